@@ -0,0 +1,46 @@
+"""Tests for the slotted AST node classes."""
+
+import pickle
+import sys
+sys.path.insert(0, '..')
+
+import pytest
+
+from zilc.parser.ast_nodes import (ASTNode, AtomNode, FormNode, LocalVarNode,
+                                   NumberNode, Program, node_fields)
+
+
+def test_nodes_have_no_instance_dict():
+    for node in (AtomNode('FOO'), NumberNode(1), LocalVarNode('X'),
+                 FormNode(AtomNode('TELL'), [NumberNode(2)])):
+        assert not hasattr(node, '__dict__')
+    with pytest.raises(AttributeError):
+        AtomNode('FOO').stray = True
+
+
+def test_atom_names_are_interned_with_cached_upper():
+    a = AtomNode(''.join(['ver', 'b?']))
+    b = AtomNode('verb?')
+    assert a.value is b.value
+    assert a.upper == 'VERB?'
+    assert a.upper is b.upper
+    assert AtomNode('TELL').upper == 'TELL'
+
+
+def test_node_fields_lists_base_and_class_slots():
+    form = FormNode(AtomNode('+'), [NumberNode(1)], line=3)
+    fields = dict(node_fields(form))
+    assert fields['line'] == 3
+    assert fields['operator'].value == '+'
+    assert [n.value for n in fields['operands']] == [1]
+    assert 'routines' in dict(node_fields(Program()))
+
+
+def test_slotted_nodes_pickle_and_compare():
+    form = FormNode(AtomNode('PRINTN'), [LocalVarNode('X')], line=7, column=2)
+    copy = pickle.loads(pickle.dumps(form))
+    assert copy.operator.upper == 'PRINTN'
+    assert copy.operands[0].name == 'X'
+    assert (copy.line, copy.column) == (7, 2)
+    assert copy == form
+    assert ASTNode.__hash__ is None
@@ -0,0 +1,43 @@
+# zorkie-batch: manifest parsing, per-game isolation and the JSON record shape.
+
+import hashlib
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from zilc.batch import load_manifest, run_batch
+
+EXAMPLES = Path(__file__).resolve().parent.parent / 'examples'
+
+
+def test_text_and_json_manifests(tmp_path):
+    txt = tmp_path / 'games.txt'
+    txt.write_text(f"# corpus\n{EXAMPLES / 'hello.zil'} 5\nsub/game.zil 3 mine\n")
+    jobs = load_manifest(str(txt))
+    assert jobs[0]['version'] == 5 and jobs[0]['name'] == 'hello'
+    assert jobs[1]['entry'] == str(tmp_path / 'sub' / 'game.zil')
+    assert jobs[1]['name'] == 'mine'
+
+    js = tmp_path / 'games.json'
+    js.write_text(json.dumps([{'entry': 'a.zil'}]))
+    assert load_manifest(str(js)) == [
+        {'entry': str(tmp_path / 'a.zil'), 'version': 3, 'name': 'a', 'output': None}]
+
+
+def test_batch_isolates_failures(tmp_path):
+    jobs = [
+        {'entry': str(EXAMPLES / 'hello.zil'), 'version': 3, 'name': 'hello', 'output': None},
+        {'entry': str(tmp_path / 'missing.zil'), 'version': 3, 'name': 'missing', 'output': None},
+        {'entry': str(EXAMPLES / 'counter.zil'), 'version': 5, 'name': 'counter', 'output': None},
+    ]
+    results = run_batch(jobs, max_workers=2, out_dir=str(tmp_path / 'out'))
+    assert [r['name'] for r in results] == ['hello', 'missing', 'counter']
+    hello, missing, counter = results
+    assert hello['ok'] and counter['ok']
+    assert not missing['ok'] and 'not found' in missing['error']
+    story = (tmp_path / 'out' / 'hello.z3').read_bytes()
+    assert hello['size'] == len(story)
+    assert hello['sha256'] == hashlib.sha256(story).hexdigest()
+    assert hello['wall'] >= 0 and isinstance(hello['warnings'], list)
@@ -0,0 +1,62 @@
+# Incremental build cache: unit splitting is lossless, cached front-end results
+# compile to the same story file, and an edit only misses the edited unit.
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from zilc.build_cache import split_units
+from zilc.compiler import ZILCompiler
+
+
+def _game(n=120, edit=None):
+    parts = ['<VERSION ZIP>', '<CONSTANT RELEASEID 1>',
+             '<ROUTINE GO () <CALL-ALL> <QUIT>>']
+    calls = []
+    for i in range(n):
+        text = edit if edit and i == n // 2 else f"Routine {i} says hi."
+        parts.append(f'<ROUTINE R{i} ("AUX" X) <SET X {i}> <TELL "{text}" N .X CR>>')
+        calls.append(f'<R{i}>')
+    parts.append('<ROUTINE CALL-ALL () %s>' % ' '.join(calls))
+    return '\n'.join(parts) + '\n'
+
+
+def test_split_units_is_lossless_and_splits():
+    src = _game()
+    units = split_units(src)
+    assert len(units) > 1
+    assert ''.join(text for _, text in units) == src
+    for first_line, text in units:
+        assert src.splitlines()[first_line - 1] == text.splitlines()[0]
+
+
+def test_split_units_ignores_brackets_in_strings_and_comments():
+    src = '<TELL ">\n<">\n;"<<<" <FOO>\n'
+    assert ''.join(t for _, t in split_units(src)) == src
+    assert split_units('<FOO\n')[0] == (1, '<FOO\n')
+
+
+def test_cached_build_matches_uncached(tmp_path):
+    src = _game()
+    plain = ZILCompiler(version=3).compile_string(src)
+    first = ZILCompiler(version=3, build_cache=str(tmp_path))
+    assert first.compile_string(src) == plain
+    second = ZILCompiler(version=3, build_cache=str(tmp_path))
+    assert second.compile_string(src) == plain
+
+
+def test_edit_reuses_other_units(tmp_path):
+    ZILCompiler(version=3, build_cache=str(tmp_path)).compile_string(_game())
+    edited = _game(edit="Changed text\nover two lines.")
+    c = ZILCompiler(version=3, build_cache=str(tmp_path))
+    story = c.compile_string(edited)
+    plain = ZILCompiler(version=3)
+    assert story == plain.compile_string(edited)
+    # Reused units were relocated to their new line numbers.
+    assert ([r.line for r in c.program.routines]
+            == [r.line for r in plain.program.routines])
+    cache = c._open_build_cache(tmp_path)
+    units = split_units(edited)
+    hits = sum(1 for _, t in units if cache.load(t) is not None)
+    assert hits >= len(units) - 1
@@ -0,0 +1,55 @@
+"""Tests for the code generator's table of builtin forms."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from zilc.codegen.codegen_improved import ImprovedCodeGenerator
+from zilc.codegen.form_builtins import BUILTIN_FORMS, form_handlers
+from zilc.compiler import ZILCompiler
+from zilc.parser.ast_nodes import AtomNode, FormNode, NumberNode, StringNode
+
+
+def _form(name, *operands):
+    return FormNode(AtomNode(name), list(operands))
+
+
+def _generator(version):
+    gen = ImprovedCodeGenerator(version=version)
+    gen._routine_names = set()      # set by generate() for a whole program
+    return gen
+
+
+def test_every_builtin_binds_to_a_generator_method():
+    gen = ImprovedCodeGenerator(version=5)
+    names = [name for builtin in BUILTIN_FORMS for name in builtin.names]
+    assert len(names) == len(set(names))
+    assert set(form_handlers(gen)) == set(names)
+    assert gen._form_handlers.keys() == set(names)
+
+
+@pytest.mark.parametrize('version, form, message', [
+    (3, _form('CRLF', NumberNode(1)), "CRLF takes no operands"),
+    (3, _form('PRINTD'), "PRINTD requires exactly 1 operand"),
+    (3, _form('PRINT'), "PRINT requires at least 1 operand"),
+    (3, _form('PRINTU', NumberNode(65)), "PRINTU requires V5 or later"),
+    (5, _form('PRINTT', NumberNode(1)), "PRINTT requires 2-4 operands"),
+    (3, _form('PRINTR', NumberNode(1)), "PRINTR requires a string operand"),
+])
+def test_operand_and_version_checks(version, form, message):
+    gen = _generator(version)
+    with pytest.raises(ValueError, match=message):
+        gen.generate_form(form)
+
+
+def test_z_aliases_and_user_routines_come_first():
+    gen = _generator(3)
+    assert gen.generate_form(_form('ZPRINTR', StringNode('Hi'))) == \
+        gen.generate_form(_form('PRINTR', StringNode('Hi')))
+    # A routine named like a builtin is called instead.
+    src = ('<ROUTINE GO () <PRINTT 1> <QUIT>> '
+           '<ROUTINE PRINTT (X) <PRINTN .X>>')
+    assert ZILCompiler(version=3).compile_string(src)
@@ -0,0 +1,52 @@
+"""Tests for hash-consing of expanded routine code."""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from zilc.compiler import ZILCompiler
+from zilc.lexer.lexer import Lexer
+from zilc.parser.hashcons import HashConsTable, share_routines
+from zilc.parser.parser import Parser
+
+SRC = ('<OBJECT LAMP (DESC "lamp") (FLAGS LIGHTBIT)> '
+       '<ROUTINE GO () <LOOK> <COND (<FSET? ,LAMP ,LIGHTBIT> <TELL "Lit." CR>)> '
+       '<COND (<FSET? ,LAMP ,LIGHTBIT> <TELL "Lit." CR>)> <QUIT>> '
+       '<ROUTINE LOOK ("AUX" (T <TABLE 1 2>) (U <TABLE 1 2>)) '
+       '<COND (<FSET? ,LAMP ,LIGHTBIT> <TELL "Lit." CR>)> <PUT .T 0 <GET .U 1>>>')
+
+
+def _program(src):
+    return Parser(Lexer(src).tokenize()).parse()
+
+
+def test_identical_subtrees_become_one_object():
+    program = _program(SRC)
+    go, look = program.routines
+    first, second = go.body[1], go.body[2]
+    assert first is not second
+    table = share_routines(program)
+    go, look = program.routines
+    assert go.body[1] is go.body[2]
+    assert look.body[0] is go.body[1]
+    assert table.shared > 0
+
+
+def test_tables_are_never_shared():
+    program = _program(SRC)
+    share_routines(program)
+    look = program.routines[1]
+    t, u = look.local_defaults['T'], look.local_defaults['U']
+    assert t is not u
+
+
+def test_tree_without_repeats_comes_back_unchanged():
+    form = Parser(Lexer('<PUT .T 0 <GET .U 1>>').tokenize()).parse_expression()
+    assert HashConsTable().share(form) is form
+
+
+def test_hash_cons_does_not_change_the_story_file():
+    plain = ZILCompiler(version=3).compile_string(SRC)
+    shared = ZILCompiler(version=3, hash_cons=True).compile_string(SRC)
+    assert shared == plain
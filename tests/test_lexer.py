@@ -1,9 +1,10 @@
 """Tests for the ZIL lexer."""
 
+import pickle
 import sys
 sys.path.insert(0, '..')
 
-from zilc.lexer import Lexer, TokenType
+from zilc.lexer import Lexer, TokenStream, TokenType
 
 
 def test_basic_form():
@@ -66,10 +67,60 @@ def test_comments():
     print("✓ Comment test passed")
 
 
+def test_positions_and_special_tokens():
+    """Test line/column tracking and the less common token kinds."""
+    source = ('<ROUTINE\tFOO! (X)\n  ;"c\\"x" %,G .\n  Y #2 101 $1F *17* !\\" \\.\n'
+              ';<A "<"> (;BAR) <+ %<- 1 2> %<COND (T 1)>>')
+    tokens = Lexer(source).tokenize()
+    got = [(t.type.name, t.value, t.line, t.column) for t in tokens]
+    assert got == [
+        ('LANGLE', '<', 1, 1), ('ATOM', 'ROUTINE', 1, 2), ('ATOM', 'FOO', 1, 10),
+        ('LPAREN', '(', 1, 15), ('ATOM', 'X', 1, 16), ('RPAREN', ')', 1, 17),
+        ('CHAR_GLOBAL_VAR', 'G', 2, 12), ('PERIOD', '.', 2, 15), ('ATOM', 'Y', 3, 3),
+        ('NUMBER', 5, 3, 5), ('NUMBER', 31, 3, 12), ('NUMBER', 15, 3, 16),
+        ('ATOM', '!\\"', 3, 21), ('ATOM', '\\.', 3, 25),
+        ('LPAREN', '(', 4, 10), ('RPAREN', ')', 4, 15), ('LANGLE', '<', 4, 17),
+        ('ATOM', '+', 4, 18), ('LANGLE', '<', 4, 21), ('ATOM', '-', 4, 22),
+        ('NUMBER', 1, 4, 24), ('NUMBER', 2, 4, 26), ('RANGLE', '>', 4, 27),
+        ('NUMBER', 0, 4, 29), ('RANGLE', '>', 4, 42), ('EOF', None, 4, 43)]
+
+
+def test_unterminated_string_reports_start():
+    """Test the error location of an unterminated string."""
+    try:
+        Lexer('<TELL\n "abc>', 'f.zil').tokenize()
+    except SyntaxError as e:
+        assert str(e) == 'f.zil:2:7: Unterminated string starting at 2:2'
+    else:
+        assert False, "expected SyntaxError"
+
+
+def test_token_stream_join_and_pickle():
+    """Test that unit streams join into the whole text's stream."""
+    parts = ['<ROUTINE A ()\n  <TELL "x">>\n', '\n<GLOBAL B 1>\n', ';"c" <C>']
+    whole = Lexer(''.join(parts)).tokenize()
+    assert isinstance(whole, TokenStream)
+    units = [Lexer(part).tokenize() for part in parts]
+    joined = TokenStream.join(units)
+    assert list(joined) == list(whole)
+    assert whole[-1].type == TokenType.EOF and whole[-2:] == list(whole)[-2:]
+    # Equal atoms of one text share one object.
+    stream = Lexer('<A> <A>').tokenize()
+    assert stream[1].value is stream[4].value
+    copy = pickle.loads(pickle.dumps(units[1]))
+    copy.line += 3
+    assert [(t.value, t.line) for t in copy] == [('<', 5), ('GLOBAL', 5), ('B', 5),
+                                                  (1, 5), ('>', 5), (None, 6)]
+    assert list(TokenStream.join([])) == [whole[-1].__class__(TokenType.EOF, None, 1, 1)]
+
+
 if __name__ == '__main__':
     test_basic_form()
     test_strings()
     test_numbers()
     test_variables()
     test_comments()
+    test_positions_and_special_tokens()
+    test_unterminated_string_reports_start()
+    test_token_stream_join_and_pickle()
     print("\nAll lexer tests passed!")
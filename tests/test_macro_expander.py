@@ -0,0 +1,180 @@
+"""Tests for MacroExpander's expansion engine."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from zilc.lexer.lexer import Lexer
+from zilc.parser.parser import Parser
+from zilc.parser.ast_nodes import FormNode, StringNode
+from zilc.parser.macro_expander import MacroExpander, MacroExpansionError
+from zilc.parser.macro_profile import MacroProfile
+
+
+def _expander(src):
+    program = Parser(Lexer(src).tokenize()).parse()
+    expander = MacroExpander()
+    for macro in program.macros:
+        expander.define_macro(macro)
+    return expander
+
+
+def _call(src):
+    return Parser(Lexer(src).tokenize()).parse_expression()
+
+
+def _render(node):
+    if isinstance(node, FormNode):
+        return [_render(node.operator)] + [_render(o) for o in node.operands]
+    return getattr(node, 'value', getattr(node, 'name', None))
+
+
+def test_expansion_leaves_the_macro_body_untouched():
+    expander = _expander('<DEFMAC SAY (X) <FORM TELL "<" .X ">" CR>>')
+    body = repr(expander.macros['SAY'].body)
+    first = expander.expand(_call('<SAY "a">'))
+    second = expander.expand(_call('<SAY "b">'))
+    assert _render(first) == ['TELL', '<', 'a', '>', 'CR']
+    assert _render(second) == ['TELL', '<', 'b', '>', 'CR']
+    assert repr(expander.macros['SAY'].body) == body
+
+
+def test_quasiquote_expansion_shares_literal_subtrees():
+    expander = _expander('<DEFMAC TWICE (X) `<PROG () <TELL "hi" CR> <PRINTN ~.X>>>')
+    first = expander.expand(_call('<TWICE 1>'))
+    second = expander.expand(_call('<TWICE 2>'))
+    # The unquoted spine is rebuilt per call site...
+    assert first is not second
+    assert _render(first.operands[2]) == ['PRINTN', 1]
+    assert _render(second.operands[2]) == ['PRINTN', 2]
+    # ...while the literal <TELL "hi" CR> is the template's own node.
+    assert first.operands[1] is second.operands[1]
+    assert isinstance(first.operands[1].operands[0], StringNode)
+
+
+def test_unchanged_substitution_returns_the_template():
+    expander = _expander('<DEFMAC HELLO () <TELL "hello" CR>>')
+    assert expander.expand(_call('<HELLO>')) is expander.macros['HELLO'].body
+
+
+def _expand_program(src):
+    expander = MacroExpander()
+    program = expander.expand_all(Parser(Lexer(src).tokenize()).parse())
+    return expander, program
+
+
+def test_pure_macro_expansions_are_cached():
+    expander, program = _expand_program(
+        '<DEFMAC SAY (X) <FORM TELL .X CR>> '
+        '<ROUTINE GO () <SAY "a"> <SAY "a"> <SAY "b">>')
+    first, again, other = program.routines[0].body
+    assert again is first
+    assert _render(first) == ['TELL', 'a', 'CR']
+    assert _render(other) == ['TELL', 'b', 'CR']
+    assert (expander.expansion_cache_hits, expander.expansion_cache_misses) == (1, 2)
+
+
+def test_side_effecting_macros_are_not_cached():
+    expander, program = _expand_program(
+        '<DEFMAC NOTE (X) <SETG LAST .X> <FORM TELL .X>> '
+        '<DEFMAC LOUD (X) <PRINC "!"> <FORM TELL .X>> '
+        '<DEFMAC VIA (X) <FORM NOTE .X>> '
+        '<ROUTINE GO () <NOTE "a"> <NOTE "a"> <LOUD "a"> <LOUD "a"> '
+        '<VIA "a"> <VIA "a">>')
+    assert (expander.expansion_cache_hits, expander.expansion_cache_misses) == (0, 0)
+
+
+def test_redefining_a_macro_clears_the_cache():
+    expander, _program = _expand_program(
+        '<DEFMAC SAY (X) <FORM TELL .X CR>> <ROUTINE GO () <SAY "a">>')
+    assert expander.expansion_cache
+    for macro in _expander('<DEFMAC SAY (X) <FORM PRINTI .X>>').macros.values():
+        expander.define_macro(macro)
+    assert not expander.expansion_cache
+
+
+def test_evaluator_dispatches_primitives_and_root_oblist_names():
+    evaluator = MacroExpander().mdl_evaluator
+    assert evaluator.evaluate(_call('<+ 1 <MOD 7 4>>'), {}) == 4
+    assert evaluator.evaluate(_call('<LIST!- 1 2>'), {}) == [1, 2]
+    assert evaluator.evaluate(_call('<GASSIGNED? ZILCH>'), {}) is True
+    # Outside a compile-time REPEAT, RETURN is runtime code and stays a form.
+    form = _call('<RETURN 1>')
+    assert evaluator.evaluate(form, {}) is form
+
+
+def test_code_without_macro_calls_is_shared_not_copied():
+    source = ('<DEFMAC SAY (X) <FORM TELL .X CR>> '
+              '<ROUTINE GO () <COND (<FSET? ,LAMP ,ONBIT> <PRINTI "on">)> '
+              '<REPEAT () <COND (<SAY "a"> <RETURN>)>>>')
+    program = Parser(Lexer(source).tokenize()).parse()
+    plain, looped = program.routines[0].body
+    inner = looped.body[0].clauses[0][1][0]
+    MacroExpander().expand_all(program)
+    new_plain, new_looped = program.routines[0].body
+    assert new_plain is plain
+    # Only the path down to the macro call is rebuilt.
+    assert new_looped is not looped
+    assert _render(new_looped.body[0].clauses[0][0]) == ['TELL', 'a', 'CR']
+    assert new_looped.body[0].clauses[0][1][0] is inner
+
+
+def test_profile_counts_calls_cache_hits_and_depth():
+    expander = MacroExpander()
+    expander.profile = MacroProfile()
+    expander.expand_all(Parser(Lexer(
+        '<DEFMAC SAY (X) <FORM TELL .X CR>> <DEFMAC BOTH (X) <FORM PROG () <FORM SAY .X>>> '
+        '<ROUTINE GO () <SAY "a"> <SAY "a"> <BOTH "b">>').tokenize()).parse())
+    say, both = expander.profile.get('SAY'), expander.profile.get('BOTH')
+    assert (say.calls, say.cached, say.max_depth) == (2, 1, 2)
+    assert (both.calls, both.cached, both.max_depth) == (1, 0, 1)
+    assert say.nodes and both.nodes
+    assert 'SAY' in expander.profile.format_report()
+
+
+def test_runaway_expansion_fails_at_the_call_site():
+    expander = MacroExpander()
+    expander.source_name = 'loop.zil'
+    expander.max_expansion_depth = 10
+    program = Parser(Lexer('<DEFMAC LOOP () <FORM LOOP>>\n'
+                           '<ROUTINE GO ()\n  <LOOP>>').tokenize()).parse()
+    with pytest.raises(MacroExpansionError) as excinfo:
+        expander.expand_all(program)
+    message = str(excinfo.value)
+    assert message.startswith('loop.zil:3:')
+    assert 'nested deeper than 10 levels expanding LOOP' in message
+
+
+def test_expansion_node_limit():
+    expander = MacroExpander()
+    expander.max_expansion_nodes = 20
+    program = Parser(Lexer(
+        '<DEFMAC BIG () <FORM PROG () <FORM TELL "a" "b" "c" "d" "e" "f" "g" "h" '
+        '"i" "j" "k" "l" "m" "n" "o" "p" "q" "r" "s" "t" "u">>> '
+        '<ROUTINE GO () <BIG>>').tokenize()).parse()
+    with pytest.raises(MacroExpansionError, match='more than 20 nodes expanding BIG'):
+        expander.expand_all(program)
+
+
+def test_parallel_routine_expansion_matches_sequential(capsys):
+    # LOUD prints at expansion time, so its routines expand in this process,
+    # in order, between the parallel runs of the SAY routines.
+    routines = [f'<ROUTINE R{i} () <SAY "r{i}">'
+                + (f' <LOUD "{i}">>' if i in (20, 30) else '>') for i in range(60)]
+    source = ('<DEFMAC SAY (X) <FORM TELL .X CR>> '
+              '<DEFMAC LOUD (X "AUX" Y) <SET Y <PRINC .X>> <FORM RTRUE>> '
+              + ' '.join(routines))
+    results = []
+    for jobs in (1, 3):
+        expander = MacroExpander()
+        expander.jobs = jobs
+        expander.profile = MacroProfile()
+        program = expander.expand_all(Parser(Lexer(source).tokenize()).parse())
+        results.append(([[_render(stmt) for stmt in r.body] for r in program.routines],
+                        capsys.readouterr().out, expander.profile.get('SAY').calls))
+    assert results[0] == results[1]
+    assert results[1][0][20] == [['TELL', 'r20', 'CR'], ['RTRUE']]
+    assert results[1][1] == '2030'
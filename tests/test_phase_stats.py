@@ -0,0 +1,53 @@
+# Per-phase timing report: compile_string records one PhaseRecord per pipeline
+# stage on compiler.phase_stats, with memory peaks only when timings=True.
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from zilc.compiler import ZILCompiler
+from zilc.phase_stats import PhaseStats
+
+SRC = '<ROUTINE GO () <TELL "Hello" CR> <QUIT>>'
+
+
+def test_compile_string_records_every_phase():
+    c = ZILCompiler(version=3)
+    c.compile_string(SRC)
+    names = [r.name for r in c.phase_stats]
+    for expected in ('preprocess', 'directives', 'lex', 'parse', 'symbols',
+                     'abbreviations', 'codegen', 'dictionary', 'objects',
+                     'optimize', 'assemble'):
+        assert expected in names
+    assert all(r.wall >= 0 and r.cpu >= 0 for r in c.phase_stats)
+    # Memory is not traced by default.
+    assert all(r.peak_memory is None for r in c.phase_stats)
+
+
+def test_timings_flag_records_memory_peaks():
+    c = ZILCompiler(version=3, timings=True)
+    c.compile_string(SRC)
+    assert all(isinstance(r.peak_memory, int) for r in c.phase_stats)
+    d = c.phase_stats.to_dict()
+    assert d['phases'][0]['name'] == 'preprocess'
+    assert 'total_wall' in d
+
+
+def test_failed_compile_keeps_partial_stats():
+    c = ZILCompiler(version=3)
+    try:
+        c.compile_string('<ROUTINE GO () <NO-SUCH-ROUTINE>>')
+    except SyntaxError:
+        pass
+    assert c.phase_stats.get('codegen') is not None
+    assert c.phase_stats.get('assemble') is None
+
+
+def test_begin_closes_previous_phase():
+    s = PhaseStats()
+    s.begin('a')
+    s.begin('b')
+    s.finish()
+    assert [r.name for r in s] == ['a', 'b']
+    assert 'total' in s.format_report()
@@ -0,0 +1,61 @@
+"""Tests for the whole-program analysis the code generator reads."""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from zilc.codegen.program_facts import Collector, analyze_program, walk
+from zilc.lexer.lexer import Lexer
+from zilc.parser.parser import Parser
+
+SRC = ('<GLOBAL TICKER I-TICK> <CONSTANT GREETING "Hi"> '
+       '<ROUTINE GO () <TELL "Hi" CR> <QUEUE I-CLOCK 3> <LATER> <SETG X .Y>> '
+       '<ROUTINE LATER () <TELL "Hi" CR>> '
+       '<ROUTINE I-TICK () <RTRUE>> <ROUTINE I-CLOCK () <RFALSE>>')
+
+
+def _program(src=SRC):
+    return Parser(Lexer(src).tokenize()).parse()
+
+
+def test_value_position_names_skip_calls_and_definitions():
+    facts = analyze_program(_program())
+    assert {'I-TICK', 'I-CLOCK', 'X', 'Y'} <= facts.value_position_names
+    assert 'LATER' not in facts.value_position_names
+    assert 'GO' not in facts.value_position_names
+
+
+def test_string_counts_are_per_occurrence():
+    program = _program()
+    go = program.routines[0]
+    go.body.append(go.body[0])          # a subtree shared by expansion
+    facts = analyze_program(program)
+    assert facts.string_uses['Hi'] == 4
+    assert facts.string_use_counts['Hi'] == 4
+
+
+def test_names_and_global_initializers():
+    facts = analyze_program(_program())
+    assert {'LATER', 'SETG', 'X', 'Y', 'QUEUE'} <= facts.names
+    assert 'GO' not in facts.names            # definitions are not walked
+    assert 'Hi' not in facts.names
+    assert 'I-TICK' in facts.global_init_names['TICKER']
+
+
+class _Atoms(Collector):
+    def __init__(self):
+        self.seen = []
+
+    def roots(self, program):
+        return [program.routines[1].body]
+
+    def name(self, text):
+        self.seen.append(text)
+
+
+def test_collectors_only_see_their_roots():
+    program = _program()
+    atoms = _Atoms()
+    walk(program, [atoms])
+    assert 'TELL' in atoms.seen and 'QUEUE' not in atoms.seen
@@ -0,0 +1,260 @@
+"""Tests for relocations recorded in routine code and their application."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from zilc.compiler import ZILCompiler
+from zilc.zmachine.assembler import ZAssembler
+from zilc.zmachine.relocations import (CODE, ROUTINE, STRING, TABLE, VOCAB,
+                                     Relocation)
+from zilc.zmachine.string_table import StringTable
+from zilc.zmachine.text_encoding import ZTextEncoder
+
+EXAMPLES = Path(__file__).resolve().parent.parent / 'examples'
+
+
+def test_apply_relocations_patches_only_recorded_words():
+    asm = ZAssembler(3)
+    asm.high_mem_base = 0x1000
+    strings = StringTable(ZTextEncoder(3), 3)
+    strings.add_string('hi')
+    strings.set_base_address(0x2000)
+    # jump #FC05 ; then a routine, a vocab and a string operand slot
+    section = bytes([0x8C, 0xFC, 0x05, 0xF0, 0x01, 0xFB, 0x02, 0x00, 0x00,
+                     0x00, 0x00])
+    relocs = [Relocation(CODE, 3, ROUTINE, 0x20),
+              Relocation(CODE, 7, VOCAB, 9),
+              Relocation(CODE, 9, STRING, 'hi')]
+    out = asm.apply_relocations(section, relocs, strings, {9: 0x1234}.get)
+    assert out[3:5] == ((0x1000 + 0x20) // 2).to_bytes(2, 'big')
+    assert out[7:9] == bytes([0x12, 0x34])
+    assert out[9:11] == strings.get_packed_address('hi', 3).to_bytes(2, 'big')
+    # Marker-looking bytes nobody recorded are left alone.
+    assert out[:3] == section[:3] and out[5:7] == section[5:7]
+    # Without a string table (or a vocab resolver) those slots stay as is.
+    assert asm.apply_relocations(section, relocs)[7:] == section[7:]
+
+
+def test_generated_code_records_every_kind():
+    src = ('<ROUTINE GO () <FOO "A string operand"> '
+           '<TELL "Hello there, this is a longer message" CR> '
+           '<TELL "Hello there, this is a longer message" CR> '
+           '<FOO ,W?LAMP> <QUIT>> '
+           '<ROUTINE FOO (S) <PRINTN .S>> '
+           '<OBJECT LAMP (SYNONYM LAMP)>')
+    compiler = ZILCompiler(version=3)
+    story = compiler.compile_string(src)
+    gen = compiler._last_codegen
+    relocs = gen.get_code_relocations()
+    assert {r.kind for r in relocs} == {ROUTINE, STRING, VOCAB}
+    assert len({r.offset for r in relocs}) == len(relocs)
+
+    high = (story[4] << 8) | story[5]
+    dictionary = (story[8] << 8) | story[9]
+
+    def word(r):
+        return (story[high + r.offset] << 8) | story[high + r.offset + 1]
+
+    for r in relocs:
+        if r.kind == ROUTINE:
+            assert r.target == gen.routines['FOO']
+            assert word(r) == (high + r.target) // 2
+        elif r.kind == STRING:
+            # Strings follow the routine code.
+            assert word(r) * 2 >= high + len(gen.code)
+        else:
+            assert dictionary < word(r) < high
+    tells = [word(r) for r in relocs
+             if r.kind == STRING and r.target.startswith('Hello')]
+    assert len(tells) == 2 and tells[0] == tells[1]
+
+
+def test_parallel_codegen_links_the_serial_story(monkeypatch, capsys):
+    from zilc.codegen import parallel_codegen
+    routines = ['<ROUTINE GO () <R0 1> <QUIT>>']
+    for i in range(24):
+        routines.append(
+            f'<ROUTINE R{i} (N "AUX" X) '
+            f'<TELL "Routine {i % 7} says hello to everyone" CR> '
+            f'<R{(i * 5 + 3) % 24} "Operand string {i % 5} for the callee"> '
+            f'<SET X ,W?WORD{i % 6}> '
+            + ('<SET X <OR <R1 .X> <R2 .X>>> ' if i % 8 == 4 else '')
+            + '<RETURN .X>>')
+    src = ' '.join(routines) + ' <OBJECT THING (SYNONYM '\
+        + ' '.join(f'WORD{i}' for i in range(6)) + ')>'
+    replayed = []
+    replay = parallel_codegen._replay
+    monkeypatch.setattr(parallel_codegen, '_replay',
+                        lambda *args: replayed.append(replay(*args)) or replayed[-1])
+    stories = []
+    for jobs in (1, 3):
+        compiler = ZILCompiler(version=3, codegen_jobs=jobs)
+        stories.append((compiler.compile_string(src), compiler.warnings,
+                        capsys.readouterr()))
+    assert stories[0] == stories[1]
+    assert any(replayed)
+
+
+def test_marks_follow_code_the_peepholes_rewrite():
+    # Each string is pushed and returned; the peepholes turn that into a
+    # `ret` of the string, which must keep the string's mark.
+    src = ('<GLOBAL FLAG <>> '
+           '<ROUTINE GO () <PRINT <PICK>> <QUIT>> '
+           '<ROUTINE PICK () <COND (,FLAG "oyster") (ELSE "clam")>>')
+    compiler = ZILCompiler(version=3)
+    compiler.compile_string(src)
+    gen = compiler._last_codegen
+    marks = {target: off for off, kind, target in gen._code_marks}
+    assert {'oyster', 'clam'} <= set(marks)
+    for text in ('oyster', 'clam'):
+        off = marks[text]
+        assert gen.code[off - 1] == 0x8B        # ret <large constant>
+    assert {r.target for r in gen.get_code_relocations()
+            if r.kind == STRING} == {'oyster', 'clam'}
+
+
+def test_globals_and_properties_record_their_marks():
+    src = ('<GLOBAL NUMS <TABLE 1 2 3>> '
+           '<GLOBAL GREETING "A global string"> '
+           '<ROUTINE GO () <PRINT ,GREETING> <QUIT>> '
+           '<ROUTINE LAMP-F () <RTRUE>> '
+           '<OBJECT LAMP (SYNONYM LAMP) (ACTION LAMP-F) '
+           '(LDESC "A brass lamp is here.")>')
+    compiler = ZILCompiler(version=3)
+    story = compiler.compile_string(src)
+    gen = compiler._last_codegen
+
+    def word(at):
+        return (story[at] << 8) | story[at + 1]
+
+    globals_addr = word(0x0C)
+    relocs = {r.offset: r for r in gen.get_global_relocations()}
+    nums = relocs[(gen.globals['NUMS'] - 0x10) * 2]
+    greeting = relocs[(gen.globals['GREETING'] - 0x10) * 2]
+    assert nums.kind == TABLE
+    assert word(globals_addr + nums.offset) < word(0x0E)     # dynamic memory
+    assert (greeting.kind, greeting.target) == (STRING, 'A global string')
+    assert word(globals_addr + greeting.offset) * 2 >= word(0x04)
+
+    # LAMP is object 1; walk its property data for the three addresses.
+    objects = word(0x0A)
+    p = word(objects + 31 * 2 + 7)
+    p += 1 + 2 * story[p]
+    words = []
+    while story[p]:
+        size = (story[p] >> 5) + 1
+        words += [word(p + 1 + j) for j in range(0, size - 1, 2)]
+        p += 1 + size
+    high = word(0x04)
+    assert (high + gen.routines['LAMP-F']) // 2 in words
+    assert any(w * 2 >= high + len(gen.code) for w in words)     # LDESC
+    dictionary = word(0x08)
+    assert any(dictionary < w < high for w in words)              # SYNONYM
+
+
+def test_string_properties_are_relocated():
+    # Property strings used to keep their 0xF4xx data-string markers.
+    src = ('<ROUTINE GO () <QUIT>> '
+           '<OBJECT LAMP (DESC "lamp") (LDESC "A brass lamp is here.") '
+           '(TEXT "Made of brass.")>')
+    compiler = ZILCompiler(version=3)
+    story = compiler.compile_string(src)
+    gen = compiler._last_codegen
+
+    def word(at):
+        return (story[at] << 8) | story[at + 1]
+
+    objects = word(0x0A)
+    p = word(objects + 31 * 2 + 7)
+    p += 1 + 2 * story[p]
+    props = {}
+    while story[p]:
+        props[story[p] & 0x1F] = word(p + 1)
+        p += 2 + (story[p] >> 5)
+    strings = word(0x04) + len(gen.code)
+    texts = [props[gen.constants[name]] for name in ('P?LDESC', 'P?TEXT')]
+    assert all(strings <= w * 2 < len(story) for w in texts)
+    assert texts[0] != texts[1]
+
+
+def test_table_data_records_its_marks():
+    # -4 stores 0xFFFC, whose 'fc' byte used to pass for a string marker.
+    src = ('<GLOBAL STUFF <TABLE -4 FOO "A table string" <VOC "LAMP" NOUN> 0>> '
+           '<ROUTINE GO () <PRINTN <GET ,STUFF 0>> <QUIT>> '
+           '<ROUTINE FOO () <RTRUE>> '
+           '<OBJECT LAMP (SYNONYM LAMP)>')
+    compiler = ZILCompiler(version=3)
+    story = compiler.compile_string(src)
+    gen = compiler._last_codegen
+    relocs = gen.get_table_relocations()
+    assert sorted(r.kind for r in relocs) == sorted([ROUTINE, STRING, VOCAB])
+
+    def word(at):
+        return (story[at] << 8) | story[at + 1]
+
+    high = word(0x04)
+    stuff = word(0x0C) + (gen.globals['STUFF'] - 0x10) * 2
+    data = [word(word(stuff) + 2 * i) for i in range(5)]
+    assert data[0] == 0xFFFC and data[4] == 0
+    assert data[1] == (high + gen.routines['FOO']) // 2
+    assert data[2] * 2 >= high + len(gen.code)
+    assert word(0x08) < data[3] < high
+
+
+@pytest.mark.parametrize('name,version', [
+    ('held_test', 3), ('prob_test', 3), ('multiversion_test_v5', 5)])
+def test_examples_leave_no_marker_in_the_code(name, version):
+    # HELD?, PROB, COLOR and FONT used to emit code that does not decode,
+    # so the TELL strings beside them kept their markers.
+    compiler = ZILCompiler(version=version)
+    story = compiler.compile_string((EXAMPLES / f'{name}.zil').read_text())
+    gen = compiler._last_codegen
+    relocs = gen.get_code_relocations()
+    high = (story[4] << 8) | story[5]
+    code = story[high:high + len(gen.code)]
+    assert gen.find_unrelocated_markers(code, relocs) == []
+    assert ({off for off, _ in gen.find_unrelocated_markers(bytes(gen.code), [])}
+            == {r.offset for r in relocs})
+
+
+def test_held_takes_an_optional_holder():
+    objects = '<OBJECT BOX> <OBJECT COIN (IN BOX)> <GLOBAL WINNER <>> '
+    codes = []
+    for test in ('<HELD? ,COIN ,BOX>', '<IN? ,COIN ,BOX>'):
+        compiler = ZILCompiler(version=3)
+        compiler.compile_string(
+            objects + f'<ROUTINE GO () <PRINTN {test}> <QUIT>>')
+        codes.append(bytes(compiler._last_codegen.code))
+    assert codes[0] == codes[1]
+
+def test_marks_that_do_not_resolve_are_reported():
+    src = ('<ROUTINE GO () <FOO "A string operand"> <QUIT>> '
+           '<ROUTINE FOO (S) <PRINTN .S>>')
+    compiler = ZILCompiler(version=3)
+    story = compiler.compile_string(src)
+    gen = compiler._last_codegen
+    relocs = gen.get_code_relocations()
+    assert {r.kind for r in relocs} == {ROUTINE, STRING}
+    # Patched, no marker is left; unpatched, every one the relocations
+    # cover is found.
+    high = (story[4] << 8) | story[5]
+    assert gen.find_unrelocated_markers(
+        story[high:high + len(gen.code)], relocs) == []
+    code = bytes(gen.code)
+    assert ({off for off, _ in gen.find_unrelocated_markers(code, [])}
+            == {r.offset for r in relocs})
+    # A mark whose word no longer holds its marker is an error.
+    lost = relocs[0].offset
+    gen.code = code[:lost] + b'\x00\x00' + code[lost + 2:]
+    with pytest.raises(SyntaxError, match='does not hold its marker'):
+        gen.get_code_relocations()
+    # A relocation that cannot be resolved is kept for the assembler,
+    # which refuses to build a story around it.
+    asm = ZAssembler(3)
+    reloc = Relocation(CODE, 0, STRING, 'nowhere')
+    assert asm.apply_relocations(b'\xfc\x00', [reloc]) == b'\xfc\x00'
+    assert asm.unresolved_relocations == [reloc]
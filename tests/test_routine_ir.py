@@ -0,0 +1,167 @@
+"""Tests for the decoded (symbolic) form of generated code."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from zilc.codegen import codegen_improved
+from zilc.codegen.routine_ir import (END, LARGE, SMALL, VARIABLE, DecodeError,
+                                     branch_targets, decode, encode,
+                                     large_const_positions, print_paddr_positions,
+                                     relax)
+from zilc.compiler import ZILCompiler
+
+# je L01,#5 ?~L ; print_paddr #F012 ; call #F0A0,L02 -> sp ; L: jump L ;
+# print "a" ; rtrue
+CODE = bytes([
+    0x41, 0x01, 0x05, 0x4B,             # je local1,#5 [false] L
+    0x8D, 0xF0, 0x12,                   # print_paddr #F012
+    0xE0, 0x2F, 0xF0, 0xA0, 0x02, 0x00,  # call #F0A0 local2 -> sp
+    0x8C, 0xFF, 0xFF,                   # L: jump L
+    0xB2, 0x98, 0xA5,                   # print "a"
+    0xB0,                               # rtrue
+])
+
+
+def test_decode_types_operands_and_labels():
+    instrs = decode(CODE, 3)
+    je, pp, call, jump, text, rtrue = instrs
+    assert je.kind == '2OP' and je.operands == [(VARIABLE, 1, 1), (SMALL, 5, 2)]
+    assert (je.branch_on, je.branch_len, je.branch_off) == (False, 1, 11)
+    assert je.label is jump and je.target == jump.start
+    assert call.kind == 'VAR' and call.store == 0
+    assert call.operands[0] == (LARGE, 0xF0A0, 9)
+    assert jump.is_jump and jump.label is jump
+    assert text.text == bytes([0x98, 0xA5]) and rtrue.label is None
+    assert branch_targets(instrs) == {jump.start}
+    assert large_const_positions(instrs) == [9]
+    assert large_const_positions(instrs, include_print_paddr=True) == [5, 9]
+    assert print_paddr_positions(instrs) == [4]
+
+
+def test_encode_round_trips_and_relabels():
+    instrs = decode(CODE, 3)
+    assert encode(instrs) == CODE
+    # Dropping the print_paddr moves everything after it: the branch offset
+    # and the jump (which targets itself) are recomputed from their labels.
+    del instrs[1]
+    out = encode(instrs)
+    again = decode(out, 3)
+    assert again[0].branch_off == 8 and again[0].target == again[2].start
+    assert again[2].jump_off == -1
+
+
+def test_a_dropped_target_is_an_error():
+    instrs = decode(CODE, 3)
+    del instrs[3]
+    with pytest.raises(ValueError):
+        encode(instrs)
+
+
+# je L01,#5 ?~A (2-byte form) ; jump B (large) ; A: rtrue ; B: rfalse
+WIDE = bytes([0x41, 0x01, 0x05, 0x00, 0x05, 0x8C, 0x00, 0x03, 0xB0, 0xB1])
+
+
+def test_relax_picks_the_shortest_forms():
+    instrs = decode(WIDE, 3)
+    assert relax(instrs)
+    assert encode(instrs) == bytes([0x41, 0x01, 0x05, 0x44, 0x9C, 0x03,
+                                    0xB0, 0xB1])
+    assert not relax(instrs)
+    # A jump back to itself needs the signed large form.
+    instrs = decode(CODE, 3)
+    relax(instrs)
+    assert decode(encode(instrs), 3)[3].op == 0x8C
+
+
+def test_relax_widens_what_does_not_reach():
+    instrs = decode(WIDE, 3)
+    instrs[2:2] = [decode(bytes([0xBB]), 3)[0] for _ in range(70)]
+    relax(instrs)
+    again = decode(encode(instrs), 3)
+    je, jump = again[0], again[1]
+    assert je.branch_len == 2 and je.label is again[72]
+    assert jump.op == 0x9C and jump.label is again[73]
+
+
+def test_truncated_code_does_not_decode():
+    with pytest.raises(DecodeError):
+        decode(CODE[:-3], 3)
+    with pytest.raises(DecodeError):
+        decode(bytes([0xBE, 0x09, 0xFF, 0x00]), 3)     # EXT before V5
+
+
+@pytest.mark.parametrize('version', [3, 5])
+def test_generated_routines_decode(version):
+    compiler = ZILCompiler(version=version)
+    compiler.compile_string('<ROUTINE GO () <TELL "Hi" CR> <PRINTN <+ 1 2>> <QUIT>>')
+    gen = compiler._last_codegen
+    start = gen.routines['GO']
+    body = start + 1 + (2 * gen.code[start] if version <= 4 else 0)
+    instrs = decode(bytes(gen.code), version, body)
+    assert instrs[-1].kind == '0OP' and instrs[-1].opnum == 0x0A    # quit
+
+
+# The last routine of the story, so its code runs to the end of gen.code.
+LOOP = ('<GLOBAL FLAG <>> <GLOBAL N 0> '
+        '<ROUTINE GO () <FROB 3> <QUIT>> '
+        '<ROUTINE FROB (X "AUX" Y) '
+        '<REPEAT () <COND (<AND ,FLAG <G? .X 2>> <TELL "big" CR> <RETURN>) '
+        '(<OR <EQUAL? .X 1 2> <L? .Y 0>> <SET Y <+ .Y 1>>) '
+        '(ELSE <SETG N <- ,N 1>>)> '
+        '<COND (<0? .X> <RTRUE>)> <SET X <- .X 1>>> <RFALSE>>')
+
+
+def _frob(monkeypatch, peephole):
+    if not peephole:
+        monkeypatch.setattr(codegen_improved, '_SZ3_PEEP', '')
+    compiler = ZILCompiler(version=3)
+    compiler.compile_string(LOOP)
+    gen = compiler._last_codegen
+    start = gen.routines['FROB']
+    body = start + 1 + 2 * gen.code[start]
+    return bytes(gen.code), body
+
+
+def _labels(instrs):
+    """Each branch or jump's target as an instruction index (or END)."""
+    index = {id(ins): k for k, ins in enumerate(instrs)}
+    found = {}
+    for k, ins in enumerate(instrs):
+        if ins.target is not None:
+            assert ins.label is not None, f"{ins!r} lands inside an instruction"
+            found[k] = END if ins.label is END else index[id(ins.label)]
+    return found
+
+
+def test_relaxed_routines_keep_their_labels(monkeypatch):
+    code, body = _frob(monkeypatch, peephole=False)
+    instrs = decode(code, 3, body)
+    before = _labels(instrs)
+    assert relax(instrs, body)
+    relaxed = code[:body] + encode(instrs, body)
+    assert len(relaxed) < len(code)
+    again = decode(relaxed, 3, body)
+    assert [ins.opnum for ins in again] == [ins.opnum for ins in instrs]
+    assert _labels(again) == before
+
+
+def test_peephole_output_branches_to_instructions(monkeypatch):
+    code, body = _frob(monkeypatch, peephole=True)
+    _labels(decode(code, 3, body))
+
+
+def test_a_rewrite_that_does_not_encode_is_logged(monkeypatch, capsys):
+    def refuse(instrs, start=0):
+        raise ValueError("branch offset 99999 does not fit")
+
+    code, _body = _frob(monkeypatch, peephole=False)
+    monkeypatch.undo()
+    monkeypatch.setattr(codegen_improved, 'encode', refuse)
+    compiler = ZILCompiler(version=3, verbose=True)
+    compiler.compile_string(LOOP)
+    assert bytes(compiler._last_codegen.code) == code
+    assert 'peephole skipped in FROB: branch offset 99999' in capsys.readouterr().err
@@ -0,0 +1,99 @@
+# Compile server: builds answered over the Unix socket match a direct compile,
+# and the warm unit store is reused across requests.
+
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from zilc.compiler import ZILCompiler
+from zilc.server import CompileServer, request
+
+HELLO = Path(__file__).resolve().parent.parent / 'examples' / 'hello.zil'
+
+pytestmark = pytest.mark.skipif(not hasattr(__import__('socket'), 'AF_UNIX'),
+                                reason='needs Unix domain sockets')
+
+
+@pytest.fixture
+def server(tmp_path):
+    srv = CompileServer(str(tmp_path / 'z.sock'))
+    t = threading.Thread(target=srv.serve_until_shutdown, daemon=True)
+    t.start()
+    yield srv
+    request(srv.socket_path, {'command': 'shutdown'}, timeout=10)
+    t.join(10)
+
+
+def test_server_build_matches_direct_compile(server, tmp_path):
+    out = tmp_path / 'hello.z3'
+    resp = request(server.socket_path, {'input': str(HELLO), 'output': str(out)}, timeout=60)
+    assert resp['ok'], resp
+    assert resp['size'] == out.stat().st_size
+    direct = ZILCompiler(version=3).compile_string(HELLO.read_text(), str(HELLO))
+    assert out.read_bytes() == direct
+
+
+def test_server_reuses_units_across_requests(server, tmp_path):
+    for _ in range(2):
+        resp = request(server.socket_path,
+                       {'input': str(HELLO), 'output': str(tmp_path / 'h.z3')}, timeout=60)
+        assert resp['ok']
+    status = request(server.socket_path, {'command': 'status'}, timeout=10)
+    assert status['requests_served'] == 2
+    assert status['cached_units'] >= 1
+
+
+def test_server_reports_failures(server, tmp_path):
+    resp = request(server.socket_path,
+                   {'input': str(tmp_path / 'missing.zil')}, timeout=60)
+    assert not resp['ok']
+    assert 'not found' in resp['stderr']
+
+
+def test_server_reuses_included_files_until_they_change(server, tmp_path):
+    lib = tmp_path / 'lib.zil'
+    main = tmp_path / 'main.zil'
+    lib.write_text('<ROUTINE SAY () <TELL "first" CR>>\n')
+    main.write_text('<INSERT-FILE "lib">\n<ROUTINE GO () <SAY> <QUIT>>\n')
+    out = tmp_path / 'main.z3'
+
+    def build():
+        resp = request(server.socket_path, {'input': str(main), 'output': str(out)}, timeout=60)
+        assert resp['ok'], resp
+        return out.read_bytes()
+
+    first = build()
+    assert request(server.socket_path, {'command': 'status'}, timeout=10)['cached_files'] == 1
+    assert build() == first
+    lib.write_text('<ROUTINE SAY () <TELL "second" CR>>\n')
+    second = build()
+    assert second != first
+    assert second == ZILCompiler(version=3).compile_string(main.read_text(), str(main))
+
+
+def test_server_replies_when_a_request_raises(server, tmp_path):
+    resp = request(server.socket_path,
+                   {'input': str(HELLO), 'version': 'three'}, timeout=60)
+    assert not resp['ok']
+    assert 'ValueError' in resp['errors'][0]
+    assert request(server.socket_path, {'command': 'status'}, timeout=10)['ok']
+
+
+def test_client_exits_on_an_unreadable_reply(monkeypatch, capsys, tmp_path):
+    import json
+    from zilc import server as server_mod
+
+    def garbled(socket_path, payload, timeout=None):
+        return json.loads('')
+
+    monkeypatch.setattr(server_mod, 'request', garbled)
+    monkeypatch.setattr(sys, 'argv', ['zorkie-client', '--socket', str(tmp_path / 'z.sock'),
+                                      '--status'])
+    with pytest.raises(SystemExit) as exit_info:
+        server_mod.client_main()
+    assert exit_info.value.code == 2
+    assert 'unreadable reply' in capsys.readouterr().err
@@ -0,0 +1,129 @@
+# SourceIndex: one scan gives the form tree and string/comment spans, lookups
+# match the old left-to-right scanners, and an index derived by spliced()
+# equals a fresh scan of the edited text.
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from zilc.compiler import ZILCompiler
+from zilc.source_index import SourceIndex
+
+SRC = '''<ROUTINE FOO () <TELL "a <FAKE> \\" b" CR> <IF-DEBUG <PRINTN 1>>>
+;<IF-DEBUG <OLD>>
+<GLOBAL CH !\\<>
+<IF-DEBUG <IF-DEBUG <NESTED>>> <OTHER \\< <X>>
+'''
+
+
+def _same(a, b):
+    return (a.starts, a.end_of, a.parent_of, a.strings, a.comments, a.heads,
+            a.unclosed) == \
+           (b.starts, b.end_of, b.parent_of, b.strings, b.comments, b.heads,
+            b.unclosed)
+
+
+def test_form_tree_and_spans():
+    index = SourceIndex(SRC)
+    foo = SRC.index('<ROUTINE')
+    assert index.end_of[foo] == SRC.index('>>>\n') + 3
+    assert index.parent_of[SRC.index('<TELL')] == foo
+    # Brackets in strings and after !\ or \ are not forms.
+    assert SRC.index('<FAKE>') not in index.end_of
+    assert index.in_string(SRC.index('<FAKE>'))
+    assert not index.in_string(SRC.index('<TELL'))
+    assert index.in_comment(SRC.index('<OLD>'))
+    assert not index.in_comment(SRC.index('<GLOBAL'))
+    assert index.forms_with_head(['if-debug']) == [
+        SRC.index('<IF-DEBUG <PRINTN'), SRC.index('<IF-DEBUG <OLD'),
+        SRC.index('<IF-DEBUG <IF-DEBUG'), SRC.index('<IF-DEBUG <NESTED')]
+
+
+def test_find_skips_nested_matches():
+    found = SourceIndex(SRC).find(r'<\s*IF-DEBUG\b')
+    assert [text for _, _, text in found] == [
+        '<IF-DEBUG <PRINTN 1>>', '<IF-DEBUG <OLD>>',
+        '<IF-DEBUG <IF-DEBUG <NESTED>>>']
+
+
+def test_outermost_matches_find_by_head():
+    index = SourceIndex(SRC)
+    assert index.outermost(['If-Debug']) == index.find(r'<\s*IF-DEBUG\b')
+    assert index.outermost(['IF-DEB']) == []
+
+
+def test_spliced_index_matches_fresh_scan():
+    index = SourceIndex(SRC)
+    edits = [(s, e, text[len('<IF-DEBUG'):-1].strip() + ' "x<y"')
+             for s, e, text in index.find(r'<\s*IF-DEBUG\b')]
+    edits.append((SRC.index('<X>'), SRC.index('<X>') + 3, ''))
+    derived = index.spliced(edits)
+    assert derived.source == index.splice(edits)
+    assert _same(derived, SourceIndex(derived.source))
+    # So does replacing a %-prefixed form.
+    pct = SourceIndex('<A %<COND (T 1)> "s">\n%<B <C>>\n<D')
+    for start, end, repl in ((3, 16, '<X "y">'), (24, 33, '')):
+        derived = pct.spliced([(start, end, repl)])
+        assert _same(derived, SourceIndex(derived.source))
+    # An edit that is not a whole form falls back to a fresh scan.
+    partial = index.spliced([(0, 3, '<R')])
+    assert _same(partial, SourceIndex(partial.source))
+
+
+def test_directives_in_strings_are_ignored():
+    c = ZILCompiler()
+    out = c.preprocess_zilf_directives(
+        '<COMPILATION-FLAG DBG T>\n<ROUTINE GO () <TELL "<SETG X 1>" CR>>\n'
+        '<SETG Y 2>\n<FILE-FLAGS SENTENCE-ENDS?>\n')
+    assert c.compilation_flags == {'DBG': True}
+    assert c.compile_globals['Y'] == 2 and 'X' not in c.compile_globals
+    assert 'SENTENCE-ENDS?' in c.file_flags
+    assert 'COMPILATION-FLAG' not in out and 'FILE-FLAGS' not in out
+    assert '<TELL "<SETG X 1>" CR>' in out
+
+
+def test_enclosing_head_and_unclosed():
+    src = '<DEFMAC M () <FORM X> "<Y>" <Z <W>>>\n<OPEN <Q>'
+    index = SourceIndex(src)
+    w = src.index('<W>')
+    assert list(index.enclosing(w)) == [src.index('<Z'), 0]
+    assert list(index.enclosing(src.index('<Y>'))) == [0]
+    assert list(index.enclosing(0)) == []
+    assert index.head(0) == 'DEFMAC'
+    assert index.unclosed == {src.index('<OPEN')}
+    # In-string reads as the old parity scan: after the opening quote, up
+    # to and including the closing one.
+    q = src.index('"<Y>"')
+    assert [index.in_string(q + k) for k in range(6)] == [
+        False, True, True, True, True, False]
+
+
+def test_compiler_helpers_use_the_index():
+    c = ZILCompiler()
+    src = '<DEFINE D () <IFFLAG (X 1)> "<">\n<IFFLAG (X 2)> <TELL !\\> "a>b">'
+    assert c._extract_balanced_content(src, 0) == (src[:src.index('\n')],
+                                                   src.index('\n'))
+    assert c._is_inside_macro_def(src, src.index('<IFFLAG (X 1)'))
+    assert not c._is_inside_macro_def(src, src.index('<IFFLAG (X 2)'))
+    assert c._pos_in_string(src, src.index('<">') + 1)
+    # A '<' the index reads as text is still matched on request.
+    quoted = '<SETG A \\<B>>'
+    assert c._extract_balanced_content(quoted, quoted.index('<B'))[0] == '<B>'
+    assert c._split_first_sexpr('<TELL ">"> T') == ('<TELL ">">', 'T')
+
+
+def test_conditional_passes_work_from_the_index():
+    c = ZILCompiler(version=3)
+    c.compilation_flags['BETA'] = True
+    src = ('<ROUTINE GO () <TELL "%<COND (T 1)> <IFFLAG (BETA 2)>" CR> '
+           '<IFFLAG (BETA <PRINTN 3>) (ELSE <PRINTN 4>)> '
+           '%<VERSION? (ZIP <PRINTN 5>) (ELSE <PRINTN 6>)> '
+           '<FOO %<COND (<==? 1 2> 7) (T 8)> %<UNKNOWN 9>>>\n'
+           ';%<COND (T <OLD>)>\n%<UNKNOWN 10>\n')
+    for step in (c._process_ifflag, c._process_version,
+                 c._process_compile_cond, c._strip_compile_forms):
+        src = step(src)
+    assert src == ('<ROUTINE GO () <TELL "%<COND (T 1)> <IFFLAG (BETA 2)>" CR> '
+                   '<PRINTN 3> <PRINTN 5> <FOO 8 0>>\n'
+                   ';%<COND (T <OLD>)>\n\n')
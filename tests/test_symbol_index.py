@@ -0,0 +1,69 @@
+"""Tests for the program symbol index."""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from zilc.compiler import ZILCompiler
+from zilc.lexer.lexer import Lexer
+from zilc.parser.macro_expander import MacroExpander
+from zilc.parser.parser import Parser
+from zilc.parser.symbol_index import SymbolIndex
+
+SRC = ('<CONSTANT GREETING "Hi"> <GLOBAL SCORE 0> '
+       '<OBJECT LAMP (DESC "lamp") (SYNONYM LAMP) (FLAGS LIGHTBIT TAKEBIT)> '
+       '<ROOM CAVE (DESC "cave") (FLAGS RLANDBIT)> '
+       '<ROUTINE GO () <TELL ,GREETING CR> <QUIT>> <ROUTINE Go () <RTRUE>>')
+
+
+def _program(src=SRC):
+    return Parser(Lexer(src).tokenize()).parse()
+
+
+def test_definitions_by_kind_and_name():
+    program = _program()
+    index = SymbolIndex.from_program(program, 'game.zil')
+    assert index.find('routine', 'GO').node is program.routines[0]
+    assert index.find('global', 'SCORE').line == 1
+    assert index.find('routine', 'SCORE') is None
+    assert set(index.names('flag')) == {'LIGHTBIT', 'TAKEBIT', 'RLANDBIT'}
+    assert index.find('flag', 'RLANDBIT').node is program.rooms[0]
+    assert 'SYNONYM' in index.names('property')
+    # The first of several definitions is found, as a scan would.
+    assert [s.name for s in index.definitions('routine', 'go', any_case=True)] == ['GO', 'Go']
+    assert index.find_any_case('routine', 'go').name == 'GO'
+    assert {s.kind for s in index.lookup('LAMP')} == {'object'}
+
+
+def test_remove_and_update_contents():
+    program = _program()
+    index = SymbolIndex.from_program(program)
+    lamp = program.objects[0]
+    lamp.properties.pop('SYNONYM')
+    index.update_contents(lamp)
+    assert 'SYNONYM' not in index.names('property')
+    index.remove(lamp)
+    assert index.find('object', 'LAMP') is None
+    assert 'TAKEBIT' not in index.names('flag')
+    assert len(index) == len(list(index))
+
+
+def test_expand_all_keeps_the_index_current():
+    program = _program('<DEFMAC OLD () <FORM RTRUE>> <SETG NEW ,OLD> '
+                       '<ROUTINE GO () <NEW>>')
+    expander = MacroExpander()
+    expander.expand_all(program)
+    index = expander.symbols
+    assert index.find('macro', 'NEW').node is program.macros[-1]
+    assert index.find('global', 'NEW') is None
+    assert set(index.names('global')) == {g.name for g in program.globals}
+
+
+def test_compiler_exposes_the_index():
+    compiler = ZILCompiler(version=3)
+    compiler.compile_string(SRC)
+    assert compiler.symbols.find('constant', 'GREETING') is not None
+    assert compiler.symbols.to_dict()['symbols'][0] == {
+        'name': 'GO', 'kind': 'routine', 'line': 1,
+        'column': compiler.symbols.find('routine', 'GO').column}
@@ -0,0 +1,64 @@
+# The V4+ SYNONYM-cap size retry resumes from a snapshot taken before the
+# object table instead of recompiling from source; the result must match a
+# fresh compile with the 4-word cap.
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from zilc.compiler import ZILCompiler
+
+SRC = '''
+<VERSION XZIP>
+<OBJECT MARKER (DESC "marker") (SYNONYM MARKER PEN FELT TIP DIAGRAM PLAN SKETCH)>
+<ROUTINE GO () <TELL D ,MARKER CR> <QUIT>>
+'''
+
+
+def _fresh_capped():
+    c = ZILCompiler(version=5)
+    c._v4_syn_word_cap = 4
+    return c.compile_string(SRC)
+
+
+def test_resume_matches_fresh_capped_compile():
+    c = ZILCompiler(version=5)
+    c._snapshot_back_end = True
+    full = c.compile_string(SRC)
+    snapshot = c._back_end_snapshot
+    assert snapshot is not None
+    capped = c._resume_back_end(snapshot, 4)
+    assert capped == _fresh_capped()
+    assert capped != full
+    # The resumed phases are reported separately.
+    names = [r.name for r in c.phase_stats]
+    assert 'objects:retry' in names and 'assemble:retry' in names
+    assert 'codegen:retry' not in names
+
+
+def test_resume_is_repeatable_from_one_snapshot():
+    c = ZILCompiler(version=5)
+    c._snapshot_back_end = True
+    c.compile_string(SRC)
+    snapshot = c._back_end_snapshot
+    expected = _fresh_capped()
+    assert c._resume_back_end(snapshot, 4) == expected
+    assert c._resume_back_end(snapshot, 4) == expected
+
+
+def test_snapshot_copies_only_what_the_back_end_changes():
+    c = ZILCompiler(version=5)
+    c._snapshot_back_end = True
+    c.compile_string(SRC)
+    state, attrs = c._back_end_snapshot
+    assert state['program'] is c.program
+    assert state['codegen'] is not c._last_codegen
+    assert attrs['_last_codegen'] is state['codegen']
+
+
+def test_no_snapshot_when_the_source_selects_v3():
+    c = ZILCompiler(version=5)
+    c._snapshot_back_end = True
+    c.compile_string('<VERSION ZIP> <ROUTINE GO () <QUIT>>')
+    assert c.version == 3 and c._back_end_snapshot is None
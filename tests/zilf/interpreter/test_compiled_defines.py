@@ -0,0 +1,118 @@
+# ZILF Interpreter Tests for Zorkie: compiled DEFINE bodies
+# =========================================================
+#
+# This file is part of zorkie.
+#
+# zorkie is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+"""
+Tests for the compiler's closure-compiled MDL bodies.
+
+The compiler's compile-time MDL evaluator can run DEFINE/DEFMAC bodies as
+closures (zilc.parser.mdl_closures) instead of walking their AST.  These
+tests run each program three ways -- compiled, tree-walked, and on the
+reference interpreter in conftest -- and require the same result.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+from .conftest import ZilAtom, ZilFix, ZilList, ZilString, evaluate
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[3]))
+
+from zilc.lexer.lexer import Lexer
+from zilc.parser.macro_expander import MacroExpander
+from zilc.parser.parser import Parser
+
+
+PROGRAMS = [
+    pytest.param(
+        '<DEFINE FACT (N) <COND (<==? .N 0> 1) (T <* .N <FACT <- .N 1>>>)>>',
+        '<FACT 6>', id='recursion'),
+    pytest.param(
+        '<DEFINE BUILD (N "AUX" (L ()) (I 0)) <REPEAT ()'
+        ' <COND (<==? .I .N> <RETURN .L>)>'
+        ' <SET I <+ .I 1>> <SET L <LIST <* .I 2> !.L>>>>',
+        '<BUILD 5>', id='repeat'),
+    pytest.param(
+        '<DEFINE CLASSIFY (N) <COND'
+        ' (<AND <==? <MOD .N 3> 0> <NOT <==? <MOD .N 5> 0>>> 3)'
+        ' (<OR <==? <MOD .N 5> 0> <==? .N 7>> 5) (T </ .N 2>)>>',
+        '<LIST <CLASSIFY 9> <CLASSIFY 10> <CLASSIFY 7> <CLASSIFY 8>>',
+        id='logic'),
+    pytest.param(
+        '<DEFINE SUM (L "AUX" (S 0)) <REPEAT ()'
+        ' <COND (<EMPTY? .L> <RETURN .S>)>'
+        ' <SET S <+ .S <NTH .L 1>>> <SET L <REST .L>>>>',
+        '<SUM <LIST 1 2 3 4>>', id='list-walk'),
+    pytest.param(
+        '<DEFINE SQUARES (L) <MAPF ,LIST <FUNCTION (X) <* .X .X>> .L>>',
+        '<SQUARES <LIST 1 2 3>>', id='mapf-function'),
+    pytest.param(
+        '<DEFINE PICK (N) <COND (<==? .N 1> "one") (T "many")>>',
+        '<LIST <PICK 1> <PICK 2>>', id='strings'),
+]
+
+
+def _python_value(obj):
+    """A reference-interpreter result as the compiler's evaluator returns it."""
+    if isinstance(obj, ZilFix):
+        return obj.value
+    if isinstance(obj, ZilString):
+        return obj.value
+    if isinstance(obj, ZilAtom):
+        return obj.name
+    if isinstance(obj, ZilList):
+        return [_python_value(e) for e in obj.elements]
+    raise TypeError(f"no Python equivalent for {obj!r}")
+
+
+def _run(definitions, call, compiled):
+    expander = MacroExpander()
+    expander.mdl_evaluator.compile_bodies = compiled
+    for macro in Parser(Lexer(definitions).tokenize()).parse().macros:
+        expander.define_macro(macro)
+    form = Parser(Lexer(call).tokenize()).parse_expression()
+    # Bodies compile on their second call, so run the program twice.
+    first = expander.mdl_evaluator.evaluate(form, {})
+    second = expander.mdl_evaluator.evaluate(form, {})
+    assert first == second
+    return expander, second
+
+
+@pytest.mark.parametrize('definitions,call', PROGRAMS)
+def test_compiled_body_matches_tree_walk_and_reference(definitions, call):
+    expected = _python_value(evaluate(f'{definitions} {call}'))
+    assert _run(definitions, call, compiled=False)[1] == expected
+    assert _run(definitions, call, compiled=True)[1] == expected
+
+
+def test_compiled_repeat_honors_again():
+    definitions = ('<DEFINE SKIP (L "AUX" (OUT ())) <REPEAT ()'
+                   ' <COND (<EMPTY? .L> <RETURN .OUT>)> <SET L <REST .L>>'
+                   ' <COND (<==? <LENGTH .L> 2> <AGAIN>)>'
+                   ' <SET OUT <LIST <LENGTH .L> !.OUT>>>>')
+    call = '<SKIP <LIST 1 2 3 4 5>>'
+    assert _run(definitions, call, compiled=True)[1] == [0, 1, 3, 4]
+    assert _run(definitions, call, compiled=False)[1] == [0, 1, 3, 4]
+
+
+def test_bodies_compile_once_per_definition():
+    expander, result = _run('<DEFINE FACT (N) <COND (<==? .N 0> 1)'
+                            ' (T <* .N <FACT <- .N 1>>>)>>', '<FACT 5>', True)
+    assert result == 120
+    evaluator = expander.mdl_evaluator
+    (body, compiled), = evaluator._compiled.values()
+    assert body is expander.macros['FACT'].body and compiled
+    # Redefining FACT compiles the new body once it is called again.
+    for macro in Parser(Lexer('<DEFINE FACT (N) <+ .N 1>>').tokenize()).parse().macros:
+        expander.define_macro(macro)
+    form = Parser(Lexer('<FACT 5>').tokenize()).parse_expression()
+    assert evaluator.evaluate(form, {}) == 6
+    assert evaluator.evaluate(form, {}) == 6
+    assert all(compiled for _body, compiled in evaluator._compiled.values())
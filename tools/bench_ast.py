@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""AST memory benchmark.
+
+Runs the compiler's front end -- preprocessing, lexing, parsing and macro
+expansion -- on one game and reports the size of the expanded Program: the
+number of AST nodes, the bytes held by the node objects themselves
+(sys.getsizeof, plus the instance __dict__ where a class has one) and the
+tracemalloc peak and retained memory of the whole front end.  The default
+game is the vendored zork1 tree (a git submodule); pass another entry file
+to measure that instead.
+
+Usage:
+    python3 tools/bench_ast.py
+    python3 tools/bench_ast.py --version 5 tests/test-pairs/libmsg.zil
+"""
+import argparse
+import contextlib
+import gc
+import io
+import sys
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+
+REPO = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO))
+sys.setrecursionlimit(20000)
+
+from zilc.compiler import ZILCompiler  # noqa: E402
+from zilc.parser.ast_nodes import ASTNode, node_fields  # noqa: E402
+from zilc.parser.macro_expander import MacroExpander  # noqa: E402
+
+DEFAULT_ENTRY = REPO / 'tests' / 'test-games' / 'zork1' / 'zork1.zil'
+
+
+def parsed_program(path: Path, version: int):
+    """(compiler, Program) for `path` after preprocessing and parsing."""
+    compiler = ZILCompiler(version=version)
+    compiler._main_source_path = str(path)
+    compiler.phase_stats.begin('front end')
+    source = path.read_text(encoding='utf-8', errors='replace')
+    source = compiler.preprocess_control_characters(source)
+    source = compiler.preprocess_ifiles(source, path.parent)
+    compiler._compile_base_path = path.parent
+    source = compiler.preprocess_zilf_directives(source, path.parent)
+    _tokens, program = compiler._lex_and_parse(source, str(path), path.parent)
+    return compiler, program
+
+
+def make_expander(compiler):
+    """A MacroExpander set up the way compile_string sets one up."""
+    expander = MacroExpander()
+    expander.ct_globals.update(getattr(compiler, '_ct_globals', {}) or {})
+    return expander
+
+
+def expanded_program(path: Path, version: int):
+    """The macro-expanded Program of `path`, as compile_string builds it."""
+    compiler, program = parsed_program(path, version)
+    if program.macros or program.top_level_forms:
+        program = make_expander(compiler).expand_all(program)
+    return program
+
+
+def node_census(root):
+    """(node count, bytes in node objects, Counter of node class names)."""
+    count = size = 0
+    kinds = Counter()
+    seen = set()
+    stack = [root]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, (list, tuple, set)):
+            stack.extend(obj)
+            continue
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+            continue
+        if not (isinstance(obj, ASTNode) or hasattr(obj, '__dict__')) or id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, ASTNode):
+            count += 1
+            kinds[obj.__class__.__name__] += 1
+            size += sys.getsizeof(obj)
+            d = getattr(obj, '__dict__', None)
+            if d is not None:
+                size += sys.getsizeof(d)
+        stack.extend(value for _name, value in node_fields(obj))
+    return count, size, kinds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('entry', nargs='?', default=str(DEFAULT_ENTRY),
+                        help='main .zil file (default: zork1)')
+    parser.add_argument('--version', type=int, default=3, help='target Z-machine version')
+    parser.add_argument('--top', type=int, default=8, help='node classes to list')
+    args = parser.parse_args()
+
+    entry = Path(args.entry).resolve()
+    if not entry.is_file():
+        sys.exit(f"{entry} not found (check out the zork1 submodule or pass a path)")
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            program = expanded_program(entry, args.version)
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    count, size, kinds = node_census(program)
+    print(f"{entry.name}: {count} AST nodes, {size // 1024} KiB in node objects "
+          f"({size / max(count, 1):.0f} bytes/node)")
+    print(f"front end: peak {peak // 1024} KiB, retained {current // 1024} KiB")
+    for name, n in kinds.most_common(args.top):
+        print(f"  {name:<20} {n:>8}")
+
+
+if __name__ == '__main__':
+    main()
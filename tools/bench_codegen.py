@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Code generation throughput benchmark.
+
+Compiles each game and reports the code generator's throughput in forms
+per second: the number of forms ImprovedCodeGenerator.generate_form is
+asked for during one compile, over the best wall time of the compiler's
+'codegen' phase.  The forms are counted in a separate, untimed compile.
+The default games are the ZILF-library games under tests/test-pairs.
+With --jobs N the timed compiles generate routines in N worker processes
+(ImprovedCodeGenerator.jobs); forms are always counted in process.
+
+Usage:
+    python3 tools/bench_codegen.py
+    python3 tools/bench_codegen.py --repeat 5 tests/test-pairs/cloak.zil
+    python3 tools/bench_codegen.py --jobs 4    # parallel routine codegen
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+from pathlib import Path
+
+from bench_macros import DEFAULT_GAMES
+
+from zilc.codegen.codegen_improved import ImprovedCodeGenerator  # noqa: E402
+from zilc.compiler import ZILCompiler  # noqa: E402
+
+
+@contextlib.contextmanager
+def counting_forms():
+    """Count generate_form calls inside the block; yields a one-item list."""
+    count = [0]
+    generate_form = ImprovedCodeGenerator.generate_form
+
+    def counted(self, form):
+        count[0] += 1
+        return generate_form(self, form)
+
+    ImprovedCodeGenerator.generate_form = counted
+    try:
+        yield count
+    finally:
+        ImprovedCodeGenerator.generate_form = generate_form
+
+
+def compile_once(path: Path, version: int, jobs: int = 1) -> ZILCompiler:
+    """Compile `path` the way the test-pair harness does; the compiler."""
+    compiler = ZILCompiler(version=version, codegen_jobs=jobs)
+    compiler._main_source_path = str(path)
+    cwd = os.getcwd()
+    os.chdir(path.parent)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()), \
+                contextlib.redirect_stderr(io.StringIO()):
+            compiler.compile_string(path.read_text(encoding='utf-8', errors='replace'),
+                                    str(path))
+    finally:
+        os.chdir(cwd)
+    return compiler
+
+
+def bench(path: Path, version: int, repeat: int, jobs: int = 1):
+    """(forms generated, best codegen seconds) for compiling `path`."""
+    with counting_forms() as count:
+        compile_once(path, version)
+    best = None
+    for _ in range(max(1, repeat)):
+        wall = compile_once(path, version, jobs).phase_stats.get('codegen').wall
+        best = wall if best is None else min(best, wall)
+    return count[0], best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('paths', nargs='*', help='game entry files (default: ZILF-library games)')
+    parser.add_argument('--version', type=int, default=3, help='target Z-machine version')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs; the best is reported')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='worker processes for routine codegen (ImprovedCodeGenerator.jobs)')
+    args = parser.parse_args()
+    sys.setrecursionlimit(20000)
+
+    total_forms, total_time = 0, 0.0
+    for path in map(Path, args.paths or DEFAULT_GAMES):
+        if not path.is_file():
+            print(f"{path.name:<16} missing")
+            continue
+        try:
+            forms, best = bench(path.resolve(), args.version, args.repeat, args.jobs)
+        except Exception as e:  # a game the compiler rejects
+            print(f"{path.name:<16} failed: {type(e).__name__}: {e}"[:100])
+            continue
+        total_forms += forms
+        total_time += best
+        print(f"{path.name:<16} codegen {best * 1000:8.1f} ms  {forms:>7} forms  "
+              f"{forms / best:>9.0f} forms/s")
+    if total_time:
+        print(f"{'total':<16} codegen {total_time * 1000:8.1f} ms  {total_forms:>7} forms  "
+              f"{total_forms / total_time:>9.0f} forms/s")
+
+
+if __name__ == '__main__':
+    main()
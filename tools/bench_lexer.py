@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Lexer throughput benchmark.
+
+Tokenizes one large text -- by default every .zil file of zork1 and of
+planetfall, concatenated -- several times and reports the best run in
+MB/s and tokens/s.  The sources are the vendored game trees (git
+submodules), so check those out first or pass the files/directories to lex.
+
+--memory instead lexes every file, then parses every file that parses on its
+own, under tracemalloc (keeping all results alive, as a build does) and
+reports the peak traced memory and the garbage collections of each phase.
+
+Usage:
+    python3 tools/bench_lexer.py
+    python3 tools/bench_lexer.py --repeat 10 games/advent_source
+    python3 tools/bench_lexer.py --memory
+"""
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+REPO = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO))
+
+from zilc.lexer import Lexer  # noqa: E402
+from zilc.parser import Parser  # noqa: E402
+
+DEFAULT_SOURCES = [
+    REPO / 'tests' / 'test-games' / 'zork1',
+    REPO / 'games' / 'planetfall' / 'source',
+]
+
+
+def collect(paths):
+    """The .zil files named by `paths` (directories are searched, sorted)."""
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(path.glob('*.zil')))
+        elif path.is_file():
+            files.append(path)
+    return files
+
+
+def _collections():
+    return sum(stat['collections'] for stat in gc.get_stats())
+
+
+def measure_memory(sources):
+    """Lex, then parse, `sources`; per phase (peak KiB, GC collections)."""
+    results = {}
+    gc.collect()
+    tracemalloc.start()
+    try:
+        gcs = _collections()
+        streams = [Lexer(text, '<bench>').tokenize() for text in sources]
+        results['lex'] = (tracemalloc.get_traced_memory()[1] // 1024, _collections() - gcs)
+        tracemalloc.reset_peak()
+        gcs = _collections()
+        programs = []
+        for tokens in streams:
+            try:
+                programs.append(Parser(tokens, '<bench>').parse())
+            except SyntaxError:
+                pass
+        results['parse'] = (tracemalloc.get_traced_memory()[1] // 1024, _collections() - gcs)
+    finally:
+        tracemalloc.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('paths', nargs='*',
+                        help='.zil files or directories (default: zork1 + planetfall)')
+    parser.add_argument('--repeat', type=int, default=5, help='runs; the best is reported')
+    parser.add_argument('--memory', action='store_true',
+                        help='report peak memory and GC collections of lex and parse')
+    args = parser.parse_args()
+
+    files = collect(args.paths or DEFAULT_SOURCES)
+    if not files:
+        sys.exit("no .zil sources found (check out the zork1/planetfall "
+                 "submodules or pass paths)")
+    texts = [f.read_text(encoding='utf-8', errors='replace') for f in files]
+    source = '\n'.join(texts)
+
+    if args.memory:
+        for phase, (peak, collections) in measure_memory(texts).items():
+            print(f"{phase:<6} peak {peak:>8} KiB  {collections:>5} GC collections")
+        return
+
+    best = None
+    for _ in range(max(1, args.repeat)):
+        t0 = time.perf_counter()
+        tokens = Lexer(source, '<bench>').tokenize()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+
+    mb = len(source.encode('utf-8')) / 1e6
+    print(f"{len(files)} files, {mb:.2f} MB, {len(tokens)} tokens")
+    print(f"best of {args.repeat}: {best:.3f}s  "
+          f"{mb / best:.2f} MB/s  {len(tokens) / best:,.0f} tokens/s")
+
+
+if __name__ == '__main__':
+    main()
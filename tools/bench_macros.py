@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""Macro expansion benchmark.
+
+Parses each game once per run and times MacroExpander.expand_all on the
+result, reporting the best run, the number of AST nodes allocated during
+expansion and the tracemalloc peak of one expansion.  The default games are
+the ZILF-library games under tests/test-pairs, whose TELL, MAP-SCOPE and
+library-message DEFMACs expand thousands of times.
+
+Usage:
+    python3 tools/bench_macros.py
+    python3 tools/bench_macros.py --repeat 5 tests/test-pairs/advent.zil
+    python3 tools/bench_macros.py --jobs 4    # parallel routine expansion
+"""
+import argparse
+import contextlib
+import copyreg
+import gc
+import io
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from bench_ast import REPO, make_expander, parsed_program
+
+from zilc.parser.ast_nodes import ASTNode  # noqa: E402
+
+DEFAULT_GAMES = [REPO / 'tests' / 'test-pairs' / name for name in (
+    'advent.zil', 'cloak.zil', 'events.zil', 'libmsg.zil', 'parser.zil',
+    'template.zil', 'zil_test.zil')]
+
+
+@contextlib.contextmanager
+def counting_nodes():
+    """Count ASTNode allocations inside the block; yields a one-item list.
+
+    Constructors are counted through ASTNode.__init__, and copy.deepcopy's
+    copies (which bypass __init__) through copyreg.__newobj__.
+    """
+    count = [0]
+    init, newobj = ASTNode.__init__, copyreg.__newobj__
+
+    def counted_init(self, *args, **kwargs):
+        count[0] += 1
+        init(self, *args, **kwargs)
+
+    def counted_newobj(cls, *args):
+        if issubclass(cls, ASTNode):
+            count[0] += 1
+        return newobj(cls, *args)
+
+    ASTNode.__init__, copyreg.__newobj__ = counted_init, counted_newobj
+    try:
+        yield count
+    finally:
+        ASTNode.__init__, copyreg.__newobj__ = init, newobj
+
+
+def bench(path: Path, version: int, repeat: int, jobs: int = 1):
+    """(best seconds, nodes constructed, peak KiB) for expanding `path`."""
+    best = nodes = peak = None
+    for run in range(max(1, repeat) + 1):
+        with contextlib.redirect_stdout(io.StringIO()):
+            compiler, program = parsed_program(path, version)
+            expander = make_expander(compiler)
+            gc.collect()
+            if run == 0:
+                # One traced, counted run, in process; the timed runs are
+                # untraced and use --jobs.
+                tracemalloc.start()
+                with counting_nodes() as count:
+                    expander.expand_all(program)
+                peak = tracemalloc.get_traced_memory()[1] // 1024
+                tracemalloc.stop()
+                nodes = count[0]
+                continue
+            expander.jobs = jobs
+            t0 = time.perf_counter()
+            expander.expand_all(program)
+            elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, nodes, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('paths', nargs='*', help='game entry files (default: ZILF-library games)')
+    parser.add_argument('--version', type=int, default=3, help='target Z-machine version')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs; the best is reported')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='worker processes for routine expansion (MacroExpander.jobs)')
+    args = parser.parse_args()
+
+    total = 0.0
+    for path in map(Path, args.paths or DEFAULT_GAMES):
+        if not path.is_file():
+            print(f"{path.name:<16} missing")
+            continue
+        try:
+            best, nodes, peak = bench(path.resolve(), args.version, args.repeat, args.jobs)
+        except Exception as e:  # a game the front end rejects
+            print(f"{path.name:<16} failed: {type(e).__name__}: {e}"[:100])
+            continue
+        total += best
+        print(f"{path.name:<16} expand_all {best * 1000:8.1f} ms  "
+              f"{nodes:>8} nodes allocated  peak {peak:>6} KiB")
+    print(f"{'total':<16} expand_all {total * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
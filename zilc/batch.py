@@ -0,0 +1,220 @@
+"""
+Parallel corpus build driver (`zorkie-batch`).
+
+Compiles a manifest of (entry .zil, version) pairs -- typically the
+vendored Infocom trees under tests/test-games/infocom-zil -- with one
+process per game, up to --jobs at a time.  Each game runs in its own
+process so a crash, runaway recursion or timeout in one build cannot take
+down the others, and so peak RSS is measured per game rather than per
+long-lived pool worker.
+
+Manifest formats:
+  *.json  a list of {"entry": path, "version": n, "name": ..., "output": ...}
+  other   one game per line: `path [version] [name]`; '#' starts a comment
+
+Relative entry paths are resolved against the manifest's directory.  One
+JSON record per game is printed as it finishes (JSON Lines); --summary
+writes the full list, in manifest order, to a file.
+"""
+
+import contextlib
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from multiprocessing.connection import wait
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+def load_manifest(path: str) -> List[Dict]:
+    """Read a manifest into a list of job dicts (entry, version, name, output)."""
+    mpath = Path(path)
+    base = mpath.resolve().parent
+    text = mpath.read_text(encoding='utf-8')
+    if mpath.suffix.lower() == '.json':
+        raw = json.loads(text)
+    else:
+        raw = []
+        for lineno, line in enumerate(text.splitlines(), 1):
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            fields = line.split()
+            job = {'entry': fields[0]}
+            if len(fields) > 1:
+                try:
+                    job['version'] = int(fields[1])
+                except ValueError:
+                    raise ValueError(f"{path}:{lineno}: version must be an integer, got {fields[1]!r}")
+            if len(fields) > 2:
+                job['name'] = fields[2]
+            raw.append(job)
+    jobs = []
+    for item in raw:
+        entry = Path(item['entry'])
+        if not entry.is_absolute():
+            entry = base / entry
+        version = int(item.get('version', 3))
+        jobs.append({
+            'entry': str(entry),
+            'version': version,
+            'name': item.get('name') or entry.stem,
+            'output': item.get('output'),
+        })
+    return jobs
+
+
+def _peak_rss_kb() -> Optional[int]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def build_one(job: Dict, out_dir: Optional[str] = None) -> Dict:
+    """Compile one game in the current process and describe the result."""
+    from .compiler import ZILCompiler
+
+    version = job['version']
+    output = job.get('output')
+    if not output:
+        if out_dir:
+            output = str(Path(out_dir) / f"{job['name']}.z{version}")
+        else:
+            output = str(Path(job['entry']).with_suffix(f".z{version}"))
+    record = {'name': job['name'], 'entry': job['entry'], 'version': version,
+              'output': output, 'ok': False}
+    compiler = ZILCompiler(version=version)
+    captured = io.StringIO()
+    t0 = time.perf_counter()
+    try:
+        with contextlib.redirect_stderr(captured), contextlib.redirect_stdout(captured):
+            ok = compiler.compile_file(job['entry'], output)
+    except BaseException as e:  # noqa: BLE001 - isolate everything, incl. RecursionError
+        ok = False
+        captured.write(f"{type(e).__name__}: {e}\n{traceback.format_exc()}")
+    record['wall'] = round(time.perf_counter() - t0, 3)
+    record['peak_rss_kb'] = _peak_rss_kb()
+    record['warnings'] = compiler.get_warnings()
+    record['ok'] = bool(ok)
+    if ok:
+        data = Path(output).read_bytes()
+        record['size'] = len(data)
+        record['sha256'] = hashlib.sha256(data).hexdigest()
+    else:
+        lines = [ln for ln in captured.getvalue().splitlines() if ln.strip()]
+        record['error'] = '\n'.join(lines[-20:]) or 'compilation failed'
+    return record
+
+
+def _child(job: Dict, out_dir: Optional[str], conn):
+    try:
+        conn.send(build_one(job, out_dir))
+    finally:
+        conn.close()
+
+
+def run_batch(jobs: List[Dict], max_workers: Optional[int] = None,
+              out_dir: Optional[str] = None, timeout: Optional[float] = None,
+              on_result=None) -> List[Dict]:
+    """Build every job, at most max_workers at a time; results in job order."""
+    max_workers = max(1, max_workers or os.cpu_count() or 1)
+    if out_dir:
+        Path(out_dir).mkdir(parents=True, exist_ok=True)
+    ctx = multiprocessing.get_context()
+    results: List[Optional[Dict]] = [None] * len(jobs)
+    pending = list(enumerate(jobs))
+    running = {}  # conn -> (index, process, start time)
+
+    def finish(index, record):
+        results[index] = record
+        if on_result:
+            on_result(record)
+
+    def failed(index, message, wall):
+        job = jobs[index]
+        finish(index, {'name': job['name'], 'entry': job['entry'],
+                       'version': job['version'], 'ok': False,
+                       'wall': round(wall, 3), 'error': message})
+
+    while pending or running:
+        while pending and len(running) < max_workers:
+            index, job = pending.pop(0)
+            parent_conn, child_conn = ctx.Pipe(duplex=False)
+            proc = ctx.Process(target=_child, args=(job, out_dir, child_conn), daemon=True)
+            proc.start()
+            child_conn.close()
+            running[parent_conn] = (index, proc, time.perf_counter())
+
+        wait_for = None
+        if timeout:
+            oldest = min(start for _, _, start in running.values())
+            wait_for = max(0.0, oldest + timeout - time.perf_counter())
+        for conn in wait(list(running), timeout=wait_for):
+            index, proc, start = running.pop(conn)
+            try:
+                finish(index, conn.recv())
+            except EOFError:
+                proc.join()
+                failed(index, f"build process died (exit code {proc.exitcode})",
+                       time.perf_counter() - start)
+            conn.close()
+            proc.join()
+        if timeout:
+            now = time.perf_counter()
+            for conn, (index, proc, start) in list(running.items()):
+                if now - start >= timeout:
+                    proc.terminate()
+                    proc.join()
+                    conn.close()
+                    del running[conn]
+                    failed(index, f"timed out after {timeout:g}s", now - start)
+    return results
+
+
+def main():
+    """Command-line interface for `zorkie-batch`."""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Compile a manifest of ZIL games in parallel and report per-game JSON'
+    )
+    parser.add_argument('manifest', help='Manifest file (.json list or `path [version] [name]` lines)')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='Parallel builds (default: CPU count)')
+    parser.add_argument('-o', '--out-dir',
+                        help='Write story files here as NAME.zV (default: next to each entry)')
+    parser.add_argument('--timeout', type=float, default=None,
+                        help='Kill any single build after this many seconds')
+    parser.add_argument('--summary', help='Write the full JSON result list to this file')
+
+    args = parser.parse_args()
+    jobs = load_manifest(args.manifest)
+
+    def emit(record):
+        print(json.dumps(record), flush=True)
+
+    t0 = time.perf_counter()
+    results = run_batch(jobs, max_workers=args.jobs, out_dir=args.out_dir,
+                        timeout=args.timeout, on_result=emit)
+    failures = [r['name'] for r in results if not r['ok']]
+    print(f"{len(results) - len(failures)}/{len(results)} games built in "
+          f"{time.perf_counter() - t0:.1f}s"
+          + (f"; failed: {', '.join(failures)}" if failures else ''),
+          file=sys.stderr)
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    sys.exit(0 if not failures else 1)
+
+
+if __name__ == '__main__':
+    main()
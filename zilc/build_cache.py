@@ -0,0 +1,214 @@
+"""
+Content-addressed incremental build cache for lexed and parsed source units.
+
+The front end works on one whole-program string: IFILE/INSERT-FILE contents
+are inlined and then rewritten by the directive preprocessor, whose output
+for any one file depends on flags set in others.  A file's raw bytes are
+therefore not a sound cache key.  Instead the *preprocessed* text is cut into
+units at top-level form boundaries, and each unit's token stream and
+top-level nodes are cached under the SHA-256 of its text plus the compile
+environment (target version, COMPILATION-FLAGs, FILE-FLAGs, ZIP-OPTIONS and
+the front-end sources themselves).
+
+Cut points are content-defined (rsync style): a unit ends after a top-level
+form whose own CRC falls in a fixed residue class.  Editing one routine
+therefore changes one unit's text, not the boundaries of every unit after
+it, and the rest of the game is loaded from `.zorkie-cache/`.
+
+Units are lexed standalone, so cached tokens and nodes carry unit-relative
+line numbers; shift_lines() relocates them to where the unit sits now (a
+unit's TokenStream by its starting `line`).
+"""
+
+import hashlib
+import os
+import pickle
+import zlib
+from enum import Enum
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from .parser.ast_nodes import ASTNode, node_fields
+
+CACHE_DIR_NAME = '.zorkie-cache'
+
+# Bumped whenever the pickled entry layout changes.
+_FORMAT = 3
+
+# A unit ends after a top-level form whose CRC32 has these low bits clear, so
+# units average (mask + 1) top-level forms.
+_CUT_MASK = 0x1F
+# Hard cap so a pathological run of non-cutting forms still splits.
+_MAX_UNIT = 256 * 1024
+
+
+def split_units(source: str) -> List[Tuple[int, str]]:
+    """Split preprocessed source into (first_line, text) units.
+
+    Cuts are only made right after a '>' that closes a depth-0 form and is
+    followed by a newline, tracking strings, backslash escapes and ';'
+    comments the same way the lexer does.  The units concatenate back to
+    `source`.  If the bracket structure does not balance, the whole source
+    is returned as a single unit.
+    """
+    units = []
+    n = len(source)
+    depth = 0
+    i = 0
+    unit_start = 0
+    unit_line = 1
+    form_start = None
+    while i < n:
+        c = source[i]
+        if c == '"':
+            i += 1
+            while i < n and source[i] != '"':
+                if source[i] == '\\':
+                    i += 1
+                i += 1
+            i += 1
+            continue
+        if c == '\\':
+            i += 2
+            continue
+        if c == ';' and i + 1 < n:
+            # Inline ';word' comment: the lexer skips to the next delimiter
+            # without treating '"' specially. ';"..."', ';<...>' etc. are
+            # ordinary data as far as bracket matching is concerned.
+            j = i + 1
+            while j < n and source[j] in ' \t':
+                j += 1
+            if j < n and source[j] not in '"<([%=':
+                while j < n and source[j] not in ' \t\n><()':
+                    j += 1
+                i = j
+                continue
+        if c in '<([':
+            if depth == 0:
+                form_start = i
+            depth += 1
+        elif c in '>)]':
+            depth -= 1
+            if depth < 0:
+                return [(1, source)]
+            if (depth == 0 and c == '>' and form_start is not None
+                    and i + 1 < n and source[i + 1] == '\n'):
+                end = i + 2
+                crc = zlib.crc32(source[form_start:end].encode('utf-8', 'surrogatepass'))
+                if (crc & _CUT_MASK) == 0 or end - unit_start >= _MAX_UNIT:
+                    text = source[unit_start:end]
+                    units.append((unit_line, text))
+                    unit_line += text.count('\n')
+                    unit_start = end
+                form_start = None
+        i += 1
+    if depth != 0:
+        return [(1, source)]
+    if unit_start < n:
+        units.append((unit_line, source[unit_start:]))
+    return units
+
+
+def shift_lines(root, delta: int):
+    """Add `delta` to the .line of every token/AST node reachable from root."""
+    if not delta:
+        return
+    seen = set()
+    stack = [root]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+            continue
+        if isinstance(obj, dict):
+            stack.extend(obj.values())
+            continue
+        if isinstance(obj, (str, int, float, bytes, Enum)) or obj is None:
+            continue
+        if id(obj) in seen or not type(obj).__module__.startswith('zilc.'):
+            continue
+        seen.add(id(obj))
+        if isinstance(getattr(obj, 'line', None), int):
+            obj.line += delta
+        if isinstance(obj, ASTNode) or hasattr(obj, '__dict__'):
+            stack.extend(value for _name, value in node_fields(obj))
+
+
+def _frontend_fingerprint() -> str:
+    """Hash of the lexer/parser sources, so a compiler upgrade misses."""
+    here = Path(__file__).resolve().parent
+    h = hashlib.sha256()
+    for rel in ('lexer/lexer.py', 'parser/parser.py', 'parser/ast_nodes.py',
+                'build_cache.py'):
+        try:
+            h.update((here / rel).read_bytes())
+        except OSError:
+            pass
+    return h.hexdigest()
+
+
+class BuildCache:
+    """Store of per-unit (tokens, top-level nodes).
+
+    Entries live on disk under `root`, or, when `store` is given, in that
+    mapping (digest -> pickled bytes) -- the compile server keeps one such
+    dict alive across requests.  Either way callers get freshly unpickled
+    objects, so later phases may mutate them freely.
+    """
+
+    def __init__(self, root, env: dict, store: Optional[dict] = None):
+        self.root = Path(root) if root is not None else None
+        self.env_key = hashlib.sha256(
+            (repr(sorted((str(k), repr(v)) for k, v in env.items()))
+             + _frontend_fingerprint()).encode('utf-8')).hexdigest()[:16]
+        self.dir = self.root / self.env_key if self.root is not None else '<memory>'
+        self._memory = store
+        self.hits = 0
+        self.misses = 0
+
+    def _digest(self, text: str) -> str:
+        return self.env_key + hashlib.sha256(text.encode('utf-8', 'surrogatepass')).hexdigest()
+
+    def _path(self, text: str) -> Path:
+        digest = hashlib.sha256(text.encode('utf-8', 'surrogatepass')).hexdigest()
+        return self.dir / digest[:2] / f"{digest}.pickle"
+
+    def load(self, text: str) -> Optional[Tuple[list, list]]:
+        """Return cached (tokens, nodes) for unit text, or None."""
+        try:
+            if self._memory is not None:
+                blob = self._memory.get(self._digest(text))
+                if blob is None:
+                    raise KeyError(text[:40])
+                fmt, tokens, nodes = pickle.loads(blob)
+            else:
+                with open(self._path(text), 'rb') as f:
+                    fmt, tokens, nodes = pickle.load(f)
+        except (OSError, KeyError, EOFError, pickle.UnpicklingError, ValueError,
+                AttributeError, ImportError, TypeError):
+            self.misses += 1
+            return None
+        if fmt != _FORMAT:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return tokens, nodes
+
+    def store(self, text: str, tokens: list, nodes: list):
+        """Persist a unit. Written atomically; failures are non-fatal."""
+        if self._memory is not None:
+            try:
+                self._memory[self._digest(text)] = pickle.dumps(
+                    (_FORMAT, tokens, nodes), protocol=pickle.HIGHEST_PROTOCOL)
+            except (pickle.PicklingError, RecursionError, TypeError, AttributeError):
+                pass
+            return
+        path = self._path(text)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp, 'wb') as f:
+                pickle.dump((_FORMAT, tokens, nodes), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except (OSError, pickle.PicklingError, RecursionError, TypeError, AttributeError):
+            pass
@@ -8,9 +8,17 @@ opcodes and better handles ZIL language constructs.
 from typing import List, Dict, Any, Optional, Tuple
 import struct
 import sys
+from bisect import bisect_right
 
 from ..parser.ast_nodes import *
 from ..zmachine.opcodes import OpcodeTable, OperandType
+from .form_builtins import form_handlers
+from .program_facts import analyze_program
+from .routine_ir import (DecodeError, END, LARGE, VARIABLE, SMALL,
+                         branch_targets, decode, encode, relax)
+from .routine_object import RoutineObject
+from ..zmachine.relocations import (CODE, DICT, GLOBALS, ROUTINE, STRING,
+                                     TABLE, TABLES, VOCAB, Relocation)
 from ..zmachine.text_encoding import ZTextEncoder, words_to_bytes
 import os as _sz3_os
 _SZ3_LEVERS = set((_sz3_os.environ.get('MP_SZ3_LEVERS') or 'inline,tail,peep').split(','))
@@ -18,7 +26,7 @@ _SZ3_INLINE = 'inline' in _SZ3_LEVERS
 _SZ3_TAIL = 'tail' in _SZ3_LEVERS
 _SZ3_PEEP = (_sz3_os.environ.get('MP_SZ3_PEEP')
              if _sz3_os.environ.get('MP_SZ3_PEEP') is not None
-             else ('DPQSTJLRNBZKGV' if 'peep' in _SZ3_LEVERS else ''))
+             else ('DPQSTJLRBZKGV' if 'peep' in _SZ3_LEVERS else ''))
 _SZ3_RULES = set((_sz3_os.environ.get('MP_SZ3_RULES') or 'R0,R1,R2,R3').split(','))
 _SZ3_R0 = 'R0' in _SZ3_RULES
 _SZ3_R1 = 'R1' in _SZ3_RULES
@@ -54,18 +62,26 @@ _W_PUNCT = {
     'EXCLAIM': '!', 'QUESTION': '?', 'COLON': ':', 'SEMICOLON': ';',
 }
 
+# Kinds of in-band marker recorded in routine code (see _code_marks): a
+# routine placeholder, a TELL string, a string operand (0xFC00 band), a
+# data-band string that overflowed into code, and a vocab word.
+_MARK_ROUTINE, _MARK_TELL, _MARK_STRING, _MARK_DATA, _MARK_VOCAB = (
+    'routine', 'tell', 'string', 'data', 'vocab')
+# The relocation each kind of mark becomes.
+_MARK_RELOCATION = {_MARK_ROUTINE: ROUTINE, _MARK_TELL: STRING,
+                    _MARK_STRING: STRING, _MARK_DATA: STRING,
+                    _MARK_VOCAB: VOCAB}
 
-class _PlaceholderScanDesync(Exception):
-    """Raised when _walk_large_const_positions cannot decode a code stream."""
 
-
-def _collect_ast_names(node, acc):
+def _collect_ast_names(node, acc, seen=None):
     """Collect every identifier-like string reachable in an AST subtree into
     `acc` (both as written and uppercased).  Used to prove an AUX local is
     NEVER referenced: any occurrence of its name anywhere -- atom, variable
     reference, macro-call argument, table initializer -- keeps it.  String
     LITERAL text is skipped (printed text can never reference a variable), so
-    single-letter locals are not pinned by prose."""
+    single-letter locals are not pinned by prose.  A node object reached
+    again (a subtree shared by macro expansion or hash-consing) is skipped:
+    `seen` holds the ids of the nodes already walked."""
     if node is None or isinstance(node, (int, float, bool, bytes)):
         return
     if isinstance(node, str):
@@ -73,310 +89,28 @@ def _collect_ast_names(node, acc):
         acc.add(node.upper())
         return
     if isinstance(node, (list, tuple, set, frozenset)):
+        if seen is None:
+            seen = set()
         for x in node:
-            _collect_ast_names(x, acc)
+            _collect_ast_names(x, acc, seen)
         return
     if isinstance(node, dict):
+        if seen is None:
+            seen = set()
         for k, v in node.items():
-            _collect_ast_names(k, acc)
-            _collect_ast_names(v, acc)
+            _collect_ast_names(k, acc, seen)
+            _collect_ast_names(v, acc, seen)
         return
     if isinstance(node, StringNode):
         return
     if isinstance(node, ASTNode):
-        for v in vars(node).values():
-            _collect_ast_names(v, acc)
-
-
-def _collect_value_position_names(node, acc):
-    """Collect identifier-like strings reachable in VALUE position only.
-
-    Like _collect_ast_names, but a FormNode's call-operator atom and a
-    RoutineNode's own definition name are skipped.  A routine whose name is
-    collected here has its ADDRESS taken as data somewhere (<QUEUE I-FOO>,
-    a property value, a table element, a global/constant initializer, a
-    GVAL comparison) -- identical-body routine folding must leave such
-    routines alone, because games compare those addresses (classic INT/QUEUE
-    interrupt bookkeeping scans C-TABLE for a specific routine address)."""
-    if node is None or isinstance(node, (int, float, bool, bytes)):
-        return
-    if isinstance(node, str):
-        acc.add(node.upper())
-        return
-    if isinstance(node, (list, tuple, set, frozenset)):
-        for x in node:
-            _collect_value_position_names(x, acc)
-        return
-    if isinstance(node, dict):
-        for k, v in node.items():
-            _collect_value_position_names(k, acc)
-            _collect_value_position_names(v, acc)
-        return
-    if isinstance(node, StringNode):
-        return
-    if isinstance(node, ASTNode):
-        for k, v in vars(node).items():
-            if k == 'operator' and isinstance(v, AtomNode):
-                continue
-            if k == 'name' and isinstance(node, RoutineNode):
-                continue
-            _collect_value_position_names(v, acc)
-
-
-_2OP_STORE_OPS = frozenset({0x08, 0x09, 0x0F, 0x10, 0x11, 0x12, 0x13,
-                            0x14, 0x15, 0x16, 0x17, 0x18})
-_2OP_BRANCH_OPS = frozenset({0x01, 0x02, 0x03, 0x04, 0x05, 0x06, 0x07, 0x0A})
-_1OP_BRANCH_OPS = frozenset({0x00, 0x01, 0x02})
-_EXT_STORE_OPS = frozenset({0x00, 0x01, 0x02, 0x03, 0x04, 0x09, 0x0A})
-_EXT_BRANCH_OPS = frozenset({0x06, 0x18, 0x1B})
-
-
-def _walk_large_const_positions(code, version, include_print_paddr=False):
-    """Walk a V3+ instruction stream; return byte offsets of every 2-byte
-    large-constant operand that may legally hold an address placeholder.
-    Raises _PlaceholderScanDesync when the stream cannot be decoded.
-
-    This exists so placeholder DISCOVERY is structural, not byte-pattern
-    matching: the blind scan matched legal bytes `f0 2e` (a 1-byte branch
-    0xF0 followed by insert_obj 0x2E) as routine placeholder 0xF02E and the
-    fixup pass overwrote them (zork1 TROLL-FCN F-DEAD -> TROLL-FLAG dead)."""
-    v = version
-    n = len(code)
-    i = 0
-    out = []
-    while i < n:
-        op = code[i]
-        if op == 0xBE:  # extended (V5+)
-            if v < 5 or i + 2 >= n:
-                raise _PlaceholderScanDesync()
-            ext = code[i + 1]
-            tb = code[i + 2]
-            i += 3
-            for sh in (6, 4, 2, 0):
-                t = (tb >> sh) & 3
-                if t == 3:
-                    break
-                if t == 0:
-                    if i + 1 >= n:
-                        raise _PlaceholderScanDesync()
-                    out.append(i)
-                    i += 2
-                else:
-                    i += 1
-            if ext in _EXT_STORE_OPS:
-                i += 1
-            if ext in _EXT_BRANCH_OPS:
-                if i >= n:
-                    raise _PlaceholderScanDesync()
-                b = code[i]
-                i += 1
-                if not (b & 0x40):
-                    i += 1
-            continue
-        if op < 0x80:  # long 2OP: two 1-byte operands, no large constants
-            opnum = op & 0x1F
-            if opnum == 0:
-                raise _PlaceholderScanDesync()
-            i += 3
-            store = opnum in _2OP_STORE_OPS or (opnum == 0x19 and v >= 4)
-            branch = opnum in _2OP_BRANCH_OPS
-        elif op < 0xB0:  # short 1OP
-            opnum = op & 0x0F
-            t = (op >> 4) & 3
-            i += 1
-            if t == 0:
-                if i + 1 >= n:
-                    raise _PlaceholderScanDesync()
-                # jump offsets and print_paddr string operands are never
-                # routine placeholders -- don't report them.
-                if opnum != 0x0C and (opnum != 0x0D or include_print_paddr):
-                    out.append(i)
-                i += 2
-            else:
-                i += 1
-            store = opnum in (0x01, 0x02, 0x03, 0x04, 0x0E) \
-                or (opnum == 0x08 and v >= 4) \
-                or (opnum == 0x0F and v <= 4)
-            branch = opnum in _1OP_BRANCH_OPS
-        elif op < 0xC0:  # short 0OP
-            opnum = op & 0x0F
-            i += 1
-            if opnum in (0x02, 0x03):  # print / print_ret: inline z-string
-                while True:
-                    if i + 1 >= n:
-                        raise _PlaceholderScanDesync()
-                    w = (code[i] << 8) | code[i + 1]
-                    i += 2
-                    if w & 0x8000:
-                        break
-            store = (opnum in (0x05, 0x06) and v == 4)
-            branch = (opnum in (0x05, 0x06) and v <= 3) or opnum in (0x0D, 0x0F)
-        else:  # variable form
-            opnum = op & 0x1F
-            var_of_2op = op < 0xE0
-            i += 1
-            ntypes = 2 if (not var_of_2op and v >= 4 and opnum in (0x0C, 0x1A)) else 1
-            if i + ntypes > n:
-                raise _PlaceholderScanDesync()
-            tbs = code[i:i + ntypes]
-            i += ntypes
-            done = False
-            for tb in tbs:
-                for sh in (6, 4, 2, 0):
-                    t = (tb >> sh) & 3
-                    if t == 3:
-                        done = True
-                        break
-                    if t == 0:
-                        if i + 1 >= n:
-                            raise _PlaceholderScanDesync()
-                        out.append(i)
-                        i += 2
-                    else:
-                        i += 1
-                if done:
-                    break
-            if var_of_2op:
-                store = opnum in _2OP_STORE_OPS or (opnum == 0x19 and v >= 4)
-                branch = opnum in _2OP_BRANCH_OPS
-            else:
-                store = opnum in (0x00, 0x07) \
-                    or (v >= 4 and opnum in (0x0C, 0x16, 0x17)) \
-                    or (v >= 5 and opnum in (0x04, 0x18))
-                branch = (v >= 4 and opnum == 0x17) or (v >= 5 and opnum == 0x1F)
-        if store:
-            i += 1
-        if branch:
-            if i >= n:
-                raise _PlaceholderScanDesync()
-            b = code[i]
-            i += 1
-            if not (b & 0x40):
-                i += 1
-        if i > n:
-            raise _PlaceholderScanDesync()
-    return out
-
-
-
-def _walk_print_paddr_positions(code, version):
-    """Walk a V3+ instruction stream; return byte offsets of every 0x8D
-    short-form print_paddr OPCODE byte (large-constant operand form), i.e.
-    positions that may legally hold a TELL string placeholder.
-    Raises _PlaceholderScanDesync when the stream cannot be decoded."""
-    v = version
-    n = len(code)
-    i = 0
-    out = []
-    while i < n:
-        op = code[i]
-        if op == 0xBE:  # extended (V5+)
-            if v < 5 or i + 2 >= n:
-                raise _PlaceholderScanDesync()
-            ext = code[i + 1]
-            tb = code[i + 2]
-            i += 3
-            for sh in (6, 4, 2, 0):
-                t = (tb >> sh) & 3
-                if t == 3:
-                    break
-                if t == 0:
-                    if i + 1 >= n:
-                        raise _PlaceholderScanDesync()
-                    i += 2
-                else:
-                    i += 1
-            if ext in _EXT_STORE_OPS:
-                i += 1
-            if ext in _EXT_BRANCH_OPS:
-                if i >= n:
-                    raise _PlaceholderScanDesync()
-                b = code[i]
-                i += 1
-                if not (b & 0x40):
-                    i += 1
-            continue
-        if op < 0x80:  # long 2OP
-            opnum = op & 0x1F
-            if opnum == 0:
-                raise _PlaceholderScanDesync()
-            i += 3
-            store = opnum in _2OP_STORE_OPS or (opnum == 0x19 and v >= 4)
-            branch = opnum in _2OP_BRANCH_OPS
-        elif op < 0xB0:  # short 1OP
-            opnum = op & 0x0F
-            t = (op >> 4) & 3
-            opcode_pos = i
-            i += 1
-            if t == 0:
-                if i + 1 >= n:
-                    raise _PlaceholderScanDesync()
-                if opnum == 0x0D:  # print_paddr with large constant = 0x8D
-                    out.append(opcode_pos)
-                i += 2
-            else:
-                i += 1
-            store = opnum in (0x01, 0x02, 0x03, 0x04, 0x0E) \
-                or (opnum == 0x08 and v >= 4) \
-                or (opnum == 0x0F and v <= 4)
-            branch = opnum in _1OP_BRANCH_OPS
-        elif op < 0xC0:  # short 0OP
-            opnum = op & 0x0F
-            i += 1
-            if opnum in (0x02, 0x03):  # print / print_ret inline z-string
-                while True:
-                    if i + 1 >= n:
-                        raise _PlaceholderScanDesync()
-                    w = (code[i] << 8) | code[i + 1]
-                    i += 2
-                    if w & 0x8000:
-                        break
-            store = (opnum in (0x05, 0x06) and v == 4)
-            branch = (opnum in (0x05, 0x06) and v <= 3) or opnum in (0x0D, 0x0F)
-        else:  # variable form
-            opnum = op & 0x1F
-            var_of_2op = op < 0xE0
-            i += 1
-            ntypes = 2 if (not var_of_2op and v >= 4 and opnum in (0x0C, 0x1A)) else 1
-            if i + ntypes > n:
-                raise _PlaceholderScanDesync()
-            tbs = code[i:i + ntypes]
-            i += ntypes
-            done = False
-            for tb in tbs:
-                for sh in (6, 4, 2, 0):
-                    t = (tb >> sh) & 3
-                    if t == 3:
-                        done = True
-                        break
-                    if t == 0:
-                        if i + 1 >= n:
-                            raise _PlaceholderScanDesync()
-                        i += 2
-                    else:
-                        i += 1
-                if done:
-                    break
-            if var_of_2op:
-                store = opnum in _2OP_STORE_OPS or (opnum == 0x19 and v >= 4)
-                branch = opnum in _2OP_BRANCH_OPS
-            else:
-                store = opnum in (0x00, 0x07) \
-                    or (v >= 4 and opnum in (0x0C, 0x16, 0x17)) \
-                    or (v >= 5 and opnum in (0x04, 0x18))
-                branch = (v >= 4 and opnum == 0x17) or (v >= 5 and opnum == 0x1F)
-        if store:
-            i += 1
-        if branch:
-            if i >= n:
-                raise _PlaceholderScanDesync()
-            b = code[i]
-            i += 1
-            if not (b & 0x40):
-                i += 1
-        if i > n:
-            raise _PlaceholderScanDesync()
-    return out
+        if seen is None:
+            seen = set()
+        elif id(node) in seen:
+            return
+        seen.add(id(node))
+        for _name, v in node_fields(node):
+            _collect_ast_names(v, acc, seen)
 
 
 class ImprovedCodeGenerator:
@@ -390,6 +124,8 @@ class ImprovedCodeGenerator:
         self.action_table = action_table
         self.symbol_tables = symbol_tables  # Store for later access (e.g., MAP-DIRECTIONS)
         self.compiler = compiler  # Reference to compiler for warnings
+        # Worker processes for routine code generation (parallel_codegen.py)
+        self.jobs = 1
         # Get CRLF-CHARACTER from compiler's compile_globals (defaults to '|')
         crlf_char = '|'
         preserve_spaces = False
@@ -499,11 +235,6 @@ class ImprovedCodeGenerator:
         # blob pointers, where 0xFF00|index placeholders can't reach
         # table indices > 255.
         self.table_addr_fixups: List[Tuple[int, int, int, int]] = []
-        # Names of tables whose DATA embeds 0xFF00|idx nested-table pointers
-        # (e.g. _GLOBAL_VILLAINS); get_tables_with_placeholders includes their
-        # ranges so the assembler resolves those pointers.
-        self._tables_with_nested_ptrs: set = set()
-        self._emitted_nested_table_ptr = False
         # (offset, child_table_index) pairs collected while encoding table
         # values; _add_table converts them to positional table_addr_fixups so
         # depth>=2 nested-table pointers resolve (zork1 HERO-MELEE).
@@ -511,9 +242,6 @@ class ImprovedCodeGenerator:
         # global name -> true table index, for atoms naming table-globals used
         # as table ELEMENTS (zork1 VILLAINS rows name TROLL-MELEE etc.)
         self._global_table_indices: dict = {}
-        # vocab placeholder indices EMITTED INTO TABLE DATA; the assembler's
-        # table 0xFB scan may only match these (zork3 CPEXITS corruption)
-        self._table_vocab_indices: set = set()
         self._table_data_size = 0  # Running total of table data size
 
         # Special header tables - track their table indices for header field population
@@ -534,18 +262,19 @@ class ImprovedCodeGenerator:
         self._max_placeholder_value = 0xFFFE   # End of placeholder range (0xFFFF reserved)
         # Reverse mapping: routine_name -> placeholder_value (reuse same value for same routine)
         self._routine_to_placeholder: Dict[str, int] = {}
-        # Track actual placeholder positions in code (offset, placeholder_idx)
-        self._placeholder_positions: List[Tuple[int, int]] = []
-        # Pending placeholders for current routine (relative offset, placeholder_idx)
-        self._pending_placeholders: List[Tuple[int, int]] = []
+        # In-band markers written into routine code, recorded as each piece
+        # of code is generated (see _record_code_marks) so the assembler can
+        # patch them point-wise (see get_code_relocations): (offset, kind,
+        # target) with kind one of the _MARK_* kinds and target what the
+        # marker stands for -- a routine name, a string's text or a vocab
+        # word -- so a mark does not depend on how markers are numbered.
+        # Final records, offsets absolute in self.code:
+        self._code_marks: List[Tuple[int, str, str]] = []
+        # The current routine's records, offsets relative to its code; every
+        # pass that moves bytes in the routine remaps these.
+        self._pending_marks: List[Tuple[int, str, str]] = []
         # Track relative offset within current routine for placeholder tracking
         self._routine_code_offset: int = 0
-        # Current statement's routine placeholder offsets: (offset_in_stmt_code, placeholder_idx)
-        # Populated by gen_routine_call(), consumed by generate_routine()
-        self._current_stmt_routine_offsets: List[Tuple[int, int]] = []
-        # Current statement's positions to exclude from placeholder scanning
-        # (for large constants in funny globals that might look like placeholders)
-        self._current_stmt_excluded_positions: set = set()
 
         # TELL string placeholders - for strings in TELL statements
         # Encoded as 0x8D <hi> <lo> where value = 0xE000 + index (8190 slots)
@@ -556,14 +285,6 @@ class ImprovedCodeGenerator:
         self._tell_string_base = 0xE000  # Base value for placeholder range
         self._max_tell_string_index = 8189  # 0xE000-0xFFFD = 8190 slots
         self._tell_string_to_placeholder: Dict[str, int] = {}
-        # Track TELL placeholder positions for offset-based resolution
-        # Final positions: (absolute_offset_in_code, placeholder_idx)
-        self._tell_placeholder_positions: List[Tuple[int, int]] = []
-        # Pending positions for current routine: (offset_in_routine_code, placeholder_idx)
-        self._pending_tell_positions: List[Tuple[int, int]] = []
-        # Current statement's TELL offsets: (offset_in_stmt_code, placeholder_idx)
-        # Populated by gen_tell(), consumed by generate_routine()
-        self._current_stmt_tell_offsets: List[Tuple[int, int]] = []
 
         # String operand placeholders - for strings passed as function arguments
         # Encoded as 0xFC00 | index (256 slots)
@@ -594,7 +315,7 @@ class ImprovedCodeGenerator:
         self._table_string_fixups = []
         self._encode_string_marker_offsets = []
         # Exact positions of ROUTINE placeholders inside compiled tables:
-        # (table_idx, byte_offset). get_table_routine_fixups used to word-scan
+        # (table_idx, byte_offset). The table routine fixups used to word-scan
         # ALL table data for 0xF0xx values -- a classic syntax entry's
         # [loc=0xF0][action] byte pair matched and the scanner overwrote it with
         # a routine address, wrecking OPEN/TAKE scope flags.
@@ -623,20 +344,18 @@ class ImprovedCodeGenerator:
         # marker value spills into the 0xFC code-string band and resolves to
         # garbage. Exact positions are therefore recorded at emission:
         #   - code: markers carry a PER-STATEMENT sequence number in the low
-        #     byte (_current_stmt_vocab_emits maps seq -> full idx); the
-        #     post-statement structural walk records each marker's offset,
-        #     rewrites the low byte to idx&0xFF (canonical, so the legacy
-        #     scan stays a valid backup for idx<256) and appends
-        #     (offset, full_idx) to _pending_vocab_positions, which the
-        #     peephole remaps exactly like _pending_placeholders.
+        #     byte (_current_stmt_vocab_emits maps seq -> full idx);
+        #     _record_code_marks records each marker's offset, rewrites the
+        #     low byte to idx&0xFF (the canonical form get_code_relocations
+        #     checks the final code against) and appends (offset,
+        #     _MARK_VOCAB, word) to _pending_marks.
         #   - tables: (table_idx, byte_offset, full_idx) in _table_vocab_fixups.
-        #   - globals: global name -> full_idx in _global_vocab_fixups.
-        # Final code positions: (abs_code_offset, full_idx).
-        self._vocab_placeholder_positions: List[Tuple[int, int]] = []
-        self._pending_vocab_positions: List[Tuple[int, int]] = []
+        #   - globals: (VOCAB, full_idx) in _global_marks.
         self._current_stmt_vocab_emits: List[int] = []
         self._table_vocab_fixups: List[Tuple[int, int, int]] = []
-        self._global_vocab_fixups: Dict[str, int] = {}
+        # global name -> (marker word, kind, target) for every global whose
+        # initial value is a marker (see _mark_global, get_global_relocations)
+        self._global_marks: Dict[str, Tuple[int, str, Any]] = {}
         self._encode_vocab_marker_offsets: List[Tuple[int, int]] = []
         self._last_voc_form_idx = None
 
@@ -761,6 +480,9 @@ class ImprovedCodeGenerator:
         for verb, num in self.verb_actions.items():
             self.constants[verb] = num
 
+        # Builtin operator name -> handler, for generate_form
+        self._form_handlers = form_handlers(self)
+
     def _init_version_features(self):
         """Initialize version-specific feature flags."""
         self.has_abbreviations = self.version >= 2  # V1 has no abbreviations
@@ -909,64 +631,24 @@ class ImprovedCodeGenerator:
         """Check if a 16-bit value is a routine placeholder."""
         return 0xF000 <= value <= self._max_placeholder_value and value in self._routine_placeholders
 
-    def _generate_nested_and_adjust(self, node, code: bytearray) -> bytes:
-        """Generate code for a nested expression and adjust placeholder offsets.
-
-        This method handles the case where we need to generate code for a nested
-        expression (like a routine call inside a DO loop bound) and properly track
-        placeholder positions relative to the outer code buffer.
-
-        Args:
-            node: The AST node to generate code for
-            code: The outer code buffer where the generated code will be appended
-
-        Returns:
-            The generated bytecode for the nested expression
-        """
-        # Save the current placeholder offsets count
-        offset_count_before = len(self._current_stmt_routine_offsets)
-
-        # Generate the nested code
-        nested_code = self.generate_statement(node)
-
-        # Adjust any new placeholder offsets by the position where nested code will be inserted
-        insert_position = len(code)
-        for i in range(offset_count_before, len(self._current_stmt_routine_offsets)):
-            rel_offset, placeholder_val = self._current_stmt_routine_offsets[i]
-            # Adjust offset by the insertion position
-            self._current_stmt_routine_offsets[i] = (insert_position + rel_offset, placeholder_val)
-
-        return nested_code
-
     def generate(self, program: Program) -> bytes:
         """Generate bytecode from program AST."""
         self._inline_ok_cache = {}
-        # Names referenced in VALUE (non-call) position anywhere: routines in
-        # this set have their address taken as data, so identical-body folding
-        # (generate_routine) must not alias them.  On any walk failure the set
-        # stays None and folding is disabled outright (safe direction).
+        # One traversal answers every whole-program question asked below
+        # (see program_facts).  Should it fail, each consumer falls back to
+        # its safe answer: no routine folding, no inline printing, VTBL built.
         try:
-            _value_refs = set()
-            _collect_value_position_names(
-                [r.body for r in program.routines]
-                + [getattr(r, 'local_defaults', None) for r in program.routines]
-                + [getattr(g, 'initial_value', None)
-                   for g in getattr(program, 'globals', []) or []]
-                + [getattr(c, 'value', None)
-                   for c in getattr(program, 'constants', []) or []]
-                + [getattr(o, 'properties', None)
-                   for o in (getattr(program, 'objects', []) or [])
-                   + (getattr(program, 'rooms', []) or [])],
-                _value_refs)
-            self._value_position_names = _value_refs
+            facts = analyze_program(program)
         except Exception:
-            self._value_position_names = None
-        self._str_use_counts = self._count_string_uses(program)
+            facts = None
+        self.program_facts = facts
+        # Names referenced in VALUE (non-call) position anywhere: routines in
+        # this set have their address taken as data, so identical-body folding
+        # (generate_routine) must not alias them.
+        self._value_position_names = facts and facts.value_position_names
+        self._str_use_counts = facts and facts.string_uses
         # Single-use TELL literals are emitted inline (see _inline_print_ok).
-        try:
-            self._string_use_counts = self._build_string_use_counts(program)
-        except Exception:
-            self._string_use_counts = None
+        self._string_use_counts = facts and facts.string_use_counts
         _demote = set(getattr(self.compiler, '_setg_demote', ()) or ()) if self.compiler else set()
         if _demote:
             # Top-level-SETG pseudo-globals that are CONSTANT-shadowed or never
@@ -990,7 +672,7 @@ class ImprovedCodeGenerator:
         def _preregister_setg_idiom(_node):
             if (isinstance(_node, FormNode)
                     and isinstance(_node.operator, AtomNode)
-                    and _node.operator.value.upper() in ('SETG', 'SET')
+                    and _node.operator.upper in ('SETG', 'SET')
                     and len(_node.operands) == 2
                     and isinstance(_node.operands[0], AtomNode)):
                 _v = self.eval_expression(_node.operands[1])
@@ -1020,15 +702,11 @@ class ImprovedCodeGenerator:
         # moonmist) for a table nothing ever read.
         _vtbl_referenced = 'VTBL' in self.globals
         if not _vtbl_referenced:
-            _prog_names = set()
-            _collect_ast_names([r.body for r in program.routines], _prog_names)
-            _collect_ast_names([getattr(g, 'initial_value', None)
-                                for g in getattr(program, 'globals', []) or []],
-                               _prog_names)
-            _collect_ast_names([getattr(c, 'value', None)
-                                for c in getattr(program, 'constants', []) or []],
-                               _prog_names)
-            _vtbl_referenced = 'VTBL' in _prog_names
+            # Globals dropped by _setg_demote above no longer count.
+            _vtbl_referenced = (
+                facts is None or 'VTBL' in facts.names
+                or any('VTBL' in facts.global_init_names.get(g.name, ())
+                       for g in program.globals))
         if (_vtbl_referenced and self.action_table
                 and 'verb_numbers' in self.action_table):
             verb_numbers = self.action_table['verb_numbers']
@@ -1056,7 +734,7 @@ class ImprovedCodeGenerator:
                 if 'VTBL' not in self.globals:
                     self.globals['VTBL'] = self.next_global
                     self.next_global += 1
-                self.global_values['VTBL'] = self._table_marker(table_idx)  # Table reference marker
+                self._set_global_table('VTBL', table_idx)  # Table reference marker
 
         # Pre-assign object numbers FIRST so globals can reference them
         # (e.g., <GLOBAL HERE CAT> needs CAT to be assigned number 1)
@@ -1147,7 +825,7 @@ class ImprovedCodeGenerator:
                 if isinstance(_iv, (TableNode, StringNode)):
                     return 0
                 if isinstance(_iv, FormNode) and isinstance(_iv.operator, AtomNode) \
-                        and _iv.operator.value.upper() in ('TABLE', 'LTABLE', 'ITABLE', 'PTABLE'):
+                        and _iv.operator.upper in ('TABLE', 'LTABLE', 'ITABLE', 'PTABLE'):
                     return 0
                 return 1
             program.globals = sorted(program.globals, key=_spill_key)
@@ -1200,7 +878,7 @@ class ImprovedCodeGenerator:
                 elif isinstance(global_node.initial_value, FormNode):
                     # Handle TABLE/LTABLE/ITABLE/PTABLE initial values (legacy)
                     if isinstance(global_node.initial_value.operator, AtomNode):
-                        form_op = global_node.initial_value.operator.value.upper()
+                        form_op = global_node.initial_value.operator.upper
                         if form_op in ('TABLE', 'LTABLE', 'ITABLE', 'PTABLE'):
                             # Compile the table and get placeholder
                             self._compile_global_table(global_node.name, global_node.initial_value, form_op)
@@ -1208,19 +886,20 @@ class ImprovedCodeGenerator:
                             # Compile-time ZGET - evaluate and store result
                             val = self._eval_compile_time_zget(global_node.initial_value.operands)
                             if val is not None:
-                                self.global_values[global_node.name] = val
+                                self._set_global_value(global_node.name, val)
                         elif form_op == 'ZREST':
                             # Compile-time ZREST - store reference to table at offset
                             self._store_zrest_reference(global_node.name, global_node.initial_value.operands)
                         elif form_op == 'VOC':
                             # <VOC "word" pos> - vocabulary word reference
                             voc_val = self._handle_voc_form(global_node.initial_value)
-                            self.global_values[global_node.name] = voc_val
-                            # Record the FULL index positionally (the marker's
-                            # low byte cannot carry indices >= 256).
+                            # Record the FULL index (the marker's low byte
+                            # cannot carry indices >= 256).
                             if self._last_voc_form_idx is not None:
-                                self._global_vocab_fixups[global_node.name] = \
-                                    self._last_voc_form_idx
+                                self._mark_global(global_node.name, voc_val, VOCAB,
+                                                  self._last_voc_form_idx)
+                            else:
+                                self.global_values[global_node.name] = voc_val
                         else:
                             # A compile-time-foldable *scalar* FORM initial value:
                             # <GLOBAL PRESENT-TIME <SETG PRESENT-TIME-ATOM 420>>
@@ -1252,18 +931,18 @@ class ImprovedCodeGenerator:
                     # as string-valued CONSTANTs). Without this the global stays 0 and any
                     # <TELL ,X> prints from address 0 (garbage).
                     text = global_node.initial_value.value
-                    self.global_values[global_node.name] = self.register_data_string(text)
+                    self._mark_global(global_node.name, self.register_data_string(text),
+                                      STRING, text)
                 elif isinstance(global_node.initial_value, GlobalVarNode):
                     # Reference to another global - copy its initial value
                     # (could be scalar or table reference marker like 0xFF00 | idx)
                     ref_name = global_node.initial_value.name
                     if ref_name in self.global_values:
                         self.global_values[global_node.name] = self.global_values[ref_name]
-                        # A copied vocab-marker value needs its own positional
-                        # fixup (the marker low byte can't carry idx >= 256).
-                        if ref_name in self._global_vocab_fixups:
-                            self._global_vocab_fixups[global_node.name] = \
-                                self._global_vocab_fixups[ref_name]
+                        # A copied marker value names the same target.
+                        if ref_name in self._global_marks:
+                            self._mark_global(global_node.name,
+                                              *self._global_marks[ref_name])
                     else:
                         # Fall back to global number (for runtime globals)
                         init_val = self.get_operand_value(global_node.initial_value)
@@ -1272,8 +951,10 @@ class ImprovedCodeGenerator:
                 else:
                     # Simple value (number, atom, etc.)
                     init_val = self.get_operand_value(global_node.initial_value)
-                    if isinstance(init_val, int):
+                    if isinstance(global_node.initial_value, NumberNode):
                         self.global_values[global_node.name] = init_val
+                    elif isinstance(init_val, int):
+                        self._set_global_value(global_node.name, init_val)
 
         # Process compile-time table operations (ZPUT, PUTB, ZGET, ZREST)
         self._process_compile_time_ops(program)
@@ -1319,7 +1000,7 @@ class ImprovedCodeGenerator:
                 self._alloc_top_global('VOCAB')
             if 'VOCAB' not in self.global_values:
                 # Use special marker 0xFA00 that assembler will replace with dict_addr
-                self.global_values['VOCAB'] = 0xFA00
+                self._mark_global('VOCAB', 0xFA00, DICT, 0)
 
         # Note: Objects were already assigned numbers above (before globals)
         # so that globals can reference objects like <GLOBAL HERE CAT>
@@ -1361,8 +1042,12 @@ class ImprovedCodeGenerator:
             routines_to_generate.append(go_routine)
         routines_to_generate.extend(other_routines)
 
-        for routine_node in routines_to_generate:
-            self.generate_routine(routine_node)
+        if self.jobs > 1:
+            from .parallel_codegen import generate_routines_parallel
+            generate_routines_parallel(self, routines_to_generate, self.jobs)
+        else:
+            for routine_node in routines_to_generate:
+                self.generate_routine(routine_node)
 
         # Generate ACTIONS table data
         if self.action_table:
@@ -1528,16 +1213,18 @@ class ImprovedCodeGenerator:
         # Build the initial values for the table
         table_data = bytearray()
         _ptr_fixups = []
-        _markers = getattr(self, '_tbl_marker_globals', set())
+        _marks = []
         for name, idx in sorted(self.funny_globals_table.items(), key=lambda x: x[1]):
             # Get initial value for this global
             init_val = self.global_values.get(name, 0)
-            if name in _markers and isinstance(init_val, int) \
-                    and (init_val & 0xFF00) == 0xFF00:
-                # nested-table pointer: resolve positionally (table_addr_fixups),
-                # the blind 0xFF00 scans never see the soft table
-                _ptr_fixups.append((idx * 2, init_val & 0xFF))
-                init_val = 0
+            mark = self._global_marks.get(name)
+            if mark is not None and mark[0] == init_val:
+                if mark[1] == TABLE:
+                    # table pointer: resolve positionally (table_addr_fixups)
+                    _ptr_fixups.append((idx * 2, mark[2]))
+                    init_val = 0
+                else:
+                    _marks.append((idx * 2, mark[1], mark[2]))
             # Store as word (2 bytes, big-endian)
             table_data.append((init_val >> 8) & 0xFF)
             table_data.append(init_val & 0xFF)
@@ -1549,16 +1236,18 @@ class ImprovedCodeGenerator:
         self.tables.append((f"_SOFT_GLOBALS", bytes(table_data), False, False))  # Not pure, mutable
         for _off, _src in _ptr_fixups:
             self.table_addr_fixups.append((table_idx, _off, _src, 0))
-
-        # Set the global's initial value to the table reference marker. The
-        # marker lives only in globals_data, whose assembler resolver
-        # (_resolve_table_placeholders) understands BOTH the 0xFF00 band
-        # (idx < 256) and the 0xF800 band (idx 256..511), so a big game like
-        # bureaucracy -- which registers 300+ tables before the soft-globals
-        # table -- resolves correctly.  _table_marker caps at 511.
+        for _off, _kind, _target in _marks:
+            if _kind == STRING:
+                self._table_string_fixups.append((table_idx, _off))
+            elif _kind == VOCAB:
+                self._table_vocab_fixups.append((table_idx, _off, _target))
+
+        # Set the global's initial value to the table reference marker.
+        # _table_marker covers table indexes up to 511 (bureaucracy registers
+        # 300+ tables before the soft-globals table).
         if table_idx > 0x1FF:
             raise ValueError("SOFT-GLOBALS table index exceeds table-marker range (max 511)")
-        self.global_values[self.funny_globals_table_global] = self._table_marker(table_idx)
+        self._set_global_table(self.funny_globals_table_global, table_idx)
 
     def _setup_action_table_globals(self):
         """Reserve globals for ACTIONS, PREACTIONS, and PREPOSITIONS tables."""
@@ -1646,7 +1335,7 @@ class ImprovedCodeGenerator:
             self._table_data_size += len(table_data)
             self.table_counter += 1
             self.tables.append((f"_GLOBAL_{global_name}", bytes(table_data), is_pure, is_parser_table))
-            self.global_values[global_name] = self._table_marker(table_idx); self.__dict__.setdefault('_tbl_marker_globals', set()).add(global_name)
+            self._set_global_table(global_name, table_idx)
             self._global_table_indices[global_name] = len(self.tables) - 1
             return
 
@@ -1673,7 +1362,7 @@ class ImprovedCodeGenerator:
             self._table_data_size += len(table_data)
             self.table_counter += 1
             self.tables.append((f"_GLOBAL_{global_name}", bytes(table_data), is_pure, is_parser_table))
-            self.global_values[global_name] = self._table_marker(table_idx); self.__dict__.setdefault('_tbl_marker_globals', set()).add(global_name)
+            self._set_global_table(global_name, table_idx)
             self._global_table_indices[global_name] = len(self.tables) - 1
             return
 
@@ -1741,17 +1430,11 @@ class ImprovedCodeGenerator:
             self._encode_routine_marker_offsets = []
             self._encode_nested_table_ptr_offsets = []
             self._encode_vocab_marker_offsets = []
-            self._emitted_nested_table_ptr = False
             encoded_data = self._encode_table_values(values, default_is_byte=is_byte,
                                                      is_string=is_string, pattern=element_pattern)
-            if self._emitted_nested_table_ptr:
-                self._tables_with_nested_ptrs.add(f"_GLOBAL_{global_name}")
             _str_marker_offs = list(self._encode_string_marker_offsets)
             _rtn_marker_offs = list(self._encode_routine_marker_offsets)
             # Nested-table pointers get POSITIONAL fixups, like _add_table does.
-            # Only the name-keyed legacy set was recorded here, and its blind
-            # 0xFF00 rescan resolves pure children with the impure base
-            # formula; the positional path is exact.
             _nst_marker_offs = list(self._encode_nested_table_ptr_offsets)
             _voc_marker_offs = list(self._encode_vocab_marker_offsets)
             # For TABLE with LENGTH flag, add a byte length prefix
@@ -1786,7 +1469,7 @@ class ImprovedCodeGenerator:
             self._table_vocab_fixups.append((table_idx, _o, _fi))
 
         # Set placeholder for table address (will be resolved by assembler)
-        self.global_values[global_name] = self._table_marker(table_idx); self.__dict__.setdefault('_tbl_marker_globals', set()).add(global_name)
+        self._set_global_table(global_name, table_idx)
         self._global_table_indices[global_name] = len(self.tables) - 1
 
         # Track special header tables
@@ -1813,7 +1496,7 @@ class ImprovedCodeGenerator:
             # Check for flags like (PURE), (BYTE), (STRING), (LEXV), (LENGTH), (PARSER-TABLE), (PATTERN ...)
             if isinstance(op, FormNode):
                 if isinstance(op.operator, AtomNode):
-                    flag_name = op.operator.value.upper()
+                    flag_name = op.operator.upper
                     if flag_name == 'PURE':
                         is_pure = True
                         continue
@@ -1840,7 +1523,7 @@ class ImprovedCodeGenerator:
                             element_pattern = self._parse_table_pattern(op.operands)
                         continue
             elif isinstance(op, AtomNode):
-                flag_name = op.value.upper()
+                flag_name = op.upper
                 if flag_name == 'PURE':
                     is_pure = True
                     continue
@@ -1905,7 +1588,7 @@ class ImprovedCodeGenerator:
             self._table_data_size += len(table_data)
             self.table_counter += 1
             self.tables.append((f"_GLOBAL_{global_name}", bytes(table_data), is_pure, is_parser_table))
-            self.global_values[global_name] = self._table_marker(table_idx); self.__dict__.setdefault('_tbl_marker_globals', set()).add(global_name)
+            self._set_global_table(global_name, table_idx)
             self._global_table_indices[global_name] = len(self.tables) - 1
             return
 
@@ -1932,7 +1615,7 @@ class ImprovedCodeGenerator:
             self._table_data_size += len(table_data)
             self.table_counter += 1
             self.tables.append((f"_GLOBAL_{global_name}", bytes(table_data), is_pure, is_parser_table))
-            self.global_values[global_name] = self._table_marker(table_idx); self.__dict__.setdefault('_tbl_marker_globals', set()).add(global_name)
+            self._set_global_table(global_name, table_idx)
             self._global_table_indices[global_name] = len(self.tables) - 1
             return
 
@@ -1978,17 +1661,11 @@ class ImprovedCodeGenerator:
             self._encode_routine_marker_offsets = []
             self._encode_nested_table_ptr_offsets = []
             self._encode_vocab_marker_offsets = []
-            self._emitted_nested_table_ptr = False
             encoded_data = self._encode_table_values(values, default_is_byte=is_byte,
                                                      is_string=is_string, pattern=element_pattern)
-            if self._emitted_nested_table_ptr:
-                self._tables_with_nested_ptrs.add(f"_GLOBAL_{global_name}")
             _str_marker_offs = list(self._encode_string_marker_offsets)
             _rtn_marker_offs = list(self._encode_routine_marker_offsets)
             # Nested-table pointers get POSITIONAL fixups, like _add_table does.
-            # Only the name-keyed legacy set was recorded here, and its blind
-            # 0xFF00 rescan resolves pure children with the impure base
-            # formula; the positional path is exact.
             _nst_marker_offs = list(self._encode_nested_table_ptr_offsets)
             _voc_marker_offs = list(self._encode_vocab_marker_offsets)
             # For TABLE with LENGTH flag, add a byte length prefix
@@ -2032,7 +1709,7 @@ class ImprovedCodeGenerator:
             self._table_vocab_fixups.append((table_idx, _o, _fi))
 
         # Set placeholder for table address (will be resolved by assembler)
-        self.global_values[global_name] = self._table_marker(table_idx); self.__dict__.setdefault('_tbl_marker_globals', set()).add(global_name)
+        self._set_global_table(global_name, table_idx)
         self._global_table_indices[global_name] = len(self.tables) - 1
 
         # Track special header tables
@@ -2078,6 +1755,27 @@ class ImprovedCodeGenerator:
             return 0xF800 | (idx - 0x100)
         raise ValueError('too many tables (max 512)')
 
+    def _mark_global(self, name: str, word: int, kind: str, target) -> int:
+        """Set global `name` to the marker `word` and record that it names
+        `target` (see get_global_relocations).  Returns the word."""
+        self.global_values[name] = word
+        self._global_marks[name] = (word, kind, target)
+        return word
+
+    def _set_global_table(self, name: str, idx: int) -> int:
+        """Point global `name` at table `idx`."""
+        return self._mark_global(name, self._table_marker(idx), TABLE, idx)
+
+    def _set_global_value(self, name: str, value: int) -> int:
+        """Set global `name` to a value computed from another name (a
+        constant, a table element), recording it if that value is a marker
+        the code generator handed out."""
+        mark = self._data_mark(value)
+        if mark is None:
+            self.global_values[name] = value
+            return value
+        return self._mark_global(name, value, *mark)
+
     def _get_table_for_global(self, global_name: str):
         """Get the table index and data for a global that references a table.
 
@@ -2126,7 +1824,7 @@ class ImprovedCodeGenerator:
         if isinstance(table_ref, FormNode):
             # Could be <GVAL TABLE-VAR> or <ZREST ...>
             if isinstance(table_ref.operator, AtomNode):
-                if table_ref.operator.value.upper() in ('GVAL', ','):
+                if table_ref.operator.upper in ('GVAL', ','):
                     if table_ref.operands and isinstance(table_ref.operands[0], AtomNode):
                         table_name = table_ref.operands[0].value
                     else:
@@ -2196,7 +1894,7 @@ class ImprovedCodeGenerator:
         if isinstance(table_ref, GlobalVarNode):
             table_name = table_ref.name
         elif isinstance(table_ref, FormNode) and isinstance(table_ref.operator, AtomNode):
-            if table_ref.operator.value.upper() in ('GVAL', ',') and table_ref.operands:
+            if table_ref.operator.upper in ('GVAL', ',') and table_ref.operands:
                 if isinstance(table_ref.operands[0], AtomNode):
                     table_name = table_ref.operands[0].value
                 else:
@@ -2244,7 +1942,7 @@ class ImprovedCodeGenerator:
         table_ref = operands[0]
         if isinstance(table_ref, FormNode):
             if isinstance(table_ref.operator, AtomNode):
-                if table_ref.operator.value.upper() in ('GVAL', ','):
+                if table_ref.operator.upper in ('GVAL', ','):
                     if table_ref.operands and isinstance(table_ref.operands[0], AtomNode):
                         table_name = table_ref.operands[0].value
                     else:
@@ -2302,7 +2000,7 @@ class ImprovedCodeGenerator:
         if isinstance(table_ref, GlobalVarNode):
             base_table = table_ref.name
         elif isinstance(table_ref, FormNode) and isinstance(table_ref.operator, AtomNode):
-            if table_ref.operator.value.upper() in ('GVAL', ',') and table_ref.operands:
+            if table_ref.operator.upper in ('GVAL', ',') and table_ref.operands:
                 if isinstance(table_ref.operands[0], AtomNode):
                     base_table = table_ref.operands[0].value
                 else:
@@ -2344,7 +2042,7 @@ class ImprovedCodeGenerator:
             return node.value
         elif isinstance(node, AtomNode):
             # Could be a constant
-            name = node.value.upper()
+            name = node.upper
             if name in self.constants:
                 val = self.constants[name]
                 if isinstance(val, int):
@@ -2370,7 +2068,7 @@ class ImprovedCodeGenerator:
         elif isinstance(node, FormNode):
             # Could be compile-time arithmetic or ZGET
             if isinstance(node.operator, AtomNode):
-                op_name = node.operator.value.upper()
+                op_name = node.operator.upper
                 if op_name == 'ZGET':
                     return self._eval_compile_time_zget(node.operands)
                 elif op_name in ('GVAL', ','):
@@ -2416,7 +2114,7 @@ class ImprovedCodeGenerator:
             table_name = table_ref.name
         elif isinstance(table_ref, FormNode):
             if isinstance(table_ref.operator, AtomNode):
-                if table_ref.operator.value.upper() in ('GVAL', ','):
+                if table_ref.operator.upper in ('GVAL', ','):
                     if table_ref.operands and isinstance(table_ref.operands[0], AtomNode):
                         table_name = table_ref.operands[0].value
                     else:
@@ -2471,7 +2169,7 @@ class ImprovedCodeGenerator:
         if isinstance(table_ref, GlobalVarNode):
             table_name = table_ref.name
         elif isinstance(table_ref, FormNode) and isinstance(table_ref.operator, AtomNode):
-            if table_ref.operator.value.upper() in ('GVAL', ',') and table_ref.operands:
+            if table_ref.operator.upper in ('GVAL', ',') and table_ref.operands:
                 if isinstance(table_ref.operands[0], AtomNode):
                     table_name = table_ref.operands[0].value
                 else:
@@ -2550,7 +2248,7 @@ class ImprovedCodeGenerator:
 
             # Link ACTIONS global to the table using placeholder
             if 'ACTIONS' in self.globals:
-                self.global_values['ACTIONS'] = self._table_marker(table_index)
+                self._set_global_table('ACTIONS', table_index)
 
         # Create PREACTIONS table: array of preaction routine addresses indexed by action number
         # Use action_num_to_preaction mapping which tracks preaction per action number
@@ -2615,7 +2313,7 @@ class ImprovedCodeGenerator:
 
             # Link PREACTIONS global to the table using placeholder
             if 'PREACTIONS' in self.globals:
-                self.global_values['PREACTIONS'] = self._table_marker(table_index)
+                self._set_global_table('PREACTIONS', table_index)
 
         # Generate PREPOSITIONS table if we have prepositions
         if 'prepositions' in self.action_table and self.action_table['prepositions']:
@@ -2676,7 +2374,7 @@ class ImprovedCodeGenerator:
 
             # Link PREPOSITIONS global to the table (global was reserved in _setup_action_table_globals)
             if 'PREPOSITIONS' in self.globals:
-                self.global_values['PREPOSITIONS'] = self._table_marker(table_index)
+                self._set_global_table('PREPOSITIONS', table_index)
 
         # Generate VERBS table with syntax entries and options bytes
         self._generate_verbs_table()
@@ -2875,7 +2573,7 @@ class ImprovedCodeGenerator:
         self.table_offsets[verbs_table_index] = self._table_data_size
         self._table_data_size += len(verbs_data)
         self.tables.append(("_VERBS", bytes(verbs_data), True, False))
-        self.global_values['VERBS'] = self._table_marker(verbs_table_index)
+        self._set_global_table('VERBS', verbs_table_index)
 
     def _generate_verbs_table_zilf(self):
         """Generate the ZILF-standard-library VERBS/syntax table.
@@ -3059,7 +2757,7 @@ class ImprovedCodeGenerator:
         self.table_offsets[verbs_table_index] = self._table_data_size
         self._table_data_size += len(verbs_data)
         self.tables.append(("_VERBS", bytes(verbs_data), True, False))
-        self.global_values['VERBS'] = self._table_marker(verbs_table_index)
+        self._set_global_table('VERBS', verbs_table_index)
 
     def generate_long_word_table(self, long_words: List[str]):
         """Generate LONG-WORD-TABLE for words exceeding dictionary length limit.
@@ -3143,13 +2841,13 @@ class ImprovedCodeGenerator:
         self.tables.append((table_name, bytes(table_data), True, False))  # is_pure=True, is_parser_table=False
 
         # Link LONG-WORD-TABLE global to the table
-        self.global_values['LONG-WORD-TABLE'] = self._table_marker(table_index)
+        self._set_global_table('LONG-WORD-TABLE', table_index)
 
     def get_routine_fixups(self) -> List[Tuple[int, int]]:
         """Get routine call fixups for the assembler to resolve.
 
-        Uses tracked placeholder positions instead of scanning, to avoid
-        false matches on data bytes that happen to look like placeholders.
+        One per routine mark recorded in the code (see _record_code_marks),
+        so nothing is read back from the code bytes.
 
         For missing routines, uses offset 0 which will result in address 0x0000
         (a safe null routine address).
@@ -3159,87 +2857,62 @@ class ImprovedCodeGenerator:
         using high_mem_base and patch at byte_offset_in_code.
         """
         fixups = []
-        seen = set()
-
-        # Use tracked placeholder positions. The CODE BYTES are authoritative:
-        # resolve each recorded position to whatever routine placeholder actually
-        # sits there, rather than to the index recorded at emission time.
-        #
-        # A tracked routine-call fixup for a NESTED call can point a couple of
-        # bytes early (at the call's opcode instead of its address operand), and
-        # a code transformation (peephole / branch resize / routine dedup) can
-        # leave a recorded index stale while the position still holds a real,
-        # different placeholder.  The old code validated `bytes == recorded_idx`
-        # and dropped BOTH cases; the second dropped a LIVE reference -- e.g. the
-        # ZILF scope engine's first <PUT ,SCOPE-CURRENT-STAGES 1
-        # ,INVENTORY-SCOPE-STAGE> in the huge inlined MAP-SCOPE, whose slot was
-        # recorded under a neighbouring routine's stale index, so the INVENTORY
-        # stage address stayed a 0xF0xx placeholder and APPLY jumped to garbage.
-        # Reading the actual bytes patches exactly the positions that genuinely
-        # hold a registered placeholder (the nested-call-opcode case still holds
-        # a non-placeholder 0xE0.. byte, so it is still skipped) and de-dups.
-        for offset, placeholder_idx in self._placeholder_positions:
-            if offset + 1 >= len(self.code):
+        for offset, kind, routine_name in self._code_marks:
+            if kind != _MARK_ROUTINE:
                 continue
-            actual = (self.code[offset] << 8) | self.code[offset + 1]
-            routine_name = self._routine_placeholders.get(actual)
-            if routine_name is None:
-                continue
-            if offset in seen:
-                continue
-            seen.add(offset)
             if routine_name in self.routines:
-                routine_offset = self.routines[routine_name]
-                fixups.append((offset, routine_offset))
+                fixups.append((offset, self.routines[routine_name]))
             else:
                 # Missing routine - track it and use offset 0
                 self._missing_routines.add(routine_name)
                 fixups.append((offset, 0))  # Will become 0x0000
-
         return fixups
 
-    def get_table_routine_fixups(self) -> List[Tuple[int, int]]:
-        """Get routine address fixups for table data.
+    def get_table_relocations(self) -> List[Relocation]:
+        """Relocations for the table data get_table_data() returns.
 
-        Scans table data for placeholder markers (0xFD + index) and returns
-        (byte_offset_in_table_data, routine_byte_offset) pairs.
+        One per routine, string and vocab marker whose position was
+        recorded when its table was built (_table_routine_marker_offsets,
+        _table_string_fixups, _table_vocab_fixups); nothing else in the
+        table data is read.  Table-to-table pointers are patched from
+        table_addr_fixups.
 
         For missing routines, uses offset 0 which will result in address 0x0000.
-
-        Returns list of (byte_offset_in_tables, routine_byte_offset) pairs.
-        The assembler should convert routine_byte_offset to packed address
-        and patch the table data at byte_offset_in_tables.
         """
-        # Point-wise resolution from positions recorded at table-build time.
-        # The old word-aligned SCAN over all table data misread a classic syntax
-        # entry's [loc=0xF0][action] byte pair as a routine placeholder and
-        # overwrote it -- OPEN/TAKE lost their scope flags.
-        fixups = []
-        table_data = self.get_table_data()
         # Positions must be computed against the SORTED memory layout
         # (impure, parser, pure) that get_table_data()/the assembler use.
         # self.table_offsets holds raw creation-order offsets; for an impure
         # table created after any pure table the two disagree (suspended's
         # GOAL-TABLES subtables follow dozens of PLTABLEs), so the marker
         # read missed the placeholder and the fixup was silently dropped.
+        table_data = self.get_table_data()
         sorted_offsets = self.get_table_offsets()
-        for table_idx, off in self._table_routine_marker_offsets:
-            base = sorted_offsets.get(table_idx)
-            if base is None:
-                continue
-            i = base + off
-            if i + 1 >= len(table_data):
-                continue
-            placeholder_val = (table_data[i] << 8) | table_data[i + 1]
-            routine_name = self._routine_placeholders.get(placeholder_val)
+
+        def marks(records):
+            for table_idx, off, *rest in records:
+                base = sorted_offsets.get(table_idx)
+                if base is None or base + off + 1 >= len(table_data):
+                    continue
+                i = base + off
+                yield i, (table_data[i] << 8) | table_data[i + 1], rest
+
+        relocs = []
+        for i, word, _ in marks(self._table_routine_marker_offsets):
+            routine_name = self._routine_placeholders.get(word)
             if routine_name is None:
                 continue
-            if routine_name in self.routines:
-                fixups.append((i, self.routines[routine_name]))
-            else:
+            if routine_name not in self.routines:
                 self._missing_routines.add(routine_name)
-                fixups.append((i, 0))
-        return fixups
+            relocs.append(Relocation(TABLES, i, ROUTINE,
+                                     self.routines.get(routine_name, 0)))
+        for i, word, _ in marks(self._table_string_fixups):
+            mark = self._data_mark(word)
+            if mark is not None and mark[0] == STRING:
+                relocs.append(Relocation(TABLES, i, *mark))
+        for i, word, (full_idx,) in marks(self._table_vocab_fixups):
+            if word == 0xFB00 | (full_idx & 0xFF):
+                relocs.append(Relocation(TABLES, i, VOCAB, full_idx))
+        return relocs
 
     def get_missing_routines(self) -> set:
         """Get set of routine names that were called but not defined.
@@ -3317,16 +2990,6 @@ class ImprovedCodeGenerator:
         """
         return self._tell_string_placeholders.copy()
 
-    def get_tell_placeholder_positions(self) -> List[Tuple[int, int]]:
-        """Get TELL string placeholder byte positions for offset-based resolution.
-
-        Returns a list of (byte_offset, placeholder_idx) tuples indicating
-        exactly where each TELL placeholder is located in the bytecode.
-        This allows the assembler to resolve only at known positions,
-        avoiding false matches when 0x8D appears as operand data.
-        """
-        return self._tell_placeholder_positions.copy()
-
     def get_vocab_placeholders(self) -> Dict[int, str]:
         """Get vocabulary word placeholders for the assembler to resolve.
 
@@ -3336,28 +2999,136 @@ class ImprovedCodeGenerator:
         """
         return self._vocab_placeholders.copy()
 
-    def get_vocab_positional_fixups(self) -> List[Tuple[int, int]]:
-        """(code_offset, full_vocab_idx) pairs recorded at emission.
-
-        Validated against the final code bytes (must hold the canonical
-        marker 0xFB / idx&0xFF); a stale position is dropped -- the
-        assembler's legacy structural scan still covers any dropped marker
-        with idx < 256, and a dropped idx >= 256 gets a loud warning since
-        the low-byte backup would resolve it to the WRONG word.
-        """
-        out = []
-        seen = set()
-        for off, idx in self._vocab_placeholder_positions:
-            if off + 1 >= len(self.code) or off in seen:
-                continue
-            if self.code[off] != 0xFB or self.code[off + 1] != (idx & 0xFF):
-                if idx > 0xFF:
-                    self._warn(f"stale vocab marker position {off} for "
-                               f"index {idx} ('{self._vocab_placeholders.get(idx)}')")
-                continue
-            seen.add(off)
-            out.append((off, idx))
-        return out
+    def get_code_relocations(self) -> List[Relocation]:
+        """Relocations for every mark recorded in the routine code.
+
+        Each mark already names its target; the code word at the mark is
+        only checked to still hold the marker for it.  A mark that fails
+        the check is a fatal error: its word would reach the story as a
+        placeholder.  This runs when the story is assembled rather than
+        straight after generate(), once the vocabulary indices are final.
+        """
+        code = self.code
+        relocs = []
+        for off, kind, target in self._code_marks:
+            word = self._marker_word(kind, target)
+            if word is None or code[off:off + 2] != word.to_bytes(2, 'big'):
+                self._error(f"{kind} mark for {target!r} at code offset "
+                            f"0x{off:04x} does not hold its marker",
+                            fatal=True)
+            if kind == _MARK_ROUTINE:
+                # A missing routine becomes 0x0000 (see get_routine_fixups).
+                target = self.routines.get(target, 0)
+            elif kind == _MARK_VOCAB:
+                target = self._vocab_word_to_index[target]
+            relocs.append(Relocation(CODE, off, _MARK_RELOCATION[kind], target))
+        return relocs
+
+    def find_unrelocated_markers(self, code: bytes,
+                                 relocations: List[Relocation]) -> List[Tuple[int, int]]:
+        """Large-constant operands in the relocated routine `code` that
+        still hold a marker word handed out by this code generator.
+
+        The tests' check on get_code_relocations(): each routine is decoded
+        on its own (trailing alignment zeros dropped; ValueError if it
+        still does not decode) and every operand not at a relocated offset
+        is compared against the markers.  A literal that happens to equal
+        a marker is reported too.  Returns (code offset, word) pairs.
+        """
+        markers = set(self._routine_placeholders)
+        markers.update(self._tell_string_base + idx
+                       for idx in self._tell_string_placeholders)
+        markers.update(0xFC00 | idx for idx in self._string_operand_placeholders)
+        markers.update(0xF400 | idx for idx in self._string_data_placeholders)
+        markers.update(getattr(self, '_string_data_ext', {}))
+        markers.update(0xFB00 | (idx & 0xFF)
+                       for idx in self._vocab_word_to_index.values())
+        relocated = {r.offset for r in relocations}
+        starts = sorted(set(self.routines.values()))
+        found = []
+        for start, end in zip(starts, starts[1:] + [len(code)]):
+            body = start + (1 if self.version >= 5 else 1 + 2 * (code[start] & 0x0F))
+            instrs = None
+            for cut in range(end, max(body, end - 8) - 1, -1):
+                try:
+                    instrs = decode(code[body:cut], self.version)
+                    break
+                except DecodeError:
+                    if code[cut - 1:cut] != b'\0':
+                        break
+            if instrs is None:
+                raise ValueError(f"routine at code offset 0x{start:04x} "
+                                 f"does not decode")
+            for ins in instrs:
+                if ins.kind == '1OP' and ins.opnum == 0x0C:
+                    continue                  # jump offset
+                for t, word, pos in ins.operands:
+                    if (t == LARGE and word in markers
+                            and body + pos not in relocated):
+                        found.append((body + pos, word))
+        return found
+
+    def _marker_word(self, kind: str, target: str) -> Optional[int]:
+        """The word a mark of `kind` naming `target` holds in the code, or
+        None if no marker has been handed out for it."""
+        if kind == _MARK_ROUTINE:
+            return self._routine_to_placeholder.get(target)
+        if kind == _MARK_TELL:
+            idx = self._tell_string_to_placeholder.get(target)
+            return None if idx is None else self._tell_string_base + idx
+        if kind == _MARK_STRING:
+            idx = self._string_operand_to_placeholder.get(target)
+            return None if idx is None else 0xFC00 | idx
+        if kind == _MARK_DATA:
+            idx = self._string_data_to_placeholder.get(target)
+            if idx is not None:
+                return 0xF400 | idx
+            return getattr(self, '_string_data_ext_by_text', {}).get(target)
+        idx = self._vocab_word_to_index.get(target)
+        return None if idx is None else 0xFB00 | (idx & 0xFF)
+
+    def get_global_relocations(self) -> List[Relocation]:
+        """Relocations for the globals table build_globals_data writes.
+
+        Each one was recorded where the global was given its marker value
+        (_mark_global).  A global whose value was replaced since holds no
+        marker and gets none.  Offsets are into the 480-byte table.
+        """
+        relocs = []
+        for name, (word, kind, target) in self._global_marks.items():
+            var_num = self.globals.get(name)
+            if (isinstance(var_num, int) and 0x10 <= var_num < 0x100
+                    and self.global_values.get(name) == word):
+                relocs.append(Relocation(GLOBALS, (var_num - 0x10) * 2,
+                                         kind, target))
+        return sorted(relocs, key=lambda r: r.offset)
+
+    def _data_mark(self, word):
+        """(kind, target) for a word taken from a constant or a table
+        element, if it is a marker the code generator handed out, else
+        None.  A vocab marker only carries the low byte of its index.
+        """
+        if not isinstance(word, int):
+            return None
+        word &= 0xFFFF
+        hi, lo = word >> 8, word & 0xFF
+        if word == 0xFA00:
+            return DICT, 0
+        if hi in (0xFF, 0xF8):
+            return TABLE, lo + (0x100 if hi == 0xF8 else 0)
+        if hi == 0xFB:
+            if lo in self._vocab_placeholders:
+                return VOCAB, lo
+            return None
+        if hi == 0xFC:
+            text = self._string_operand_placeholders.get(lo)
+        elif 0xF4 <= hi <= 0xF7:
+            text = self._string_data_placeholders.get(word & 0x3FF)
+        elif 0xF0 <= hi <= 0xF3:
+            text = getattr(self, '_string_data_ext', {}).get(word)
+        else:
+            return None
+        return None if text is None else (STRING, text)
 
     def get_voc_words(self) -> Dict[str, Optional[str]]:
         """Get VOC words with their part-of-speech types.
@@ -3391,7 +3162,7 @@ class ImprovedCodeGenerator:
         # Handle FormNode values that are TABLE/LTABLE/ITABLE/PTABLE forms
         if isinstance(const_node.value, FormNode):
             if isinstance(const_node.value.operator, AtomNode):
-                form_op = const_node.value.operator.value.upper()
+                form_op = const_node.value.operator.upper
                 if form_op in ('TABLE', 'LTABLE', 'ITABLE', 'PTABLE'):
                     # Check for redefinition
                     if const_node.name in self.constants:
@@ -3489,11 +3260,11 @@ class ImprovedCodeGenerator:
             if isinstance(node.operator, AtomNode) and node.operator.value == '<>' and not node.operands:
                 return 0
             # Handle ZGET for compile-time table access
-            if isinstance(node.operator, AtomNode) and node.operator.value.upper() == 'ZGET':
+            if isinstance(node.operator, AtomNode) and node.operator.upper == 'ZGET':
                 return self._eval_compile_time_zget(node.operands)
             # Handle compile-time arithmetic and bitwise operations
             if isinstance(node.operator, AtomNode):
-                op = node.operator.value.upper()
+                op = node.operator.upper
                 if op in ('+', '-', '*', '/', 'MOD', 'BAND', 'BOR', 'BXOR', 'ANDB', 'ORB', 'XORB', 'LSH'):
                     # Evaluate all operands
                     values = []
@@ -3602,7 +3373,7 @@ class ImprovedCodeGenerator:
 
         if isinstance(node, FormNode):
             if isinstance(node.operator, AtomNode):
-                op_name = node.operator.value.upper()
+                op_name = node.operator.upper
                 if op_name == 'SET' and len(node.operands) >= 1:
                     # First operand is the variable name
                     var_node = node.operands[0]
@@ -3661,65 +3432,74 @@ class ImprovedCodeGenerator:
                     return val
         return None
 
-    def _scan_placeholder_words(self, blob, tracked_positions=frozenset()):
-        """Find routine-address placeholder words in generated code, walking
-        the instruction stream so a placeholder value straddling an
-        instruction boundary (e.g. branch byte 0xF0 + opcode 0x2E) is never
-        matched. Falls back to the legacy byte-blind scan only if the stream
-        cannot be decoded (0 desyncs observed across the corpus)."""
+    def _decode_or_none(self, blob):
+        """blob's instructions (routine_ir.decode), or None when it cannot be
+        decoded."""
         try:
-            positions = _walk_large_const_positions(blob, self.version)
-        except _PlaceholderScanDesync:
-            return self._legacy_placeholder_scan(blob, tracked_positions)
-        res = []
-        _overflow = getattr(self, '_string_code_overflow', False)
-        _ext = getattr(self, '_string_data_ext', {})
-        for p in positions:
-            if p in tracked_positions:
-                continue
-            w = (blob[p] << 8) | blob[p + 1]
-            if w in self._routine_placeholders:
-                res.append((p, w))
-            elif _overflow and ((0xF400 <= w <= 0xF7FF
-                                 and (w & 0x3FF) in self._string_data_placeholders)
-                                or w in _ext):
-                # Overflow string-operand marker at a large-constant operand
-                # position: record for point-wise assembler resolution.
-                res.append((p, w))
-        return res
-
-    def _legacy_placeholder_scan(self, blob, tracked):
-        """The old byte-blind scan with its ad-hoc guards (desync fallback)."""
-        res = []
-        for i in range(len(blob) - 1):
-            if i in tracked:
-                continue
-            high_byte = blob[i]
-            low_byte = blob[i + 1]
-            if high_byte >= 0xF0:
-                if i > 0 and blob[i - 1] == 0x8D:
-                    continue
-                if i > 0 and blob[i - 1] in (0xFE, 0xFF):
-                    continue
-                if i > 0 and 0x90 <= blob[i - 1] <= 0x9F:
+            return decode(blob, self.version)
+        except DecodeError:
+            return None
+
+    def _record_code_marks(self, blob, base: int) -> bytes:
+        """Record the markers in `blob`, code just generated for the current
+        routine that will sit at `base` in it, and return it with each vocab
+        marker in canonical form.
+
+        A marker reaches code only as a large-constant operand, so `blob` is
+        decoded and each such operand is looked up among the markers handed
+        out so far: _get_routine_placeholder, the TELL and string operand
+        emitters, register_data_string and _code_vocab_marker keep what each
+        one stands for.  A jump offset never holds a marker, and only a
+        print_paddr operand holds a TELL string.  Each hit is appended to
+        _pending_marks as (base + offset, kind, target).
+        """
+        if not blob:
+            return blob
+        try:
+            instrs = decode(blob, self.version)
+        except DecodeError as e:
+            # An emitter wrote something that is not a whole instruction;
+            # no operand in it can be found, so its markers would reach the
+            # story unresolved.
+            self._error(f"generated code does not decode at offset {e} "
+                        f"({bytes(blob).hex()})", fatal=True)
+        emits = self._current_stmt_vocab_emits
+        overflow = getattr(self, '_string_code_overflow', False)
+        ext = getattr(self, '_string_data_ext', {})
+        fixed = None
+        for ins in instrs:
+            if ins.kind == '1OP' and ins.opnum == 0x0C:
+                continue                      # jump offset
+            print_paddr = ins.op == 0x8D
+            for t, word, pos in ins.operands:
+                if t != LARGE:
                     continue
-                if i >= 4:
-                    opcode = blob[i - 4]
-                    type_byte = blob[i - 3]
-                    prev_byte = blob[i - 1]
-                    if opcode in (0xCF, 0xE1):
-                        second_op_type = (type_byte >> 4) & 0x03
-                        if second_op_type == 0 and prev_byte == 0x00:
-                            continue
-                placeholder_val = (high_byte << 8) | low_byte
-                if placeholder_val in self._routine_placeholders:
-                    res.append((i, placeholder_val))
-                elif (getattr(self, '_string_code_overflow', False)
-                        and ((0xF400 <= placeholder_val <= 0xF7FF
-                              and (placeholder_val & 0x3FF) in self._string_data_placeholders)
-                             or placeholder_val in getattr(self, '_string_data_ext', {}))):
-                    res.append((i, placeholder_val))
-        return res
+                hi, lo = word >> 8, word & 0xFF
+                kind = target = None
+                if print_paddr:
+                    target = self._tell_string_placeholders.get(
+                        word - self._tell_string_base)
+                    if target is not None:
+                        kind = _MARK_TELL
+                    elif hi == 0xFC:
+                        kind, target = _MARK_STRING, self._string_operand_placeholders.get(lo)
+                elif word in self._routine_placeholders:
+                    kind, target = _MARK_ROUTINE, self._routine_placeholders[word]
+                elif overflow and (0xF400 <= word <= 0xF7FF or word in ext):
+                    kind = _MARK_DATA
+                    target = (self._string_data_placeholders.get(word & 0x3FF)
+                              if word >= 0xF400 else ext[word])
+                elif hi == 0xFB and lo < len(emits):
+                    idx = emits[lo]
+                    kind, target = _MARK_VOCAB, self._vocab_placeholders[idx]
+                    if fixed is None:
+                        fixed = bytearray(blob)
+                    fixed[pos + 1] = idx & 0xFF
+                elif hi == 0xFC:
+                    kind, target = _MARK_STRING, self._string_operand_placeholders.get(lo)
+                if target is not None:
+                    self._pending_marks.append((base + pos, kind, target))
+        return blob if fixed is None else bytes(fixed)
 
     def _set_is_special(self, operands, is_global):
         var_node = operands[0]
@@ -3745,7 +3525,7 @@ class ImprovedCodeGenerator:
         if isinstance(stmt, CondNode):
             return self.generate_cond(stmt, discard=True)
         if (isinstance(stmt, FormNode) and isinstance(stmt.operator, AtomNode)
-                and stmt.operator.value.upper() in ('PROG', 'BIND')
+                and stmt.operator.upper in ('PROG', 'BIND')
                 and not self._prog_contains_return(stmt)):
             # A PROG/BIND in statement position: suppress the default TRUE push
             # (classic TELL macros expand to <PROG () <PRINTI ...>>).
@@ -3756,9 +3536,9 @@ class ImprovedCodeGenerator:
             finally:
                 self._discard_prog_ops = _saved
         if (isinstance(stmt, FormNode) and isinstance(stmt.operator, AtomNode)
-                and stmt.operator.value.upper() in ('SET', 'SETG')
+                and stmt.operator.upper in ('SET', 'SETG')
                 and len(stmt.operands) == 2
-                and not self._set_is_special(stmt.operands, stmt.operator.value.upper() == 'SETG')):
+                and not self._set_is_special(stmt.operands, stmt.operator.upper == 'SETG')):
             code = self.gen_set(stmt.operands, is_global=(stmt.operator.value.upper() == 'SETG'))
             b = bytearray(code)
             # strip the trailing value push gen_set always emits
@@ -3771,39 +3551,6 @@ class ImprovedCodeGenerator:
             return bytes(b)
         return self.generate_statement(stmt)
 
-    def _build_string_use_counts(self, program):
-        """Count every StringNode occurrence in the program AST.
-
-        A literal that occurs exactly once can be emitted INLINE (0xB2) instead
-        of print_paddr + a string-table entry, saving 2 bytes.  Over-counting is
-        always safe (it just declines the optimisation), so shared/cyclic nodes
-        are visited once.
-        """
-        from collections import Counter as _Counter
-        counts = _Counter()
-        seen = set()
-        stack = [program]
-        while stack:
-            n = stack.pop()
-            if isinstance(n, (list, tuple, set)):
-                stack.extend(n)
-                continue
-            if isinstance(n, dict):
-                stack.extend(n.values())
-                continue
-            d = getattr(n, '__dict__', None)
-            if d is None:
-                continue
-            if id(n) in seen:
-                continue
-            seen.add(id(n))
-            if type(n).__name__ == 'StringNode':
-                v = getattr(n, 'value', None)
-                if isinstance(v, str):
-                    counts[v] += 1
-            stack.extend(d.values())
-        return counts
-
     def _inline_print_ok(self, text):
         """True when this TELL literal should be emitted inline (0xB2)."""
         if not _SZ3_INLINE or self.version > 4:
@@ -3825,107 +3572,11 @@ class ImprovedCodeGenerator:
         Returns None whenever the stream cannot be decoded cleanly to exactly
         len(code) -- the tail peephole then does nothing.
         """
-        v = self.version
-        n = len(code)
-        i = start
-        starts = []
-        targets = set()
-        while i < n:
-            starts.append(i)
-            op = code[i]
-            if op == 0xBE:
-                return None
-            if op < 0x80:                      # long 2OP
-                opnum = op & 0x1F
-                if opnum == 0:
-                    return None
-                i += 3
-                store = opnum in _2OP_STORE_OPS or (opnum == 0x19 and v >= 4)
-                branch = opnum in _2OP_BRANCH_OPS
-            elif op < 0xB0:                    # short 1OP
-                opnum = op & 0x0F
-                t = (op >> 4) & 3
-                i += 1
-                if t == 0:
-                    if i + 1 >= n:
-                        return None
-                    if opnum == 0x0C:          # jump, large-constant offset
-                        off = (code[i] << 8) | code[i + 1]
-                        if off >= 0x8000:
-                            off -= 0x10000
-                        targets.add(i + off)
-                    i += 2
-                else:
-                    if i >= n:
-                        return None
-                    if t == 1 and opnum == 0x0C:   # jump, small-constant offset
-                        targets.add(i + 1 + code[i] - 2)
-                    i += 1
-                store = opnum in (0x01, 0x02, 0x03, 0x04, 0x0E) \
-                    or (opnum == 0x08 and v >= 4) \
-                    or (opnum == 0x0F and v <= 4)
-                branch = opnum in _1OP_BRANCH_OPS
-            elif op < 0xC0:                    # short 0OP
-                opnum = op & 0x0F
-                i += 1
-                if opnum in (0x02, 0x03):      # print / print_ret inline string
-                    while True:
-                        if i + 1 >= n:
-                            return None
-                        w = (code[i] << 8) | code[i + 1]
-                        i += 2
-                        if w & 0x8000:
-                            break
-                store = (opnum in (0x05, 0x06) and v == 4)
-                branch = (opnum in (0x05, 0x06) and v <= 3) or opnum in (0x0D, 0x0F)
-            else:                              # variable form
-                opnum = op & 0x1F
-                var_of_2op = op < 0xE0
-                i += 1
-                ntypes = 2 if (not var_of_2op and v >= 4 and opnum in (0x0C, 0x1A)) else 1
-                if i + ntypes > n:
-                    return None
-                tbs = code[i:i + ntypes]
-                i += ntypes
-                done = False
-                for tb in tbs:
-                    for sh in (6, 4, 2, 0):
-                        t = (tb >> sh) & 3
-                        if t == 3:
-                            done = True
-                            break
-                        i += 2 if t == 0 else 1
-                    if done:
-                        break
-                if var_of_2op:
-                    store = opnum in _2OP_STORE_OPS or (opnum == 0x19 and v >= 4)
-                    branch = opnum in _2OP_BRANCH_OPS
-                else:
-                    store = opnum in (0x00, 0x07) \
-                        or (v >= 4 and opnum in (0x0C, 0x16, 0x17)) \
-                        or (v >= 5 and opnum in (0x04, 0x18))
-                    branch = (v >= 4 and opnum == 0x17) or (v >= 5 and opnum == 0x1F)
-            if store:
-                i += 1
-            if branch:
-                if i >= n:
-                    return None
-                b = code[i]
-                i += 1
-                if b & 0x40:
-                    off = b & 0x3F
-                else:
-                    if i >= n:
-                        return None
-                    off = ((b & 0x3F) << 8) | code[i]
-                    i += 1
-                    if off >= 0x2000:
-                        off -= 0x4000
-                if off not in (0, 1):
-                    targets.add(i + off - 2)
-            if i > n:
-                return None
-        return starts, targets
+        try:
+            instrs = decode(code, self.version, start)
+        except DecodeError:
+            return None
+        return [ins.start for ins in instrs], branch_targets(instrs)
 
     def _tail_peephole(self, routine_code, body_start):
         """Shrink the LAST instructions of a routine (ZILCH return idioms).
@@ -3986,12 +3637,9 @@ class ImprovedCodeGenerator:
                         # stale.
                         if len(rep) == 3:
                             _old_pos = prev + 2
-                            self._pending_placeholders = [
-                                (prev + 1 if r == _old_pos else r, x)
-                                for r, x in self._pending_placeholders]
-                            self._pending_vocab_positions = [
-                                (prev + 1 if r == _old_pos else r, x)
-                                for r, x in self._pending_vocab_positions]
+                            self._pending_marks = [
+                                (prev + 1 if r == _old_pos else r, k, x)
+                                for r, k, x in self._pending_marks]
                         del b[prev:]
                         b.extend(rep)
                         continue
@@ -4026,154 +3674,58 @@ class ImprovedCodeGenerator:
 
         Returns a list of instruction records, or None if the stream cannot be
         decoded exactly to len(code) (the optimiser then does nothing).
-        Each record: a/n (byte range), op, opnum, form, store_pos, branch_pos,
-        branch_len, branch_off, branch_on, jump_pos, jump_len, jump_off,
-        reads_stack, writes_stack, is_term, targets.
+        Each record: ins (the routine_ir Instruction), a/n (byte range), op,
+        opnum, form, store_pos, branch_pos, branch_len, branch_off, branch_on,
+        jump_pos, jump_len, jump_off, reads_stack, writes_stack, is_term,
+        targets.
         """
-        v = self.version
-        n = len(code)
-        i = start
+        try:
+            instrs = decode(code, self.version, start)
+        except DecodeError:
+            return None
         out = []
-        while i < n:
-            a = i
-            op = code[i]
-            rec = {'a': a, 'op': op, 'store_pos': None, 'branch_pos': None,
-                   'jump_pos': None, 'reads_stack': 0, 'writes_stack': False,
-                   'is_term': False, 'branch_len': 0, 'jump_len': 0,
+        for ins in instrs:
+            op, opnum, kind = ins.op, ins.opnum, ins.kind
+            rec = {'ins': ins, 'a': ins.start, 'n': ins.end, 'op': op,
+                   'opnum': opnum, 'store_pos': ins.store_pos, 'branch_pos': ins.branch_pos,
+                   'jump_pos': None, 'reads_stack': 0,
+                   'writes_stack': ins.store == 0, 'is_term': False,
+                   'branch_len': ins.branch_len, 'jump_len': 0,
                    'stack_indirect': False, 'stack_ops': []}
-            if op == 0xBE:
+            if kind == 'EXT':
                 return None
-            if op < 0x80:                       # long 2OP
-                opnum = op & 0x1F
-                if opnum == 0 or i + 2 >= n:
-                    return None
-                if (op & 0x40) and code[i + 1] == 0:
+            for t, value, pos in ins.operands:
+                if t == VARIABLE and value == 0:
                     rec['reads_stack'] += 1
-                    rec['stack_ops'].append(i + 1)
-                if (op & 0x20) and code[i + 2] == 0:
-                    rec['reads_stack'] += 1
-                    rec['stack_ops'].append(i + 2)
-                # indirect variable-number operand naming the stack
-                if opnum in (0x04, 0x05, 0x0D) and not (op & 0x40) and code[i + 1] == 0:
-                    rec['stack_indirect'] = True
-                i += 3
-                store = opnum in _2OP_STORE_OPS or (opnum == 0x19 and v >= 4)
-                branch = opnum in _2OP_BRANCH_OPS
-            elif op < 0xB0:                     # short 1OP
-                opnum = op & 0x0F
-                t = (op >> 4) & 3
-                i += 1
-                if t == 0:
-                    if i + 1 >= n:
-                        return None
-                    if opnum == 0x0C:
-                        rec['jump_pos'] = i
-                        rec['jump_len'] = 2
-                        o = (code[i] << 8) | code[i + 1]
-                        rec['jump_off'] = o - 0x10000 if o >= 0x8000 else o
-                    i += 2
-                else:
-                    if i >= n:
-                        return None
-                    if t == 2 and code[i] == 0:
-                        rec['reads_stack'] += 1
-                        rec['stack_ops'].append(i)
-                    if t == 1 and opnum in (0x05, 0x06, 0x0E) and code[i] == 0:
+                    rec['stack_ops'].append(pos)
+            # indirect variable-number operand naming the stack
+            if kind == '2OP':
+                if opnum in (0x04, 0x05, 0x0D):
+                    operands = ins.operands if op >= 0xC0 else ins.operands[:1]
+                    if any(t == SMALL and value == 0 for t, value, _pos in operands):
                         rec['stack_indirect'] = True
-                    if t == 1 and opnum == 0x0C:
-                        rec['jump_pos'] = i
-                        rec['jump_len'] = 1
-                        rec['jump_off'] = code[i]
-                    i += 1
-                store = opnum in (0x01, 0x02, 0x03, 0x04, 0x0E)                     or (opnum == 0x08 and v >= 4) or (opnum == 0x0F and v <= 4)
-                branch = opnum in _1OP_BRANCH_OPS
+            elif kind == '1OP':
+                t, value, pos = ins.operands[0]
+                if t == SMALL and opnum in (0x05, 0x06, 0x0E) and value == 0:
+                    rec['stack_indirect'] = True
+                if ins.is_jump:
+                    rec['jump_pos'] = pos
+                    rec['jump_len'] = 2 if t == 0 else 1
+                    rec['jump_off'] = ins.jump_off
                 if opnum in (0x0B, 0x0C):
                     rec['is_term'] = True
-            elif op < 0xC0:                     # short 0OP
-                opnum = op & 0x0F
-                i += 1
-                if opnum in (0x02, 0x03):
-                    while True:
-                        if i + 1 >= n:
-                            return None
-                        w = (code[i] << 8) | code[i + 1]
-                        i += 2
-                        if w & 0x8000:
-                            break
-                store = (opnum in (0x05, 0x06) and v == 4)
-                branch = (opnum in (0x05, 0x06) and v <= 3) or opnum in (0x0D, 0x0F)
+            elif kind == '0OP':
                 if opnum in (0x00, 0x01, 0x03, 0x07, 0x08, 0x0A):
                     rec['is_term'] = True
                 if opnum in (0x08, 0x09):       # ret_popped / pop
                     rec['reads_stack'] += 1
-            else:                               # variable form
-                opnum = op & 0x1F
-                var_of_2op = op < 0xE0
-                i += 1
-                ntypes = 2 if (not var_of_2op and v >= 4 and opnum in (0x0C, 0x1A)) else 1
-                if i + ntypes > n:
-                    return None
-                tbs = code[i:i + ntypes]
-                i += ntypes
-                done = False
-                for tb in tbs:
-                    for sh in (6, 4, 2, 0):
-                        t = (tb >> sh) & 3
-                        if t == 3:
-                            done = True
-                            break
-                        if t == 0:
-                            i += 2
-                        else:
-                            if i >= n:
-                                return None
-                            if t == 2 and code[i] == 0:
-                                rec['reads_stack'] += 1
-                                rec['stack_ops'].append(i)
-                            if (t == 1 and code[i] == 0 and not var_of_2op
-                                    and opnum == 0x09):
-                                rec['stack_indirect'] = True
-                            if (t == 1 and code[i] == 0 and var_of_2op
-                                    and opnum in (0x04, 0x05, 0x0D)):
-                                rec['stack_indirect'] = True
-                            i += 1
-                    if done:
-                        break
-                if not var_of_2op and opnum == 0x09:   # pull pops the stack
-                    rec['reads_stack'] += 1
-                if var_of_2op:
-                    store = opnum in _2OP_STORE_OPS or (opnum == 0x19 and v >= 4)
-                    branch = opnum in _2OP_BRANCH_OPS
-                else:
-                    store = opnum in (0x00, 0x07)                         or (v >= 4 and opnum in (0x0C, 0x16, 0x17))                         or (v >= 5 and opnum in (0x04, 0x18))
-                    branch = (v >= 4 and opnum == 0x17) or (v >= 5 and opnum == 0x1F)
-            if store:
-                if i >= n:
-                    return None
-                rec['store_pos'] = i
-                rec['writes_stack'] = (code[i] == 0)
-                i += 1
-            if branch:
-                if i >= n:
-                    return None
-                b = code[i]
-                rec['branch_pos'] = i
-                rec['branch_on'] = bool(b & 0x80)
-                i += 1
-                if b & 0x40:
-                    rec['branch_len'] = 1
-                    rec['branch_off'] = b & 0x3F
-                else:
-                    if i >= n:
-                        return None
-                    o = ((b & 0x3F) << 8) | code[i]
-                    i += 1
-                    rec['branch_len'] = 2
-                    rec['branch_off'] = o - 0x4000 if o >= 0x2000 else o
-            if i > n:
-                return None
-            rec['n'] = i
-            rec['opnum'] = opnum
+            elif opnum == 0x09:                 # pull pops the stack
+                if any(t == SMALL and value == 0 for t, value, _pos in ins.operands):
+                    rec['stack_indirect'] = True
+                rec['reads_stack'] += 1
+            if ins.branch_on is not None:
+                rec['branch_on'] = ins.branch_on
+                rec['branch_off'] = ins.branch_off
             out.append(rec)
         return out
 
@@ -4260,10 +3812,11 @@ class ImprovedCodeGenerator:
              always-taken -> `jump` (or rtrue/rfalse via offsets 1/0); the
              AND/OR short-circuit trampoline emits `jz #0 [always]`
           K  `jump` to the immediately following instruction -> drop
-        After deleting, every branch/jump offset is recomputed in its ORIGINAL
-        encoding width (deletions only shrink offsets, so a width never has to
-        grow); anything that no longer fits aborts the pass.  Recorded
-        placeholder positions are remapped through the same old->new map.
+        The surviving instructions are rebuilt as labelled routine_ir
+        Instructions; relax() gives every branch and jump the shortest form
+        that reaches its label (1-byte branches, small-constant jumps) and
+        encode() lays them out, so a rewrite never has to fit an old width.
+        Recorded placeholder positions are remapped through the old->new map.
         """
         if not _SZ3_PEEP or self.version > 4:
             return routine_code
@@ -4287,6 +3840,10 @@ class ImprovedCodeGenerator:
             # Z: constant-JZ folded into an unconditional JUMP; k -> target
             # address (old coordinates).  Rebuilt as a fresh 9C/8C jump below.
             jz2 = {}
+            # replacements that carry bytes of other instructions: k ->
+            # [(old start, length, offset in the replacement)], so the marks
+            # on those bytes follow them.
+            moved = {}
 
             # --- D: unreachable tail of a straight-line run -----------------
             if 'D' in _SZ3_PEEP:
@@ -4347,6 +3904,7 @@ class ImprovedCodeGenerator:
                                  or (0x80 <= t['op'] < 0xB0 and t['opnum'] == 0x0B))
                         if isret and tlen < (r['n'] - r['a']):
                             repl[k] = bytes(code[t['a']:t['n']])
+                            moved[k] = [(t['a'], tlen, 0)]
                             continue
                 # A "constant push" is either a real PUSH #c or the older
                 # `add #0,x -> sp` push idiom that some generators still emit.
@@ -4376,10 +3934,12 @@ class ImprovedCodeGenerator:
                             rb = bytes([0x9B, val])
                         else:
                             rb = bytes([0x8B, (val >> 8) & 0xFF, val & 0xFF])
+                            moved[k + 1] = [(r['a'] + 2, 2, 1)]
                         if len(rb) < (r['n'] - r['a']) + 1:
                             drop[k] = True
                             repl[k + 1] = rb
                             continue
+                        moved.pop(k + 1, None)
                     # --- P: provably-dead push ------------------------------
                     if ('P' in _SZ3_PEEP
                             and self._peep_stack_dead(instrs, k, byidx)):
@@ -4440,12 +4000,6 @@ class ImprovedCodeGenerator:
                     drop[k + 1] = True
                     continue
 
-            # --- N: re-narrow branch/jump encodings that now fit -----------
-            # Deletions only ever SHRINK offsets, so a 2-byte branch whose
-            # offset already fits the 1-byte form (and a large-constant JUMP
-            # whose offset fits the small-constant form) can be re-encoded one
-            # byte shorter.  Skipped in round 0 so an infeasible narrowing can
-            # never discard the round that carries the other rules' gains.
             # --- G: a VAR-form 2OP naming exactly two operands, each a small
             # constant or a variable, re-encodes one byte shorter as a long
             # 2OP (the type byte is dropped).  Some emit paths always pick the
@@ -4457,13 +4011,7 @@ class ImprovedCodeGenerator:
             # TELL position lands in, belt-and-suspenders.
             long2 = {}
             if 'G' in _SZ3_PEEP:
-                _ph = set()
-                for _rel, _idx in self._pending_placeholders:
-                    _ph.add(_rel)
-                for _rel, _idx in self._pending_tell_positions:
-                    _ph.add(_rel)
-                for _rel, _idx in self._pending_vocab_positions:
-                    _ph.add(_rel)
+                _ph = {_rel for _rel, _k, _v in self._pending_marks}
                 for k, r in enumerate(instrs):
                     if drop[k] or k in repl or k in jz2:
                         continue
@@ -4491,7 +4039,7 @@ class ImprovedCodeGenerator:
             # JUMP straight through to that jump's own target; the jump then
             # usually becomes unreachable and rule D removes it.
             retarget = {}
-            if 'A' in _SZ3_PEEP and _round > 0:
+            if 'A' in _SZ3_PEEP:
                 def _final(addr, depth=0):
                     tk = byidx.get(addr)
                     while (depth < 8 and tk is not None and not drop[tk]
@@ -4546,13 +4094,9 @@ class ImprovedCodeGenerator:
             # target; the jump is dropped (`?~cond:+jumpsize ; jump L` ->
             # `?cond:L`).  COND chains emit this shape when a clause body is
             # just a jump to the end.  Applied only when nothing else lands on
-            # the jump, and only when the re-encoded offset provably fits the
-            # branch's existing 1- or 2-byte form (deletions can only shrink
-            # forward distances, so the old-coordinate bound is conservative);
-            # gated to _round > 0 like A/N so an infeasible rewrite can never
-            # discard a round that carries the other rules' gains.
+            # the jump.
             flip = set()
-            if 'V' in _SZ3_PEEP and _round > 0:
+            if 'V' in _SZ3_PEEP:
                 for k, r in enumerate(instrs):
                     if (drop[k] or k in repl or k in jz2 or k in long2
                             or k in force_br or ('b', k) in retarget
@@ -4572,245 +4116,111 @@ class ImprovedCodeGenerator:
                     jt = j['jump_pos'] + j['jump_len'] + j['jump_off'] - 2
                     if not (jt in byidx or jt == len(code)):
                         continue
-                    est = jt - r['n'] + 2   # old-coordinate offset bound
-                    if r['branch_len'] == 1:
-                        if not (2 <= est <= 63):
-                            continue
-                    else:
-                        if not (-8000 <= est <= 8000):
-                            continue
                     flip.add(k)
                     retarget[('b', k)] = jt
                     drop[kj] = True
 
-            narrow_b = set()
-            narrow_j = set()
-            if 'N' in _SZ3_PEEP and _round > 0:
-                for k, r in enumerate(instrs):
-                    if (drop[k] or k in repl or k in force_br or k in jz2
-                            or k in long2 or k in flip):
-                        continue
-                    # Branch bytes / small-jump operands in the 0xF0-0xFF band
-                    # are safe now: every placeholder scan over code is gated
-                    # STRUCTURALLY (instruction-walker large-constant operand
-                    # positions), so a branch byte or a 1OP small-constant
-                    # operand can never be matched as a marker.  The old
-                    # `bb < 0xF0` / `off <= 0xEF` guards protected the retired
-                    # byte-blind scans only.
-                    if (r['branch_pos'] is not None and r['branch_len'] == 2
-                            and 2 <= r['branch_off'] <= 63
-                            and r['branch_pos'] + 2 == r['n']):
-                        narrow_b.add(k)
-                    elif (r['jump_pos'] is not None and r['jump_len'] == 2
-                          and 2 <= r['jump_off'] <= 0xFF
-                          and r['jump_pos'] + 2 == r['n']
-                          and r['jump_pos'] == r['a'] + 1):
-                        narrow_j.add(k)
-
-            if (not any(drop) and not repl and not narrow_b and not narrow_j
-                    and not force_br and not retarget and not jz2 and not long2):
-                return routine_code
-
-            # --- rebuild -------------------------------------------------------
-            new_len = [0] * nins
+            # --- rebuild through the symbolic form ----------------------------
+            v = self.version
+            new = [None] * nins
             for k, r in enumerate(instrs):
                 if drop[k]:
-                    new_len[k] = 0
+                    continue
+                if k in jz2:
+                    new[k] = decode(bytes([0x9C, 2]), v)[0]
+                elif k in long2:
+                    long_op, o1, o2 = long2[k]
+                    new[k] = decode(bytes([long_op, o1, o2])
+                                    + code[r['a'] + 4:r['n']], v)[0]
                 elif k in repl:
-                    new_len[k] = len(repl[k])
-                elif k in jz2:
-                    # 3-byte jz+1B branch -> 2-byte small jump;
-                    # 4-byte jz+2B branch -> 3-byte large jump
-                    new_len[k] = (r['n'] - r['a']) - 1
-                elif k in narrow_b or k in narrow_j or k in long2:
-                    new_len[k] = (r['n'] - r['a']) - 1
-                elif k in force_br:
-                    new_len[k] = (r['n'] - r['a']) - (r['branch_len'] - 1)
+                    new[k] = decode(repl[k], v)[0]
                 else:
-                    new_len[k] = r['n'] - r['a']
-            newaddr = [0] * (nins + 1)
-            pos = body_start
-            for k in range(nins):
-                newaddr[k] = pos
-                pos += new_len[k]
-            newaddr[nins] = pos
-            end_new = pos
+                    new[k] = r['ins']
 
-            def surviving(k):
+            def label_at(addr):
+                """The rebuilt instruction at old address `addr` (the next
+                survivor if it was dropped), or END."""
+                k = nins if addr == len(code) else byidx[addr]
                 while k < nins and drop[k]:
                     k += 1
-                return k
-
-            def new_target(addr):
-                if addr == len(code):
-                    return end_new
-                k = byidx.get(addr)
-                if k is None:
-                    return None
-                k = surviving(k)
-                return newaddr[k] if k <= nins else None
+                return END if k == nins else new[k]
 
-            pieces = []
-            ok = True
             for k, r in enumerate(instrs):
-                if drop[k]:
+                ins = new[k]
+                if ins is None:
                     continue
-                if k in repl and k not in repl_same:
-                    pieces.append(bytearray(repl[k]))
-                    continue
-                # layout-preserving rewrites still need their branch/jump
-                # offsets repaired below, so they take the normal path
-                nb = bytearray(repl[k] if k in repl_same else code[r['a']:r['n']])
-                base = newaddr[k]
                 if k in jz2:
-                    t = new_target(jz2[k])
-                    if t is None:
-                        ok = False
-                        break
-                    nlen = new_len[k]
-                    off = t - (base + nlen) + 2
-                    if nlen == 2:
-                        if not (2 <= off <= 0xFF):
-                            ok = False
-                            break
-                        pieces.append(bytearray([0x9C, off]))
-                    else:
-                        u = off & 0xFFFF
-                        pieces.append(bytearray([0x8C, (u >> 8) & 0xFF,
-                                                 u & 0xFF]))
+                    ins.label = label_at(jz2[k])
                     continue
-                if k in long2:
-                    long_op, o1, o2 = long2[k]
-                    # long prefix (3 bytes) + original tail (store byte and/or
-                    # branch bytes) which sat after the two operands at a+4
-                    nb = bytearray([long_op, o1, o2])
-                    nb.extend(code[r['a'] + 4:r['n']])
-                    if (r['branch_pos'] is not None
-                            and r['branch_off'] not in (0, 1)):
-                        t = new_target(r['n'] + r['branch_off'] - 2)
-                        if t is None:
-                            ok = False
-                            break
-                        after = base + new_len[k]
-                        off = t - after + 2
-                        bp = (r['branch_pos'] - r['a']) - 1
-                        if r['branch_len'] == 1:
-                            if not (2 <= off <= 63):
-                                ok = False
-                                break
-                            bb = (0x80 if r['branch_on'] else 0) | 0x40 | off
-                            nb[bp] = bb
-                        else:
-                            if not (-8192 <= off <= 8191) or off in (0, 1):
-                                ok = False
-                                break
-                            u = off & 0x3FFF
-                            nb[bp] = ((0x80 if r['branch_on'] else 0)
-                                      | ((u >> 8) & 0x3F))
-                            nb[bp + 1] = u & 0xFF
-                    pieces.append(nb)
+                if k in repl and k not in repl_same:
                     continue
+                old = r['ins'].label
+                addr = (len(code) if old is END
+                        else None if old is None else old.start)
+                addr = retarget.get(('b', k), retarget.get(('j', k), addr))
                 if k in force_br:
-                    bp = r['branch_pos'] - r['a']
-                    bb = (0x80 if r['branch_on'] else 0) | 0x40 | force_br[k]
-                    del nb[bp:]
-                    nb.append(bb)
-                    pieces.append(nb)
-                    continue
-                if k in narrow_j:
-                    t = new_target(r['jump_pos'] + r['jump_len'] + r['jump_off'] - 2)
-                    off = None if t is None else t - (base + 2) + 2
-                    if off is None or not (2 <= off <= 0xFF):
-                        ok = False
-                        break
-                    pieces.append(bytearray([0x9C, off]))
-                    continue
-                if k in narrow_b:
-                    t = new_target(r['n'] + r['branch_off'] - 2)
-                    bp = r['branch_pos'] - r['a']
-                    off = None if t is None else t - (base + bp + 1) + 2
-                    if off is None or not (2 <= off <= 63):
-                        ok = False
-                        break
-                    bb = (0x80 if r['branch_on'] else 0) | 0x40 | off
-                    del nb[bp:]
-                    nb.append(bb)
-                    pieces.append(nb)
-                    continue
-                if r['branch_pos'] is not None and r['branch_off'] not in (0, 1):
-                    t = new_target(retarget.get(('b', k), r['n'] + r['branch_off'] - 2))
-                    if t is None:
-                        ok = False
-                        break
-                    after = base + (r['n'] - r['a'])
-                    off = t - after + 2
-                    bp = r['branch_pos'] - r['a']
-                    _bon = r['branch_on'] != (k in flip)   # V inverts the sense
-                    if r['branch_len'] == 1:
-                        if not (2 <= off <= 63):
-                            ok = False
-                            break
-                        bb = (0x80 if _bon else 0) | 0x40 | off
-                        nb[bp] = bb
-                    else:
-                        if not (-8192 <= off <= 8191) or off in (0, 1):
-                            ok = False
-                            break
-                        u = off & 0x3FFF
-                        nb[bp] = (0x80 if _bon else 0) | ((u >> 8) & 0x3F)
-                        nb[bp + 1] = u & 0xFF
-                if r['jump_pos'] is not None:
-                    t = new_target(retarget.get(('j', k),
-                                                r['jump_pos'] + r['jump_len']
-                                                + r['jump_off'] - 2))
-                    if t is None:
-                        ok = False
-                        break
-                    after = base + (r['jump_pos'] - r['a']) + r['jump_len']
-                    off = t - after + 2
-                    jp = r['jump_pos'] - r['a']
-                    if r['jump_len'] == 1:
-                        if not (2 <= off <= 0xFF):
-                            ok = False
-                            break
-                        nb[jp] = off
-                    else:
-                        u = off & 0xFFFF
-                        nb[jp] = (u >> 8) & 0xFF
-                        nb[jp + 1] = u & 0xFF
-                pieces.append(nb)
-            if not ok:
+                    ins.branch_off = force_br[k]
+                    addr = None
+                if k in flip:
+                    ins.branch_on = not ins.branch_on
+                ins.label = None if addr is None else label_at(addr)
+
+            out = [ins for ins in new if ins is not None]
+            if not relax(out, body_start) and not (
+                    any(drop) or repl or force_br or retarget or jz2 or long2):
                 return routine_code
-
-            newcode = bytearray(code[:body_start])
-            for p in pieces:
-                newcode.extend(p)
-            if len(newcode) != end_new:
+            try:
+                newcode = bytearray(code[:body_start]) + encode(out, body_start)
+            except ValueError as e:
+                # encode() cannot lay it out (a branch beyond 2-byte range)
+                if self.compiler:
+                    self.compiler.log(f"peephole skipped in "
+                                      f"{self._current_routine}: {e}")
+                return routine_code
+            if newcode == code:
                 return routine_code
 
             # --- remap recorded placeholder positions --------------------------
+            # Only operand bytes carry placeholders, and they sit before any
+            # store or branch byte, so re-encoded widths never move them
+            # within their instruction.
+            newaddr = {}
+            pos = body_start
+            for ins in out:
+                newaddr[id(ins)] = pos
+                pos += ins.size
             posmap = {}
             for k, r in enumerate(instrs):
                 if (drop[k] or (k in repl and k not in repl_same)
-                        or k in narrow_j or k in jz2 or k in long2):
+                        or k in jz2 or k in long2 or r['jump_pos'] is not None):
                     continue
-                lim = ((r['branch_pos'] - r['a'])
-                       if (k in narrow_b or k in force_br) else (r['n'] - r['a']))
+                base = newaddr[id(new[k])]
+                lim = (r['n'] if r['branch_pos'] is None
+                       else r['branch_pos']) - r['a']
                 for off in range(lim):
-                    posmap[r['a'] + off] = newaddr[k] + off
-
-            def remap(lst):
-                res = []
-                for rel, idx in lst:
-                    if rel < body_start:
-                        res.append((rel, idx))
-                    elif rel in posmap:
-                        res.append((posmap[rel], idx))
-                return res
-
-            self._pending_placeholders = remap(self._pending_placeholders)
-            self._pending_tell_positions = remap(self._pending_tell_positions)
-            self._pending_vocab_positions = remap(self._pending_vocab_positions)
+                    posmap[r['a'] + off] = base + off
+            copies = {}
+            for k, spans in moved.items():
+                base = newaddr[id(new[k])]
+                for a, n, o in spans:
+                    for off in range(n):
+                        copies.setdefault(a + off, []).append(base + o + off)
+
+            # A mark that maps nowhere goes only with a dropped instruction;
+            # anywhere else its marker was rewritten without it.
+            starts = [r['a'] for r in instrs]
+            marks = []
+            for rel, kind, val in self._pending_marks:
+                if rel < body_start:
+                    marks.append((rel, kind, val))
+                    continue
+                if rel in posmap:
+                    marks.append((posmap[rel], kind, val))
+                elif rel not in copies and not drop[bisect_right(starts, rel) - 1]:
+                    self._error(f"peephole rewrite lost the {kind} mark "
+                                f"for {val!r}", fatal=True)
+                marks.extend((p, kind, val) for p in copies.get(rel, ()))
+            self._pending_marks = marks
             routine_code = newcode
         return routine_code
     def _inline_string_ok(self, text):
@@ -4842,29 +4252,16 @@ class ImprovedCodeGenerator:
         cache[key] = ok
         return ok
 
-    def _count_string_uses(self, program):
-        """Count every literal-string occurrence in the program AST."""
-        counts = {}
-        seen = set()
-        stack = [program]
-        while stack:
-            node = stack.pop()
-            if isinstance(node, (list, tuple)):
-                stack.extend(node)
-                continue
-            if not hasattr(node, '__dict__') or id(node) in seen:
-                continue
-            seen.add(id(node))
-            if isinstance(node, StringNode):
-                counts[node.value] = counts.get(node.value, 0) + 1
-                continue
-            for v in vars(node).values():
-                if isinstance(v, (list, tuple)) or hasattr(v, '__dict__'):
-                    stack.append(v)
-        return counts
-
     def generate_routine(self, routine: RoutineNode) -> bytes:
-        """Generate bytecode for a routine."""
+        """Generate bytecode for a routine and place it in the code section."""
+        return self._link_routine(self._compile_routine(routine))
+
+    def _compile_routine(self, routine: RoutineNode) -> RoutineObject:
+        """Compile a routine into a RoutineObject without placing it.
+
+        Nothing here reads or writes the code section, so the result does
+        not depend on where (or whether) the routines before it were placed.
+        """
         self._last_stmt_tail_cond = False
         self._current_routine = routine.name  # Track for warnings
 
@@ -4929,31 +4326,10 @@ class ImprovedCodeGenerator:
                     f"but only {7 - num_params} can ever be passed in V{self.version}"
                 )
 
-        # Align routine to proper boundary for packed addresses
-        # V1-3: Even addresses (divisible by 2)
-        # V4-7: Addresses divisible by 4
-        # V8: Addresses divisible by 8
-        if self.version <= 3:
-            alignment = 2
-        elif self.version <= 7:
-            alignment = 4
-        else:
-            alignment = 8
-
-        # Add padding if needed
-        current_offset = len(self.code)
-        _pre_pad_len = current_offset
-        if current_offset % alignment != 0:
-            padding_needed = alignment - (current_offset % alignment)
-            self.code.extend(bytes(padding_needed))  # Pad with zeros
-
-        routine_start = len(self.code)
         routine_code = bytearray()
         # Track current routine code buffer for placeholder position tracking
         self._current_routine_code = routine_code
-        self._pending_placeholders.clear()
-        self._pending_tell_positions.clear()
-        self._pending_vocab_positions.clear()
+        self._pending_marks.clear()
         self._current_stmt_vocab_emits = []
 
         # Trim AUX locals that are provably never referenced: each local slot
@@ -5080,6 +4456,9 @@ class ImprovedCodeGenerator:
                         routine_code.append(local_num & 0xFF)
                         routine_code.append((init_val >> 8) & 0xFF)
                         routine_code.append(init_val & 0xFF)
+                        # The constant may be a marker (a string CONSTANT).
+                        self._record_code_marks(
+                            bytes(routine_code[_span_start:]), _span_start)
                     if self.version <= 4:
                         _const_init_spans.append((_span_start, len(routine_code)))
                 elif isinstance(default_node, FormNode):
@@ -5087,23 +4466,8 @@ class ImprovedCodeGenerator:
                     # Generate the expression code (result ends up on stack)
                     self._current_stmt_vocab_emits = []
                     expr_code = self.generate_form(default_node)
-                    # Track any routine placeholders from the expression
-                    # (instruction-walk: only large-constant operands qualify)
-                    for i, placeholder_val in self._scan_placeholder_words(expr_code):
-                        # Offset is relative to routine_code start
-                        self._pending_placeholders.append(
-                            (len(routine_code) + i, placeholder_val)
-                        )
-                    # Vocab seq markers: record positions, canonicalize bytes.
-                    _voc_hits = self._scan_stmt_vocab_markers(expr_code)
-                    if _voc_hits:
-                        expr_code = bytearray(expr_code)
-                        for _vp, _vfi in _voc_hits:
-                            expr_code[_vp + 1] = _vfi & 0xFF
-                            self._pending_vocab_positions.append(
-                                (len(routine_code) + _vp, _vfi))
-                        expr_code = bytes(expr_code)
-                    routine_code.extend(expr_code)
+                    routine_code.extend(
+                        self._record_code_marks(expr_code, len(routine_code)))
                     # Store stack to local variable: STORE local_num, stack
                     # 2OP long form: bit7=0, bit6=first_type, bit5=second_type, bits4-0=opcode
                     # STORE (0x0D) with first=small (0), second=variable (1) = 0x2D
@@ -5129,7 +4493,6 @@ class ImprovedCodeGenerator:
         # Generate code for routine body
         for _stmt_i, stmt in enumerate(routine.body):
             # Clear per-statement tracking before generating
-            self._current_stmt_routine_offsets.clear()
             self._current_stmt_vocab_emits = []
             # A COND as the routine's LAST statement IS the routine's return value
             # (an implicit RET_POPPED follows). Generate it in value context so a
@@ -5144,58 +4507,14 @@ class ImprovedCodeGenerator:
                 stmt_code = self._gen_discard_stmt(stmt)
             else:
                 stmt_code = self.generate_statement(stmt)
-            stmt_offset = len(routine_code)
-
-            # Collect directly-tracked placeholder positions (from gen_routine_call)
-            tracked_positions = set()
-            for rel_offset, placeholder_val in self._current_stmt_routine_offsets:
-                self._pending_placeholders.append((stmt_offset + rel_offset, placeholder_val))
-                tracked_positions.add(rel_offset)
-
-            # Scan for additional placeholders not tracked by gen_routine_call
-            # (e.g., routine refs used as operand values in SET, etc.)
-            # Skip positions already tracked to avoid duplicates
-            # Instruction-walk discovery: only large-constant operand
-            # positions can hold a routine placeholder. The old byte-blind
-            # scan matched branch-byte/opcode pairs (f0 2e in TROLL-FCN) and
-            # got them overwritten with packed routine addresses.
-            for i, placeholder_val in self._scan_placeholder_words(stmt_code, tracked_positions):
-                self._pending_placeholders.append((stmt_offset + i, placeholder_val))
-
-            # Scan for TELL placeholder positions in statement code.
-            # STRUCTURAL discovery: only an 0x8D byte that STARTS a short-form
-            # print_paddr instruction (large-constant operand) can hold a TELL
-            # placeholder. The byte-blind scan matched a jz long-branch second
-            # byte 0x8D + call opcode 'e0 3f' as placeholder 0x3F and the
-            # resolver overwrote the call opcode (zork2 PKH-FCN).
-            try:
-                _pp_positions = _walk_print_paddr_positions(stmt_code, self.version)
-            except _PlaceholderScanDesync:
-                _pp_positions = [i for i in range(len(stmt_code) - 2)
-                                 if stmt_code[i] == 0x8D]
-            for i in _pp_positions:
-                if i + 2 < len(stmt_code):
-                    placeholder_val = (stmt_code[i + 1] << 8) | stmt_code[i + 2]
-                    if 0xE000 <= placeholder_val <= 0xFFFD:
-                        placeholder_idx = placeholder_val - 0xE000
-                        if placeholder_idx in self._tell_string_placeholders:
-                            self._pending_tell_positions.append((stmt_offset + i, placeholder_idx))
-
-            # Vocab seq markers (see _code_vocab_marker): record each marker's
-            # exact offset with its FULL index and rewrite the low byte to the
-            # canonical idx & 0xFF form (keeps the assembler's legacy scan a
-            # valid backup for indices < 256).
-            _voc_hits = self._scan_stmt_vocab_markers(stmt_code)
-            if _voc_hits:
-                stmt_code = bytearray(stmt_code)
-                for _vp, _vfi in _voc_hits:
-                    stmt_code[_vp + 1] = _vfi & 0xFF
-                    self._pending_vocab_positions.append(
-                        (stmt_offset + _vp, _vfi))
-            routine_code.extend(stmt_code)
+            # Markers are recorded statement by statement: a vocab marker's
+            # low byte is a sequence number within its statement.
+            routine_code.extend(
+                self._record_code_marks(stmt_code, len(routine_code)))
 
         # Add implicit return if the routine doesn't end with a terminating instruction
         # This ensures all routines have a valid return path
+        _tail_start = len(routine_code)
         if not self._ends_with_terminator(routine.body):
             # Check if last statement is a value that should be returned
             implicit_ret_generated = False
@@ -5256,17 +4575,7 @@ class ImprovedCodeGenerator:
                         # ,W?FOO as a routine tail returns the dictionary word
                         # address (vocab placeholder), not the parser_constants
                         # stub 0 (NUMBER? compiled to 'ret 0' otherwise).
-                        # This runs AFTER the statement loop, so record the
-                        # marker's position directly (no scan runs here) and
-                        # emit the canonical low-byte form.
                         _t, _v = self._get_operand_type_and_value(last_stmt)
-                        _emits = self._current_stmt_vocab_emits
-                        if (0xFB00 <= _v <= 0xFBFF
-                                and (_v & 0xFF) < len(_emits)):
-                            _vfi = _emits[_v & 0xFF]
-                            self._pending_vocab_positions.append(
-                                (len(routine_code) + 1, _vfi))
-                            _v = 0xFB00 | (_vfi & 0xFF)
                         routine_code.append(0x8B)  # RET large constant
                         routine_code.append((_v >> 8) & 0xFF)
                         routine_code.append(_v & 0xFF)
@@ -5319,7 +4628,7 @@ class ImprovedCodeGenerator:
                     implicit_ret_generated = True
                 elif isinstance(last_stmt, FormNode):
                     # Check if it's a void operation that doesn't push a value
-                    op_name = last_stmt.operator.value.upper() if isinstance(last_stmt.operator, AtomNode) else ''
+                    op_name = last_stmt.operator.upper if isinstance(last_stmt.operator, AtomNode) else ''
                     void_ops = {
                         'PRINTI', 'PRINT', 'PRINTR', 'PRINTC', 'PRINTB', 'PRINTD',
                         'PRINTN', 'PRINTT', 'PRINTU', 'CRLF', 'TELL',
@@ -5445,6 +4754,9 @@ class ImprovedCodeGenerator:
                     # 0x9B = 10 01 1011 = 1OP short with small constant, opcode 0x0B
                     routine_code.append(0x9B)  # RET small constant
                     routine_code.append(0x00)  # Return value 0
+        # A returned constant may be a marker.
+        routine_code[_tail_start:] = self._record_code_marks(
+            bytes(routine_code[_tail_start:]), _tail_start)
 
         # Patch routine header if PROG/BIND added more locals
         if hasattr(self, 'max_local_slot') and self.max_local_slot > num_locals:
@@ -5464,36 +4776,13 @@ class ImprovedCodeGenerator:
                     routine_code.insert(insert_pos, 0x00)
                     insert_pos += 2
 
-                # Adjust pending placeholder positions by the number of bytes inserted
+                # Adjust pending marker positions by the number of bytes inserted
                 # All positions after insert_pos (which was right after the original header)
                 # need to be shifted forward
                 header_end = 1 + 2 * num_locals
-                adjusted = []
-                for rel_offset, placeholder_idx in self._pending_placeholders:
-                    # Placeholders after the insertion point need adjustment
-                    if rel_offset >= header_end:
-                        adjusted.append((rel_offset + bytes_inserted, placeholder_idx))
-                    else:
-                        adjusted.append((rel_offset, placeholder_idx))
-                self._pending_placeholders = adjusted
-
-                # Also adjust pending TELL placeholder positions
-                adjusted_tell = []
-                for rel_offset, placeholder_idx in self._pending_tell_positions:
-                    if rel_offset >= header_end:
-                        adjusted_tell.append((rel_offset + bytes_inserted, placeholder_idx))
-                    else:
-                        adjusted_tell.append((rel_offset, placeholder_idx))
-                self._pending_tell_positions = adjusted_tell
-
-                # And pending vocab positions
-                adjusted_voc = []
-                for rel_offset, placeholder_idx in self._pending_vocab_positions:
-                    if rel_offset >= header_end:
-                        adjusted_voc.append((rel_offset + bytes_inserted, placeholder_idx))
-                    else:
-                        adjusted_voc.append((rel_offset, placeholder_idx))
-                self._pending_vocab_positions = adjusted_voc
+                self._pending_marks = [
+                    (rel + bytes_inserted if rel >= header_end else rel, kind, val)
+                    for rel, kind, val in self._pending_marks]
 
         # Pop routine loop context and patch AGAIN placeholders
         _has_routine_again = False
@@ -5546,12 +4835,9 @@ class ImprovedCodeGenerator:
                         break
                 return off - d
 
-            self._pending_placeholders = [
-                (_shift_off(o), pi) for o, pi in self._pending_placeholders]
-            self._pending_tell_positions = [
-                (_shift_off(o), pi) for o, pi in self._pending_tell_positions]
-            self._pending_vocab_positions = [
-                (_shift_off(o), pi) for o, pi in self._pending_vocab_positions]
+            self._pending_marks = [
+                (_shift_off(o), k, v) for o, k, v in self._pending_marks
+                if not any(_s <= o < _e for _s, _e in _cuts)]
 
         # ZILCH-style routine-tail return idioms (PRINTR / RET-of-pushed-const).
         # Runs after every in-routine placeholder patch, only truncates the end,
@@ -5563,6 +4849,40 @@ class ImprovedCodeGenerator:
         except Exception:
             pass
 
+        # Unused routine-level locals (ZIL0210), warned when the routine is
+        # placed.  Trimmed AUX locals were dropped from the header precisely
+        # because they are never referenced, so they still warrant it.
+        unused = []
+        if hasattr(self, 'routine_level_locals'):
+            unused = [name for name in self.routine_level_locals
+                      if name not in self.used_locals
+                      and name not in self.locals_with_side_effect_init]
+        unused.extend(_trimmed_locals)
+        marks = list(self._pending_marks)
+        self._pending_marks.clear()
+        return RoutineObject(routine.name, routine_code, marks, unused)
+
+    def _link_routine(self, obj: RoutineObject) -> bytes:
+        """Place a compiled routine at the end of the code section."""
+        # Align routine to proper boundary for packed addresses
+        # V1-3: Even addresses (divisible by 2)
+        # V4-7: Addresses divisible by 4
+        # V8: Addresses divisible by 8
+        if self.version <= 3:
+            alignment = 2
+        elif self.version <= 7:
+            alignment = 4
+        else:
+            alignment = 8
+
+        # Add padding if needed
+        current_offset = len(self.code)
+        _pre_pad_len = current_offset
+        if current_offset % alignment != 0:
+            padding_needed = alignment - (current_offset % alignment)
+            self.code.extend(bytes(padding_needed))  # Pad with zeros
+        routine_start = len(self.code)
+
         # Identical-routine folding: two routines whose finished bodies are
         # byte-identical AND whose recorded fixup patterns (placeholder /
         # TELL / vocab positions and indices) are identical necessarily
@@ -5573,65 +4893,28 @@ class ImprovedCodeGenerator:
         # self.routines[name] and resolves to the shared address.
         if not hasattr(self, '_routine_body_dedup'):
             self._routine_body_dedup = {}
-        _dedup_key = (bytes(routine_code),
-                      tuple(self._pending_placeholders),
-                      tuple(self._pending_tell_positions),
-                      tuple(self._pending_vocab_positions))
+        _dedup_key = (bytes(obj.code), tuple(sorted(obj.marks)))
         _shared_start = self._routine_body_dedup.get(_dedup_key)
         _value_refs = getattr(self, '_value_position_names', None)
         _foldable = (_value_refs is not None
-                     and routine.name.upper() not in _value_refs)
+                     and obj.name.upper() not in _value_refs)
         if _shared_start is not None and self.routines and _foldable:
-            # Rewind the alignment padding added for this routine; nothing
-            # else touched self.code since.
+            # Rewind the alignment padding added for this routine.
             del self.code[_pre_pad_len:]
-            self.routines[routine.name] = _shared_start
-            self._pending_placeholders.clear()
-            self._pending_tell_positions.clear()
-            self._pending_vocab_positions.clear()
-            if hasattr(self, 'routine_level_locals') and self.compiler is not None:
-                for local_name in self.routine_level_locals:
-                    if (local_name not in self.used_locals and
-                            local_name not in self.locals_with_side_effect_init):
-                        self.compiler.warn("ZIL0210", f"local variable '{local_name}' is never used")
-                for local_name in _trimmed_locals:
-                    self.compiler.warn("ZIL0210", f"local variable '{local_name}' is never used")
-            return bytes(routine_code)
-        self._routine_body_dedup[_dedup_key] = routine_start
-
-        # Store routine address for later reference
-        self.routines[routine.name] = routine_start
-
-        # Adjust pending placeholder positions to absolute offsets
-        # and move them to the final positions list
-        base_offset = len(self.code)
-        for rel_offset, placeholder_idx in self._pending_placeholders:
-            self._placeholder_positions.append((base_offset + rel_offset, placeholder_idx))
-        self._pending_placeholders.clear()
-
-        # Adjust pending TELL placeholder positions to absolute offsets
-        for rel_offset, placeholder_idx in self._pending_tell_positions:
-            self._tell_placeholder_positions.append((base_offset + rel_offset, placeholder_idx))
-        self._pending_tell_positions.clear()
-
-        # Adjust pending vocab positions to absolute offsets
-        for rel_offset, placeholder_idx in self._pending_vocab_positions:
-            self._vocab_placeholder_positions.append((base_offset + rel_offset, placeholder_idx))
-        self._pending_vocab_positions.clear()
-
-        # Check for unused routine-level locals (ZIL0210).  Trimmed AUX
-        # locals were dropped from the header precisely because they are
-        # never referenced, so they still warrant the warning.
-        if hasattr(self, 'routine_level_locals') and self.compiler is not None:
-            for local_name in self.routine_level_locals:
-                if (local_name not in self.used_locals and
-                        local_name not in self.locals_with_side_effect_init):
-                    self.compiler.warn("ZIL0210", f"local variable '{local_name}' is never used")
-            for local_name in _trimmed_locals:
+            self.routines[obj.name] = _shared_start
+        else:
+            self._routine_body_dedup[_dedup_key] = routine_start
+            # Store routine address for later reference
+            self.routines[obj.name] = routine_start
+            # Marker positions become absolute offsets in the code section
+            for rel_offset, kind, val in obj.marks:
+                self._code_marks.append((routine_start + rel_offset, kind, val))
+            self.code.extend(obj.code)
+
+        if self.compiler is not None:
+            for local_name in obj.unused_locals:
                 self.compiler.warn("ZIL0210", f"local variable '{local_name}' is never used")
-
-        self.code.extend(routine_code)
-        return bytes(routine_code)
+        return bytes(obj.code)
 
     def _ends_with_terminator(self, body: List[ASTNode]) -> bool:
         """Check if a routine body ends with a terminating instruction."""
@@ -5641,7 +4924,7 @@ class ImprovedCodeGenerator:
         last_stmt = body[-1]
 
         if isinstance(last_stmt, FormNode) and isinstance(last_stmt.operator, AtomNode):
-            op_name = last_stmt.operator.value.upper()
+            op_name = last_stmt.operator.upper
             # These operations terminate the routine or loop
             if op_name in ('RTRUE', 'RFALSE', 'RETURN', 'QUIT', 'RESTART', 'AGAIN', 'RFATAL'):
                 return True
@@ -5658,13 +4941,13 @@ class ImprovedCodeGenerator:
         """<TELL "text" CR> / <PROG () ... <PRINTI "text"> <CRLF>>?"""
         if not (isinstance(action, FormNode) and isinstance(action.operator, AtomNode)):
             return False
-        _op = action.operator.value.upper()
+        _op = action.operator.upper
         if _op in ('PROG', 'BIND'):
             return self._prog_tail_is_print_crlf(action)
         if _op in ('TELL', 'PRINTI', 'PRINT'):
             ops = action.operands
             return (len(ops) >= 2 and isinstance(ops[-1], AtomNode)
-                    and ops[-1].value.upper() in ('CR', 'CRLF')
+                    and ops[-1].upper in ('CR', 'CRLF')
                     and isinstance(ops[-2], StringNode))
         return False
 
@@ -5674,11 +4957,11 @@ class ImprovedCodeGenerator:
             return False
         last, prev = body[-1], body[-2]
         if not (isinstance(last, FormNode) and isinstance(last.operator, AtomNode)
-                and last.operator.value.upper() in ('CRLF', 'CR')
+                and last.operator.upper in ('CRLF', 'CR')
                 and not last.operands):
             return False
         return (isinstance(prev, FormNode) and isinstance(prev.operator, AtomNode)
-                and prev.operator.value.upper() in ('PRINTI', 'TELL', 'PRINT')
+                and prev.operator.upper in ('PRINTI', 'TELL', 'PRINT')
                 and len(prev.operands) == 1
                 and isinstance(prev.operands[0], StringNode))
 
@@ -5688,7 +4971,7 @@ class ImprovedCodeGenerator:
         This is used to determine if PROG leaves a value on the stack that should
         be returned with RET_POPPED instead of RET 1.
         """
-        op_name = form.operator.value.upper() if isinstance(form.operator, AtomNode) else ''
+        op_name = form.operator.upper if isinstance(form.operator, AtomNode) else ''
         if op_name not in ('PROG', 'BIND', 'REPEAT',
                            'MAP-CONTENTS', 'MAP-DIRECTIONS'):
             # (The MAP loop forms matter too: a tail <MAP-CONTENTS ... (END
@@ -5717,7 +5000,7 @@ class ImprovedCodeGenerator:
                 if self._body_contains_return(stmt):
                     return True
             elif isinstance(stmt, FormNode) and isinstance(stmt.operator, AtomNode):
-                op_name = stmt.operator.value.upper()
+                op_name = stmt.operator.upper
                 if op_name == 'RETURN':
                     return True
                 # Check inside nested PROG/BIND/REPEAT
@@ -5828,705 +5111,76 @@ class ImprovedCodeGenerator:
         if op_name in _Z_PRIM_ALIASES:
             op_name = _Z_PRIM_ALIASES[op_name]
 
-        # Control flow
-        if op_name == 'RTRUE':
-            if form.operands:
-                raise ValueError("RTRUE takes no operands")
-            # In GO routine, RTRUE should become QUIT (returning from GO is undefined)
-            if self._current_routine == "GO":
-                return self.gen_quit()
-            return self.gen_rtrue()
-        elif op_name == 'RFALSE':
-            if form.operands:
-                raise ValueError("RFALSE takes no operands")
-            # In GO routine, RFALSE should become QUIT (returning from GO is undefined)
-            if self._current_routine == "GO":
-                return self.gen_quit()
-            return self.gen_rfalse()
-        elif op_name == '<>':
-            # <> evaluates to FALSE (0) but does NOT return from routine
-            # When used as a statement, it's a no-op
-            # When used as an expression/value, the caller handles it via _get_operand_type_and_value
-            if form.operands:
-                raise ValueError("<> takes no operands")
-            return b''  # No-op when used as a statement
-        elif op_name == 'RFATAL':
-            if form.operands:
-                raise ValueError("RFATAL takes no operands")
-            # In GO routine, RFATAL should become QUIT (returning from GO is undefined)
-            if self._current_routine == "GO":
-                return self.gen_quit()
-            return self.gen_rfatal()
-        elif op_name == 'RETURN':
-            # Let gen_return handle block logic first
-            # GO routine conversion to QUIT happens inside gen_return if needed
-            return self.gen_return(form.operands)
-        elif op_name == 'QUIT':
-            if form.operands:
-                raise ValueError("QUIT takes no operands")
-            return self.gen_quit()
-        elif op_name == 'AGAIN':
-            return self.gen_again(form.operands)
-        elif op_name == 'GOTO':
-            return self.gen_goto(form.operands)
-        elif op_name == 'PROG':
-            return self.gen_prog(form.operands)
-        elif op_name == 'REPEAT':
-            return self.gen_repeat(form.operands)
-        elif op_name == 'BIND':
-            return self.gen_bind(form.operands)
-        elif op_name == 'DO':
-            return self.gen_do(form.operands)
-        elif op_name == 'MAP-CONTENTS':
-            return self.gen_map_contents(form.operands)
-        elif op_name == 'MAP-DIRECTIONS':
-            return self.gen_map_directions(form.operands)
-
-        # Output
-        elif op_name == 'TELL':
-            return self.gen_tell(form.operands)
-        elif op_name == 'PRINT':
-            if not form.operands:
-                raise ValueError("PRINT requires at least 1 operand")
-            return self.gen_tell(form.operands)
-        elif op_name == 'CRLF':
-            if form.operands:
-                raise ValueError("CRLF takes no operands")
-            return self.gen_newline()
-        elif op_name == 'PRINTN' or op_name == 'PRINT-NUM':
-            return self.gen_print_num(form.operands)
-        elif op_name == 'PRINTD':
-            if len(form.operands) != 1:
-                raise ValueError("PRINTD requires exactly 1 operand")
-            return self.gen_printobj(form.operands)
-        elif op_name == 'PRINTC' or op_name == 'PRINT-CHAR':
-            return self.gen_print_char(form.operands)
-        elif op_name == 'PRINTB':
-            return self.gen_printb(form.operands)
-        elif op_name == 'PRINTI':
-            if len(form.operands) != 1:
-                raise ValueError("PRINTI requires exactly 1 operand")
-            return self.gen_printi(form.operands)
-        elif op_name == 'PRINTADDR':
-            return self.gen_printaddr(form.operands)
-        elif op_name == 'STRING':
-            return self.gen_string(form.operands)
-
-        # Variables
-        elif op_name == 'SET':
-            return self.gen_set(form.operands, is_global=False)
-        elif op_name == 'SETG':
-            return self.gen_set(form.operands, is_global=True)
-        elif op_name == 'INC':
-            return self.gen_inc(form.operands)
-        elif op_name == 'DEC':
-            return self.gen_dec(form.operands)
-        elif op_name == 'VALUE':
-            return self.gen_value(form.operands)
-        elif op_name == 'LVAL':
-            return self.gen_lval(form.operands)
-        elif op_name == 'GVAL':
-            return self.gen_gval(form.operands)
-
-        # Arithmetic
-        elif op_name in ('+', 'ADD'):
-            return self.gen_add(form.operands)
-        elif op_name in ('-', 'SUB'):
-            return self.gen_sub(form.operands)
-        elif op_name in ('*', 'MUL'):
-            return self.gen_mul(form.operands)
-        elif op_name in ('/', 'DIV'):
-            return self.gen_div(form.operands)
-        elif op_name == 'MOD':
-            return self.gen_mod(form.operands)
-        elif op_name == '1+':
-            return self.gen_add1(form.operands)
-        elif op_name == '1-':
-            return self.gen_sub1(form.operands)
-        elif op_name == 'MIN':
-            return self.gen_min(form.operands)
-        elif op_name == 'MAX':
-            return self.gen_max(form.operands)
-        elif op_name == 'ABS':
-            return self.gen_abs(form.operands)
-        elif op_name == 'SOUND':
-            return self.gen_sound(form.operands)
-        elif op_name == 'CLEAR':
-            return self.gen_clear(form.operands)
-        elif op_name == 'ERASE':
-            return self.gen_erase(form.operands)
-        elif op_name == 'SPLIT':
-            return self.gen_split(form.operands)
-        elif op_name == 'SCREEN':
-            return self.gen_screen(form.operands)
-        elif op_name == 'CURSET':
-            return self.gen_curset(form.operands)
-        elif op_name == 'CURGET':
-            return self.gen_get_cursor(form.operands)
-        elif op_name == 'HLIGHT':
-            return self.gen_hlight(form.operands)
-        elif op_name == 'COLOR':
-            return self.gen_color(form.operands)
-        elif op_name == 'FONT':
-            return self.gen_font(form.operands)
-        elif op_name == 'INPUT':
-            return self.gen_input_readchar(form.operands)
-        elif op_name == 'BUFOUT':
-            return self.gen_bufout(form.operands)
-        elif op_name == 'UXOR':
-            return self.gen_uxor(form.operands)
-        elif op_name == 'USL':
-            return self.gen_usl(form.operands)
-        elif op_name == 'DIROUT':
-            return self.gen_dirout(form.operands)
-        elif op_name == 'DIRIN':
-            return self.gen_input_stream(form.operands)
-        elif op_name == 'PRINTOBJ':
-            return self.gen_printobj(form.operands)
-        elif op_name == 'READ':
-            return self.gen_read(form.operands)
-        elif op_name == 'MAPF':
-            return self.gen_mapf(form.operands)
-        elif op_name == 'MAPT':
-            return self.gen_mapt(form.operands)
-        elif op_name == 'MAPR':
-            return self.gen_mapr(form.operands)
-
-        # Type system (MDL constructs)
-        elif op_name == 'NEWTYPE':
-            return self.gen_newtype(form.operands)
-        elif op_name == 'CHTYPE':
-            return self.gen_chtype(form.operands)
-        elif op_name == 'PRIMTYPE':
-            return self.gen_primtype(form.operands)
-
-        # Comparison
-        elif op_name in ('=', 'EQUAL?', '==?', '=?'):
-            return self.gen_equal(form.operands)
-        elif op_name in ('L?', '<', 'LESS?'):
-            return self.gen_less(form.operands)
-        elif op_name in ('G?', '>', 'GRTR?'):
-            return self.gen_greater(form.operands)
-        elif op_name in ('ZERO?', '0?'):
-            return self.gen_zero_test(form.operands)
-        elif op_name == '1?':
-            return self.gen_one(form.operands)
-        elif op_name == 'ASSIGNED?':
-            return self.gen_assigned(form.operands)
-        elif op_name == 'NOT?':
-            return self.gen_not_predicate(form.operands)
-        elif op_name == 'TRUE?' or op_name == 'T?':
-            return self.gen_true_predicate(form.operands)
-        elif op_name == 'FALSE?' or op_name == 'F?':
-            return self.gen_false_predicate(form.operands)
-        elif op_name == 'IGRTR?':
-            return self.gen_igrtr(form.operands)
-        elif op_name == 'DLESS?':
-            return self.gen_dless(form.operands)
-        elif op_name == 'CHECKU':
-            return self.gen_checku(form.operands)
-        elif op_name == 'LEXV':
-            return self.gen_lexv(form.operands)
-        elif op_name in ('G=?', 'GEQ?', '>='):
-            return self.gen_grtr_or_equal(form.operands)
-        elif op_name in ('L=?', 'LEQ?', '<='):
-            return self.gen_less_or_equal(form.operands)
-        elif op_name in ('N=?', 'N==?', 'NEQUAL?', '!='):
-            return self.gen_nequal(form.operands)
-        elif op_name == 'ZGET':
-            return self.gen_zget(form.operands)
-        elif op_name == 'ZPUT':
-            return self.gen_zput(form.operands)
-        elif op_name == 'ORIGINAL?':
-            return self.gen_original(form.operands)
-        elif op_name == 'TEST-BIT':
-            return self.gen_test_bit(form.operands)
-        elif op_name == 'WINSIZE':
-            return self.gen_winsize(form.operands)
-        elif op_name == 'COLOR':
-            return self.gen_color(form.operands)
-        elif op_name == 'FONT':
-            return self.gen_font(form.operands)
-        elif op_name == 'FIRST':
-            return self.gen_first(form.operands)
-        elif op_name == 'MEMBER':
-            return self.gen_member(form.operands)
-        elif op_name == 'MEMQ':
-            return self.gen_memq(form.operands)
-        elif op_name == 'GETB2':
-            return self.gen_getb2(form.operands)
-        elif op_name == 'PUTB2':
-            return self.gen_putb2(form.operands)
-        elif op_name == 'GETW2':
-            return self.gen_getw2(form.operands)
-        elif op_name == 'PUTW2':
-            return self.gen_putw2(form.operands)
-        elif op_name == 'LOWCORE':
-            return self.gen_lowcore(form.operands)
-        elif op_name == 'LOWCORE-TABLE':
-            return self.gen_lowcore_table(form.operands)
-        elif op_name == 'SCREEN-HEIGHT':
-            return self.gen_screen_height(form.operands)
-        elif op_name == 'SCREEN-WIDTH':
-            return self.gen_screen_width(form.operands)
-        elif op_name == 'ASR':
-            return self.gen_asr(form.operands)
-        elif op_name == 'NEW-LINE':
-            return self.gen_new_line(form.operands)
-        elif op_name == 'CATCH':
-            return self.gen_catch(form.operands)
-        elif op_name == 'THROW':
-            return self.gen_throw(form.operands)
-        elif op_name == 'SPACES':
-            return self.gen_spaces(form.operands)
-        elif op_name == 'BACK':
-            return self.gen_back(form.operands)
-        elif op_name == 'DISPLAY':
-            return self.gen_display(form.operands)
-        elif op_name == 'SCORE':
-            return self.gen_score(form.operands)
-        elif op_name == 'CHRSET':
-            return self.gen_chrset(form.operands)
-        elif op_name == 'MARGIN':
-            return self.gen_margin(form.operands)
-        elif op_name == 'WINGET':
-            return self.gen_winget(form.operands)
-        elif op_name == 'WINPUT':
-            return self.gen_winput(form.operands)
-        elif op_name == 'WINATTR':
-            return self.gen_winattr(form.operands)
-        elif op_name == 'WINPOS':
-            return self.gen_winpos(form.operands)
-        elif op_name == 'SET-COLOUR':
-            return self.gen_set_colour(form.operands)
-        elif op_name == 'SET-TRUE-COLOUR':
-            return self.gen_set_true_colour(form.operands)
-        elif op_name == 'ERASE-WINDOW':
-            return self.gen_erase_window(form.operands)
-        elif op_name == 'SPLIT-WINDOW':
-            return self.gen_split_window(form.operands)
-        elif op_name == 'SET-WINDOW':
-            return self.gen_set_window(form.operands)
-        elif op_name == 'SET-FONT':
-            return self.gen_font(form.operands)
-        elif op_name == 'BUFFER-MODE':
-            return self.gen_bufout(form.operands)
-        elif op_name == 'SET-CURSOR':
-            return self.gen_curset(form.operands)
-        elif op_name == 'GET-CURSOR':
-            return self.gen_get_cursor(form.operands)
-        elif op_name == 'SET-TEXT-STYLE':
-            return self.gen_hlight(form.operands)
-        elif op_name == 'ERASE-LINE':
-            return self.gen_erase_line(form.operands)
-        elif op_name == 'MOVE-WINDOW':
-            return self.gen_move_window(form.operands)
-        elif op_name == 'WINDOW-SIZE':
-            return self.gen_window_size(form.operands)
-        elif op_name == 'WINDOW-STYLE':
-            return self.gen_winattr(form.operands)
-        elif op_name == 'SCROLL-WINDOW' or op_name == 'SCROLL':
-            return self.gen_scroll_window(form.operands)
-        elif op_name == 'PICINF':
-            return self.gen_picinf(form.operands)
-        elif op_name == 'PICSET':
-            return self.gen_picset(form.operands)
-        elif op_name == 'MOUSE-INFO':
-            return self.gen_mouse_info(form.operands)
-        elif op_name == 'MOUSE-LIMIT':
-            return self.gen_mouse_limit(form.operands)
-        elif op_name == 'MENU':
-            return self.gen_make_menu(form.operands)
-        elif op_name == 'PRINTF':
-            return self.gen_print_form(form.operands)
-        elif op_name == 'TYPE?':
-            return self.gen_type(form.operands)
-        elif op_name == 'PRINTTYPE':
-            return self.gen_printtype(form.operands)
-        elif op_name == 'PRINTT':
-            # Check if PRINTT is a user-defined routine (common in Infocom games to print "THE")
-            if form.operator.value in self.routines:
-                return self.gen_routine_call(form.operator.value, form.operands)
-            if self.version < 5:
-                raise ValueError("PRINTT requires V5 or later")
-            if len(form.operands) < 2 or len(form.operands) > 4:
-                raise ValueError("PRINTT requires 2-4 operands")
-            return self.gen_printt(form.operands)
-        elif op_name == 'PRINTR':
-            if len(form.operands) != 1:
-                raise ValueError("PRINTR requires exactly 1 operand")
-            if not isinstance(form.operands[0], StringNode):
-                raise ValueError("PRINTR requires a string operand")
-            return self.gen_printr(form.operands)
-        elif op_name == 'FSTACK':
-            return self.gen_fstack(form.operands)
-        elif op_name == 'RSTACK':
-            return self.gen_rstack(form.operands)
-        elif op_name == 'IFFLAG':
-            return self.gen_ifflag(form.operands)
-        elif op_name == 'LOG-SHIFT':
-            return self.gen_log_shift(form.operands)
-        elif op_name in ('XOR', 'XORB'):
-            return self.gen_xor(form.operands)
-        elif op_name == 'MUSIC':
-            return self.gen_music(form.operands)
-        elif op_name == 'VOLUME':
-            return self.gen_volume(form.operands)
-        elif op_name == 'COPYT':
-            return self.gen_copyt(form.operands)
-        elif op_name == 'COPY-TABLE':
-            return self.gen_copyt(form.operands)
-        elif op_name == 'ZERO':
-            return self.gen_zero(form.operands)
-        elif op_name == 'ZERO-TABLE':
-            return self.gen_zero(form.operands)
-        elif op_name == 'SHIFT':
-            return self.gen_shift(form.operands)
-        elif op_name in ('ASH', 'ASHIFT', 'ART-SHIFT'):
-            return self.gen_art_shift(form.operands)
-        elif op_name == 'LSH':
-            return self.gen_shift(form.operands)
-
-        # V5+ Unicode operations
-        elif op_name == 'PRINT-UNICODE':
-            return self.gen_print_unicode(form.operands)
-        elif op_name == 'PRINTU':
-            if self.version < 5:
-                raise ValueError("PRINTU requires V5 or later")
-            if len(form.operands) != 1:
-                raise ValueError("PRINTU requires exactly 1 operand")
-            return self.gen_print_unicode(form.operands)
-        elif op_name == 'CHECK-UNICODE':
-            return self.gen_check_unicode(form.operands)
-
-        # Table searching
-        elif op_name == 'INTBL?':
-            return self.gen_intbl(form.operands)
-        elif op_name == 'IN-TABLE?':
-            return self.gen_intbl(form.operands)
-        elif op_name == 'SCAN-TABLE':
-            return self.gen_intbl(form.operands)
-        elif op_name == 'CHECK':
-            return self.gen_check(form.operands)
-
-        # Picture operations (V6)
-        elif op_name == 'DRAW-PICTURE':
-            return self.gen_draw_picture(form.operands)
-        elif op_name == 'ERASE-PICTURE':
-            return self.gen_erase_picture(form.operands)
-        elif op_name == 'PICTURE-TABLE':
-            return self.gen_picture_table(form.operands)
-
-        # Logical
-        elif op_name == 'AND':
-            return self.gen_and(form.operands)
-        elif op_name == 'OR':
-            return self.gen_or(form.operands)
-        elif op_name == 'AND?':
-            return self.gen_and_pred(form.operands)
-        elif op_name == 'OR?':
-            return self.gen_or_pred(form.operands)
-        elif op_name == 'NOT':
-            return self.gen_not(form.operands)
-        elif op_name == 'BCOM':
-            # BCOM is bitwise complement
-            return self.gen_bcom(form.operands)
-        elif op_name in ('BAND', 'ANDB'):
-            return self.gen_band(form.operands)
-        elif op_name in ('BOR', 'ORB'):
-            return self.gen_bor(form.operands)
-        elif op_name == 'BTST':
-            return self.gen_btst(form.operands)
-        elif op_name == 'LSH':
-            return self.gen_lsh(form.operands)
-        elif op_name == 'RSH':
-            return self.gen_rsh(form.operands)
-
-        # Objects
-        elif op_name == 'FSET':
-            return self.gen_fset(form.operands)
-        elif op_name == 'FCLEAR':
-            return self.gen_fclear(form.operands)
-        elif op_name == 'FSET?':
-            return self.gen_fset_test(form.operands)
-        elif op_name == 'MOVE':
-            return self.gen_move(form.operands)
-        elif op_name == 'REMOVE':
-            return self.gen_remove(form.operands)
-        elif op_name == 'LOC':
-            return self.gen_loc(form.operands)
-
-        # Properties
-        elif op_name == 'GETP':
-            return self.gen_getp(form.operands)
-        elif op_name == 'PUTP':
-            return self.gen_putp(form.operands)
-        elif op_name == 'PTSIZE':
-            return self.gen_ptsize(form.operands)
-        elif op_name == 'NEXTP':
-            return self.gen_nextp(form.operands)
-        elif op_name == 'GETPT':
-            return self.gen_getpt(form.operands)
-
-        # Conditionals (these create branch instructions)
-        elif op_name == 'COND':
-            if form.operands and isinstance(form.operands[0], CondNode):
-                return self.generate_cond(form.operands[0])
-            else:
-                # COND may have macro-expanded clauses
-                # Convert operands to COND clauses
-                clauses = []
-                for operand in form.operands:
-                    clause = self._extract_cond_clause(operand)
-                    if clause is not None:
-                        clauses.append(clause)
-
-                if clauses:
-                    # Create CondNode and generate
-                    cond_node = CondNode(clauses, form.line, form.column)
-                    return self.generate_cond(cond_node)
-                else:
-                    # All clauses were empty - return empty
-                    return []
-
-        # Memory operations
-        elif op_name == 'LOADW':
-            return self.gen_loadw(form.operands)
-        elif op_name == 'LOADB':
-            return self.gen_loadb(form.operands)
-        elif op_name == 'STOREW':
-            return self.gen_storew(form.operands)
-        elif op_name == 'STOREB':
-            return self.gen_storeb(form.operands)
-
-        # Table operations (higher-level)
-        elif op_name == 'GET':
-            return self.gen_get(form.operands)
-        elif op_name == 'PUT':
-            return self.gen_put(form.operands)
-        elif op_name == 'GETB':
-            return self.gen_getb(form.operands)
-        elif op_name == 'PUTB':
-            return self.gen_putb(form.operands)
-        elif op_name == 'LENGTH':
-            return self.gen_length(form.operands)
-        elif op_name == 'NTH':
-            return self.gen_nth(form.operands)
-
-        # Stack operations
-        elif op_name == 'PUSH':
-            return self.gen_push(form.operands)
-        elif op_name == 'PULL':
-            return self.gen_pull(form.operands)
-        elif op_name == 'POP':
-            return self.gen_pop(form.operands)
-        elif op_name == 'XPUSH':
-            return self.gen_xpush(form.operands)
-
-        # Object tree
-        elif op_name == 'GET-CHILD' or op_name == 'FIRST?':
-            return self.gen_get_child(form.operands)
-        elif op_name == 'GET-SIBLING' or op_name == 'NEXT?':
-            return self.gen_get_sibling(form.operands)
-        elif op_name == 'GET-PARENT':
-            return self.gen_get_parent(form.operands)
-        elif op_name == 'EMPTY?':
-            return self.gen_empty(form.operands)
-        elif op_name == 'IN?':
-            return self.gen_in(form.operands)
-        elif op_name == 'HELD?':
-            return self.gen_held(form.operands)
-
-        # Random and utilities
-        elif op_name == 'RANDOM':
-            return self.gen_random(form.operands)
-        elif op_name == 'PROB':
-            return self.gen_prob(form.operands)
-        elif op_name == 'PICK-ONE':
-            return self.gen_pick_one(form.operands)
-        elif op_name == 'RESTART':
-            if form.operands:
-                raise ValueError("RESTART takes no operands")
-            return self.gen_restart()
-        elif op_name == 'SAVE':
-            return self.gen_save(form.operands)
-        elif op_name == 'RESTORE':
-            return self.gen_restore(form.operands)
-        elif op_name == 'VERIFY':
-            if form.operands:
-                raise ValueError("VERIFY takes no operands")
-            return self.gen_verify()
-        elif op_name == 'GOTO':
-            return self.gen_goto(form.operands)
-
-        # Parser predicates
-        elif op_name == 'VERB?':
-            return self.gen_verb_test(form.operands)
-        elif op_name in ('PRSO?', 'PRSI?', 'ROOM?', 'HERE?', 'WINNER?'):
-            # Classic-game MULTIFROB macros: <PRSO? a b> == <EQUAL? ,PRSO a b>,
-            # <HERE? a b> == <EQUAL? ,HERE a b>, <WINNER? a> == <EQUAL?
-            # ,WINNER a>.  The MDL DEFMAC/MULTIFROB machinery isn't expanded
-            # by the front end, so handle them as builtins (same shape as
-            # VERB?).  Expanding them through the macro path instead leaked
-            # MULTIFROB's compile-time REPEAT into the instruction stream
-            # (lurkinghorror's V-LISTEN <HERE? ,YUGGOTH ...> emitted garbage
-            # bytes that crashed the routine and desynced every placeholder
-            # scan behind it).
-            return self.gen_parser_eq_test(
-                {'PRSO?': 'PRSO', 'PRSI?': 'PRSI', 'ROOM?': 'HERE',
-                 'HERE?': 'HERE', 'WINNER?': 'WINNER'}[op_name],
-                form.operands)
-        elif op_name in ('RARG?', 'CONTEXT?'):
-            # Classic MULTIFROB macro over the room-function argument:
-            # <RARG? LOOK> == <EQUAL? .RARG ,M-LOOK> (atoms not already
-            # prefixed with M- get the prefix, per MULTIFROB's .RARG branch).
-            _ops = []
-            for _o in form.operands:
-                if isinstance(_o, AtomNode):
-                    _nm = _o.value
-                    if not (len(_nm) > 2 and _nm.upper().startswith('M-')):
-                        _nm = 'M-' + _nm
-                    _ops.append(GlobalVarNode(_nm))
-                else:
-                    _ops.append(_o)
-            return self.generate_form(
-                FormNode(AtomNode('EQUAL?'),
-                         [LocalVarNode('RARG')] + _ops))
-        elif op_name == 'PERFORM':
-            # If a PERFORM routine exists (the game's own, or our injected
-            # standard-library fallback), dispatch to it so the full action chain
-            # runs. gen_perform is only a stub for toy games with no PERFORM.
-            if hasattr(self, '_routine_names') and 'PERFORM' in self._routine_names:
-                return self.gen_routine_call('PERFORM', form.operands)
-            return self.gen_perform(form.operands)
-        elif op_name == 'CALL':
-            return self.gen_call(form.operands)
-        elif op_name == 'APPLY' or op_name == 'ZAPPLY':
-            # ZAPPLY is the MDL-ZIL indirect call: <ZAPPLY routine-value args...>
-            # calls the routine whose (packed) address is the first operand,
-            # exactly like APPLY/CALL. bureaucracy dispatches field/menu/clock
-            # handlers this way (<ZAPPLY <FIELD-FCN .TBL> ...>).
-            return self.gen_apply(form.operands)
-
-        # Daemon/Interrupt system
-        # NOTE: QUEUE, INT, DEQUEUE, ENABLE, DISABLE are typically implemented
-        # as ZIL library routines (see gclock.zil, events.zil), not compiler built-ins.
-        # If the user has defined these routines, use them instead of the built-ins.
-        # The built-in implementations are problematic because they store data in
-        # static memory, which cannot be modified at runtime.
-        # We check _routine_names (populated before generation) rather than
-        # self.routines (populated during generation) to handle forward references.
-        elif op_name == 'QUEUE':
-            if hasattr(self, '_routine_names') and 'QUEUE' in self._routine_names:
-                return self.gen_routine_call('QUEUE', form.operands)
-            return self.gen_queue(form.operands)
-        elif op_name == 'INT':
-            if hasattr(self, '_routine_names') and 'INT' in self._routine_names:
-                return self.gen_routine_call('INT', form.operands)
-            return self.gen_int(form.operands)
-        elif op_name == 'DEQUEUE':
-            if hasattr(self, '_routine_names') and 'DEQUEUE' in self._routine_names:
-                return self.gen_routine_call('DEQUEUE', form.operands)
-            return self.gen_dequeue(form.operands)
-        elif op_name == 'ENABLE':
-            if hasattr(self, '_routine_names') and 'ENABLE' in self._routine_names:
-                return self.gen_routine_call('ENABLE', form.operands)
-            return self.gen_enable(form.operands)
-        elif op_name == 'DISABLE':
-            if hasattr(self, '_routine_names') and 'DISABLE' in self._routine_names:
-                return self.gen_routine_call('DISABLE', form.operands)
-            return self.gen_disable(form.operands)
-
-        # List/table operations
-        elif op_name == 'REST':
-            return self.gen_rest(form.operands)
-        elif op_name == 'ZREST':
-            return self.gen_rest(form.operands)
-
-        # Game control
-        elif op_name == 'JIGS-UP':
-            return self.gen_jigs_up(form.operands)
-
-        # Parser/lexer operations (V5+ aliases)
-        elif op_name == 'LEX':
-            return self.gen_tokenise(form.operands)
-        elif op_name == 'PARSE':
-            return self.gen_tokenise(form.operands)
-        elif op_name == 'TOKENIZE':
-            return self.gen_tokenise(form.operands)
-
-        # Extended call forms (V5+)
-        elif op_name == 'CALL-VS2':
-            return self.gen_call_vs2(form.operands)
-        elif op_name == 'CALL-VN2':
-            return self.gen_call_vn2(form.operands)
-        elif op_name == 'CALL-1S':
-            return self.gen_call_1s(form.operands)
-        elif op_name == 'CALL-1N':
-            return self.gen_call_1n(form.operands)
-        elif op_name == 'CALL-2S':
-            return self.gen_call_2s(form.operands)
-        elif op_name == 'CALL-2N':
-            return self.gen_call_2n(form.operands)
-
-        # Undo operations (V5+)
-        elif op_name == 'SAVE-UNDO':
-            return self.gen_save_undo(form.operands)
-        elif op_name == 'RESTORE-UNDO':
-            return self.gen_restore_undo(form.operands)
-        elif op_name == 'ISAVE':
-            return self.gen_save_undo(form.operands)
-        elif op_name == 'IRESTORE':
-            return self.gen_restore_undo(form.operands)
-        elif op_name == 'ORIGINAL?':
-            return self.gen_original(form.operands)
-        elif op_name == 'INTBL?':
-            return self.gen_intbl(form.operands)
-        elif op_name == 'ZWSTR':
-            return self.gen_zwstr(form.operands)
-
-        # Table operations
-        elif op_name == 'TABLE':
-            return self.gen_table(form.operands, table_type='TABLE')
-        elif op_name == 'LTABLE':
-            return self.gen_table(form.operands, table_type='LTABLE')
-        elif op_name == 'ITABLE':
-            return self.gen_table(form.operands, table_type='ITABLE')
-        elif op_name == 'PTABLE':
-            return self.gen_table(form.operands, table_type='PTABLE')
-        elif op_name == 'REST':
-            return self.gen_rest(form.operands)
-        elif op_name == 'ZREST':
-            return self.gen_rest(form.operands)
-
-        # QUOTE form - returns its argument unevaluated
-        # In ZIL, 'EXPR becomes <QUOTE EXPR>
-        # As a statement, QUOTE is a no-op (it just evaluates to its quoted content)
-        # The value extraction is handled by _get_operand_type_and_value
-        elif op_name == 'QUOTE':
-            # As a statement, QUOTE has no side effects - it's a no-op
-            # When used as a value (e.g., in <FSET? ,OBJ 'FLAG>), the quoted
-            # atom is extracted by _get_operand_type_and_value
-            return b''
-
-        # VOC form - vocabulary word placeholder
-        elif op_name == 'VOC':
-            return self.gen_voc(form.operands)
+        # Builtins: see form_builtins.BUILTIN_FORMS
+        handler = self._form_handlers.get(op_name)
+        if handler is not None:
+            return handler(form)
 
         # DEFINE-GLOBALS accessor - check before routine calls
-        elif op_name in self.define_globals_entries:
+        if op_name in self.define_globals_entries:
             return self.gen_define_globals_access(op_name, form.operands)
 
         # Routine calls - check if it's a routine name
-        elif isinstance(form.operator, AtomNode):
-            if form.operator.value in self.routines or form.operator.value.isupper():
-                # Likely a routine call
-                return self.gen_routine_call(form.operator.value, form.operands)
+        if form.operator.value in self.routines or form.operator.value.isupper():
+            # Likely a routine call
+            return self.gen_routine_call(form.operator.value, form.operands)
 
         # Unrecognized operation - warn and return empty
         self._warn(f"Unrecognized operation '{op_name}' - no code generated")
         return b''
 
+    def _gen_printr_form(self, operands: List[ASTNode]) -> bytes:
+        """<PRINTR "text">: the operand must be a literal string."""
+        if not isinstance(operands[0], StringNode):
+            raise ValueError("PRINTR requires a string operand")
+        return self.gen_printr(operands)
+
+    def _gen_cond_form(self, form: FormNode) -> bytes:
+        """COND written as a form rather than parsed to a CondNode."""
+        if form.operands and isinstance(form.operands[0], CondNode):
+            return self.generate_cond(form.operands[0])
+        # COND may have macro-expanded clauses
+        # Convert operands to COND clauses
+        clauses = []
+        for operand in form.operands:
+            clause = self._extract_cond_clause(operand)
+            if clause is not None:
+                clauses.append(clause)
+        if not clauses:
+            # All clauses were empty - return empty
+            return []
+        return self.generate_cond(CondNode(clauses, form.line, form.column))
+
+    def _gen_parser_eq_form(self, operands: List[ASTNode], global_name: str) -> bytes:
+        """Classic-game MULTIFROB macros: <PRSO? a b> == <EQUAL? ,PRSO a b>,
+        <HERE? a b> == <EQUAL? ,HERE a b>, <WINNER? a> == <EQUAL? ,WINNER a>.
+
+        The MDL DEFMAC/MULTIFROB machinery isn't expanded by the front end,
+        so they are builtins (same shape as VERB?).  Expanding them through
+        the macro path instead leaked MULTIFROB's compile-time REPEAT into
+        the instruction stream (lurkinghorror's V-LISTEN <HERE? ,YUGGOTH ...>
+        emitted garbage bytes that crashed the routine and desynced every
+        placeholder scan behind it).
+        """
+        return self.gen_parser_eq_test(global_name, operands)
+
+    def _gen_rarg_form(self, operands: List[ASTNode]) -> bytes:
+        """Classic MULTIFROB macro over the room-function argument:
+        <RARG? LOOK> == <EQUAL? .RARG ,M-LOOK> (atoms not already prefixed
+        with M- get the prefix, per MULTIFROB's .RARG branch)."""
+        _ops = []
+        for _o in operands:
+            if isinstance(_o, AtomNode):
+                _nm = _o.value
+                if not (len(_nm) > 2 and _nm.upper().startswith('M-')):
+                    _nm = 'M-' + _nm
+                _ops.append(GlobalVarNode(_nm))
+            else:
+                _ops.append(_o)
+        return self.generate_form(
+            FormNode(AtomNode('EQUAL?'),
+                     [LocalVarNode('RARG')] + _ops))
+
     # ===== Table Node Helpers =====
 
     def _parse_table_pattern(self, pattern_operands) -> list:
@@ -6548,7 +5202,7 @@ class ImprovedCodeGenerator:
         pattern = []
         for elem in pattern_operands:
             if isinstance(elem, AtomNode):
-                elem_name = elem.value.upper()
+                elem_name = elem.upper
                 if elem_name == 'BYTE':
                     pattern.append((True, False))  # is_byte=True, is_rest=False
                 elif elem_name == 'WORD':
@@ -6558,15 +5212,15 @@ class ImprovedCodeGenerator:
                 if len(elem) >= 2:
                     rest_elem = elem[0]
                     type_elem = elem[1]
-                    if isinstance(rest_elem, AtomNode) and rest_elem.value.upper() == 'REST':
+                    if isinstance(rest_elem, AtomNode) and rest_elem.upper == 'REST':
                         if isinstance(type_elem, AtomNode):
-                            type_name = type_elem.value.upper()
+                            type_name = type_elem.upper
                             is_byte = (type_name == 'BYTE')
                             pattern.append((is_byte, True))  # is_rest=True
             elif isinstance(elem, FormNode):
                 # Could be wrapped in a form like <WORD>
                 if isinstance(elem.operator, AtomNode):
-                    elem_name = elem.operator.value.upper()
+                    elem_name = elem.operator.upper
                     if elem_name == 'BYTE':
                         pattern.append((True, False))
                     elif elem_name == 'WORD':
@@ -6605,7 +5259,7 @@ class ImprovedCodeGenerator:
             val = values[i]
 
             # Check for #BYTE prefix atom
-            if isinstance(val, AtomNode) and val.value.upper() == '#BYTE':
+            if isinstance(val, AtomNode) and val.upper == '#BYTE':
                 # Next value should be stored as a byte
                 i += 1
                 if i < len(values):
@@ -6617,7 +5271,7 @@ class ImprovedCodeGenerator:
                 continue
 
             # Check for #WORD prefix atom
-            if isinstance(val, AtomNode) and val.value.upper() == '#WORD':
+            if isinstance(val, AtomNode) and val.upper == '#WORD':
                 # Next value should be stored as a word
                 i += 1
                 if i < len(values):
@@ -6647,9 +5301,9 @@ class ImprovedCodeGenerator:
             force_word = False
             if (isinstance(val, FormNode)
                     and isinstance(val.operator, AtomNode)
-                    and val.operator.value.upper() in ('BYTE', 'WORD')
+                    and val.operator.upper in ('BYTE', 'WORD')
                     and val.operands):
-                if val.operator.value.upper() == 'BYTE':
+                if val.operator.upper == 'BYTE':
                     folded = 0
                     for op_node in val.operands:
                         folded |= self._get_table_value_int(op_node) & 0xFFFF
@@ -6716,7 +5370,6 @@ class ImprovedCodeGenerator:
                                     getattr(val, 'line', 0), getattr(val, 'column', 0))
                 if isinstance(val, TableNode):
                     child_idx = self._add_table(val)
-                    self._emitted_nested_table_ptr = True
                     self._encode_nested_table_ptr_offsets.append(
                         (len(table_data), child_idx))
                     table_data.extend(struct.pack('>H', 0xFF00 | (child_idx & 0xFF)))
@@ -6732,7 +5385,6 @@ class ImprovedCodeGenerator:
                         and val.value not in self.constants
                         and val.value in getattr(self, '_global_table_indices', ())):
                     child_idx = self._global_table_indices[val.value]
-                    self._emitted_nested_table_ptr = True
                     self._encode_nested_table_ptr_offsets.append(
                         (len(table_data), child_idx))
                     table_data.extend(struct.pack('>H', 0xFF00 | (child_idx & 0xFF)))
@@ -6780,7 +5432,7 @@ class ImprovedCodeGenerator:
         """Check if a node is a QUOTE form (<QUOTE ...> or 'EXPR)."""
         return (isinstance(node, FormNode) and
                 isinstance(node.operator, AtomNode) and
-                node.operator.value.upper() == 'QUOTE')
+                node.operator.upper == 'QUOTE')
 
     def _unwrap_quote(self, node: ASTNode) -> ASTNode:
         """Unwrap a QUOTE form to get the quoted content.
@@ -6814,7 +5466,7 @@ class ImprovedCodeGenerator:
             if not val.operands and isinstance(val.operator, NumberNode):
                 return val.operator.value
             # Check for VOC form: <VOC "word" pos>
-            if isinstance(val.operator, AtomNode) and val.operator.value.upper() == 'VOC':
+            if isinstance(val.operator, AtomNode) and val.operator.upper == 'VOC':
                 return self._handle_voc_form(val)
             # A compile-time arithmetic element folds to a constant (moonmist's
             # C-TABLE stores <- ,DINNER-TIME ,PRESENT-TIME-ATOM 10> as
@@ -6836,7 +5488,7 @@ class ImprovedCodeGenerator:
                 return self.objects[name]
             elif name in self.routines or (hasattr(self, '_routine_names') and name in self._routine_names):
                 # Routine reference in table data: emit a placeholder and record
-                # its position (get_table_routine_fixups no longer scans).
+                # its position (see get_table_relocations).
                 ph = self._get_routine_placeholder(name)
                 return ph
             elif name in self.globals:
@@ -6881,9 +5533,9 @@ class ImprovedCodeGenerator:
         """In-code marker word for vocab placeholder `idx`.
 
         The low byte is a PER-STATEMENT emission sequence number (deduped by
-        idx), not the placeholder index -- the post-statement scan maps it
-        back through _current_stmt_vocab_emits so the FULL index is known at
-        the exact recorded position (indices >= 256 would not fit the byte).
+        idx), not the placeholder index -- _record_code_marks maps it back
+        through _current_stmt_vocab_emits so the FULL index is known at the
+        recorded position (indices >= 256 would not fit the byte).
         """
         emits = self._current_stmt_vocab_emits
         try:
@@ -6897,28 +5549,6 @@ class ImprovedCodeGenerator:
             emits.append(idx)
         return 0xFB00 | seq
 
-    def _scan_stmt_vocab_markers(self, blob):
-        """(offset, full_idx) for every vocab seq marker in statement code.
-
-        Structural walk: only 2-byte large-constant operand positions can
-        hold a marker. Falls back to a byte-blind scan (with the assembler's
-        JUMP-offset guards) if the stream cannot be decoded.
-        """
-        emits = self._current_stmt_vocab_emits
-        if not emits:
-            return []
-        try:
-            positions = _walk_large_const_positions(bytes(blob), self.version)
-        except _PlaceholderScanDesync:
-            positions = [i for i in range(len(blob) - 1)
-                         if not (i >= 1 and blob[i - 1] == 0x8C)
-                         and not (i >= 2 and blob[i - 2] == 0x8C)]
-        res = []
-        for p in positions:
-            if p + 1 < len(blob) and blob[p] == 0xFB and blob[p + 1] < len(emits):
-                res.append((p, emits[blob[p + 1]]))
-        return res
-
     def _extract_voc_word(self, form: FormNode) -> Optional[str]:
         """Extract the word string from a VOC form.
 
@@ -6999,12 +5629,12 @@ class ImprovedCodeGenerator:
         if len(form.operands) >= 2:
             pos_node = form.operands[1]
             if isinstance(pos_node, AtomNode):
-                pos_type = pos_node.value.upper()
+                pos_type = pos_node.upper
             elif isinstance(pos_node, FormNode):
                 # <> means no part-of-speech (FALSE)
                 if isinstance(pos_node.operator, AtomNode) and pos_node.operator.value == '<>':
                     pos_type = None
-                elif not pos_node.operands and isinstance(pos_node.operator, AtomNode) and pos_node.operator.value.upper() == '<>':
+                elif not pos_node.operands and isinstance(pos_node.operator, AtomNode) and pos_node.operator.upper == '<>':
                     pos_type = None
 
         # Track the word and part-of-speech for dictionary building
@@ -7610,16 +6240,13 @@ class ImprovedCodeGenerator:
         - C ,char - print character (PRINT_CHAR)
         - P ,address - print from packed address (PRINT_PADDR)
         """
-        # NOTE: Don't clear _current_stmt_tell_offsets here!
-        # It's cleared in generate_routine before each statement.
-        # Multiple gen_tell calls within one statement (e.g., COND branches) accumulate.
         code = bytearray()
         i = 0
         _tail_fuse_idx = -1
         if (getattr(self, '_tail_hint_ops', None) == id(operands)
                 and len(operands) >= 2
                 and isinstance(operands[-1], AtomNode)
-                and operands[-1].value.upper() in ('CR', 'CRLF')
+                and operands[-1].upper in ('CR', 'CRLF')
                 and isinstance(operands[-2], StringNode)
                 and self._inline_string_ok(operands[-2].value)):
             _tail_fuse_idx = len(operands) - 2
@@ -7654,8 +6281,6 @@ class ImprovedCodeGenerator:
                         self._next_tell_string_index += 1
                     # Encode as 16-bit placeholder value: base + index
                     placeholder_val = self._tell_string_base + placeholder_idx
-                    # Track the offset for position-based resolution
-                    self._current_stmt_tell_offsets.append((len(code), placeholder_idx))
                     code.append(0x8D)  # PRINT_PADDR short form
                     code.append((placeholder_val >> 8) & 0xFF)  # High byte (0xE0-0xFF)
                     code.append(placeholder_val & 0xFF)  # Low byte
@@ -7666,7 +6291,7 @@ class ImprovedCodeGenerator:
                 i += 1
 
             elif isinstance(op, AtomNode):
-                atom_name = op.value.upper()
+                atom_name = op.upper
 
                 if atom_name == 'CR' or atom_name == 'CRLF':
                     # Print newline
@@ -7732,7 +6357,6 @@ class ImprovedCodeGenerator:
                             self._tell_string_to_placeholder[" the "] = placeholder_idx
                             self._next_tell_string_index += 1
                         placeholder_val = self._tell_string_base + placeholder_idx
-                        self._current_stmt_tell_offsets.append((len(code), placeholder_idx))
                         code.append(0x8D)  # PRINT_PADDR short form
                         code.append((placeholder_val >> 8) & 0xFF)
                         code.append(placeholder_val & 0xFF)
@@ -7905,7 +6529,7 @@ class ImprovedCodeGenerator:
                 # and should be printed with PRINT_PADDR, not PRINT_NUM
                 is_var_form = False
                 if isinstance(op.operator, AtomNode):
-                    op_name = op.operator.value.upper()
+                    op_name = op.operator.upper
                     if op_name in ('LVAL', 'GVAL'):
                         is_var_form = True
                 # Classic MDL TELL prints a bare form's value as a STRING
@@ -8255,7 +6879,7 @@ class ImprovedCodeGenerator:
         # Handle FormNode operands
         if isinstance(operands[0], FormNode):
             # Check if it's a VOC form - print the word as a string
-            if isinstance(operands[0].operator, AtomNode) and operands[0].operator.value.upper() == 'VOC':
+            if isinstance(operands[0].operator, AtomNode) and operands[0].operator.upper == 'VOC':
                 # Extract the word from VOC form
                 word = self._extract_voc_word(operands[0])
                 if word:
@@ -8273,7 +6897,6 @@ class ImprovedCodeGenerator:
                                 self._tell_string_to_placeholder[word] = placeholder_idx
                                 self._next_tell_string_index += 1
                         placeholder_val = self._tell_string_base + placeholder_idx
-                        self._current_stmt_tell_offsets.append((len(code), placeholder_idx))
                         op_type = 0  # Large constant
                         op_val = placeholder_val
                     else:
@@ -8417,7 +7040,7 @@ class ImprovedCodeGenerator:
             return b''
         pos_type = None
         if len(operands) >= 2 and isinstance(operands[1], AtomNode):
-            pos_type = operands[1].value.upper()
+            pos_type = operands[1].upper
         self.record_voc_word(word, pos_type)
         placeholder_idx = self._intern_vocab_placeholder(word)
         marker = self._code_vocab_marker(placeholder_idx)
@@ -9169,7 +7792,6 @@ class ImprovedCodeGenerator:
 
         # For each remaining operand, compute stack OP opN -> stack
         stack_ref = NumberNode(0)  # Variable 0 = stack
-        stack_ref._is_stack_ref = True  # Mark as stack reference
 
         for i in range(2, len(operands)):
             code.extend(self._gen_2op_store_with_stack(opcode, operands[i]))
@@ -9783,7 +8405,7 @@ class ImprovedCodeGenerator:
             # Check for QUOTE form - 'EXPR becomes <QUOTE EXPR>
             # QUOTE is a compile-time construct that returns its argument unevaluated
             # We need to unwrap it and process the quoted content
-            if isinstance(node.operator, AtomNode) and node.operator.value.upper() == 'QUOTE':
+            if isinstance(node.operator, AtomNode) and node.operator.upper == 'QUOTE':
                 if node.operands:
                     # Recursively process the quoted content
                     return self._get_operand_type_and_value(node.operands[0])
@@ -9817,8 +8439,8 @@ class ImprovedCodeGenerator:
                     # 0xFC00-band overflow (>256 unique code string operands):
                     # allocate from the wide data-string band instead. The
                     # positions of these markers in ROUTINE code are recorded
-                    # structurally by _scan_placeholder_words and patched
-                    # point-wise by the assembler (never by a byte scan).
+                    # by _record_code_marks and patched point-wise by the
+                    # assembler (never by a byte scan).
                     self._string_code_overflow = True
                     return (0, self.register_data_string(node.value))
                 self._string_operand_placeholders[placeholder_idx] = node.value
@@ -12393,23 +11015,12 @@ class ImprovedCodeGenerator:
         # Evaluate first operand
         first_op = operands[0]
         if isinstance(first_op, FormNode):
-            placeholder_count_before = len(self._current_stmt_routine_offsets)
-            insert_pos = len(code)
             expr_code = self.generate_form(first_op)
-            # Adjust placeholders for code being inserted
-            for k in range(placeholder_count_before, len(self._current_stmt_routine_offsets)):
-                rel_offset, placeholder_val = self._current_stmt_routine_offsets[k]
-                self._current_stmt_routine_offsets[k] = (insert_pos + rel_offset, placeholder_val)
             code.extend(expr_code)
             op1_type = 1  # Variable (stack)
             op1_val = 0   # Stack
         elif isinstance(first_op, CondNode):
-            placeholder_count_before = len(self._current_stmt_routine_offsets)
-            insert_pos = len(code)
             expr_code = self.generate_cond(first_op)
-            for k in range(placeholder_count_before, len(self._current_stmt_routine_offsets)):
-                rel_offset, placeholder_val = self._current_stmt_routine_offsets[k]
-                self._current_stmt_routine_offsets[k] = (insert_pos + rel_offset, placeholder_val)
             code.extend(expr_code)
             op1_type = 1
             op1_val = 0
@@ -12419,23 +11030,12 @@ class ImprovedCodeGenerator:
         # Evaluate second operand
         second_op = operands[1]
         if isinstance(second_op, FormNode):
-            placeholder_count_before = len(self._current_stmt_routine_offsets)
-            insert_pos = len(code)
             expr_code = self.generate_form(second_op)
-            # Adjust placeholders for code being inserted
-            for k in range(placeholder_count_before, len(self._current_stmt_routine_offsets)):
-                rel_offset, placeholder_val = self._current_stmt_routine_offsets[k]
-                self._current_stmt_routine_offsets[k] = (insert_pos + rel_offset, placeholder_val)
             code.extend(expr_code)
             op2_type = 1  # Variable (stack)
             op2_val = 0   # Stack
         elif isinstance(second_op, CondNode):
-            placeholder_count_before = len(self._current_stmt_routine_offsets)
-            insert_pos = len(code)
             expr_code = self.generate_cond(second_op)
-            for k in range(placeholder_count_before, len(self._current_stmt_routine_offsets)):
-                rel_offset, placeholder_val = self._current_stmt_routine_offsets[k]
-                self._current_stmt_routine_offsets[k] = (insert_pos + rel_offset, placeholder_val)
             code.extend(expr_code)
             op2_type = 1
             op2_val = 0
@@ -12679,30 +11279,10 @@ class ImprovedCodeGenerator:
         if len(operands) != 2:
             raise ValueError("COLOR requires exactly 2 operands")
 
-        # V5+: SET_COLOUR opcode (EXT:27)
-        code = bytearray()
-        if len(operands) >= 2:
-            op1_type, op1_val = self._get_operand_type_and_value(operands[0])
-            op2_type, op2_val = self._get_operand_type_and_value(operands[1])
-
-            # Extended opcode format: 0xBE followed by opcode number
-            code.append(0xBE)  # EXT marker
-            code.append(0x1B)  # SET_COLOUR (EXT:27)
-
-            # Build type byte (same format as VAR opcodes)
-            # 00=large constant, 01=small constant, 10=variable, 11=omitted
-            types = []
-            types.append(0x01 if op1_type == 0 else 0x02)  # small const or variable
-            types.append(0x01 if op2_type == 0 else 0x02)
-            types.append(0x03)  # Omitted
-            types.append(0x03)  # Omitted
-
-            type_byte = (types[0] << 6) | (types[1] << 4) | (types[2] << 2) | types[3]
-            code.append(type_byte)
-
-            code.append(op1_val & 0xFF)
-            code.append(op2_val & 0xFF)
-        return bytes(code)
+        # V5+: SET_COLOUR is 2OP:27 (no store, no branch)
+        op1_type, op1_val = self._get_operand_type_and_value(operands[0])
+        op2_type, op2_val = self._get_operand_type_and_value(operands[1])
+        return bytes(self._asm_2op(0x1B, op1_type, op1_val, op2_type, op2_val))
 
     def gen_set_colour(self, operands: List[ASTNode]) -> bytes:
         """Generate SET_COLOUR (V5+ - set text colors).
@@ -12737,17 +11317,21 @@ class ImprovedCodeGenerator:
         if len(operands) != 1:
             raise ValueError("FONT requires exactly 1 operand")
 
-        # V5+: SET_FONT opcode
-        code = bytearray()
-        if operands:
-            op_type, op_val = self._get_operand_type_and_value(operands[0])
-            # SET_FONT is 1OP opcode 0x04 (EXT)
-            if op_type == 1:  # Variable
-                code.append(0xBC)  # 1OP variable, opcode 0x0C
-            else:  # Constant
-                code.append(0x9C)  # 1OP small constant, opcode 0x0C
-            code.append(op_val & 0xFF)
-            code.append(0x00)  # Store result to stack
+        # V5+: SET_FONT is EXT:4, storing the previous font
+        op_type, op_val = self._get_operand_type_and_value(operands[0])
+        return self._asm_set_font(op_type, op_val)
+
+    def _asm_set_font(self, op_type, op_val):
+        """Assemble SET_FONT (EXT:4) -> stack from a
+        _get_operand_type_and_value-convention operand."""
+        code = bytearray([0xBE, 0x04])
+        if op_type == 1:
+            code.extend([0xBF, op_val & 0xFF])        # variable
+        elif 0 <= op_val <= 255:
+            code.extend([0x7F, op_val])               # small constant
+        else:
+            code.extend([0x3F, (op_val >> 8) & 0xFF, op_val & 0xFF])
+        code.append(0x00)  # Store result to stack
         return bytes(code)
 
     def gen_set_true_colour(self, operands: List[ASTNode]) -> bytes:
@@ -13121,99 +11705,11 @@ class ImprovedCodeGenerator:
             code.extend([0x2D, sv, 0x00])  # STORE sv, sp (pop)
 
     def _tail_store_pos(self, blob):
-        """Walk a V3+ instruction stream; return the offset of the FINAL
-        instruction's store byte, or None when the stream cannot be decoded,
-        is empty, or the final instruction does not store."""
-        v = self.version
-        n = len(blob)
-        i = 0
-        last_store = None
-        while i < n:
-            store_pos = None
-            op = blob[i]
-            if op == 0xBE:  # extended (V5+)
-                if v < 5 or i + 2 >= n:
-                    return None
-                ext = blob[i + 1]
-                tb = blob[i + 2]
-                i += 3
-                for sh in (6, 4, 2, 0):
-                    t = (tb >> sh) & 3
-                    if t == 3:
-                        break
-                    i += 2 if t == 0 else 1
-                store = ext in _EXT_STORE_OPS
-                branch = ext in _EXT_BRANCH_OPS
-            elif op < 0x80:  # long 2OP
-                opnum = op & 0x1F
-                if opnum == 0:
-                    return None
-                i += 3
-                store = opnum in _2OP_STORE_OPS or (opnum == 0x19 and v >= 4)
-                branch = opnum in _2OP_BRANCH_OPS
-            elif op < 0xB0:  # short 1OP
-                opnum = op & 0x0F
-                t = (op >> 4) & 3
-                i += 1
-                i += 2 if t == 0 else 1
-                store = opnum in (0x01, 0x02, 0x03, 0x04, 0x0E) \
-                    or (opnum == 0x08 and v >= 4) \
-                    or (opnum == 0x0F and v <= 4)
-                branch = opnum in _1OP_BRANCH_OPS
-            elif op < 0xC0:  # short 0OP
-                opnum = op & 0x0F
-                i += 1
-                if opnum in (0x02, 0x03):  # print / print_ret inline z-string
-                    while True:
-                        if i + 1 >= n:
-                            return None
-                        w = (blob[i] << 8) | blob[i + 1]
-                        i += 2
-                        if w & 0x8000:
-                            break
-                store = (opnum in (0x05, 0x06) and v == 4)
-                branch = (opnum in (0x05, 0x06) and v <= 3) or opnum in (0x0D, 0x0F)
-            else:  # variable form
-                opnum = op & 0x1F
-                var_of_2op = op < 0xE0
-                i += 1
-                ntypes = 2 if (not var_of_2op and v >= 4 and opnum in (0x0C, 0x1A)) else 1
-                if i + ntypes > n:
-                    return None
-                tbs = blob[i:i + ntypes]
-                i += ntypes
-                done = False
-                for tb in tbs:
-                    for sh in (6, 4, 2, 0):
-                        t = (tb >> sh) & 3
-                        if t == 3:
-                            done = True
-                            break
-                        i += 2 if t == 0 else 1
-                    if done:
-                        break
-                if var_of_2op:
-                    store = opnum in _2OP_STORE_OPS or (opnum == 0x19 and v >= 4)
-                    branch = opnum in _2OP_BRANCH_OPS
-                else:
-                    store = opnum in (0x00, 0x07) \
-                        or (v >= 4 and opnum in (0x0C, 0x16, 0x17)) \
-                        or (v >= 5 and opnum in (0x04, 0x18))
-                    branch = (v >= 4 and opnum == 0x17) or (v >= 5 and opnum == 0x1F)
-            if store:
-                store_pos = i
-                i += 1
-            if branch:
-                if i >= n:
-                    return None
-                b = blob[i]
-                i += 1
-                if not (b & 0x40):
-                    i += 1
-            if i > n:
-                return None
-            last_store = store_pos
-        return last_store
+        """The offset of the FINAL instruction's store byte in a V3+
+        instruction stream, or None when the stream cannot be decoded, is
+        empty, or the final instruction does not store."""
+        instrs = self._decode_or_none(blob)
+        return instrs[-1].store_pos if instrs else None
 
     def _emit_scan_table(self, operands, code, store_var):
         """Emit SCAN_TABLE (VAR:23) for INTBL? operands into `code`,
@@ -13670,7 +12166,7 @@ class ImprovedCodeGenerator:
         elif isinstance(first_op, FormNode):
             # Subfield access: (NAME subfield)
             if first_op.operands and isinstance(first_op.operands[0], AtomNode):
-                name = first_op.operands[0].value.upper()
+                name = first_op.operands[0].upper
                 if name in self.LOWCORE_HEADER:
                     addr = self.LOWCORE_HEADER[name]
                     # Add subfield offset if provided
@@ -13863,7 +12359,7 @@ class ImprovedCodeGenerator:
             if node.operands:
                 op_name = None
                 if isinstance(node.operands[0], AtomNode):
-                    op_name = node.operands[0].value.upper()
+                    op_name = node.operands[0].upper
                 # Handle macro expansion - look for the macro definition
                 if op_name and op_name in self.macros:
                     # Simplified: if macro body is just a number, return it
@@ -14313,19 +12809,13 @@ class ImprovedCodeGenerator:
             # Full implementation would modify alphabet table
             if charset == 0:
                 # Default - font 1
-                code.append(0xB4)  # SET_FONT (1OP:0x04 with variable type)
-                code.append(0x01)  # Font 1
-                code.append(0x00)  # Store result
+                code.extend(self._asm_set_font(0, 1))
             elif charset == 1:
                 # Alternative - font 2 (if available)
-                code.append(0xB4)
-                code.append(0x02)
-                code.append(0x00)
+                code.extend(self._asm_set_font(0, 2))
             elif charset == 2:
                 # Character graphics - font 3
-                code.append(0xB4)
-                code.append(0x03)
-                code.append(0x00)
+                code.extend(self._asm_set_font(0, 3))
 
         return bytes(code)
 
@@ -14541,7 +13031,7 @@ class ImprovedCodeGenerator:
         if len(operands) >= 2:
             type_check = operands[1]
             if isinstance(type_check, AtomNode):
-                type_name = type_check.value.upper()
+                type_name = type_check.upper
 
                 if type_name == 'FALSE':
                     # Check if value is 0
@@ -15716,22 +14206,11 @@ class ImprovedCodeGenerator:
             # Generate code for each statement in sequence
             for i in range(body_start, len(operands)):
                 stmt = operands[i]
-
-                # Track placeholder count before generating statement
-                placeholder_count_before = len(self._current_stmt_routine_offsets)
-
                 if i < len(operands) - 1:
                     stmt_code = self._gen_discard_stmt(stmt)
                 else:
                     stmt_code = self.generate_statement(stmt)
-
-                # Adjust any new placeholder offsets to account for position in block
                 if stmt_code:
-                    stmt_insert_offset = len(code)
-                    for k in range(placeholder_count_before, len(self._current_stmt_routine_offsets)):
-                        rel_offset, placeholder_val = self._current_stmt_routine_offsets[k]
-                        self._current_stmt_routine_offsets[k] = (stmt_insert_offset + rel_offset, placeholder_val)
-
                     code.extend(stmt_code)
 
             # PROG should return the value of its last expression
@@ -15755,7 +14234,7 @@ class ImprovedCodeGenerator:
             elif isinstance(last_stmt, FormNode):
                 # Check if it's a void operation
                 if isinstance(last_stmt.operator, AtomNode):
-                    op_name = last_stmt.operator.value.upper()
+                    op_name = last_stmt.operator.upper
                     body_produces_value = op_name not in void_ops
                 else:
                     body_produces_value = True
@@ -16039,22 +14518,11 @@ class ImprovedCodeGenerator:
             for i in range(1, len(operands)):
                 stmt = operands[i]
                 last_stmt = stmt
-
-                # Track placeholder count before generating statement
-                placeholder_count_before = len(self._current_stmt_routine_offsets)
-
                 if i < len(operands) - 1:
                     stmt_code = self._gen_discard_stmt(stmt)
                 else:
                     stmt_code = self.generate_statement(stmt)
-
-                # Adjust any new placeholder offsets to account for position in block
                 if stmt_code:
-                    stmt_insert_offset = len(code)
-                    for k in range(placeholder_count_before, len(self._current_stmt_routine_offsets)):
-                        rel_offset, placeholder_val = self._current_stmt_routine_offsets[k]
-                        self._current_stmt_routine_offsets[k] = (stmt_insert_offset + rel_offset, placeholder_val)
-
                     code.extend(stmt_code)
 
             # Handle last statement as return value
@@ -16177,7 +14645,7 @@ class ImprovedCodeGenerator:
                                          GlobalVarNode as _GVN)
         if isinstance(end_node, _FN):
             # Re-evaluate the expression each pass onto the stack; compare var>stack.
-            end_code = self._generate_nested_and_adjust(end_node, code)
+            end_code = self.generate_statement(end_node)
             code.extend(end_code)
             code.append(0x40 | 0x20 | jump_opcode)  # long 2OP: var, variable(stack)
             code.append(var_num & 0xFF)
@@ -16293,7 +14761,7 @@ class ImprovedCodeGenerator:
                 code.append(start_val & 0xFF)
         else:
             # Evaluate expression for start value
-            start_code = self._generate_nested_and_adjust(start_node, code)
+            start_code = self.generate_statement(start_node)
             code.extend(start_code)
             code.append(0xE9)  # PULL
             code.append(0x7F)  # Type: small constant
@@ -16374,7 +14842,7 @@ class ImprovedCodeGenerator:
             else:
                 # End is a form expression - treat as predicate
                 # Evaluate and exit if result is truthy (non-zero)
-                end_code = self._generate_nested_and_adjust(end_node, code)
+                end_code = self.generate_statement(end_node)
                 code.extend(end_code)
                 # JZ stack - branch if zero (continue) or not zero (exit)
                 code.append(0xA0)  # JZ 1OP short form with variable type
@@ -16519,7 +14987,7 @@ class ImprovedCodeGenerator:
             else:
                 # End is a form expression - treat as predicate
                 # Evaluate and exit if result is truthy (non-zero)
-                end_code = self._generate_nested_and_adjust(end_node, code)
+                end_code = self.generate_statement(end_node)
                 code.extend(end_code)
                 # JZ stack - branch if zero (continue) or not zero (exit)
                 code.append(0xA0)  # JZ 1OP short form with variable type
@@ -16663,7 +15131,7 @@ class ImprovedCodeGenerator:
                 # Check if this list looks like an END clause
                 if (len(stmt) > 0 and
                         isinstance(stmt[0], AtomNode) and
-                        stmt[0].value.upper() == 'END'):
+                        stmt[0].upper == 'END'):
                     raise ValueError(
                         "DO END clause must appear immediately after the loop specification, "
                         "not after body statements"
@@ -16820,18 +15288,8 @@ class ImprovedCodeGenerator:
             if end_clause:
                 # Generate END clause statements
                 for stmt in end_clause:
-                    # Track placeholder count before generating statement
-                    placeholder_count_before = len(self._current_stmt_routine_offsets)
-
                     stmt_code = self._gen_discard_stmt(stmt)
-
-                    # Adjust any new placeholder offsets to account for position in block
                     if stmt_code:
-                        stmt_insert_offset = len(code)
-                        for k in range(placeholder_count_before, len(self._current_stmt_routine_offsets)):
-                            rel_offset, placeholder_val = self._current_stmt_routine_offsets[k]
-                            self._current_stmt_routine_offsets[k] = (stmt_insert_offset + rel_offset, placeholder_val)
-
                         code.extend(stmt_code)
 
             # Return point is after END clause (where RETURN jumps to)
@@ -17053,10 +15511,9 @@ class ImprovedCodeGenerator:
 
         try:
             # Generate body code
-            # Use _generate_nested_and_adjust to properly track placeholder offsets
             for i in range(body_start_idx, len(operands)):
                 stmt = operands[i]
-                stmt_code = self._generate_nested_and_adjust(stmt, code)
+                stmt_code = self.generate_statement(stmt)
                 if stmt_code:
                     code.extend(stmt_code)
 
@@ -17116,10 +15573,9 @@ class ImprovedCodeGenerator:
             code[exit_branch_pos + 1] = long_offset2 & 0xFF
 
             # Generate END clause if present
-            # Use _generate_nested_and_adjust to properly track placeholder offsets
             if end_clause:
                 for stmt in end_clause:
-                    stmt_code = self._generate_nested_and_adjust(stmt, code)
+                    stmt_code = self.generate_statement(stmt)
                     if stmt_code:
                         code.extend(stmt_code)
 
@@ -17250,7 +15706,7 @@ class ImprovedCodeGenerator:
             # Check if it's (END ...) form
             if (len(operands[1]) > 0 and
                 isinstance(operands[1][0], AtomNode) and
-                operands[1][0].value.upper() == 'END'):
+                operands[1][0].upper == 'END'):
                 end_clause = operands[1][1:]  # Skip the END atom
                 body_start_idx = 2
 
@@ -17313,7 +15769,8 @@ class ImprovedCodeGenerator:
         # exceeds the 1-byte form's 63-byte reach (lurkinghorror's I-URCHIN
         # body is ~160 bytes; the old 1-byte placeholder truncated the offset
         # so the "exit" landed back inside the body and the interrupt spun
-        # forever).  The size peephole re-narrows short ones afterwards.
+        # forever).  The size peephole's branch relaxation shortens it when the
+        # body is short.
         exit_branch_pos = len(code)
         code.append(0x80)  # Placeholder: branch on true, long form (patched)
         code.append(0x00)  # Placeholder low byte
@@ -17390,10 +15847,9 @@ class ImprovedCodeGenerator:
         body_start = len(code)
 
         # Generate body statements
-        # Use _generate_nested_and_adjust to properly track placeholder offsets
         for i in range(body_start_idx, len(operands)):
             stmt = operands[i]
-            stmt_code = self._generate_nested_and_adjust(stmt, code)
+            stmt_code = self.generate_statement(stmt)
             if stmt_code:
                 code.extend(stmt_code)
 
@@ -17443,10 +15899,9 @@ class ImprovedCodeGenerator:
             self.loop_stack.pop()
 
         # Execute END clause if present
-        # Use _generate_nested_and_adjust to properly track placeholder offsets
         if end_clause:
             for stmt in end_clause:
-                stmt_code = self._generate_nested_and_adjust(stmt, code)
+                stmt_code = self.generate_statement(stmt)
                 if stmt_code:
                     code.extend(stmt_code)
 
@@ -17516,19 +15971,8 @@ class ImprovedCodeGenerator:
             # Generate code for each statement in loop body
             for i in range(1, len(operands)):
                 stmt = operands[i]
-
-                # Track placeholder count before generating statement
-                placeholder_count_before = len(self._current_stmt_routine_offsets)
-
                 stmt_code = self._gen_discard_stmt(stmt)
-
-                # Adjust any new placeholder offsets to account for position in loop
                 if stmt_code:
-                    stmt_insert_offset = len(code)
-                    for k in range(placeholder_count_before, len(self._current_stmt_routine_offsets)):
-                        rel_offset, placeholder_val = self._current_stmt_routine_offsets[k]
-                        self._current_stmt_routine_offsets[k] = (stmt_insert_offset + rel_offset, placeholder_val)
-
                     code.extend(stmt_code)
 
             # At end of loop, add an unconditional jump back to start (the infinite
@@ -17979,23 +16423,12 @@ class ImprovedCodeGenerator:
         # If first operand is a nested expression, evaluate it first
         first_op = operands[0]
         if isinstance(first_op, FormNode):
-            placeholder_count_before = len(self._current_stmt_routine_offsets)
-            insert_pos = len(code)
             expr_code = self.generate_form(first_op)
-            # Adjust placeholders for code being inserted
-            for k in range(placeholder_count_before, len(self._current_stmt_routine_offsets)):
-                rel_offset, placeholder_val = self._current_stmt_routine_offsets[k]
-                self._current_stmt_routine_offsets[k] = (insert_pos + rel_offset, placeholder_val)
             code.extend(expr_code)
             op1_type = 1  # Variable (stack)
             op1_val = 0   # Stack
         elif isinstance(first_op, CondNode):
-            placeholder_count_before = len(self._current_stmt_routine_offsets)
-            insert_pos = len(code)
             expr_code = self.generate_cond(first_op)
-            for k in range(placeholder_count_before, len(self._current_stmt_routine_offsets)):
-                rel_offset, placeholder_val = self._current_stmt_routine_offsets[k]
-                self._current_stmt_routine_offsets[k] = (insert_pos + rel_offset, placeholder_val)
             code.extend(expr_code)
             op1_type = 1
             op1_val = 0
@@ -18006,23 +16439,12 @@ class ImprovedCodeGenerator:
         if len(operands) == 2:
             second_op = operands[1]
             if isinstance(second_op, FormNode):
-                placeholder_count_before = len(self._current_stmt_routine_offsets)
-                insert_pos = len(code)
                 expr_code = self.generate_form(second_op)
-                # Adjust placeholders for code being inserted
-                for k in range(placeholder_count_before, len(self._current_stmt_routine_offsets)):
-                    rel_offset, placeholder_val = self._current_stmt_routine_offsets[k]
-                    self._current_stmt_routine_offsets[k] = (insert_pos + rel_offset, placeholder_val)
                 code.extend(expr_code)
                 op2_type = 1  # Variable (stack)
                 op2_val = 0   # Stack
             elif isinstance(second_op, CondNode):
-                placeholder_count_before = len(self._current_stmt_routine_offsets)
-                insert_pos = len(code)
                 expr_code = self.generate_cond(second_op)
-                for k in range(placeholder_count_before, len(self._current_stmt_routine_offsets)):
-                    rel_offset, placeholder_val = self._current_stmt_routine_offsets[k]
-                    self._current_stmt_routine_offsets[k] = (insert_pos + rel_offset, placeholder_val)
                 code.extend(expr_code)
                 op2_type = 1
                 op2_val = 0
@@ -18132,13 +16554,8 @@ class ImprovedCodeGenerator:
             comparand_tv = []
             for c in all_comparands:
                 if isinstance(c, (FormNode, CondNode)):
-                    _pb = len(self._current_stmt_routine_offsets)
-                    _ins = len(code)
                     _sub = (self.generate_cond(c) if isinstance(c, CondNode)
                             else self.generate_form(c))
-                    for _k in range(_pb, len(self._current_stmt_routine_offsets)):
-                        _ro, _pv = self._current_stmt_routine_offsets[_k]
-                        self._current_stmt_routine_offsets[_k] = (_ins + _ro, _pv)
                     code.extend(_sub)
                     comparand_tv.append((1, 0))  # value now on the stack
                 else:
@@ -18668,7 +17085,7 @@ class ImprovedCodeGenerator:
         unconditionally TRUE (MDL: any FIX, even 0, is true; only FALSE is
         false) -- starcross PARSER's <AND <OR ...> <SET VAL 0>>."""
         if (isinstance(op, FormNode) and isinstance(op.operator, AtomNode)
-                and op.operator.value.upper() in ('SET', 'SETG')
+                and op.operator.upper in ('SET', 'SETG')
                 and len(op.operands) == 2
                 and isinstance(op.operands[1], NumberNode)):
             return op.operands[1].value
@@ -19500,13 +17917,9 @@ class ImprovedCodeGenerator:
         scratch_n = 0
         for i, o in enumerate(operands):
             if isinstance(o, (FormNode, CondNode)):
-                before = len(self._current_stmt_routine_offsets)
                 insert = len(code)
                 expr = (self.generate_form(o) if isinstance(o, FormNode)
                         else self.generate_cond(o))
-                for k in range(before, len(self._current_stmt_routine_offsets)):
-                    rel, ph = self._current_stmt_routine_offsets[k]
-                    self._current_stmt_routine_offsets[k] = (insert + rel, ph)
                 code.extend(expr)
                 if i != exprs[-1]:
                     scratch_n += 1
@@ -19660,52 +18073,26 @@ class ImprovedCodeGenerator:
         """
         code = bytearray()
 
-        # Track accumulated offset for placeholder position adjustment.
-        # This is the offset within the COND bytecode where code will be placed.
-        accumulated_offset = 0
-
         # First pass: generate all clause code WITHOUT branch offsets
         clause_data = []
         for i, (condition, actions) in enumerate(cond.clauses):
-            # Offset this clause's test is ASSUMED to start at (before third-pass
-            # 2-byte-branch / NOP-padding growth). The fourth pass re-adjusts each
-            # clause's placeholders by (actual start - this assumed start) so the
-            # position-blind assembler patches routine/vocab refs at the RIGHT bytes.
-            clause_start_off = accumulated_offset
             # Check if this is the T (else) clause - can be T or ELSE
-            is_t_clause = isinstance(condition, AtomNode) and condition.value.upper() in ('T', 'ELSE')
+            is_t_clause = isinstance(condition, AtomNode) and condition.upper in ('T', 'ELSE')
 
             # Generate the condition test (without proper offset yet)
             test_code = bytearray()
             test_size = 0
             _test_meta = []
-            test_ph_start = len(self._current_stmt_routine_offsets)
             if not is_t_clause:
-                # Track placeholder count before generating test code
-                test_placeholder_count_before = len(self._current_stmt_routine_offsets)
-
                 test_code = bytearray(self.generate_condition_test(condition, branch_on_false=True))
                 _test_meta = [dict(_m) for _m in (getattr(self, '_last_test_meta', None) or ())]
                 test_size = len(test_code)
 
-                # Adjust any test code placeholders to be relative to COND start
-                for k in range(test_placeholder_count_before, len(self._current_stmt_routine_offsets)):
-                    rel_offset, placeholder_val = self._current_stmt_routine_offsets[k]
-                    self._current_stmt_routine_offsets[k] = (accumulated_offset + rel_offset, placeholder_val)
-            test_ph_end = len(self._current_stmt_routine_offsets)
-
-            # Actions will start after test_code
-            actions_start_offset = accumulated_offset + test_size
-            action_ph_start = len(self._current_stmt_routine_offsets)
-
             # Generate actions for this clause
             actions_code = bytearray()
             for j, action in enumerate(actions):
                 is_last_action = (j == len(actions) - 1)
 
-                # Track placeholder count before generating action
-                placeholder_count_before = len(self._current_stmt_routine_offsets)
-
                 if value_context and is_last_action and isinstance(action, CondNode):
                     action_code = self.generate_cond(action, value_context=True, tail=tail)
                 elif discard or not is_last_action:
@@ -19718,20 +18105,13 @@ class ImprovedCodeGenerator:
                     self._tail_hint_ops = None
                     if (tail and value_context and isinstance(action, FormNode)
                             and isinstance(action.operator, AtomNode)
-                            and action.operator.value.upper() in ('TELL', 'PRINTI')):
+                            and action.operator.upper in ('TELL', 'PRINTI')):
                         self._tail_hint_ops = id(action.operands)
                     try:
                         action_code = self.generate_statement(action)
                     finally:
                         self._tail_hint_ops = None
 
-                # Adjust any new placeholder offsets to be relative to COND start
-                # The action's code will be placed at actions_start_offset + len(actions_code)
-                action_insert_offset = actions_start_offset + len(actions_code)
-                for k in range(placeholder_count_before, len(self._current_stmt_routine_offsets)):
-                    rel_offset, placeholder_val = self._current_stmt_routine_offsets[k]
-                    self._current_stmt_routine_offsets[k] = (action_insert_offset + rel_offset, placeholder_val)
-
                 if is_last_action and len(action_code) == 0 and not discard:
                     # Last action is a value that doesn't generate code (number, atom)
                     # Push the value to stack using ADD 0 val -> stack
@@ -19815,7 +18195,7 @@ class ImprovedCodeGenerator:
                     # If this is the last action and it's a void operation,
                     # push 0 to ensure COND always has a value on the stack
                     if is_last_action and isinstance(action, FormNode):
-                        op_name = action.operator.value.upper() if isinstance(action.operator, AtomNode) else ''
+                        op_name = action.operator.upper if isinstance(action.operator, AtomNode) else ''
                         # Known void operations that don't push a value
                         void_ops = {
                             'PRINTI', 'PRINT', 'PRINTR', 'PRINTC', 'PRINTB', 'PRINTD',
@@ -19881,7 +18261,7 @@ class ImprovedCodeGenerator:
             if (_lip and len(actions) >= 2
                     and isinstance(actions[-1], FormNode)
                     and isinstance(actions[-1].operator, AtomNode)
-                    and actions[-1].operator.value.upper() == 'RTRUE'
+                    and actions[-1].operator.upper == 'RTRUE'
                     and not actions[-1].operands
                     and self._action_is_print_crlf(actions[-2])):
                 _sig = bytes([0xB2]) + _lip + bytes([0xBB, 0xB0])
@@ -19925,7 +18305,7 @@ class ImprovedCodeGenerator:
                         actions_code.extend([0x8B, _hi, _lo])
                         _converted = True
                 elif isinstance(_last_a, FormNode) and isinstance(_last_a.operator, AtomNode):
-                    _opn = _last_a.operator.value.upper()
+                    _opn = _last_a.operator.upper
                     if _opn == 'RTRUE' or (len(action_code) > 0 and _p3 == b'\xb0'):
                         pass
                     _setg_tn = None
@@ -19980,26 +18360,14 @@ class ImprovedCodeGenerator:
                 if not _converted:
                     actions_code.append(0xB8)  # RET_POPPED
 
-            action_ph_end = len(self._current_stmt_routine_offsets)
             clause_data.append({
                 'is_t_clause': is_t_clause,
                 'test_code': test_code,
                 'test_meta': _test_meta,
                 'test_size': test_size,
                 'actions_code': actions_code,
-                # Placeholder bookkeeping for the fourth-pass re-adjustment.
-                'assumed_test_start': clause_start_off,
-                'assumed_actions_start': actions_start_offset,
-                'test_ph_range': (test_ph_start, test_ph_end),
-                'action_ph_range': (action_ph_start, action_ph_end),
             })
 
-            # Update accumulated_offset for next clause.
-            # Jump size is 3 bytes for non-T clauses (will be refined later, but
-            # this is sufficient for placeholder adjustment purposes).
-            jump_size_estimate = 0 if is_t_clause else 3
-            accumulated_offset += test_size + len(actions_code) + jump_size_estimate
-
         # Check if we need a default FALSE at the end (no T/ELSE clause)
         has_t_clause = clause_data and clause_data[-1]['is_t_clause']
         if tail:
@@ -20074,31 +18442,6 @@ class ImprovedCodeGenerator:
 
         # Fourth pass: generate with proper offsets (all sizes are now stable)
         for i, clause in enumerate(clause_data):
-            # Re-adjust this clause's routine/vocab placeholder positions to the
-            # bytes we're ACTUALLY about to emit. The first pass recorded them
-            # against an assumed layout (1-byte branches, no NOP padding); the third
-            # pass then grew earlier clauses' tests (2-byte branches) and actions
-            # (NOP padding), shifting every later placeholder. Without this fixup the
-            # position-blind assembler patches routine addresses into the wrong bytes
-            # -- e.g. growing PARSER's direction clause corrupted the following
-            # clause's SYNTAX-CHECK/SNARF-OBJECTS refs and the game went dark.
-            actual_test_start = len(code)
-            test_delta = actual_test_start - clause['assumed_test_start']
-            tps, tpe = clause['test_ph_range']
-            if test_delta:
-                for k in range(tps, tpe):
-                    rel, ph = self._current_stmt_routine_offsets[k]
-                    self._current_stmt_routine_offsets[k] = (rel + test_delta, ph)
-            # Actions start after the (possibly 2-byte) test code. Compute against the
-            # final test_size so a 2-byte branch's extra byte is accounted for.
-            actual_actions_start = actual_test_start + clause['test_size']
-            actions_delta = actual_actions_start - clause['assumed_actions_start']
-            aps, ape = clause['action_ph_range']
-            if actions_delta:
-                for k in range(aps, ape):
-                    rel, ph = self._current_stmt_routine_offsets[k]
-                    self._current_stmt_routine_offsets[k] = (rel + actions_delta, ph)
-
             # Fix the condition test branch offset
             if not clause['is_t_clause'] and clause['test_size'] > 0:
                 # Branch should jump to next clause if test fails
@@ -20194,26 +18537,20 @@ class ImprovedCodeGenerator:
             return False
         if isinstance(node, FormNode):
             op = node.operator
-            if isinstance(op, AtomNode) and op.value.upper() == 'QUOTE':
+            if isinstance(op, AtomNode) and op.upper == 'QUOTE':
                 return False
             return True
         return isinstance(node, (CondNode, RepeatNode))
 
     def _emit_cmp_operand_to_stack(self, node, code):
-        """Evaluate a nested comparand, pushing its value to the stack, with any
-        routine-address placeholder offsets rebased to the insertion point in
-        `code` (mirrors the FormNode arms elsewhere in the comparison emitters)."""
-        before = len(self._current_stmt_routine_offsets)
-        insert_pos = len(code)
+        """Evaluate a nested comparand, pushing its value to the stack (mirrors
+        the FormNode arms elsewhere in the comparison emitters)."""
         if isinstance(node, FormNode):
             expr = self.generate_form(node)
         elif isinstance(node, CondNode):
             expr = self.generate_cond(node)
         else:
             expr = self.generate_statement(node)
-        for k in range(before, len(self._current_stmt_routine_offsets)):
-            rel, ph = self._current_stmt_routine_offsets[k]
-            self._current_stmt_routine_offsets[k] = (insert_pos + rel, ph)
         code.extend(expr)
 
     def _resolve_two_cmp_operands(self, n1, n2, code):
@@ -20235,12 +18572,7 @@ class ImprovedCodeGenerator:
             return isinstance(n, (FormNode, CondNode))
 
         def emit(n):
-            before = len(self._current_stmt_routine_offsets)
-            insert_pos = len(code)
             expr = self.generate_form(n) if isinstance(n, FormNode) else self.generate_cond(n)
-            for k in range(before, len(self._current_stmt_routine_offsets)):
-                rel, ph = self._current_stmt_routine_offsets[k]
-                self._current_stmt_routine_offsets[k] = (insert_pos + rel, ph)
             code.extend(expr)
 
         if self._is_empty_false_form(n1):
@@ -20505,7 +18837,6 @@ class ImprovedCodeGenerator:
             if _bad_sub(o, _sbof):
                 return None
 
-        ph_all = len(self._current_stmt_routine_offsets)
         code = bytearray()
         subs = []
         for i, o in enumerate(ops):
@@ -20516,7 +18847,6 @@ class ImprovedCodeGenerator:
                 sub_bof = not branch_on_false
             else:
                 sub_bof = branch_on_false
-            ph_before = len(self._current_stmt_routine_offsets)
             if last and self._set_literal_number(o) is not None:
                 # ZILCH dialect quirk (mirrors gen_and/gen_or tails): a LAST
                 # operand <SET/SETG var <literal FIX>> is executed and is
@@ -20539,13 +18869,9 @@ class ImprovedCodeGenerator:
                 sub = self.generate_condition_test(o, branch_on_false=sub_bof)
             sub_meta = [dict(_m) for _m in (self._last_test_meta or ())]
             if not sub:
-                del self._current_stmt_routine_offsets[ph_all:]
                 self._last_test_meta = []
                 return None
             sub_start = len(code)
-            for k in range(ph_before, len(self._current_stmt_routine_offsets)):
-                rel, ph = self._current_stmt_routine_offsets[k]
-                self._current_stmt_routine_offsets[k] = (sub_start + rel, ph)
             for _m in sub_meta:
                 _m['pos'] += sub_start
             code.extend(sub)
@@ -20556,7 +18882,6 @@ class ImprovedCodeGenerator:
         # far below 0xF0, so no branch byte can land in a placeholder-scanner
         # band and no offset can overflow.
         if len(code) > 200:
-            del self._current_stmt_routine_offsets[ph_all:]
             self._last_test_meta = []
             return None
         # Decide each internally-patched final branch's size (1 or 2 bytes).
@@ -20584,8 +18909,8 @@ class ImprovedCodeGenerator:
                 s['off'] = None
                 s['bsize'] = 1     # caller-patched placeholder byte
             tail += (s['end'] - s['start']) + (s['bsize'] - 1)
-        # Rebuild the block with the chosen branch forms, remapping recorded
-        # placeholder positions and nested meta entries.
+        # Rebuild the block with the chosen branch forms, remapping nested
+        # meta entries.
         new_code = bytearray()
         for s in subs:
             new_start = len(new_code)
@@ -20604,11 +18929,6 @@ class ImprovedCodeGenerator:
                     new_code.append(off & 0xFF)
             else:
                 new_code.append(ph_byte)
-            if delta:
-                for k in range(ph_all, len(self._current_stmt_routine_offsets)):
-                    rel, ph = self._current_stmt_routine_offsets[k]
-                    if s['start'] <= rel < s['end']:
-                        self._current_stmt_routine_offsets[k] = (rel + delta, ph)
             for _m in s['meta']:
                 _m['pos'] += delta
                 if s['internal'] and s['bsize'] == 2:
@@ -20709,7 +19029,7 @@ class ImprovedCodeGenerator:
 
         # If condition is a form, it might be a comparison or test
         if isinstance(condition, FormNode):
-            op_name = condition.operator.value.upper() if isinstance(condition.operator, AtomNode) else ''
+            op_name = condition.operator.upper if isinstance(condition.operator, AtomNode) else ''
 
             # Handle FSET? (TEST_ATTR)
             if op_name == 'FSET?':
@@ -20759,13 +19079,7 @@ class ImprovedCodeGenerator:
 
                     # If first operand is a nested expression, evaluate it first
                     if isinstance(first_op, FormNode):
-                        placeholder_count_before = len(self._current_stmt_routine_offsets)
-                        insert_pos = len(code)
                         expr_code = self.generate_form(first_op)
-                        # Adjust placeholders for code being inserted
-                        for k in range(placeholder_count_before, len(self._current_stmt_routine_offsets)):
-                            rel_offset, placeholder_val = self._current_stmt_routine_offsets[k]
-                            self._current_stmt_routine_offsets[k] = (insert_pos + rel_offset, placeholder_val)
                         code.extend(expr_code)
                         op1_type = 1  # Variable (stack)
                         op1_val = 0   # Stack
@@ -20784,12 +19098,7 @@ class ImprovedCodeGenerator:
                             code.append(temp_global)  # store to temp global
                             op1_val = temp_global
                     elif isinstance(first_op, CondNode):
-                        placeholder_count_before = len(self._current_stmt_routine_offsets)
-                        insert_pos = len(code)
                         expr_code = self.generate_cond(first_op)
-                        for k in range(placeholder_count_before, len(self._current_stmt_routine_offsets)):
-                            rel_offset, placeholder_val = self._current_stmt_routine_offsets[k]
-                            self._current_stmt_routine_offsets[k] = (insert_pos + rel_offset, placeholder_val)
                         code.extend(expr_code)
                         op1_type = 1
                         op1_val = 0
@@ -20822,23 +19131,12 @@ class ImprovedCodeGenerator:
                         if len(group) == 1:
                             # Check if operand needs evaluation first
                             if isinstance(group[0], FormNode):
-                                placeholder_count_before = len(self._current_stmt_routine_offsets)
-                                insert_pos = len(code)
                                 expr_code = self.generate_form(group[0])
-                                # Adjust placeholders for code being inserted
-                                for k in range(placeholder_count_before, len(self._current_stmt_routine_offsets)):
-                                    rel_offset, placeholder_val = self._current_stmt_routine_offsets[k]
-                                    self._current_stmt_routine_offsets[k] = (insert_pos + rel_offset, placeholder_val)
                                 code.extend(expr_code)
                                 op2_type = 1  # Variable (stack)
                                 op2_val = 0   # Stack
                             elif isinstance(group[0], CondNode):
-                                placeholder_count_before = len(self._current_stmt_routine_offsets)
-                                insert_pos = len(code)
                                 expr_code = self.generate_cond(group[0])
-                                for k in range(placeholder_count_before, len(self._current_stmt_routine_offsets)):
-                                    rel_offset, placeholder_val = self._current_stmt_routine_offsets[k]
-                                    self._current_stmt_routine_offsets[k] = (insert_pos + rel_offset, placeholder_val)
                                 code.extend(expr_code)
                                 op2_type = 1
                                 op2_val = 0
@@ -21443,8 +19741,6 @@ class ImprovedCodeGenerator:
                 # its word scan at index 0 (GETWORD? 0 -> "I don't know the word").
                 # Evaluate the initializer onto the stack, then pop it into the
                 # loop variable.
-                ph_before = len(self._current_stmt_routine_offsets)
-                insert_pos = len(code)
                 if isinstance(init_value, FormNode):
                     # <> / empty form yields no value; leave the var at 0.
                     init_code = self.generate_form(init_value)
@@ -21464,11 +19760,6 @@ class ImprovedCodeGenerator:
                         push += bytes([0x3F, (ov >> 8) & 0xFF, ov & 0xFF])
                     init_code = bytes(push)
                 if init_code:
-                    # Re-base placeholder offsets recorded while generating the
-                    # initializer to its position in this REPEAT's code buffer.
-                    for k in range(ph_before, len(self._current_stmt_routine_offsets)):
-                        rel, ph = self._current_stmt_routine_offsets[k]
-                        self._current_stmt_routine_offsets[k] = (insert_pos + rel, ph)
                     code.extend(init_code)         # result now on the stack
                     code.append(0xE9)              # VAR pull ...
                     code.append(0x7F)              # ... one small-constant operand
@@ -21500,17 +19791,7 @@ class ImprovedCodeGenerator:
 
         # Generate body statements
         for stmt in repeat.body:
-            # Track placeholder count before generating statement
-            placeholder_count_before = len(self._current_stmt_routine_offsets)
-
             stmt_code = self._gen_discard_stmt(stmt)
-
-            # Adjust any new placeholder offsets to account for position in REPEAT
-            stmt_insert_offset = len(code)
-            for k in range(placeholder_count_before, len(self._current_stmt_routine_offsets)):
-                rel_offset, placeholder_val = self._current_stmt_routine_offsets[k]
-                self._current_stmt_routine_offsets[k] = (stmt_insert_offset + rel_offset, placeholder_val)
-
             code.extend(stmt_code)
 
         # Generate jump back to loop start
@@ -21643,11 +19924,6 @@ class ImprovedCodeGenerator:
             table_index = self._add_table(node)
             # Return a marker value that will be patched later
             # Use high byte 0xFF to indicate table reference
-            # Flag the emission so the ENCLOSING table gets registered for
-            # placeholder resolution (see get_tables_with_placeholders):
-            # zork1's <GLOBAL VILLAINS <LTABLE <TABLE TROLL ...> ...>> held
-            # unresolved 0xFFxx pointers and every HERO-BLOW missed.
-            self._emitted_nested_table_ptr = True
             return self._table_marker(table_index)
         return None
 
@@ -21672,7 +19948,7 @@ class ImprovedCodeGenerator:
                 and isinstance(node.operator, AtomNode)
                 and len(node.operands) == 1
                 and isinstance(node.operands[0], AtomNode)):
-            op = node.operator.value.upper()
+            op = node.operator.upper
             nm = node.operands[0].value
             if op in ('LVAL', '.'):
                 return self.locals.get(nm)
@@ -21793,17 +20069,17 @@ class ImprovedCodeGenerator:
                 if not isinstance(value, (list, tuple)) or not value:
                     continue
                 toks = list(value)
-                k0 = toks[0].value.upper() if isinstance(toks[0], AtomNode) else ''
+                k0 = toks[0].upper if isinstance(toks[0], AtomNode) else ''
                 if k0 != 'TO':
                     continue
                 if_i = next((i for i, t in enumerate(toks)
-                             if isinstance(t, AtomNode) and t.value.upper() == 'IF'),
+                             if isinstance(t, AtomNode) and t.upper == 'IF'),
                             None)
                 if if_i is None:
                     continue
                 # (... IF <door> IS OPEN) gates on an OBJECT flag (DEXIT), which
                 # stores an object number, not a variable number -- not a gate.
-                if any(isinstance(t, AtomNode) and t.value.upper() == 'IS'
+                if any(isinstance(t, AtomNode) and t.upper == 'IS'
                        for t in toks[if_i + 1:]):
                     continue
                 cond = toks[if_i + 1] if len(toks) > if_i + 1 else None
@@ -22096,7 +20372,6 @@ class ImprovedCodeGenerator:
         resolved = []  # (op_type, op_val) per argument
         for i, op in enumerate(arg_ops):
             if isinstance(op, (FormNode, CondNode, RepeatNode)):
-                before = len(self._current_stmt_routine_offsets)
                 insert_pos = len(code)
                 if isinstance(op, FormNode):
                     inner = self.generate_form(op)
@@ -22104,9 +20379,6 @@ class ImprovedCodeGenerator:
                     inner = self.generate_cond(op)
                 else:
                     inner = self.generate_repeat(op)
-                for k in range(before, len(self._current_stmt_routine_offsets)):
-                    rel, ph = self._current_stmt_routine_offsets[k]
-                    self._current_stmt_routine_offsets[k] = (insert_pos + rel, ph)
                 code.extend(inner)  # result now on the stack
                 if i == form_positions[-1]:
                     resolved.append((1, 0))  # variable 0 = stack (last stack arg)
@@ -22131,10 +20403,8 @@ class ImprovedCodeGenerator:
             # compiled build under the 256KB V4 cap.
             placeholder_val = self._get_routine_placeholder(routine_name)
             code.append(0x88)  # call_1s, large-constant operand
-            placeholder_offset = len(code)
             code.append((placeholder_val >> 8) & 0xFF)
             code.append(placeholder_val & 0xFF)
-            self._current_stmt_routine_offsets.append((placeholder_offset, placeholder_val))
             code.append(0x00)  # Store result to stack
             return bytes(code)
         # 4..7 args need CALL_VS2 (VAR:12, V4+; two operand-type bytes for up
@@ -22169,10 +20439,8 @@ class ImprovedCodeGenerator:
 
         # Use placeholder encoding for routine address
         placeholder_val = self._get_routine_placeholder(routine_name)
-        placeholder_offset = len(code)
         code.append((placeholder_val >> 8) & 0xFF)
         code.append(placeholder_val & 0xFF)
-        self._current_stmt_routine_offsets.append((placeholder_offset, placeholder_val))
 
         # Add operand values (from the resolved list)
         for i, (op_type, op_val) in enumerate(resolved):
@@ -22752,18 +21020,18 @@ class ImprovedCodeGenerator:
 
         code = bytearray()
 
-        # XPUSH is EXT opcode 0x18 (PUSH_STACK)
-        code.append(0xBE)  # EXT marker
-        code.append(0x18)  # PUSH_STACK
-
         # Evaluate nested FormNode/CondNode operands -- _get_operand_type_and_value
         # returns "stack" for a form WITHOUT emitting its code, so e.g.
         # <GETP <LOC ,WINNER> ,P?ACTION> read a stale stack value (the M-END
         # hook APPLY'd object 1's action, so the CHALICE answered "Huh?" to
-        # every "open").
+        # every "open").  Their code goes before the instruction.
         op1_type, op1_val, op2_type, op2_val = self._resolve_two_cmp_operands(
             operands[0], operands[1], code)
 
+        # XPUSH is EXT opcode 0x18 (PUSH_STACK)
+        code.append(0xBE)  # EXT marker
+        code.append(0x18)  # PUSH_STACK
+
         # Type byte
         type1 = 0x01 if op1_type == 0 else 0x02
         type2 = 0x01 if op2_type == 0 else 0x02
@@ -22772,6 +21040,8 @@ class ImprovedCodeGenerator:
 
         code.append(op1_val & 0xFF)
         code.append(op2_val & 0xFF)
+        # PUSH_STACK branches when the push succeeds: 1 if pushed, else 0
+        code.extend(self._compare_materialize_tail(1, 0))
 
         return bytes(code)
 
@@ -22885,16 +21155,11 @@ class ImprovedCodeGenerator:
         if self._is_empty_false_form(node):
             return (0, 0)
         if (isinstance(node, FormNode) and isinstance(node.operator, AtomNode)
-                and node.operator.value.upper() == 'QUOTE'):
+                and node.operator.upper == 'QUOTE'):
             return self._get_operand_type_and_value(node)
         if isinstance(node, (FormNode, CondNode)):
-            before = len(self._current_stmt_routine_offsets)
-            insert_pos = len(code)
             expr = (self.generate_form(node) if isinstance(node, FormNode)
                     else self.generate_cond(node, value_context=True))
-            for k in range(before, len(self._current_stmt_routine_offsets)):
-                rel, ph = self._current_stmt_routine_offsets[k]
-                self._current_stmt_routine_offsets[k] = (insert_pos + rel, ph)
             code.extend(expr)
             return (1, 0)  # stack
         return self._get_operand_type_and_value(node)
@@ -23422,7 +21687,7 @@ class ImprovedCodeGenerator:
             if isinstance(op, FormNode):
                 # QUOTE forms resolve inline to a constant - no code needed
                 if (isinstance(op.operator, AtomNode)
-                        and op.operator.value.upper() == 'QUOTE'):
+                        and op.operator.upper == 'QUOTE'):
                     return False
                 return True
             return False
@@ -23433,7 +21698,6 @@ class ImprovedCodeGenerator:
         resolved = []  # (op_type, op_val): op_type 2=variable, else constant
         for i, op in enumerate(all_ops):
             if needs_eval(op):
-                before = len(self._current_stmt_routine_offsets)
                 insert_pos = len(code)
                 if isinstance(op, FormNode):
                     inner = self.generate_form(op)
@@ -23441,9 +21705,6 @@ class ImprovedCodeGenerator:
                     inner = self.generate_cond(op, value_context=True)
                 else:
                     inner = self.generate_repeat(op)
-                for k in range(before, len(self._current_stmt_routine_offsets)):
-                    rel, ph = self._current_stmt_routine_offsets[k]
-                    self._current_stmt_routine_offsets[k] = (insert_pos + rel, ph)
                 code.extend(inner)  # result now on the stack
                 if i == eval_positions[-1]:
                     resolved.append((2, 0))  # variable 0 = stack (last one)
@@ -24628,38 +22889,24 @@ class ImprovedCodeGenerator:
     def gen_held(self, operands: List[ASTNode]) -> bytes:
         """Generate HELD? (test if object is held by player).
 
-        Tests if object's parent is WINNER (the player/adventurer).
+        Tests if object's parent is the holder, WINNER (the player/adventurer)
+        by default.
         Equivalent to: <IN? object ,WINNER>
 
         Args:
             operands[0]: object to test
+            operands[1]: holder (optional, default ,WINNER)
 
         Returns:
-            bytes: Z-machine code (GET_PARENT + JE with WINNER)
+            bytes: Z-machine code (JIN, as IN? generates it)
         """
-        if not operands:
-            return b''
-
-        # HELD? is equivalent to <IN? object ,WINNER>
-        # We need to get the WINNER global variable
-        winner_var = self.globals.get('WINNER', 1)  # Default to 1 if not defined
-
-        code = bytearray()
-        obj = self.get_operand_value(operands[0])
-
-        if isinstance(obj, int):
-            # GET_PARENT is 1OP opcode 0x03
-            code.append(0x83)  # Short form, small constant
-            code.append(obj & 0xFF)
-            code.append(0x00)  # Store result to stack
-
-            # JE (test equality with WINNER) is 2OP opcode 0x01
-            code.append(0x41)  # Long form, opcode 0x01
-            code.append(0x00)  # Stack (result from GET_PARENT)
-            code.append(winner_var & 0xFF)  # WINNER global
-            # Branch offset would be added during COND processing
-
-        return bytes(code)
+        if len(operands) not in (1, 2):
+            raise ValueError("HELD? requires 1 or 2 operands")
+        if len(operands) == 2:
+            return self.gen_in(operands)
+        if 'WINNER' not in self.globals:
+            raise ValueError("HELD? requires a WINNER global")
+        return self.gen_in([operands[0], GlobalVarNode('WINNER')])
 
     def gen_igrtr(self, operands: List[ASTNode]) -> bytes:
         """Generate IGRTR? (increment variable and test if greater).
@@ -24789,12 +23036,12 @@ class ImprovedCodeGenerator:
             expr = (self.generate_form(operand) if isinstance(operand, FormNode)
                     else self.generate_cond(operand))
             code.extend(expr)
-            code.extend([0x97, 100, 0x00])       # RANDOM 100 -> stack (1OP small)
+            code.extend([0xE7, 0x7F, 100, 0x00])  # RANDOM 100 -> stack (VAR:7)
             # JG rand(top), percentage: long form var,var = 0x63
             code.extend([0x63, 0x00, 0x00])
         else:
             op_type, op_val = self._get_operand_type_and_value(operand)
-            code.extend([0x97, 100, 0x00])       # RANDOM 100 -> stack
+            code.extend([0xE7, 0x7F, 100, 0x00])  # RANDOM 100 -> stack
             if op_type == 0:
                 code.extend([0x43, 0x00, op_val & 0xFF])   # JG stack, small const
             else:
@@ -25222,7 +23469,7 @@ class ImprovedCodeGenerator:
             if global_name not in self.globals:
                 self._alloc_hard_or_raise(global_name)
                 # Store placeholder for table address (self._table_marker(table_idx))
-                self.global_values[global_name] = self._table_marker(table_idx); self.__dict__.setdefault('_tbl_marker_globals', set()).add(global_name)
+                self._set_global_table(global_name, table_idx)
 
             global_num = self.globals[global_name]
 
@@ -25404,7 +23651,7 @@ class ImprovedCodeGenerator:
         # Handle QUOTE FormNode - extract the quoted list
         if isinstance(operand, FormNode):
             if isinstance(operand.operator, AtomNode):
-                op_name = operand.operator.value.upper()
+                op_name = operand.operator.upper
                 if op_name == 'QUOTE':
                     # Extract the quoted content
                     if operand.operands:
@@ -25440,7 +23687,7 @@ class ImprovedCodeGenerator:
 
         # Handle AtomNode '<>' or similar
         if isinstance(operand, AtomNode):
-            if operand.value.upper() in ('', '<>', 'FALSE'):
+            if operand.upper in ('', '<>', 'FALSE'):
                 return None
             # Bare atom - error
             raise ValueError(
@@ -25510,7 +23757,7 @@ class ImprovedCodeGenerator:
             # Check for flags like (PURE), (BYTE), (STRING), (PARSER-TABLE), (PATTERN ...)
             if isinstance(op, FormNode):
                 if isinstance(op.operator, AtomNode):
-                    flag_name = op.operator.value.upper()
+                    flag_name = op.operator.upper
                     if flag_name == 'PURE':
                         is_pure = True
                         continue
@@ -25531,7 +23778,7 @@ class ImprovedCodeGenerator:
                             element_pattern = self._parse_table_pattern(op.operands)
                         continue
             elif isinstance(op, AtomNode):
-                flag_name = op.value.upper()
+                flag_name = op.upper
                 if flag_name == 'PURE':
                     is_pure = True
                     continue
@@ -25605,7 +23852,7 @@ class ImprovedCodeGenerator:
         if global_name not in self.globals:
             self.globals[global_name] = self.next_global
             # Store placeholder for table address (self._table_marker(table_idx))
-            self.global_values[global_name] = self._table_marker(table_idx); self.__dict__.setdefault('_tbl_marker_globals', set()).add(global_name)
+            self._set_global_table(global_name, table_idx)
             self.next_global += 1
 
         global_num = self.globals[global_name]
@@ -25700,30 +23947,6 @@ class ImprovedCodeGenerator:
         _, impure_size, _ = self._get_sorted_tables()
         return impure_size
 
-    def get_tables_with_placeholders(self) -> List[Tuple[int, int]]:
-        """Get byte ranges in table data that contain table address placeholders.
-
-        Tables like _VERBS contain self._table_marker(table_idx) placeholders that need to
-        be resolved to actual addresses. Other tables may contain user data with
-        0xFF bytes that should NOT be treated as placeholders.
-
-        Returns:
-            List of (start, end) byte offsets within combined table data
-        """
-        sorted_tables, _, _ = self._get_sorted_tables()
-        result = []
-        offset = 0
-        for _, table_name, data, _, _ in sorted_tables:
-            # _VERBS and _VWORD_* tables contain table address placeholders,
-            # as does any table that embedded a nested anonymous <TABLE ...>
-            # (e.g. _GLOBAL_VILLAINS).
-            # Note: _VERB_DATA_* tables do NOT - they contain literal values like -1
-            if (table_name == '_VERBS' or table_name.startswith('_VWORD_')
-                    or table_name in getattr(self, '_tables_with_nested_ptrs', ())):
-                result.append((offset, offset + len(data)))
-            offset += len(data)
-        return result
-
     def get_tchars_table_idx(self) -> Optional[int]:
         """Get the table index for TCHARS constant, if defined.
 
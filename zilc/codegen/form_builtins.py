@@ -0,0 +1,408 @@
+"""
+Builtin forms of the code generator, declared as data.
+
+Each Builtin names the ZIL operators it implements, the generator method
+that emits their code, and the checks made before it runs: operand count,
+minimum Z-machine version.  form_handlers binds the table to one
+ImprovedCodeGenerator, once, giving a handler per operator name;
+generate_form looks the operator up there after the user-routine shadowing
+and _Z_PRIM_ALIASES renaming, instead of testing the names one by one.
+
+A name is listed once.  Operators that need more than a call with the
+operand list have small _gen_*_form methods on the generator.
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class Builtin:
+    """One builtin: its operator names and how to generate it.
+
+    method       -- generator method name; None emits no code
+    arity        -- (min, max) operand count, max None for no limit
+    min_version  -- lowest Z-machine version it exists in
+    keywords     -- extra keyword arguments for the method
+    call         -- what the method is passed: 'operands', 'form' or 'none'
+    quits_in_go  -- in routine GO, generate QUIT instead
+    library      -- a routine of this name in the program is called instead
+                    (PERFORM and the daemon routines of the library)
+    """
+    names: Tuple[str, ...]
+    method: Optional[str]
+    arity: Optional[Tuple[int, Optional[int]]] = None
+    min_version: int = 0
+    keywords: Dict[str, Any] = field(default_factory=dict)
+    call: str = 'operands'
+    quits_in_go: bool = False
+    library: bool = False
+
+    def bind(self, generator, name: str) -> Callable:
+        """Handler for operator `name`: form -> generated code."""
+        method = getattr(generator, self.method) if self.method else None
+        if (self.call == 'operands' and method is not None
+                and self.arity is None and not self.min_version
+                and not self.keywords and not self.quits_in_go
+                and not self.library):
+            return lambda form: method(form.operands)
+
+        arity, min_version, keywords = self.arity, self.min_version, self.keywords
+        call, quits_in_go, library = self.call, self.quits_in_go, self.library
+
+        def handler(form):
+            operands = form.operands
+            if min_version and generator.version < min_version:
+                raise ValueError(f"{name} requires V{min_version} or later")
+            if arity is not None:
+                low, high = arity
+                if len(operands) < low or (high is not None and len(operands) > high):
+                    raise ValueError(_arity_message(name, low, high))
+            if library and name in getattr(generator, '_routine_names', ()):
+                return generator.gen_routine_call(name, operands)
+            if quits_in_go and generator._current_routine == "GO":
+                return generator.gen_quit()
+            if method is None:
+                return b''
+            if call == 'form':
+                return method(form)
+            if call == 'none':
+                return method()
+            return method(operands, **keywords)
+        return handler
+
+
+def _arity_message(name: str, low: int, high: Optional[int]) -> str:
+    if high == 0:
+        return f"{name} takes no operands"
+    if low == high:
+        return f"{name} requires exactly {low} operand" + ('' if low == 1 else 's')
+    if high is None:
+        return f"{name} requires at least {low} operand" + ('' if low == 1 else 's')
+    return f"{name} requires {low}-{high} operands"
+
+
+BUILTIN_FORMS = (
+    # Control flow
+    # Returning from GO is undefined: there RTRUE/RFALSE/RFATAL become QUIT.
+    Builtin(('RTRUE',), 'gen_rtrue', arity=(0, 0), call='none', quits_in_go=True),
+    Builtin(('RFALSE',), 'gen_rfalse', arity=(0, 0), call='none', quits_in_go=True),
+    # <> is FALSE: as a value it is read by _get_operand_type_and_value, as a
+    # statement it is a no-op (it does NOT return from the routine).
+    Builtin(('<>',), None, arity=(0, 0)),
+    Builtin(('RFATAL',), 'gen_rfatal', arity=(0, 0), call='none', quits_in_go=True),
+    Builtin(('RETURN',), 'gen_return'),
+    Builtin(('QUIT',), 'gen_quit', arity=(0, 0), call='none'),
+    Builtin(('AGAIN',), 'gen_again'),
+    Builtin(('GOTO',), 'gen_goto'),
+    Builtin(('PROG',), 'gen_prog'),
+    Builtin(('REPEAT',), 'gen_repeat'),
+    Builtin(('BIND',), 'gen_bind'),
+    Builtin(('DO',), 'gen_do'),
+    Builtin(('MAP-CONTENTS',), 'gen_map_contents'),
+    Builtin(('MAP-DIRECTIONS',), 'gen_map_directions'),
+
+    # Output
+    Builtin(('TELL',), 'gen_tell'),
+    Builtin(('PRINT',), 'gen_tell', arity=(1, None)),
+    Builtin(('CRLF',), 'gen_newline', arity=(0, 0), call='none'),
+    Builtin(('PRINTN', 'PRINT-NUM'), 'gen_print_num'),
+    Builtin(('PRINTD',), 'gen_printobj', arity=(1, 1)),
+    Builtin(('PRINTC', 'PRINT-CHAR'), 'gen_print_char'),
+    Builtin(('PRINTB',), 'gen_printb'),
+    Builtin(('PRINTI',), 'gen_printi', arity=(1, 1)),
+    Builtin(('PRINTADDR',), 'gen_printaddr'),
+    Builtin(('STRING',), 'gen_string'),
+
+    # Variables
+    Builtin(('SET',), 'gen_set', keywords={'is_global': False}),
+    Builtin(('SETG',), 'gen_set', keywords={'is_global': True}),
+    Builtin(('INC',), 'gen_inc'),
+    Builtin(('DEC',), 'gen_dec'),
+    Builtin(('VALUE',), 'gen_value'),
+    Builtin(('LVAL',), 'gen_lval'),
+    Builtin(('GVAL',), 'gen_gval'),
+
+    # Arithmetic
+    Builtin(('+', 'ADD'), 'gen_add'),
+    Builtin(('-', 'SUB'), 'gen_sub'),
+    Builtin(('*', 'MUL'), 'gen_mul'),
+    Builtin(('/', 'DIV'), 'gen_div'),
+    Builtin(('MOD',), 'gen_mod'),
+    Builtin(('1+',), 'gen_add1'),
+    Builtin(('1-',), 'gen_sub1'),
+    Builtin(('MIN',), 'gen_min'),
+    Builtin(('MAX',), 'gen_max'),
+    Builtin(('ABS',), 'gen_abs'),
+    Builtin(('SOUND',), 'gen_sound'),
+    Builtin(('CLEAR',), 'gen_clear'),
+    Builtin(('ERASE',), 'gen_erase'),
+    Builtin(('SPLIT',), 'gen_split'),
+    Builtin(('SCREEN',), 'gen_screen'),
+    Builtin(('CURSET',), 'gen_curset'),
+    Builtin(('CURGET',), 'gen_get_cursor'),
+    Builtin(('HLIGHT',), 'gen_hlight'),
+    Builtin(('COLOR',), 'gen_color'),
+    Builtin(('FONT',), 'gen_font'),
+    Builtin(('INPUT',), 'gen_input_readchar'),
+    Builtin(('BUFOUT',), 'gen_bufout'),
+    Builtin(('UXOR',), 'gen_uxor'),
+    Builtin(('USL',), 'gen_usl'),
+    Builtin(('DIROUT',), 'gen_dirout'),
+    Builtin(('DIRIN',), 'gen_input_stream'),
+    Builtin(('PRINTOBJ',), 'gen_printobj'),
+    Builtin(('READ',), 'gen_read'),
+    Builtin(('MAPF',), 'gen_mapf'),
+    Builtin(('MAPT',), 'gen_mapt'),
+    Builtin(('MAPR',), 'gen_mapr'),
+
+    # Type system (MDL constructs)
+    Builtin(('NEWTYPE',), 'gen_newtype'),
+    Builtin(('CHTYPE',), 'gen_chtype'),
+    Builtin(('PRIMTYPE',), 'gen_primtype'),
+
+    # Comparison
+    Builtin(('=', 'EQUAL?', '==?', '=?'), 'gen_equal'),
+    Builtin(('L?', '<', 'LESS?'), 'gen_less'),
+    Builtin(('G?', '>', 'GRTR?'), 'gen_greater'),
+    Builtin(('ZERO?', '0?'), 'gen_zero_test'),
+    Builtin(('1?',), 'gen_one'),
+    Builtin(('ASSIGNED?',), 'gen_assigned'),
+    Builtin(('NOT?',), 'gen_not_predicate'),
+    Builtin(('TRUE?', 'T?'), 'gen_true_predicate'),
+    Builtin(('FALSE?', 'F?'), 'gen_false_predicate'),
+    Builtin(('IGRTR?',), 'gen_igrtr'),
+    Builtin(('DLESS?',), 'gen_dless'),
+    Builtin(('CHECKU',), 'gen_checku'),
+    Builtin(('LEXV',), 'gen_lexv'),
+    Builtin(('G=?', 'GEQ?', '>='), 'gen_grtr_or_equal'),
+    Builtin(('L=?', 'LEQ?', '<='), 'gen_less_or_equal'),
+    Builtin(('N=?', 'N==?', 'NEQUAL?', '!='), 'gen_nequal'),
+    Builtin(('ZGET',), 'gen_zget'),
+    Builtin(('ZPUT',), 'gen_zput'),
+    Builtin(('ORIGINAL?',), 'gen_original'),
+    Builtin(('TEST-BIT',), 'gen_test_bit'),
+    Builtin(('WINSIZE',), 'gen_winsize'),
+    Builtin(('FIRST',), 'gen_first'),
+    Builtin(('MEMBER',), 'gen_member'),
+    Builtin(('MEMQ',), 'gen_memq'),
+    Builtin(('GETB2',), 'gen_getb2'),
+    Builtin(('PUTB2',), 'gen_putb2'),
+    Builtin(('GETW2',), 'gen_getw2'),
+    Builtin(('PUTW2',), 'gen_putw2'),
+    Builtin(('LOWCORE',), 'gen_lowcore'),
+    Builtin(('LOWCORE-TABLE',), 'gen_lowcore_table'),
+    Builtin(('SCREEN-HEIGHT',), 'gen_screen_height'),
+    Builtin(('SCREEN-WIDTH',), 'gen_screen_width'),
+    Builtin(('ASR',), 'gen_asr'),
+    Builtin(('NEW-LINE',), 'gen_new_line'),
+    Builtin(('CATCH',), 'gen_catch'),
+    Builtin(('THROW',), 'gen_throw'),
+    Builtin(('SPACES',), 'gen_spaces'),
+    Builtin(('BACK',), 'gen_back'),
+    Builtin(('DISPLAY',), 'gen_display'),
+    Builtin(('SCORE',), 'gen_score'),
+    Builtin(('CHRSET',), 'gen_chrset'),
+    Builtin(('MARGIN',), 'gen_margin'),
+    Builtin(('WINGET',), 'gen_winget'),
+    Builtin(('WINPUT',), 'gen_winput'),
+    Builtin(('WINATTR',), 'gen_winattr'),
+    Builtin(('WINPOS',), 'gen_winpos'),
+    Builtin(('SET-COLOUR',), 'gen_set_colour'),
+    Builtin(('SET-TRUE-COLOUR',), 'gen_set_true_colour'),
+    Builtin(('ERASE-WINDOW',), 'gen_erase_window'),
+    Builtin(('SPLIT-WINDOW',), 'gen_split_window'),
+    Builtin(('SET-WINDOW',), 'gen_set_window'),
+    Builtin(('SET-FONT',), 'gen_font'),
+    Builtin(('BUFFER-MODE',), 'gen_bufout'),
+    Builtin(('SET-CURSOR',), 'gen_curset'),
+    Builtin(('GET-CURSOR',), 'gen_get_cursor'),
+    Builtin(('SET-TEXT-STYLE',), 'gen_hlight'),
+    Builtin(('ERASE-LINE',), 'gen_erase_line'),
+    Builtin(('MOVE-WINDOW',), 'gen_move_window'),
+    Builtin(('WINDOW-SIZE',), 'gen_window_size'),
+    Builtin(('WINDOW-STYLE',), 'gen_winattr'),
+    Builtin(('SCROLL-WINDOW', 'SCROLL'), 'gen_scroll_window'),
+    Builtin(('PICINF',), 'gen_picinf'),
+    Builtin(('PICSET',), 'gen_picset'),
+    Builtin(('MOUSE-INFO',), 'gen_mouse_info'),
+    Builtin(('MOUSE-LIMIT',), 'gen_mouse_limit'),
+    Builtin(('MENU',), 'gen_make_menu'),
+    Builtin(('PRINTF',), 'gen_print_form'),
+    Builtin(('TYPE?',), 'gen_type'),
+    Builtin(('PRINTTYPE',), 'gen_printtype'),
+    Builtin(('PRINTT',), 'gen_printt', arity=(2, 4), min_version=5),
+    Builtin(('PRINTR',), '_gen_printr_form', arity=(1, 1)),
+    Builtin(('FSTACK',), 'gen_fstack'),
+    Builtin(('RSTACK',), 'gen_rstack'),
+    Builtin(('IFFLAG',), 'gen_ifflag'),
+    Builtin(('LOG-SHIFT',), 'gen_log_shift'),
+    Builtin(('XOR', 'XORB'), 'gen_xor'),
+    Builtin(('MUSIC',), 'gen_music'),
+    Builtin(('VOLUME',), 'gen_volume'),
+    Builtin(('COPYT',), 'gen_copyt'),
+    Builtin(('COPY-TABLE',), 'gen_copyt'),
+    Builtin(('ZERO',), 'gen_zero'),
+    Builtin(('ZERO-TABLE',), 'gen_zero'),
+    Builtin(('SHIFT',), 'gen_shift'),
+    Builtin(('ASH', 'ASHIFT', 'ART-SHIFT'), 'gen_art_shift'),
+    Builtin(('LSH',), 'gen_shift'),
+
+    # V5+ Unicode operations
+    Builtin(('PRINT-UNICODE',), 'gen_print_unicode'),
+    Builtin(('PRINTU',), 'gen_print_unicode', arity=(1, 1), min_version=5),
+    Builtin(('CHECK-UNICODE',), 'gen_check_unicode'),
+
+    # Table searching
+    Builtin(('INTBL?',), 'gen_intbl'),
+    Builtin(('IN-TABLE?',), 'gen_intbl'),
+    Builtin(('SCAN-TABLE',), 'gen_intbl'),
+    Builtin(('CHECK',), 'gen_check'),
+
+    # Picture operations (V6)
+    Builtin(('DRAW-PICTURE',), 'gen_draw_picture'),
+    Builtin(('ERASE-PICTURE',), 'gen_erase_picture'),
+    Builtin(('PICTURE-TABLE',), 'gen_picture_table'),
+
+    # Logical
+    Builtin(('AND',), 'gen_and'),
+    Builtin(('OR',), 'gen_or'),
+    Builtin(('AND?',), 'gen_and_pred'),
+    Builtin(('OR?',), 'gen_or_pred'),
+    Builtin(('NOT',), 'gen_not'),
+    Builtin(('BCOM',), 'gen_bcom'),
+    Builtin(('BAND', 'ANDB'), 'gen_band'),
+    Builtin(('BOR', 'ORB'), 'gen_bor'),
+    Builtin(('BTST',), 'gen_btst'),
+    Builtin(('RSH',), 'gen_rsh'),
+
+    # Objects
+    Builtin(('FSET',), 'gen_fset'),
+    Builtin(('FCLEAR',), 'gen_fclear'),
+    Builtin(('FSET?',), 'gen_fset_test'),
+    Builtin(('MOVE',), 'gen_move'),
+    Builtin(('REMOVE',), 'gen_remove'),
+    Builtin(('LOC',), 'gen_loc'),
+
+    # Properties
+    Builtin(('GETP',), 'gen_getp'),
+    Builtin(('PUTP',), 'gen_putp'),
+    Builtin(('PTSIZE',), 'gen_ptsize'),
+    Builtin(('NEXTP',), 'gen_nextp'),
+    Builtin(('GETPT',), 'gen_getpt'),
+
+    # Conditionals (these create branch instructions)
+    Builtin(('COND',), '_gen_cond_form', call='form'),
+
+    # Memory operations
+    Builtin(('LOADW',), 'gen_loadw'),
+    Builtin(('LOADB',), 'gen_loadb'),
+    Builtin(('STOREW',), 'gen_storew'),
+    Builtin(('STOREB',), 'gen_storeb'),
+
+    # Table operations (higher-level)
+    Builtin(('GET',), 'gen_get'),
+    Builtin(('PUT',), 'gen_put'),
+    Builtin(('GETB',), 'gen_getb'),
+    Builtin(('PUTB',), 'gen_putb'),
+    Builtin(('LENGTH',), 'gen_length'),
+    Builtin(('NTH',), 'gen_nth'),
+
+    # Stack operations
+    Builtin(('PUSH',), 'gen_push'),
+    Builtin(('PULL',), 'gen_pull'),
+    Builtin(('POP',), 'gen_pop'),
+    Builtin(('XPUSH',), 'gen_xpush'),
+
+    # Object tree
+    Builtin(('GET-CHILD', 'FIRST?'), 'gen_get_child'),
+    Builtin(('GET-SIBLING', 'NEXT?'), 'gen_get_sibling'),
+    Builtin(('GET-PARENT',), 'gen_get_parent'),
+    Builtin(('EMPTY?',), 'gen_empty'),
+    Builtin(('IN?',), 'gen_in'),
+    Builtin(('HELD?',), 'gen_held'),
+
+    # Random and utilities
+    Builtin(('RANDOM',), 'gen_random'),
+    Builtin(('PROB',), 'gen_prob'),
+    Builtin(('PICK-ONE',), 'gen_pick_one'),
+    Builtin(('RESTART',), 'gen_restart', arity=(0, 0), call='none'),
+    Builtin(('SAVE',), 'gen_save'),
+    Builtin(('RESTORE',), 'gen_restore'),
+    Builtin(('VERIFY',), 'gen_verify', arity=(0, 0), call='none'),
+
+    # Parser predicates
+    Builtin(('VERB?',), 'gen_verb_test'),
+    # Classic-game MULTIFROB macros, handled as builtins (like VERB?): see
+    # ImprovedCodeGenerator._gen_parser_eq_form and _gen_rarg_form.
+    Builtin(('PRSO?',), '_gen_parser_eq_form', keywords={'global_name': 'PRSO'}),
+    Builtin(('PRSI?',), '_gen_parser_eq_form', keywords={'global_name': 'PRSI'}),
+    Builtin(('ROOM?', 'HERE?'), '_gen_parser_eq_form', keywords={'global_name': 'HERE'}),
+    Builtin(('WINNER?',), '_gen_parser_eq_form', keywords={'global_name': 'WINNER'}),
+    Builtin(('RARG?', 'CONTEXT?'), '_gen_rarg_form'),
+    # A PERFORM routine (the game's own, or the injected standard-library
+    # fallback) runs the full action chain; gen_perform is only a stub for
+    # toy games with no PERFORM.  Likewise the daemon routines below.
+    Builtin(('PERFORM',), 'gen_perform', library=True),
+    Builtin(('CALL',), 'gen_call'),
+    Builtin(('APPLY', 'ZAPPLY'), 'gen_apply'),
+
+    # Daemon/Interrupt system
+    Builtin(('QUEUE',), 'gen_queue', library=True),
+    Builtin(('INT',), 'gen_int', library=True),
+    Builtin(('DEQUEUE',), 'gen_dequeue', library=True),
+    Builtin(('ENABLE',), 'gen_enable', library=True),
+    Builtin(('DISABLE',), 'gen_disable', library=True),
+
+    # List/table operations
+    Builtin(('REST',), 'gen_rest'),
+    Builtin(('ZREST',), 'gen_rest'),
+
+    # Game control
+    Builtin(('JIGS-UP',), 'gen_jigs_up'),
+
+    # Parser/lexer operations (V5+ aliases)
+    Builtin(('LEX',), 'gen_tokenise'),
+    Builtin(('PARSE',), 'gen_tokenise'),
+    Builtin(('TOKENIZE',), 'gen_tokenise'),
+
+    # Extended call forms (V5+)
+    Builtin(('CALL-VS2',), 'gen_call_vs2'),
+    Builtin(('CALL-VN2',), 'gen_call_vn2'),
+    Builtin(('CALL-1S',), 'gen_call_1s'),
+    Builtin(('CALL-1N',), 'gen_call_1n'),
+    Builtin(('CALL-2S',), 'gen_call_2s'),
+    Builtin(('CALL-2N',), 'gen_call_2n'),
+
+    # Undo operations (V5+)
+    Builtin(('SAVE-UNDO',), 'gen_save_undo'),
+    Builtin(('RESTORE-UNDO',), 'gen_restore_undo'),
+    Builtin(('ISAVE',), 'gen_save_undo'),
+    Builtin(('IRESTORE',), 'gen_restore_undo'),
+    Builtin(('ZWSTR',), 'gen_zwstr'),
+
+    # Table operations
+    Builtin(('TABLE',), 'gen_table', keywords={'table_type': 'TABLE'}),
+    Builtin(('LTABLE',), 'gen_table', keywords={'table_type': 'LTABLE'}),
+    Builtin(('ITABLE',), 'gen_table', keywords={'table_type': 'ITABLE'}),
+    Builtin(('PTABLE',), 'gen_table', keywords={'table_type': 'PTABLE'}),
+
+    # QUOTE form - returns its argument unevaluated.  In ZIL, 'EXPR becomes
+    # <QUOTE EXPR>; as a value it is read by _get_operand_type_and_value, as
+    # a statement it has no effect.
+    Builtin(('QUOTE',), None),
+
+    # VOC form - vocabulary word placeholder
+    Builtin(('VOC',), 'gen_voc'),
+)
+
+
+def form_handlers(generator) -> Dict[str, Callable]:
+    """Operator name -> handler for every builtin, bound to `generator`."""
+    handlers: Dict[str, Callable] = {}
+    for builtin in BUILTIN_FORMS:
+        for name in builtin.names:
+            if name in handlers:
+                raise ValueError(f"builtin {name} is declared twice")
+            handlers[name] = builtin.bind(generator, name)
+    return handlers
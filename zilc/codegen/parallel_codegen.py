@@ -0,0 +1,395 @@
+"""
+Parallel routine code generation (ImprovedCodeGenerator.jobs > 1).
+
+By the time generate() reaches the routines, the globals, constants, flags,
+properties, objects and tables are in place, and most routines compile
+without changing any of it: they only add placeholders (routine calls,
+string operands, TELL strings, vocab words) and strings, numbered first come
+first served.  _compile_routine() returns a relocatable RoutineObject whose
+bytes do not depend on where earlier routines were placed, so routines can
+be compiled out of order as long as that numbering is put right.
+
+All routines but the last are split into chunks and compiled by a pool of
+forked workers, which inherit the generator as it stands before the first
+routine.  A worker records what each routine added to the shared tables (its
+Registrations) and what it printed.  A routine that changes anything else --
+allocates a global, builds a table, records an error, raises -- is rolled
+back in the worker and sent back as None.
+
+The parent links the routines in source order.  For each one it replays the
+registrations, numbering new placeholders as the sequential loop would,
+rewrites the marked markers in the code to those numbers and places the
+routine with _link_routine().  A routine sent back as None is compiled in
+the parent instead, in its turn, so it sees the state the sequential loop
+gives it; so is one whose numbering cannot be replayed (a placeholder band
+would overflow), with the rest of its chunk.  The last routine is always
+compiled here, which leaves the per-routine state behind as the sequential
+loop does.  The code, marks and tables that result are the sequential ones,
+byte for byte.
+
+Workers must be forked: the generator holds the AST, the compiler and
+closures that cannot be pickled.  Where fork is unavailable, or this process
+is a daemonic pool worker (which may not have children), routines are
+compiled sequentially.
+"""
+
+import contextlib
+import io
+import multiprocessing
+import sys
+from typing import Dict, List, Optional
+
+from .routine_object import Registrations, RoutineObject
+
+# Fewer routines than this are compiled in this process: starting a pool
+# costs more than compiling a few routines.
+MIN_PARALLEL_ROUTINES = 16
+
+# Chunks per worker; more chunks balance uneven routine sizes.
+CHUNKS_PER_JOB = 4
+
+# (generator attribute, counter attribute, reverse map, Registrations field)
+# for each first-come placeholder family.  The forward map is value -> key.
+_PLACEHOLDERS = (
+    ('_routine_placeholders', '_next_placeholder_value',
+     '_routine_to_placeholder', 'routines'),
+    ('_string_operand_placeholders', '_next_string_operand_index',
+     '_string_operand_to_placeholder', 'string_operands'),
+    ('_tell_string_placeholders', '_next_tell_string_index',
+     '_tell_string_to_placeholder', 'tell_strings'),
+    ('_vocab_placeholders', '_next_vocab_placeholder_index',
+     '_vocab_word_to_index', 'vocab'),
+)
+
+# Generator attributes a routine may change without being rolled back:
+# per-routine working state (set up again by every routine before use),
+# the code section and what _link_routine() keeps, the placeholder tables
+# above and the tallies merged from Registrations.
+_ROUTINE_STATE = frozenset({
+    '_current_routine', '_current_routine_code', '_current_routine_activation',
+    '_current_stmt_vocab_emits',
+    '_routine_code_offset', '_pending_marks', 'locals', 'used_locals',
+    'routine_level_locals', 'routine_locals', 'max_local_slot',
+    'locals_with_side_effect_init', 'loop_stack', '_last_stmt_tail_cond',
+    '_last_test_meta', '_tail_hint_ops', '_tail_terminal', '_discard_prog_ops',
+    '_inline_ok_cache',
+    'code', 'routines', '_routine_body_dedup', '_code_marks',
+    '_routine_call_count', 'used_flags', 'used_properties', '_warnings',
+}) | frozenset(attr for family in _PLACEHOLDERS for attr in family[:3])
+
+# Compiler attributes replayed from Registrations.
+_COMPILER_REPLAYED = frozenset({'warnings'})
+
+# Registrations field (and mark key) -> the generator attribute it tallies.
+_MERGED = {'call_counts': '_routine_call_count', 'used_flags': 'used_flags',
+           'used_properties': 'used_properties'}
+
+_MISSING = object()
+
+# (generator, routines) for forked workers, set while a pool is running.
+_worker_state = None
+
+
+def generate_routines_parallel(gen, routines: List, jobs: int):
+    """Compile and place ``routines`` in order with up to ``jobs`` workers."""
+    if len(routines) <= MIN_PARALLEL_ROUTINES or not _can_fork():
+        for routine in routines:
+            gen.generate_routine(routine)
+        return
+    head = routines[:-1]
+    size = max(1, -(-len(head) // (jobs * CHUNKS_PER_JOB)))
+    chunks = [range(start, min(start + size, len(head)))
+              for start in range(0, len(head), size)]
+    global _worker_state
+    _worker_state = (gen, head)
+    try:
+        with multiprocessing.get_context('fork').Pool(min(jobs, len(chunks))) as pool:
+            results = pool.map(_compile_chunk, chunks)
+    except Exception:
+        # The pool itself failed: nothing was placed yet, so compile here.
+        results = [[None] * len(chunk) for chunk in chunks]
+    finally:
+        _worker_state = None
+
+    for chunk, objects in zip(chunks, results):
+        for n, (i, obj) in enumerate(zip(chunk, objects)):
+            if obj is None:
+                gen.generate_routine(head[i])
+            elif _replay(gen, obj):
+                head[i].aux_vars[:] = obj.aux_vars
+                gen._link_routine(obj)
+            else:
+                # What this routine added in the worker has no number here,
+                # and the rest of the chunk may use it.
+                for k in chunk[n:]:
+                    gen.generate_routine(head[k])
+                break
+    gen.generate_routine(routines[-1])
+
+
+def _can_fork() -> bool:
+    return ('fork' in multiprocessing.get_all_start_methods()
+            and not multiprocessing.current_process().daemon)
+
+
+# --- worker ---------------------------------------------------------------
+
+def _compile_chunk(chunk: range) -> List[Optional[RoutineObject]]:
+    """Worker: compile routines[chunk]; a RoutineObject with Registrations
+    for each, or None for one that must be compiled in the parent."""
+    gen, routines = _worker_state
+    shared = _Shared(gen)
+    start = shared.mark()
+    out = []
+    for i in chunk:
+        mark = shared.mark()
+        stdout, stderr = io.StringIO(), io.StringIO()
+        try:
+            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                obj = gen._compile_routine(routines[i])
+        except Exception:
+            obj = None
+        if obj is None or not shared.unchanged():
+            shared.rollback(mark)
+            out.append(None)
+            continue
+        obj.registrations = shared.registrations(mark)
+        obj.registrations.stdout = stdout.getvalue()
+        obj.registrations.stderr = stderr.getvalue()
+        obj.aux_vars = list(routines[i].aux_vars)
+        out.append(obj)
+    # A worker may be handed another chunk: that one starts where the
+    # parent's does, too.
+    shared.rollback(start)
+    return out
+
+
+class _Shared:
+    """The generator state a worker's routines share, as inherited from the
+    parent: what a routine may add to it and what it must leave alone."""
+
+    def __init__(self, gen):
+        self.gen = gen
+        self.compiler = gen.compiler
+        self.strings = gen.string_table
+        self.saved = self._save(gen, _ROUTINE_STATE)
+        self.saved_compiler = (self._save(self.compiler, _COMPILER_REPLAYED)
+                               if self.compiler is not None else {})
+        self.fingerprint = self._fingerprints()
+
+    @staticmethod
+    def _save(obj, skip) -> dict:
+        saved = {}
+        for name, value in vars(obj).items():
+            if name in skip:
+                continue
+            if isinstance(value, (dict, list, set, bytearray)):
+                value = value.copy()
+            saved[name] = value
+        return saved
+
+    @staticmethod
+    def _fingerprint(obj, saved, skip) -> tuple:
+        """Enough of each attribute to see that a routine changed it: the
+        length of a container, the value of a scalar, else the object."""
+        current = vars(obj)
+        out = []
+        for name in saved:
+            value = current.get(name, _MISSING)
+            if isinstance(value, (dict, list, set, bytearray, tuple, str)):
+                out.append(len(value))
+            elif value is None or isinstance(value, (bool, int, float)):
+                out.append(value)
+            else:
+                out.append(id(value))
+        out.append(len(current.keys() - skip))
+        return tuple(out)
+
+    def _fingerprints(self) -> tuple:
+        out = self._fingerprint(self.gen, self.saved, _ROUTINE_STATE)
+        if self.compiler is not None:
+            out += self._fingerprint(self.compiler, self.saved_compiler,
+                                     _COMPILER_REPLAYED)
+        return out
+
+    def unchanged(self) -> bool:
+        """Did the last routine leave everything but the tables it may add
+        to as the parent had it?"""
+        return self._fingerprints() == self.fingerprint
+
+    def mark(self) -> dict:
+        gen = self.gen
+        mark = {family[3]: (len(getattr(gen, family[0])), len(getattr(gen, family[2])),
+                            getattr(gen, family[1]))
+                for family in _PLACEHOLDERS}
+        if self.strings is not None:
+            mark['strings'] = (len(self.strings.strings), len(self.strings.addresses),
+                               len(self.strings.encoded_data))
+        mark['call_counts'] = dict(gen._routine_call_count)
+        mark['used_flags'] = set(gen.used_flags)
+        mark['used_properties'] = set(gen.used_properties)
+        mark['warnings'] = len(gen._warnings)
+        if self.compiler is not None:
+            mark['compiler_warnings'] = len(self.compiler.warnings)
+        return mark
+
+    def rollback(self, mark: dict):
+        """Undo everything the last routine did to the shared state."""
+        gen = self.gen
+        for name, value in self.saved.items():
+            _restore(gen, name, value)
+        for name in set(vars(gen)) - set(self.saved) - _ROUTINE_STATE:
+            delattr(gen, name)
+        if self.compiler is not None:
+            for name, value in self.saved_compiler.items():
+                _restore(self.compiler, name, value)
+        for forward, counter, reverse, field in _PLACEHOLDERS:
+            n_forward, n_reverse, next_value = mark[field]
+            _truncate(getattr(gen, forward), n_forward)
+            _truncate(getattr(gen, reverse), n_reverse)
+            setattr(gen, counter, next_value)
+        if self.strings is not None:
+            n_strings, n_addresses, n_data = mark['strings']
+            _truncate(self.strings.strings, n_strings)
+            _truncate(self.strings.addresses, n_addresses)
+            del self.strings.encoded_data[n_data:]
+        for name in ('call_counts', 'used_flags', 'used_properties'):
+            _restore(gen, _MERGED[name], mark[name])
+        del gen._warnings[mark['warnings']:]
+        if self.compiler is not None:
+            del self.compiler.warnings[mark['compiler_warnings']:]
+
+    def registrations(self, mark: dict) -> Registrations:
+        """What the last routine added to the shared tables."""
+        gen = self.gen
+        regs = Registrations()
+        for forward, _counter, _reverse, field in _PLACEHOLDERS:
+            added = list(getattr(gen, forward).items())[mark[field][0]:]
+            setattr(regs, field, added)
+        if self.strings is not None:
+            regs.strings = list(self.strings.addresses)[mark['strings'][1]:]
+        before = mark['call_counts']
+        regs.call_counts = {name: count - before.get(name, 0)
+                            for name, count in gen._routine_call_count.items()
+                            if count != before.get(name, 0)}
+        regs.used_flags = gen.used_flags - mark['used_flags']
+        regs.used_properties = gen.used_properties - mark['used_properties']
+        regs.warnings = gen._warnings[mark['warnings']:]
+        if self.compiler is not None:
+            regs.compiler_warnings = self.compiler.warnings[mark['compiler_warnings']:]
+        return regs
+
+
+def _restore(obj, name, value):
+    """Put attribute ``name`` back to its saved ``value``, in place for a
+    container others may hold."""
+    current = getattr(obj, name, _MISSING)
+    if current is value:
+        return
+    if type(current) is type(value) and isinstance(value, (dict, set)):
+        if current != value:
+            current.clear()
+            current.update(value)
+        return
+    if type(current) is type(value) and isinstance(value, (list, bytearray)):
+        if current != value:
+            current[:] = value
+        return
+    setattr(obj, name, value.copy() if isinstance(value, (dict, list, set, bytearray))
+            else value)
+
+
+def _truncate(mapping: dict, length: int):
+    """Drop the entries added to ``mapping`` after its first ``length``."""
+    for key in list(mapping)[length:]:
+        del mapping[key]
+
+
+# --- parent ---------------------------------------------------------------
+
+def _replay(gen, obj: RoutineObject) -> bool:
+    """Replay a worker's routine into ``gen``: number its placeholders as the
+    sequential loop would and rewrite its marked markers to match.  False,
+    with nothing changed, if that is not possible."""
+    regs = obj.registrations
+    plan = {}                       # field -> key -> value, for new keys
+    for forward, counter, reverse, field in _PLACEHOLDERS:
+        known = getattr(gen, reverse)
+        nxt, limit = getattr(gen, counter), _limit(gen, field)
+        new = {}
+        for _value, key in getattr(regs, field):
+            if key not in known and key not in new:
+                if limit is not None and nxt > limit:
+                    return False
+                new[key] = nxt
+                nxt += 1
+        plan[field] = new
+    code = _renumbered(gen, obj, plan)
+    if code is None:
+        return False
+
+    for forward, counter, reverse, field in _PLACEHOLDERS:
+        fwd, rev = getattr(gen, forward), getattr(gen, reverse)
+        for key, value in plan[field].items():
+            fwd[value] = key
+            rev[key] = value
+            setattr(gen, counter, value + 1)
+    obj.code = code
+    if gen.string_table is not None:
+        for text in regs.strings:
+            gen.string_table.add_string(text)
+    for name, count in regs.call_counts.items():
+        gen._routine_call_count[name] = gen._routine_call_count.get(name, 0) + count
+    gen.used_flags |= regs.used_flags
+    gen.used_properties |= regs.used_properties
+    gen._warnings.extend(regs.warnings)
+    if gen.compiler is not None:
+        gen.compiler.warnings.extend(regs.compiler_warnings)
+    sys.stdout.write(regs.stdout)
+    sys.stderr.write(regs.stderr)
+    return True
+
+
+def _limit(gen, field: str) -> Optional[int]:
+    """Largest value a placeholder family may hand out (None: no limit)."""
+    if field == 'routines':
+        return min(gen._max_placeholder_value, 0xF3FF)
+    if field == 'string_operands':
+        return gen._max_string_operand_index
+    if field == 'tell_strings':
+        return gen._max_tell_string_index
+    return None
+
+
+def _renumbered(gen, obj: RoutineObject, plan: Dict[str, Dict[str, int]]):
+    """The routine's code with the marker at each mark rewritten to the
+    number its target has here (``plan`` holds those about to be added), or
+    None if a mark names a target that has none."""
+    from .codegen_improved import (_MARK_ROUTINE, _MARK_STRING, _MARK_TELL,
+                                   _MARK_VOCAB)
+    fields = {_MARK_ROUTINE: '_routine_to_placeholder',
+              _MARK_STRING: '_string_operand_to_placeholder',
+              _MARK_TELL: '_tell_string_to_placeholder',
+              _MARK_VOCAB: '_vocab_word_to_index'}
+    family = {family[2]: family[3] for family in _PLACEHOLDERS}
+    code = bytearray(obj.code)
+    for off, kind, target in obj.marks:
+        reverse = fields.get(kind)
+        if reverse is None:
+            continue                           # a data string: not renumbered
+        value = getattr(gen, reverse).get(target)
+        if value is None:
+            value = plan[family[reverse]].get(target)
+            if value is None:
+                return None
+        if kind == _MARK_ROUTINE:
+            word = value
+        elif kind == _MARK_STRING:
+            word = 0xFC00 | value
+        elif kind == _MARK_TELL:
+            word = gen._tell_string_base + value
+        else:
+            code[off + 1] = value & 0xFF
+            continue
+        code[off:off + 2] = word.to_bytes(2, 'big')
+    return code
@@ -0,0 +1,277 @@
+"""
+Whole-program facts the code generator reads before it emits any code.
+
+ImprovedCodeGenerator.generate needs several answers about the expanded
+program up front: which names are used as values (routine folding), how
+often each string literal occurs (inline printing), whether anything names
+VTBL.  analyze_program answers all of them with ONE traversal of the
+program, feeding each Collector the objects it is interested in.
+
+A Collector states its own descent rules -- which containers it enters,
+whether a subtree shared by macro expansion or hash-consing is walked once
+or once per occurrence, which objects it starts from -- so what it collects
+is exactly what a separate walk with those rules would collect; the single
+traversal only shares the work of reaching each object.
+"""
+
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+from ..parser.ast_nodes import ASTNode, AtomNode, RoutineNode, StringNode, node_fields
+
+_SCALARS = (type(None), int, float, bool, bytes)
+
+
+class Collector:
+    """One analysis fed by analyze_program.
+
+    The class attributes are the descent rules.  string_node is called for
+    each StringNode reached, name for each str reached; nothing inside a
+    StringNode is walked.  roots returns the objects the collector starts
+    from (reached through the program), or None for the whole program.
+    """
+    sets = True              # walk the items of sets
+    frozensets = True        # ... and of frozensets
+    dict_keys = True         # walk dict keys
+    dict_values = True       # walk dict values
+    objects = False          # walk non-AST objects with a __dict__, once each
+    once = True              # walk a shared AST node once, not per occurrence
+    value_position = False   # skip call-operator atoms and routine def names
+
+    def roots(self, program) -> Optional[List]:
+        return None
+
+    def string_node(self, node: StringNode):
+        pass
+
+    def name(self, text: str):
+        pass
+
+
+class StringUses(Collector):
+    """Occurrences of each literal string, counted per occurrence
+    (_inline_ok: table vs inline print by total size)."""
+    sets = frozensets = dict_keys = dict_values = False
+    objects = True
+    once = False
+
+    def __init__(self):
+        self.counts: Dict[str, int] = {}
+
+    def string_node(self, node):
+        self.counts[node.value] = self.counts.get(node.value, 0) + 1
+
+
+class StringUseCounts(Collector):
+    """Occurrences of each literal string, dict values and sets included
+    (_inline_print_ok: single-use TELL literals are printed inline)."""
+    frozensets = dict_keys = False
+    objects = True
+    once = False
+
+    def __init__(self):
+        self.counts: Counter = Counter()
+
+    def string_node(self, node):
+        if isinstance(node.value, str):
+            self.counts[node.value] += 1
+
+
+class ValuePositionNames(Collector):
+    """Identifier strings in VALUE position: a FormNode's call-operator atom
+    and a RoutineNode's own name are skipped.  A routine named here has its
+    address taken as data (<QUEUE I-FOO>, a property value, a table element,
+    a GVAL comparison), so identical-body folding must leave it alone."""
+    value_position = True
+
+    def __init__(self):
+        self.names: Set[str] = set()
+
+    def roots(self, program):
+        return ([r.body for r in program.routines]
+                + [getattr(r, 'local_defaults', None) for r in program.routines]
+                + [getattr(g, 'initial_value', None) for g in program.globals]
+                + [getattr(c, 'value', None) for c in program.constants]
+                + [getattr(o, 'properties', None)
+                   for o in program.objects + program.rooms])
+
+    def name(self, text):
+        self.names.add(text.upper())
+
+
+class Names(Collector):
+    """Every identifier string, as written and uppercased, under the given
+    roots; string literal text is not an identifier."""
+
+    def __init__(self, roots: List):
+        self._roots = roots
+        self.names: Set[str] = set()
+
+    def roots(self, program):
+        return self._roots
+
+    def name(self, text):
+        self.names.add(text)
+        self.names.add(text.upper())
+
+
+@dataclass
+class ProgramFacts:
+    """What analyze_program found.
+
+    value_position_names -- ValuePositionNames over routine bodies and local
+        defaults, global and constant values and object properties
+    string_uses         -- StringUses over the whole program
+    string_use_counts   -- StringUseCounts over the whole program
+    names               -- Names over routine bodies and constant values
+    global_init_names   -- Names over each global's initial value, by global
+        name, so a consumer can leave out globals it has since dropped
+    """
+    value_position_names: Set[str] = field(default_factory=set)
+    string_uses: Dict[str, int] = field(default_factory=dict)
+    string_use_counts: Counter = field(default_factory=Counter)
+    names: Set[str] = field(default_factory=set)
+    global_init_names: Dict[str, Set[str]] = field(default_factory=dict)
+
+
+def analyze_program(program) -> ProgramFacts:
+    """Collect the ProgramFacts of `program` in one traversal."""
+    value_refs = ValuePositionNames()
+    uses = StringUses()
+    counts = StringUseCounts()
+    names = Names([r.body for r in program.routines]
+                  + [getattr(c, 'value', None) for c in program.constants])
+    global_names = {}
+    for g in program.globals:
+        collector = global_names.get(g.name)
+        if collector is None:
+            collector = global_names[g.name] = Names([])
+        collector._roots.append(getattr(g, 'initial_value', None))
+    walk(program, [value_refs, uses, counts, names] + list(global_names.values()))
+    return ProgramFacts(
+        value_position_names=value_refs.names,
+        string_uses=uses.counts,
+        string_use_counts=counts.counts,
+        names=names.names,
+        global_init_names={n: c.names for n, c in global_names.items()})
+
+
+def walk(program, collectors: List[Collector]):
+    """Traverse `program` once, feeding each of `collectors`.
+
+    Each stack entry carries a bit mask of the collectors walking that
+    object.  Whole-program collectors start at `program`; the others join
+    when the traversal first reaches one of their roots, and any root not
+    reached that way is walked afterwards.  A collector drops out of an
+    entry where its own walk would not go.
+    """
+    def mask_of(pred):
+        return sum(1 << i for i, c in enumerate(collectors) if pred(c))
+
+    start = mask_of(lambda c: c.roots(program) is None)
+    roots: Dict[int, list] = {}
+    for i, c in enumerate(collectors):
+        for root in c.roots(program) or ():
+            if isinstance(root, str):
+                c.name(root)
+            elif not isinstance(root, _SCALARS):
+                roots.setdefault(id(root), [root, 0])[1] |= 1 << i
+    name_mask = mask_of(lambda c: type(c).name is not Collector.name)
+    set_mask = mask_of(lambda c: c.sets)
+    frozenset_mask = mask_of(lambda c: c.frozensets)
+    key_mask = mask_of(lambda c: c.dict_keys)
+    value_mask = mask_of(lambda c: c.dict_values)
+    object_mask = mask_of(lambda c: c.objects)
+    once_mask = mask_of(lambda c: c.once)
+    value_pos_mask = mask_of(lambda c: c.value_position)
+    seen = [set() for _ in collectors]
+
+    members_cache: Dict[int, tuple] = {}
+
+    def members(mask):
+        found = members_cache.get(mask)
+        if found is None:
+            found = members_cache[mask] = tuple(
+                i for i in range(len(collectors)) if mask >> i & 1)
+        return found
+
+    stack = [(program, start)] if start else []
+    pop, push = stack.pop, stack.append
+    while stack or roots:
+        if not stack:
+            # Roots no collector walking the program reached.
+            stack.extend(tuple(entry) for entry in roots.values())
+            roots.clear()
+        obj, mask = pop()
+        if isinstance(obj, _SCALARS):
+            continue
+        if roots:
+            joined = roots.pop(id(obj), None)
+            if joined:
+                mask |= joined[1]
+        if isinstance(obj, str):
+            for i in members(mask & name_mask):
+                collectors[i].name(obj)
+            continue
+        if isinstance(obj, (list, tuple)):
+            for item in obj:
+                push((item, mask))
+            continue
+        if isinstance(obj, (set, frozenset)):
+            mask &= frozenset_mask if isinstance(obj, frozenset) else set_mask
+            if mask:
+                for item in obj:
+                    push((item, mask))
+            continue
+        if isinstance(obj, dict):
+            keys, values = mask & key_mask, mask & value_mask
+            for k, v in obj.items():
+                if keys:
+                    push((k, keys))
+                if values:
+                    push((v, values))
+            continue
+        if isinstance(obj, ASTNode):
+            if isinstance(obj, StringNode):
+                for i in members(mask):
+                    collectors[i].string_node(obj)
+                continue
+            if mask & once_mask:
+                key = id(obj)
+                for i in members(mask & once_mask):
+                    if key in seen[i]:
+                        mask &= ~(1 << i)
+                    else:
+                        seen[i].add(key)
+                if not mask:
+                    continue
+            skip = mask & value_pos_mask
+            is_routine = skip and isinstance(obj, RoutineNode)
+            names = mask & name_mask
+            for k, v in node_fields(obj):
+                m = mask
+                if skip and ((k == 'operator' and isinstance(v, AtomNode))
+                             or (k == 'name' and is_routine)):
+                    m &= ~skip
+                if v.__class__ is str:
+                    # Most fields are atom names: collected here rather
+                    # than pushed (no root is a str, see above).
+                    for i in members(m & names):
+                        collectors[i].name(v)
+                elif m and not isinstance(v, _SCALARS):
+                    push((v, m))
+            continue
+        # Any other object: walked, once, by the collectors that walk objects.
+        mask &= object_mask
+        if not mask or getattr(obj, '__dict__', None) is None:
+            continue
+        key = id(obj)
+        for i in members(mask):
+            if key in seen[i]:
+                mask &= ~(1 << i)
+            else:
+                seen[i].add(key)
+        if mask:
+            for _k, v in node_fields(obj):
+                push((v, mask))
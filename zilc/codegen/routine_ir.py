@@ -0,0 +1,412 @@
+"""
+Symbolic form of generated Z-machine code.
+
+The code generator emits bytes, and several later passes need the
+instructions back: placeholder discovery (only a large-constant operand
+slot may hold an address marker) and the tail and routine peepholes
+(instruction boundaries, branch targets, stack use).  decode() lifts a byte stream into Instructions -- opcode,
+typed operands, store target, branch or jump with the address it lands on --
+once, and those passes read the list instead of each walking the bytes.
+
+encode() is the inverse.  decode() labels every branch and jump with the
+Instruction it lands on, and encode() recomputes the offsets from the
+labels, so a pass may drop, insert or replace instructions and serialise
+the list without repairing offsets by hand.  relax() picks the encoding
+widths first: the 1- or 2-byte branch form and the small- or
+large-constant jump, each as short as its label allows.
+"""
+
+from typing import List, Optional
+
+# Operand types, as in the type bits of the Z-machine encoding.
+LARGE, SMALL, VARIABLE, OMITTED = 0, 1, 2, 3
+
+_2OP_STORE_OPS = frozenset({0x08, 0x09, 0x0F, 0x10, 0x11, 0x12, 0x13,
+                            0x14, 0x15, 0x16, 0x17, 0x18})
+_2OP_BRANCH_OPS = frozenset({0x01, 0x02, 0x03, 0x04, 0x05, 0x06, 0x07, 0x0A})
+_1OP_BRANCH_OPS = frozenset({0x00, 0x01, 0x02})
+_EXT_STORE_OPS = frozenset({0x00, 0x01, 0x02, 0x03, 0x04, 0x09, 0x0A, 0x0C})
+_EXT_BRANCH_OPS = frozenset({0x06, 0x18, 0x1B})
+
+# Label of a branch to the end of the code (one past the last instruction).
+END = 'END'
+
+
+class DecodeError(Exception):
+    """The bytes are not a whole number of instructions."""
+
+
+class Instruction:
+    """One decoded instruction.
+
+    start, end  -- its byte range in the decoded code
+    op          -- first opcode byte (0xBE for EXT)
+    kind        -- '0OP', '1OP', '2OP' (long or variable form), 'VAR' or 'EXT'
+    opnum       -- opcode number within its kind
+    type_bytes  -- the VAR/EXT operand type byte(s), as written
+    operands    -- [(type, value, position)], position the operand's offset
+    store       -- store variable, or None
+    branch_on   -- branch sense, or None for no branch
+    branch_len  -- 1 or 2 byte branch
+    branch_off  -- branch offset (0 and 1 return false / true)
+    text        -- inline z-string bytes of print / print_ret, or None
+    label       -- the Instruction a branch or jump lands on, END, or None
+                   (no branch or jump, a return offset, or a target that is
+                   not an instruction start: its offset is kept as written)
+    """
+    __slots__ = ('start', 'end', 'op', 'kind', 'opnum', 'type_bytes', 'operands',
+                 'store', 'store_pos', 'branch_on', 'branch_pos', 'branch_len',
+                 'branch_off', 'text', 'label')
+
+    def __init__(self, start: int, op: int, kind: str, opnum: int):
+        self.start = start
+        self.end = start
+        self.op = op
+        self.kind = kind
+        self.opnum = opnum
+        self.type_bytes = b''
+        self.operands = []
+        self.store = self.store_pos = None
+        self.branch_on = self.branch_pos = None
+        self.branch_len = 0
+        self.branch_off = 0
+        self.text = None
+        self.label = None
+
+    def __repr__(self):
+        return (f"Instruction({self.start}-{self.end} {self.kind}:{self.opnum:#x} "
+                f"{self.operands})")
+
+    @property
+    def is_jump(self) -> bool:
+        """jump with a constant offset."""
+        return (self.kind == '1OP' and self.opnum == 0x0C
+                and self.operands[0][0] != VARIABLE)
+
+    @property
+    def jump_off(self) -> int:
+        """The jump offset: signed for a large constant, as written for a
+        small one."""
+        t, value, _pos = self.operands[0]
+        if t == LARGE and value >= 0x8000:
+            return value - 0x10000
+        return value
+
+    @property
+    def size(self) -> int:
+        """Encoded length in bytes with the current widths."""
+        n = 2 if self.kind == 'EXT' else 1
+        n += len(self.type_bytes)
+        for t, _value, _pos in self.operands:
+            n += 2 if t == LARGE else 1
+        if self.store is not None:
+            n += 1
+        if self.branch_on is not None:
+            n += self.branch_len
+        if self.text is not None:
+            n += len(self.text)
+        return n
+
+    def set_jump_width(self, t: int):
+        """Re-encode a jump's offset operand as LARGE or SMALL."""
+        _t, value, pos = self.operands[0]
+        self.op = (self.op & 0xCF) | (t << 4)
+        self.operands = [(t, value, pos)]
+
+    @property
+    def target(self) -> Optional[int]:
+        """Address a branch or jump lands on (None for none, or a branch
+        that returns)."""
+        if self.is_jump:
+            return self.end + self.jump_off - 2
+        if self.branch_on is not None and self.branch_off not in (0, 1):
+            return self.end + self.branch_off - 2
+        return None
+
+
+def decode(code, version: int, start: int = 0) -> List[Instruction]:
+    """Decode code[start:] into Instructions and label their branches.
+
+    Raises DecodeError unless the bytes decode to exactly len(code).
+    """
+    v = version
+    n = len(code)
+    i = start
+    out = []
+    while i < n:
+        op = code[i]
+        if op == 0xBE:                      # extended (V5+)
+            if v < 5 or i + 2 >= n:
+                raise DecodeError(i)
+            ins = Instruction(i, op, 'EXT', code[i + 1])
+            ins.type_bytes = bytes(code[i + 2:i + 3])
+            i += 3
+            i = _var_operands(code, i, n, ins)
+            store = ins.opnum in _EXT_STORE_OPS
+            branch = ins.opnum in _EXT_BRANCH_OPS
+        elif op < 0x80:                     # long 2OP
+            opnum = op & 0x1F
+            if opnum == 0 or i + 2 >= n:
+                raise DecodeError(i)
+            ins = Instruction(i, op, '2OP', opnum)
+            ins.operands = [(VARIABLE if op & 0x40 else SMALL, code[i + 1], i + 1),
+                            (VARIABLE if op & 0x20 else SMALL, code[i + 2], i + 2)]
+            i += 3
+            store = opnum in _2OP_STORE_OPS or (opnum == 0x19 and v >= 4)
+            branch = opnum in _2OP_BRANCH_OPS
+        elif op < 0xB0:                     # short 1OP
+            opnum = op & 0x0F
+            t = (op >> 4) & 3
+            ins = Instruction(i, op, '1OP', opnum)
+            i += 1
+            if t == LARGE:
+                if i + 1 >= n:
+                    raise DecodeError(i)
+                ins.operands = [(LARGE, (code[i] << 8) | code[i + 1], i)]
+                i += 2
+            else:
+                if i >= n:
+                    raise DecodeError(i)
+                ins.operands = [(t, code[i], i)]
+                i += 1
+            store = opnum in (0x01, 0x02, 0x03, 0x04, 0x0E) \
+                or (opnum == 0x08 and v >= 4) \
+                or (opnum == 0x0F and v <= 4)
+            branch = opnum in _1OP_BRANCH_OPS
+        elif op < 0xC0:                     # short 0OP
+            opnum = op & 0x0F
+            ins = Instruction(i, op, '0OP', opnum)
+            i += 1
+            if opnum in (0x02, 0x03):       # print / print_ret: inline z-string
+                text_start = i
+                while True:
+                    if i + 1 >= n:
+                        raise DecodeError(i)
+                    w = (code[i] << 8) | code[i + 1]
+                    i += 2
+                    if w & 0x8000:
+                        break
+                ins.text = bytes(code[text_start:i])
+            store = (opnum in (0x05, 0x06) and v == 4) or (opnum == 0x09 and v >= 5)
+            branch = (opnum in (0x05, 0x06) and v <= 3) or opnum in (0x0D, 0x0F)
+        else:                               # variable form
+            opnum = op & 0x1F
+            var_of_2op = op < 0xE0
+            ins = Instruction(i, op, '2OP' if var_of_2op else 'VAR', opnum)
+            i += 1
+            ntypes = 2 if (not var_of_2op and v >= 4 and opnum in (0x0C, 0x1A)) else 1
+            if i + ntypes > n:
+                raise DecodeError(i)
+            ins.type_bytes = bytes(code[i:i + ntypes])
+            i += ntypes
+            i = _var_operands(code, i, n, ins)
+            if var_of_2op:
+                store = opnum in _2OP_STORE_OPS or (opnum == 0x19 and v >= 4)
+                branch = opnum in _2OP_BRANCH_OPS
+            else:
+                # not (0x18) is emitted for BCOM in every version.
+                store = opnum in (0x00, 0x07, 0x18) \
+                    or (v >= 4 and opnum in (0x0C, 0x16, 0x17)) \
+                    or (v >= 5 and opnum == 0x04) or (v == 6 and opnum == 0x09)
+                branch = (v >= 4 and opnum == 0x17) or (v >= 5 and opnum == 0x1F)
+        if store:
+            if i >= n:
+                raise DecodeError(i)
+            ins.store = code[i]
+            ins.store_pos = i
+            i += 1
+        if branch:
+            if i >= n:
+                raise DecodeError(i)
+            b = code[i]
+            ins.branch_pos = i
+            ins.branch_on = bool(b & 0x80)
+            i += 1
+            if b & 0x40:
+                ins.branch_len = 1
+                ins.branch_off = b & 0x3F
+            else:
+                if i >= n:
+                    raise DecodeError(i)
+                off = ((b & 0x3F) << 8) | code[i]
+                i += 1
+                ins.branch_len = 2
+                ins.branch_off = off - 0x4000 if off >= 0x2000 else off
+        ins.end = i
+        out.append(ins)
+    _link(out, n)
+    return out
+
+
+def _var_operands(code, i, n, ins):
+    """Read the operands of a VAR or EXT instruction named by its type
+    bytes; the offset after them."""
+    operands = ins.operands
+    for tb in ins.type_bytes:
+        for shift in (6, 4, 2, 0):
+            t = (tb >> shift) & 3
+            if t == OMITTED:
+                return i
+            if t == LARGE:
+                if i + 1 >= n:
+                    raise DecodeError(i)
+                operands.append((LARGE, (code[i] << 8) | code[i + 1], i))
+                i += 2
+            else:
+                if i >= n:
+                    raise DecodeError(i)
+                operands.append((t, code[i], i))
+                i += 1
+    return i
+
+
+def _link(instrs: List[Instruction], end: int):
+    """Label each branch and jump with the instruction it lands on."""
+    at = {ins.start: ins for ins in instrs}
+    for ins in instrs:
+        target = ins.target
+        if target is not None:
+            ins.label = END if target == end else at.get(target)
+
+
+def relax(instrs: List[Instruction], start: int = 0) -> bool:
+    """Give every labelled branch and jump its shortest encoding.
+
+    All of them start in the short form (1-byte branch, small-constant
+    jump); each pass lays the code out, and any whose offset does not fit
+    is widened.  Widening only lengthens code, so offsets only grow and the
+    passes reach a fixed point.  A branch that returns (offset 0 or 1)
+    always fits one byte.  Returns True if any width changed.
+    """
+    before = [(ins.op, ins.branch_len) for ins in instrs]
+    labelled = []
+    for ins in instrs:
+        if ins.label is None:
+            if ins.branch_on is not None and ins.branch_off in (0, 1):
+                ins.branch_len = 1
+            continue
+        if ins.is_jump:
+            ins.set_jump_width(SMALL)
+        else:
+            ins.branch_len = 1
+        labelled.append(ins)
+    grew = bool(labelled)
+    while grew:
+        addrs = {}
+        pos = start
+        for ins in instrs:
+            addrs[id(ins)] = pos
+            pos += ins.size
+        end = pos
+        grew = False
+        for ins in labelled:
+            target = end if ins.label is END else addrs.get(id(ins.label))
+            if target is None:
+                continue                    # encode() reports it
+            offset = target - (addrs[id(ins)] + ins.size) + 2
+            if ins.is_jump:
+                if ins.operands[0][0] == SMALL and not 2 <= offset <= 0xFF:
+                    ins.set_jump_width(LARGE)
+                    grew = True
+            elif ins.branch_len == 1 and not 2 <= offset <= 63:
+                ins.branch_len = 2
+                grew = True
+    return before != [(ins.op, ins.branch_len) for ins in instrs]
+
+
+def encode(instrs: List[Instruction], start: int = 0) -> bytearray:
+    """Serialise `instrs`, the first placed at offset `start`.
+
+    Each instruction keeps its current encoding widths (see relax());
+    labelled branch and jump offsets are recomputed from the new addresses.
+    Raises ValueError when a label is not in `instrs` or an offset does not
+    fit its width.
+    """
+    addrs = {}
+    pos = start
+    for ins in instrs:
+        addrs[id(ins)] = pos
+        pos += ins.size
+    end = pos
+    out = bytearray()
+    pos = start
+    for ins in instrs:
+        pos += ins.size
+        offset = None
+        if ins.label is END:
+            offset = end - pos + 2
+        elif ins.label is not None:
+            target = addrs.get(id(ins.label))
+            if target is None:
+                raise ValueError(f"{ins!r} branches to an instruction not in the code")
+            offset = target - pos + 2
+        out += _encode_one(ins, offset)
+    return out
+
+
+def _encode_one(ins: Instruction, offset: Optional[int]) -> bytearray:
+    if ins.kind == 'EXT':
+        out = bytearray((0xBE, ins.opnum))
+    else:
+        out = bytearray((ins.op,))
+    out += ins.type_bytes
+    operands = ins.operands
+    if offset is not None and ins.is_jump:
+        t, _value, pos = operands[0]
+        if t == LARGE:
+            if not -0x8000 <= offset <= 0x7FFF:
+                raise ValueError(f"jump offset {offset} does not fit")
+            operands = [(t, offset & 0xFFFF, pos)]
+        else:
+            if not 0 <= offset <= 0xFF:
+                raise ValueError(f"jump offset {offset} does not fit")
+            operands = [(t, offset, pos)]
+    for t, value, _pos in operands:
+        if t == LARGE:
+            out += bytes(((value >> 8) & 0xFF, value & 0xFF))
+        else:
+            out.append(value)
+    if ins.store is not None:
+        out.append(ins.store)
+    if ins.branch_on is not None:
+        off = ins.branch_off if offset is None or ins.is_jump else offset
+        sense = 0x80 if ins.branch_on else 0
+        if ins.branch_len == 1:
+            if not 0 <= off <= 63:
+                raise ValueError(f"branch offset {off} does not fit")
+            out.append(sense | 0x40 | off)
+        else:
+            if not -0x2000 <= off <= 0x1FFF:
+                raise ValueError(f"branch offset {off} does not fit")
+            u = off & 0x3FFF
+            out += bytes((sense | (u >> 8), u & 0xFF))
+    if ins.text is not None:
+        out += ins.text
+    return out
+
+
+def large_const_positions(instrs: List[Instruction],
+                          include_print_paddr: bool = False) -> List[int]:
+    """Offsets of the 2-byte large-constant operands that may hold an
+    address placeholder: every one but a jump offset and, unless asked
+    for, a print_paddr string address."""
+    out = []
+    for ins in instrs:
+        if ins.kind == '1OP' and (ins.opnum == 0x0C
+                                  or (ins.opnum == 0x0D and not include_print_paddr)):
+            continue
+        for t, _value, pos in ins.operands:
+            if t == LARGE:
+                out.append(pos)
+    return out
+
+
+def print_paddr_positions(instrs: List[Instruction]) -> List[int]:
+    """Offsets of the print_paddr instructions with a large-constant
+    operand (opcode byte 0x8D), which may hold a TELL string placeholder."""
+    return [ins.start for ins in instrs if ins.op == 0x8D]
+
+
+def branch_targets(instrs: List[Instruction]) -> set:
+    """Addresses branches and jumps land on."""
+    return {t for t in (ins.target for ins in instrs) if t is not None}
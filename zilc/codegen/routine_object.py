@@ -0,0 +1,50 @@
+"""
+A routine compiled but not yet placed in the code section.
+
+ImprovedCodeGenerator._compile_routine() turns a RoutineNode into a
+RoutineObject and _link_routine() places it: it aligns the routine, folds
+it onto an identical earlier routine or appends it, and makes its marks
+absolute.  The code is relocatable -- every address the generator could not
+know yet is an in-band marker at a position listed in `marks` (see
+zmachine/relocations.py) -- so it can be compiled before the routines ahead
+of it are placed.
+
+A routine compiled in a parallel worker (parallel_codegen.py) also carries
+its Registrations: the placeholders, strings and other shared entries it
+added to the worker's tables, numbered there.  The parent replays them in
+source order and renumbers the marked markers to match.
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+
+@dataclass
+class Registrations:
+    """Shared-table entries a routine added in a parallel worker, in the
+    order it added them.  Placeholder entries are (worker value, key)."""
+    routines: List[Tuple[int, str]] = field(default_factory=list)
+    string_operands: List[Tuple[int, str]] = field(default_factory=list)
+    tell_strings: List[Tuple[int, str]] = field(default_factory=list)
+    vocab: List[Tuple[int, str]] = field(default_factory=list)
+    strings: List[str] = field(default_factory=list)       # string table texts
+    call_counts: Dict[str, int] = field(default_factory=dict)
+    used_flags: Set[str] = field(default_factory=set)
+    used_properties: Set[str] = field(default_factory=set)
+    warnings: List[str] = field(default_factory=list)          # codegen
+    compiler_warnings: List[str] = field(default_factory=list)
+    stdout: str = ''
+    stderr: str = ''
+
+
+@dataclass
+class RoutineObject:
+    """name, header + body bytes, (offset, kind, target) marks relative to
+    the routine -- the target is the routine name, text or word the marker
+    stands for -- and the unused locals to warn about once it is placed."""
+    name: str
+    code: bytearray
+    marks: List[Tuple[int, str, str]]
+    unused_locals: List[str] = field(default_factory=list)
+    aux_vars: List[str] = field(default_factory=list)
+    registrations: Optional[Registrations] = None
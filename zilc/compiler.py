@@ -4,16 +4,25 @@ Main ZIL Compiler.
 Coordinates lexing, parsing, code generation, and assembly.
 """
 
+import os
 import sys
 from typing import List, Optional
 from pathlib import Path
 
-from .lexer import Lexer
+from .lexer import Lexer, Token, TokenStream, TokenType
 from .parser import Parser
 from .parser.macro_expander import MacroExpander
+from .parser.macro_profile import MacroProfile
+from .parser.hashcons import share_routines
+from .parser.symbol_index import SymbolIndex
 from .codegen.codegen_improved import ImprovedCodeGenerator
 from .zmachine import ZAssembler, ObjectTable, Dictionary
 from .zmachine.object_table import ByteValue
+from .zmachine.relocations import (DICT, OBJECTS, ROUTINE, STRING, TABLE,
+                                   VOCAB, Relocation)
+from .phase_stats import PhaseStats
+from .source_index import SourceIndex
+from .build_cache import BuildCache, CACHE_DIR_NAME, split_units, shift_lines
 
 
 class ZILCompiler:
@@ -21,7 +30,10 @@ class ZILCompiler:
 
     def __init__(self, version: int = 3, verbose: bool = False, enable_string_dedup: bool = False,
                  include_paths: Optional[list] = None, lax_brackets: bool = False,
-                 override_version: bool = False, allow_undefined_routines: bool = False):
+                 override_version: bool = False, allow_undefined_routines: bool = False,
+                 timings: bool = False, build_cache=None, macro_profile: bool = False,
+                 expand_jobs: int = 1, hash_cons: bool = False,
+                 codegen_jobs: int = 1):
         self.version = version
         self.verbose = verbose
         self.enable_string_dedup = enable_string_dedup
@@ -46,6 +58,40 @@ class ZILCompiler:
         self.allow_undefined_routines = allow_undefined_routines
         self.warnings: List[str] = []  # Compilation warnings
         self.errors: List[str] = []  # Compilation errors
+        # Per-phase wall/CPU time of the last compile_string (see
+        # zilc/phase_stats.py). Memory peaks are only recorded when `timings`
+        # is set, since tracemalloc slows compilation several-fold.
+        self.timings = timings
+        self.phase_stats = PhaseStats()
+        # Per-macro expansion statistics (zilc/parser/macro_profile.py),
+        # accumulated over every compile_string when enabled.
+        self.macro_profile = MacroProfile() if macro_profile else None
+        # Worker processes for expanding ROUTINE macros (1 = in process).
+        self.expand_jobs = expand_jobs
+        # Share identical expression subtrees after macro expansion
+        # (zilc/parser/hashcons.py).
+        self.hash_cons = hash_cons
+        # Worker processes for compiling routines (1 = in process).
+        self.codegen_jobs = codegen_jobs
+        # Definitions of the program being compiled by kind and name
+        # (zilc/parser/symbol_index.py); set once it has been parsed.
+        self.symbols: Optional[SymbolIndex] = None
+        # Set by compile_file for V4+ builds: capture the state before the
+        # object table so a SYNONYM-cap size retry can resume from there.
+        self._snapshot_back_end = False
+        self._back_end_snapshot = None
+        # Incremental front-end cache (zilc/build_cache.py): None/False = off,
+        # True = `.zorkie-cache/` next to the main source, a directory path, or
+        # a dict used as an in-memory store (the compile server's).
+        self.build_cache = build_cache
+        # Expansions of IFILE'd files kept across compiles, each with the
+        # stamps of the files and directories it was built from (the compile
+        # server's; see _expand_ifile).  None = read and expand every time.
+        self.source_cache = None
+        self._ifile_dep_stack = []
+        # SourceIndexes of the texts the directive preprocessor last searched,
+        # most recent last (see _source_index).
+        self._source_indexes = []
 
     def log(self, message: str):
         """Print log message if verbose mode is enabled."""
@@ -266,7 +312,7 @@ class ZILCompiler:
         # objects) never enters this branch, so their output is byte-identical.
         if self.version >= 4 and len(ordered_names) > 255:
             from .parser.ast_nodes import (ASTNode, FormNode as _FN,
-                                           GlobalVarNode as _GVN)
+                                           GlobalVarNode as _GVN, node_fields)
             names = set(ordered_names)
             cnt = {n: 0 for n in ordered_names}
             # The promotion assumes object numbers are ARBITRARY labels. That
@@ -293,7 +339,7 @@ class ZILCompiler:
                     if x.value in names:
                         cnt[x.value] += 1
                 if (isinstance(x, _FN) and isinstance(x.operator, AtomNode)
-                        and x.operator.value.upper() in _rel_ops):
+                        and x.operator.upper in _rel_ops):
                     for _op in x.operands:
                         _nm = (_op.name if isinstance(_op, _GVN)
                                else _op.value if isinstance(_op, AtomNode)
@@ -302,7 +348,7 @@ class ZILCompiler:
                             order_sensitive = True
                             break
                 if isinstance(x, ASTNode):
-                    for v in vars(x).values():
+                    for _k, v in node_fields(x):
                         if isinstance(v, ASTNode):
                             stack.append(v)
                         elif isinstance(v, (list, tuple)):
@@ -355,28 +401,54 @@ class ZILCompiler:
             # Compile. If a V4+ build overflows the hard story-size cap,
             # retry ONCE with the legacy 4-word SYNONYM cap (graceful size
             # degradation; loudly reported so the loss is visible).
+            self._snapshot_back_end = (self.version >= 4
+                                       and getattr(self, '_v4_syn_word_cap', None) is None)
             try:
                 story_data = self.compile_string(source, str(input_path))
             except ValueError as _sz_e:
-                if (self.version >= 4
+                _snapshot = self._back_end_snapshot
+                self._back_end_snapshot = None
+                if not (self.version >= 4
                         and 'too large' in str(_sz_e)
                         and getattr(self, '_v4_syn_word_cap', None) is None):
-                    print("Warning: story exceeds the size cap with full "
-                          "SYNONYM lists; retrying with 4-word cap "
-                          "(5th+ object synonyms will not parse)",
-                          file=sys.stderr)
-                    # Fresh compiler instance: compile_string is stateful and
-                    # a second pass on the same instance would double-register
-                    # tables/globals.
+                    raise
+                print("Warning: story exceeds the size cap with full "
+                      "SYNONYM lists; retrying with 4-word cap "
+                      "(5th+ object synonyms will not parse)",
+                      file=sys.stderr)
+                if _snapshot is not None:
+                    # Only the object table and later read the cap: resume
+                    # there from the state captured before it.
+                    story_data = self._resume_back_end(_snapshot, 4)
+                else:
+                    # No snapshot (the state could not be copied): recompile
+                    # on a fresh compiler instance -- compile_string is
+                    # stateful and a second pass on the same instance would
+                    # double-register tables/globals.
                     _retry = type(self)(
                         version=self.version, verbose=self.verbose,
                         enable_string_dedup=self.enable_string_dedup,
-                        allow_undefined_routines=self.allow_undefined_routines)
+                        include_paths=self.include_paths,
+                        lax_brackets=self.lax_brackets,
+                        override_version=self.override_version,
+                        allow_undefined_routines=self.allow_undefined_routines,
+                        timings=self.timings, build_cache=self.build_cache,
+                        expand_jobs=self.expand_jobs, hash_cons=self.hash_cons,
+                        codegen_jobs=self.codegen_jobs)
+                    # Same profile, so the report covers both attempts.
+                    _retry.macro_profile = self.macro_profile
+                    _retry.source_cache = self.source_cache
                     _retry._v4_syn_word_cap = 4
                     _retry._main_source_path = self._main_source_path
-                    story_data = _retry.compile_string(source, str(input_path))
-                else:
-                    raise
+                    try:
+                        story_data = _retry.compile_string(source, str(input_path))
+                    finally:
+                        # Keep the failed first attempt's phases and append the
+                        # retry's, so the report shows what the retry cost.
+                        for _rec in _retry.phase_stats:
+                            _rec.name += ':retry'
+                            self.phase_stats.records.append(_rec)
+            self._back_end_snapshot = None
 
             # Write output
             self.log(f"Writing {output_path}...")
@@ -436,8 +508,7 @@ class ZILCompiler:
         """Append a fallback PERFORM routine if the game calls PERFORM but none
         was compiled (see the call site in compile_file_multi for why)."""
         import re
-        defined = {getattr(r, 'name', '').upper() for r in program.routines}
-        if 'PERFORM' in defined:
+        if self.symbols.find_any_case('routine', 'PERFORM'):
             return
         # Only inject when PERFORM is actually used as a verb dispatcher (a call
         # like <PERFORM ,V?TAKE ...> or <PERFORM .A>), never for the <ROUTINE
@@ -454,6 +525,8 @@ class ZILCompiler:
             return
         if sub.routines:
             program.routines.extend(sub.routines)
+            for routine in sub.routines:
+                self.symbols.define(routine)
             self.log("  Injected standard-library PERFORM fallback routine")
 
     def compile_file_multi(self, main_file: str, included_files: list = None) -> bytes:
@@ -555,7 +628,9 @@ class ZILCompiler:
             # Search for file in base_path and include_paths
             search_paths = [base_path] + [Path(p) for p in self.include_paths]
             file_path = None
+            searched = 0
             for search_path in search_paths:
+                searched += 1
                 candidate = search_path / filename.lower()
                 if candidate.exists():
                     file_path = candidate
@@ -568,17 +643,13 @@ class ZILCompiler:
 
             if file_path is None:
                 raise FileNotFoundError(f"IFILE not found: {filename} (searched: {[str(p) for p in search_paths]})")
+            # A file added to a directory searched first would change what
+            # this IFILE names.
+            self._note_ifile_deps(search_paths[:searched])
 
             try:
                 self.log(f"  Including file: {file_path}")
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                # Preprocess control characters in included file
-                content = self.preprocess_control_characters(content)
-                # Recursively process nested IFILE directives - use file's parent as new base.
-                # Not top-level: the demote analysis must only run on the fully
-                # expanded whole-program source (see _top_level docstring).
-                return self.preprocess_ifiles(content, file_path.parent, _top_level=False)
+                return self._expand_ifile(file_path)
             except FileNotFoundError:
                 raise FileNotFoundError(f"IFILE not found: {file_path}")
 
@@ -620,6 +691,56 @@ class ZILCompiler:
 
         return _result_src
 
+    def _expand_ifile(self, file_path: Path) -> str:
+        """The text an IFILE of `file_path` expands to: the file with its
+        control characters and nested IFILEs processed.
+
+        With a source cache the expansion is reused while the stamps of the
+        files it was read from and the directories its nested IFILEs were
+        looked up in are unchanged.  It also depends on the IFILE aliases
+        known on entry, and may add to them; both go with the cached text.
+        """
+        aliases = self._ifile_aliases
+        key = (str(file_path), frozenset(aliases), tuple(map(str, self.include_paths)))
+        cache = self.source_cache
+        hit = cache.get(key) if cache is not None else None
+        if hit is not None and all(self._file_stamp(p) == stamp for p, stamp in hit[1]):
+            text, deps, added = hit
+            aliases.update(added)
+        else:
+            deps = [(file_path, self._file_stamp(file_path))]
+            self._ifile_dep_stack.append(deps)
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+                # Preprocess control characters in included file
+                content = self.preprocess_control_characters(content)
+                # Recursively process nested IFILE directives - use file's parent as new base.
+                # Not top-level: the demote analysis must only run on the fully
+                # expanded whole-program source (see _top_level docstring).
+                text = self.preprocess_ifiles(content, file_path.parent, _top_level=False)
+            finally:
+                self._ifile_dep_stack.pop()
+            if cache is not None:
+                cache[key] = (text, deps, frozenset(aliases - key[1]))
+        if self._ifile_dep_stack:
+            self._ifile_dep_stack[-1].extend(deps)
+        return text
+
+    def _note_ifile_deps(self, paths):
+        """Record `paths` as inputs of the IFILE being expanded, if any."""
+        if self._ifile_dep_stack:
+            self._ifile_dep_stack[-1].extend((p, self._file_stamp(p)) for p in paths)
+
+    @staticmethod
+    def _file_stamp(path):
+        """(mtime, size) of a file or directory; None if it is gone."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
     def preprocess_control_characters(self, source: str) -> str:
         """
         Preprocess text representations of control characters.
@@ -673,6 +794,25 @@ class ZILCompiler:
         # consumed by _process_if_options to expand the IF-<OPTION> forms.
         self.zip_options = set()
 
+        # The directives below are single forms recognised by their head atom,
+        # so they are all collected from one form tree of the source (see
+        # zilc/source_index.py) rather than by one re.sub over the whole text
+        # each. Handlers run in the order they are registered -- the order the
+        # passes have always run in, so e.g. a SET still overrides a SETG of
+        # the same name -- and the forms they remove are spliced out at once.
+        # Forms inside string literals are not directives and are skipped.
+        index = self._source_index(source)
+        edits = []
+
+        def directive(heads, pattern, handler):
+            pat = re.compile(pattern, re.IGNORECASE)
+            for start in index.forms_with_head(heads):
+                match = pat.match(source, start)
+                if match:
+                    replacement = handler(match)
+                    if replacement != match.group(0):
+                        edits.append((match.start(), match.end(), replacement))
+
         # Extract SET and SETG directives to track compile-time values
         # <SET VARNAME value> or <SETG VARNAME value>
         # Handles: integers, T, <>, and character literals (!\X)
@@ -712,7 +852,7 @@ class ZILCompiler:
             return match.group(0)  # Keep in source
 
         new_sflags_pattern = r'<\s*SETG\s+NEW-SFLAGS\s+\[([^\]]*)\]\s*>'
-        source = re.sub(new_sflags_pattern, extract_new_sflags, source, flags=re.IGNORECASE)
+        directive(('SETG',), new_sflags_pattern, extract_new_sflags)
 
         # Handle SETG
         # Variable names can include MDL special suffixes like !- (unbind)
@@ -724,12 +864,12 @@ class ZILCompiler:
         # queue tick) could not fold and dinner was served at turn 0.
         _setg_tail = r'(?:\s*;[^\s>]+)?\s*>'
         setg_pattern = r'<\s*SETG\s+([A-Z0-9\-?!]+)\s+(\d+|T|<>|!\\.|\"\S*\")?' + _setg_tail
-        source = re.sub(setg_pattern, extract_set_or_setg, source, flags=re.IGNORECASE)
+        directive(('SETG',), setg_pattern, extract_set_or_setg)
 
         # Handle SET (compile-time settings like REDEFINE)
         # Variable names can include MDL special suffixes like !- (unbind)
         set_pattern = r'<\s*SET\s+([A-Z0-9\-?!]+)\s+(\d+|T|<>|!\\.|\"\S*\")?' + _setg_tail
-        source = re.sub(set_pattern, extract_set_or_setg, source, flags=re.IGNORECASE)
+        directive(('SET',), set_pattern, extract_set_or_setg)
 
         # Handle shorthand flag forms like <FUNNY-GLOBALS?> (sets flag to T)
         def extract_shorthand_flag(match):
@@ -739,7 +879,8 @@ class ZILCompiler:
             return match.group(0)  # Keep the form in source
 
         shorthand_flag_pattern = r'<\s*([A-Z][A-Z0-9\-]*\?)\s*>'
-        source = re.sub(shorthand_flag_pattern, extract_shorthand_flag, source, flags=re.IGNORECASE)
+        directive([h for h in index.heads if h.endswith('?')],
+                  shorthand_flag_pattern, extract_shorthand_flag)
 
         # First pass: Extract COMPILATION-FLAG directives
         # <COMPILATION-FLAG FLAGNAME <T>> or <COMPILATION-FLAG FLAGNAME T>
@@ -755,7 +896,7 @@ class ZILCompiler:
             self.log(f"  Flag: {flag_name} = {self.compilation_flags[flag_name]}")
             return ''  # Remove the directive from source
 
-        source = re.sub(flag_pattern, extract_flag, source, flags=re.IGNORECASE)
+        directive(('COMPILATION-FLAG',), flag_pattern, extract_flag)
 
         # Extract FILE-FLAGS directives
         # <FILE-FLAGS FLAG1 FLAG2 ...> - set file-level flags like SENTENCE-ENDS?
@@ -771,7 +912,7 @@ class ZILCompiler:
                     self.log(f"  FILE-FLAG: {flag}")
             return ''  # Remove the directive from source
 
-        source = re.sub(file_flags_pattern, extract_file_flags, source, flags=re.IGNORECASE)
+        directive(('FILE-FLAGS',), file_flags_pattern, extract_file_flags)
 
         # Extract SUPPRESS-WARNINGS? directives
         # <SUPPRESS-WARNINGS? "ZIL0204"> - suppress specific warning
@@ -797,7 +938,7 @@ class ZILCompiler:
                 self.log(f"  Suppressing warning: {warning_code}")
             return ''  # Remove the directive from source
 
-        source = re.sub(suppress_pattern, extract_suppress, source, flags=re.IGNORECASE)
+        directive(('SUPPRESS-WARNINGS?',), suppress_pattern, extract_suppress)
 
         # Extract WARN-AS-ERROR? directive
         # <WARN-AS-ERROR? T> - treat warnings as errors
@@ -810,7 +951,7 @@ class ZILCompiler:
             self.log(f"  Warn as error: {self.warn_as_error}")
             return ''  # Remove the directive from source
 
-        source = re.sub(warn_error_pattern, extract_warn_error, source, flags=re.IGNORECASE)
+        directive(('WARN-AS-ERROR?',), warn_error_pattern, extract_warn_error)
 
         # Extract CHRSET directives
         # <CHRSET 0 "abcdefghijklmnopqrstuvwxyz"> - set custom alphabet A0
@@ -835,7 +976,7 @@ class ZILCompiler:
                 self.warn("ZIL0421", f"CHRSET alphabet number must be 0, 1, or 2, got {alphabet_num}")
             return ''  # Remove the directive from source
 
-        source = re.sub(chrset_pattern, extract_chrset, source, flags=re.IGNORECASE)
+        directive(('CHRSET',), chrset_pattern, extract_chrset)
 
         # Extract LANGUAGE directive
         # <LANGUAGE GERMAN> - set language mode with custom alphabets and escape sequences
@@ -861,7 +1002,8 @@ class ZILCompiler:
                 self.warn("ZIL0422", f"Unknown LANGUAGE: {lang_name}")
             return ''  # Remove the directive from source
 
-        source = re.sub(language_pattern, extract_language, source, flags=re.IGNORECASE)
+        directive(('LANGUAGE',), language_pattern, extract_language)
+        source = index.splice(edits)
 
         # Second pass: Evaluate IFFLAG conditionals
         # Process manually to handle nested brackets properly
@@ -948,6 +1090,7 @@ class ZILCompiler:
         if self.lax_brackets:
             source = self._fix_lax_brackets(source)
 
+        self._source_indexes = []
         return source
 
     def _strip_decl(self, source: str) -> str:
@@ -961,21 +1104,18 @@ class ZILCompiler:
         We remove entire #DECL blocks.
         """
         import re
-        result = []
+        pattern = re.compile(r'#DECL\s*\(', re.IGNORECASE)
+        edits = []
         pos = 0
 
-        while pos < len(source):
+        while True:
             # Look for #DECL
-            match = re.search(r'#DECL\s*\(', source[pos:], re.IGNORECASE)
+            match = pattern.search(source, pos)
             if not match:
-                result.append(source[pos:])
                 break
 
-            # Add text before match
-            result.append(source[pos:pos + match.start()])
-
             # Find the matching ) for this #DECL (
-            start = pos + match.start() + len('#DECL')
+            start = match.start() + len('#DECL')
             # Skip whitespace to find the (
             while start < len(source) and source[start] in ' \t\n':
                 start += 1
@@ -990,13 +1130,13 @@ class ZILCompiler:
                     elif source[end] == ')':
                         depth -= 1
                     end += 1
+                edits.append((match.start(), end, ''))
                 pos = end
             else:
                 # No opening paren found, skip just the #DECL
-                result.append('#DECL')
-                pos = pos + match.start() + len('#DECL')
+                pos = match.start() + len('#DECL')
 
-        return ''.join(result)
+        return self._splice(source, edits)
 
     def _process_splice(self, source: str) -> str:
         """
@@ -1015,52 +1155,24 @@ class ZILCompiler:
         by the parser and macro expander to preserve splice semantics for macros.
         """
         import re
-        result = []
+        pattern = re.compile(r'#SPLICE\s*', re.IGNORECASE)
+        edits = []
         pos = 0
 
-        # Track nesting inside DEFMAC to skip #SPLICE processing there
-        defmac_depth = 0
-
-        while pos < len(source):
+        while True:
             # Look for #SPLICE
-            match = re.search(r'#SPLICE\s*', source[pos:], re.IGNORECASE)
+            match = pattern.search(source, pos)
             if not match:
-                result.append(source[pos:])
                 break
 
-            # Add text before match
-            result.append(source[pos:pos + match.start()])
-
-            splice_start = pos + match.start()
-            after_splice = splice_start + match.end() - match.start()
+            splice_start = match.start()
+            after_splice = match.end()
 
             # Check if we're inside a DEFMAC - if so, don't process #SPLICE
             # The parser and macro expander will handle it instead
-            text_before = source[:splice_start]
-            in_defmac = False
-            search_pos = 0
-            while True:
-                defmac_pos = text_before.upper().find('<DEFMAC', search_pos)
-                if defmac_pos == -1:
-                    break
-                # Check if this DEFMAC is closed before our splice position
-                depth = 1
-                check_pos = defmac_pos + 7
-                while check_pos < len(text_before) and depth > 0:
-                    if text_before[check_pos] == '<':
-                        depth += 1
-                    elif text_before[check_pos] == '>':
-                        depth -= 1
-                    check_pos += 1
-                if depth > 0:
-                    # This DEFMAC is not closed - we're inside it
-                    in_defmac = True
-                    break
-                search_pos = check_pos
-
-            if in_defmac:
+            index = self._source_index(source)
+            if any(index.head(start) == 'DEFMAC' for start in index.enclosing(splice_start)):
                 # Inside DEFMAC - keep #SPLICE as-is for parser to handle
-                result.append(source[splice_start:after_splice])
                 pos = after_splice
                 continue
 
@@ -1085,11 +1197,11 @@ class ZILCompiler:
                         # Extract content (without parens)
                         content = source[content_start:end-1].strip()
                         # If empty, splice nothing; otherwise splice the content
-                        result.append(content)
+                        edits.append((splice_start, end, content))
                         pos = end
                     else:
                         # Unbalanced - skip the #SPLICE and continue
-                        result.append('#SPLICE')
+                        edits.append((splice_start, after_splice, '#SPLICE'))
                         pos = after_splice
 
                 elif next_char == '<':
@@ -1097,21 +1209,21 @@ class ZILCompiler:
                     content, end = self._extract_balanced_content(source, after_splice)
                     if content:
                         # Splice the form directly
-                        result.append(content)
+                        edits.append((splice_start, after_splice, ''))
                         pos = end
                     else:
-                        result.append('#SPLICE')
+                        edits.append((splice_start, after_splice, '#SPLICE'))
                         pos = after_splice
                 else:
                     # Unknown format - keep as is
-                    result.append('#SPLICE')
+                    edits.append((splice_start, after_splice, '#SPLICE'))
                     pos = after_splice
             else:
                 # #SPLICE at end of file
-                result.append('#SPLICE')
+                edits.append((splice_start, after_splice, '#SPLICE'))
                 pos = after_splice
 
-        return ''.join(result)
+        return self._splice(source, edits)
 
     def _skip_mdl_macros(self, source: str) -> str:
         """
@@ -1124,32 +1236,29 @@ class ZILCompiler:
         macro expansion.
         """
         import re
-        result = []
+        pattern = re.compile(r'<\s*DEFINE\s+', re.IGNORECASE)
+        edits = []
         pos = 0
 
-        while pos < len(source):
+        while True:
             # Only skip <DEFINE (not DEFMAC - we now support those)
-            match = re.search(r'<\s*DEFINE\s+', source[pos:], re.IGNORECASE)
+            match = pattern.search(source, pos)
             if not match:
-                result.append(source[pos:])
                 break
 
-            # Add text before match
-            result.append(source[pos:pos + match.start()])
-
             # Find the matching > for this <DEFINE
-            start = pos + match.start()
+            start = match.start()
             content, end = self._extract_balanced_content(source, start)
 
             if content:
                 # Skip the DEFINE definition entirely
+                edits.append((start, end, ''))
                 pos = end
             else:
                 # Can't find matching bracket, skip this character
-                result.append(source[pos + match.start()])
-                pos += match.start() + 1
+                pos = start + 1
 
-        return ''.join(result)
+        return self._splice(source, edits)
 
     def _fix_lax_brackets(self, source: str) -> str:
         """
@@ -1268,18 +1377,9 @@ class ZILCompiler:
         Returns True if there are unclosed <DEFMAC or <DEFINE forms
         before the given position.
         """
-        import re
-
-        # Find all macro definition starts and their closing brackets
-        macro_starts = []
-        for m in re.finditer(r'<\s*(DEFMAC|DEFINE)\s+', source[:pos], re.IGNORECASE):
-            # Find the matching > for this macro definition
-            _, end = self._extract_balanced_content(source, m.start())
-            if end > pos:
-                # The macro definition closes AFTER our position - we're inside it
-                return True
-
-        return False
+        index = self._source_index(source)
+        return any(index.head(start) in ('DEFMAC', 'DEFINE')
+                   for start in index.enclosing(pos))
 
     def _is_table_form(self, value) -> bool:
         """Check if value is a TABLE-family FormNode or a parsed TableNode."""
@@ -1287,126 +1387,72 @@ class ZILCompiler:
         if isinstance(value, TableNode):
             return True
         if isinstance(value, FormNode) and isinstance(value.operator, AtomNode):
-            op_name = value.operator.value.upper()
+            op_name = value.operator.upper
             return op_name in ('TABLE', 'ITABLE', 'LTABLE', 'PTABLE')
         return False
 
     def _process_ifflag(self, source: str) -> str:
         """Process IFFLAG directives with proper bracket balancing."""
         import re
-        result = []
-        pos = 0
-
-        while pos < len(source):
-            # Look for <IFFLAG
-            match = re.search(r'<\s*IFFLAG\s+', source[pos:], re.IGNORECASE)
-            if not match:
-                result.append(source[pos:])
-                break
-
-            # Add text before match
-            result.append(source[pos:pos + match.start()])
-
+        edits = []
+        for start, end, content in self._find_named_forms(source, 'IFFLAG'):
             # Check if this IFFLAG is inside a macro definition
-            ifflag_start = pos + match.start()
-            if self._is_inside_macro_def(source, ifflag_start):
+            if self._is_inside_macro_def(source, start):
                 # Inside macro definition - preserve the IFFLAG for macro expansion time
-                content, end = self._extract_balanced_content(source, ifflag_start)
-                if content:
-                    result.append(content)
-                    pos = end
-                else:
-                    result.append(match.group(0))
-                    pos += match.end()
                 continue
 
-            # Find the matching > for this <IFFLAG
-            start = pos + match.start()  # Start of <IFFLAG
-            content, end = self._extract_balanced_content(source, start)
-
-            if content:
-                # Extract just the part after <IFFLAG and before >
-                # content is like: <IFFLAG (BETA "...") (ELSE "...")>
-                # Find where IFFLAG ends within content
-                ifflag_match = re.match(r'<\s*IFFLAG\s+', content, re.IGNORECASE)
-                if ifflag_match:
-                    ifflag_content = content[ifflag_match.end():-1].strip()
-                else:
-                    ifflag_content = content[1:-1].strip()  # Fallback
-
-                # Parse and evaluate
-                parts = self._parse_conditional_parts(ifflag_content)
-                if parts and 'condition' in parts:
-                    flag_name = parts['condition']
-                    if flag_name in self.compilation_flags and self.compilation_flags[flag_name]:
-                        result.append(parts.get('true_expr', ''))
-                    else:
-                        result.append(parts.get('false_expr', ''))
+            # Extract just the part after <IFFLAG and before >
+            # content is like: <IFFLAG (BETA "...") (ELSE "...")>
+            ifflag_match = re.match(r'<\s*IFFLAG\s+', content, re.IGNORECASE)
+            if not ifflag_match:
+                continue
+            ifflag_content = content[ifflag_match.end():-1].strip()
+
+            # Parse and evaluate
+            parts = self._parse_conditional_parts(ifflag_content)
+            if parts and 'condition' in parts:
+                flag_name = parts['condition']
+                if flag_name in self.compilation_flags and self.compilation_flags[flag_name]:
+                    edits.append((start, end, parts.get('true_expr', '')))
                 else:
-                    # Can't parse, keep original
-                    result.append(content)
+                    edits.append((start, end, parts.get('false_expr', '')))
+            # else: can't parse, keep original
 
-                pos = end
-            else:
-                # Can't find matching bracket, skip
-                result.append(match.group(0))
-                pos += match.end()
-
-        return ''.join(result)
+        return self._splice(source, edits)
 
     def _process_version(self, source: str) -> str:
         """Process VERSION? directives with proper bracket balancing."""
         import re
-        result = []
-        pos = 0
-
-        while pos < len(source):
-            # Look for %<VERSION? or <VERSION? (% is optional)
-            match = re.search(r'%?<\s*VERSION\?\s+', source[pos:], re.IGNORECASE)
-            if not match:
-                result.append(source[pos:])
-                break
-
-            # Add text before match
-            result.append(source[pos:pos + match.start()])
-
-            # Find the matching > for this VERSION?
-            # Check if % prefix was present
-            has_percent = source[pos + match.start()] == '%'
-            start = pos + match.start() + (1 if has_percent else 0)  # +1 to skip % if present
-            content, end = self._extract_balanced_content(source, start)
-
-            if content:
-                # Extract just the part after <VERSION?
-                version_content = content[len('<VERSION?'):-1].strip()  # Remove <VERSION? prefix and >
-
-                # Parse and evaluate
-                parts = self._parse_conditional_parts(version_content)
-                if parts and 'condition' in parts:
-                    target_version = parts['condition']
-                    version_matches = False
-                    if target_version == 'ZIP':
-                        version_matches = (self.version == 3)
-                    elif target_version == 'EZIP':
-                        version_matches = (self.version == 4)
-                    elif target_version == 'XZIP':
-                        version_matches = (self.version == 5)
-
-                    if version_matches:
-                        result.append(parts.get('true_expr', ''))
-                    else:
-                        result.append(parts.get('false_expr', ''))
+        edits = []
+        for start, end, content in self._find_named_forms(source, 'VERSION?'):
+            # %<VERSION? or <VERSION? (% is optional; it goes with the form)
+            if start > 0 and source[start - 1] == '%':
+                start -= 1
+            head = re.match(r'<\s*VERSION\?\s+', content, re.IGNORECASE)
+            if not head:
+                continue
+            # Extract just the part after <VERSION?
+            version_content = content[head.end():-1].strip()
+
+            # Parse and evaluate
+            parts = self._parse_conditional_parts(version_content)
+            if parts and 'condition' in parts:
+                target_version = parts['condition']
+                version_matches = False
+                if target_version == 'ZIP':
+                    version_matches = (self.version == 3)
+                elif target_version == 'EZIP':
+                    version_matches = (self.version == 4)
+                elif target_version == 'XZIP':
+                    version_matches = (self.version == 5)
+
+                if version_matches:
+                    edits.append((start, end, parts.get('true_expr', '')))
                 else:
-                    # Can't parse, keep original
-                    result.append(('%' if has_percent else '') + content)
-
-                pos = end
-            else:
-                # Can't find matching bracket, skip
-                result.append(match.group(0))
-                pos += match.end()
+                    edits.append((start, end, parts.get('false_expr', '')))
+            # else: can't parse, keep original
 
-        return ''.join(result)
+        return self._splice(source, edits)
 
     def _process_zip_options(self, source: str) -> str:
         """Record enabled <ZIP-OPTIONS ...> and strip the forms (they emit no
@@ -1419,22 +1465,9 @@ class ZILCompiler:
         stripped and no options survive, so IF-UNDO strips its V5-only ISAVE.
         """
         import re
-        result = []
-        pos = 0
+        edits = []
         known = {'UNDO', 'COLOR', 'MOUSE', 'SOUND', 'DISPLAY'}
-        while pos < len(source):
-            match = re.search(r'<\s*ZIP-OPTIONS\b', source[pos:], re.IGNORECASE)
-            if not match:
-                result.append(source[pos:])
-                break
-            start = pos + match.start()
-            result.append(source[pos:start])
-            content, end = self._extract_balanced_content(source, start)
-            if not content:
-                # Unbalanced; leave as-is to avoid mangling source.
-                result.append(match.group(0))
-                pos += match.end()
-                continue
+        for start, end, content in self._find_named_forms(source, 'ZIP-OPTIONS'):
             # content is like <ZIP-OPTIONS UNDO COLOR>; drop the token, read opts
             inner = re.sub(r'^<\s*ZIP-OPTIONS\b', '', content[:-1],
                            flags=re.IGNORECASE)
@@ -1445,8 +1478,8 @@ class ZILCompiler:
                     if opt not in known:
                         self.log(f"  ZIP-OPTIONS: unknown option '{opt}'")
             self.log(f"  ZIP-OPTIONS enabled: {sorted(self.zip_options)}")
-            pos = end  # strip the form (emit nothing)
-        return ''.join(result)
+            edits.append((start, end, ''))  # strip the form (emit nothing)
+        return self._splice(source, edits)
 
     def _process_if_options(self, source: str) -> str:
         """Expand ZILF IF-<OPTION> compile-time forms per the enabled ZIP-OPTIONS.
@@ -1466,38 +1499,18 @@ class ZILCompiler:
             'IF-SOUND': 'SOUND',
             'IF-DISPLAY': 'DISPLAY',
         }
-        name_re = r'IF-UNDO|IF-COLOR|IF-MOUSE|IF-SOUND|IF-DISPLAY'
+        head = re.compile(r'<\s*(' + '|'.join(option_forms) + r')', re.IGNORECASE)
         for _ in range(50):
-            result = []
-            pos = 0
-            changed = False
-            while pos < len(source):
-                match = re.search(r'<\s*(' + name_re + r')\b',
-                                  source[pos:], re.IGNORECASE)
-                if not match:
-                    result.append(source[pos:])
-                    break
-                start = pos + match.start()
-                result.append(source[pos:start])
-                content, end = self._extract_balanced_content(source, start)
-                if not content:
-                    # Unbalanced; leave alone.
-                    result.append(match.group(0))
-                    pos += match.end()
-                    continue
-                head = re.match(r'<\s*(' + name_re + r')\b', content,
-                                re.IGNORECASE)
-                form_name = head.group(1).upper()
-                body = content[head.end():-1]  # between the form name and '>'
-                option = option_forms[form_name]
-                if option in self.zip_options:
-                    result.append(body)
-                # else: option disabled -> emit nothing (strip body)
-                changed = True
-                pos = end
-            source = ''.join(result)
-            if not changed:
+            edits = []
+            for start, end, content in self._find_named_forms(source, option_forms):
+                match = head.match(content)
+                body = content[match.end():-1]  # between the form name and '>'
+                option = option_forms[match.group(1).upper()]
+                # Option disabled -> emit nothing (strip body)
+                edits.append((start, end, body if option in self.zip_options else ''))
+            if not edits:
                 break
+            source = self._splice(source, edits)
         return source
 
     # ------------------------------------------------------------------
@@ -1529,22 +1542,18 @@ class ZILCompiler:
         forms = self._find_named_forms(source, 'DEFAULT-DEFINITION')
         if not forms:
             return source
-        out = []
-        pos = 0
+        edits = []
         for (start, end, content) in forms:
-            out.append(source[pos:start])
-            pos = end
             m = re.match(r'<\s*DEFAULT-DEFINITION\b', content, re.IGNORECASE)
             name, body = self._read_atom(content[m.end():-1])
             if name is None:
-                out.append(content)  # malformed; leave untouched
-                continue
+                continue  # malformed; leave untouched
             other = source[:start] + source[end:]
             if self._has_competing_definition(other, name.upper()):
-                continue  # overridden elsewhere -> drop the default
-            out.append(body)
-        out.append(source[pos:])
-        return ''.join(out)
+                edits.append((start, end, ''))  # overridden elsewhere -> drop the default
+                continue
+            edits.append((start, end, body))
+        return self._splice(source, edits)
 
     def _process_replace_definition(self, source: str) -> str:
         """Unwrap <REPLACE-DEFINITION NAME body...> forms.
@@ -1562,19 +1571,14 @@ class ZILCompiler:
         forms = self._find_named_forms(source, 'REPLACE-DEFINITION')
         if not forms:
             return source
-        out = []
-        pos = 0
+        edits = []
         for (start, end, content) in forms:
-            out.append(source[pos:start])
-            pos = end
             m = re.match(r'<\s*REPLACE-DEFINITION\b', content, re.IGNORECASE)
             name, body = self._read_atom(content[m.end():-1])
             if name is None:
-                out.append(content)  # malformed; leave untouched
-                continue
-            out.append(body)
-        out.append(source[pos:])
-        return ''.join(out)
+                continue  # malformed; leave untouched
+            edits.append((start, end, body))
+        return self._splice(source, edits)
 
     def _has_competing_definition(self, text: str, name: str) -> bool:
         import re
@@ -1663,14 +1667,8 @@ class ZILCompiler:
                                             get_map.get(putter, putter))
         # Strip only the paren-base structs we processed above; bare-base
         # (VECTOR) compile-time structs are left for the parser + macro expander.
-        if processed_spans:
-            _out = []
-            _pos = 0
-            for (_start, _end) in processed_spans:
-                _out.append(source[_pos:_start])
-                _pos = _end
-            _out.append(source[_pos:])
-            source = ''.join(_out)
+        source = self._splice(source, [(_start, _end, '')
+                                       for (_start, _end) in processed_spans])
         # (0-arg table-constructor DEFINEs -- NOUN-PHRASE, PARSER-RESULT,
         # PRSTBL, MAKE-READBUF, ... -- were already inlined by
         # _inline_table_constructors, so MAKE-<STRUCT> calls are present here.)
@@ -1679,14 +1677,13 @@ class ZILCompiler:
         # splice vals into the matching element (by byte offset); other bases
         # (e.g. <ITABLE ...>) keep the base and drop the inits.
         if make_names:
-            alt = '|'.join(re.escape(mk) for mk in
-                           sorted(make_names, key=len, reverse=True))
-            for (start, end, content) in reversed(
-                    self._find_named_forms(source, alt)):
+            edits = []
+            for (start, end, content) in self._find_named_forms(source, make_names):
                 toks = self._split_tokens(content[1:-1])
                 base = toks[2] if len(toks) >= 3 else '<>'
                 base = self._build_struct_table(base, toks[3:], accessors)
-                source = source[:start] + base + source[end:]
+                edits.append((start, end, base))
+            source = self._splice(source, edits)
         # Field accessors (fixpoint; a write value may itself be a read).
         source = self._rewrite_accessors(source, accessors)
         # Field-macro generators: <MAPF <> <FUNCTION (F) <EVAL `<DEFMAC
@@ -1719,30 +1716,23 @@ class ZILCompiler:
             strip_spans.append((start, end))
         if not fixed:
             return source
-        for (start, end) in sorted(strip_spans, reverse=True):
-            source = source[:start] + source[end:]
-        alt = '|'.join(re.escape(k) for k in sorted(fixed, key=len, reverse=True))
+        source = self._splice(source, [(start, end, '') for (start, end) in strip_spans])
         for _ in range(50):
-            forms = self._find_named_forms(source, alt)
+            forms = self._find_named_forms(source, fixed)
             if not forms:
                 break
-            out = []
-            pos = 0
+            edits = []
             for (start, end, content) in forms:
-                out.append(source[pos:start])
-                pos = end
                 toks = self._split_tokens(content[1:-1])
                 if not toks or toks[0].upper() not in fixed:
-                    out.append(content)
                     continue
                 gtext, off, getter, putter = fixed[toks[0].upper()]
                 args = toks[1:]
                 if not args:
-                    out.append(f'<{getter} {gtext} {off}>')
+                    edits.append((start, end, f'<{getter} {gtext} {off}>'))
                 else:
-                    out.append(f'<{putter} {gtext} {off} {" ".join(args)}>')
-            out.append(source[pos:])
-            source = ''.join(out)
+                    edits.append((start, end, f'<{putter} {gtext} {off} {" ".join(args)}>'))
+            source = self._splice(source, edits)
         return source
 
     def _inline_table_constructors(self, source: str) -> str:
@@ -1769,27 +1759,18 @@ class ZILCompiler:
         for name in ctor:
             source = self._strip_forms_by_head(
                 source, r'<\s*DEFINE\s+' + re.escape(name) + self._ATOM_BOUND)
-        alt = '|'.join(re.escape(n) for n in sorted(ctor, key=len, reverse=True))
         for _ in range(30):
-            forms = self._find_named_forms(source, alt)
+            forms = self._find_named_forms(source, ctor)
             if not forms:
                 break
-            out = []
-            pos = 0
-            changed = False
+            edits = []
             for (start, end, content) in forms:
-                out.append(source[pos:start])
-                pos = end
                 toks = self._split_tokens(content[1:-1])
                 if len(toks) == 1 and toks[0].upper() in ctor:
-                    out.append(ctor[toks[0].upper()])
-                    changed = True
-                else:
-                    out.append(content)
-            out.append(source[pos:])
-            source = ''.join(out)
-            if not changed:
+                    edits.append((start, end, ctor[toks[0].upper()]))
+            if not edits:
                 break
+            source = self._splice(source, edits)
         return source
 
     def _fold_table_sizes(self, source: str) -> str:
@@ -1829,11 +1810,8 @@ class ZILCompiler:
         forms = self._find_named_forms(source, 'ITABLE')
         if not forms:
             return source
-        out = []
-        pos = 0
+        edits = []
         for (start, end, content) in forms:
-            out.append(source[pos:start])
-            pos = end
             m = re.match(r'<\s*ITABLE\b', content, re.IGNORECASE)
             toks = self._split_tokens(content[m.end():-1])
             new = []
@@ -1851,9 +1829,8 @@ class ZILCompiler:
                     size_done = True
                     continue
                 new.append(t[1:] if t.startswith("'(") else t)
-            out.append('<ITABLE ' + ' '.join(new) + '>')
-        out.append(source[pos:])
-        return ''.join(out)
+            edits.append((start, end, '<ITABLE ' + ' '.join(new) + '>'))
+        return self._splice(source, edits)
 
     def _build_struct_table(self, base: str, inits, accessors: dict) -> str:
         """Splice MAKE-<STRUCT> field initializers into the base table.
@@ -1953,31 +1930,24 @@ class ZILCompiler:
         import re
         if not accessors:
             return source
-        alt = '|'.join(re.escape(k) for k in
-                       sorted(accessors, key=len, reverse=True))
         for _ in range(50):
-            forms = self._find_named_forms(source, alt)
+            forms = self._find_named_forms(source, accessors)
             if not forms:
                 break
-            out = []
-            pos = 0
+            edits = []
             for (start, end, content) in forms:
-                out.append(source[pos:start])
-                pos = end
                 toks = self._split_tokens(content[1:-1])
                 if not toks or toks[0].upper() not in accessors:
-                    out.append(content)
                     continue
                 off, getter, putter = accessors[toks[0].upper()]
                 args = toks[1:]
                 if len(args) <= 1:
                     struct = args[0] if args else '0'
-                    out.append(f'<{getter} {struct} {off}>')
+                    edits.append((start, end, f'<{getter} {struct} {off}>'))
                 else:
                     struct, val = args[0], ' '.join(args[1:])
-                    out.append(f'<{putter} {struct} {off} {val}>')
-            out.append(source[pos:])
-            source = ''.join(out)
+                    edits.append((start, end, f'<{putter} {struct} {off} {val}>'))
+            source = self._splice(source, edits)
         return source
 
     def _split_tokens(self, text: str):
@@ -2049,20 +2019,15 @@ class ZILCompiler:
         # 2. Strip any DEFAULT/REPLACE forms inlined in the compiled source so
         #    they never reach codegen (they are pure compile-time data).
         source = self._strip_named_forms(
-            source, 'DEFAULT-LIBRARY-MESSAGES|REPLACE-LIBRARY-MESSAGES')
+            source, ('DEFAULT-LIBRARY-MESSAGES', 'REPLACE-LIBRARY-MESSAGES'))
         # 3. Rewrite every <LIBRARY-MESSAGE ...> call.
         for _ in range(20):
             forms = self._find_named_forms(source, 'LIBRARY-MESSAGE')
             if not forms:
                 break
-            out = []
-            pos = 0
-            for (start, end, content) in forms:
-                out.append(source[pos:start])
-                out.append(self._resolve_library_message(content, msgs))
-                pos = end
-            out.append(source[pos:])
-            source = ''.join(out)
+            source = self._splice(source, [
+                (start, end, self._resolve_library_message(content, msgs))
+                for (start, end, content) in forms])
         return source
 
     def _locate_used_message_files(self, source: str, base_path):
@@ -2107,59 +2072,66 @@ class ZILCompiler:
                     worklist.append(nm)
         return texts
 
-    def _find_named_forms(self, text: str, name_alt: str):
-        """Yield (start, end, content) for each top-level <NAME ...> form whose
-        operator matches name_alt (a regex alternation), skipping matches inside
-        strings and !\\ char literals. Balanced via _extract_balanced_content.
-
-        The operator boundary is a ZIL atom boundary (not \\b): the char after
-        the name must not continue an atom. This both rejects longer names
-        (LIBRARY-MESSAGE vs LIBRARY-MESSAGES) and lets a shorter accessor name
-        (PST-V) coexist with a longer one (PST-V-WORD), since '-' is an atom
-        char that \\b would treat as a boundary."""
-        import re
-        pat = re.compile(r'<\s*(?:' + name_alt + r')(?![A-Za-z0-9?!/\-])',
-                         re.IGNORECASE)
-        results = []
-        n = len(text)
-        i = 0
-        while i < n:
-            ch = text[i]
-            if ch == '\\':  # MDL bare escape: \X quotes next char (e.g. \")
-                i += 2
-                continue
-            if ch == '"':
-                i += 1
-                while i < n and text[i] != '"':
-                    if text[i] == '\\' and i + 1 < n:
-                        i += 2
-                    else:
-                        i += 1
-                i += 1
-                continue
-            if ch == '!' and i + 1 < n and text[i + 1] == '\\':
-                i += 3
-                continue
-            if ch == '<' and pat.match(text, i):
-                content, end = self._extract_balanced_content(text, i)
-                if content:
-                    results.append((i, end, content))
-                    i = end
-                    continue
-            i += 1
-        return results
-
-    def _strip_named_forms(self, source: str, name_alt: str) -> str:
-        forms = self._find_named_forms(source, name_alt)
-        if not forms:
+    def _source_index(self, text: str) -> SourceIndex:
+        """SourceIndex of `text`, reused while the text is the same string:
+        passes that find nothing return their input unchanged, and passes
+        that rewrite it go through _splice, which derives the next index.
+        A few recent texts are kept, so a helper asked about a second text
+        (a DEFINE body, the pre-IFILE source) does not evict the first."""
+        indexes = self._source_indexes
+        for index in reversed(indexes):
+            if index.source is text:
+                return index
+        index = SourceIndex(text)
+        self._remember_source_index(index)
+        return index
+
+    def _remember_source_index(self, index: SourceIndex):
+        indexes = self._source_indexes
+        if index in indexes:
+            indexes.remove(index)
+        indexes.append(index)
+        if len(indexes) > 4:
+            del indexes[0]
+
+    def _splice(self, source: str, edits) -> str:
+        """Apply (start, end, replacement) edits to `source` in one copy,
+        keeping the SourceIndex of the result for the next pass."""
+        if not edits:
             return source
-        out = []
-        pos = 0
-        for (start, end, _content) in forms:
-            out.append(source[pos:start])
-            pos = end
-        out.append(source[pos:])
-        return ''.join(out)
+        index = self._source_index(source).spliced(edits)
+        self._remember_source_index(index)
+        return index.source
+
+    def _find_named_forms(self, text: str, names):
+        """(start, end, content) for each outermost <NAME ...> form headed by
+        `names` (one atom or an iterable of them, any case), skipping forms
+        inside strings and !\\ char literals. Looked up by head atom in the
+        text's SourceIndex, so the text itself is not searched.
+
+        The head is the whole atom: LIBRARY-MESSAGE does not match
+        <LIBRARY-MESSAGES ...>, and a shorter accessor name (PST-V) coexists
+        with a longer one (PST-V-WORD)."""
+        if isinstance(names, str):
+            names = (names,)
+        return self._source_index(text).outermost(names)
+
+    def _defined_names(self, text: str, head: str) -> set:
+        """Upper-cased atom naming each <HEAD NAME ...> form in `text`,
+        nested forms included (e.g. the macros a DEFMAC defines)."""
+        index = self._source_index(text)
+        names = set()
+        for start in index.forms_with_head((head,)):
+            _head, rest = self._read_atom(text[start + 1:index.end_of[start] - 1])
+            if rest[:1] in (' ', '\t', '\r', '\n'):
+                name, _rest = self._read_atom(rest)
+                if name:
+                    names.add(name.upper())
+        return names
+
+    def _strip_named_forms(self, source: str, names) -> str:
+        forms = self._find_named_forms(source, names)
+        return self._splice(source, [(start, end, '') for (start, end, _c) in forms])
 
     def _read_atom(self, text: str):
         """Return (atom, rest) reading one leading atom token (after skipping
@@ -2243,49 +2215,11 @@ class ZILCompiler:
         """Like _find_named_forms but matches a full head regex at '<' (so it can
         key on operator+name, e.g. r'<\\s*DEFINE\\s+PRONOUN\\b'). String/char-
         literal/backslash aware. Returns (start, end, content) list."""
-        import re
-        if isinstance(head_pat, str):
-            head_pat = re.compile(head_pat, re.IGNORECASE)
-        results = []
-        n = len(text)
-        i = 0
-        while i < n:
-            ch = text[i]
-            if ch == '\\':
-                i += 2
-                continue
-            if ch == '"':
-                i += 1
-                while i < n and text[i] != '"':
-                    if text[i] == '\\' and i + 1 < n:
-                        i += 2
-                    else:
-                        i += 1
-                i += 1
-                continue
-            if ch == '!' and i + 1 < n and text[i + 1] == '\\':
-                i += 3
-                continue
-            if ch == '<' and head_pat.match(text, i):
-                content, end = self._extract_balanced_content(text, i)
-                if content:
-                    results.append((i, end, content))
-                    i = end
-                    continue
-            i += 1
-        return results
+        return self._source_index(text).find(head_pat)
 
     def _strip_forms_by_head(self, source: str, head_regex: str) -> str:
         forms = self._find_forms_by_head(source, head_regex)
-        if not forms:
-            return source
-        out = []
-        pos = 0
-        for (start, end, _content) in forms:
-            out.append(source[pos:start])
-            pos = end
-        out.append(source[pos:])
-        return ''.join(out)
+        return self._splice(source, [(start, end, '') for (start, end, _c) in forms])
 
     _ATOM_BOUND = r'(?![A-Za-z0-9?!/\-])'
 
@@ -2297,17 +2231,14 @@ class ZILCompiler:
         if not forms:
             return source
         debug_on = bool(self.compilation_flags.get('DEBUG'))
-        out = []
-        pos = 0
+        edits = []
         for (start, end, content) in forms:
-            out.append(source[pos:start])
-            pos = end
             if debug_on:
                 m = re.match(r'<\s*IF-DEBUG\b', content, re.IGNORECASE)
-                out.append(content[m.end():-1])
-            # else strip
-        out.append(source[pos:])
-        return ''.join(out)
+                edits.append((start, end, content[m.end():-1]))
+            else:
+                edits.append((start, end, ''))
+        return self._splice(source, edits)
 
     def _process_if_beta(self, source: str) -> str:
         """Expand ZILF <IF-BETA body...> -> body iff the BETA compilation flag
@@ -2321,17 +2252,14 @@ class ZILCompiler:
         if not forms:
             return source
         beta_on = bool(self.compilation_flags.get('BETA'))
-        out = []
-        pos = 0
+        edits = []
         for (start, end, content) in forms:
-            out.append(source[pos:start])
-            pos = end
             if beta_on:
                 m = re.match(r'<\s*IF-BETA\b', content, re.IGNORECASE)
-                out.append(content[m.end():-1])
-            # else strip
-        out.append(source[pos:])
-        return ''.join(out)
+                edits.append((start, end, content[m.end():-1]))
+            else:
+                edits.append((start, end, ''))
+        return self._splice(source, edits)
 
     def _process_string_folds(self, source: str) -> str:
         r"""Fold compile-time <STRING ...> forms whose arguments are ALL string
@@ -2362,8 +2290,7 @@ class ZILCompiler:
                 r'"((?:[^"\\]|\\.)*)"\s*>', source, re.IGNORECASE)
         }
 
-        out = []
-        pos = 0
+        edits = []
         for (start, end, content) in forms:
             m = re.match(r'<\s*STRING\b', content, re.IGNORECASE)
             inner = content[m.end():-1]
@@ -2406,14 +2333,11 @@ class ZILCompiler:
                     break
             if not ok:
                 continue  # leave this form untouched
-            out.append(source[pos:start])
             # fold the % of a %-immediate (%<STRING ...>) into the replacement
-            if out[-1].endswith('%'):
-                out[-1] = out[-1][:-1]
-            out.append('"' + ''.join(parts) + '"')
-            pos = end
-        out.append(source[pos:])
-        return ''.join(out)
+            if start > 0 and source[start - 1] == '%':
+                start -= 1
+            edits.append((start, end, '"' + ''.join(parts) + '"'))
+        return self._splice(source, edits)
 
     def _process_version_ops(self, source: str) -> str:
         """Resolve the ZILF stdlib version-abstraction macros (GET/B, PUT/B,
@@ -2430,34 +2354,26 @@ class ZILCompiler:
         else:
             mapping = {'GET/B': 'GET', 'PUT/B': 'PUT',
                        'IN-PB/WTBL?': 'IN-PWTBL?', 'IN-B/WTBL?': 'IN-WTBL?'}
-        active = {mac: op for mac, op in mapping.items()
-                  if re.search(r'<\s*DEFMAC\s+' + re.escape(mac) + self._ATOM_BOUND,
-                               source, re.IGNORECASE)}
+        defined = self._defined_names(source, 'DEFMAC')
+        active = {mac: op for mac, op in mapping.items() if mac in defined}
         if not active:
             return source
-        alt = '|'.join(re.escape(m) for m in sorted(active, key=len, reverse=True))
         heads = {m: re.compile(r'<\s*' + re.escape(m) + self._ATOM_BOUND,
                                re.IGNORECASE) for m in active}
         for _ in range(50):
-            forms = self._find_named_forms(source, alt)
+            forms = self._find_named_forms(source, active)
             if not forms:
                 break
-            out = []
-            pos = 0
-            changed = False
+            edits = []
             for (start, end, content) in forms:
-                out.append(source[pos:start])
-                pos = end
                 mac = next((m for m in active if heads[m].match(content)), None)
                 if mac is None:
-                    out.append(content)
                     continue
-                out.append('<' + active[mac] + content[heads[mac].match(content).end():])
-                changed = True
-            out.append(source[pos:])
-            source = ''.join(out)
-            if not changed:
+                edits.append((start, end,
+                              '<' + active[mac] + content[heads[mac].match(content).end():]))
+            if not edits:
                 break
+            source = self._splice(source, edits)
         return source
 
     def _process_expand(self, source: str) -> str:
@@ -2470,15 +2386,11 @@ class ZILCompiler:
             forms = self._find_named_forms(source, 'EXPAND')
             if not forms:
                 break
-            out = []
-            pos = 0
+            edits = []
             for (start, end, content) in forms:
-                out.append(source[pos:start])
-                pos = end
                 m = re.match(r'<\s*EXPAND\b', content, re.IGNORECASE)
-                out.append(content[m.end():-1])
-            out.append(source[pos:])
-            source = ''.join(out)
+                edits.append((start, end, content[m.end():-1]))
+            source = self._splice(source, edits)
         return source
 
     def _process_pronouns(self, source: str) -> str:
@@ -2711,10 +2623,21 @@ class ZILCompiler:
         Extract content with balanced angle brackets.
         Returns (content, end_position) or (None, start_pos) if not balanced.
         Properly handles strings and character literals - doesn't count <> inside them.
+
+        A '<' that opens a form is answered from the source's SourceIndex;
+        the scan below only runs for one the index reads as text (inside a
+        string or after a backslash), which callers still treat as a form.
         """
         if start_pos >= len(source) or source[start_pos] != '<':
             return None, start_pos
 
+        index = self._source_index(source)
+        end = index.end_of.get(start_pos)
+        if end is not None:
+            return source[start_pos:end], end
+        if start_pos in index.unclosed:
+            return None, start_pos
+
         depth = 1
         pos = start_pos + 1
 
@@ -2840,65 +2763,21 @@ class ZILCompiler:
         return source
 
     def _toplevel_cond_pass(self, source: str) -> str:
-        import re
-        result = []
-        pos = 0
-        n = len(source)
-        depth = 0
-        in_string = False
-        i = 0
-        while i < n:
-            ch = source[i]
-            if in_string:
-                if ch == '\\' and i + 1 < n:
-                    i += 2
-                    continue
-                if ch == '"':
-                    in_string = False
-                i += 1
-                continue
-            if ch == '!' and i + 1 < n and source[i + 1] == '\\':
-                i += 3  # character literal !\x (may be " < >)
+        # Forms nested in no other form, outside strings, and not quoted,
+        # commented or %-read-macro'd by the character before them.
+        index = self._source_index(source)
+        edits = []
+        for start in index.forms_with_head(['COND']):
+            if index.parent_of[start] is not None:
                 continue
-            if ch == '\\' and i + 1 < n:
-                # A bare backslash OUTSIDE a string quotes the next char into an
-                # atom name -- e.g. the buzzword atom \" (a literal quote) in
-                # <BUZZ ... UNDO OOPS \. \, \">, or ,W?\" in the parser. The
-                # escaped char (especially a ") must NOT open a string, else
-                # string parity desyncs for the rest of the file and depth==0
-                # is reached inside PARSER, so routine-internal runtime CONDs
-                # (the bare-direction movement clause) get misread as top-level
-                # compile-time CONDs and deleted. _extract_balanced_content
-                # already skips it this way; keep the two scanners in sync.
-                i += 2
+            prev = source[start - 1] if start > 0 else ''
+            if prev in (';', "'", '%'):
                 continue
-            if ch == '"':
-                in_string = True
-                i += 1
-                continue
-            if ch == '<' and depth == 0:
-                m = re.match(r'<\s*COND(?![A-Z0-9?\-])', source[i:i + 16],
-                             re.IGNORECASE)
-                prev = source[i - 1] if i > 0 else ''
-                if m and prev not in (';', "'", '%'):
-                    content, end = self._extract_balanced_content(source, i)
-                    if content:
-                        result.append(source[pos:i])
-                        result.append(self._evaluate_compile_cond(content))
-                        pos = end
-                        i = end
-                        continue
-            if ch == '<':
-                depth += 1
-            elif ch == '>':
-                if depth > 0:
-                    depth -= 1
-            i += 1
-        result.append(source[pos:])
-        return ''.join(result)
+            end = index.end_of[start]
+            edits.append((start, end, self._evaluate_compile_cond(source[start:end])))
+        return self._splice(source, edits)
 
-    @staticmethod
-    def _pos_in_string(source: str, idx: int) -> bool:
+    def _pos_in_string(self, source: str, idx: int) -> bool:
         """True if character position `idx` lies inside a "..." string literal.
 
         The `%` read-macro (%<COND ...>, %<+ ...>, etc.) is inert inside MDL
@@ -2912,21 +2791,10 @@ class ZILCompiler:
         escape and the outside-string !\" char literal both leave a `"` that
         does not toggle string state. A naive look-back-one test miscounts
         consecutive backslashes (e.g. a string ending in \\") and desyncs
-        parity for the rest of the file.
+        parity for the rest of the file. The string spans come from the
+        source's SourceIndex, which reads them by exactly these rules.
         """
-        n = len(source)
-        limit = idx if idx < n else n
-        in_string = False
-        i = 0
-        while i < limit:
-            c = source[i]
-            if c == '\\' and i + 1 < n:
-                i += 2
-                continue
-            if c == '"':
-                in_string = not in_string
-            i += 1
-        return in_string
+        return self._source_index(source).in_string(idx)
 
     def _process_compile_cond(self, source: str) -> str:
         """
@@ -2938,51 +2806,30 @@ class ZILCompiler:
         The semicolon prefix makes it a comment that the lexer will skip.
         """
         import re
-        result = []
-        pos = 0
-
-        while pos < len(source):
-            # Look for %<COND (note: % prefix is critical)
-            match = re.search(r'%<\s*COND\s+', source[pos:], re.IGNORECASE)
-            if not match:
-                result.append(source[pos:])
-                break
-
-            abs_match_pos = pos + match.start()
-
-            # %<COND inside a string literal is just text, not a read-macro.
-            if self._pos_in_string(source, abs_match_pos):
-                result.append(source[pos:pos + match.end()])
-                pos = pos + match.end()
+        head = re.compile(r'<\s*COND\s+', re.IGNORECASE)
+        index = self._source_index(source)
+        edits = []
+        resume = 0
+        for start in index.forms_with_head(('COND',)):
+            # Only %<COND (note: % prefix is critical), not one inside an
+            # earlier %<COND
+            if start < resume or start == 0 or source[start - 1] != '%':
                 continue
 
             # Check if preceded by semicolon - if so, this is a comment form
             # that should be left for the lexer to skip
-            if abs_match_pos > 0 and source[abs_match_pos - 1] == ';':
-                # This is ;%<COND ...> - a comment form, skip it
-                result.append(source[pos:pos + match.end()])
-                pos = pos + match.end()
+            if start > 1 and source[start - 2] == ';':
                 continue
 
-            # Add text before match
-            result.append(source[pos:pos + match.start()])
-
-            # Find the matching > for this %<COND
-            # Skip the % and start from <
-            start = pos + match.start() + 1  # +1 to skip %
-            content, end = self._extract_balanced_content(source, start)
-
-            if content:
-                # Evaluate the COND at compile time
-                evaluated = self._evaluate_compile_cond(content)
-                result.append(evaluated)
-                pos = end
-            else:
-                # Can't find matching bracket, keep original
-                result.append(match.group(0))
-                pos += match.end()
+            end = index.end_of[start]
+            content = source[start:end]
+            if not head.match(content):
+                continue
+            # Evaluate the COND at compile time
+            edits.append((start - 1, end, self._evaluate_compile_cond(content)))
+            resume = end
 
-        return ''.join(result)
+        return self._splice(source, edits)
 
     def _evaluate_compile_cond(self, content: str) -> str:
         """
@@ -3181,17 +3028,10 @@ class ZILCompiler:
         if not text:
             return ('', '')
 
-        # If it starts with <, find matching >
+        # If it starts with <, find matching > (not one inside a string)
         if text[0] == '<':
-            depth = 1
-            pos = 1
-            while pos < len(text) and depth > 0:
-                if text[pos] == '<':
-                    depth += 1
-                elif text[pos] == '>':
-                    depth -= 1
-                pos += 1
-            if depth == 0:
+            pos = SourceIndex(text).end_of.get(0)
+            if pos is not None:
                 return (text[:pos], text[pos:].strip())
             else:
                 # Unmatched, treat whole thing as test
@@ -3244,9 +3084,8 @@ class ZILCompiler:
         Note: %<" is MDL escape for literal quote, not a compile-time form!
         Similarly %<, %<. etc. are not compile-time forms.
         """
-        import re
         self._scan_ct_constants(source)
-        result = []
+        edits = []
         pos = 0
 
         # Valid compile-time operators that start a form
@@ -3257,18 +3096,14 @@ class ZILCompiler:
                        'MAPF', 'MAPR', 'ILIST', 'IVECTOR', 'ITABLE', 'STRING', 'BYTE',
                        'FORM', 'CHTYPE', 'PARSE', 'UNPARSE', 'SPNAME', 'PNAME')
 
-        while pos < len(source):
+        while True:
             # Look for %< (compile-time form)
-            match = re.search(r'%<', source[pos:])
-            if not match:
-                result.append(source[pos:])
+            match_pos = source.find('%<', pos)
+            if match_pos < 0:
                 break
 
-            match_pos = pos + match.start()
-
             # %< inside a string literal is just text, not a read-macro.
             if self._pos_in_string(source, match_pos):
-                result.append(source[pos:match_pos + 2])
                 pos = match_pos + 2
                 continue
 
@@ -3292,13 +3127,9 @@ class ZILCompiler:
 
             if not is_compile_form:
                 # Not a compile-time form - keep the %< as-is
-                result.append(source[pos:match_pos + 2])  # Include %<
                 pos = match_pos + 2
                 continue
 
-            # Add text before match
-            result.append(source[pos:match_pos])
-
             # Find the matching > for this %<
             # Skip the % and start from <
             start = match_pos + 1  # +1 to skip %
@@ -3308,18 +3139,17 @@ class ZILCompiler:
                 # Try to evaluate the expression
                 evaluated = self._evaluate_compile_expr(content)
                 if evaluated is not None:
-                    result.append(str(evaluated))
+                    edits.append((match_pos, end, str(evaluated)))
                 else:
                     # Can't evaluate - leave placeholder 0 to avoid parse errors
                     # This is not ideal but allows compilation to continue
-                    result.append('0')
+                    edits.append((match_pos, end, '0'))
                 pos = end
             else:
                 # Can't find matching bracket, skip
-                result.append('%')
                 pos = match_pos + 1
 
-        return ''.join(result)
+        return self._splice(source, edits)
 
     def _strip_compile_forms(self, source: str) -> str:
         """
@@ -3328,69 +3158,23 @@ class ZILCompiler:
         At the top level, we strip them entirely.
         Inside another form, we replace with 0 placeholder.
         """
-        import re
-        result = []
-        pos = 0
-
-        while pos < len(source):
-            # Look for %<
-            match = re.search(r'%<', source[pos:])
-            if not match:
-                result.append(source[pos:])
-                break
-
-            match_pos = pos + match.start()
-
-            # %< inside a string literal is just text, not a read-macro.
-            if self._pos_in_string(source, match_pos):
-                result.append(source[pos:match_pos + 2])
-                pos = match_pos + 2
+        index = self._source_index(source)
+        edits = []
+        resume = 0
+        for start in index.starts:
+            # %<...> outside strings, not inside an earlier one
+            if start < resume or start == 0 or source[start - 1] != '%':
                 continue
+            # ;%<...> is commented out - leave it for the lexer to skip
+            if start > 1 and source[start - 2] == ';':
+                continue
+            # Strip the form - if at top level (no form encloses it),
+            # remove entirely; if inside a form, replace with 0 placeholder
+            at_top_level = index.parent_of[start] is None
+            resume = index.end_of[start]
+            edits.append((start - 1, resume, '' if at_top_level else '0'))
 
-            # Add text before match
-            result.append(source[pos:match_pos])
-
-            # Figure out if we're inside a form by scanning from start
-            # We need to properly handle strings when counting brackets
-            at_top_level = True
-
-            # Check if we're inside a form by counting brackets with string awareness
-            # Brackets inside strings don't affect nesting depth
-            text_before = source[:match_pos]
-            depth = 0
-            in_string = False
-            i = 0
-            while i < len(text_before):
-                char = text_before[i]
-                if char == '"' and (i == 0 or text_before[i-1] != '\\'):
-                    in_string = not in_string
-                elif not in_string:
-                    if char == '<':
-                        depth += 1
-                    elif char == '>':
-                        depth -= 1
-                i += 1
-
-            if depth > 0:
-                at_top_level = False
-
-            # Skip the % and start from <
-            start = match_pos + 1  # +1 to skip %
-            content, end = self._extract_balanced_content(source, start)
-
-            if content:
-                # Strip the form - if at top level, remove entirely
-                # If inside a form, replace with 0 placeholder
-                if not at_top_level:
-                    result.append('0')
-                # else: discard entirely
-                pos = end
-            else:
-                # Can't find matching bracket, keep the %
-                result.append('%')
-                pos = match_pos + 1
-
-        return ''.join(result)
+        return self._splice(source, edits)
 
     def _split_zil_elements(self, text: str) -> list:
         """Split ZIL source text into its top-level elements (as raw text).
@@ -3600,54 +3384,36 @@ class ZILCompiler:
         # Iterate to a fixpoint so selector calls nested inside a selected
         # arm are expanded too (bounded to guard against self-recursion).
         for _ in range(20):
-            changed = False
-            result = []
+            edits = []
             pos = 0
-            while pos < len(source):
+            while True:
                 m = name_re.search(source, pos)
                 if not m:
-                    result.append(source[pos:])
                     break
                 mp = m.start()
                 if mp > 0 and source[mp - 1] == ';':
                     # ;%<NAME ...> is a comment form -- leave it alone
-                    result.append(source[pos:m.end()])
                     pos = m.end()
                     continue
                 content, end = self._extract_balanced_content(source, mp + 1)
                 if not content:
-                    result.append(source[pos:m.end()])
                     pos = m.end()
                     continue
                 repl = self._evaluate_selector_call(defs, content)
                 if repl is None:
                     # Not evaluable: keep intact for the strip pass
-                    result.append(source[pos:end])
                     pos = end
                     continue
                 # A bare-atom/false result (e.g. the default T) is a no-op
                 # at top level: emitting it there would leave a stray atom.
                 if repl in ('T', '<>', ''):
-                    text_before = ''.join(result) + source[pos:mp]
-                    depth = 0
-                    in_str = False
-                    for ch in text_before:
-                        if ch == '"':
-                            in_str = not in_str
-                        elif not in_str:
-                            if ch == '<':
-                                depth += 1
-                            elif ch == '>':
-                                depth -= 1
-                    if depth <= 0:
+                    if next(self._source_index(source).enclosing(mp), None) is None:
                         repl = ''
-                result.append(source[pos:mp])
-                result.append(repl)
+                edits.append((mp, end, repl))
                 pos = end
-                changed = True
-            source = ''.join(result)
-            if not changed:
+            if not edits:
                 break
+            source = self._splice(source, edits)
         return source
 
     def _evaluate_compile_expr(self, content: str) -> object:
@@ -4092,18 +3858,7 @@ class ZILCompiler:
                 self.log(f"  BIT-SYNONYM: {bs.alias} -> {bs.original}")
 
         # Collect all flags from objects and rooms
-        all_flags = set()
-        for obj in program.objects + program.rooms:
-            if 'FLAGS' in obj.properties:
-                flags_prop = obj.properties['FLAGS']
-                if isinstance(flags_prop, AtomNode):
-                    all_flags.add(flags_prop.value)
-                elif isinstance(flags_prop, (list, tuple)):
-                    for f in flags_prop:
-                        if isinstance(f, AtomNode):
-                            all_flags.add(f.value)
-                        elif isinstance(f, str):
-                            all_flags.add(f)
+        all_flags = set(self.symbols.names('flag'))
 
         # Also scan routines for FSET/FCLEAR/FSET? usage to find flags
         from .parser.ast_nodes import FormNode, GlobalVarNode
@@ -4116,11 +3871,11 @@ class ZILCompiler:
                 return node.name
             elif isinstance(node, FormNode):
                 # Check for QUOTE form: 'FLAGNAME -> <QUOTE FLAGNAME>
-                if isinstance(node.operator, AtomNode) and node.operator.value.upper() == 'QUOTE':
+                if isinstance(node.operator, AtomNode) and node.operator.upper == 'QUOTE':
                     if node.operands and isinstance(node.operands[0], AtomNode):
                         return node.operands[0].value
                 # Check for GVAL form: ,FLAGNAME -> <GVAL FLAGNAME>
-                elif isinstance(node.operator, AtomNode) and node.operator.value.upper() == 'GVAL':
+                elif isinstance(node.operator, AtomNode) and node.operator.upper == 'GVAL':
                     if node.operands and isinstance(node.operands[0], AtomNode):
                         return node.operands[0].value
             return None
@@ -4132,7 +3887,7 @@ class ZILCompiler:
             if isinstance(node, FormNode):
                 op_name = None
                 if isinstance(node.operator, AtomNode):
-                    op_name = node.operator.value.upper()
+                    op_name = node.operator.upper
                 if op_name in ('FSET', 'FCLEAR', 'FSET?', 'FSET?-OPTIONAL'):
                     # Second operand is the flag name
                     if len(node.operands) >= 2:
@@ -4164,8 +3919,7 @@ class ZILCompiler:
 
         # Exclude globals from being treated as flags
         # (e.g., P-GWIMBIT is a global holding a flag number, not a flag itself)
-        global_names = {g.name for g in program.globals}
-        all_flags -= global_names
+        all_flags.difference_update(self.symbols.names('global'))
 
         # Check if flags are already defined as constants
         from .parser.ast_nodes import NumberNode
@@ -4221,8 +3975,8 @@ class ZILCompiler:
         next_prop = 3  # Custom properties start at 3
 
         # Check if SYNONYM or ADJECTIVE are used in any object - add P? constants
-        uses_synonym = any('SYNONYM' in obj.properties for obj in program.objects + program.rooms)
-        uses_adjective = any('ADJECTIVE' in obj.properties for obj in program.objects + program.rooms)
+        uses_synonym = 'SYNONYM' in self.symbols.names('property')
+        uses_adjective = 'ADJECTIVE' in self.symbols.names('property')
 
         if uses_synonym:
             properties['P?SYNONYM'] = next_prop
@@ -4304,11 +4058,11 @@ class ZILCompiler:
             if len(value) >= 2:
                 first = value[0]
                 if isinstance(first, AtomNode):
-                    first_val = first.value.upper()
+                    first_val = first.upper
                     # (GOES TO dest) pattern
                     if first_val == 'GOES' and len(value) >= 3:
                         second = value[1]
-                        if isinstance(second, AtomNode) and second.value.upper() == 'TO':
+                        if isinstance(second, AtomNode) and second.upper == 'TO':
                             return True
                     # (TO dest) pattern
                     if first_val == 'TO':
@@ -4987,13 +4741,12 @@ class ZILCompiler:
             codegen._table_routine_marker_offsets.append((table_idx, _o))
         for _o, _child in pending_nst:
             codegen.table_addr_fixups.append((table_idx, _o, _child, 0))
-            codegen._tables_with_nested_ptrs.add(table_name_key)
         for _o, _fi in pending_voc:
             codegen._table_vocab_fixups.append((table_idx, _o, _fi))
 
         # Register the global to point to this table
         codegen.globals[dg.table_name] = codegen.next_global
-        codegen.global_values[dg.table_name] = 0xFF00 | table_idx  # Special marker for table reference
+        codegen._set_global_table(dg.table_name, table_idx)
         codegen.next_global += 1
 
         # Register each entry accessor with offsets
@@ -5004,10 +4757,104 @@ class ZILCompiler:
 
         self.log(f"  DEFINE-GLOBALS {dg.table_name}: {len(dg.entries)} entries, {len(table_data)} bytes")
 
+    def _open_build_cache(self, base_path):
+        """Return the BuildCache for this compile, or None when disabled.
+
+        The environment key covers everything that changes how the same
+        preprocessed text lexes and parses; the preprocessed text itself
+        already reflects IFFLAG/VERSION?/ZIP-OPTIONS resolution.
+        """
+        if self.build_cache is None or self.build_cache is False:
+            return None
+        env = {
+            'version': self.version,
+            'compilation_flags': sorted(self.compilation_flags.items(), key=repr),
+            'file_flags': sorted(self.file_flags),
+            'zip_options': sorted(getattr(self, 'zip_options', ()) or ()),
+        }
+        if isinstance(self.build_cache, dict):
+            # In-memory store shared across compiles (zorkie --serve).
+            return BuildCache(None, env, store=self.build_cache)
+        root = (Path(self.build_cache) if isinstance(self.build_cache, (str, Path))
+                else Path(base_path) / CACHE_DIR_NAME)
+        return BuildCache(root, env)
+
+    def _lex_and_parse(self, source: str, filename: str, base_path):
+        """Lex and parse preprocessed source into (tokens, program).
+
+        With a build cache, the source is split into content-defined units
+        (see zilc/build_cache.py); unchanged units are loaded instead of being
+        lexed and parsed again. Any unit that fails standalone sends the whole
+        source down the uncached path, so error locations stay exact.
+        """
+        phases = self.phase_stats
+        mdl_zil = 'MDL-ZIL?' in self.file_flags
+        cache = self._open_build_cache(base_path)
+        if cache is not None:
+            result = self._lex_and_parse_cached(source, filename, mdl_zil, cache)
+            if result is not None:
+                return result
+
+        self.log("Lexing...")
+        phases.begin('lex')
+        lexer = Lexer(source, filename)
+        tokens = lexer.tokenize()
+        self.log(f"  {len(tokens)} tokens")
+
+        self.log("Parsing...")
+        phases.begin('parse')
+        parser = Parser(tokens, filename, mdl_zil=mdl_zil)
+        return tokens, parser.parse()
+
+    def _lex_and_parse_cached(self, source: str, filename: str, mdl_zil: bool, cache):
+        """Unit-wise lex/parse through `cache`; None means fall back."""
+        phases = self.phase_stats
+        units = split_units(source)
+
+        self.log(f"Lexing ({len(units)} units, cache {cache.dir})...")
+        phases.begin('lex')
+        entries = []  # [first_line, text, tokens, nodes-or-None]
+        for first_line, text in units:
+            hit = cache.load(text)
+            if hit is not None:
+                entries.append([first_line, text, hit[0], hit[1]])
+                continue
+            try:
+                unit_tokens = Lexer(text, filename).tokenize()
+            except SyntaxError as e:
+                self.log(f"  unit at line {first_line} does not lex standalone ({e}); cache bypassed")
+                return None
+            entries.append([first_line, text, unit_tokens, None])
+
+        self.log("Parsing...")
+        phases.begin('parse')
+        nodes = []
+        for entry in entries:
+            first_line, text, unit_tokens, unit_nodes = entry
+            if unit_nodes is None:
+                try:
+                    unit_nodes = Parser(unit_tokens, filename, mdl_zil=mdl_zil).parse_nodes()
+                except SyntaxError as e:
+                    self.log(f"  unit at line {first_line} does not parse standalone ({e}); cache bypassed")
+                    return None
+                # Persist before relocating: cached lines are unit-relative.
+                cache.store(text, unit_tokens, unit_nodes)
+            shift_lines((unit_tokens, unit_nodes), first_line - 1)
+            nodes.extend(unit_nodes)
+        # The units concatenate back to the source, so their streams join
+        # into the stream of the whole source.
+        tokens = TokenStream.join([entry[2] for entry in entries])
+        self.log(f"  {len(tokens)} tokens; cache {cache.hits} hits, {cache.misses} misses")
+        program = Parser(tokens, filename, mdl_zil=mdl_zil).build_program(nodes)
+        return tokens, program
+
     def compile_string(self, source: str, filename: str = "<input>") -> bytes:
         """
         Compile ZIL source code to Z-machine bytecode.
 
+        Per-phase timings of the run are left in self.phase_stats, also when
+        compilation fails (the failing phase is the last record).
+
         Args:
             source: ZIL source code as string
             filename: Filename for error messages
@@ -5015,11 +4862,21 @@ class ZILCompiler:
         Returns:
             Z-machine story file as bytes
         """
+        self.phase_stats = PhaseStats(track_memory=self.timings)
+        try:
+            return self._compile_string(source, filename)
+        finally:
+            self.phase_stats.finish()
+
+    def _compile_string(self, source: str, filename: str) -> bytes:
+        """Body of compile_string; phase boundaries are marked on self.phase_stats."""
+        phases = self.phase_stats
         # Clear warnings and errors from any previous compilation
         self.warnings = []
         self.errors = []
 
         # Preprocess control characters (^L etc.)
+        phases.begin('preprocess')
         source = self.preprocess_control_characters(source)
 
         # Preprocess IFILE directives
@@ -5029,19 +4886,12 @@ class ZILCompiler:
 
         # Preprocess ZILF directives (COMPILATION-FLAG, IFFLAG, VERSION?)
         self.log("Preprocessing ZILF directives...")
+        phases.begin('directives')
         self._compile_base_path = base_path
         source = self.preprocess_zilf_directives(source, base_path)
 
-        # Lexical analysis
-        self.log("Lexing...")
-        lexer = Lexer(source, filename)
-        tokens = lexer.tokenize()
-        self.log(f"  {len(tokens)} tokens")
-
-        # Parsing
-        self.log("Parsing...")
-        parser = Parser(tokens, filename, mdl_zil='MDL-ZIL?' in self.file_flags)
-        program = parser.parse()
+        # Lexical analysis and parsing (reusing cached units when enabled)
+        tokens, program = self._lex_and_parse(source, filename, base_path)
         self.log(f"  {len(program.routines)} routines")
         self.log(f"  {len(program.objects)} objects")
         self.log(f"  {len(program.rooms)} rooms")
@@ -5049,6 +4899,9 @@ class ZILCompiler:
         self.log(f"  {len(program.propdefs)} property definitions")
         self.log(f"  {len(program.syntax)} syntax definitions")
         self.log(f"  {len(program.macros)} macro definitions")
+        # Definitions by name, kept current by the phases that add or drop
+        # them (see symbol_index.py)
+        self.symbols = SymbolIndex.from_program(program, filename)
 
         # Macro expansion and top-level form processing
         # Always call expand_all to handle:
@@ -5057,10 +4910,22 @@ class ZILCompiler:
         # - PRE-COMPILE hooks
         if program.macros or program.top_level_forms:
             self.log("Expanding macros...")
+            phases.begin('macros')
             expander = MacroExpander()
             expander.ct_globals.update(getattr(self, '_ct_globals', {}) or {})
+            expander.profile = self.macro_profile
+            expander.source_name = filename
+            expander.jobs = self.expand_jobs
+            expander.symbols = self.symbols
             program = expander.expand_all(program)
             self.log(f"  Macros expanded")
+            self.log(f"  Macro expansion cache: {expander.expansion_cache_hits} hits, "
+                     f"{expander.expansion_cache_misses} misses")
+
+        if self.hash_cons:
+            table = share_routines(program)
+            self.log(f"  Shared subtrees: {table.shared} occurrences of "
+                     f"{len(table)} distinct nodes")
 
         # Store program for access by codegen (e.g., for TELL-TOKENS)
         self.program = program
@@ -5070,9 +4935,7 @@ class ZILCompiler:
         # P-SPREP1 / P-SLOC1 records, VERBS indexed by verb-number). ZILF-library and
         # toy games use the byte-6 "options" VERBS layout indexed by action-number.
         # This flag selects the VERBS table format and the dictionary verb-byte below.
-        self._is_classic_parser = any(
-            getattr(r, 'name', '') == 'SYNTAX-CHECK' for r in program.routines
-        )
+        self._is_classic_parser = self.symbols.find('routine', 'SYNTAX-CHECK') is not None
 
         # Inject a standard-library PERFORM routine when the game calls PERFORM as
         # its verb dispatcher but no PERFORM routine survived compilation. Real
@@ -5101,9 +4964,11 @@ class ZILCompiler:
 
         # Glulx compilation path (version 256)
         if self.version == 256:
+            phases.begin('glulx')
             return self._compile_glulx(program)
 
         # Build symbol tables (flags, properties, parser constants)
+        phases.begin('symbols')
         symbol_tables = self._build_symbol_tables(program, source)
         self.log(f"  Pre-scanned {len(symbol_tables['flags'])} flags, {len(symbol_tables['properties'])} properties")
 
@@ -5117,6 +4982,7 @@ class ZILCompiler:
         if self.version >= 2:
             from .zmachine.abbreviations import AbbreviationsTable
             self.log("Building abbreviations table...")
+            phases.begin('abbreviations')
 
             # Collect all strings from the program
             all_strings = []
@@ -5266,11 +5132,13 @@ class ZILCompiler:
         # The abbreviation indices (Z-chars 1-3 + index) are stable after analyze_strings().
         # The assembler positions the actual abbreviation strings later.
         self.log("Generating code...")
+        phases.begin('codegen')
         codegen = ImprovedCodeGenerator(self.version, abbreviations_table=abbreviations_table,
                                        string_table=string_table,
                                        action_table=action_table_info,
                                        symbol_tables=symbol_tables,
                                        compiler=self)
+        codegen.jobs = self.codegen_jobs
         self._last_codegen = codegen  # debug introspection hook
 
         # Pre-register scalar compile-time constants so DEFINE-GLOBALS initial
@@ -5312,15 +5180,14 @@ class ZILCompiler:
         routines_code = codegen.generate(program)
         self.log(f"  {len(routines_code)} bytes of routines")
 
-        # Get routine call fixups for address resolution
+        # Routine call fixups (this also collects calls to undefined routines)
         routine_fixups = codegen.get_routine_fixups()
         if routine_fixups:
             self.log(f"  {len(routine_fixups)} routine call fixups")
 
-        # Get table routine fixups (for ACTIONS table, etc.)
-        table_routine_fixups = codegen.get_table_routine_fixups()
-        if table_routine_fixups:
-            self.log(f"  {len(table_routine_fixups)} table routine fixups")
+        # Collect routines the tables (ACTIONS, etc.) name but nobody
+        # defined; the table relocations themselves are taken at assembly.
+        codegen.get_table_relocations()
 
         # Report missing routines as errors (one error per call site)
         missing_routines = codegen.get_missing_routines()
@@ -5382,7 +5249,6 @@ class ZILCompiler:
         # Get table data and offsets
         table_data = codegen.get_table_data() if codegen.tables else b''
         table_offsets = codegen.get_table_offsets() if codegen.tables else {}
-        tables_with_placeholders = codegen.get_tables_with_placeholders() if codegen.tables else []
         impure_tables_size = codegen.get_impure_tables_size() if codegen.tables else 0
         if table_data:
             self.log(f"  {len(codegen.tables)} tables ({len(table_data)} bytes, {impure_tables_size} impure)")
@@ -5397,6 +5263,7 @@ class ZILCompiler:
 
         # Build dictionary first to get word offsets for SYNONYM properties
         self.log("Building dictionary vocabulary...")
+        phases.begin('dictionary')
         # Check for NEW-PARSER? (from global) and related compilation flags
         new_parser = self.compile_globals.get('NEW-PARSER?', False)
         # WORD-FLAGS-IN-TABLE and ONE-BYTE-PARTS-OF-SPEECH are COMPILATION-FLAGs
@@ -5948,8 +5815,8 @@ class ZILCompiler:
             if 'WORD-FLAG-TABLE' not in codegen.globals:
                 codegen.globals['WORD-FLAG-TABLE'] = codegen.next_global
                 codegen.next_global += 1
-            # Link global to the table using 0xFF00 | table_index pattern
-            codegen.global_values['WORD-FLAG-TABLE'] = 0xFF00 | table_index
+            # Link global to the table
+            codegen._set_global_table('WORD-FLAG-TABLE', table_index)
 
             # Refresh table data and offsets
             table_data = codegen.get_table_data()
@@ -6065,13 +5932,12 @@ class ZILCompiler:
                 # Field 2: WORD-FLAGS (0 if WORD-FLAGS-IN-TABLE)
                 vword_data.extend([0x00, 0x00])
 
-                # Field 3: WORD-SEMANTIC-STUFF (VERB-DATA table pointer for verbs)
+                # Field 3: WORD-SEMANTIC-STUFF (VERB-DATA table pointer for verbs),
+                # patched positionally by the assembler (table_addr_fixups)
                 if word in verb_data_tables:
-                    # Use 0xFF00 | table_index pattern for table reference
-                    verb_data_ref = 0xFF00 | verb_data_tables[word]
-                    vword_data.extend([(verb_data_ref >> 8) & 0xFF, verb_data_ref & 0xFF])
-                else:
-                    vword_data.extend([0x00, 0x00])
+                    codegen.table_addr_fixups.append(
+                        (len(codegen.tables), len(vword_data), verb_data_tables[word], 0))
+                vword_data.extend([0x00, 0x00])
 
                 # Field 4: WORD-VERB-STUFF
                 vword_data.extend([0x00, 0x00])
@@ -6116,10 +5982,11 @@ class ZILCompiler:
                 # Field 2: WORD-FLAGS (0 if WORD-FLAGS-IN-TABLE)
                 vword_data.extend([0x00, 0x00])
 
-                # Field 3: WORD-SEMANTIC-STUFF (pointer to main word's VWORD table)
-                # Use 0xFF00 | table_index pattern for table reference
-                main_vword_ref = 0xFF00 | vword_tables[main_word]
-                vword_data.extend([(main_vword_ref >> 8) & 0xFF, main_vword_ref & 0xFF])
+                # Field 3: WORD-SEMANTIC-STUFF (pointer to main word's VWORD
+                # table), patched positionally like the verb's VERB-DATA pointer
+                codegen.table_addr_fixups.append(
+                    (len(codegen.tables), len(vword_data), vword_tables[main_word], 0))
+                vword_data.extend([0x00, 0x00])
 
                 # Field 4: WORD-VERB-STUFF
                 vword_data.extend([0x00, 0x00])
@@ -6138,16 +6005,125 @@ class ZILCompiler:
 
             self.log(f"  Generated {len(vword_tables)} VWORD tables ({synonym_vword_count} synonyms) and {len(verb_data_tables)} VERB-DATA tables")
 
-            # Refresh table data, offsets, placeholder ranges, impure size, and routine fixups
+            # Refresh table data, offsets and impure size
             table_data = codegen.get_table_data()
             table_offsets = codegen.get_table_offsets()
-            tables_with_placeholders = codegen.get_tables_with_placeholders()
             impure_tables_size = codegen.get_impure_tables_size()
-            table_routine_fixups = codegen.get_table_routine_fixups()  # Recalculate with new offsets
             globals_data = codegen.build_globals_data()
 
+        # Everything above is independent of the V4+ SYNONYM word cap; the
+        # object table is the first phase that reads it. When compile_file may
+        # need the capped retry, snapshot the state here so the retry resumes
+        # at the object table instead of re-running the whole front end.
+        state = {
+            'abbreviations_table': abbreviations_table,
+            'codegen': codegen,
+            'dict_word_offsets': dict_word_offsets,
+            'dictionary': dictionary,
+            'globals_data': globals_data,
+            'new_parser': new_parser,
+            'program': program,
+            'routines_code': routines_code,
+            'string_table': string_table,
+            'vocab_placeholders': vocab_placeholders,
+            'vword_internal_placeholders': vword_internal_placeholders,
+            'vword_tables': vword_tables,
+        }
+        # A VERSION in the source may have made this a V1-3 build after all;
+        # those are never retried.
+        if self._snapshot_back_end and self.version >= 4:
+            self._back_end_snapshot = self._take_back_end_snapshot(state)
+        return self._compile_back_end(state)
+
+    # Attributes never copied into (or restored from) a back-end snapshot.
+    _SNAPSHOT_EXCLUDE = ('phase_stats', 'build_cache', '_back_end_snapshot')
+
+    # The `state` entries the back end changes; it only reads the others
+    # (the program, the routine code, the dictionary offsets, ...).
+    _BACK_END_MUTABLE = ('abbreviations_table', 'codegen', 'dictionary',
+                         'string_table', 'vocab_placeholders')
+
+    def _take_back_end_snapshot(self, state: dict):
+        """Copy what the back end changes: the _BACK_END_MUTABLE entries of
+        `state`, deeply, and the compiler attributes, which it rebinds or
+        appends to, one level deep.  Everything else is shared with the
+        running compile: the deep copy reaches the program, the compiler and
+        its attributes through its memo, as the originals or the attribute
+        copies.
+
+        Returns None if the state cannot be copied; the caller then falls
+        back to recompiling from source.
+        """
+        import copy
+        attrs, memo = {}, {id(self): self}
+        for name, value in self.__dict__.items():
+            if name in self._SNAPSHOT_EXCLUDE:
+                continue
+            attrs[name] = (value.copy() if isinstance(value, (list, dict, set))
+                           else value)
+            memo[id(value)] = attrs[name]
+        for name, value in state.items():
+            memo[id(value)] = value
+        mutable = {name: state[name] for name in self._BACK_END_MUTABLE}
+        for value in mutable.values():
+            memo.pop(id(value), None)
+        try:
+            copied = copy.deepcopy(mutable, memo)
+        except (RecursionError, TypeError, copy.Error) as e:
+            self.log(f"  Back-end snapshot unavailable ({type(e).__name__}); "
+                     f"a size retry will recompile from source")
+            return None
+        # Attributes naming a copied entry (_last_codegen) follow the copy.
+        for name, value in attrs.items():
+            for key, original in mutable.items():
+                if value is original:
+                    attrs[name] = copied[key]
+        return {**state, **copied}, attrs
+
+    def _resume_back_end(self, snapshot, syn_word_cap: int) -> bytes:
+        """Re-run the object table, optimisation and assembly from a snapshot
+        with a different V4+ SYNONYM word cap. Phase records are appended to
+        self.phase_stats with a ':retry' suffix."""
+        state, attrs = snapshot
+        keep = {k: self.__dict__[k] for k in self._SNAPSHOT_EXCLUDE if k in self.__dict__}
+        self.__dict__.clear()
+        self.__dict__.update(attrs)
+        self.__dict__.update(keep)
+        self._back_end_snapshot = None
+        self._v4_syn_word_cap = syn_word_cap
+        first = self.phase_stats
+        self.phase_stats = PhaseStats(track_memory=self.timings)
+        try:
+            return self._compile_back_end(state)
+        finally:
+            self.phase_stats.finish()
+            for rec in self.phase_stats:
+                rec.name += ':retry'
+                first.records.append(rec)
+            self.phase_stats = first
+
+    def _compile_back_end(self, state: dict) -> bytes:
+        """Object table, optimisation passes and assembly.
+
+        `state` holds the front-end results (see the end of _compile_string).
+        """
+        phases = self.phase_stats
+        abbreviations_table = state['abbreviations_table']
+        codegen = state['codegen']
+        dict_word_offsets = state['dict_word_offsets']
+        dictionary = state['dictionary']
+        globals_data = state['globals_data']
+        new_parser = state['new_parser']
+        program = state['program']
+        routines_code = state['routines_code']
+        string_table = state['string_table']
+        vocab_placeholders = state['vocab_placeholders']
+        vword_internal_placeholders = state['vword_internal_placeholders']
+        vword_tables = state['vword_tables']
+
         # Build object table with proper properties
         self.log("Building object table...")
+        phases.begin('objects')
         obj_table = ObjectTable(self.version, text_encoder=codegen.encoder)
 
         # Track flag bit assignments - auto-assign if not defined as constants
@@ -6255,8 +6231,8 @@ class ZILCompiler:
             self.log(f"  LOW-DIRECTION = {low_direction}")
 
         # Check if SYNONYM or ADJECTIVE are used - add to prop_map
-        uses_synonym = any('SYNONYM' in obj.properties for obj in program.objects + program.rooms)
-        uses_adjective = any('ADJECTIVE' in obj.properties for obj in program.objects + program.rooms)
+        uses_synonym = 'SYNONYM' in self.symbols.names('property')
+        uses_adjective = 'ADJECTIVE' in self.symbols.names('property')
 
         if uses_synonym:
             prop_map['SYNONYM'] = next_prop_num
@@ -6296,29 +6272,34 @@ class ZILCompiler:
                 f"(max {low_direction - 1} in V{self.version})"
             )
 
-        # Track dictionary word fixups for object properties
-        # Each entry is (word, property_offset) - to be resolved during assembly
-        dict_word_fixups = []
-
-        # Track property routine fixups for object properties
-        # Maps placeholder_idx -> routine_name for assembly-time resolution
-        # Placeholders are 0xFA00 | idx values stored in property data
-        property_routine_map = {}  # placeholder_idx -> routine_name
+        # Property routine markers: 0xFA00 | idx values stored in property
+        # data, one index per routine name (placeholder_idx -> routine_name)
+        property_routine_map = {}
         next_routine_placeholder_idx = 0
-        # Positional property-routine fixup state (>256 distinct routines,
-        # e.g. wishbringer/trinity).  'pending' and 'overrides'/'used_global'
-        # are per-object (reset each object); 'positional' accumulates
-        # (obj_idx, prop_num, byte_off, routine_name) across all objects and
-        # is only USED when 'overflow' flips True (mode decided at the end of
-        # the object loop; <=256-routine games keep the legacy scheme and
-        # stay byte-identical).
-        _prp_state = {'overflow': False, 'pending': [], 'overrides': {},
-                      'used_global': set(), 'positional': []}
+        # Marker words written into the current object's property values,
+        # reset each object (see _record_object_marks):
+        #   'issued'  -- marker word -> (kind, target) for every marker the
+        #                helpers below handed out;
+        #   'marks'   -- (prop_num, byte_off, kind, target) for markers whose
+        #                place in the property is known where they are written
+        #                (dictionary words);
+        #   'overrides'/'used_global' -- routine marker indices recycled per
+        #                object once 'overflow' flips (>256 distinct routines,
+        #                e.g. wishbringer/trinity).
+        _prp_state = {'overflow': False, 'issued': {}, 'marks': [],
+                      'overrides': {}, 'used_global': set()}
+
+        def _issue(word, kind, target):
+            """Note that `word` in the current object's property values is a
+            marker for `target`, and return it."""
+            _prp_state['issued'].setdefault(word & 0xFFFF, (kind, target))
+            return word
 
         # Build sets for property value validation
         global_names = {g.name for g in program.globals}
         constant_names = {c.name for c in program.constants}
-        object_names = {o.name for o in program.objects + program.rooms}
+        object_names = (self.symbols.names('object')
+                        | self.symbols.names('room'))
 
         # Store for direction exit validation (IF CONDITION check)
         self._current_globals_set = global_names
@@ -6559,7 +6540,8 @@ class ZILCompiler:
                             # Use codegen's vocab placeholder system (deduped by word)
                             placeholder_idx = codegen._intern_vocab_placeholder(word_lower)
                             # Store placeholder value (will be resolved to dict address)
-                            placeholder_val = 0xFB00 | placeholder_idx
+                            placeholder_val = _issue(0xFB00 | (placeholder_idx & 0xFF),
+                                                     VOCAB, placeholder_idx)
                             result.extend([(placeholder_val >> 8) & 0xFF,
                                            placeholder_val & 0xFF])
                         else:
@@ -6656,6 +6638,9 @@ class ZILCompiler:
             if atom_name in codegen.constants:
                 val = codegen.constants[atom_name]
                 if isinstance(val, int):
+                    mark = codegen._data_mark(val)
+                    if mark is not None and mark[0] in (STRING, VOCAB):
+                        _issue(val, *mark)
                     return val
             # Check if it's a routine name - create placeholder for later fixup
             if atom_name in routine_names:
@@ -6671,8 +6656,7 @@ class ZILCompiler:
                 _ov = _prp_state['overrides']
                 for _pidx, _rn in _ov.items():
                     if _rn == atom_name:
-                        _prp_state['pending'].append((_pidx, atom_name))
-                        return 0xFA00 | _pidx
+                        return _issue(0xFA00 | _pidx, ROUTINE, atom_name)
                 _gidx = None
                 for _pidx, _rn in property_routine_map.items():
                     if _rn == atom_name:
@@ -6680,15 +6664,13 @@ class ZILCompiler:
                         break
                 if _gidx is not None and _gidx not in _ov:
                     _prp_state['used_global'].add(_gidx)
-                    _prp_state['pending'].append((_gidx, atom_name))
-                    return 0xFA00 | _gidx
+                    return _issue(0xFA00 | _gidx, ROUTINE, atom_name)
                 if _gidx is None and next_routine_placeholder_idx <= 0xFF:
                     placeholder_idx = next_routine_placeholder_idx
                     next_routine_placeholder_idx += 1
                     property_routine_map[placeholder_idx] = atom_name
                     _prp_state['used_global'].add(placeholder_idx)
-                    _prp_state['pending'].append((placeholder_idx, atom_name))
-                    return 0xFA00 | placeholder_idx
+                    return _issue(0xFA00 | placeholder_idx, ROUTINE, atom_name)
                 # Overflow (or global idx shadowed in this object): allocate a
                 # per-object recycled marker index.
                 _prp_state['overflow'] = True
@@ -6700,8 +6682,7 @@ class ZILCompiler:
                         '(>256 routine references in one object)')
                 _idx = _free[0]
                 _ov[_idx] = atom_name
-                _prp_state['pending'].append((_idx, atom_name))
-                return 0xFA00 | _idx
+                return _issue(0xFA00 | _idx, ROUTINE, atom_name)
             # Not found
             return None
 
@@ -6710,7 +6691,7 @@ class ZILCompiler:
             LDESC/FDESC/TEXT). Returns a 0xFC00|idx marker the assembler resolves
             to the string's packed address (data namespace: see
             register_data_string)."""
-            return codegen.register_data_string(text)
+            return _issue(codegen.register_data_string(text), STRING, text)
 
         def encode_exit_classic(value):
             """Encode a classic (PTSIZE-dispatched) direction exit property.
@@ -6775,10 +6756,9 @@ class ZILCompiler:
                 elif isinstance(node, _A):
                     nm = node.value.upper()
                 if nm is not None:
-                    for _c in program.constants:
-                        if _c.name.upper() == nm and isinstance(
-                                getattr(_c, 'value', None), _S):
-                            return _c.value.value
+                    for _sym in self.symbols.definitions('constant', nm, any_case=True):
+                        if isinstance(getattr(_sym.node, 'value', None), _S):
+                            return _sym.node.value.value
                 return None
 
             if isinstance(toks[0], _S):                                    # (DIR "msg")
@@ -6830,8 +6810,7 @@ class ZILCompiler:
         # single-byte fallback flattened advent's (EAST PER EAST-FROM-IN-ALCOVE)
         # to a 1-byte UEXIT of room 0 -- walking east through the Alcove
         # tunnel GOTO'd the void and the game went permanently dark.
-        ptsize_exit_dispatch = any(
-            getattr(c, 'name', '') == 'UEXIT' for c in program.constants)
+        ptsize_exit_dispatch = self.symbols.find('constant', 'UEXIT') is not None
 
         # Helper to extract property number and value
         def extract_properties(obj_node, obj_idx):
@@ -6895,14 +6874,14 @@ class ZILCompiler:
                         word_lower = self._unescape_vocab_word(str(w)).lower()
                         if word_lower in dict_word_offsets:
                             # The marker word is a placeholder only; the REAL
-                            # patch is positional via dict_word_fixups
-                            # (obj, prop, byte_off, word_offset). In-band
+                            # patch is positional via the object's marks
+                            # (prop, byte_off, DICT, word_offset). In-band
                             # markers can't work here: a 12-bit offset field
                             # truncated zork1's 'window' (offset 0x15FE), and
                             # widening the match range made minizork's GLOBAL
                             # prop bytes 9a 8f a false positive.
-                            dict_word_fixups.append(
-                                (obj_idx, prop_num, 2 * len(marker_words),
+                            _prp_state['marks'].append(
+                                (prop_num, 2 * len(marker_words), DICT,
                                  dict_word_offsets[word_lower]))
                             marker_words.append(0x8000 | (dict_word_offsets[word_lower] & 0x0FFF))
                     if marker_words:
@@ -6944,8 +6923,8 @@ class ZILCompiler:
                         for w in words[:32]:
                             wl = self._unescape_vocab_word(str(w)).lower()
                             if wl in dict_word_offsets:
-                                dict_word_fixups.append(
-                                    (obj_idx, prop_num, 2 * len(_adj_marks),
+                                _prp_state['marks'].append(
+                                    (prop_num, 2 * len(_adj_marks), DICT,
                                      dict_word_offsets[wl]))
                                 _adj_marks.append(
                                     0x8000 | (dict_word_offsets[wl] & 0x0FFF))
@@ -6981,7 +6960,7 @@ class ZILCompiler:
                         if word_lower in dict_word_offsets:
                             word_offset = dict_word_offsets[word_lower]
                             props[prop_num] = 0xFE00 | (word_offset & 0xFF)
-                            dict_word_fixups.append((obj_idx, prop_num, 0, word_offset))
+                            _prp_state['marks'].append((prop_num, 0, DICT, word_offset))
                         else:
                             props[prop_num] = 0
                 elif key == 'PSEUDO' and getattr(self, '_is_classic_parser', False):
@@ -7009,7 +6988,7 @@ class ZILCompiler:
                         rmark = resolve_atom_value(rname)
                         if not isinstance(rmark, int):
                             rmark = 0
-                        dict_word_fixups.append((obj_idx, prop_num, len(data), dict_word_offsets[wl]))
+                        _prp_state['marks'].append((prop_num, len(data), DICT, dict_word_offsets[wl]))
                         data.extend([(wmark >> 8) & 0xFF, wmark & 0xFF,
                                      (rmark >> 8) & 0xFF, rmark & 0xFF])
                     if data:
@@ -7132,8 +7111,9 @@ class ZILCompiler:
                             # Get the table index and create a placeholder
                             table_idx = len(codegen.tables) - 1
                         # Store 0xFD00 | idx (or ext 0xF900|(idx-256)) marker
-                        props[prop_num] = (0xFD00 | table_idx) if table_idx <= 0xFF \
-                            else (0xF900 | (table_idx - 0x100))
+                        props[prop_num] = _issue(
+                            (0xFD00 | table_idx) if table_idx <= 0xFF
+                            else (0xF900 | (table_idx - 0x100)), TABLE, table_idx)
                     # Extract value from AST node
                     elif hasattr(value, 'value'):
                         from .parser.ast_nodes import StringNode as _SN
@@ -7172,8 +7152,9 @@ class ZILCompiler:
                             # Get the table index and create a placeholder
                             table_idx = len(codegen.tables) - 1
                         # Store 0xFD00 | idx (or ext 0xF900|(idx-256)) marker
-                        props[prop_num] = (0xFD00 | table_idx) if table_idx <= 0xFF \
-                            else (0xF900 | (table_idx - 0x100))
+                        props[prop_num] = _issue(
+                            (0xFD00 | table_idx) if table_idx <= 0xFF
+                            else (0xF900 | (table_idx - 0x100)), TABLE, table_idx)
                     elif hasattr(value, 'value'):
                         from .parser.ast_nodes import StringNode as _SN
                         if isinstance(value, _SN) and prop_num != 0:
@@ -7204,7 +7185,7 @@ class ZILCompiler:
         self.log(f"  {len(all_objects)} objects/rooms total")
 
         # Build set of routine names for validation
-        routine_names = {r.name for r in program.routines}
+        routine_names = self.symbols.names('routine')
 
         # Helper to get object number from IN property value
         def get_parent_num(in_value, obj_name):
@@ -7313,51 +7294,51 @@ class ZILCompiler:
         # Add objects with properties and tree structure
         # Sort by object number so objects are added in the correct order for the table
         sorted_objects = sorted(all_objects, key=lambda x: obj_name_to_num[x[0]])
-        def _prp_scan_object(props, obj_idx):
-            """Record positional (obj_idx, prop_num, byte_off, routine_name)
-            fixups for every routine marker embedded in this object's finished
-            property values, then reset the per-object marker state."""
-            pend = {}
-            for _i, _n in _prp_state['pending']:
-                pend.setdefault(_i, _n)
-            if pend:
+        def _record_object_marks(props):
+            """Return the (prop_num, byte_off, kind, target) marks for every
+            marker the helpers handed out while this object's property values
+            were built, then reset the per-object marker state.
+
+            An issued marker is looked up in the finished value it ended up
+            in; markers are whole words, so only WORD-ALIGNED offsets can
+            hold one.  A byte-blind look matched the second byte of a DEXIT
+            door-object word plus a zero string byte -- trinity's NWGATE is
+            object 506 (0x01FA), so 'fa 00' at odd offset 3 minted a bogus
+            routine fixup that walled off the ranch yard."""
+            marks = _prp_state['marks']
+            issued = _prp_state['issued']
+            if issued:
                 for _pn, _val in props.items():
                     if isinstance(_val, int):
-                        if (_val & 0xFF00) == 0xFA00 and (_val & 0xFF) in pend:
-                            _prp_state['positional'].append(
-                                (obj_idx, _pn, 0, pend[_val & 0xFF]))
+                        _words = [_val]
                     elif isinstance(_val, (bytes, bytearray)):
-                        # Routine markers are emitted as WORD-ALIGNED words
-                        # within property byte values (FEXIT/PSEUDO/PROPDEF
-                        # word slots), so scan even offsets ONLY. The old
-                        # byte-blind scan matched the second byte of a DEXIT
-                        # door-object word plus a zero string byte -- trinity's
-                        # NWGATE is object 506 (0x01FA), so 'fa 00' at odd
-                        # offset 3 minted a bogus fixup that overwrote the
-                        # door/string words with a packed routine address and
-                        # walled off the ranch yard ("q is" garbage).
-                        _j = 0
-                        while _j + 1 < len(_val):
-                            if _val[_j] == 0xFA and _val[_j + 1] in pend:
-                                _prp_state['positional'].append(
-                                    (obj_idx, _pn, _j, pend[_val[_j + 1]]))
-                            _j += 2
-            _prp_state['pending'] = []
+                        _words = [(_val[_j] << 8) | _val[_j + 1]
+                                  for _j in range(0, len(_val) - 1, 2)]
+                    elif isinstance(_val, (list, tuple)):
+                        _words = [_v for _v in _val if isinstance(_v, int)]
+                    else:
+                        continue
+                    for _k, _w in enumerate(_words):
+                        if _w & 0xFFFF in issued:
+                            marks.append((_pn, 2 * _k) + issued[_w & 0xFFFF])
+            _prp_state['issued'] = {}
+            _prp_state['marks'] = []
             _prp_state['overrides'] = {}
             _prp_state['used_global'] = set()
+            return marks
 
         for obj_idx, (name, node, is_room) in enumerate(sorted_objects):
             obj_num = obj_name_to_num[name]
             attributes = flags_to_attributes(node.properties.get('FLAGS', []))
             properties = extract_properties(node, obj_idx)
-            _prp_scan_object(properties, obj_idx)
             obj_table.add_object(
                 name=name,
                 parent=parent_of.get(obj_num, 0),
                 sibling=sibling_of.get(obj_num, 0),
                 child=child_of.get(obj_num, 0),
                 attributes=attributes,
-                properties=properties
+                properties=properties,
+                marks=_record_object_marks(properties)
             )
 
         # Populate the property-defaults table from PROPDEF declarations.
@@ -7395,28 +7376,19 @@ class ZILCompiler:
         table_offsets = codegen.get_table_offsets()
         # ...and the derived values.  Tables created here are IMPURE and sort
         # BEFORE every pure table, so each one shifts ACTIONS/PREACTIONS (and
-        # any other table holding routine-address markers) later in the block.
-        # Leaving the fixup list stale wrote enchanter's 208 packed action
-        # routine addresses 306 bytes early: ACTIONS[k] got action k+153's
-        # routine and the top 153 slots kept their raw 0xF0xx placeholders, so
-        # PERFORM's <APPLY <GET ,ACTIONS .A>> called into the string area on
-        # the first command.  impure_tables_size is the static-memory
-        # (PURBOT) boundary and goes stale the same way.
+        # any other table holding routine-address markers) later in the block
+        # -- which is why the table relocations are only taken at assembly.
+        # impure_tables_size is the static-memory (PURBOT) boundary and goes
+        # stale the same way.
         if codegen.tables:
             impure_tables_size = codegen.get_impure_tables_size()
-            table_routine_fixups = codegen.get_table_routine_fixups()
         # ...and everything else derived from the table layout.  Object
         # building appends IMPURE tables for table-valued properties
         # (planetfall: 80 of them, 1,920 bytes), which shifts the sorted
         # (impure, parser, pure) layout: every pure-table offset moves and the
-        # impure/pure split moves with it.  Leaving these stale made the
-        # assembler patch ACTIONS/PREACTIONS routine addresses at the old
-        # offsets (so those tables kept raw 0xF0xx routine placeholders and
-        # every verb dispatch became a no-op / a wild call) and put the new
+        # impure/pure split moves with it.  Leaving it stale put the new
         # writable tables in static memory.
-        tables_with_placeholders = codegen.get_tables_with_placeholders()
         impure_tables_size = codegen.get_impure_tables_size()
-        table_routine_fixups = codegen.get_table_routine_fixups()
 
         # Register flag bit assignments with codegen for FSET/FCLEAR/FSET? opcodes
         for flag_name, bit_num in flag_bit_map.items():
@@ -7428,36 +7400,21 @@ class ZILCompiler:
 
         self.log(f"  Registered {len(flag_bit_map)} flags, {len(obj_name_to_num)} objects")
 
-        # Build property routine fixups from property_routine_map
-        # Maps placeholder_idx -> routine_byte_offset for assembler to patch
-        property_routine_fixups = []  # List of (placeholder_idx, routine_byte_offset)
-        for placeholder_idx, routine_name in property_routine_map.items():
-            if routine_name in codegen.routines:
-                routine_offset = codegen.routines[routine_name]
-                property_routine_fixups.append((placeholder_idx, routine_offset))
-            else:
-                # Missing routine - use offset 0 (will become 0x0000)
-                self.log(f"  WARNING: Property references missing routine '{routine_name}'")
-                property_routine_fixups.append((placeholder_idx, 0))
-
-        property_routine_positional = None
-        if _prp_state['overflow']:
-            # Positional mode: point-wise patches by (obj, prop, byte_off).
-            # The legacy list must be EMPTY so the assembler's position-blind
-            # 0xFA scan never runs (recycled indices are ambiguous globally).
-            property_routine_positional = []
-            for _oi, _pn, _off, _rname in _prp_state['positional']:
-                if _rname in codegen.routines:
-                    _roff = codegen.routines[_rname]
-                else:
-                    self.log(f"  WARNING: Property references missing routine '{_rname}'")
-                    _roff = 0
-                property_routine_positional.append((_oi, _pn, _off, _roff))
-            property_routine_fixups = []
-            self.log(f"  {len(property_routine_positional)} POSITIONAL property"
-                     f" routine fixups (>256 distinct routines)")
-        if property_routine_fixups:
-            self.log(f"  {len(property_routine_fixups)} property routine fixups")
+        # Property relocations, offsets into objects_data.  A routine mark
+        # names the routine; the assembler wants its offset in the code.
+        object_relocations = []
+        missing_routines = set()
+        for reloc in obj_table.relocations:
+            if reloc.kind == ROUTINE:
+                if (reloc.target not in codegen.routines
+                        and reloc.target not in missing_routines):
+                    missing_routines.add(reloc.target)
+                    self.log(f"  WARNING: Property references missing routine '{reloc.target}'")
+                reloc = Relocation(OBJECTS, reloc.offset, ROUTINE,
+                                   codegen.routines.get(reloc.target, 0))
+            object_relocations.append(reloc)
+        if object_relocations:
+            self.log(f"  {len(object_relocations)} property relocations")
 
         # Now build vocab_fixups after object table (PROPDEF may have added vocab placeholders)
         # Merge in any new placeholders from codegen (e.g., from LONG-WORD-TABLE)
@@ -7558,6 +7515,7 @@ class ZILCompiler:
         # Run optimization passes before assembly
         # Note: AbbreviationOptimizationPass is now run earlier, before code generation
         self.log("Running optimization passes...")
+        phases.begin('optimize')
         from .optimization.passes import OptimizationPipeline, StringDeduplicationPass, PropertyOptimizationPass
 
         compilation_data = {
@@ -7622,9 +7580,6 @@ class ZILCompiler:
             self.log(f"  Built alphabet table: {len(alphabet_table)} bytes")
 
         # Get string placeholders for resolution
-        string_placeholders = codegen.get_string_placeholders()  # For operand format (0xFC)
-        tell_string_placeholders = codegen.get_tell_string_placeholders()  # For TELL format (0x8D)
-        tell_placeholder_positions = codegen.get_tell_placeholder_positions()  # Exact byte offsets
 
         # Get special header table indices
         tchars_table_idx = codegen.get_tchars_table_idx()
@@ -7642,37 +7597,26 @@ class ZILCompiler:
 
         # Assemble story file
         self.log("Assembling story file...")
+        phases.begin('assemble')
         assembler = ZAssembler(self.version)
-        # Table 0xFB scan may only match table-emitted vocab indices.
-        assembler._table_vocab_indices = set(getattr(codegen, '_table_vocab_indices', set()) or set())
-        # Overflow string-operand markers (data band / ext band) recorded at
-        # structurally-discovered ROUTINE-code positions; resolved point-wise.
-        _sdp_overflow = codegen.get_string_data_placeholders()
-        _sde_overflow = dict(getattr(codegen, '_string_data_ext', {}) or {})
-        assembler._string_data_ext = _sde_overflow
-        assembler._code_string_marker_fixups = [
-            (_off, _w)
-            for _off, _w in getattr(codegen, '_placeholder_positions', [])
-            if (0xF400 <= _w <= 0xF7FF and (_w & 0x3FF) in _sdp_overflow)
-            or _w in _sde_overflow
-        ]
-        # Structural gate inputs for the routine-code vocab scans.
+        # Routine offsets, for the ZORKIE_AUDIT_DUMP section dump.
         assembler._routine_offsets_map = dict(getattr(codegen, 'routines', {}) or {})
-        assembler._codegen_code_len = len(bytes(getattr(codegen, 'code', b'') or b''))
-        # POSITIONAL vocab fixups (no 8-bit index limit): exact positions
-        # recorded at emission for routine code, table data, and globals.
-        vocab_positional = codegen.get_vocab_positional_fixups()
-        table_vocab_positional = list(getattr(codegen, '_table_vocab_fixups', []) or [])
-        global_vocab_positional = []
-        for _gname, _gidx in (getattr(codegen, '_global_vocab_fixups', {}) or {}).items():
-            _gnum = codegen.globals.get(_gname)
-            if isinstance(_gnum, int) and 0x10 <= _gnum < 0x100:
-                global_vocab_positional.append(((_gnum - 0x10) * 2, _gidx))
-        if vocab_positional or table_vocab_positional or global_vocab_positional:
-            self.log(f"  Positional vocab fixups: {len(vocab_positional)} code, "
-                     f"{len(table_vocab_positional)} table, "
-                     f"{len(global_vocab_positional)} globals "
-                     f"({len(codegen.get_vocab_placeholders())} distinct words)")
+        # Every routine / string / vocab address in the routine code, recorded
+        # where the code generator wrote its marker.
+        code_relocations = codegen.get_code_relocations()
+        # ...and every table, dictionary, string and vocab address in the
+        # globals table, recorded where each initial value was handed out.
+        global_relocations = codegen.get_global_relocations()
+        # ...and every routine, string and vocab address in the table data,
+        # at the positions recorded when each table was built.  Taken now:
+        # tables added since (objects, VWORD tables) moved the sorted layout.
+        table_relocations = codegen.get_table_relocations()
+        if code_relocations:
+            self.log(f"  {len(code_relocations)} code relocations")
+        if global_relocations:
+            self.log(f"  {len(global_relocations)} globals relocations")
+        if table_relocations:
+            self.log(f"  {len(table_relocations)} table relocations")
         story = assembler.build_story_file(
             routines_code,
             objects_data,
@@ -7682,38 +7626,17 @@ class ZILCompiler:
             string_table=string_table,
             table_data=table_data,
             table_offsets=table_offsets,
-            tables_with_placeholders=tables_with_placeholders,
             impure_tables_size=impure_tables_size,
-            routine_fixups=routine_fixups,
-            table_routine_fixups=table_routine_fixups,
-            property_routine_fixups=property_routine_fixups,
-            property_routine_positional_fixups=property_routine_positional,
+            code_relocations=code_relocations,
             extension_table=extension_table,
             alphabet_table=alphabet_table,
-            string_placeholders=string_placeholders,
-            tell_string_placeholders=tell_string_placeholders,
-            tell_placeholder_positions=tell_placeholder_positions,
             vocab_fixups=vocab_fixups,
             vword_fixups=vword_fixups if new_parser else None,
             tchars_table_idx=tchars_table_idx,
-            # Classic games: direction (exit) properties hold raw room/flag bytes
-            # the dict-placeholder scanner must not touch (see
-            # _resolve_dict_placeholders). Lowest direction property number.
-            dir_prop_min=((31 if self.version <= 3 else 63) - len(program.directions) + 1
-                          if getattr(self, '_is_classic_parser', False) and program.directions
-                          else None),
-            # Routine-code string-marker namespace boundary (see
-            # register_data_string): the routines scanner only accepts these.
-            string_code_index_max=codegen._next_string_operand_index,
-            string_data_placeholders=codegen.get_string_data_placeholders(),
             table_addr_fixups=getattr(codegen, 'table_addr_fixups', None),
-            # Positional dict-word patches for SYNONYM/PSEUDO/ADJECTIVE prop
-            # data (see _resolve_dict_placeholders).
-            prop_dict_fixups=dict_word_fixups,
-            table_string_fixups=codegen._table_string_fixups,
-            vocab_positional_fixups=vocab_positional,
-            table_vocab_fixups=table_vocab_positional,
-            global_vocab_fixups=global_vocab_positional
+            global_relocations=global_relocations,
+            table_relocations=table_relocations,
+            object_relocations=object_relocations
         )
 
         return story
@@ -7951,7 +7874,7 @@ class ZILCompiler:
                     # Get operator name from the operator node
                     op_name = ""
                     if isinstance(statement.operator, AtomNode):
-                        op_name = statement.operator.value.upper()
+                        op_name = statement.operator.upper
                     if op_name == 'TELL':
                         for operand in statement.operands:
                             if isinstance(operand, StringNode):
@@ -8023,7 +7946,7 @@ def main():
     parser = argparse.ArgumentParser(
         description='ZIL Compiler - Compile ZIL source code to Z-machine bytecode'
     )
-    parser.add_argument('input', help='Input .zil source file')
+    parser.add_argument('input', nargs='?', help='Input .zil source file')
     parser.add_argument('-o', '--output', help='Output story file (.z3, .z5, etc.)')
     parser.add_argument('-v', '--version', type=int, default=3,
                        choices=[1, 2, 3, 4, 5, 6, 7, 8],
@@ -8040,12 +7963,60 @@ def main():
                             'error to a warning, stubbing them as no-ops (call 0). '
                             'For provenance-incomplete historical sources whose '
                             'missing routines are off the boot path.')
+    parser.add_argument('--timings', action='store_true',
+                       help='Print wall time, CPU time and peak traced memory '
+                            'for each compiler phase to stderr')
+    parser.add_argument('--macro-profile', action='store_true',
+                       help='Print per-macro call counts, expansion time, '
+                            'output nodes and nesting depth to stderr')
+    parser.add_argument('--expand-jobs', type=int, default=1, metavar='N',
+                       help='Expand ROUTINE macros in N worker processes '
+                            '(default: 1, in process)')
+    parser.add_argument('--codegen-jobs', type=int, default=1, metavar='N',
+                       help='Compile routines in N worker processes '
+                            '(default: 1, in process)')
+    parser.add_argument('--hash-cons', action='store_true',
+                       help='Share identical expression subtrees after macro '
+                            'expansion (less memory on large games)')
+    parser.add_argument('--index', metavar='FILE',
+                       help='Write the symbol index (every routine, global, '
+                            'constant, object, room, macro, property and flag '
+                            'with its kind and source line) as JSON to FILE; '
+                            '- for stdout')
+    parser.add_argument('--cache', action='store_true',
+                       help='Reuse lexed/parsed source units from .zorkie-cache/ '
+                            'next to the input file (incremental rebuilds)')
+    parser.add_argument('--cache-dir', metavar='DIR',
+                       help='Like --cache, but keep the cache in DIR')
+    parser.add_argument('--serve', action='store_true',
+                       help='Run a persistent compile server on a Unix socket; '
+                            'send it builds with zorkie-client.  Unchanged '
+                            'included files are not re-read or re-expanded and '
+                            'unchanged units are not re-lexed or re-parsed; the '
+                            'directive pass, macro expansion and the back end '
+                            'run on every build')
+    parser.add_argument('--socket', metavar='PATH',
+                       help='Socket for --serve (default: $ZORKIE_SOCKET or a '
+                            'per-user temp path)')
 
     args = parser.parse_args()
 
+    if args.serve:
+        from .server import serve
+        serve(args.socket, verbose=args.verbose)
+        return
+    if not args.input:
+        parser.error("an input file is required")
+
     compiler = ZILCompiler(version=args.version, verbose=args.verbose,
                           enable_string_dedup=args.string_dedup,
-                          allow_undefined_routines=args.allow_undefined_routines)
+                          allow_undefined_routines=args.allow_undefined_routines,
+                          timings=args.timings,
+                          build_cache=args.cache_dir or args.cache,
+                          macro_profile=args.macro_profile,
+                          expand_jobs=args.expand_jobs,
+                          hash_cons=args.hash_cons,
+                          codegen_jobs=args.codegen_jobs)
 
     # Use multi-file compilation if includes are specified
     if args.include:
@@ -8076,6 +8047,19 @@ def main():
     else:
         success = compiler.compile_file(args.input, args.output)
 
+    if args.timings:
+        print(compiler.phase_stats.format_report(), file=sys.stderr)
+    if compiler.macro_profile is not None:
+        print(compiler.macro_profile.format_report(), file=sys.stderr)
+    if args.index and compiler.symbols is not None:
+        import json
+        dump = json.dumps(compiler.symbols.to_dict(), indent=1)
+        if args.index == '-':
+            print(dump)
+        else:
+            with open(args.index, 'w', encoding='utf-8') as f:
+                f.write(dump + '\n')
+
     sys.exit(0 if success else 1)
 
 
@@ -1,5 +1,5 @@
 """ZIL Lexer - Tokenizes ZIL source code."""
 
-from .lexer import Lexer, Token, TokenType
+from .lexer import Lexer, Token, TokenStream, TokenType
 
-__all__ = ['Lexer', 'Token', 'TokenType']
+__all__ = ['Lexer', 'Token', 'TokenStream', 'TokenType']
@@ -8,8 +8,21 @@ Handles:
 - Numbers
 - Comments
 - Variable prefixes (. for local, , for global)
+
+The scanner works on offsets into the source: runs of whitespace, atom
+characters, string bodies and skipped comments are consumed by compiled
+regexes, the token kind is chosen by a dispatch table keyed on the first
+character, and line/column are looked up from a table of newline offsets
+only when a token (or an error) needs them.
+
+Tokens are stored in a TokenStream (struct of arrays), not one object per
+token; indexing it yields ordinary Token objects.
 """
 
+import re
+from array import array
+from bisect import bisect_left
+from collections.abc import Sequence
 from enum import Enum, auto
 from dataclasses import dataclass
 from typing import Optional, List
@@ -62,6 +75,119 @@ class Token:
         return f"Token({self.type.name}, {self.value!r}, {self.line}:{self.column})"
 
 
+# TokenType by its (small, positive) enum value, the code a TokenStream stores.
+_TYPE_BY_CODE = [None] * (max(t.value for t in TokenType) + 1)
+for _type in TokenType:
+    _TYPE_BY_CODE[_type.value] = _type
+del _type
+
+
+class TokenStream(Sequence):
+    """The tokens of one source text, stored column-wise.
+
+    Per token: the TokenType's value in an array('B'), the source offset in
+    an array('I') and a reference to the value, which the lexer interns so
+    equal atoms and strings share one object.  Line and column are derived
+    from the offset and the offsets of the source's newlines; `line` is the
+    line number of the text's first line (the build cache relocates a unit
+    by shifting it).  Indexing builds a Token, so code written against a
+    list of Tokens reads a TokenStream unchanged.
+    """
+
+    __slots__ = ('types', 'offsets', 'values', 'newlines', 'length', 'line')
+
+    def __init__(self, newlines=(), length: int = 0, line: int = 1):
+        self.types = array('B')
+        self.offsets = array('I')
+        self.values: list = []
+        self.newlines = array('I', newlines)
+        self.length = length  # length of the source text
+        self.line = line
+
+    def __len__(self):
+        return len(self.types)
+
+    def __getitem__(self, index):
+        if index.__class__ is slice:
+            return [self[i] for i in range(*index.indices(len(self.types)))]
+        offset = self.offsets[index]
+        newlines = self.newlines
+        k = bisect_left(newlines, offset)
+        return Token(_TYPE_BY_CODE[self.types[index]], self.values[index],
+                     self.line + k, offset - newlines[k - 1] if k else offset + 1)
+
+    def __iter__(self):
+        for i in range(len(self.types)):
+            yield self[i]
+
+    def __repr__(self):
+        return f"<TokenStream of {len(self.types)} tokens>"
+
+    def __getstate__(self):
+        return (self.types, self.offsets, self.values, self.newlines,
+                self.length, self.line)
+
+    def __setstate__(self, state):
+        (self.types, self.offsets, self.values, self.newlines,
+         self.length, self.line) = state
+
+    @classmethod
+    def join(cls, streams: List['TokenStream']) -> 'TokenStream':
+        """The stream of the concatenated source texts of `streams`, one EOF.
+
+        Offsets (and newlines) are rebased onto the joined text, so line
+        numbers count from the first stream's `line`.
+        """
+        joined = cls(line=streams[0].line if streams else 1)
+        base = 0
+        last = len(streams) - 1
+        for k, stream in enumerate(streams):
+            count = len(stream.types) - (0 if k == last else 1)  # drop EOF
+            joined.types.extend(stream.types[:count])
+            joined.offsets.extend(off + base for off in stream.offsets[:count])
+            joined.values.extend(stream.values[:count])
+            joined.newlines.extend(nl + base for nl in stream.newlines)
+            base += stream.length
+        joined.length = base
+        if not streams:
+            joined.types.append(TokenType.EOF.value)
+            joined.offsets.append(0)
+            joined.values.append(None)
+        return joined
+
+
+# Character classes of the scanner (see Lexer.is_atom_char for the atom set;
+# \w is exactly str.isalnum() plus '_').
+_WHITESPACE = re.compile(r'[ \t\n\r\f]*')
+_BLANKS = re.compile(r'[ \t]*')
+_ATOM_CHARS = re.compile(r"[\w\-?+*/=$#;.%:&^!|']*")
+# An atom may also contain backslash escapes (A?G\'S for the word G'S).
+_ATOM = re.compile(r"(?:[\w\-?+*/=$#;.%:&^!|']|\\[^ \t\n\r\f])*")
+_HEX_DIGITS = re.compile(r'[0-9A-Fa-f]*')
+_INLINE_COMMENT = re.compile(r'[^ \t\n><()]*')
+# A string literal's body: up to (not including) the closing quote.
+_STRING_BODY = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*', re.DOTALL)
+_STRING = r'"[^"\\]*(?:\\.[^"\\]*)*(?:"|\\?\Z)'
+_STRING_ESCAPE = re.compile(r'\\(.)', re.DOTALL)
+_ESCAPES = {'n': '\n', 't': '\t'}
+# Lexemes that matter while skipping a nested comment or %<...> form.
+_NESTED = {
+    '<': re.compile(_STRING + r'|[<>]', re.DOTALL),
+    '(': re.compile(_STRING + r'|[()]', re.DOTALL),
+    '[': re.compile(_STRING + r'|[\[\]]', re.DOTALL),
+}
+_COMPILE_TIME_FORM = re.compile(_STRING + r'|!\\.|[<>]', re.DOTALL)
+_CLOSER = {'<': '>', '(': ')', '[': ']'}
+# First characters that always start an ordinary atom.
+_PLAIN_ATOM_START = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz_?+/=:|')
+
+_DELIMITER_CODES = {
+    '<': TokenType.LANGLE.value, '>': TokenType.RANGLE.value,
+    '(': TokenType.LPAREN.value, ')': TokenType.RPAREN.value,
+    '[': TokenType.LBRACKET.value, ']': TokenType.RBRACKET.value,
+}
+
+
 class Lexer:
     """Tokenizes ZIL source code."""
 
@@ -69,11 +195,29 @@ class Lexer:
         self.source = source
         self.filename = filename
         self.pos = 0
-        self.line = 1
-        self.column = 1
-        self.tokens: List[Token] = []
+        self.tokens = TokenStream(length=len(source))
+        self._intern: dict = {}
         self.paren_depth = 0  # Track parenthesis depth for context-aware semicolon handling
         self.angle_depth = 0  # Track angle bracket depth for context-aware semicolon handling
+        self._newlines: Optional[List[int]] = None
+
+    # -- positions ------------------------------------------------------------
+
+    def location(self, pos: int):
+        """(line, column) of source offset `pos`, both 1-based."""
+        newlines = self._newlines
+        if newlines is None:
+            newlines = self._newlines = [m.start() for m in re.finditer('\n', self.source)]
+        k = bisect_left(newlines, pos)
+        return k + 1, pos - (newlines[k - 1] if k else -1)
+
+    @property
+    def line(self) -> int:
+        return self.location(self.pos)[0]
+
+    @property
+    def column(self) -> int:
+        return self.location(self.pos)[1]
 
     def error(self, message: str):
         """Raise a lexer error with location information."""
@@ -90,206 +234,91 @@ class Lexer:
         """Consume and return current character."""
         if self.pos >= len(self.source):
             return None
-
         ch = self.source[self.pos]
         self.pos += 1
-
-        if ch == '\n':
-            self.line += 1
-            self.column = 1
-        else:
-            self.column += 1
-
         return ch
 
+    # -- skipping -------------------------------------------------------------
+
     def skip_whitespace(self):
         """Skip whitespace characters."""
-        while self.peek() and self.peek() in ' \t\n\r\f':
-            self.advance()
+        self.pos = _WHITESPACE.match(self.source, self.pos).end()
 
     def skip_comment(self):
         """Skip ZIL comments: ;\"comment\", ;< form>, ;(...), or ; line comment"""
+        src = self.source
         if self.peek() != ';':
             return
 
-        # Check for block comment: ;" ... "
-        # Need to skip whitespace between ; and "
-        pos = 1
-        while self.peek(pos) and self.peek(pos) in ' \t':
-            pos += 1
-
-        if self.peek(pos) == '%':
-            # MDL conditional compilation: ;%<COND ...> - skip entire form
-            # This is used for compile-time vs load-time conditional evaluation
-            self.advance()  # ;
-            self.advance()  # %
-            # Skip whitespace
-            while self.peek() and self.peek() in ' \t':
-                self.advance()
-            # Skip the following form
-            if self.peek() == '<':
-                self.skip_angle_form_comment()
-            elif self.peek() == '(':
-                self.skip_paren_form_comment()
-            elif self.peek() == '[':
-                self.skip_bracket_form_comment()
+        # What follows the ';' (and any blanks) picks the comment kind.
+        after = _BLANKS.match(src, self.pos + 1).end()
+        kind = src[after] if after < len(src) else None
+
+        if kind == '%':
+            # MDL conditional compilation: ;%<COND ...> - skip entire form.
+            # Exactly two characters are consumed before the blanks, so with
+            # blanks between ';' and '%' only ';' and one blank are skipped.
+            self.pos = _BLANKS.match(src, self.pos + 2).end()
+            if self.peek() in _NESTED:
+                self._skip_nested_comment()
             # else: single token was already skipped
-        elif self.peek(pos) == '"':
+        elif kind == '"':
             # Block comment: ; "comment"
-            self.advance()  # ;
-            # Skip whitespace
-            while self.peek() and self.peek() in ' \t':
-                self.advance()
-            self.advance()  # "
-
-            # Read until closing " (handle escapes)
-            while self.peek() and self.peek() != '"':
-                if self.peek() == '\\' and self.peek(1):
-                    self.advance()  # skip backslash
-                    self.advance()  # skip escaped char
-                else:
-                    self.advance()
-
-            if self.peek() == '"':
-                self.advance()
+            body = _STRING_BODY.match(src, after + 1).end()
+            if body < len(src) and src[body] == '"':
+                self.pos = body + 1
             else:
+                self.pos = len(src)
                 self.error("Unterminated comment")
-        elif self.peek(pos) == '<':
-            # Form comment: ;< form > - skip entire form including nested brackets
-            self.advance()  # ;
-            # Skip whitespace
-            while self.peek() and self.peek() in ' \t':
-                self.advance()
-            # Now skip the form
-            self.skip_angle_form_comment()
-        elif self.peek(pos) == '(':
-            # Form comment: ;(...) - skip entire form including nested parens
-            self.advance()  # ;
-            # Skip whitespace
-            while self.peek() and self.peek() in ' \t':
-                self.advance()
-            # Now skip the form
-            self.skip_paren_form_comment()
-        elif self.peek(pos) == '[':
-            # Bracket comment: ;[...] - skip entire bracketed form including nested brackets
-            self.advance()  # ;
-            # Skip whitespace
-            while self.peek() and self.peek() in ' \t':
-                self.advance()
-            # Now skip the bracketed form
-            self.skip_bracket_form_comment()
+        elif kind in _NESTED:
+            # Form comment ;<...>, ;(...) or ;[...] - skip the entire form
+            # including nested brackets
+            self.pos = after
+            self._skip_nested_comment()
         else:
             # Inline comment: ; comments out next token/word, stops at delimiters or whitespace
-            # Skip the semicolon
-            self.advance()
-            # Skip whitespace after semicolon
-            while self.peek() and self.peek() in ' \t':
-                self.advance()
-            # Skip until delimiter or whitespace (comments out one token)
-            while self.peek() and self.peek() not in ' \t\n><()':
-                self.advance()
+            self.pos = _INLINE_COMMENT.match(src, after).end()
+
+    def _skip_nested_comment(self):
+        """Skip the bracketed form at pos (brackets in strings don't count)."""
+        opener = self.peek()
+        closer = _CLOSER[opener]
+        depth = 0
+        for m in _NESTED[opener].finditer(self.source, self.pos):
+            c = m.group()
+            if c == opener:
+                depth += 1
+            elif c == closer:
+                depth -= 1
+                if depth == 0:
+                    self.pos = m.end()
+                    return
+        self.pos = len(self.source)
+        self.error("Unterminated bracket comment" if opener == '[' else "Unterminated form comment")
 
     def skip_angle_form_comment(self):
         """Skip an angle-bracket form comment: < ... > with nested angle brackets.
 
         Must handle strings properly - don't count <> inside strings.
         """
-        if self.peek() != '<':
-            return
-
-        self.advance()  # <
-        depth = 1
-
-        while depth > 0 and self.peek():
-            ch = self.peek()
-            if ch == '"':
-                # Skip string content - don't count brackets inside strings
-                self.advance()  # opening "
-                while self.peek() and self.peek() != '"':
-                    if self.peek() == '\\' and self.peek(1):
-                        self.advance()  # skip escape char
-                    self.advance()
-                if self.peek() == '"':
-                    self.advance()  # closing "
-            elif ch == '<':
-                depth += 1
-                self.advance()
-            elif ch == '>':
-                depth -= 1
-                self.advance()
-            else:
-                self.advance()
-
-        if depth != 0:
-            self.error("Unterminated form comment")
+        if self.peek() == '<':
+            self._skip_nested_comment()
 
     def skip_paren_form_comment(self):
         """Skip a parenthesis form comment: (...) with nested parentheses.
 
         Must handle strings properly - don't count () inside strings.
         """
-        if self.peek() != '(':
-            return
-
-        self.advance()  # (
-        depth = 1
-
-        while depth > 0 and self.peek():
-            ch = self.peek()
-            if ch == '"':
-                # Skip string content - don't count parens inside strings
-                self.advance()  # opening "
-                while self.peek() and self.peek() != '"':
-                    if self.peek() == '\\' and self.peek(1):
-                        self.advance()  # skip escape char
-                    self.advance()
-                if self.peek() == '"':
-                    self.advance()  # closing "
-            elif ch == '(':
-                depth += 1
-                self.advance()
-            elif ch == ')':
-                depth -= 1
-                self.advance()
-            else:
-                self.advance()
-
-        if depth != 0:
-            self.error("Unterminated form comment")
+        if self.peek() == '(':
+            self._skip_nested_comment()
 
     def skip_bracket_form_comment(self):
         """Skip a bracket form comment: [ ... ] with nested brackets.
 
         Must handle strings properly - don't count [] inside strings.
         """
-        if self.peek() != '[':
-            return
-
-        self.advance()  # [
-        depth = 1
-
-        while depth > 0 and self.peek():
-            ch = self.peek()
-            if ch == '"':
-                # Skip string content - don't count brackets inside strings
-                self.advance()  # opening "
-                while self.peek() and self.peek() != '"':
-                    if self.peek() == '\\' and self.peek(1):
-                        self.advance()  # skip escape char
-                    self.advance()
-                if self.peek() == '"':
-                    self.advance()  # closing "
-            elif ch == '[':
-                depth += 1
-                self.advance()
-            elif ch == ']':
-                depth -= 1
-                self.advance()
-            else:
-                self.advance()
-
-        if depth != 0:
-            self.error("Unterminated bracket comment")
+        if self.peek() == '[':
+            self._skip_nested_comment()
 
     def skip_compile_time_form(self):
         """Skip a compile-time evaluation form: %<...> with nested angle brackets.
@@ -300,122 +329,78 @@ class Lexer:
         """
         if self.peek() != '<':
             return
-
-        self.advance()  # <
-        depth = 1
-
-        while depth > 0 and self.peek():
-            ch = self.peek()
-            if ch == '"':
-                # Skip string content - don't count brackets inside strings
-                self.advance()  # opening "
-                while self.peek() and self.peek() != '"':
-                    if self.peek() == '\\' and self.peek(1):
-                        self.advance()  # skip escape char
-                    self.advance()
-                if self.peek() == '"':
-                    self.advance()  # closing "
-            elif ch == '<':
+        depth = 0
+        for m in _NESTED['<'].finditer(self.source, self.pos):
+            c = m.group()
+            if c == '<':
                 depth += 1
-                self.advance()
-            elif ch == '>':
+            elif c == '>':
                 depth -= 1
-                self.advance()
-            else:
-                self.advance()
+                if depth == 0:
+                    self.pos = m.end()
+                    return
+        self.pos = len(self.source)
+        self.error("Unterminated compile-time form")
 
-        if depth != 0:
-            self.error("Unterminated compile-time form")
+    # -- readers --------------------------------------------------------------
 
     def read_string(self) -> str:
         """Read a string literal."""
-        start_line = self.line
-        start_col = self.column
-
-        self.advance()  # opening "
-        chars = []
-
-        while self.peek() and self.peek() != '"':
-            ch = self.peek()
-
-            # Handle escape sequences
-            if ch == '\\':
-                self.advance()
-                next_ch = self.peek()
-                if next_ch == 'n':
-                    chars.append('\n')
-                    self.advance()
-                elif next_ch == 't':
-                    chars.append('\t')
-                    self.advance()
-                elif next_ch == '\\':
-                    chars.append('\\')
-                    self.advance()
-                elif next_ch == '"':
-                    chars.append('"')
-                    self.advance()
-                else:
-                    chars.append(next_ch)
-                    self.advance()
-            else:
-                chars.append(ch)
-                self.advance()
-
-        if self.peek() != '"':
+        src = self.source
+        start = self.pos
+        end = _STRING_BODY.match(src, start + 1).end()
+        if end >= len(src) or src[end] != '"':
+            start_line, start_col = self.location(start)
+            self.pos = len(src)
             self.error(f"Unterminated string starting at {start_line}:{start_col}")
-
-        self.advance()  # closing "
-        return ''.join(chars)
+        self.pos = end + 1
+        value = src[start + 1:end]
+        if '\\' in value:
+            value = _STRING_ESCAPE.sub(
+                lambda m: _ESCAPES.get(m.group(1), m.group(1)), value)
+        return value
 
     def read_number(self) -> int:
         """Read a number (decimal or hex)."""
-        chars = []
+        src = self.source
+        start = self.pos
 
         # Handle negative numbers
         if self.peek() == '-':
-            chars.append(self.advance())
+            self.pos += 1
 
         # Check for hex prefix
         if self.peek() == '$':
-            chars.append(self.advance())
-            # Read hex digits
-            while self.peek() and self.peek() in '0123456789ABCDEFabcdef':
-                chars.append(self.advance())
-
-            num_str = ''.join(chars)
+            self.pos = _HEX_DIGITS.match(src, self.pos + 1).end()
+            num_str = src[start:self.pos]
             try:
                 return int(num_str[1:], 16) if num_str[0] != '-' else -int(num_str[2:], 16)
             except ValueError:
                 self.error(f"Invalid hex number: {num_str}")
         else:
-            # Read decimal digits
-            while self.peek() and self.peek().isdigit():
-                chars.append(self.advance())
-
-            num_str = ''.join(chars)
+            # Read decimal digits (str.isdigit, not just ASCII)
+            self._skip_digits()
+            num_str = src[start:self.pos]
             try:
                 return int(num_str)
             except ValueError:
                 self.error(f"Invalid number: {num_str}")
 
+    def _skip_digits(self):
+        src = self.source
+        n = len(src)
+        pos = self.pos
+        while pos < n and src[pos].isdigit():
+            pos += 1
+        self.pos = pos
+
     def read_atom(self) -> str:
         """Read an atom/identifier."""
-        chars = []
-
         # Atoms can contain letters, digits, hyphens, underscores, and some special chars
-        # First character must be letter or special
         # Also handle backslash escapes within atoms (e.g., A?G\'S for adjective G'S)
-        while self.peek():
-            if self.is_atom_char(self.peek()):
-                chars.append(self.advance())
-            elif self.peek() == '\\' and self.peek(1) and self.peek(1) not in ' \t\n\r\f':
-                # Backslash escape within atom - include both backslash and escaped char
-                chars.append(self.advance())  # backslash
-                chars.append(self.advance())  # escaped char
-            else:
-                break
-
-        value = ''.join(chars)
+        start = self.pos
+        self.pos = _ATOM.match(self.source, start).end()
+        value = self.source[start:self.pos]
         # MDL oblist trailer: an unescaped terminal '!' (ROUTINE FOO!) names the
         # same atom as FOO. '!-' trailers are handled elsewhere and '\\!' is a
         # literal escape.
@@ -437,402 +422,378 @@ class Lexer:
         return (ch.isalnum() or
                 ch in "-_?+*/=$#;.%:&^!|'")
 
+    # -- tokenizer --------------------------------------------------------------
+
     def tokenize(self) -> List[Token]:
         """Tokenize the entire source code."""
-        while self.pos < len(self.source):
-            self.skip_whitespace()
-
-            if self.pos >= len(self.source):
+        src = self.source
+        n = len(src)
+        tokens = self.tokens
+        add_type = tokens.types.append
+        add_offset = tokens.offsets.append
+        add_value = tokens.values.append
+        intern = self._intern.setdefault
+        skip_whitespace = _WHITESPACE.match
+        match_atom = _ATOM.match
+        dispatch = self._dispatch
+        ATOM = TokenType.ATOM.value
+
+        while True:
+            pos = self.pos = skip_whitespace(src, self.pos).end()
+            if pos >= n:
                 break
-
-            # Handle MDL control character sequences: ^/X (e.g., ^/L = form feed)
-            # Also handle ^<ctrl-char> where the control char is literal (e.g., ^\x0c for form feed)
-            # Also handle ^\X format where \X is a backslash-escaped letter (e.g., ^\L = form feed)
-            # These are typically used as page breaks and should be treated as whitespace
-            if self.peek() == '^':
-                next_ch = self.peek(1)
-                if next_ch == '/':
-                    # ^/X format
-                    self.advance()  # ^
-                    self.advance()  # /
-                    if self.peek():
-                        self.advance()  # The control character letter
-                    continue
-                elif next_ch == '\\':
-                    # ^\X format (backslash-escaped letter, e.g., ^\L for form feed)
-                    self.advance()  # ^
-                    self.advance()  # \
-                    if self.peek():
-                        self.advance()  # The control character letter
-                    continue
-                elif next_ch and ord(next_ch) < 32:
-                    # ^<ctrl-char> format (literal control character)
-                    self.advance()  # ^
-                    self.advance()  # The control character
-                    continue
-
-            # Check for comment (both ;" and ; styles)
-            # Special case: ;= is an atom (used in BUZZ words)
-            # Special case: ; inside parentheses followed by non-comment char is a separator (ZILF SYNONYM/ADJECTIVE)
-            # But ;" ;< ;( are always comments
-            if self.peek() == ';':
-                next_ch = self.peek(1)
-                # Only treat as atom if followed by = (for ;=)
-                if next_ch == '=':
-                    # Fall through to atom handling below
-                    pass
-                # Check if this could be a ZILF separator:
-                # Inside parentheses (but not angle brackets) AND immediately followed by identifier
-                # ZILF separator is ;WORD (no space) - e.g., <SYNONYM FOO ;BAR BAZ>
-                # If there's whitespace after ;, it's a comment, not a separator
-                elif self.paren_depth > 0 and self.angle_depth == 0:
-                    peek_after = self.peek(1)
-                    # If immediately followed by alphanumeric (no whitespace), it's a ZILF separator
-                    # e.g., ;INSIDE, ;INTO, ;AUF
-                    if peek_after and peek_after.isalnum():
-                        line = self.line
-                        col = self.column
-                        self.advance()  # Skip the semicolon
-                        self.tokens.append(Token(TokenType.SEMICOLON, ';', line, col))
-                        continue
-                    # Otherwise (whitespace, quotes, etc.), it's a comment
-                    else:
-                        self.skip_comment()
-                        continue
-                # Otherwise it's a comment
-                else:
-                    self.skip_comment()
-                    continue
-
-            ch = self.peek()
-            line = self.line
-            col = self.column
-
-            # Compile-time evaluation: %,VAR, %.VAR - these become CHAR_GLOBAL_VAR/CHAR_LOCAL_VAR
-            # Note: %<...> forms are handled by compiler preprocessing, not lexer
-            percent_prefix = False
-            if ch == '%':
-                next_ch = self.peek(1)
-                if next_ch in (',', '.'):
-                    percent_prefix = True
-                    self.advance()  # Skip %
-                    # Fall through to handle the next character
-                    ch = self.peek()
-                    line = self.line
-                    col = self.column
-
-            # Delimiters
-            if ch == '<':
-                self.advance()
-                self.angle_depth += 1
-                self.tokens.append(Token(TokenType.LANGLE, '<', line, col))
-            elif ch == '>':
-                self.advance()
-                self.angle_depth -= 1
-                self.tokens.append(Token(TokenType.RANGLE, '>', line, col))
-            elif ch == '(':
-                self.advance()
-                self.paren_depth += 1
-                self.tokens.append(Token(TokenType.LPAREN, '(', line, col))
-            elif ch == ')':
-                self.advance()
-                self.paren_depth -= 1
-                self.tokens.append(Token(TokenType.RPAREN, ')', line, col))
-            elif ch == '[':
-                self.advance()
-                self.tokens.append(Token(TokenType.LBRACKET, '[', line, col))
-            elif ch == ']':
-                self.advance()
-                self.tokens.append(Token(TokenType.RBRACKET, ']', line, col))
-
-            # String
-            elif ch == '"':
-                value = self.read_string()
-                self.tokens.append(Token(TokenType.STRING, value, line, col))
-
-            # Local variable reference (allow whitespace after period)
-            elif ch == '.':
-                # Look ahead to see if this is a local var or just a period
-                pos = 1
-                while self.peek(pos) and self.peek(pos) in ' \t':
-                    pos += 1
-                # If followed by alphanumeric (after optional whitespace), it's a local var
-                # Allow digits too, for vars like .1ST?
-                # Allow ? for vars like .?RESULT
-                next_ch = self.peek(pos)
-                if next_ch and (next_ch.isalnum() or next_ch in '-_?'):
-                    self.advance()  # .
-                    # Skip whitespace
-                    while self.peek() and self.peek() in ' \t':
-                        self.advance()
-                    name = self.read_atom()
-                    # Use CHAR_LOCAL_VAR if we had % prefix (for %.VAR in TELL)
-                    token_type = TokenType.CHAR_LOCAL_VAR if percent_prefix else TokenType.LOCAL_VAR
-                    self.tokens.append(Token(token_type, name, line, col))
-                else:
-                    # Just a period token
-                    self.advance()
-                    self.tokens.append(Token(TokenType.PERIOD, '.', line, col))
-
-            # Global variable reference (allow whitespace after comma)
-            elif ch == ',':
-                # Look ahead to see if this is a global var or just a comma
-                pos = 1
-                while self.peek(pos) and self.peek(pos) in ' \t':
-                    pos += 1
-                # If followed by alphanumeric (after optional whitespace), it's a global var
-                # Allow digits too for consistency
-                # Allow ? for vars like ,?RESULT
-                next_ch = self.peek(pos)
-                if next_ch and (next_ch.isalnum() or next_ch in '-_?'):
-                    self.advance()  # ,
-                    # Skip whitespace
-                    while self.peek() and self.peek() in ' \t':
-                        self.advance()
-                    name = self.read_atom()
-                    # Use CHAR_GLOBAL_VAR if we had % prefix (for %,VAR in TELL)
-                    token_type = TokenType.CHAR_GLOBAL_VAR if percent_prefix else TokenType.GLOBAL_VAR
-                    self.tokens.append(Token(token_type, name, line, col))
-                else:
-                    # Just a comma token
-                    self.advance()
-                    self.tokens.append(Token(TokenType.COMMA, ',', line, col))
-
-            # Number (but not if it's part of an atom like 1ST?)
-            elif ch.isdigit():
-                # Look ahead to see if this is a pure number or starts an atom
-                # Atoms can start with digits: 1ST?, 2ND, etc.
-                pos = 1
-                while self.peek(pos) and (self.peek(pos).isdigit() or self.peek(pos) in 'ABCDEFabcdef'):
-                    pos += 1
-                # If followed by atom characters after the digits, it's an atom
-                # Exception: ; after a number starts a comment, not an atom (17;comment = 17)
-                next_ch = self.peek(pos)
-                if next_ch and self.is_atom_char(next_ch) and not next_ch.isdigit() and next_ch != ';':
-                    # It's an atom like 1ST?
-                    value = self.read_atom()
-                    self.tokens.append(Token(TokenType.ATOM, value, line, col))
-                else:
-                    # It's a number
-                    value = self.read_number()
-                    self.tokens.append(Token(TokenType.NUMBER, value, line, col))
-            # Negative number
-            elif ch == '-' and self.peek(1) and self.peek(1).isdigit():
-                value = self.read_number()
-                self.tokens.append(Token(TokenType.NUMBER, value, line, col))
-
-            # Hex number ($1A3F) - only if $ is followed by hex digits and nothing else
-            # Check if it's truly a hex number vs an atom like $BUZZ
-            elif ch == '$' and self.peek(1) and self.peek(1) in '0123456789ABCDEFabcdef':
-                # Look ahead to see if this is a pure hex number or an atom
-                pos = 1
-                while self.peek(pos) and self.peek(pos) in '0123456789ABCDEFabcdef':
-                    pos += 1
-                # If followed by other atom characters (like 'Z' in $BUZZ), it's an atom
-                if self.peek(pos) and self.is_atom_char(self.peek(pos)) and self.peek(pos) not in '0123456789ABCDEFabcdef':
-                    # It's an atom starting with $
-                    self.advance()  # $
-                    name = '$' + self.read_atom()
-                    self.tokens.append(Token(TokenType.ATOM, name, line, col))
-                else:
-                    # Pure hex number
-                    value = self.read_number()
-                    self.tokens.append(Token(TokenType.NUMBER, value, line, col))
-
-            # Base-prefixed number (#2 binary, #8 octal, etc.) or MDL type specifier (#SEMI, etc.)
-            elif ch == '#':
-                self.advance()  # #
-                # Check if followed by a digit (base specifier) or an atom (type specifier)
-                if self.peek() and self.peek().isdigit():
-                    base = 0
-                    while self.peek() and self.peek().isdigit():
-                        base = base * 10 + int(self.advance())
-                    # Skip whitespace between base and number
-                    while self.peek() and self.peek() in ' \t':
-                        self.advance()
-                    # Now read the number digits
-                    num_str = ''
-                    while self.peek() and (self.peek().isdigit() or self.peek().isalpha()):
-                        num_str += self.advance()
-                    try:
-                        value = int(num_str, base) if num_str else 0
-                        self.tokens.append(Token(TokenType.NUMBER, value, line, col))
-                    except ValueError:
-                        # If it's not a valid number in that base, treat as 0
-                        self.tokens.append(Token(TokenType.NUMBER, 0, line, col))
-                else:
-                    # It's a type specifier like #SEMI - read as an atom with # prefix
-                    name = '#'
-                    if self.peek() and (self.peek().isalpha() or self.peek() in '-_'):
-                        name += self.read_atom()
-                    self.tokens.append(Token(TokenType.ATOM, name, line, col))
-
-            # Special case: ! escapes for STRING form (!\", !\\, !=, !\`, etc.)
-            # Also handles !< for MDL splice-form operator
-            elif ch == '!':
-                chars = [self.advance()]  # Read !
-                # Check for escape patterns: !\X where X is any char
-                if self.peek() == '\\':
-                    # Read backslash
-                    chars.append(self.advance())
-                    # Read the escaped character (could be anything)
-                    if self.peek():
-                        chars.append(self.advance())
-                    value = ''.join(chars)
-                    self.tokens.append(Token(TokenType.ATOM, value, line, col))
-                elif self.peek() == ',':
-                    # !,VAR pattern - just the ! (VAR will be read separately)
-                    self.tokens.append(Token(TokenType.ATOM, '!', line, col))
-                elif self.peek() == '<':
-                    # !< is MDL splice-form operator - emit ! and let < be read as LANGLE
-                    # This allows !<MAPF ...> to be parsed as splice of a form
-                    self.tokens.append(Token(TokenType.ATOM, '!', line, col))
-                elif self.peek() == '.':
-                    # !.VAR pattern - splice local variable - emit just !
-                    self.tokens.append(Token(TokenType.ATOM, '!', line, col))
-                elif self.peek():
-                    # Any other character after !
-                    chars.append(self.advance())
-                    value = ''.join(chars)
-                    self.tokens.append(Token(TokenType.ATOM, value, line, col))
-                else:
-                    self.tokens.append(Token(TokenType.ATOM, '!', line, col))
-
-            # Backslash (character constant or escape prefix for identifiers)
-            elif ch == '\\':
-                chars = [self.advance()]  # Read \
-                # If followed by another character, include it as part of the atom
-                # This handles \. \, \" \\ etc. as complete atoms
-                if self.peek() and self.peek() not in ' \t\n\r\f':
-                    chars.append(self.advance())
-                # Continue reading if more atom characters follow (e.g., \,TELL -> single atom)
-                while self.peek() and self.is_atom_char(self.peek()):
-                    chars.append(self.advance())
-                value = ''.join(chars)
-                self.tokens.append(Token(TokenType.ATOM, value, line, col))
-
-            # Octal number: *digits* (e.g., *3777* = 2047 decimal)
-            # Must be checked before general atom handling since * is a valid atom char
-            elif ch == '*' and self.peek(1) and self.peek(1).isdigit():
-                self.advance()  # Skip opening *
-                num_str = ''
-                while self.peek() and self.peek().isdigit():
-                    num_str += self.advance()
-                if self.peek() == '*':
-                    self.advance()  # Skip closing *
-                    try:
-                        value = int(num_str, 8)  # Parse as octal
-                        self.tokens.append(Token(TokenType.NUMBER, value, line, col))
-                    except ValueError:
-                        self.error(f"Invalid octal number: *{num_str}*")
-                else:
-                    # Not a valid *digits* pattern, treat as atom
-                    value = '*' + num_str
-                    while self.peek() and self.is_atom_char(self.peek()):
-                        value += self.advance()
-                    self.tokens.append(Token(TokenType.ATOM, value, line, col))
-
-            # Atom/Identifier
-            # Note: : can start atoms for type annotations (e.g., :FIX, :DECL)
-            # Note: | is used in TELL-TOKENS and other MDL constructs
-            elif ch.isalpha() or ch in '-_?+*/<>=$#;:|':
-                value = self.read_atom()
-                self.tokens.append(Token(TokenType.ATOM, value, line, col))
-
-            # Quote operator
-            elif ch == "'":
-                self.advance()
-                self.tokens.append(Token(TokenType.QUOTE, "'", line, col))
-
-            # Quasi-quote operator (backtick) - used in ZILF macros
-            elif ch == '`':
-                self.advance()
-                self.tokens.append(Token(TokenType.ATOM, '`', line, col))
-
-            # Unquote operator (tilde) - used in ZILF macros with quasi-quote
-            elif ch == '~':
-                self.advance()
-                # Check for ~! which is splice-unquote
-                if self.peek() == '!':
-                    self.advance()
-                    self.tokens.append(Token(TokenType.ATOM, '~!', line, col))
-                else:
-                    self.tokens.append(Token(TokenType.ATOM, '~', line, col))
-
-            # @ prefix - used for reader macros via MAKE-PREFIX-MACRO
-            # Emit @ as a separate token so the parser/macro expander can handle it
-            elif ch == '@':
-                self.advance()
-                self.tokens.append(Token(TokenType.ATOM, '@', line, col))
-
-            # Compile-time conditional: %< ... > (reader macro)
-            # This is used for DEBUG-CODE and similar conditionals
-            # At top level (angle_depth=0), these conditionally include/exclude code, so skip entirely
-            # Inside a form (angle_depth>0), these evaluate to a value, emit placeholder 0
-            elif ch == '%' and self.peek(1) == '<':
-                line = self.line
-                col = self.column
-                inside_form = self.angle_depth > 0 or self.paren_depth > 0
-                # A compile-time ARITHMETIC form used as a value -- %<- ...>,
-                # %<+ ...>, %<* ...>, %</ ...> -- must actually be folded, not
-                # replaced by 0.  moonmist stores I-DINNER's queue tick as
-                # <TABLE ... 1 %<- ,DINNER-TIME ,PRESENT-TIME-ATOM 10> I-DINNER>
-                # and queues I-LIONEL-SPEAKS with %<- ,LIONEL-TIME
-                # ,PRESENT-TIME-ATOM>; dropped to 0 the after-dinner clock
-                # collapses.  Drop only the % here so <...> tokenizes as an
-                # ordinary form and codegen's constant folder evaluates it.
-                # DEBUG-CODE / COND reader-conditionals keep the skip below.
-                if inside_form:
-                    _j = self.pos + 2
-                    while _j < len(self.source) and self.source[_j] in ' \t\n\r':
-                        _j += 1
-                    if (_j + 1 < len(self.source)
-                            and self.source[_j] in '-+*/'
-                            and self.source[_j + 1] in ' \t\n\r'):
-                        self.advance()  # drop % only; < becomes LANGLE next loop
-                        continue
-                self.advance()  # Skip %
-                self.advance()  # Skip <
-                # Skip the entire form including nested angle brackets
-                # Must handle: strings with escapes, !\X character literals, nested () and <>
-                depth = 1
-                while depth > 0 and self.pos < len(self.source):
-                    c = self.advance()
-                    if c == '<':
-                        depth += 1
-                    elif c == '>':
-                        depth -= 1
-                    elif c == '!':
-                        # Only !\X is a character literal (e.g. !\> is a literal >,
-                        # which must NOT count as a bracket). Other uses of ! are
-                        # segment/splice operators -- !<form>, !.var, !,var -- whose
-                        # following token is ordinary and MUST be counted normally.
-                        # Skipping the char after every ! swallowed the < of !<...>,
-                        # so the inner form's > over-decremented depth and this %<...>
-                        # skip terminated one > early, leaking a stray >.
-                        if self.peek() == '\\' and self.pos + 1 < len(self.source):
-                            self.advance()  # skip \
-                            self.advance()  # skip the escaped char
-                    elif c == '"':
-                        # Skip string contents
-                        while self.pos < len(self.source):
-                            sc = self.advance()
-                            if sc == '"':
-                                break
-                            elif sc == '\\' and self.pos < len(self.source):
-                                self.advance()
-                # If inside a form, emit a placeholder value of 0
-                # This allows constructs like <CONSTANT NAME %<COND ...>> to parse correctly
-                # At top level, skip entirely (the conditional block is excluded)
-                if inside_form:
-                    self.tokens.append(Token(TokenType.NUMBER, 0, line, col))
-
+            ch = src[pos]
+            # Delimiters and plain atoms -- most tokens -- are handled inline.
+            kind = _DELIMITER_CODES.get(ch)
+            if kind is not None:
+                if ch == '<':
+                    self.angle_depth += 1
+                elif ch == '>':
+                    self.angle_depth -= 1
+                elif ch == '(':
+                    self.paren_depth += 1
+                elif ch == ')':
+                    self.paren_depth -= 1
+                self.pos = pos + 1
+                value = ch
+            elif ch in _PLAIN_ATOM_START:
+                end = self.pos = match_atom(src, pos).end()
+                value = src[pos:end]
+                if value[-1] == '!' and len(value) > 1 and not value.endswith('\\!'):
+                    value = value[:-1]
+                value = intern(value, value)
+                kind = ATOM
             else:
-                self.error(f"Unexpected character: {ch!r}")
+                handler = dispatch.get(ch)
+                if handler is not None:
+                    handler(self, ch, pos)
+                else:
+                    self._lex_other(ch, pos)
+                continue
+            add_type(kind)
+            add_offset(pos)
+            add_value(value)
 
         # Add EOF token
-        self.tokens.append(Token(TokenType.EOF, None, self.line, self.column))
-        return self.tokens
+        self._emit(TokenType.EOF, None, self.pos)
+        self.location(0)
+        tokens.newlines = array('I', self._newlines)
+        return tokens
+
+    def _emit(self, token_type: TokenType, value, pos: int):
+        tokens = self.tokens
+        if value.__class__ is str:
+            value = self._intern.setdefault(value, value)
+        tokens.types.append(token_type.value)
+        tokens.offsets.append(pos)
+        tokens.values.append(value)
+
+    def _lex_string(self, ch: str, pos: int):
+        value = self.read_string()
+        self._emit(TokenType.STRING, value, pos)
+
+    def _lex_caret(self, ch: str, pos: int):
+        # Handle MDL control character sequences: ^/X (e.g., ^/L = form feed)
+        # Also handle ^<ctrl-char> where the control char is literal (e.g., ^\x0c for form feed)
+        # Also handle ^\X format where \X is a backslash-escaped letter (e.g., ^\L = form feed)
+        # These are typically used as page breaks and should be treated as whitespace
+        next_ch = self.peek(1)
+        if next_ch in ('/', '\\'):
+            self.pos = min(pos + 3, len(self.source))
+        elif next_ch and ord(next_ch) < 32:
+            self.pos = pos + 2
+        else:
+            self._lex_other(ch, pos)
+
+    def _lex_semicolon(self, ch: str, pos: int):
+        # Check for comment (both ;" and ; styles)
+        # Special case: ;= is an atom (used in BUZZ words)
+        # Special case: ; inside parentheses followed by non-comment char is a separator (ZILF SYNONYM/ADJECTIVE)
+        # But ;" ;< ;( are always comments
+        next_ch = self.peek(1)
+        if next_ch == '=':
+            # Fall through to atom handling
+            self._lex_other(ch, pos)
+        elif self.paren_depth > 0 and self.angle_depth == 0 and next_ch and next_ch.isalnum():
+            # ZILF separator is ;WORD (no space) inside parentheses but not
+            # angle brackets - e.g., <SYNONYM FOO ;BAR BAZ>
+            self.pos = pos + 1
+            self._emit(TokenType.SEMICOLON, ';', pos)
+        else:
+            # If there's whitespace after ;, it's a comment, not a separator
+            self.skip_comment()
+
+    def _lex_percent(self, ch: str, pos: int):
+        # Compile-time evaluation: %,VAR, %.VAR - these become CHAR_GLOBAL_VAR/CHAR_LOCAL_VAR
+        # Note: %<...> forms are handled by compiler preprocessing, not lexer
+        next_ch = self.peek(1)
+        if next_ch == ',':
+            self.pos = pos + 1
+            self._lex_variable(next_ch, pos + 1, percent_prefix=True)
+        elif next_ch == '.':
+            self.pos = pos + 1
+            self._lex_variable(next_ch, pos + 1, percent_prefix=True)
+        elif next_ch == '<':
+            self._lex_compile_time_form(pos)
+        else:
+            self._lex_other(ch, pos)
+
+    def _lex_variable(self, ch: str, pos: int, percent_prefix: bool = False):
+        # Local (.) or global (,) variable reference (allow whitespace after
+        # the prefix); otherwise just a PERIOD or COMMA token.
+        # If followed by alphanumeric (after optional whitespace), it's a var.
+        # Allow digits too, for vars like .1ST?; allow ? for vars like .?RESULT
+        name_start = _BLANKS.match(self.source, pos + 1).end()
+        next_ch = self.source[name_start] if name_start < len(self.source) else None
+        if next_ch and (next_ch.isalnum() or next_ch in '-_?'):
+            self.pos = name_start
+            name = self.read_atom()
+            # Use CHAR_*_VAR if we had % prefix (for %.VAR / %,VAR in TELL)
+            if ch == '.':
+                token_type = TokenType.CHAR_LOCAL_VAR if percent_prefix else TokenType.LOCAL_VAR
+            else:
+                token_type = TokenType.CHAR_GLOBAL_VAR if percent_prefix else TokenType.GLOBAL_VAR
+            self._emit(token_type, name, pos)
+        else:
+            self.pos = pos + 1
+            self._emit(TokenType.PERIOD if ch == '.' else TokenType.COMMA, ch, pos)
+
+    def _lex_digit(self, ch: str, pos: int):
+        # Number (but not if it's part of an atom like 1ST?)
+        # Look ahead to see if this is a pure number or starts an atom
+        # Atoms can start with digits: 1ST?, 2ND, etc.
+        src = self.source
+        n = len(src)
+        ahead = pos + 1
+        while ahead < n and (src[ahead].isdigit() or src[ahead] in 'ABCDEFabcdef'):
+            ahead += 1
+        # If followed by atom characters after the digits, it's an atom
+        # Exception: ; after a number starts a comment, not an atom (17;comment = 17)
+        next_ch = src[ahead] if ahead < n else None
+        if next_ch and self.is_atom_char(next_ch) and not next_ch.isdigit() and next_ch != ';':
+            # It's an atom like 1ST?
+            value = self.read_atom()
+            self._emit(TokenType.ATOM, value, pos)
+        else:
+            value = self.read_number()
+            self._emit(TokenType.NUMBER, value, pos)
+
+    def _lex_minus(self, ch: str, pos: int):
+        # Negative number
+        next_ch = self.peek(1)
+        if next_ch and next_ch.isdigit():
+            value = self.read_number()
+            self._emit(TokenType.NUMBER, value, pos)
+        else:
+            self._lex_atom(ch, pos)
+
+    def _lex_dollar(self, ch: str, pos: int):
+        # Hex number ($1A3F) - only if $ is followed by hex digits and nothing else
+        # Check if it's truly a hex number vs an atom like $BUZZ
+        next_ch = self.peek(1)
+        if not (next_ch and next_ch in '0123456789ABCDEFabcdef'):
+            self._lex_atom(ch, pos)
+            return
+        src = self.source
+        ahead = _HEX_DIGITS.match(src, pos + 1).end()
+        after = src[ahead] if ahead < len(src) else None
+        # If followed by other atom characters (like 'Z' in $BUZZ), it's an atom
+        if after and self.is_atom_char(after) and after not in '0123456789ABCDEFabcdef':
+            self.pos = pos + 1
+            name = '$' + self.read_atom()
+            self._emit(TokenType.ATOM, name, pos)
+        else:
+            value = self.read_number()
+            self._emit(TokenType.NUMBER, value, pos)
+
+    def _lex_hash(self, ch: str, pos: int):
+        # Base-prefixed number (#2 binary, #8 octal, etc.) or MDL type specifier (#SEMI, etc.)
+        src = self.source
+        n = len(src)
+        self.pos = pos + 1
+        next_ch = self.peek()
+        if next_ch and next_ch.isdigit():
+            base = 0
+            while self.peek() and self.peek().isdigit():
+                base = base * 10 + int(self.advance())
+            # Skip whitespace between base and number
+            digits = self.pos = _BLANKS.match(src, self.pos).end()
+            # Now read the number digits
+            end = digits
+            while end < n and (src[end].isdigit() or src[end].isalpha()):
+                end += 1
+            self.pos = end
+            num_str = src[digits:end]
+            try:
+                value = int(num_str, base) if num_str else 0
+            except ValueError:
+                # If it's not a valid number in that base, treat as 0
+                value = 0
+            self._emit(TokenType.NUMBER, value, pos)
+        else:
+            # It's a type specifier like #SEMI - read as an atom with # prefix
+            name = '#'
+            if next_ch and (next_ch.isalpha() or next_ch in '-_'):
+                name += self.read_atom()
+            self._emit(TokenType.ATOM, name, pos)
+
+    def _lex_bang(self, ch: str, pos: int):
+        # Special case: ! escapes for STRING form (!\", !\\, !=, !\`, etc.)
+        # Also handles !< for MDL splice-form operator
+        next_ch = self.peek(1)
+        if next_ch == '\\':
+            # !\X where X is any char (could be anything)
+            self.pos = min(pos + 3, len(self.source))
+            value = self.source[pos:self.pos]
+        elif next_ch in (',', '<', '.'):
+            # !,VAR / !.VAR splice a variable, !<...> splices a form: emit
+            # just the ! and let the rest be read separately
+            self.pos = pos + 1
+            value = '!'
+        elif next_ch:
+            # Any other character after !
+            self.pos = pos + 2
+            value = self.source[pos:pos + 2]
+        else:
+            self.pos = pos + 1
+            value = '!'
+        self._emit(TokenType.ATOM, value, pos)
+
+    def _lex_backslash(self, ch: str, pos: int):
+        # Backslash (character constant or escape prefix for identifiers)
+        # If followed by another character, include it as part of the atom
+        # This handles \. \, \" \\ etc. as complete atoms
+        src = self.source
+        end = pos + 1
+        if end < len(src) and src[end] not in ' \t\n\r\f':
+            end += 1
+        # Continue reading if more atom characters follow (e.g., \,TELL -> single atom)
+        self.pos = _ATOM_CHARS.match(src, end).end()
+        self._emit(TokenType.ATOM, src[pos:self.pos], pos)
+
+    def _lex_star(self, ch: str, pos: int):
+        # Octal number: *digits* (e.g., *3777* = 2047 decimal)
+        # Must be checked before general atom handling since * is a valid atom char
+        next_ch = self.peek(1)
+        if not (next_ch and next_ch.isdigit()):
+            self._lex_atom(ch, pos)
+            return
+        src = self.source
+        self.pos = pos + 1
+        self._skip_digits()
+        num_str = src[pos + 1:self.pos]
+        if self.peek() == '*':
+            self.pos += 1
+            try:
+                value = int(num_str, 8)  # Parse as octal
+            except ValueError:
+                self.error(f"Invalid octal number: *{num_str}*")
+            self._emit(TokenType.NUMBER, value, pos)
+        else:
+            # Not a valid *digits* pattern, treat as atom
+            self.pos = _ATOM_CHARS.match(src, self.pos).end()
+            self._emit(TokenType.ATOM, src[pos:self.pos], pos)
+
+    def _lex_atom(self, ch: str, pos: int):
+        value = self.read_atom()
+        self._emit(TokenType.ATOM, value, pos)
+
+    def _lex_single(self, ch: str, pos: int):
+        # Quote operator, quasi-quote (`) and @ reader-macro prefix
+        self.pos = pos + 1
+        self._emit(TokenType.QUOTE if ch == "'" else TokenType.ATOM, ch, pos)
+
+    def _lex_tilde(self, ch: str, pos: int):
+        # Unquote operator (tilde) - used in ZILF macros with quasi-quote;
+        # ~! is splice-unquote
+        if self.peek(1) == '!':
+            self.pos = pos + 2
+            self._emit(TokenType.ATOM, '~!', pos)
+        else:
+            self.pos = pos + 1
+            self._emit(TokenType.ATOM, '~', pos)
+
+    def _lex_compile_time_form(self, pos: int):
+        # Compile-time conditional: %< ... > (reader macro)
+        # This is used for DEBUG-CODE and similar conditionals
+        # At top level (angle_depth=0), these conditionally include/exclude code, so skip entirely
+        # Inside a form (angle_depth>0), these evaluate to a value, emit placeholder 0
+        src = self.source
+        n = len(src)
+        inside_form = self.angle_depth > 0 or self.paren_depth > 0
+        # A compile-time ARITHMETIC form used as a value -- %<- ...>,
+        # %<+ ...>, %<* ...>, %</ ...> -- must actually be folded, not
+        # replaced by 0.  moonmist stores I-DINNER's queue tick as
+        # <TABLE ... 1 %<- ,DINNER-TIME ,PRESENT-TIME-ATOM 10> I-DINNER>
+        # and queues I-LIONEL-SPEAKS with %<- ,LIONEL-TIME
+        # ,PRESENT-TIME-ATOM>; dropped to 0 the after-dinner clock
+        # collapses.  Drop only the % here so <...> tokenizes as an
+        # ordinary form and codegen's constant folder evaluates it.
+        # DEBUG-CODE / COND reader-conditionals keep the skip below.
+        if inside_form:
+            _j = pos + 2
+            while _j < n and src[_j] in ' \t\n\r':
+                _j += 1
+            if (_j + 1 < n
+                    and src[_j] in '-+*/'
+                    and src[_j + 1] in ' \t\n\r'):
+                self.pos = pos + 1  # drop % only; < becomes LANGLE next loop
+                return
+        # Skip the entire form including nested angle brackets
+        # Must handle: strings with escapes, !\X character literals, nested () and <>
+        # Only !\X is a character literal (e.g. !\> is a literal >, which
+        # must NOT count as a bracket). Other uses of ! are segment/splice
+        # operators -- !<form>, !.var, !,var -- whose following token is
+        # ordinary and MUST be counted normally.
+        self.pos = n
+        depth = 0
+        for m in _COMPILE_TIME_FORM.finditer(src, pos + 1):
+            c = m.group()
+            if c == '<':
+                depth += 1
+            elif c == '>':
+                depth -= 1
+                if depth == 0:
+                    self.pos = m.end()
+                    break
+        # If inside a form, emit a placeholder value of 0
+        # This allows constructs like <CONSTANT NAME %<COND ...>> to parse correctly
+        # At top level, skip entirely (the conditional block is excluded)
+        if inside_form:
+            self._emit(TokenType.NUMBER, 0, pos)
+
+    def _lex_other(self, ch: str, pos: int):
+        # Digits outside ASCII (str.isdigit) start numbers too
+        if ch.isdigit():
+            self._lex_digit(ch, pos)
+        # Atom/Identifier
+        # Note: : can start atoms for type annotations (e.g., :FIX, :DECL)
+        # Note: | is used in TELL-TOKENS and other MDL constructs
+        elif ch.isalpha() or ch in '-_?+*/<>=$#;:|':
+            self._lex_atom(ch, pos)
+        else:
+            self.error(f"Unexpected character: {ch!r}")
+
+    # First character -> handler; anything else is an atom or an error.
+    # (Delimiters and plain atoms are handled inline in tokenize.)
+    _dispatch = {
+        '"': _lex_string,
+        '^': _lex_caret,
+        ';': _lex_semicolon,
+        '%': _lex_percent,
+        '.': _lex_variable, ',': _lex_variable,
+        '-': _lex_minus,
+        '$': _lex_dollar,
+        '#': _lex_hash,
+        '!': _lex_bang,
+        '\\': _lex_backslash,
+        '*': _lex_star,
+        "'": _lex_single, '`': _lex_single, '@': _lex_single,
+        '~': _lex_tilde,
+    }
+    for _digit in '0123456789':
+        _dispatch[_digit] = _lex_digit
+    del _digit
 
 
 def tokenize(source: str, filename: str = "<input>") -> List[Token]:
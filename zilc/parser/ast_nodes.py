@@ -2,8 +2,16 @@
 Abstract Syntax Tree node definitions for ZIL.
 
 Each node represents a ZIL construct.
+
+Node classes declare __slots__: a large game's expanded program holds
+hundreds of thousands of nodes, and a slotted instance is a fraction of the
+size of one with a __dict__.  Atom names are interned and AtomNode caches
+the upper-cased name in `upper`, so the comparisons the expander and code
+generator make by name are attribute reads.  node_fields() lists a node's
+attributes where code used to call vars().
 """
 
+import sys
 from dataclasses import dataclass, field
 from typing import List, Optional, Any, Dict, Set
 from enum import Enum, auto
@@ -68,17 +76,62 @@ class NodeType(Enum):
     DEFINE_GLOBALS = auto() # <DEFINE-GLOBALS table-name (name val) (name BYTE val) ...>
 
 
-@dataclass
 class ASTNode:
-    """Base class for all AST nodes."""
-    node_type: NodeType
-    line: int = 0
-    column: int = 0
+    """Base class for all AST nodes.
+
+    Equality compares the class, node_type, line and column (the behaviour
+    of the dataclass this used to be); nodes are not hashable.
+    """
+    __slots__ = ('node_type', 'line', 'column')
+
+    def __init__(self, node_type: NodeType, line: int = 0, column: int = 0):
+        self.node_type = node_type
+        self.line = line
+        self.column = column
+
+    def __eq__(self, other):
+        if other.__class__ is self.__class__:
+            return ((self.node_type, self.line, self.column)
+                    == (other.node_type, other.line, other.column))
+        return NotImplemented
+
+    __hash__ = None
 
     def __repr__(self):
         return f"{self.__class__.__name__}(...)"
 
 
+_FIELD_NAMES: Dict[type, tuple] = {}
+
+
+def node_fields(node):
+    """(name, value) of each attribute set on `node`: its slots, base class
+    first, then anything in an instance __dict__ (Program, TellTokenDef...)."""
+    cls = node.__class__
+    names = _FIELD_NAMES.get(cls)
+    if names is None:
+        names = []
+        for klass in reversed(cls.__mro__):
+            slots = klass.__dict__.get('__slots__', ())
+            names.extend((slots,) if isinstance(slots, str) else slots)
+        names = _FIELD_NAMES[cls] = tuple(n for n in names if n != '__dict__')
+    for name in names:
+        try:
+            yield name, getattr(node, name)
+        except AttributeError:
+            pass
+    d = getattr(node, '__dict__', None)
+    if d:
+        yield from d.items()
+
+
+_UPPER: Dict[str, str] = {}
+
+
+def _intern(name):
+    return sys.intern(name) if name.__class__ is str else name
+
+
 class MdlVector(list):
     """An MDL VECTOR literal [a b c].
 
@@ -94,9 +147,25 @@ class MdlVector(list):
 
 
 class AtomNode(ASTNode):
-    """Atom/identifier node."""
+    """Atom/identifier node.
+
+    `value` is the interned name and `upper` its interned upper-case form;
+    atoms are not renamed in place (build a new AtomNode instead).
+    """
+    __slots__ = ('value', 'upper')
+
     def __init__(self, value: str, line: int = 0, column: int = 0):
         super().__init__(NodeType.ATOM, line, column)
+        if value.__class__ is str:
+            upper = _UPPER.get(value)
+            if upper is None:
+                value = sys.intern(value)
+                upper = _UPPER[value] = sys.intern(value.upper())
+            else:
+                value = sys.intern(value)
+            self.upper = upper
+        else:
+            self.upper = value
         self.value = value
 
     def __repr__(self):
@@ -105,6 +174,8 @@ class AtomNode(ASTNode):
 
 class NumberNode(ASTNode):
     """Number literal node."""
+    __slots__ = ('value',)
+
     def __init__(self, value: int, line: int = 0, column: int = 0):
         super().__init__(NodeType.NUMBER, line, column)
         self.value = value
@@ -115,6 +186,8 @@ class NumberNode(ASTNode):
 
 class StringNode(ASTNode):
     """String literal node."""
+    __slots__ = ('value',)
+
     def __init__(self, value: str, line: int = 0, column: int = 0):
         super().__init__(NodeType.STRING, line, column)
         self.value = value
@@ -125,9 +198,11 @@ class StringNode(ASTNode):
 
 class LocalVarNode(ASTNode):
     """Local variable reference (.VAR)."""
+    __slots__ = ('name',)
+
     def __init__(self, name: str, line: int = 0, column: int = 0):
         super().__init__(NodeType.LOCAL_VAR, line, column)
-        self.name = name
+        self.name = _intern(name)
 
     def __repr__(self):
         return f"LocalVar(.{self.name})"
@@ -135,9 +210,11 @@ class LocalVarNode(ASTNode):
 
 class GlobalVarNode(ASTNode):
     """Global variable reference (,VAR)."""
+    __slots__ = ('name',)
+
     def __init__(self, name: str, line: int = 0, column: int = 0):
         super().__init__(NodeType.GLOBAL_VAR, line, column)
-        self.name = name
+        self.name = _intern(name)
 
     def __repr__(self):
         return f"GlobalVar(,{self.name})"
@@ -145,9 +222,11 @@ class GlobalVarNode(ASTNode):
 
 class CharLocalVarNode(ASTNode):
     """Local variable reference for character printing (%.VAR)."""
+    __slots__ = ('name',)
+
     def __init__(self, name: str, line: int = 0, column: int = 0):
         super().__init__(NodeType.CHAR_LOCAL_VAR, line, column)
-        self.name = name
+        self.name = _intern(name)
 
     def __repr__(self):
         return f"CharLocalVar(%.{self.name})"
@@ -155,9 +234,11 @@ class CharLocalVarNode(ASTNode):
 
 class CharGlobalVarNode(ASTNode):
     """Global variable reference for character printing (%,VAR)."""
+    __slots__ = ('name',)
+
     def __init__(self, name: str, line: int = 0, column: int = 0):
         super().__init__(NodeType.CHAR_GLOBAL_VAR, line, column)
-        self.name = name
+        self.name = _intern(name)
 
     def __repr__(self):
         return f"CharGlobalVar(%,{self.name})"
@@ -165,6 +246,8 @@ class CharGlobalVarNode(ASTNode):
 
 class FormNode(ASTNode):
     """Generic form/S-expression node: <func arg1 arg2 ...>"""
+    __slots__ = ('operator', 'operands')
+
     def __init__(self, operator: ASTNode, operands: List[ASTNode] = None,
                  line: int = 0, column: int = 0):
         super().__init__(NodeType.FORM, line, column)
@@ -177,6 +260,9 @@ class FormNode(ASTNode):
 
 class RoutineNode(ASTNode):
     """ROUTINE definition node."""
+    __slots__ = ('name', 'params', 'aux_vars', 'opt_params', 'body', 'declarations',
+                 'local_defaults', 'activation')
+
     def __init__(self, name: str, params: List[str] = None, aux_vars: List[str] = None,
                  body: List[ASTNode] = None, line: int = 0, column: int = 0,
                  local_defaults: Dict[str, 'ASTNode'] = None, activation: str = None,
@@ -199,6 +285,8 @@ class RoutineNode(ASTNode):
 
 class ObjectNode(ASTNode):
     """OBJECT definition node."""
+    __slots__ = ('name', 'properties')
+
     def __init__(self, name: str, properties: Dict[str, Any] = None,
                  line: int = 0, column: int = 0):
         super().__init__(NodeType.OBJECT, line, column)
@@ -211,6 +299,8 @@ class ObjectNode(ASTNode):
 
 class RoomNode(ASTNode):
     """ROOM definition node."""
+    __slots__ = ('name', 'properties')
+
     def __init__(self, name: str, properties: Dict[str, Any] = None,
                  line: int = 0, column: int = 0):
         super().__init__(NodeType.ROOM, line, column)
@@ -231,6 +321,8 @@ class SyntaxNode(ASTNode):
         object_flags: List of scope flag lists for each OBJECT in pattern
                       e.g., [['HAVE'], ['MANY']] for two OBJECTs with different flags
     """
+    __slots__ = ('pattern', 'routine', 'verb_synonyms', 'object_flags')
+
     def __init__(self, pattern: List[Any] = None, routine: str = "",
                  verb_synonyms: List[str] = None,
                  object_flags: List[List[str]] = None,
@@ -249,6 +341,8 @@ class SyntaxNode(ASTNode):
 
 class CondNode(ASTNode):
     """COND conditional node."""
+    __slots__ = ('clauses',)
+
     def __init__(self, clauses: List[tuple] = None, line: int = 0, column: int = 0):
         super().__init__(NodeType.COND, line, column)
         self.clauses = clauses or []
@@ -263,6 +357,8 @@ class RepeatNode(ASTNode):
     Syntax: <REPEAT ((var1 init1) (var2 init2) ...) (cond) body...>
     or simplified: <REPEAT () body...>
     """
+    __slots__ = ('bindings', 'condition', 'body')
+
     def __init__(self, bindings: List[tuple] = None, condition: ASTNode = None,
                  body: List[ASTNode] = None, line: int = 0, column: int = 0):
         super().__init__(NodeType.REPEAT, line, column)
@@ -276,6 +372,8 @@ class RepeatNode(ASTNode):
 
 class TableNode(ASTNode):
     """TABLE/ITABLE/LTABLE node."""
+    __slots__ = ('table_type', 'flags', 'size', 'values', 'pattern_spec')
+
     def __init__(self, table_type: str, flags: List[str] = None, size: int = None,
                  values: List[ASTNode] = None, line: int = 0, column: int = 0,
                  pattern_spec: List[Any] = None):
@@ -294,6 +392,8 @@ class TableNode(ASTNode):
 
 class VersionNode(ASTNode):
     """VERSION directive node."""
+    __slots__ = ('version',)
+
     def __init__(self, version: int, line: int = 0, column: int = 0):
         super().__init__(NodeType.VERSION, line, column)
         self.version = version
@@ -304,6 +404,8 @@ class VersionNode(ASTNode):
 
 class GlobalNode(ASTNode):
     """GLOBAL variable definition."""
+    __slots__ = ('name', 'initial_value', 'from_setg')
+
     def __init__(self, name: str, initial_value: ASTNode = None,
                  line: int = 0, column: int = 0, from_setg: bool = False):
         super().__init__(NodeType.GLOBAL, line, column)
@@ -322,6 +424,8 @@ class GlobalNode(ASTNode):
 
 class ConstantNode(ASTNode):
     """CONSTANT definition."""
+    __slots__ = ('name', 'value')
+
     def __init__(self, name: str, value: ASTNode, line: int = 0, column: int = 0):
         super().__init__(NodeType.CONSTANT, line, column)
         self.name = name
@@ -355,6 +459,8 @@ class PropdefNode(ASTNode):
         - <GLOBAL .VAR> (encode as global variable reference)
         - (CONST_NAME VALUE) (define a constant)
     """
+    __slots__ = ('name', 'default_value', 'patterns')
+
     def __init__(self, name: str, default_value: ASTNode = None,
                  patterns: list = None, line: int = 0, column: int = 0):
         super().__init__(NodeType.PROPDEF, line, column)
@@ -370,6 +476,8 @@ class PropdefNode(ASTNode):
 
 class MacroNode(ASTNode):
     """DEFMAC macro definition."""
+    __slots__ = ('name', 'params', 'body', 'param_defaults')
+
     def __init__(self, name: str, params: List[tuple] = None, body: ASTNode = None,
                  line: int = 0, column: int = 0):
         super().__init__(NodeType.MACRO, line, column)
@@ -384,6 +492,8 @@ class MacroNode(ASTNode):
 
 class BuzzNode(ASTNode):
     """BUZZ noise word declaration."""
+    __slots__ = ('words',)
+
     def __init__(self, words: List[str], line: int = 0, column: int = 0):
         super().__init__(NodeType.BUZZ, line, column)
         self.words = words  # List of noise words
@@ -394,6 +504,8 @@ class BuzzNode(ASTNode):
 
 class NewAddWordNode(ASTNode):
     """NEW-ADD-WORD vocabulary addition (NEW-PARSER? mode)."""
+    __slots__ = ('name', 'word_type', 'value', 'flags')
+
     def __init__(self, name: str, word_type: Optional[str], value: Any, flags: int,
                  line: int = 0, column: int = 0):
         super().__init__(NodeType.NEW_ADD_WORD, line, column)
@@ -408,6 +520,8 @@ class NewAddWordNode(ASTNode):
 
 class SynonymNode(ASTNode):
     """Standalone SYNONYM declaration (not in an object)."""
+    __slots__ = ('words',)
+
     def __init__(self, words: List[str], line: int = 0, column: int = 0):
         super().__init__(NodeType.SYNONYM, line, column)
         self.words = words  # List of synonym words
@@ -422,6 +536,8 @@ class BitSynonymNode(ASTNode):
     Makes one flag an alias for another, so both names refer to the same bit.
     Syntax: <BIT-SYNONYM original-flag alias-flag>
     """
+    __slots__ = ('original', 'alias')
+
     def __init__(self, original: str, alias: str, line: int = 0, column: int = 0):
         super().__init__(NodeType.BIT_SYNONYM, line, column)
         self.original = original  # The original flag name
@@ -438,6 +554,8 @@ class PrepSynonymNode(ASTNode):
     Syntax: <PREP-SYNONYM canonical-prep synonym-prep...>
     Example: <PREP-SYNONYM TO TOWARD TOWARDS>
     """
+    __slots__ = ('canonical', 'synonyms')
+
     def __init__(self, canonical: str, synonyms: list, line: int = 0, column: int = 0):
         super().__init__(NodeType.PREP_SYNONYM, line, column)
         self.canonical = canonical  # The canonical preposition
@@ -462,6 +580,8 @@ class RemoveSynonymNode(ASTNode):
     Removes a word from being a synonym, allowing it to be used independently.
     Syntax: <REMOVE-SYNONYM word>
     """
+    __slots__ = ('word',)
+
     def __init__(self, word: str, line: int = 0, column: int = 0):
         super().__init__(NodeType.REMOVE_SYNONYM, line, column)
         self.word = word  # The word to remove from synonyms
@@ -477,6 +597,8 @@ class QuasiquoteNode(ASTNode):
     In MDL/ZILF: `<FORM A ~X B> creates a form where X is evaluated
     and its value inserted.
     """
+    __slots__ = ('expr',)
+
     def __init__(self, expr: ASTNode, line: int = 0, column: int = 0):
         super().__init__(NodeType.QUASIQUOTE, line, column)
         self.expr = expr  # The quasiquoted expression
@@ -492,6 +614,8 @@ class UnquoteNode(ASTNode):
     evaluated and its value inserted.
     In MDL/ZILF: ~X within a quasiquote evaluates X.
     """
+    __slots__ = ('expr',)
+
     def __init__(self, expr: ASTNode, line: int = 0, column: int = 0):
         super().__init__(NodeType.UNQUOTE, line, column)
         self.expr = expr  # The expression to evaluate
@@ -507,6 +631,8 @@ class SpliceUnquoteNode(ASTNode):
     evaluated and its elements spliced into the surrounding list.
     In MDL/ZILF: ~!X evaluates X and splices the result.
     """
+    __slots__ = ('expr',)
+
     def __init__(self, expr: ASTNode, line: int = 0, column: int = 0):
         super().__init__(NodeType.SPLICE_UNQUOTE, line, column)
         self.expr = expr  # The expression to evaluate and splice
@@ -522,6 +648,8 @@ class SpliceResultNode(ASTNode):
     into the surrounding context rather than treated as a single value.
     Created by macros returning <CHTYPE '(...) SPLICE>.
     """
+    __slots__ = ('items',)
+
     def __init__(self, items: List['ASTNode'], line: int = 0, column: int = 0):
         super().__init__(NodeType.SPLICE_UNQUOTE, line, column)  # Reuse type
         self.items = items  # List of items to splice inline
@@ -584,6 +712,8 @@ class DirectionsNode(ASTNode):
     For V3 (max 31 properties): NORTH=31, SOUTH=30, EAST=29, WEST=28
     Also creates LOW-DIRECTION constant = lowest direction property.
     """
+    __slots__ = ('names',)
+
     def __init__(self, names: List[str], line: int = 0, column: int = 0):
         super().__init__(NodeType.DIRECTIONS, line, column)
         self.names = names  # List of direction names
@@ -600,6 +730,8 @@ class OrderObjectsNode(ASTNode):
     - DEFINED: Objects numbered in definition order
     - REVERSE-DEFINED: Objects numbered in reverse definition order
     """
+    __slots__ = ('ordering',)
+
     def __init__(self, ordering: str, line: int = 0, column: int = 0):
         super().__init__(NodeType.ORDER_OBJECTS, line, column)
         self.ordering = ordering
@@ -615,6 +747,8 @@ class OrderTreeNode(ASTNode):
     - DEFINED: Children in definition order
     - REVERSE-DEFINED: Children in reverse definition order (default)
     """
+    __slots__ = ('ordering',)
+
     def __init__(self, ordering: str, line: int = 0, column: int = 0):
         super().__init__(NodeType.ORDER_TREE, line, column)
         self.ordering = ordering
@@ -630,6 +764,8 @@ class LongWordsNode(ASTNode):
     dictionary limit (6 chars in V1-3, 9 chars in V4+) are tracked and a
     LONG-WORD-TABLE is generated containing the full text of these words.
     """
+    __slots__ = ()
+
     def __init__(self, line: int = 0, column: int = 0):
         super().__init__(NodeType.LONG_WORDS, line, column)
 
@@ -664,6 +800,8 @@ class DefineGlobalsNode(ASTNode):
         - TABLE-NAME constant pointing to the table
         - NAME1, NAME2, etc. as accessor routines/macros
     """
+    __slots__ = ('table_name', 'entries')
+
     def __init__(self, table_name: str, entries: List[DefineGlobalEntry],
                  line: int = 0, column: int = 0):
         super().__init__(NodeType.DEFINE_GLOBALS, line, column)
@@ -700,6 +838,8 @@ class TellTokensNode(ASTNode):
     - *: Each * indicates an argument capture
     - EXPANSION: A form using .X, .Y, .Z, .W for captured args
     """
+    __slots__ = ('tokens',)
+
     def __init__(self, tokens: List[TellTokenDef], line: int = 0, column: int = 0):
         super().__init__(NodeType.TELL_TOKENS, line, column)
         self.tokens = tokens  # List of TellTokenDef
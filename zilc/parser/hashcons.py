@@ -0,0 +1,150 @@
+"""
+Hash-consing of expanded routine code.
+
+After macro expansion a game's routines repeat the same small subtrees
+over and over: ,PRSO, <FSET? ,PRSO ,TAKEBIT>, <EQUAL? ,HERE ,FOO>, the
+<TELL "..." CR> of a common idiom.  HashConsTable.share() rebuilds a tree
+bottom-up so that structurally identical subtrees are one object.  The
+table key of a node is its class and value, or for a form or COND the ids
+of its (already shared) children, so it is computed in O(1) per node, and
+two shared subtrees are equal exactly when they are the same object.
+
+Source positions are not part of the structure: a shared node keeps the
+line and column of the occurrence seen first.  Positions are reported by
+the parser and macro expander, which run before sharing; the code
+generator does not report them.
+
+Only value-like nodes are shared -- atoms, literals, variable references,
+and forms and CONDs built entirely from them.  A TABLE-family form is
+never shared (each occurrence allocates its own table), and neither is
+anything containing one, a TableNode or a REPEAT; the shareable parts
+inside those are.  A node is only copied when one of its children was
+replaced, so an unshared tree comes back unchanged.
+"""
+
+from typing import Dict, List, Tuple
+
+from .ast_nodes import (ASTNode, AtomNode, CharGlobalVarNode, CharLocalVarNode,
+                        CondNode, FormNode, GlobalVarNode, LocalVarNode,
+                        NumberNode, RepeatNode, StringNode)
+
+# Leaf classes and the attribute that is their whole structure.
+_LEAF_FIELDS = {
+    AtomNode: 'value',
+    NumberNode: 'value',
+    StringNode: 'value',
+    LocalVarNode: 'name',
+    GlobalVarNode: 'name',
+    CharLocalVarNode: 'name',
+    CharGlobalVarNode: 'name',
+}
+
+# Forms that allocate storage per occurrence.
+_TABLE_OPS = frozenset({'TABLE', 'LTABLE', 'ITABLE', 'PTABLE', 'PLTABLE'})
+
+
+class HashConsTable:
+    """Canonical nodes by structure.
+
+    Usage:
+        table = HashConsTable()
+        routine.body = [table.share(stmt) for stmt in routine.body]
+    """
+
+    def __init__(self):
+        self._nodes: Dict[tuple, ASTNode] = {}
+        self.shared = 0     # occurrences replaced by an existing equal node
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def share(self, node):
+        """``node`` with its identical subtrees shared (see module doc)."""
+        if not isinstance(node, ASTNode):
+            return node
+        return self._share(node)[0]
+
+    def _intern(self, key: tuple, node: ASTNode) -> Tuple[ASTNode, bool]:
+        canonical = self._nodes.setdefault(key, node)
+        if canonical is not node:
+            self.shared += 1
+        return canonical, True
+
+    def _share(self, node: ASTNode) -> Tuple[ASTNode, bool]:
+        """(shared node, whether it is canonical in this table)."""
+        cls = node.__class__
+        field = _LEAF_FIELDS.get(cls)
+        if field is not None:
+            value = getattr(node, field)
+            try:
+                return self._intern((cls, value.__class__, value), node)
+            except TypeError:           # an unhashable value
+                return node, False
+        if cls is FormNode:
+            operator, ok = self._share_child(node.operator)
+            operands, operands_ok, changed = self._share_list(node.operands)
+            changed = changed or operator is not node.operator
+            ok = (ok and operands_ok
+                  and not (operator.__class__ is AtomNode and operator.upper in _TABLE_OPS))
+            if changed:
+                node = FormNode(operator, operands, node.line, node.column)
+            if not ok:
+                return node, False
+            return self._intern((FormNode, id(operator), tuple(map(id, operands))), node)
+        if cls is CondNode:
+            clauses, ok, changed = [], True, False
+            for clause in node.clauses:
+                if (clause.__class__ is not tuple or len(clause) != 2
+                        or not isinstance(clause[1], list)):
+                    clauses.append(clause)
+                    ok = False
+                    continue
+                test, test_ok = self._share_child(clause[0])
+                actions, actions_ok, actions_changed = self._share_list(clause[1])
+                if test is not clause[0] or actions_changed:
+                    clause = (test, actions)
+                    changed = True
+                clauses.append(clause)
+                ok = ok and test_ok and actions_ok
+            if changed:
+                node = CondNode(clauses, node.line, node.column)
+            if not ok:
+                return node, False
+            return self._intern(
+                (CondNode, tuple((id(test), tuple(map(id, actions)))
+                                 for test, actions in clauses)), node)
+        if cls is RepeatNode:
+            condition, _ok = self._share_child(node.condition)
+            body, _ok, changed = self._share_list(node.body)
+            if changed or condition is not node.condition:
+                node = RepeatNode(node.bindings, condition, body, node.line, node.column)
+            return node, False
+        return node, False
+
+    def _share_child(self, child) -> Tuple[object, bool]:
+        if isinstance(child, ASTNode):
+            return self._share(child)
+        return child, False
+
+    def _share_list(self, items: List) -> Tuple[List, bool, bool]:
+        """(shared items, all canonical, any replaced); ``items`` itself if
+        nothing was replaced."""
+        shared, ok, changed = [], True, False
+        for item in items:
+            new, item_ok = self._share_child(item)
+            shared.append(new)
+            ok = ok and item_ok
+            changed = changed or new is not item
+        return (shared if changed else items), ok, changed
+
+
+def share_routines(program, table: HashConsTable = None) -> HashConsTable:
+    """Share identical subtrees across every routine body and local default
+    of ``program``, in place; returns the table used."""
+    if table is None:
+        table = HashConsTable()
+    for routine in program.routines:
+        routine.body = [table.share(stmt) for stmt in routine.body]
+        for name, value in list(routine.local_defaults.items()):
+            routine.local_defaults[name] = table.share(value)
+    return table
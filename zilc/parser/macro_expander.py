@@ -8,7 +8,12 @@ Also includes MDL compile-time evaluation for MAPF/FUNCTION constructs.
 
 from typing import Dict, List, Optional, Any, Union, Tuple
 from .ast_nodes import *
+from .macro_profile import MacroProfile
+from .mdl_closures import compile_body, run_compiled
+from .parallel_expand import expand_routines_parallel
+from .symbol_index import SymbolIndex
 import copy
+import time
 
 
 class MapStop(Exception):
@@ -33,6 +38,17 @@ class MdlAgain(Exception):
     pass
 
 
+class MacroExpansionError(ValueError):
+    """A macro call site exceeded MacroExpander's runaway-expansion limits."""
+    pass
+
+
+# Returned by a primitive's handler when the form is not compile-time MDL
+# after all (RETURN outside a REPEAT); _evaluate_form then treats it as an
+# unknown form.
+_NOT_EVALUATED = object()
+
+
 class MdlStruct:
     """A compile-time DEFSTRUCT instance (e.g. advent's per-hint MAKE-HINT
     vector).  `type_name` is the struct name (HINT); `fields` maps each field
@@ -95,10 +111,10 @@ def _gassigned_guarded_names(test_node):
     def walk(n):
         if isinstance(n, FormNode):
             if isinstance(n.operator, AtomNode) and \
-               n.operator.value.upper() in ('GASSIGNED?', 'ASSIGNED?'):
+               n.operator.upper in ('GASSIGNED?', 'ASSIGNED?'):
                 for op in n.operands:
                     if isinstance(op, AtomNode):
-                        names.add(op.value.upper())
+                        names.add(op.upper)
                     elif isinstance(op, (GlobalVarNode, LocalVarNode)):
                         names.add(op.name.upper())
             for op in n.operands:
@@ -177,7 +193,7 @@ def _body_is_ct_cond_mdl(body, bound, ct_globals=None):
         if isinstance(it, CondNode):
             clauses = it.clauses
         elif (isinstance(it, FormNode) and isinstance(it.operator, AtomNode)
-              and it.operator.value.upper() == 'COND'):
+              and it.operator.upper == 'COND'):
             clauses = []
             for _op in it.operands:
                 if (isinstance(_op, FormNode)
@@ -199,7 +215,7 @@ def _body_writes_names(node, names):
     """True if any <SET nm ...> in ``node`` targets a name in ``names``."""
     if isinstance(node, FormNode):
         if (isinstance(node.operator, AtomNode)
-                and node.operator.value.upper() == 'SET' and node.operands):
+                and node.operator.upper == 'SET' and node.operands):
             tgt = node.operands[0]
             tn = getattr(tgt, 'value', getattr(tgt, 'name', None))
             if tn is not None and str(tn).upper() in names:
@@ -268,6 +284,177 @@ def _body_is_ct_list_setg(macro, ct_globals):
     return nm in ct_globals and isinstance(ct_globals[nm], list)
 
 
+# Operators whose evaluation has an effect beyond its value: compile-time
+# globals and definitions, output, and reads of the program being compiled
+# (ASSOCIATIONS/GETPROP see every definition made so far).  A macro that can
+# evaluate one of these is not pure, and its expansions are never cached.
+_EFFECT_OPS = frozenset({
+    'SETG', 'SETG20', 'EVAL', 'PRINC', 'PRIN1', 'PRINT', 'TERPRI', 'CRLF',
+    'ASSOCIATIONS', 'GETPROP', 'NEXT', 'PUTPROP', 'DEFINE', 'DEFMAC',
+    'DEFSTRUCT', 'MAKE-PREFIX-MACRO', 'VOC', 'ROUTINE', 'CONSTANT', 'GLOBAL',
+    'OBJECT', 'ROOM', 'COMPILATION-FLAG', 'COMPILATION-FLAG-DEFAULT',
+})
+
+_DEFINITION_NODES = (RoutineNode, ConstantNode, GlobalNode, ObjectNode,
+                     RoomNode, MacroNode)
+
+_LEAF_NODES = (StringNode, NumberNode, LocalVarNode, CharLocalVarNode,
+               CharGlobalVarNode)
+
+
+def _scan_effects(root, calls, reads):
+    """False if evaluating ``root`` may have a compile-time side effect.
+
+    Operators inside quoted data -- a QUOTE form, or a quasiquote outside
+    its unquotes -- are not evaluated and do not count.  Every atom and
+    ,GLOBAL named, quoted or not, goes into ``calls`` (a quoted template's
+    macro calls are expanded when its result is), and each global read
+    outside quoted data into ``reads``."""
+    stack = [(root, False)]
+    while stack:
+        node, quoted = stack.pop()
+        cls = node.__class__
+        if cls is list or cls is tuple or isinstance(node, (list, tuple)):
+            stack.extend((n, quoted) for n in node)
+            continue
+        if cls is dict:
+            stack.extend((n, quoted) for n in node.values())
+            continue
+        if not isinstance(node, ASTNode):
+            continue
+        if cls is FormNode:
+            op = node.operator
+            if not quoted and op.__class__ is AtomNode:
+                name = op.upper
+                if name in _EFFECT_OPS:
+                    return False
+                if name == 'QUOTE':
+                    quoted = True
+                elif (name == 'GVAL' and node.operands
+                        and isinstance(node.operands[0], AtomNode)):
+                    reads.add(node.operands[0].upper)
+            stack.append((op, quoted))
+            stack.extend((n, quoted) for n in node.operands)
+        elif cls is AtomNode:
+            calls.add(node.upper)
+        elif isinstance(node, GlobalVarNode):
+            name = node.name.upper()
+            calls.add(name)
+            if not quoted:
+                reads.add(name)
+        elif cls is QuasiquoteNode:
+            stack.append((node.expr, True))
+        elif cls is UnquoteNode or cls is SpliceUnquoteNode:
+            stack.append((node.expr, False))
+        elif isinstance(node, _DEFINITION_NODES):
+            return False
+        elif cls is CondNode:
+            for test, actions in node.clauses:
+                stack.append((test, quoted))
+                stack.extend((n, quoted) for n in actions)
+        elif not isinstance(node, _LEAF_NODES):
+            stack.extend((v, quoted) for _name, v in node_fields(node))
+    return True
+
+
+# Arguments larger than this many nodes (a routine body passed to a wrapper
+# macro) are expanded uncached: they rarely repeat, and keying them costs
+# more than the expansion.
+_ARG_KEY_BUDGET = 24
+
+_NOT_CACHED = object()
+
+# DEFMACs that expand() leaves for the code generator (see there).
+_PARSER_PREDICATES = frozenset({'VERB?', 'PRSO?', 'PRSI?', 'ROOM?', 'HERE?',
+                                'WINNER?', 'RARG?', 'CONTEXT?'})
+
+def _count_nodes(root, limit=None) -> int:
+    """AST nodes in the tree under ``root`` (a shared subtree counts once
+    per reference); stops early once the count passes ``limit``."""
+    count = 0
+    stack = [root]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, (list, tuple)):
+            stack.extend(obj)
+        elif isinstance(obj, ASTNode):
+            count += 1
+            if limit is not None and count > limit:
+                break
+            stack.extend(value for _name, value in node_fields(obj)
+                         if isinstance(value, (ASTNode, list, tuple)))
+    return count
+
+
+def _atom_names(root) -> set:
+    """Upper-cased names of the atoms and ,GLOBALs in the tree under ``root``."""
+    names = set()
+    stack = [root]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, (list, tuple)):
+            stack.extend(obj)
+        elif isinstance(obj, dict):
+            stack.extend(obj.values())
+        elif obj.__class__ is AtomNode:
+            names.add(obj.upper)
+        elif isinstance(obj, GlobalVarNode):
+            names.add(obj.name.upper())
+        elif isinstance(obj, ASTNode):
+            stack.extend(value for _name, value in node_fields(obj)
+                         if isinstance(value, (ASTNode, list, tuple, dict)))
+    return names
+
+
+_NAME_LEAVES = (LocalVarNode, CharLocalVarNode)
+_GLOBAL_LEAVES = (GlobalVarNode, CharGlobalVarNode)
+
+
+def _arg_key(node, calls, reads, budget):
+    """Hashable structural key of macro-call arguments, or None.
+
+    Equal for arguments that differ only in source position.  Like
+    _scan_effects it records the atoms and globals named, and gives up
+    (None) on a side-effecting operator, on anything but atoms, literals,
+    variables and forms of them, and once ``budget[0]`` nodes are spent."""
+    budget[0] -= 1
+    if budget[0] < 0:
+        return None
+    cls = node.__class__
+    if cls is AtomNode:
+        calls.add(node.upper)
+        return (cls, node.value)
+    if cls is StringNode or cls is NumberNode:
+        return (cls, node.value.__class__, node.value)
+    if isinstance(node, _NAME_LEAVES):
+        return (cls, node.name)
+    if isinstance(node, _GLOBAL_LEAVES):
+        name = node.name.upper()
+        calls.add(name)
+        reads.add(name)
+        return (cls, node.name)
+    if cls is FormNode:
+        if isinstance(node.operator, AtomNode):
+            op = node.operator.upper
+            if op in _EFFECT_OPS:
+                return None
+            if op == 'GVAL' and node.operands and isinstance(node.operands[0], AtomNode):
+                reads.add(node.operands[0].upper)
+        items = [node.operator]
+        items.extend(node.operands)
+    elif cls is list or cls is tuple or cls is MdlVector:
+        items = node
+    else:
+        return None
+    key = [cls]
+    for item in items:
+        item_key = _arg_key(item, calls, reads, budget)
+        if item_key is None:
+            return None
+        key.append(item_key)
+    return tuple(key)
+
+
 class MDLEvaluator:
     """
     Compile-time MDL evaluator for macro expansion.
@@ -276,9 +463,42 @@ class MDLEvaluator:
     that need to be evaluated at compile time during macro expansion.
     """
 
+    # Run DEFINE/DEFMAC and FUNCTION bodies as closures compiled once per
+    # body (see mdl_closures) instead of re-walking their AST on every call.
+    # A body is compiled on its second call: most run exactly once, and
+    # compiling costs about as much as one tree walk.
+    compile_bodies = True
+
     def __init__(self, macro_expander: 'MacroExpander'):
         self.macro_expander = macro_expander
         self.env: Dict[str, Any] = {}  # Current evaluation environment
+        self._primitives = self._build_primitives()
+        # id(owner) -> (owner, compiled statements or None once seen); the
+        # owner is kept so a recycled id can't return another body's closures.
+        self._compiled: Dict[int, Tuple[Any, Optional[list]]] = {}
+
+    def _compiled_body(self, owner, body) -> Optional[list]:
+        """Compiled statements of ``body`` (owned by ``owner``), or None on
+        its first call or when compile_bodies is off."""
+        if not self.compile_bodies:
+            return None
+        entry = self._compiled.get(id(owner))
+        if entry is None or entry[0] is not owner:
+            self._compiled[id(owner)] = (owner, None)
+            return None
+        if entry[1] is None:
+            entry = self._compiled[id(owner)] = (owner, compile_body(self, body))
+        return entry[1]
+
+    def run_body(self, body, env: Dict[str, Any]) -> Any:
+        """Evaluate a DEFINE/DEFMAC body in ``env``; the last value is the result."""
+        compiled = self._compiled_body(body, body)
+        if compiled is not None:
+            return run_compiled(compiled, env)
+        result = None
+        for stmt in (body if isinstance(body, list) else [body]):
+            result = self.evaluate(stmt, env)
+        return result
 
     def evaluate(self, node: ASTNode, env: Dict[str, Any] = None) -> Any:
         """Evaluate an MDL expression at compile time."""
@@ -287,7 +507,7 @@ class MDLEvaluator:
 
         # Handle atoms
         if isinstance(node, AtomNode):
-            name = node.value.upper()
+            name = node.upper
             # Check for special atoms
             if name == 'T':
                 return True
@@ -393,237 +613,121 @@ class MDLEvaluator:
         # Return other nodes as-is
         return node
 
+    def _build_primitives(self) -> Dict[str, Any]:
+        """Map each MDL primitive's name to its bound handler.
+
+        Every handler takes (operands, env).  A root-oblist name (RETURN!-,
+        moonmist's loop exits) dispatches like the bare name.  Built once per
+        evaluator so _evaluate_form is one dict lookup, not a string ladder.
+        """
+        table = {
+            'GASSIGNED?': self._eval_gassigned,
+            'RETURN': self._eval_return,
+            'AGAIN': self._eval_again,
+            'LENGTH?': self._eval_length_p,
+            'QUOTE': self._eval_quote,
+            'MAPF': self._eval_mapf,
+            'MAPR': self._eval_mapr,
+            'FUNCTION': self._make_function,
+            'COND': self._eval_cond,
+            'SET': self._eval_set,
+            # SETG20 is the MDL-ZIL compile-time SETG (the "20" package): it
+            # names a compile-time global used by the form/menu builders,
+            # never a runtime Z-machine global.
+            'SETG': self._eval_setg,
+            'SETG20': self._eval_setg,
+            'NTH': self._eval_nth,
+            'REST': self._eval_rest,
+            'PUTREST': self._eval_putrest,
+            'EMPTY?': self._eval_empty,
+            'LENGTH': self._eval_length,
+            'TYPE?': self._eval_type,
+            'SPNAME': self._eval_spname,
+            'ASCII': self._eval_ascii,
+            '=?': self._eval_equal,
+            'EQUAL?': self._eval_equal,
+            '==?': self._eval_eq,
+            'N==?': self._eval_neq,
+            'OR': self._eval_or,
+            'AND': self._eval_and,
+            'NOT': self._eval_not,
+            'MAPRET': self._eval_mapret,
+            'MAPSTOP': self._eval_mapstop,
+            'FORM': self._eval_form_constructor,
+            'LIST': self._eval_list,
+            # List literal (a b c) -- the parser represents it as a form whose
+            # operator is the atom "()".  It builds a real MDL list the way
+            # LIST does, so <SET L (<PE ...> !.L)> builds lists.
+            '()': self._eval_list,
+            'CONS': self._eval_cons,
+            'GVAL': self._eval_gval,
+            'LVAL': self._eval_lval,
+            'PARSE': self._eval_parse,
+            'STRING': self._eval_string,
+            'ERROR': self._eval_error,
+            'ASSIGNED?': self._eval_assigned,
+            'EVAL': self._eval_eval,
+            'UNPARSE': self._eval_unparse,
+            'IFFLAG': self._eval_ifflag,
+            'PRINC': self._eval_princ,
+            'PRIN1': self._eval_prin1,
+            'PRINT': self._eval_print,
+            'TERPRI': self._eval_terpri,
+            'CRLF': self._eval_crlf,
+            # BIND is a scoping construct: <BIND (bindings) body...>; PROG is
+            # similar but with different control flow semantics.  Both
+            # evaluate the body in order and return the last value.
+            'BIND': self._eval_bind,
+            'PROG': self._eval_bind,
+            'CHTYPE': self._eval_chtype,
+            # Arithmetic operators
+            '+': self._eval_add,
+            '-': self._eval_sub,
+            '*': self._eval_mul,
+            '/': self._eval_div,
+            'MOD': self._eval_mod,
+            # Symbol table introspection
+            'ASSOCIATIONS': self._eval_associations,
+            'GETPROP': self._eval_getprop,
+            'NEXT': self._eval_next,
+            'SORT': self._eval_sort,
+            'VECTOR': self._eval_vector,
+            'DEFSTRUCT': self._eval_defstruct,
+            # Reader macro support
+            'MAKE-PREFIX-MACRO': self._eval_make_prefix_macro,
+            'VOC': self._eval_voc,
+        }
+        table.update({name + '!-': handler
+                      for name, handler in list(table.items())})
+        return table
+
     def _evaluate_form(self, form: FormNode, env: Dict[str, Any]) -> Any:
         """Evaluate a form (function call)."""
-        _op = getattr(form, 'operator', None)
-        if isinstance(_op, AtomNode) and _op.value.upper() == 'GASSIGNED?':
-            # ZILCH/PREDGEN are parts of the ZILCH compiler environment and
-            # always GASSIGNED when compiling a real game.
-            if not form.operands:
-                return False
-            _t = form.operands[0]
-            if isinstance(_t, AtomNode):
-                _nm = _t.value.upper()
-            elif isinstance(_t, (GlobalVarNode, LocalVarNode)):
-                _nm = _t.name.upper()
-            else:
-                return False
-            if _nm in _ZILCH_ENV_ASSIGNED:
-                return True
-            return _nm in env and env[_nm] is not None
+        operator = form.operator
+        operands = form.operands
         # Handle numeric operators as NTH: <1 .ARGS> means <NTH .ARGS 1>
-        if isinstance(form.operator, NumberNode):
-            index = form.operator.value
-            if form.operands:
-                list_val = self._as_mdl_list(self.evaluate(form.operands[0], env))
+        if isinstance(operator, NumberNode):
+            index = operator.value
+            if operands:
+                list_val = self._as_mdl_list(self.evaluate(operands[0], env))
                 if list_val is not None and 1 <= index <= len(list_val):
                     return list_val[index - 1]  # 1-indexed
             return None
 
-        if not isinstance(form.operator, AtomNode):
+        if not isinstance(operator, AtomNode):
             return form
 
-        op_name = form.operator.value.upper()
-        operands = form.operands
+        op_name = operator.upper
+        handler = self._primitives.get(op_name)
+        if handler is not None:
+            result = handler(operands, env)
+            if result is not _NOT_EVALUATED:
+                return result
 
-        # Root-oblist qualification: FOO!- is the atom FOO on the root oblist
-        # (moonmist's <RETURN!- ...>).  Normalize for dispatch.
+        # Root-oblist qualification: FOO!- is the atom FOO on the root oblist.
         if op_name.endswith('!-'):
             op_name = op_name[:-2]
 
-        # Compile-time loop control -- honored only while a REPEAT evaluation
-        # is active; elsewhere a (runtime) RETURN/AGAIN form is left as-is,
-        # matching the old unknown-form behavior.
-        if op_name in ('RETURN', 'AGAIN') and getattr(self, '_repeat_depth', 0) > 0:
-            if op_name == 'AGAIN':
-                raise MdlAgain()
-            raise MdlReturn(self.evaluate(operands[0], env) if operands else True)
-
-        if op_name == 'LENGTH?':
-            return self._eval_length_p(operands, env)
-
-        # MDL primitives
-        if op_name == 'QUOTE':
-            # Quote returns the unevaluated expression
-            if operands:
-                return operands[0]
-            return None
-        elif op_name == 'MAPF':
-            return self._eval_mapf(operands, env)
-        elif op_name == 'MAPR':
-            return self._eval_mapr(operands, env)
-        elif op_name == 'FUNCTION':
-            return self._make_function(operands, env)
-        elif op_name == 'COND':
-            return self._eval_cond(operands, env)
-        elif op_name == 'SET':
-            return self._eval_set(operands, env)
-        elif op_name == 'SETG' or op_name == 'SETG20':
-            # SETG20 is the MDL-ZIL compile-time SETG (the "20" package): it names
-            # a compile-time global used by the form/menu builders, never a
-            # runtime Z-machine global.
-            return self._eval_setg(operands, env)
-        elif op_name == 'NTH':
-            return self._eval_nth(operands, env)
-        elif op_name == 'REST':
-            return self._eval_rest(operands, env)
-        elif op_name == 'PUTREST':
-            return self._eval_putrest(operands, env)
-        elif op_name == 'EMPTY?':
-            return self._eval_empty(operands, env)
-        elif op_name == 'LENGTH':
-            return self._eval_length(operands, env)
-        elif op_name == 'TYPE?':
-            return self._eval_type(operands, env)
-        elif op_name == 'SPNAME':
-            return self._eval_spname(operands, env)
-        elif op_name == 'ASCII':
-            return self._eval_ascii(operands, env)
-        elif op_name == '=?' or op_name == 'EQUAL?':
-            return self._eval_equal(operands, env)
-        elif op_name == '==?':
-            return self._eval_eq(operands, env)
-        elif op_name == 'N==?':
-            return not self._eval_eq(operands, env)
-        elif op_name == 'OR':
-            return self._eval_or(operands, env)
-        elif op_name == 'AND':
-            return self._eval_and(operands, env)
-        elif op_name == 'NOT':
-            return self._eval_not(operands, env)
-        elif op_name == 'MAPRET':
-            raise MapRet([self.evaluate(op, env) for op in operands])
-        elif op_name == 'MAPSTOP':
-            raise MapStop()
-        elif op_name == 'FORM':
-            return self._eval_form_constructor(operands, env)
-        elif op_name == 'LIST':
-            # Evaluate operands and flatten any SpliceResultNodes
-            result = []
-            for op in operands:
-                evaluated = self.evaluate(op, env)
-                if isinstance(evaluated, SpliceResultNode):
-                    result.extend(evaluated.items)
-                else:
-                    result.append(evaluated)
-            return result
-        elif op_name == 'CONS':
-            # <CONS x list> -> a new MDL list with x prepended to list.
-            # (scope.zil's MAP-SCOPE prepends the count PUT onto INIT-STAGES.)
-            head = self.evaluate(operands[0], env) if operands else None
-            rest = (self._as_mdl_list(self.evaluate(operands[1], env))
-                    if len(operands) > 1 else None)
-            if rest is None:
-                rest = []
-            items = ([]
-                     if head is None and not operands
-                     else (list(head.items)
-                           if isinstance(head, SpliceResultNode)
-                           else [head]))
-            return items + list(rest)
-        elif op_name == 'GVAL':
-            return self._eval_gval(operands, env)
-        elif op_name == 'LVAL':
-            return self._eval_lval(operands, env)
-        elif op_name == 'PARSE':
-            return self._eval_parse(operands, env)
-        elif op_name == 'STRING':
-            return self._eval_string(operands, env)
-        elif op_name == 'ERROR':
-            # Compile-time error - ignore for now
-            return None
-        elif op_name == 'ASSIGNED?':
-            return self._eval_assigned(operands, env)
-        elif op_name == 'EVAL':
-            return self._eval_eval(operands, env)
-        elif op_name == 'UNPARSE':
-            # <UNPARSE x>: the printed representation of x as a STRING.
-            # advent's maze macros build room names with
-            # <PARSE <STRING "ALIKE-MAZE-" <UNPARSE .DEST>>>.
-            if operands:
-                _uv = self.evaluate(operands[0], env)
-                if isinstance(_uv, NumberNode):
-                    _uv = _uv.value
-                if isinstance(_uv, (int, float)):
-                    return str(_uv)
-                if isinstance(_uv, AtomNode):
-                    return _uv.value
-                if isinstance(_uv, StringNode):
-                    return _uv.value
-                if isinstance(_uv, str):
-                    return _uv
-            return ''
-        elif op_name == 'IFFLAG':
-            return self._eval_ifflag(operands, env)
-        elif op_name == 'PRINC':
-            return self._eval_princ(operands, env)
-        elif op_name == 'PRIN1':
-            return self._eval_prin1(operands, env)
-        elif op_name == 'PRINT':
-            return self._eval_print(operands, env)
-        elif op_name == 'TERPRI':
-            return self._eval_terpri(operands, env)
-        elif op_name == 'CRLF':
-            # CRLF in compile context prints newline
-            print()
-            return True
-        elif op_name == 'BIND':
-            # BIND is a scoping construct: <BIND (bindings) body...>
-            # Evaluate the body expressions in order and return the last value
-            return self._eval_bind(operands, env)
-        elif op_name == 'PROG':
-            # PROG is similar to BIND but with different control flow semantics
-            return self._eval_bind(operands, env)
-        elif op_name == 'CHTYPE':
-            return self._eval_chtype(operands, env)
-
-        # Arithmetic operators
-        elif op_name == '+':
-            return self._eval_add(operands, env)
-        elif op_name == '-':
-            return self._eval_sub(operands, env)
-        elif op_name == '*':
-            return self._eval_mul(operands, env)
-        elif op_name == '/':
-            return self._eval_div(operands, env)
-        elif op_name == 'MOD':
-            return self._eval_mod(operands, env)
-
-        # Symbol table introspection
-        elif op_name == 'ASSOCIATIONS':
-            return self._eval_associations(operands, env)
-        elif op_name == 'GETPROP':
-            return self._eval_getprop(operands, env)
-        elif op_name == 'NEXT':
-            return self._eval_next(operands, env)
-        elif op_name == 'SORT':
-            return self._eval_sort(operands, env)
-        elif op_name == 'VECTOR':
-            # VECTOR creates a vector: list-like, but satisfies TYPE? VECTOR.
-            return MdlVector(self.evaluate(op, env) for op in operands)
-        elif op_name == 'DEFSTRUCT':
-            return self._eval_defstruct(operands, env)
-
-        # Reader macro support
-        elif op_name == 'MAKE-PREFIX-MACRO':
-            return self._eval_make_prefix_macro(operands, env)
-        elif op_name == 'VOC':
-            # VOC creates a vocabulary word reference - return a placeholder form
-            return self._eval_voc(operands, env)
-
-        # List literal (a b c) -- the parser represents it as a form whose
-        # operator is the atom "()".  Evaluate the elements into a real MDL
-        # list (inlining !-splices) so <SET L (<PE ...> !.L)> builds lists.
-        if op_name == '()':
-            result = []
-            for op in operands:
-                evaluated = self.evaluate(op, env)
-                if isinstance(evaluated, SpliceResultNode):
-                    result.extend(evaluated.items)
-                else:
-                    result.append(evaluated)
-            return result
-
         # DEFSTRUCT constructor / field accessor (advent's hint system).
         # <MAKE-HINT 'HINT-PENALTY 4 ...> builds an MdlStruct; <HINT-PENALTY .I>
         # reads a field.  Registered only after a <DEFSTRUCT ...>, so this is a
@@ -645,53 +749,153 @@ class MDLEvaluator:
                 # The classic parser predicates are handled as codegen
                 # builtins (see expand()'s skip list); leave their FORMS
                 # for codegen rather than applying MULTIFROB here.
-                and op_name not in ('VERB?', 'PRSO?', 'PRSI?', 'ROOM?',
-                                    'HERE?', 'WINNER?', 'RARG?', 'CONTEXT?')):
-            macro = _macros[op_name]
-            try:
-                self._apply_depth = getattr(self, '_apply_depth', 0) + 1
-                new_env = {}
-                arg_i = 0
-                for param in macro.params:
-                    if len(param) == 5:
-                        p_name, p_quoted, p_tuple, p_aux, p_opt = param
-                    else:
-                        p_name, p_quoted, p_tuple, p_aux = param
-                        p_opt = False
-                    _defaults = getattr(macro, 'param_defaults', None) or {}
-                    if p_tuple:
-                        vals = []
-                        while arg_i < len(operands):
-                            v = operands[arg_i] if p_quoted else self.evaluate(operands[arg_i], env)
-                            vals.append(v)
-                            arg_i += 1
-                        new_env[p_name.upper()] = vals
-                    elif p_aux or (p_opt and arg_i >= len(operands)):
-                        if p_name in _defaults:
-                            # Defaults are EVALUATED at bind time with earlier
-                            # bindings visible (MULTIFROB's (OO (OR)) (O .OO)).
-                            new_env[p_name.upper()] = self.evaluate(
-                                copy.deepcopy(_defaults[p_name]), new_env)
-                        else:
-                            new_env[p_name.upper()] = []
-                    else:
-                        if arg_i < len(operands):
-                            v = operands[arg_i] if p_quoted else self.evaluate(operands[arg_i], env)
-                            new_env[p_name.upper()] = v
-                            arg_i += 1
-                        else:
-                            new_env[p_name.upper()] = None
-                body = macro.body if isinstance(macro.body, list) else [macro.body]
-                result = None
-                for b in body:
-                    result = self.evaluate(copy.deepcopy(b), new_env)
-                return result
-            finally:
-                self._apply_depth -= 1
+                and op_name not in _PARSER_PREDICATES):
+            return self._apply_defined(_macros[op_name], operands, env)
 
         # Unknown form - return as-is (will be processed at runtime)
         return form
 
+    def _apply_defined(self, macro: MacroNode, operands: List[ASTNode],
+                       env: Dict[str, Any]) -> Any:
+        """Apply a user DEFINE/DEFMAC to ``operands`` (see _evaluate_form)."""
+        try:
+            self._apply_depth = getattr(self, '_apply_depth', 0) + 1
+            new_env = {}
+            arg_i = 0
+            for param in macro.params:
+                if len(param) == 5:
+                    p_name, p_quoted, p_tuple, p_aux, p_opt = param
+                else:
+                    p_name, p_quoted, p_tuple, p_aux = param
+                    p_opt = False
+                _defaults = getattr(macro, 'param_defaults', None) or {}
+                if p_tuple:
+                    vals = []
+                    while arg_i < len(operands):
+                        v = operands[arg_i] if p_quoted else self.evaluate(operands[arg_i], env)
+                        vals.append(v)
+                        arg_i += 1
+                    new_env[p_name.upper()] = vals
+                elif p_aux or (p_opt and arg_i >= len(operands)):
+                    if p_name in _defaults:
+                        # Defaults are EVALUATED at bind time with earlier
+                        # bindings visible (MULTIFROB's (OO (OR)) (O .OO)).
+                        new_env[p_name.upper()] = self.evaluate(
+                            _defaults[p_name], new_env)
+                    else:
+                        new_env[p_name.upper()] = []
+                else:
+                    if arg_i < len(operands):
+                        v = operands[arg_i] if p_quoted else self.evaluate(operands[arg_i], env)
+                        new_env[p_name.upper()] = v
+                        arg_i += 1
+                    else:
+                        new_env[p_name.upper()] = None
+            return self.run_body(macro.body, new_env)
+        finally:
+            self._apply_depth -= 1
+
+    def _eval_gassigned(self, operands: List[ASTNode], env: Dict[str, Any]) -> Any:
+        """<GASSIGNED? name>.  ZILCH/PREDGEN are parts of the ZILCH compiler
+        environment and always GASSIGNED when compiling a real game."""
+        if not operands:
+            return False
+        _t = operands[0]
+        if isinstance(_t, AtomNode):
+            _nm = _t.upper
+        elif isinstance(_t, (GlobalVarNode, LocalVarNode)):
+            _nm = _t.name.upper()
+        else:
+            return False
+        if _nm in _ZILCH_ENV_ASSIGNED:
+            return True
+        return _nm in env and env[_nm] is not None
+
+    # Compile-time loop control -- honored only while a REPEAT evaluation is
+    # active; elsewhere a (runtime) RETURN/AGAIN form is left as-is.
+
+    def _eval_return(self, operands: List[ASTNode], env: Dict[str, Any]) -> Any:
+        if getattr(self, '_repeat_depth', 0) > 0:
+            raise MdlReturn(self.evaluate(operands[0], env) if operands else True)
+        return _NOT_EVALUATED
+
+    def _eval_again(self, operands: List[ASTNode], env: Dict[str, Any]) -> Any:
+        if getattr(self, '_repeat_depth', 0) > 0:
+            raise MdlAgain()
+        return _NOT_EVALUATED
+
+    def _eval_quote(self, operands: List[ASTNode], env: Dict[str, Any]) -> Any:
+        """Quote returns the unevaluated expression."""
+        if operands:
+            return operands[0]
+        return None
+
+    def _eval_neq(self, operands: List[ASTNode], env: Dict[str, Any]) -> Any:
+        return not self._eval_eq(operands, env)
+
+    def _eval_mapret(self, operands: List[ASTNode], env: Dict[str, Any]) -> Any:
+        raise MapRet([self.evaluate(op, env) for op in operands])
+
+    def _eval_mapstop(self, operands: List[ASTNode], env: Dict[str, Any]) -> Any:
+        raise MapStop()
+
+    def _eval_list(self, operands: List[ASTNode], env: Dict[str, Any]) -> Any:
+        """Evaluate operands into a list, flattening any SpliceResultNodes."""
+        result = []
+        for op in operands:
+            evaluated = self.evaluate(op, env)
+            if isinstance(evaluated, SpliceResultNode):
+                result.extend(evaluated.items)
+            else:
+                result.append(evaluated)
+        return result
+
+    def _eval_cons(self, operands: List[ASTNode], env: Dict[str, Any]) -> Any:
+        """<CONS x list> -> a new MDL list with x prepended to list.
+        (scope.zil's MAP-SCOPE prepends the count PUT onto INIT-STAGES.)"""
+        head = self.evaluate(operands[0], env) if operands else None
+        rest = (self._as_mdl_list(self.evaluate(operands[1], env))
+                if len(operands) > 1 else None)
+        if rest is None:
+            rest = []
+        items = ([]
+                 if head is None and not operands
+                 else (list(head.items)
+                       if isinstance(head, SpliceResultNode)
+                       else [head]))
+        return items + list(rest)
+
+    def _eval_error(self, operands: List[ASTNode], env: Dict[str, Any]) -> Any:
+        # Compile-time error - ignore for now
+        return None
+
+    def _eval_unparse(self, operands: List[ASTNode], env: Dict[str, Any]) -> Any:
+        """<UNPARSE x>: the printed representation of x as a STRING.
+        advent's maze macros build room names with
+        <PARSE <STRING "ALIKE-MAZE-" <UNPARSE .DEST>>>."""
+        if operands:
+            _uv = self.evaluate(operands[0], env)
+            if isinstance(_uv, NumberNode):
+                _uv = _uv.value
+            if isinstance(_uv, (int, float)):
+                return str(_uv)
+            if isinstance(_uv, AtomNode):
+                return _uv.value
+            if isinstance(_uv, StringNode):
+                return _uv.value
+            if isinstance(_uv, str):
+                return _uv
+        return ''
+
+    def _eval_crlf(self, operands: List[ASTNode], env: Dict[str, Any]) -> Any:
+        # CRLF in compile context prints newline
+        print()
+        return True
+
+    def _eval_vector(self, operands: List[ASTNode], env: Dict[str, Any]) -> Any:
+        # VECTOR creates a vector: list-like, but satisfies TYPE? VECTOR.
+        return MdlVector(self.evaluate(op, env) for op in operands)
+
     def _eval_length_p(self, operands: List[ASTNode], env: Dict[str, Any]) -> Any:
         """<LENGTH? obj max>: the length if length <= max, else false."""
         if len(operands) < 2:
@@ -837,11 +1041,11 @@ class MDLEvaluator:
         if isinstance(node, GlobalVarNode):
             return node.name.upper()
         if isinstance(node, AtomNode):
-            return node.value.upper()
+            return node.upper
         if (isinstance(node, FormNode) and isinstance(node.operator, AtomNode)
-                and node.operator.value.upper() == 'GVAL' and node.operands
+                and node.operator.upper == 'GVAL' and node.operands
                 and isinstance(node.operands[0], AtomNode)):
-            return node.operands[0].value.upper()
+            return node.operands[0].upper
         return None
 
     @staticmethod
@@ -931,7 +1135,7 @@ class MDLEvaluator:
 
         for p in param_items:
             if isinstance(p, AtomNode):
-                name = p.value.upper()
+                name = p.upper
                 # Strip type annotation (W:ATOM -> W)
                 if ':' in name:
                     name = name.split(':')[0]
@@ -948,7 +1152,7 @@ class MDLEvaluator:
                 # AUX variable with initializer: (VAR init-expr)
                 # The operator is the var name, operands[0] is the initializer
                 if isinstance(p.operator, AtomNode):
-                    var_name = p.operator.value.upper()
+                    var_name = p.operator.upper
                     initializer = p.operands[0] if p.operands else None
                     aux_vars.append((var_name, initializer))
             elif isinstance(p, list) and len(p) >= 1:
@@ -957,7 +1161,7 @@ class MDLEvaluator:
                     in_aux = True
                 elif in_aux and isinstance(p[0], AtomNode):
                     # [VAR init-expr] - AUX variable with initializer
-                    var_name = p[0].value.upper()
+                    var_name = p[0].upper
                     initializer = p[1] if len(p) > 1 else None
                     aux_vars.append((var_name, initializer))
 
@@ -987,7 +1191,11 @@ class MDLEvaluator:
                 elif var_name not in call_env:
                     call_env[var_name] = None
 
-            # Execute body
+            # Execute body.  Compiled code is keyed on the FUNCTION form's
+            # operand list, which outlives the callables MAPF builds from it.
+            compiled = evaluator._compiled_body(operands, body)
+            if compiled is not None:
+                return run_compiled(compiled, call_env)
             result = None
             for stmt in body:
                 result = evaluator.evaluate(stmt, call_env)
@@ -1025,7 +1233,7 @@ class MDLEvaluator:
 
             # Check for ELSE/T/OTHERWISE as always-true
             if isinstance(condition, AtomNode):
-                cond_name = condition.value.upper()
+                cond_name = condition.upper
                 if cond_name in ('T', 'ELSE', 'OTHERWISE'):
                     test = True
 
@@ -1046,7 +1254,7 @@ class MDLEvaluator:
 
         var_name = operands[0]
         if isinstance(var_name, AtomNode):
-            name = var_name.value.upper()
+            name = var_name.upper
         elif isinstance(var_name, LocalVarNode):
             name = var_name.name.upper()
         else:
@@ -1063,7 +1271,7 @@ class MDLEvaluator:
 
         var_name = operands[0]
         if isinstance(var_name, AtomNode):
-            name = var_name.value.upper()
+            name = var_name.upper
         else:
             return None
 
@@ -1197,7 +1405,7 @@ class MDLEvaluator:
         for type_op in operands[1:]:
             type_name = None
             if isinstance(type_op, AtomNode):
-                type_name = type_op.value.upper()
+                type_name = type_op.upper
 
             if type_name:
                 # A ZIL character literal (!\X, !X, \X) is TYPE CHARACTER in
@@ -1246,7 +1454,7 @@ class MDLEvaluator:
         val = self.evaluate(operands[0], env)
 
         if isinstance(val, AtomNode):
-            return val.value.upper()
+            return val.upper
         if isinstance(val, str):
             return val.upper()
 
@@ -1303,7 +1511,7 @@ class MDLEvaluator:
 
         # Atom comparison - compare by value
         if isinstance(val1, AtomNode) and isinstance(val2, AtomNode):
-            return val1.value.upper() == val2.value.upper()
+            return val1.upper == val2.upper
 
         return val1 == val2
 
@@ -1429,7 +1637,7 @@ class MDLEvaluator:
 
         name_node = operands[0]
         if isinstance(name_node, AtomNode):
-            name = name_node.value.upper()
+            name = name_node.upper
             if name in env:
                 return env[name]
             # Fall back to compile-time globals (the scope engine's SCOPE-STAGES
@@ -1449,7 +1657,7 @@ class MDLEvaluator:
 
         name_node = operands[0]
         if isinstance(name_node, AtomNode):
-            name = name_node.value.upper()
+            name = name_node.upper
             if name in env:
                 return env[name]
 
@@ -1495,7 +1703,7 @@ class MDLEvaluator:
 
         var_name = operands[0]
         if isinstance(var_name, AtomNode):
-            name = var_name.value.upper()
+            name = var_name.upper
         elif isinstance(var_name, LocalVarNode):
             name = var_name.name.upper()
         else:
@@ -1525,7 +1733,7 @@ class MDLEvaluator:
         type_node = operands[1]
 
         if isinstance(type_node, AtomNode):
-            type_name = type_node.value.upper()
+            type_name = type_node.upper
 
             if type_name == 'FORM':
                 # Convert list to form: (FN arg1 arg2) -> <FN arg1 arg2>
@@ -1695,15 +1903,15 @@ class MDLEvaluator:
             return None
         atom = self.evaluate(operands[0], env)
         indicator = operands[1]
-        ind_name = indicator.value.upper() if isinstance(indicator, AtomNode) else ''
+        ind_name = indicator.upper if isinstance(indicator, AtomNode) else ''
         if not isinstance(atom, AtomNode) or ind_name != 'ZVAL':
             return None
         name = atom.value.upper()
         program = getattr(self.macro_expander, 'program', None)
         if program is not None:
-            for routine in program.routines:
-                if routine.name.upper() == name:
-                    return routine
+            found = self.macro_expander.symbols.find_any_case('routine', name)
+            if found:
+                return found.node
             for routine in getattr(self.macro_expander, 'pending_routines', []):
                 if routine.name.upper() == name:
                     return routine
@@ -1740,7 +1948,7 @@ class MDLEvaluator:
         # Extract sortable values
         def get_sort_key(item):
             if isinstance(item, AtomNode):
-                return item.value.upper()
+                return item.upper
             elif isinstance(item, str):
                 return item.upper()
             elif isinstance(item, NumberNode):
@@ -1830,7 +2038,7 @@ class MDLEvaluator:
 
         # If the result is a FormNode, check if it's a definition form
         if isinstance(arg, FormNode) and isinstance(arg.operator, AtomNode):
-            op_name = arg.operator.value.upper()
+            op_name = arg.operator.upper
 
             if op_name == 'GLOBAL':
                 # Create a global variable
@@ -1838,7 +2046,7 @@ class MDLEvaluator:
                 if len(arg.operands) >= 1:
                     name_node = arg.operands[0]
                     if isinstance(name_node, AtomNode):
-                        name = name_node.value.upper()
+                        name = name_node.upper
                         value = arg.operands[1] if len(arg.operands) > 1 else None
                         # Evaluate the value if it's an expression
                         if value is not None:
@@ -1858,7 +2066,7 @@ class MDLEvaluator:
                 if len(arg.operands) >= 2:
                     name_node = arg.operands[0]
                     if isinstance(name_node, AtomNode):
-                        name = name_node.value.upper()
+                        name = name_node.upper
                         value = arg.operands[1]
                         # Evaluate the value
                         eval_value = self.evaluate(value, env)
@@ -1909,7 +2117,7 @@ class MDLEvaluator:
         # passed to it, i.e. runs MAKE-HINT.  advent's HINT macro relies on this
         # to turn each hint into an MdlStruct in HINT-DEFINITIONS.
         if isinstance(arg, FormNode) and isinstance(arg.operator, AtomNode):
-            _opn = arg.operator.value.upper()
+            _opn = arg.operator.upper
             me = self.macro_expander
             if (_opn in getattr(me, 'struct_ctors', ())
                     or _opn in getattr(me, 'struct_accessors', ())):
@@ -1940,13 +2148,13 @@ class MDLEvaluator:
                 # (FIELD TYPE) parses as a '()' form: operator = FIELD atom.
                 if isinstance(spec.operator, AtomNode) and spec.operator.value == '()':
                     if spec.operands and isinstance(spec.operands[0], AtomNode):
-                        fld = spec.operands[0].value.upper()
+                        fld = spec.operands[0].upper
                 elif isinstance(spec.operator, AtomNode):
-                    fld = spec.operator.value.upper()
+                    fld = spec.operator.upper
             elif isinstance(spec, list) and spec and isinstance(spec[0], AtomNode):
-                fld = spec[0].value.upper()
+                fld = spec[0].upper
             elif isinstance(spec, AtomNode):
-                fld = spec.value.upper()
+                fld = spec.upper
             if fld:
                 field_names.append(fld)
         me = self.macro_expander
@@ -2019,13 +2227,13 @@ class MDLEvaluator:
     def _table_flag_from_value(self, v) -> Optional[str]:
         """A bare (LENGTH)/(PURE)/(BYTE)... flag-list table value -> the flag."""
         if isinstance(v, list) and len(v) == 1 and isinstance(v[0], AtomNode):
-            f = v[0].value.upper()
+            f = v[0].upper
             if f in self._TABLE_FLAG_ATOMS:
                 return f
         if (isinstance(v, FormNode) and isinstance(v.operator, AtomNode)
                 and v.operator.value == '()' and len(v.operands) == 1
                 and isinstance(v.operands[0], AtomNode)):
-            f = v.operands[0].value.upper()
+            f = v.operands[0].upper
             if f in self._TABLE_FLAG_ATOMS:
                 return f
         return None
@@ -2036,10 +2244,10 @@ class MDLEvaluator:
         if isinstance(v, ASTNode):
             # A bare <> (false) -- either the atom or the empty form the FUNCTION
             # bodies return for a missing location/condition -- is 0 in the table.
-            if isinstance(v, AtomNode) and v.value.upper() in ('<>', 'FALSE'):
+            if isinstance(v, AtomNode) and v.upper in ('<>', 'FALSE'):
                 return NumberNode(0, 0, 0)
             if (isinstance(v, FormNode) and isinstance(v.operator, AtomNode)
-                    and v.operator.value.upper() in ('<>', 'FALSE')
+                    and v.operator.upper in ('<>', 'FALSE')
                     and not v.operands):
                 return NumberNode(0, 0, 0)
             return v
@@ -2159,7 +2367,7 @@ class MDLEvaluator:
             # Evaluate the flag
             flag_value = False
             if isinstance(flag_node, AtomNode):
-                flag_name = flag_node.value.upper()
+                flag_name = flag_node.upper
                 if flag_name == 'T':
                     flag_value = True
                 elif flag_name == 'ELSE':
@@ -2266,18 +2474,18 @@ class MDLEvaluator:
                 if isinstance(binding, FormNode):
                     # (VAR init-expr) - operator is var name, operand is initializer
                     if isinstance(binding.operator, AtomNode) and binding.operator.value != '()':
-                        _bind_one(binding.operator.value.upper(),
+                        _bind_one(binding.operator.upper,
                                   binding.operands[0] if binding.operands else None,
                                   bool(binding.operands))
                 elif isinstance(binding, list) and len(binding) >= 1:
                     # [VAR init-expr] list form
                     if isinstance(binding[0], AtomNode):
-                        _bind_one(binding[0].value.upper(),
+                        _bind_one(binding[0].upper,
                                   binding[1] if len(binding) > 1 else None,
                                   len(binding) > 1)
                 elif isinstance(binding, AtomNode) and binding.value != '()':
                     # Just a variable name with no initializer
-                    _bind_one(binding.value.upper(), None, False)
+                    _bind_one(binding.upper, None, False)
 
         # Execute body expressions in order, return last value
         try:
@@ -2367,7 +2575,7 @@ class MDLEvaluator:
         if isinstance(val, str):
             return len(val) > 0
         if isinstance(val, AtomNode):
-            return val.value.upper() not in ('FALSE', '<>')
+            return val.upper not in ('FALSE', '<>')
         if isinstance(val, FormNode):
             # A bare <> (or ()) literal is MDL FALSE. hollywood's PSEUDO
             # tuples use <> for "no adjective": <COND (<NTH .OBJ 1> ...)>
@@ -2419,10 +2627,45 @@ class MacroExpander:
         self.structs: Dict[str, List[str]] = {}
         self.struct_ctors: Dict[str, str] = {}
         self.struct_accessors: Dict[str, Tuple[str, str]] = {}
+        # Fully expanded calls of pure macros (see _macro_reads), keyed by
+        # macro name, expander state and the structure of the arguments: a
+        # DEFMAC like TELL is called with the same arguments over and over,
+        # and each repeat is a lookup.  define_macro invalidates them.
+        self.expansion_cache: Dict[tuple, Optional[ASTNode]] = {}
+        self.expansion_cache_hits = 0
+        self.expansion_cache_misses = 0
+        self._pure_macro_reads: Dict[str, Optional[frozenset]] = {}
+        self._macro_effects: Dict[str, tuple] = {}
+        # Opt-in per-macro statistics (see macro_profile.py).
+        self.profile: Optional[MacroProfile] = None
+        # Runaway-expansion guard: macro expansions may nest at most
+        # max_expansion_depth deep, and the expansion steps under one source
+        # call site may produce at most max_expansion_nodes AST nodes.  Past
+        # either, expansion stops with a MacroExpansionError naming the call
+        # site instead of recursing or growing without end.  None disables a
+        # limit; counting nodes costs a walk of each expansion, so it is off
+        # by default.
+        self.max_expansion_depth: Optional[int] = 100
+        self.max_expansion_nodes: Optional[int] = None
+        # Prefix for error locations (the compiler sets the source file name).
+        self.source_name = ''
+        # [macro name, call form] of the expansions in progress, outermost
+        # first, and the nodes produced under the outermost one so far.
+        self._expansion_stack: List[list] = []
+        self._site_nodes = 0
+        # Worker processes for expanding ROUTINE bodies (parallel_expand.py);
+        # 1 expands them in this process.
+        self.jobs = 1
+        # The program's definitions (symbol_index.py), kept current as
+        # expand_all adds and drops them; built by expand_all if not given.
+        self.symbols: Optional[SymbolIndex] = None
 
     def define_macro(self, macro: MacroNode):
         """Store a macro definition."""
         self.macros[macro.name.upper()] = macro
+        self.expansion_cache.clear()
+        self._pure_macro_reads.clear()
+        self._macro_effects.pop(macro.name.upper(), None)
 
     def is_macro(self, name: str) -> bool:
         """Check if a name is a defined macro."""
@@ -2471,7 +2714,7 @@ class MacroExpander:
                 bindings[param_name] = value_nodes
 
         # Expand the handler body with parameter substitution
-        expanded = self._substitute(copy.deepcopy(handler.body), bindings)
+        expanded = self._substitute(handler.body, bindings)
 
         # Evaluate MDL constructs
         expanded = self._evaluate_mdl(expanded, bindings)
@@ -2639,7 +2882,7 @@ class MacroExpander:
         The quote means "return this form unevaluated", not "return a QUOTE form".
         """
         if isinstance(node, FormNode):
-            if isinstance(node.operator, AtomNode) and node.operator.value.upper() == 'QUOTE':
+            if isinstance(node.operator, AtomNode) and node.operator.upper == 'QUOTE':
                 if node.operands:
                     return node.operands[0]
         return node
@@ -2677,8 +2920,7 @@ class MacroExpander:
         # the instruction stream desynced. The code generator has exact builtin
         # equivalents (gen_verb_test / gen_parser_eq_test), so leave these
         # unexpanded for it.
-        if macro_name in ('VERB?', 'PRSO?', 'PRSI?', 'ROOM?', 'HERE?',
-                          'WINNER?', 'RARG?', 'CONTEXT?'):
+        if macro_name in _PARSER_PREDICATES:
             return None
 
         macro = self.macros[macro_name]
@@ -2719,7 +2961,7 @@ class MacroExpander:
                 and all(isinstance(b, ConstantNode) for b in _def_body)):
             _cenv = {str(k).upper(): v for k, v in bindings.items()}
             for _b in _def_body:
-                self.mdl_evaluator.evaluate(copy.deepcopy(_b), _cenv)
+                self.mdl_evaluator.evaluate(_b, _cenv)
             return SpliceResultNode([], form.line, form.column)
 
         # A DEFMAC whose body is a top-level MDL loop (moonmist's DOBJ?/IOBJ?
@@ -2748,21 +2990,16 @@ class MacroExpander:
                     # MULTIFROB's "AUX" (OO (OR)) (O .OO) needs OO to be a
                     # real one-element list and O to alias it.
                     try:
-                        _env[_ku] = self.mdl_evaluator.evaluate(
-                            copy.deepcopy(_v), _env)
+                        _env[_ku] = self.mdl_evaluator.evaluate(_v, _env)
                     except Exception:
                         _env[_ku] = _v
                 else:
                     _env[_ku] = _v
             try:
-                _body_items = (macro.body if isinstance(macro.body, list)
-                               else [macro.body])
-                _res = None
-                for _b in _body_items:
-                    # Sequential evaluation with a SHARED env: earlier conds'
-                    # SETs (P?'s list-building) are visible to later forms,
-                    # and the LAST form's value is the expansion.
-                    _res = self.mdl_evaluator.evaluate(copy.deepcopy(_b), _env)
+                # Sequential evaluation with a SHARED env: earlier conds'
+                # SETs (P?'s list-building) are visible to later forms,
+                # and the LAST form's value is the expansion.
+                _res = self.mdl_evaluator.run_body(macro.body, _env)
             except Exception:
                 _res = None
             if _res is not None and not isinstance(_res, RepeatNode):
@@ -2780,10 +3017,10 @@ class MacroExpander:
                 return SpliceResultNode([], form.line, form.column)
             # else: fall through to the legacy path
 
-        # Expand the macro body with parameter substitution
-        # IMPORTANT: Use a deep copy to avoid mutating the original macro body
-        # (the macro may be expanded multiple times with different in_zilch values)
-        expanded = self._substitute(copy.deepcopy(macro.body), bindings)
+        # Expand the macro body with parameter substitution.  The body is a
+        # template: _substitute and _evaluate_mdl never mutate it, they build
+        # new nodes along the substituted spine and share everything else.
+        expanded = self._substitute(macro.body, bindings)
 
         # Evaluate MDL constructs (MAPF/FUNCTION, etc.) at compile time
         expanded = self._evaluate_mdl(expanded, bindings)
@@ -2794,7 +3031,7 @@ class MacroExpander:
         if isinstance(expanded, list) and len(expanded) >= 1:
             first = expanded[0]
             if isinstance(first, AtomNode):
-                fn_name = first.value.upper()
+                fn_name = first.upper
                 if fn_name == 'QUOTE' and len(expanded) >= 2:
                     # (QUOTE X) -> return X
                     return expanded[1]
@@ -2802,7 +3039,7 @@ class MacroExpander:
                     # (CHTYPE value type) - handle SPLICE
                     value_node = expanded[1]
                     type_node = expanded[2]
-                    if isinstance(type_node, AtomNode) and type_node.value.upper() == 'SPLICE':
+                    if isinstance(type_node, AtomNode) and type_node.upper == 'SPLICE':
                         # Return items for splicing
                         if isinstance(value_node, list):
                             items = [item for item in value_node if isinstance(item, ASTNode)]
@@ -2822,16 +3059,16 @@ class MacroExpander:
         # Unwrap QUOTE forms - when a macro returns '<FORM>, the result is <FORM>
         # The quote means "return this form unevaluated", not "return a QUOTE form"
         if isinstance(expanded, FormNode):
-            if isinstance(expanded.operator, AtomNode) and expanded.operator.value.upper() == 'QUOTE':
+            if isinstance(expanded.operator, AtomNode) and expanded.operator.upper == 'QUOTE':
                 if expanded.operands:
                     return expanded.operands[0]
 
             # Handle CHTYPE ... SPLICE - returns a list to be spliced inline
-            if isinstance(expanded.operator, AtomNode) and expanded.operator.value.upper() == 'CHTYPE':
+            if isinstance(expanded.operator, AtomNode) and expanded.operator.upper == 'CHTYPE':
                 if len(expanded.operands) >= 2:
                     value_node = expanded.operands[0]
                     type_node = expanded.operands[1]
-                    if isinstance(type_node, AtomNode) and type_node.value.upper() == 'SPLICE':
+                    if isinstance(type_node, AtomNode) and type_node.upper == 'SPLICE':
                         # Return the contents as a SpliceResultNode for inline expansion
                         # Value can be:
                         # - A quoted list '(<A> <B> <C>) -> QUOTE form
@@ -2841,7 +3078,7 @@ class MacroExpander:
                             items = [item for item in value_node if isinstance(item, ASTNode)]
                             return SpliceResultNode(items, expanded.line, expanded.column)
                         elif isinstance(value_node, FormNode):
-                            if isinstance(value_node.operator, AtomNode) and value_node.operator.value.upper() == 'QUOTE':
+                            if isinstance(value_node.operator, AtomNode) and value_node.operator.upper == 'QUOTE':
                                 # Extract the list contents from the quoted form
                                 if value_node.operands:
                                     quoted_content = value_node.operands[0]
@@ -2910,8 +3147,7 @@ class MacroExpander:
             elif is_aux:
                 # AUX variables get their declared default (empty list if none)
                 if param_name in _defaults:
-                    bindings[param_name] = self._unwrap_quote(
-                        copy.deepcopy(_defaults[param_name]))
+                    bindings[param_name] = self._unwrap_quote(_defaults[param_name])
                 else:
                     bindings[param_name] = FormNode(AtomNode("()"), [])
                 self._last_defaulted_params.add(param_name.upper())
@@ -2925,8 +3161,7 @@ class MacroExpander:
                     # unquoted per MDL binding semantics (lurkinghorror's
                     # <DEFMAC P? ('V "OPT" ('O '*) ...)> binds O to the atom *
                     # so <N==? .O '*> folds correctly).
-                    bindings[param_name] = self._unwrap_quote(
-                        copy.deepcopy(_defaults[param_name]))
+                    bindings[param_name] = self._unwrap_quote(_defaults[param_name])
                     self._last_defaulted_params.add(param_name.upper())
                 else:
                     # Missing optional argument - bind to None (unassigned)
@@ -2989,7 +3224,7 @@ class MacroExpander:
         if not isinstance(node, FormNode):
             return node
         if (isinstance(node.operator, AtomNode)
-                and node.operator.value.upper() == 'COND'):
+                and node.operator.upper == 'COND'):
             clauses = []
             for cl in node.operands:
                 items = None
@@ -3021,12 +3256,12 @@ class MacroExpander:
             return
         for b in items:
             if isinstance(b, AtomNode) and b.value != '()':
-                acc.append(b.value.upper().split(':')[0])
+                acc.append(b.upper.split(':')[0])
             elif (isinstance(b, FormNode) and isinstance(b.operator, AtomNode)
                   and b.operator.value != '()'):
-                acc.append(b.operator.value.upper().split(':')[0])
+                acc.append(b.operator.upper.split(':')[0])
             elif isinstance(b, list) and b and isinstance(b[0], AtomNode):
-                acc.append(b[0].value.upper().split(':')[0])
+                acc.append(b[0].upper.split(':')[0])
 
     def _collect_local_vars(self, node, acc):
         """Collect BIND/PROG/REPEAT-introduced local variable names anywhere in a
@@ -3049,7 +3284,7 @@ class MacroExpander:
             self._collect_local_vars(node.body, acc)
             return
         if isinstance(node, FormNode):
-            op = (node.operator.value.upper()
+            op = (node.operator.upper
                   if isinstance(node.operator, AtomNode) else '')
             if op in ('BIND', 'PROG', 'REPEAT') and node.operands:
                 self._collect_binding_vars(node.operands[0], acc)
@@ -3114,7 +3349,7 @@ class MacroExpander:
                         nm_node = p[0]
                         dflt = p[1] if len(p) > 1 else None
                     if isinstance(nm_node, AtomNode):
-                        nm = nm_node.value.upper().split(':')[0]
+                        nm = nm_node.upper.split(':')[0]
                         if mode == 'aux':
                             aux_vars.append(nm)
                         elif mode == 'opt':
@@ -3170,7 +3405,7 @@ class MacroExpander:
             is_nexit_string = (prop_name in location_props and len(values) == 1
                                and isinstance(values[0], StringNode))
             is_direction_exit = (bool(values) and isinstance(values[0], AtomNode)
-                                 and values[0].value.upper() in _dir_exit_kws)
+                                 and values[0].upper in _dir_exit_kws)
             if (prop_name in location_props and not is_nexit_string
                     and not is_direction_exit):
                 for loc_prop in location_props:
@@ -3213,11 +3448,18 @@ class MacroExpander:
                 if isinstance(result, ASTNode):
                     return self._evaluate_mdl(result, bindings)
                 return self._convert_to_ast(result)
+            # The node may be part of a macro template: build a new CondNode
+            # rather than updating its clauses in place.
             new_clauses = []
+            changed = False
             for _c, _a in node.clauses:
-                new_clauses.append((_c, [self._evaluate_mdl(s, bindings) for s in _a]))
-            node.clauses = new_clauses
-            return node
+                new_actions = [self._evaluate_mdl(s, bindings) for s in _a]
+                if any(n is not o for n, o in zip(new_actions, _a)):
+                    changed = True
+                new_clauses.append((_c, new_actions))
+            if not changed:
+                return node
+            return CondNode(new_clauses, node.line, node.column)
 
         # Handle list of expressions (macro body with multiple statements)
         if isinstance(node, list):
@@ -3225,8 +3467,10 @@ class MacroExpander:
 
         # Handle RoutineNode directly (created by parser when ROUTINE appears in DEFINE body)
         if isinstance(node, RoutineNode):
-            # Add to pending routines and return None (side effect only)
-            self.pending_routines.append(node)
+            # Add to pending routines and return None (side effect only).
+            # expand_all rewrites pending routines in place, so they must not
+            # be the macro body's own node.
+            self.pending_routines.append(copy.deepcopy(node))
             return None
 
         if not isinstance(node, FormNode):
@@ -3320,7 +3564,7 @@ class MacroExpander:
             for operand in node.operands:
                 if isinstance(operand, FormNode):
                     if isinstance(operand.operator, AtomNode):
-                        if operand.operator.value.upper() == 'FUNCTION':
+                        if operand.operator.upper == 'FUNCTION':
                             has_function = True
                             break
 
@@ -3342,10 +3586,10 @@ class MacroExpander:
                     coll_name = coll.name.upper()
                 elif (isinstance(coll, FormNode)
                       and isinstance(coll.operator, AtomNode)
-                      and coll.operator.value.upper() == 'GVAL'
+                      and coll.operator.upper == 'GVAL'
                       and coll.operands
                       and isinstance(coll.operands[0], AtomNode)):
-                    coll_name = coll.operands[0].value.upper()
+                    coll_name = coll.operands[0].upper
                 table_kinds = {
                     'TABLE': ('TABLE', []), 'PTABLE': ('TABLE', ['PURE']),
                     'LTABLE': ('LTABLE', []), 'PLTABLE': ('LTABLE', ['PURE']),
@@ -3372,10 +3616,10 @@ class MacroExpander:
             return None
 
         # Recursively process operands
-        new_operands = []
-        for operand in node.operands:
-            new_operands.append(self._evaluate_mdl(operand, bindings))
-
+        new_operands = [self._evaluate_mdl(operand, bindings)
+                        for operand in node.operands]
+        if all(n is o for n, o in zip(new_operands, node.operands)):
+            return node
         return FormNode(node.operator, new_operands, node.line, node.column)
 
     def _convert_to_ast(self, value: Any) -> ASTNode:
@@ -3453,8 +3697,9 @@ class MacroExpander:
                 value = bindings[var_name]
                 if value is None:
                     return node
-                # Return a copy of the bound value
-                return copy.deepcopy(value)
+                # Bound values are shared, not copied: nothing downstream
+                # mutates AST nodes.  A list gets its own spine.
+                return list(value) if isinstance(value, list) else value
             return node
 
         # Handle atoms (might be special keywords)
@@ -3468,7 +3713,7 @@ class MacroExpander:
             operator = node.operator
 
             # Special handling for FORM constructor
-            if isinstance(operator, AtomNode) and operator.value.upper() == "FORM":
+            if isinstance(operator, AtomNode) and operator.upper == "FORM":
                 # <FORM op arg1 arg2 ...>
                 # Constructs a new form with evaluated arguments
                 if len(node.operands) == 0:
@@ -3504,9 +3749,9 @@ class MacroExpander:
                                 value = bindings[var_name]
                                 if isinstance(value, list):
                                     # Splice in all elements
-                                    new_operands.extend([copy.deepcopy(v) for v in value])
+                                    new_operands.extend(value)
                                 else:
-                                    new_operands.append(copy.deepcopy(value))
+                                    new_operands.append(value)
                             continue
 
                     # Handle SpliceUnquoteNode - evaluate and splice results
@@ -3547,8 +3792,10 @@ class MacroExpander:
 
                 return FormNode(new_operator, new_operands, node.line, node.column)
 
-            # Regular form - substitute recursively
+            # Regular form - substitute recursively, rebuilding the form only
+            # when something beneath it changed
             new_operator = self._substitute(operator, bindings)
+            changed = new_operator is not operator
             new_operands = []
 
             for operand in node.operands:
@@ -3564,9 +3811,10 @@ class MacroExpander:
                     if var_name in bindings:
                         value = bindings[var_name]
                         if isinstance(value, list):
-                            new_operands.extend([copy.deepcopy(v) for v in value])
+                            new_operands.extend(value)
                         else:
-                            new_operands.append(copy.deepcopy(value))
+                            new_operands.append(value)
+                    changed = True
                     continue
 
                 # Splice-unquote operand (!,X outside a quasiquote): when X
@@ -3585,11 +3833,16 @@ class MacroExpander:
                             new_operands.append(
                                 item if isinstance(item, ASTNode)
                                 else self._convert_result_to_ast(item))
+                        changed = True
                         continue
 
                 substituted = self._substitute(operand, bindings)
+                if substituted is not operand:
+                    changed = True
                 new_operands.append(substituted)
 
+            if not changed:
+                return node
             return FormNode(new_operator, new_operands, node.line, node.column)
 
         # For other node types, return as-is
@@ -3607,7 +3860,7 @@ class MacroExpander:
         """
         if isinstance(node, LocalVarNode):
             return node.name.upper() in bindings
-        for v in vars(node).values():
+        for _name, v in node_fields(node):
             if isinstance(v, ASTNode):
                 if not self._all_locals_bound(v, bindings):
                     return False
@@ -3645,7 +3898,7 @@ class MacroExpander:
             expr = node.expr
             if (isinstance(expr, FormNode)
                     and isinstance(expr.operator, AtomNode)
-                    and expr.operator.value.upper()
+                    and expr.operator.upper
                     in ('PARSE', 'STRING', 'SPNAME', 'PNAME', 'UNPARSE')
                     and self._all_locals_bound(expr, bindings)):
                 result = self.mdl_evaluator.evaluate(expr, bindings)
@@ -3675,54 +3928,55 @@ class MacroExpander:
             inner = self._expand_quasiquote(node.expr, bindings)
             return QuasiquoteNode(inner, node.line, node.column)
 
-        # Handle forms: recursively process operands, handling splicing
+        # Handle forms: recursively process operands, handling splicing.
+        # Literal parts of the template are shared with it; a form or list is
+        # rebuilt only when an unquote beneath it produced something new.
         if isinstance(node, FormNode):
             new_operator = self._expand_quasiquote(node.operator, bindings)
-            new_operands = []
-
-            for operand in node.operands:
-                expanded = self._expand_quasiquote(operand, bindings)
-
-                # Check if this is a splice-unquote result that needs splicing
-                if isinstance(expanded, SpliceUnquoteNode):
-                    # The inner expr has been evaluated, splice it
-                    inner = expanded.expr
-                    if isinstance(inner, list):
-                        new_operands.extend([copy.deepcopy(v) for v in inner])
-                    elif isinstance(inner, FormNode) and inner.operands:
-                        # If result is a form, splice its operands
-                        new_operands.extend([copy.deepcopy(v) for v in inner.operands])
-                    else:
-                        # Single value - just append
-                        new_operands.append(copy.deepcopy(inner))
-                else:
-                    new_operands.append(expanded)
-
+            new_operands, changed = self._expand_quasiquote_items(
+                node.operands, bindings, splice_forms=True)
+            if not changed and new_operator is node.operator:
+                return node
             return FormNode(new_operator, new_operands, node.line, node.column)
 
         # Handle lists (e.g., from parsing parenthesized expressions)
         if isinstance(node, list):
-            new_items = []
-            for item in node:
-                expanded = self._expand_quasiquote(item, bindings)
-                if isinstance(expanded, SpliceUnquoteNode):
-                    inner = expanded.expr
-                    if isinstance(inner, list):
-                        new_items.extend([copy.deepcopy(v) for v in inner])
-                    else:
-                        new_items.append(copy.deepcopy(inner))
-                else:
-                    new_items.append(expanded)
-            return new_items
+            new_items, changed = self._expand_quasiquote_items(node, bindings)
+            # MdlVector and other list subclasses come back as plain lists
+            return node if not changed and type(node) is list else new_items
 
-        # Handle local variable references inside quasiquote
-        # In quasiquote, .VAR is kept as-is (literal) unless unquoted
-        if isinstance(node, LocalVarNode):
-            return copy.deepcopy(node)
+        # All other node types are literals: atoms, numbers, strings, global
+        # vars and .VAR (kept as-is inside a quasiquote unless unquoted)
+        return node
+
+    def _expand_quasiquote_items(self, items, bindings, splice_forms=False):
+        """Quasiquote-expand a sequence, splicing ~!EXPR results (a form
+        result splices its operands when `splice_forms`, i.e. inside a form).
 
-        # All other node types: keep as literals
-        # (atoms, numbers, strings, global vars, etc.)
-        return copy.deepcopy(node)
+        Returns (new_items, changed); changed is False when every item came
+        back as the identical object.
+        """
+        new_items = []
+        changed = False
+        for item in items:
+            expanded = self._expand_quasiquote(item, bindings)
+            if isinstance(expanded, SpliceUnquoteNode):
+                # The inner expr has been evaluated, splice it
+                inner = expanded.expr
+                if isinstance(inner, list):
+                    new_items.extend(inner)
+                elif splice_forms and isinstance(inner, FormNode) and inner.operands:
+                    # If result is a form, splice its operands
+                    new_items.extend(inner.operands)
+                else:
+                    # Single value - just append
+                    new_items.append(inner)
+                changed = True
+            else:
+                if expanded is not item:
+                    changed = True
+                new_items.append(expanded)
+        return new_items, changed
 
     def expand_all(self, program: Program) -> Program:
         """
@@ -3733,41 +3987,44 @@ class MacroExpander:
         """
         # Store program reference for ASSOCIATIONS introspection
         self.program = program
+        if self.symbols is None:
+            self.symbols = SymbolIndex.from_program(program, self.source_name)
+        symbols = self.symbols
 
         # Register all macros
         for macro in program.macros:
             self.define_macro(macro)
 
         # MDL macro ALIASING via <SETG NEW ,OLDMACRO> (monkeypatch fix E)
-        _macro_names = {m.name for m in program.macros}
         _kept_globals = []
         for _g in program.globals:
             _iv = getattr(_g, 'initial_value', None)
-            if (isinstance(_iv, GlobalVarNode) and _iv.name in _macro_names
-                    and _g.name not in _macro_names
+            _src = (symbols.find('macro', _iv.name)
+                    if isinstance(_iv, GlobalVarNode) else None)
+            if (_src and not symbols.find('macro', _g.name)
                     and '!-' not in _g.name and '!-' not in _iv.name):
                 # (names with !- are MDL-namespaced, e.g. the ZILF
                 # REWRITE-ROUTINE!-HOOKS!-ZILF hook global -- leave those)
-                _src = next(_m for _m in program.macros if _m.name == _iv.name)
-                _alias = copy.copy(_src)
+                _alias = copy.copy(_src.node)
                 _alias.name = _g.name
                 program.macros.append(_alias)
+                symbols.define(_alias)
+                symbols.remove(_g)
                 self.define_macro(_alias)
-                _macro_names.add(_g.name)
                 continue
             _kept_globals.append(_g)
         program.globals = _kept_globals
 
         # Check for PRE-COMPILE hook
         pre_compile_hook = None
-        for global_node in program.globals:
-            if global_node.name.upper() == 'PRE-COMPILE!-HOOKS!-ZILF':
-                # Value should be a GlobalVarNode pointing to the hook function
-                if isinstance(global_node.initial_value, GlobalVarNode):
-                    hook_name = global_node.initial_value.name.upper()
-                    if hook_name in self.macros:
-                        pre_compile_hook = self.macros[hook_name]
-                break
+        hook_global = symbols.find_any_case('global', 'PRE-COMPILE!-HOOKS!-ZILF')
+        if hook_global:
+            global_node = hook_global.node
+            # Value should be a GlobalVarNode pointing to the hook function
+            if isinstance(global_node.initial_value, GlobalVarNode):
+                hook_name = global_node.initial_value.name.upper()
+                if hook_name in self.macros:
+                    pre_compile_hook = self.macros[hook_name]
 
         # Execute PRE-COMPILE hook if defined
         if pre_compile_hook:
@@ -3775,14 +4032,14 @@ class MacroExpander:
 
         # Check for ROUTINE-REWRITER hook
         routine_rewriter = None
-        for global_node in program.globals:
-            if global_node.name.upper() == 'REWRITE-ROUTINE!-HOOKS!-ZILF':
-                # Value should be a GlobalVarNode pointing to the rewriter function
-                if isinstance(global_node.initial_value, GlobalVarNode):
-                    rewriter_name = global_node.initial_value.name.upper()
-                    if rewriter_name in self.macros:
-                        routine_rewriter = self.macros[rewriter_name]
-                break
+        hook_global = symbols.find_any_case('global', 'REWRITE-ROUTINE!-HOOKS!-ZILF')
+        if hook_global:
+            global_node = hook_global.node
+            # Value should be a GlobalVarNode pointing to the rewriter function
+            if isinstance(global_node.initial_value, GlobalVarNode):
+                rewriter_name = global_node.initial_value.name.upper()
+                if rewriter_name in self.macros:
+                    routine_rewriter = self.macros[rewriter_name]
 
         # Apply ROUTINE-REWRITER hook to routines if defined
         if routine_rewriter:
@@ -3814,20 +4071,11 @@ class MacroExpander:
 
         # Expand macros in routines (IN-ZILCH = true, generating Z-machine code)
         self.in_zilch = True
-        for routine in program.routines:
-            # Expand and flatten SpliceResultNodes
-            new_body = []
-            for stmt in routine.body:
-                expanded = self._expand_recursive(stmt)
-                if isinstance(expanded, SpliceResultNode):
-                    # Inline the splice items
-                    new_body.extend(expanded.items)
-                else:
-                    new_body.append(expanded)
-            routine.body = new_body
-            # Expand macros in local variable initializers
-            for var_name, default_val in list(routine.local_defaults.items()):
-                routine.local_defaults[var_name] = self._expand_recursive(default_val)
+        if self.jobs > 1:
+            expand_routines_parallel(self, program.routines, self.jobs)
+        else:
+            for routine in program.routines:
+                self._expand_routine(routine)
 
         # Expand macros in objects (IN-ZILCH = true, generating Z-machine code)
         for obj in program.objects:
@@ -3848,6 +4096,7 @@ class MacroExpander:
                         self._expand_recursive(v) if isinstance(v, ASTNode) else v
                         for v in value
                     ]
+            symbols.update_contents(obj)
 
         # Expand macros in rooms (IN-ZILCH = true, generating Z-machine code)
         for room in program.rooms:
@@ -3859,6 +4108,7 @@ class MacroExpander:
                         self._expand_recursive(v) if isinstance(v, ASTNode) else v
                         for v in value
                     ]
+            symbols.update_contents(room)
 
         # Expand macros in globals (IN-ZILCH = true, generating Z-machine code)
         for global_node in program.globals:
@@ -3880,43 +4130,27 @@ class MacroExpander:
                 if isinstance(token_def.expansion, ASTNode):
                     token_def.expansion = self._expand_recursive(token_def.expansion)
 
-        # Merge globals created by EVAL during macro expansion
-        if self.pending_globals:
-            # Check for duplicates and add new globals
-            existing_names = {g.name for g in program.globals}
-            for global_node in self.pending_globals:
-                if global_node.name not in existing_names:
-                    program.globals.append(global_node)
-                    existing_names.add(global_node.name)
-
-        # Merge constants created by EVAL during macro expansion
-        if self.pending_constants:
-            existing_names = {c.name for c in program.constants}
-            for const_node in self.pending_constants:
-                if const_node.name not in existing_names:
-                    program.constants.append(const_node)
-                    existing_names.add(const_node.name)
-
-        # Merge routines created by EVAL during macro expansion (e.g., from PRE-COMPILE hooks)
-        if self.pending_routines:
-            existing_names = {r.name for r in program.routines}
-            for routine_node in self.pending_routines:
-                if routine_node.name not in existing_names:
-                    program.routines.append(routine_node)
-                    existing_names.add(routine_node.name)
+        # Merge globals, constants and routines created by EVAL during macro
+        # expansion (e.g., from PRE-COMPILE hooks), skipping names already
+        # defined
+        for pending, target, kind in (
+                (self.pending_globals, program.globals, 'global'),
+                (self.pending_constants, program.constants, 'constant'),
+                (self.pending_routines, program.routines, 'routine')):
+            for node in pending:
+                if not symbols.find(kind, node.name):
+                    target.append(node)
+                    symbols.define(node)
 
         # Merge rooms/objects created by EVAL during macro expansion
         # (advent's MAZE-ROOM / DIFFMAZE-ROOM / DEAD-END-ROOM machinery).
         # Their property values were built by the compile-time evaluator, so
         # run them through the same IN-ZILCH expansion pass source-level
         # rooms/objects got above.
-        for pending, target in ((self.pending_rooms, program.rooms),
-                                (self.pending_objects, program.objects)):
-            if not pending:
-                continue
-            existing_names = {r.name for r in target}
+        for pending, target, kind in ((self.pending_rooms, program.rooms, 'room'),
+                                      (self.pending_objects, program.objects, 'object')):
             for node in pending:
-                if node.name in existing_names:
+                if symbols.find(kind, node.name):
                     continue
                 for key, value in node.properties.items():
                     if isinstance(value, ASTNode):
@@ -3927,10 +4161,37 @@ class MacroExpander:
                             for v in value
                         ]
                 target.append(node)
-                existing_names.add(node.name)
+                symbols.define(node)
 
         return program
 
+    def _expand_routine(self, routine: RoutineNode):
+        """Expand macros in a routine's body and local defaults, in place."""
+        # Expand and flatten SpliceResultNodes
+        new_body = []
+        for stmt in routine.body:
+            expanded = self._expand_recursive(stmt)
+            if isinstance(expanded, SpliceResultNode):
+                # Inline the splice items
+                new_body.extend(expanded.items)
+            else:
+                new_body.append(expanded)
+        routine.body = new_body
+        # Expand macros in local variable initializers
+        for var_name, default_val in list(routine.local_defaults.items()):
+            routine.local_defaults[var_name] = self._expand_recursive(default_val)
+
+    def _routine_is_independent(self, routine: RoutineNode) -> bool:
+        """True if expanding ``routine`` cannot change the expander state
+        another routine's expansion sees: every macro its body and local
+        defaults name is pure (see _macro_reads), and there are no prefix
+        macros, whose handlers are arbitrary compile-time code."""
+        if self.prefix_macros:
+            return False
+        names = _atom_names([routine.body, routine.local_defaults])
+        return all(self._macro_reads(name) is not None
+                   for name in names if name in self.macros)
+
     def _apply_prefix_macro(self, handler: Any, atom: AtomNode) -> Optional[ASTNode]:
         """Apply a prefix macro handler to an atom.
 
@@ -3965,88 +4226,257 @@ class MacroExpander:
         'OBJECT', 'ROOM',  # Object/room definitions are handled by compiler
     })
 
+    def _macro_reads(self, name: str) -> Optional[frozenset]:
+        """The globals macro ``name`` may read, or None if it is not pure.
+
+        A macro is pure when neither its body nor its parameter defaults can
+        evaluate a side-effecting operator (_EFFECT_OPS) or a definition, and
+        every macro they name is pure too.  A pure macro's expansion depends
+        only on its arguments, the globals returned here, and the expander
+        state folded into the cache key."""
+        if name in self._pure_macro_reads:
+            return self._pure_macro_reads[name]
+        reads = set()
+        seen = {name}
+        stack = [name]
+        pure = True
+        while stack and pure:
+            effects = self._macro_effects.get(stack[-1])
+            if effects is None:
+                macro = self.macros[stack[-1]]
+                calls, body_reads = set(), set()
+                ok = (_scan_effects(macro.body, calls, body_reads)
+                      and _scan_effects(getattr(macro, 'param_defaults', None) or {},
+                                        calls, body_reads))
+                effects = self._macro_effects[stack[-1]] = (
+                    ok, frozenset(calls), frozenset(body_reads))
+            stack.pop()
+            ok, calls, body_reads = effects
+            pure = ok
+            reads |= body_reads
+            for callee in calls - seen:
+                if callee in self.macros:
+                    seen.add(callee)
+                    stack.append(callee)
+        result = self._pure_macro_reads[name] = frozenset(reads) if pure else None
+        return result
+
+    def _expansion_cache_key(self, macro_name: str, args: List[ASTNode]) -> Optional[tuple]:
+        """The expansion-cache key for a call, or None to expand uncached.
+
+        Calls are cached when the macro is pure, the arguments name only pure
+        macros and no side-effecting operators, and none of the globals either
+        may read is a compile-time global (those change between calls)."""
+        if self.prefix_macros:
+            return None     # prefix handlers are arbitrary compile-time code
+        reads = self._macro_reads(macro_name)
+        if reads is None:
+            return None
+        calls, arg_reads = set(), set()
+        budget = [_ARG_KEY_BUDGET]
+        args_key = _arg_key(args, calls, arg_reads, budget)
+        if args_key is None:
+            return None
+        for callee in calls:
+            if callee in self.macros:
+                callee_reads = self._macro_reads(callee)
+                if callee_reads is None:
+                    return None
+                arg_reads |= callee_reads
+        if self.ct_globals and not (reads.isdisjoint(self.ct_globals)
+                                    and arg_reads.isdisjoint(self.ct_globals)):
+            return None
+        return (macro_name, self.in_zilch, len(self.struct_accessors),
+                tuple(self.compilation_flags.items()), args_key)
+
+    def _expand_call(self, name: str, node: FormNode) -> ASTNode:
+        """Expand macro call ``node`` and then its expansion, under the
+        runaway guard, recording it in the profile if one is set."""
+        stack = self._expansion_stack
+        if self.max_expansion_depth is not None and len(stack) >= self.max_expansion_depth:
+            raise MacroExpansionError(self._expansion_limit_message(
+                node, f"macro expansions nested deeper than {self.max_expansion_depth} levels"))
+        if not stack:
+            self._site_nodes = 0
+        profile = self.profile
+        rec = None
+        if profile is not None:
+            rec = profile.record(name)
+            rec.calls += 1
+            rec.max_depth = max(rec.max_depth, len(stack) + 1)
+            t0 = time.perf_counter()
+        stack.append([name, node])
+        try:
+            expanded = self.expand(node)
+            if expanded is None:
+                result = None
+            else:
+                limit = self.max_expansion_nodes
+                if rec is not None or limit is not None:
+                    budget = None if limit is None else limit - self._site_nodes
+                    produced = _count_nodes(expanded, budget)
+                    self._site_nodes += produced
+                    if rec is not None:
+                        rec.nodes += produced
+                    if limit is not None and self._site_nodes > limit:
+                        raise MacroExpansionError(self._expansion_limit_message(
+                            node, f"macro expansion produced more than {limit} nodes"))
+                result = self._expand_recursive(expanded)
+        finally:
+            stack.pop()
+            # Recursive calls of a macro are timed once, by the outermost.
+            if rec is not None and not any(frame[0] == name for frame in stack):
+                rec.time += time.perf_counter() - t0
+        if expanded is None:
+            return self._expand_operands(node)
+        return result
+
+    def _expansion_limit_message(self, node: FormNode, what: str) -> str:
+        """'file:line:col: <what> expanding <site>: A -> B -> ...' for the
+        expansion in progress, located at its outermost (source) call site."""
+        frames = self._expansion_stack + [[node.operator.upper, node]]
+        site = frames[0][1]
+        chain = [f"{name} ({call.line}:{call.column})" for name, call in frames]
+        if len(chain) > 8:
+            chain = chain[:4] + ['...'] + chain[-3:]
+        where = f"{self.source_name}:{site.line}:{site.column}"
+        return f"{where}: {what} expanding {frames[0][0]}: {' -> '.join(chain)}"
+
     def _expand_recursive(self, node: ASTNode) -> ASTNode:
-        """Recursively expand macros in an AST node."""
+        """Recursively expand macros in an AST node.
+
+        Returns ``node`` itself when nothing beneath it changes, so code that
+        calls no macro is shared rather than copied.
+        """
         if isinstance(node, FormNode):
             # Check if this is a native operation that we should NOT expand
             if isinstance(node.operator, AtomNode):
-                op_name = node.operator.value.upper()
+                op_name = node.operator.upper
                 if op_name in self.NATIVE_OPERATIONS:
                     # Don't expand this macro - just recursively process operands
                     new_operands = [self._expand_recursive(op) for op in node.operands]
+                    if all(new is old for new, old in zip(new_operands, node.operands)):
+                        return node
                     return FormNode(node.operator, new_operands, node.line, node.column)
-
-            # First, try to expand this form if it's a macro
-            expanded = self.expand(node)
-            if expanded is not None:
-                # Macro was expanded, continue expanding recursively
-                return self._expand_recursive(expanded)
-
-            # Not a macro, recursively expand operands
-            # Handle SpliceResultNode in operands by inlining their items
-            # Also apply prefix macro transformations
-            new_operator = self._expand_recursive(node.operator)
-            new_operands = []
-            i = 0
-            operands = list(node.operands)
-            while i < len(operands):
-                op = operands[i]
-                # Check for prefix macro: @ followed by ATOM
-                if isinstance(op, AtomNode) and op.value in self.prefix_macros:
-                    prefix_char = op.value
-                    if i + 1 < len(operands) and isinstance(operands[i + 1], AtomNode):
-                        # Apply prefix macro transformation
-                        next_atom = operands[i + 1]
-                        handler = self.prefix_macros[prefix_char]
-                        transformed = self._apply_prefix_macro(handler, next_atom)
-                        if transformed is not None:
-                            # Skip both prefix and atom, add transformed result
-                            expanded = self._expand_recursive(transformed)
-                            if isinstance(expanded, SpliceResultNode):
-                                new_operands.extend(expanded.items)
-                            else:
-                                new_operands.append(expanded)
-                            i += 2
-                            continue
-                # Normal operand processing
-                expanded = self._expand_recursive(op)
-                if isinstance(expanded, SpliceResultNode):
-                    # Inline the splice items as operands
-                    new_operands.extend(expanded.items)
-                else:
-                    new_operands.append(expanded)
-                i += 1
-            return FormNode(new_operator, new_operands, node.line, node.column)
+                if op_name in self.macros and op_name not in _PARSER_PREDICATES:
+                    key = self._expansion_cache_key(op_name, node.operands)
+                    if key is not None:
+                        expanded = self.expansion_cache.get(key, _NOT_CACHED)
+                        if expanded is _NOT_CACHED:
+                            self.expansion_cache_misses += 1
+                            expanded = self.expansion_cache[key] = self._expand_form(node)
+                        else:
+                            self.expansion_cache_hits += 1
+                            if self.profile is not None:
+                                self.profile.record(op_name).cached += 1
+                        return expanded
+            return self._expand_form(node)
 
         elif isinstance(node, CondNode):
             # Expand COND clauses
             new_clauses = []
+            changed = False
             for condition, actions in node.clauses:
                 new_condition = self._expand_recursive(condition)
                 new_actions = [self._expand_recursive(action) for action in actions]
+                changed = changed or new_condition is not condition or any(
+                    new is not old for new, old in zip(new_actions, actions))
                 new_clauses.append((new_condition, new_actions))
+            if not changed:
+                return node
             return CondNode(new_clauses, node.line, node.column)
 
         elif isinstance(node, RepeatNode):
             # Expand REPEAT body
             new_body = [self._expand_recursive(stmt) for stmt in node.body]
             new_condition = self._expand_recursive(node.condition) if node.condition else None
+            if new_condition is (node.condition or None) and all(
+                    new is old for new, old in zip(new_body, node.body)):
+                return node
             return RepeatNode(node.bindings, new_condition, new_body, node.line, node.column)
 
         elif isinstance(node, QuasiquoteNode):
             # Expand quasiquote contents
             new_expr = self._expand_recursive(node.expr)
+            if new_expr is node.expr:
+                return node
             return QuasiquoteNode(new_expr, node.line, node.column)
 
         elif isinstance(node, UnquoteNode):
             # Expand unquote contents
             new_expr = self._expand_recursive(node.expr)
+            if new_expr is node.expr:
+                return node
             return UnquoteNode(new_expr, node.line, node.column)
 
         elif isinstance(node, SpliceUnquoteNode):
             # Expand splice-unquote contents
             new_expr = self._expand_recursive(node.expr)
+            if new_expr is node.expr:
+                return node
             return SpliceUnquoteNode(new_expr, node.line, node.column)
 
         # For other node types, return as-is
         return node
+
+    def _expand_form(self, node: FormNode) -> ASTNode:
+        """_expand_recursive for a form: expand it if it is a macro call,
+        otherwise expand its operator and operands."""
+        if (isinstance(node.operator, AtomNode) and node.operator.upper in self.macros
+                and node.operator.upper not in _PARSER_PREDICATES):
+            return self._expand_call(node.operator.upper, node)
+        # First, try to expand this form if it's a macro
+        expanded = self.expand(node)
+        if expanded is not None:
+            # Macro was expanded, continue expanding recursively
+            return self._expand_recursive(expanded)
+        return self._expand_operands(node)
+
+    def _expand_operands(self, node: FormNode) -> ASTNode:
+        """_expand_form for a form that is not a macro call."""
+        # Not a macro, recursively expand operands
+        # Handle SpliceResultNode in operands by inlining their items
+        # Also apply prefix macro transformations
+        new_operator = self._expand_recursive(node.operator)
+        # Copied from the original operands on the first change only.
+        new_operands = None
+        i = 0
+        operands = node.operands
+        while i < len(operands):
+            op = operands[i]
+            # Check for prefix macro: @ followed by ATOM
+            if isinstance(op, AtomNode) and op.value in self.prefix_macros:
+                prefix_char = op.value
+                if i + 1 < len(operands) and isinstance(operands[i + 1], AtomNode):
+                    # Apply prefix macro transformation
+                    next_atom = operands[i + 1]
+                    handler = self.prefix_macros[prefix_char]
+                    transformed = self._apply_prefix_macro(handler, next_atom)
+                    if transformed is not None:
+                        # Skip both prefix and atom, add transformed result
+                        if new_operands is None:
+                            new_operands = list(operands[:i])
+                        expanded = self._expand_recursive(transformed)
+                        if isinstance(expanded, SpliceResultNode):
+                            new_operands.extend(expanded.items)
+                        else:
+                            new_operands.append(expanded)
+                        i += 2
+                        continue
+            # Normal operand processing
+            expanded = self._expand_recursive(op)
+            if new_operands is None and (expanded is not op
+                                         or isinstance(expanded, SpliceResultNode)):
+                new_operands = list(operands[:i])
+            if new_operands is not None:
+                if isinstance(expanded, SpliceResultNode):
+                    # Inline the splice items as operands
+                    new_operands.extend(expanded.items)
+                else:
+                    new_operands.append(expanded)
+            i += 1
+        if new_operands is None:
+            if new_operator is node.operator:
+                return node
+            new_operands = list(operands)
+        return FormNode(new_operator, new_operands, node.line, node.column)
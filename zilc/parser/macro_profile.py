@@ -0,0 +1,83 @@
+"""
+Per-macro statistics for a MacroExpander run.
+
+Opt-in: set MacroExpander.profile to a MacroProfile before expand_all.
+Each expansion of a macro call site adds one call to the macro's record,
+with the time spent expanding it (nested expansions included), the AST
+nodes the expansion steps produced and the deepest nesting of macro
+expansions it was reached at.  Expansions answered from the expansion
+cache are counted separately, as they cost a lookup rather than a run.
+"""
+
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional
+
+
+@dataclass
+class MacroRecord:
+    """Measurements for one macro."""
+    name: str
+    calls: int = 0
+    cached: int = 0              # calls answered by the expansion cache
+    time: float = 0.0            # seconds, nested expansions included
+    nodes: int = 0               # AST nodes produced by its expansion steps
+    max_depth: int = 0           # deepest macro-expansion nesting seen
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+class MacroProfile:
+    """Accumulates MacroRecords by macro name.
+
+    Usage:
+        expander.profile = MacroProfile()
+        expander.expand_all(program)
+        print(expander.profile.format_report())
+    """
+
+    def __init__(self):
+        self.records: Dict[str, MacroRecord] = {}
+
+    def record(self, name: str) -> MacroRecord:
+        """The record for macro `name`, created on first use."""
+        rec = self.records.get(name)
+        if rec is None:
+            rec = self.records[name] = MacroRecord(name)
+        return rec
+
+    def __iter__(self):
+        return iter(self.records.values())
+
+    def __len__(self):
+        return len(self.records)
+
+    def get(self, name: str) -> Optional[MacroRecord]:
+        return self.records.get(name)
+
+    def merge(self, other: 'MacroProfile'):
+        """Add the records of `other` (a parallel worker's profile)."""
+        for theirs in other:
+            rec = self.record(theirs.name)
+            rec.calls += theirs.calls
+            rec.cached += theirs.cached
+            rec.time += theirs.time
+            rec.nodes += theirs.nodes
+            rec.max_depth = max(rec.max_depth, theirs.max_depth)
+
+    def ranked(self) -> List[MacroRecord]:
+        """Records by descending time."""
+        return sorted(self.records.values(), key=lambda r: (-r.time, r.name))
+
+    def to_dict(self) -> Dict:
+        """Structured form for tooling (JSON-serialisable)."""
+        return {'macros': [r.to_dict() for r in self.ranked()]}
+
+    def format_report(self, top: Optional[int] = None) -> str:
+        """Human-readable table, slowest macros first."""
+        lines = [f"{'macro':<24} {'calls':>7} {'cached':>7} {'time(s)':>9} "
+                 f"{'nodes':>9} {'depth':>6}"]
+        for r in self.ranked()[:top]:
+            lines.append(f"{r.name:<24} {r.calls:7d} {r.cached:7d} {r.time:9.3f} "
+                         f"{r.nodes:9d} {r.max_depth:6d}")
+        return "\n".join(lines)
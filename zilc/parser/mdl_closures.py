@@ -0,0 +1,558 @@
+"""
+Closure compilation of compile-time MDL bodies.
+
+MDLEvaluator walks the AST of a DEFINE/DEFMAC body on every call: each node
+pays an isinstance ladder in evaluate(), each form a primitive-table lookup
+and an operand-list walk.  compile_body() does that dispatch once, turning
+every node into a Python closure taking the environment dict.  Variable
+names are upper-cased at compile time, the common primitives (arithmetic,
+comparisons, COND, SET, list access) become specialized closures over their
+compiled operands, and every other form -- MAPF, FORM, user DEFINE calls,
+struct accessors, anything defined after the body was compiled -- is handed
+back to MDLEvaluator._evaluate_form unchanged, so the semantics are the
+evaluator's own.
+"""
+
+from typing import Any, Callable, Dict, List
+
+from .ast_nodes import (
+    AtomNode, CondNode, ConstantNode, FormNode, GlobalVarNode, LocalVarNode,
+    NumberNode, QuasiquoteNode, RepeatNode, SpliceResultNode,
+    SpliceUnquoteNode, StringNode, TableNode,
+)
+
+Env = Dict[str, Any]
+Compiled = Callable[[Env], Any]
+
+
+def compile_body(ev, body) -> List[Compiled]:
+    """Compile a DEFINE/DEFMAC body (one node or a list of them)."""
+    items = body if isinstance(body, list) else [body]
+    return [compile_node(ev, item) for item in items]
+
+
+def run_compiled(fns: List[Compiled], env: Env) -> Any:
+    """Run compiled body statements in order; the last value is the result."""
+    result = None
+    for fn in fns:
+        result = fn(env)
+    return result
+
+
+def _const(value) -> Compiled:
+    return lambda env: value
+
+
+def compile_node(ev, node) -> Compiled:
+    """A closure computing ``ev.evaluate(node, env)``."""
+    if isinstance(node, AtomNode):
+        name = node.upper
+        if name == 'T':
+            return _const(True)
+        if name == '<>' or name == 'FALSE':
+            return _const(False)
+        return _const(node)
+
+    if isinstance(node, LocalVarNode):
+        name = node.name.upper()
+        return lambda env: env.get(name)
+
+    if isinstance(node, GlobalVarNode):
+        return _compile_gval_ref(ev, node)
+
+    if isinstance(node, (NumberNode, StringNode)):
+        return _const(node.value)
+
+    if isinstance(node, QuasiquoteNode):
+        expr = node.expr
+        return lambda env: ev._expand_quasiquote(expr, env)
+
+    if isinstance(node, FormNode):
+        return _compile_form(ev, node)
+
+    if isinstance(node, CondNode):
+        return _compile_cond(ev, [
+            (condition, isinstance(condition, AtomNode)
+             and condition.upper in ('T', 'ELSE', 'OTHERWISE'), actions)
+            for condition, actions in node.clauses])
+
+    if isinstance(node, RepeatNode):
+        return _compile_repeat(ev, node)
+
+    if isinstance(node, SpliceUnquoteNode):
+        inner = compile_node(ev, node.expr)
+        line, column = node.line, node.column
+
+        def splice(env):
+            result = inner(env)
+            if isinstance(result, list):
+                return SpliceResultNode(result, line, column)
+            if result is None:
+                return SpliceResultNode([], line, column)
+            return SpliceResultNode([result], line, column)
+        return splice
+
+    if isinstance(node, list):
+        return _compile_list(ev, node)
+
+    if isinstance(node, TableNode):
+        return lambda env: ev._resolve_table_node(node, env)
+
+    if isinstance(node, ConstantNode):
+        return lambda env: ev._emit_constant_node(node, env)
+
+    return _const(node)
+
+
+def _compile_gval_ref(ev, node) -> Compiled:
+    name = node.name.upper()
+    me = ev.macro_expander
+
+    def gval(env):
+        if name in env:
+            return env[name]
+        ct = getattr(me, 'ct_globals', None)
+        if ct is not None and name in ct:
+            return ct[name]
+        fn = ev._struct_callable(name)
+        if fn is not None:
+            return fn
+        return node
+    return gval
+
+
+def _compile_repeat(ev, node: RepeatNode) -> Compiled:
+    """MDLEvaluator._eval_repeat_node over compiled bindings and body."""
+    from .macro_expander import MdlAgain, MdlReturn
+    if getattr(node, 'condition', None) is not None:
+        return _const(node)
+    bindings = []
+    for binding in node.bindings or ():
+        if isinstance(binding, tuple) and len(binding) == 2:
+            name, init = binding
+        else:
+            name, init = binding, None
+        if not isinstance(name, str):
+            # Expression binding: not compile-time.  The initializers before
+            # it still run, as they do in the evaluator.
+            bindings.append(None)
+            break
+        bindings.append((name.upper(),
+                         compile_node(ev, init) if init is not None else None))
+    has_bindings = bool(node.bindings)
+    body = [compile_node(ev, stmt) for stmt in node.body]
+
+    def repeat(env):
+        loop_env = env
+        if has_bindings:
+            loop_env = dict(env)
+            for binding in bindings:
+                if binding is None:
+                    return node
+                name, init = binding
+                loop_env[name] = init(loop_env) if init is not None else None
+        ev._repeat_depth = getattr(ev, '_repeat_depth', 0) + 1
+        try:
+            for _ in range(2000):
+                try:
+                    for stmt in body:
+                        stmt(loop_env)
+                except MdlAgain:
+                    continue
+                except MdlReturn as r:
+                    return r.value
+        finally:
+            ev._repeat_depth -= 1
+        return node
+    return repeat
+
+
+def _compile_list(ev, operands) -> Compiled:
+    """Evaluate ``operands`` into a new list, inlining splices."""
+    fns = [compile_node(ev, op) for op in operands]
+
+    def build(env):
+        result = []
+        for fn in fns:
+            value = fn(env)
+            if isinstance(value, SpliceResultNode):
+                result.extend(value.items)
+            else:
+                result.append(value)
+        return result
+    return build
+
+
+def _compile_form(ev, form: FormNode) -> Compiled:
+    operator, operands = form.operator, form.operands
+    if isinstance(operator, NumberNode):
+        # <1 .ARGS> is <NTH .ARGS 1>
+        index = operator.value
+        if not operands:
+            return _const(None)
+        target = compile_node(ev, operands[0])
+        as_list = ev._as_mdl_list
+
+        def nth(env):
+            lst = as_list(target(env))
+            if lst is not None and 1 <= index <= len(lst):
+                return lst[index - 1]
+            return None
+        return nth
+
+    if not isinstance(operator, AtomNode):
+        return _const(form)
+
+    op_name = operator.upper
+    base = op_name[:-2] if op_name.endswith('!-') else op_name
+    if op_name in ev._primitives:
+        builder = _SPECIALIZED.get(base)
+        if builder is not None:
+            return builder(ev, operands)
+        builder = _LOOP_EXITS.get(base)
+        if builder is not None:
+            # Outside a REPEAT these are runtime code and fall through.
+            return builder(ev, operands, form)
+    return lambda env: ev._evaluate_form(form, env)
+
+
+# -- specialized primitives --------------------------------------------------
+#
+# Each builder takes (ev, operands) and returns a closure that behaves exactly
+# like the MDLEvaluator handler of the same name; the loop exits also take the
+# form, which they evaluate the slow way when no REPEAT is running.
+
+def _return(ev, operands, form):
+    from .macro_expander import MdlReturn
+    value_fn = compile_node(ev, operands[0]) if operands else None
+
+    def return_(env):
+        if getattr(ev, '_repeat_depth', 0) > 0:
+            raise MdlReturn(value_fn(env) if value_fn is not None else True)
+        return ev._evaluate_form(form, env)
+    return return_
+
+
+def _again(ev, operands, form):
+    from .macro_expander import MdlAgain
+
+    def again(env):
+        if getattr(ev, '_repeat_depth', 0) > 0:
+            raise MdlAgain()
+        return ev._evaluate_form(form, env)
+    return again
+
+
+def _quote(ev, operands):
+    return _const(operands[0] if operands else None)
+
+
+def _cond(ev, operands):
+    return _compile_cond(ev, [(clause.operator, False, clause.operands)
+                              for clause in operands
+                              if isinstance(clause, FormNode)])
+
+
+def _compile_cond(ev, clauses) -> Compiled:
+    """COND over (test, always-true, actions) triples."""
+    compiled = [(compile_node(ev, test), always,
+                 [compile_node(ev, action) for action in actions])
+                for test, always, actions in clauses]
+    truthy = ev._is_truthy
+
+    def cond(env):
+        for test, always, actions in compiled:
+            value = test(env)
+            if always or truthy(value):
+                result = None
+                for action in actions:
+                    result = action(env)
+                return result
+        return None
+    return cond
+
+
+def _set(ev, operands):
+    if len(operands) < 2:
+        return _const(None)
+    target = operands[0]
+    if isinstance(target, AtomNode):
+        name = target.upper
+    elif isinstance(target, LocalVarNode):
+        name = target.name.upper()
+    else:
+        return _const(None)
+    value_fn = compile_node(ev, operands[1])
+
+    def set_(env):
+        value = env[name] = value_fn(env)
+        return value
+    return set_
+
+
+def _and(ev, operands):
+    fns = [compile_node(ev, op) for op in operands]
+    truthy = ev._is_truthy
+
+    def and_(env):
+        result = True
+        for fn in fns:
+            value = fn(env)
+            if not truthy(value):
+                return False
+            result = value
+        return result
+    return and_
+
+
+def _or(ev, operands):
+    fns = [compile_node(ev, op) for op in operands]
+    truthy = ev._is_truthy
+
+    def or_(env):
+        for fn in fns:
+            value = fn(env)
+            if truthy(value):
+                return value
+        return False
+    return or_
+
+
+def _not(ev, operands):
+    if not operands:
+        return _const(True)
+    fn = compile_node(ev, operands[0])
+    truthy = ev._is_truthy
+    return lambda env: not truthy(fn(env))
+
+
+def _mdl_eq(val1, val2) -> bool:
+    if isinstance(val1, (int, NumberNode)) and isinstance(val2, (int, NumberNode)):
+        n1 = val1 if isinstance(val1, int) else val1.value
+        n2 = val2 if isinstance(val2, int) else val2.value
+        return n1 == n2
+    if isinstance(val1, AtomNode) and isinstance(val2, AtomNode):
+        return val1.upper == val2.upper
+    return val1 == val2
+
+
+def _eq(ev, operands):
+    if len(operands) < 2:
+        return _const(False)
+    fn1, fn2 = compile_node(ev, operands[0]), compile_node(ev, operands[1])
+    return lambda env: _mdl_eq(fn1(env), fn2(env))
+
+
+def _neq(ev, operands):
+    if len(operands) < 2:
+        return _const(True)
+    fn1, fn2 = compile_node(ev, operands[0]), compile_node(ev, operands[1])
+    return lambda env: not _mdl_eq(fn1(env), fn2(env))
+
+
+def _add(ev, operands):
+    fns = [compile_node(ev, op) for op in operands]
+
+    def add(env):
+        result = 0
+        for fn in fns:
+            value = fn(env)
+            if isinstance(value, int):
+                result += value
+            elif isinstance(value, NumberNode):
+                result += value.value
+        return result
+    return add
+
+
+def _mul(ev, operands):
+    fns = [compile_node(ev, op) for op in operands]
+
+    def mul(env):
+        result = 1
+        for fn in fns:
+            value = fn(env)
+            if isinstance(value, int):
+                result *= value
+            elif isinstance(value, NumberNode):
+                result *= value.value
+        return result
+    return mul
+
+
+def _sub(ev, operands):
+    if not operands:
+        return _const(0)
+    first_fn = compile_node(ev, operands[0])
+    fns = [compile_node(ev, op) for op in operands[1:]]
+    unary = len(operands) == 1
+
+    def sub(env):
+        result = first_fn(env)
+        if isinstance(result, NumberNode):
+            result = result.value
+        if not isinstance(result, int):
+            result = 0
+        if unary:
+            return -result
+        for fn in fns:
+            value = fn(env)
+            if isinstance(value, int):
+                result -= value
+            elif isinstance(value, NumberNode):
+                result -= value.value
+        return result
+    return sub
+
+
+def _div(ev, operands):
+    if len(operands) < 2:
+        return _const(0)
+    first_fn = compile_node(ev, operands[0])
+    fns = [compile_node(ev, op) for op in operands[1:]]
+
+    def div(env):
+        result = first_fn(env)
+        if isinstance(result, NumberNode):
+            result = result.value
+        if not isinstance(result, int):
+            return 0
+        for fn in fns:
+            value = fn(env)
+            if isinstance(value, NumberNode):
+                value = value.value
+            if isinstance(value, int) and value != 0:
+                result //= value
+        return result
+    return div
+
+
+def _mod(ev, operands):
+    if len(operands) < 2:
+        return _const(0)
+    fn1, fn2 = compile_node(ev, operands[0]), compile_node(ev, operands[1])
+
+    def mod(env):
+        first, second = fn1(env), fn2(env)
+        if isinstance(first, NumberNode):
+            first = first.value
+        if isinstance(second, NumberNode):
+            second = second.value
+        if isinstance(first, int) and isinstance(second, int) and second != 0:
+            return first % second
+        return 0
+    return mod
+
+
+def _nth(ev, operands):
+    if len(operands) < 2:
+        return _const(None)
+    lst_fn, n_fn = compile_node(ev, operands[0]), compile_node(ev, operands[1])
+    as_list = ev._as_mdl_list
+
+    def nth(env):
+        lst = as_list(lst_fn(env))
+        n = n_fn(env)
+        if lst is not None and isinstance(n, int) and 0 <= n - 1 < len(lst):
+            return lst[n - 1]
+        return None
+    return nth
+
+
+def _rest(ev, operands):
+    if not operands:
+        return lambda env: []
+    lst_fn = compile_node(ev, operands[0])
+    n_fn = compile_node(ev, operands[1]) if len(operands) > 1 else None
+    as_list = ev._as_mdl_list
+
+    def rest(env):
+        lst = as_list(lst_fn(env))
+        n = 1
+        if n_fn is not None:
+            n = n_fn(env)
+            if not isinstance(n, int):
+                n = 1
+        if lst is not None:
+            return lst[n:]
+        return []
+    return rest
+
+
+def _empty(ev, operands):
+    if not operands:
+        return _const(True)
+    fn = compile_node(ev, operands[0])
+
+    def empty(env):
+        value = fn(env)
+        if isinstance(value, list):
+            return len(value) == 0
+        return value is None
+    return empty
+
+
+def _length(ev, operands):
+    if not operands:
+        return _const(0)
+    fn = compile_node(ev, operands[0])
+
+    def length(env):
+        value = fn(env)
+        if isinstance(value, (list, str)):
+            return len(value)
+        return 0
+    return length
+
+
+def _lval(ev, operands):
+    if not operands or not isinstance(operands[0], AtomNode):
+        return _const(None)
+    name = operands[0].upper
+    return lambda env: env.get(name)
+
+
+def _gval(ev, operands):
+    if not operands or not isinstance(operands[0], AtomNode):
+        return _const(None)
+    name = operands[0].upper
+    me = ev.macro_expander
+
+    def gval(env):
+        if name in env:
+            return env[name]
+        ct = getattr(me, 'ct_globals', None)
+        if ct is not None and name in ct:
+            return ct[name]
+        return GlobalVarNode(name, 0, 0)
+    return gval
+
+
+_SPECIALIZED = {
+    'QUOTE': _quote,
+    'COND': _cond,
+    'SET': _set,
+    'AND': _and,
+    'OR': _or,
+    'NOT': _not,
+    '==?': _eq,
+    'N==?': _neq,
+    '+': _add,
+    '-': _sub,
+    '*': _mul,
+    '/': _div,
+    'MOD': _mod,
+    'NTH': _nth,
+    'REST': _rest,
+    'EMPTY?': _empty,
+    'LENGTH': _length,
+    'LVAL': _lval,
+    'GVAL': _gval,
+    'LIST': _compile_list,
+    '()': _compile_list,
+}
+
+_LOOP_EXITS = {
+    'RETURN': _return,
+    'AGAIN': _again,
+}
@@ -0,0 +1,116 @@
+"""
+Parallel expansion of ROUTINE bodies (MacroExpander.jobs > 1).
+
+By the time expand_all reaches the routines, every macro, prefix macro and
+hook has been registered and the top-level forms have run, so expanding one
+routine body is independent of the others -- unless the expansion can change
+compile-time state (a SETG, a DEFMAC, output) that a later routine's
+expansion would see.  MacroExpander._routine_is_independent tells the two
+apart statically.
+
+Routines are taken in source order and split into runs at the routines that
+are not independent.  Each run of independent routines is expanded in chunks
+by a pool of forked worker processes, which inherit the expander as it
+stands at the start of the run, and the expanded bodies are sent back; each
+remaining routine is expanded in this process, in its place in the order.
+The Program that results is the one the sequential loop builds.
+
+Workers must be forked: the expander holds macro functions and compiled MDL
+bodies that cannot be pickled.  Where fork is unavailable, or this process
+is a daemonic pool worker (which may not have children), routines are
+expanded sequentially.
+"""
+
+import multiprocessing
+from typing import List
+
+from .macro_profile import MacroProfile
+
+# Runs shorter than this are expanded in this process: starting a pool and
+# shipping the bodies back costs more than expanding a few routines.
+MIN_PARALLEL_RUN = 16
+
+# Chunks per worker; more chunks balance uneven routine sizes.
+CHUNKS_PER_JOB = 4
+
+# (expander, routines) for forked workers, set while a pool is running.
+_worker_state = None
+
+
+def expand_routines_parallel(expander, routines: List, jobs: int):
+    """Expand ``routines`` in place with up to ``jobs`` worker processes."""
+    if not _can_fork():
+        for routine in routines:
+            expander._expand_routine(routine)
+        return
+    run: List = []
+    for routine in routines:
+        if expander._routine_is_independent(routine):
+            run.append(routine)
+            continue
+        _expand_run(expander, run, jobs)
+        run = []
+        expander._expand_routine(routine)
+    _expand_run(expander, run, jobs)
+
+
+def _can_fork() -> bool:
+    return ('fork' in multiprocessing.get_all_start_methods()
+            and not multiprocessing.current_process().daemon)
+
+
+def _expand_run(expander, routines: List, jobs: int):
+    """Expand a run of independent routines across a forked pool."""
+    if len(routines) < MIN_PARALLEL_RUN:
+        for routine in routines:
+            expander._expand_routine(routine)
+        return
+    global _worker_state
+    size = max(1, -(-len(routines) // (jobs * CHUNKS_PER_JOB)))
+    chunks = [range(start, min(start + size, len(routines)))
+              for start in range(0, len(routines), size)]
+    _worker_state = (expander, routines)
+    try:
+        with multiprocessing.get_context('fork').Pool(min(jobs, len(chunks))) as pool:
+            results = pool.map(_expand_chunk, chunks)
+    except Exception:
+        # The pool itself failed (no processes, a result that would not
+        # pickle): nothing has been expanded here yet, so do it all here.
+        results = [None] * len(chunks)
+    finally:
+        _worker_state = None
+
+    for index, (chunk, result) in enumerate(zip(chunks, results)):
+        if result is None:
+            # Expand the failed chunk, and the rest of the run, here: the
+            # error raised is then the one the sequential loop raises.
+            for rest in chunks[index:]:
+                for i in rest:
+                    expander._expand_routine(routines[i])
+            return
+        bodies, hits, misses, profile = result
+        for i, (body, defaults) in zip(chunk, bodies):
+            routines[i].body = body
+            routines[i].local_defaults.update(defaults)
+        expander.expansion_cache_hits += hits
+        expander.expansion_cache_misses += misses
+        if profile is not None:
+            expander.profile.merge(profile)
+
+
+def _expand_chunk(chunk: range):
+    """Worker: expand routines[chunk]; their bodies, local defaults, cache
+    counts and profile, or None if expansion raised."""
+    expander, routines = _worker_state
+    hits, misses = expander.expansion_cache_hits, expander.expansion_cache_misses
+    if expander.profile is not None:
+        expander.profile = MacroProfile()
+    try:
+        bodies = []
+        for i in chunk:
+            expander._expand_routine(routines[i])
+            bodies.append((routines[i].body, routines[i].local_defaults))
+    except Exception:
+        return None
+    return (bodies, expander.expansion_cache_hits - hits,
+            expander.expansion_cache_misses - misses, expander.profile)
@@ -14,6 +14,9 @@ class Parser:
 
     def __init__(self, tokens: List[Token], filename: str = "<input>", mdl_zil: bool = False):
         self.tokens = tokens
+        # A TokenStream builds each Token on indexing and its len() is a
+        # Python call, so the hot peek/advance path uses this count.
+        self.token_count = len(tokens)
         self.filename = filename
         self.pos = 0
         # MDL-ZIL? dialect (set by <FILE-FLAGS MDL-ZIL?>). In this dialect the
@@ -41,14 +44,14 @@ class Parser:
     def peek(self, offset: int = 0) -> Optional[Token]:
         """Peek at token at current position + offset."""
         pos = self.pos + offset
-        if pos < len(self.tokens):
+        if pos < self.token_count:
             return self.tokens[pos]
         return None
 
     def advance(self) -> Token:
         """Consume and return current token."""
         token = self.current_token
-        if self.pos < len(self.tokens) - 1:
+        if self.pos < self.token_count - 1:
             self.pos += 1
             self.current_token = self.tokens[self.pos]
         return token
@@ -61,7 +64,16 @@ class Parser:
 
     def parse(self) -> Program:
         """Parse the entire program."""
-        program = Program()
+        return self.build_program(self.parse_nodes())
+
+    def parse_nodes(self) -> List[ASTNode]:
+        """Parse every top-level form, returning the nodes in program order.
+
+        This is parse() without the final filing into a Program, so callers
+        (the incremental build cache) can parse source units separately and
+        combine the results with build_program().
+        """
+        nodes = []
         self._extra_forms = []  # For forms extracted from parenthesized groups
 
         while self.current_token.type != TokenType.EOF:
@@ -73,17 +85,23 @@ class Parser:
 
             # Handle lists of nodes (from VERSION? expansion)
             if isinstance(node, list):
-                for n in node:
-                    self._add_node_to_program(program, n)
+                nodes.extend(node)
             else:
-                self._add_node_to_program(program, node)
+                nodes.append(node)
 
             # Process any extra forms from parenthesized groups
             while self._extra_forms:
                 extra = self._extra_forms.pop(0)
                 if extra:
-                    self._add_node_to_program(program, extra)
+                    nodes.append(extra)
+
+        return nodes
 
+    def build_program(self, nodes: List[ASTNode]) -> Program:
+        """File top-level nodes (from parse_nodes) into a new Program."""
+        program = Program()
+        for node in nodes:
+            self._add_node_to_program(program, node)
         return program
 
     def _add_node_to_program(self, program, node):
@@ -155,7 +173,7 @@ class Parser:
         elif isinstance(node, FormNode):
             # Handle top-level forms like SETG
             if isinstance(node.operator, AtomNode):
-                op_name = node.operator.value.upper()
+                op_name = node.operator.upper
                 if op_name == 'SETG' and len(node.operands) >= 2:
                     # SETG creates/updates a global variable
                     # Treat as GlobalNode for compilation
@@ -195,7 +213,7 @@ class Parser:
                         indicator_node = node.operands[1]
                         has_value = len(node.operands) >= 3
                         if isinstance(item_node, AtomNode) and isinstance(indicator_node, AtomNode):
-                            if indicator_node.value.upper() == 'PROPSPEC':
+                            if indicator_node.upper == 'PROPSPEC':
                                 if not has_value:
                                     # Clear PROPSPEC for this atom
                                     program.cleared_propspecs.add(item_node.value.upper())
@@ -351,7 +369,7 @@ class Parser:
         # generic form -- the operand loop below handles unquotes (~ / ~!). This is
         # what lets library macros like `<CONSTANT ~.NAME <ITABLE ...>> parse.
         if self.quasiquote_depth == 0 and isinstance(operator, AtomNode):
-            op_name = operator.value.upper()
+            op_name = operator.upper
 
             if op_name == "ROUTINE":
                 node = self.parse_routine(line, col)
@@ -377,9 +395,9 @@ class Parser:
                 version_num = self.parse_expression()
                 # Handle VERSION ZIP (Z-code Interpreter Program) = version 3
                 if isinstance(version_num, AtomNode):
-                    if version_num.value.upper() == "ZIP":
+                    if version_num.upper == "ZIP":
                         version_value = 3
-                    elif version_num.value.upper() == "EZIP":
+                    elif version_num.upper == "EZIP":
                         version_value = 4
                     elif version_num.value.upper() == "XZIP":
                         version_value = 5
@@ -1087,7 +1105,7 @@ class Parser:
                     # Check if this looks like a direction exit syntax: TO, PER, SORRY, NEXIT, UEXIT, etc.
                     is_direction_exit = False
                     if values and isinstance(values[0], AtomNode):
-                        first_val = values[0].value.upper()
+                        first_val = values[0].upper
                         if first_val in ('TO', 'PER', 'SORRY', 'NEXIT', 'UEXIT', 'NE-EXIT', 'CEXIT', 'FEXIT',
                                          'DEXIT', 'DOOR', 'SETG', 'NONE', 'IF'):
                             is_direction_exit = True
@@ -1173,7 +1191,7 @@ class Parser:
                 # Check if this looks like a direction exit syntax: TO, PER, SORRY, NEXIT, UEXIT, etc.
                 is_direction_exit = False
                 if values and isinstance(values[0], AtomNode):
-                    first_val = values[0].value.upper()
+                    first_val = values[0].upper
                     if first_val in ('TO', 'PER', 'SORRY', 'NEXIT', 'UEXIT', 'NE-EXIT', 'CEXIT', 'FEXIT',
                                      'DEXIT', 'DOOR', 'SETG', 'NONE', 'IF'):
                         is_direction_exit = True
@@ -2171,7 +2189,7 @@ class Parser:
         # Get the operator - should be a simple atom (routine name or builtin)
         operator = form.operator
         if isinstance(operator, AtomNode):
-            op_name = operator.value.upper()
+            op_name = operator.upper
             # Certain builtins are allowed to have nested forms
             if op_name in ('PRINT', 'PRINTI', 'PRINTN', 'PRINTD', 'PRINTC', 'PRINTB',
                            'PRINT-DBL', 'CRLF'):
@@ -2192,7 +2210,7 @@ class Parser:
                 if nested_op is None:
                     continue
                 if isinstance(nested_op, AtomNode):
-                    nested_name = nested_op.value.upper()
+                    nested_name = nested_op.upper
                     # GVAL (, syntax), LVAL (. syntax) are okay - they're just variable references
                     # Empty forms <> are okay
                     if nested_name in ('GVAL', 'LVAL', 'GASSIGNED?', 'ASSIGNED?', '<>'):
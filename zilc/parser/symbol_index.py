@@ -0,0 +1,186 @@
+"""
+Definitions of a program by name.
+
+Questions like "is there a routine called PERFORM", "which macro is OLDMAC"
+or "does any object have a SYNONYM property" used to be answered by scanning
+program.routines, program.macros, every object's properties ... at each
+place they were asked.  SymbolIndex is built once, right after parsing, and
+kept current by the phases that add or drop definitions (MacroExpander.
+expand_all, ZILCompiler._maybe_inject_perform); a lookup by kind and name is
+a dictionary lookup.
+
+Kinds:
+    routine, global, constant, object, room, macro, propdef
+                the definition nodes of those kinds
+    property    a property name used by an object or room (the node is
+                the object or room)
+    flag        a name in an object's or room's FLAGS (ditto)
+
+A name may be defined more than once.  Every definition is kept, in program
+order, and find returns the first: the one a scan of the program's list
+would find.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, KeysView, List, Optional
+
+from .ast_nodes import (AtomNode, ConstantNode, GlobalNode, MacroNode, ObjectNode,
+                        PropdefNode, RoomNode, RoutineNode)
+
+KINDS = ('routine', 'global', 'constant', 'object', 'room', 'macro', 'propdef',
+         'property', 'flag')
+
+_NODE_KINDS = ((RoutineNode, 'routine'), (GlobalNode, 'global'),
+               (ConstantNode, 'constant'), (ObjectNode, 'object'),
+               (RoomNode, 'room'), (MacroNode, 'macro'), (PropdefNode, 'propdef'))
+
+
+@dataclass
+class Symbol:
+    """One definition of a name."""
+    name: str
+    kind: str
+    node: Any
+    line: int = 0
+    column: int = 0
+
+    def to_dict(self) -> Dict:
+        return {'name': self.name, 'kind': self.kind,
+                'line': self.line, 'column': self.column}
+
+
+class SymbolIndex:
+    """Symbols of one program by kind and name.
+
+    Usage:
+        index = SymbolIndex.from_program(program, filename)
+        index.find('routine', 'PERFORM')        # Symbol or None
+        'SYNONYM' in index.names('property')
+    """
+
+    def __init__(self, source_name: str = '<input>'):
+        self.source_name = source_name
+        self._names: Dict[str, Dict[str, List[Symbol]]] = {k: {} for k in KINDS}
+        self._folded: Dict[str, Dict[str, List[Symbol]]] = {k: {} for k in KINDS}
+        # id(object or room) -> its property and flag symbols
+        self._contents: Dict[int, List[Symbol]] = {}
+
+    @classmethod
+    def from_program(cls, program, source_name: str = '<input>') -> 'SymbolIndex':
+        """Index every definition in `program`."""
+        index = cls(source_name)
+        for nodes in (program.routines, program.globals, program.constants,
+                      program.objects, program.rooms, program.macros,
+                      program.propdefs):
+            for node in nodes:
+                index.define(node)
+        return index
+
+    # -- maintenance ---------------------------------------------------------
+
+    def define(self, node) -> Symbol:
+        """Add definition `node` (after any earlier definitions of its name)."""
+        kind = _kind_of(node)
+        symbol = self._add(kind, node.name, node)
+        if kind in ('object', 'room'):
+            self._add_contents(node)
+        return symbol
+
+    def remove(self, node):
+        """Drop definition `node` (and, for an object or room, its
+        properties and flags)."""
+        kind = _kind_of(node)
+        for symbol in self._names[kind].get(node.name, ()):
+            if symbol.node is node:
+                self._drop(symbol)
+                break
+        for symbol in self._contents.pop(id(node), ()):
+            self._drop(symbol)
+
+    def update_contents(self, node):
+        """Re-read the properties and flags of object or room `node` after
+        its property values have been rewritten."""
+        for symbol in self._contents.pop(id(node), ()):
+            self._drop(symbol)
+        self._add_contents(node)
+
+    def _add_contents(self, node):
+        contents = self._contents.setdefault(id(node), [])
+        for key, value in node.properties.items():
+            contents.append(self._add('property', key, node))
+            if key == 'FLAGS':
+                for flag in _flag_names(value):
+                    contents.append(self._add('flag', flag, node))
+
+    def _add(self, kind: str, name: str, node) -> Symbol:
+        symbol = Symbol(name, kind, node, getattr(node, 'line', 0),
+                        getattr(node, 'column', 0))
+        self._names[kind].setdefault(name, []).append(symbol)
+        self._folded[kind].setdefault(name.upper(), []).append(symbol)
+        return symbol
+
+    def _drop(self, symbol: Symbol):
+        for table, key in ((self._names, symbol.name),
+                           (self._folded, symbol.name.upper())):
+            symbols = table[symbol.kind][key]
+            symbols.remove(symbol)
+            if not symbols:
+                del table[symbol.kind][key]
+
+    # -- queries -------------------------------------------------------------
+
+    def find(self, kind: str, name: str) -> Optional[Symbol]:
+        """The first definition of `name` as a `kind`, or None."""
+        symbols = self._names[kind].get(name)
+        return symbols[0] if symbols else None
+
+    def find_any_case(self, kind: str, name: str) -> Optional[Symbol]:
+        """Like find, ignoring the case of `name`."""
+        symbols = self._folded[kind].get(name.upper())
+        return symbols[0] if symbols else None
+
+    def definitions(self, kind: str, name: str, any_case: bool = False) -> List[Symbol]:
+        """Every definition of `name` as a `kind`, in program order."""
+        if any_case:
+            return list(self._folded[kind].get(name.upper(), ()))
+        return list(self._names[kind].get(name, ()))
+
+    def names(self, kind: str) -> KeysView:
+        """The names defined as a `kind` (a live view)."""
+        return self._names[kind].keys()
+
+    def lookup(self, name: str) -> List[Symbol]:
+        """Every definition of `name`, of any kind."""
+        return [s for kind in KINDS for s in self._names[kind].get(name, ())]
+
+    def __iter__(self) -> Iterator[Symbol]:
+        for kind in KINDS:
+            for symbols in self._names[kind].values():
+                yield from symbols
+
+    def __len__(self) -> int:
+        return sum(len(symbols) for kind in KINDS
+                   for symbols in self._names[kind].values())
+
+    def to_dict(self) -> Dict:
+        """Structured form for tooling (JSON-serialisable)."""
+        return {'source': self.source_name,
+                'symbols': [s.to_dict() for s in self]}
+
+
+def _kind_of(node) -> str:
+    for cls, kind in _NODE_KINDS:
+        if isinstance(node, cls):
+            return kind
+    raise TypeError(f"not a definition: {type(node).__name__}")
+
+
+def _flag_names(value) -> List[str]:
+    """Flag names in a FLAGS property value, as the symbol-table builder
+    reads them: an atom, or atoms and strings in a list."""
+    if isinstance(value, AtomNode):
+        return [value.value]
+    if isinstance(value, (list, tuple)):
+        return [f.value if isinstance(f, AtomNode) else f
+                for f in value if isinstance(f, (AtomNode, str))]
+    return []
@@ -0,0 +1,117 @@
+"""
+Per-phase timing and memory statistics for a compilation.
+
+ZILCompiler.compile_string is one long linear pipeline, so phases are
+recorded as a sequence of markers: starting a phase closes the one before
+it.  Each record holds wall time, CPU time and (when tracemalloc is
+tracing) the peak traced allocation seen while the phase ran.
+"""
+
+import time
+import tracemalloc
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional
+
+
+@dataclass
+class PhaseRecord:
+    """Measurements for one compiler phase."""
+    name: str
+    wall: float = 0.0            # seconds
+    cpu: float = 0.0             # seconds of process CPU time
+    peak_memory: Optional[int] = None  # bytes; None when not tracing
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+class PhaseStats:
+    """Records consecutive compiler phases.
+
+    Usage:
+        stats = PhaseStats(track_memory=True)
+        stats.begin('lex')
+        ...
+        stats.begin('parse')   # closes 'lex'
+        ...
+        stats.finish()         # closes 'parse', stops tracemalloc if we started it
+    """
+
+    def __init__(self, track_memory: bool = False):
+        self.track_memory = track_memory
+        self.records: List[PhaseRecord] = []
+        self._current: Optional[PhaseRecord] = None
+        self._wall0 = 0.0
+        self._cpu0 = 0.0
+        self._started_tracing = False
+        if track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def begin(self, name: str):
+        """Start phase `name`, ending the current phase (if any)."""
+        self.end()
+        self._current = PhaseRecord(name)
+        if tracemalloc.is_tracing() and hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        self._wall0 = time.perf_counter()
+        self._cpu0 = time.process_time()
+
+    def end(self):
+        """End the current phase and append its record."""
+        rec = self._current
+        if rec is None:
+            return
+        rec.wall = time.perf_counter() - self._wall0
+        rec.cpu = time.process_time() - self._cpu0
+        if tracemalloc.is_tracing():
+            rec.peak_memory = tracemalloc.get_traced_memory()[1]
+        self.records.append(rec)
+        self._current = None
+
+    def finish(self):
+        """End the current phase and release tracemalloc if we enabled it."""
+        self.end()
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __len__(self):
+        return len(self.records)
+
+    def get(self, name: str) -> Optional[PhaseRecord]:
+        """Return the record for phase `name` (first occurrence), or None."""
+        for rec in self.records:
+            if rec.name == name:
+                return rec
+        return None
+
+    @property
+    def total_wall(self) -> float:
+        return sum(r.wall for r in self.records)
+
+    @property
+    def total_cpu(self) -> float:
+        return sum(r.cpu for r in self.records)
+
+    def to_dict(self) -> Dict:
+        """Structured form for tooling (JSON-serialisable)."""
+        return {
+            'phases': [r.to_dict() for r in self.records],
+            'total_wall': self.total_wall,
+            'total_cpu': self.total_cpu,
+        }
+
+    def format_report(self) -> str:
+        """Human-readable table, one line per phase."""
+        total = self.total_wall or 1e-9
+        lines = [f"{'phase':<16} {'wall(s)':>9} {'cpu(s)':>9} {'%':>6} {'peak(KiB)':>11}"]
+        for r in self.records:
+            peak = f"{r.peak_memory / 1024:11.0f}" if r.peak_memory is not None else f"{'-':>11}"
+            lines.append(f"{r.name:<16} {r.wall:9.3f} {r.cpu:9.3f} "
+                         f"{100.0 * r.wall / total:6.1f} {peak}")
+        lines.append(f"{'total':<16} {self.total_wall:9.3f} {self.total_cpu:9.3f}")
+        return "\n".join(lines)
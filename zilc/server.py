@@ -0,0 +1,292 @@
+"""
+Persistent compile server (`zorkie --serve`) and its thin client
+(`zorkie-client`).
+
+A fresh `zorkie` process pays for interpreter start-up, module import and a
+full front end on every build, although for a game built on the ZILF
+library most of the program text -- parser.zil, verbs.zil, scope.zil, ... --
+is the same from one build to the next.  The server keeps the compiler
+loaded and holds two stores across requests: the expanded text of every
+IFILE'd file, checked against the stamps of the files it came from (see
+ZILCompiler._expand_ifile), so unchanged library files are not read and
+preprocessed again; and an in-memory unit store (see zilc/build_cache.py),
+so unchanged library units are never lexed or parsed twice.
+
+Every request still runs the passes that see the whole program: the ZILF
+directive pass over the expanded source, macro expansion, code generation
+and assembly.
+
+Protocol: the client connects to a Unix socket, writes one JSON object on a
+line and reads one JSON object back.  Requests carry the same options as
+the `zorkie` command line; `{"command": "shutdown"}` stops the server.
+"""
+
+import contextlib
+import io
+import json
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from .compiler import ZILCompiler
+
+
+def default_socket_path() -> str:
+    """$ZORKIE_SOCKET, else a per-user socket in the temp directory."""
+    env = os.environ.get('ZORKIE_SOCKET')
+    if env:
+        return env
+    uid = os.getuid() if hasattr(os, 'getuid') else 0
+    return os.path.join(tempfile.gettempdir(), f"zorkie-{uid}.sock")
+
+
+class _UnitStore(OrderedDict):
+    """Bounded LRU mapping used as the BuildCache in-memory store."""
+
+    def __init__(self, max_entries: int = 20000):
+        super().__init__()
+        self.max_entries = max_entries
+
+    def get(self, key, default=None):
+        if key in self:
+            self.move_to_end(key)
+            return self[key]
+        return default
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        while len(self) > self.max_entries:
+            self.popitem(last=False)
+
+
+class _CompileHandler(socketserver.StreamRequestHandler):
+    """One request per connection: a JSON line in, a JSON line out."""
+
+    def handle(self):
+        line = self.rfile.readline()
+        try:
+            request = json.loads(line.decode('utf-8'))
+            if not isinstance(request, dict):
+                raise ValueError("request must be a JSON object")
+        except ValueError as e:
+            response = {'ok': False, 'errors': [f"bad request: {e}"]}
+        else:
+            try:
+                response = self.server.dispatch(request)
+            except Exception as e:
+                # The client waits for a reply line; never leave it without one
+                self.server.log(f"request failed: {type(e).__name__}: {e}")
+                response = {'ok': False, 'errors': [f"server error: {type(e).__name__}: {e}"]}
+        self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+
+
+class CompileServer(socketserver.UnixStreamServer):
+    """Serves compile requests sequentially from one warm process.
+
+    Requests are handled one at a time: ZILCompiler is not re-entrant and
+    the captured stderr of a build must not interleave with another's.
+    """
+
+    def __init__(self, socket_path: Optional[str] = None, verbose: bool = False):
+        self.socket_path = socket_path or default_socket_path()
+        self.verbose = verbose
+        self.unit_store = _UnitStore()
+        self.source_store = _UnitStore(max_entries=2000)
+        self.requests_served = 0
+        self._stop = False
+        if os.path.exists(self.socket_path):
+            # A live server still answers; only a stale socket is replaced.
+            if _server_alive(self.socket_path):
+                raise OSError(f"a compile server is already listening on {self.socket_path}")
+            os.unlink(self.socket_path)
+        super().__init__(self.socket_path, _CompileHandler)
+
+    def log(self, message: str):
+        if self.verbose:
+            print(f"[zorkie-server] {message}", file=sys.stderr)
+
+    def serve_until_shutdown(self):
+        """Handle requests until a shutdown request arrives."""
+        self.log(f"listening on {self.socket_path}")
+        try:
+            while not self._stop:
+                self.handle_request()
+        finally:
+            self.server_close()
+
+    def server_close(self):
+        super().server_close()
+        with contextlib.suppress(OSError):
+            os.unlink(self.socket_path)
+
+    def dispatch(self, request: dict) -> dict:
+        command = request.get('command', 'compile')
+        if command == 'shutdown':
+            self._stop = True
+            return {'ok': True}
+        if command == 'status':
+            return {'ok': True, 'requests_served': self.requests_served,
+                    'cached_units': len(self.unit_store),
+                    'cached_files': len(self.source_store), 'pid': os.getpid()}
+        if command != 'compile':
+            return {'ok': False, 'errors': [f"unknown command {command!r}"]}
+        return self.compile(request)
+
+    def compile(self, request: dict) -> dict:
+        """Run one build described by `request` (see client_main for keys)."""
+        self.requests_served += 1
+        input_path = request.get('input')
+        if not input_path:
+            return {'ok': False, 'errors': ["request has no 'input'"]}
+        version = int(request.get('version', 3))
+        output_path = request.get('output') or str(Path(input_path).with_suffix(f".z{version}"))
+        compiler = ZILCompiler(
+            version=version,
+            verbose=bool(request.get('verbose')),
+            enable_string_dedup=bool(request.get('string_dedup')),
+            allow_undefined_routines=bool(request.get('allow_undefined_routines')),
+            timings=bool(request.get('timings')),
+            build_cache=self.unit_store)
+        compiler.source_cache = self.source_store
+        captured = io.StringIO()
+        with contextlib.redirect_stderr(captured), contextlib.redirect_stdout(captured):
+            success = _run_compile(compiler, input_path, output_path,
+                                   request.get('include') or [])
+            if request.get('timings'):
+                print(compiler.phase_stats.format_report(), file=sys.stderr)
+        self.log(f"{'ok' if success else 'FAILED'}: {input_path} -> {output_path}")
+        response = {
+            'ok': success,
+            'output': output_path,
+            'warnings': compiler.get_warnings(),
+            'errors': compiler.get_errors(),
+            'stderr': captured.getvalue(),
+        }
+        if success:
+            with contextlib.suppress(OSError):
+                response['size'] = os.path.getsize(output_path)
+        return response
+
+
+def _run_compile(compiler: ZILCompiler, input_path: str, output_path: str,
+                 includes: list) -> bool:
+    """The command-line build, as main() performs it."""
+    if not includes:
+        return compiler.compile_file(input_path, output_path)
+    try:
+        story_data = compiler.compile_file_multi(input_path, includes)
+        with open(output_path, 'wb') as f:
+            f.write(story_data)
+        return True
+    except Exception as e:
+        print(f"Compilation error: {e}", file=sys.stderr)
+        return False
+
+
+def _server_alive(socket_path: str) -> bool:
+    try:
+        request(socket_path, {'command': 'status'}, timeout=2.0)
+        return True
+    except (OSError, ValueError):
+        return False
+
+
+def request(socket_path: str, payload: dict, timeout: Optional[float] = None) -> dict:
+    """Send one request to the server at socket_path and return its reply."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(payload).encode('utf-8') + b'\n')
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            if chunk.endswith(b'\n'):
+                break
+    return json.loads(b''.join(chunks).decode('utf-8'))
+
+
+def serve(socket_path: Optional[str] = None, verbose: bool = False):
+    """Entry point for `zorkie --serve`."""
+    server = CompileServer(socket_path, verbose=verbose)
+    print(f"zorkie compile server listening on {server.socket_path}", file=sys.stderr)
+    with contextlib.suppress(KeyboardInterrupt):
+        server.serve_until_shutdown()
+
+
+def client_main():
+    """Command-line interface for `zorkie-client`."""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Send a compile request to a running `zorkie --serve` server'
+    )
+    parser.add_argument('input', nargs='?', help='Input .zil source file')
+    parser.add_argument('-o', '--output', help='Output story file (.z3, .z5, etc.)')
+    parser.add_argument('-v', '--version', type=int, default=3,
+                        choices=[1, 2, 3, 4, 5, 6, 7, 8], metavar='1-8',
+                        help='Target Z-machine version (default: 3)')
+    parser.add_argument('-i', '--include', action='append',
+                        help='Include additional ZIL files (can be used multiple times)')
+    parser.add_argument('--verbose', action='store_true', help='Verbose output')
+    parser.add_argument('--string-dedup', action='store_true',
+                        help='Enable string table deduplication (uses PRINT_PADDR)')
+    parser.add_argument('--allow-undefined-routines', action='store_true',
+                        help='Stub calls to undefined routines (see zorkie --help)')
+    parser.add_argument('--timings', action='store_true',
+                        help='Print per-phase timings to stderr')
+    parser.add_argument('--socket', default=None,
+                        help='Server socket (default: $ZORKIE_SOCKET or a per-user temp path)')
+    parser.add_argument('--status', action='store_true', help='Query the server and exit')
+    parser.add_argument('--shutdown', action='store_true', help='Stop the server and exit')
+
+    args = parser.parse_args()
+    socket_path = args.socket or default_socket_path()
+
+    if args.status or args.shutdown:
+        payload = {'command': 'status' if args.status else 'shutdown'}
+    else:
+        if not args.input:
+            parser.error("an input file is required")
+        payload = {
+            'command': 'compile',
+            'input': os.path.abspath(args.input),
+            'output': os.path.abspath(args.output) if args.output else None,
+            'version': args.version,
+            'include': [os.path.abspath(p) for p in (args.include or [])],
+            'verbose': args.verbose,
+            'string_dedup': args.string_dedup,
+            'allow_undefined_routines': args.allow_undefined_routines,
+            'timings': args.timings,
+        }
+
+    try:
+        response = request(socket_path, payload)
+    except OSError as e:
+        print(f"Error: no compile server at {socket_path} ({e}); "
+              f"start one with `zorkie --serve`", file=sys.stderr)
+        sys.exit(2)
+    except ValueError as e:
+        print(f"Error: unreadable reply from the compile server at {socket_path} ({e})",
+              file=sys.stderr)
+        sys.exit(2)
+
+    if payload['command'] == 'status':
+        print(json.dumps(response, indent=2))
+    if response.get('stderr'):
+        sys.stderr.write(response['stderr'])
+    for err in response.get('errors', []) if not response.get('stderr') else []:
+        print(err, file=sys.stderr)
+    sys.exit(0 if response.get('ok') else 1)
+
+
+if __name__ == '__main__':
+    client_main()
@@ -0,0 +1,408 @@
+"""
+Structural index of one revision of (preprocessed) ZIL source text.
+
+The directive preprocessor rewrites the whole-program source string in many
+passes, and most of them start by looking for `<NAME ...>` forms.  Each
+lookup used to be a character-by-character walk over the entire text, and
+each rewrite a fresh copy of it, so the cost was the source size times the
+number of passes, even for passes whose directive never occurs.
+
+SourceIndex scans a text once and records its `<...>` form tree: where every
+form starts and ends, its parent form and its head atom, plus the spans of
+string literals and `;` comments.  Lookups by head, or by a head regex, are
+then proportional to the number of candidate forms.  A pass that rewrites
+forms hands its (start, end, replacement) edits to spliced(), which builds
+the new text once and derives the new text's index from the old one --
+only the replacement texts are scanned -- so a chain of passes never
+rescans the whole program.  ZILCompiler._source_index/_splice keep the
+index of the text the preprocessor is currently working on, and its
+source-text helpers (_extract_balanced_content, _pos_in_string,
+_is_inside_macro_def, ...) answer bracket and string questions from it.
+
+The lexical rules are the ones the preprocessor helpers have always used:
+outside strings a backslash quotes the next character and `!\\X` is a
+character literal; inside strings a backslash escapes the next character.
+Only angle brackets nest -- ( ) and [ ] are ordinary characters here.
+"""
+
+import re
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# The only lexemes the scanner acts on; everything between them is skipped
+# by the regex engine.  A string runs to its closing quote (or the end of
+# the text); a backslash outside a string quotes the next character, which
+# also covers '!\\X' character literals.
+_STRING = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*(?:"|\\?\Z)', re.DOTALL)
+_TOKEN = re.compile(_STRING.pattern + r'|\\.|[<>]|;\s*', re.DOTALL)
+# Head atom of a form: optional whitespace, then atom characters.
+_HEAD = re.compile(r'\s*([^\s<>()\[\]{}";,\'%.]+)')
+# A bare commented datum that is neither a form, a string nor a list.
+_COMMENT_ATOM = re.compile(r'[^\s<>()\[\]{}"]*')
+
+Edit = Tuple[int, int, str]
+
+
+class SourceIndex:
+    """Form tree and string/comment spans of one source text.
+
+    Attributes:
+        source:   the indexed text
+        starts:   start offset of every balanced form, in document order
+        end_of:   start -> offset just past the form's closing '>'
+        unclosed: offsets of '<'s that are never closed
+        parent_of: start -> start of the enclosing form (None at top level)
+        heads:    upper-cased head atom -> starts of the forms it heads
+                  (built on first use)
+        strings:  (start, end) of each string literal, quotes included
+        comments: (start, end) of each outermost ';' comment, from the ';'
+                  to the end of the commented datum
+
+    Neither span list overlaps itself, so the sorted list doubles as the
+    interval tree for "is this offset inside a string/comment": one bisect.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.starts: List[int] = []
+        self.end_of: Dict[int, int] = {}
+        self.unclosed = frozenset()
+        self.parent_of: Dict[int, Optional[int]] = {}
+        self.strings: List[Tuple[int, int]] = []
+        self.comments: List[Tuple[int, int]] = []
+        self._heads: Optional[Dict[str, List[int]]] = None
+        # False when the text cannot stand alone as a replacement: an
+        # unclosed form, a stray '>', an unterminated string, a trailing
+        # backslash or a comment whose datum may continue past the end.
+        self.self_contained = True
+        self._scan()
+
+    def _scan(self):
+        src = self.source
+        n = len(src)
+        end_of = self.end_of
+        parent_of = self.parent_of
+        strings = self.strings
+        comments = []
+        stack: List[int] = []
+        # '<' offset -> ';' offset, for forms that are commented out.
+        pending: Dict[int, int] = {}
+        open_starts = []
+        for m in _TOKEN.finditer(src):
+            c = m.group()[0]
+            if c == '<':
+                i = m.start()
+                stack.append(i)
+                open_starts.append(i)
+            elif c == '>':
+                if stack:
+                    start = stack.pop()
+                    end = end_of[start] = m.end()
+                    parent_of[start] = stack[-1] if stack else None
+                    if pending:
+                        semi = pending.pop(start, None)
+                        if semi is not None:
+                            comments.append((semi, end))
+                else:
+                    self.self_contained = False
+            elif c == '"':
+                strings.append(m.span())
+            elif c == ';':
+                i = m.start()
+                j = m.end()
+                nxt = src[j] if j < n else ''
+                if nxt == '<':
+                    pending[j] = i
+                elif nxt == '"':
+                    comments.append((i, _STRING.match(src, j).end()))
+                elif nxt and nxt in '([':
+                    comments.append((i, _list_end(src, j)))
+                else:
+                    comments.append((i, _COMMENT_ATOM.match(src, j).end()))
+            # else a backslash escape: nothing to record
+        self.starts = [s for s in open_starts if s in end_of]
+        self.unclosed = frozenset(stack)
+        comments.sort()
+        last_end = -1
+        for span in comments:
+            if span[0] >= last_end:
+                self.comments.append(span)
+                last_end = span[1]
+        if (stack or pending or src.endswith('\\')
+                or (strings and (strings[-1][1] - strings[-1][0] < 2
+                                 or src[strings[-1][1] - 1] != '"'))
+                or (self.comments and self.comments[-1][1] >= n)):
+            self.self_contained = False
+
+    @property
+    def heads(self) -> Dict[str, List[int]]:
+        if self._heads is None:
+            src = self.source
+            head = _HEAD.match
+            heads = self._heads = {}
+            for s in self.starts:
+                hm = head(src, s + 1)
+                if hm:
+                    heads.setdefault(hm.group(1).upper(), []).append(s)
+        return self._heads
+
+    # -- queries ----------------------------------------------------------
+
+    def forms_with_head(self, names: Iterable[str]) -> List[int]:
+        """Starts of the forms headed by any of `names`, in document order."""
+        found = []
+        for name in names:
+            found.extend(self.heads.get(name.upper(), ()))
+        found.sort()
+        return found
+
+    def outermost(self, names: Iterable[str]) -> List[Tuple[int, int, str]]:
+        """(start, end, text) of each form headed by any of `names` that is
+        not nested inside an earlier one, in document order: find() keyed
+        on the head atom, answered from the form tree instead of a regex
+        scan."""
+        src = self.source
+        end_of = self.end_of
+        results = []
+        resume = 0
+        for start in self.forms_with_head(names):
+            if start < resume:
+                continue
+            end = resume = end_of[start]
+            results.append((start, end, src[start:end]))
+        return results
+
+    def find(self, head_pat) -> List[Tuple[int, int, str]]:
+        """(start, end, text) of each outermost form whose '<' head_pat matches.
+
+        head_pat is a compiled regex (or pattern string, matched
+        case-insensitively) anchored at the form's '<'.  A matching form
+        nested inside an earlier match is not reported, exactly as a
+        left-to-right scan that skips over each match would behave.
+        """
+        if isinstance(head_pat, str):
+            head_pat = re.compile(head_pat, re.IGNORECASE)
+        src = self.source
+        end_of = self.end_of
+        results = []
+        resume = 0
+        for m in _lookahead(head_pat.pattern, head_pat.flags).finditer(src):
+            start = m.start()
+            if start < resume:
+                continue
+            end = end_of.get(start)
+            if end is None:
+                continue
+            results.append((start, end, src[start:end]))
+            resume = end
+        return results
+
+    def enclosing(self, pos: int):
+        """Starts of the forms strictly containing offset `pos`, innermost
+        first.  (A form starting at `pos` does not contain it.)"""
+        starts = self.starts
+        k = bisect_left(starts, pos) - 1
+        if k < 0:
+            return
+        # The last form opened before pos is pos's innermost enclosing form
+        # or a descendant of it, so the chain up from it passes through all
+        # of pos's enclosing forms.
+        s = starts[k]
+        end_of = self.end_of
+        parent_of = self.parent_of
+        while s is not None:
+            if end_of[s] > pos:
+                yield s
+            s = parent_of[s]
+
+    def head(self, start: int) -> Optional[str]:
+        """Upper-cased head atom of the form starting at `start`."""
+        hm = _HEAD.match(self.source, start + 1)
+        return hm.group(1).upper() if hm else None
+
+    def in_string(self, pos: int) -> bool:
+        """True if the character at `pos` is read as part of a string: after
+        an opening quote, up to and including the closing one."""
+        k = bisect_right(self.strings, (pos, -1)) - 1
+        return k >= 0 and self.strings[k][0] < pos < self.strings[k][1]
+
+    def in_comment(self, pos: int) -> bool:
+        """True if offset `pos` lies inside a ';' comment."""
+        return _in_spans(self.comments, pos)
+
+    # -- rewriting ----------------------------------------------------------
+
+    def splice(self, edits: Iterable[Edit]) -> str:
+        """Apply (start, end, replacement) edits and return the new text."""
+        return self.spliced(edits).source
+
+    def spliced(self, edits: Iterable[Edit]) -> 'SourceIndex':
+        """Index of the text with (start, end, replacement) edits applied.
+
+        Edits are applied in offset order; an edit overlapping an earlier
+        one is dropped.  With no edits (or none that change anything) this
+        index itself is returned.  When
+        every edit replaces one whole form, or a %-prefixed one (not
+        commented out, and not right after a comment it could run on from),
+        with self-contained text, the result is derived from this index by
+        shifting offsets and scanning only the replacements; otherwise the
+        new text is scanned afresh.
+        """
+        src = self.source
+        ordered = []
+        pos = 0
+        for edit in sorted(edits, key=lambda e: (e[0], e[1])):
+            if edit[0] >= pos:
+                pos = edit[1]
+                if src[edit[0]:pos] != edit[2]:
+                    ordered.append(edit)
+        if not ordered:
+            return self
+        out = []
+        pos = 0
+        for start, end, text in ordered:
+            out.append(src[pos:start])
+            out.append(text)
+            pos = end
+        out.append(src[pos:])
+        text = ''.join(out)
+
+        forms = []
+        pieces = []
+        for start, end, repl in ordered:
+            form = start
+            while src.startswith('%', form):
+                form += 1
+            if (self.end_of.get(form) != end or self.in_comment(start)
+                    or _span_ends_at(self.comments, start)):
+                return SourceIndex(text)
+            piece = SourceIndex(repl) if repl else None
+            if piece is not None and not piece.self_contained:
+                return SourceIndex(text)
+            forms.append(form)
+            pieces.append(piece)
+        return self._derive(text, ordered, forms, pieces)
+
+    def _derive(self, text: str, edits: List[Edit], forms: List[int],
+                pieces: List[Optional['SourceIndex']]) -> 'SourceIndex':
+        new = SourceIndex.__new__(SourceIndex)
+        new.source = text
+        new._heads = None
+        new.self_contained = self.self_contained
+        ends = [e for _, e, _ in edits]
+        # shift[k]: total length change of the first k edits
+        shift = [0]
+        for start, end, repl in edits:
+            shift.append(shift[-1] + len(repl) - (end - start))
+
+        def moved(p):
+            return p + shift[bisect_right(ends, p)]
+
+        new.unclosed = frozenset(moved(p) for p in self.unclosed)
+
+        starts = []
+        end_of = {}
+        parent_of = {}
+        strings = []
+        comments = []
+        old_starts = self.starts
+        old_end = self.end_of
+        old_parent = self.parent_of
+        prev = 0
+        for k, ((a, b, _repl), form, piece) in enumerate(zip(edits, forms, pieces)):
+            delta = shift[k]
+            # Forms starting between the previous edit and this one: shifted
+            # by delta, except an end past this edit (the form encloses it)
+            # or a parent before the previous edit.
+            for s in old_starts[bisect_left(old_starts, prev):bisect_left(old_starts, a)]:
+                ns = s + delta
+                starts.append(ns)
+                e = old_end[s]
+                end_of[ns] = e + delta if e <= a else moved(e)
+                p = old_parent[s]
+                parent_of[ns] = (None if p is None else
+                                 p + delta if p >= prev else moved(p))
+            strings.extend((s + delta, e + delta) for s, e in
+                           _spans_between(self.strings, prev, a))
+            comments.extend((s + delta, e + delta) for s, e in
+                            _spans_between(self.comments, prev, a))
+            if piece is not None:
+                base = a + delta
+                outer = old_parent[form]
+                outer = None if outer is None else moved(outer)
+                for s in piece.starts:
+                    ns = s + base
+                    starts.append(ns)
+                    end_of[ns] = piece.end_of[s] + base
+                    p = piece.parent_of[s]
+                    parent_of[ns] = outer if p is None else p + base
+                strings.extend((s + base, e + base) for s, e in piece.strings)
+                comments.extend((s + base, e + base) for s, e in piece.comments)
+            prev = b
+        delta = shift[-1]
+        for s in old_starts[bisect_left(old_starts, prev):]:
+            ns = s + delta
+            starts.append(ns)
+            end_of[ns] = old_end[s] + delta
+            p = old_parent[s]
+            parent_of[ns] = (None if p is None else
+                             p + delta if p >= prev else moved(p))
+        strings.extend((s + delta, e + delta) for s, e in
+                       _spans_between(self.strings, prev, len(self.source) + 1))
+        comments.extend((s + delta, e + delta) for s, e in
+                        _spans_between(self.comments, prev, len(self.source) + 1))
+        new.starts = starts
+        new.end_of = end_of
+        new.parent_of = parent_of
+        new.strings = strings
+        new.comments = comments
+        return new
+
+
+@lru_cache(maxsize=256)
+def _lookahead(pattern: str, flags: int):
+    """`pattern` as a zero-width lookahead, so finditer reports every offset
+    where it matches, overlapping or not."""
+    return re.compile('(?=' + pattern + ')', flags)
+
+
+def _spans_between(spans: List[Tuple[int, int]], lo: int, hi: int):
+    """The spans of a sorted list that start in [lo, hi)."""
+    return spans[bisect_left(spans, (lo, -1)):bisect_left(spans, (hi, -1))]
+
+
+def _span_ends_at(spans: List[Tuple[int, int]], pos: int) -> bool:
+    """True if a span of a sorted, non-overlapping list ends exactly at pos
+    (a comment atom that would run on into text spliced in there)."""
+    k = bisect_left(spans, (pos, -1)) - 1
+    return k >= 0 and spans[k][1] == pos
+
+
+def _in_spans(spans: List[Tuple[int, int]], pos: int) -> bool:
+    k = bisect_right(spans, (pos, float('inf'))) - 1
+    return k >= 0 and spans[k][0] <= pos < spans[k][1]
+
+
+def _list_end(src: str, j: int) -> int:
+    """End of the ( ) or [ ] list starting at j (commented-out data)."""
+    opener = src[j]
+    closer = ')' if opener == '(' else ']'
+    depth = 0
+    n = len(src)
+    while j < n:
+        c = src[j]
+        if c == '"':
+            j = _STRING.match(src, j).end()
+            continue
+        if c == '\\':
+            j += 2
+            continue
+        if c == opener:
+            depth += 1
+        elif c == closer:
+            depth -= 1
+            if depth == 0:
+                return j + 1
+        j += 1
+    return n
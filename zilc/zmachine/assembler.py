@@ -7,6 +7,8 @@ This is a simplified assembler for the initial implementation.
 from typing import List, Dict, Optional
 import struct
 
+from .relocations import DICT, ROUTINE, STRING, TABLE, VOCAB
+
 
 class ZAssembler:
     """Assembles Z-machine bytecode into a story file."""
@@ -17,6 +19,9 @@ class ZAssembler:
         self.dynamic_mem_size = 0
         self.static_mem_base = 0
         self.high_mem_base = 0
+        # Relocations apply_relocations() could not resolve; their bytes
+        # still hold the marker.
+        self.unresolved_relocations: list = []
 
     def create_header(self) -> bytearray:
         """Create Z-machine header (64 bytes)."""
@@ -81,8 +86,7 @@ class ZAssembler:
         Table data is split into an impure (dynamic-memory) region and a pure
         (static-memory) region, and build_story_file pads to a word boundary
         between them, so pure tables do NOT live at table_base_addr + offset.
-        Mirrors _resolve_table_placeholders_split, which is what makes the
-        table pointers stored in GLOBALS correct.
+        Every table address the assembler writes goes through here.
         """
         impure = getattr(self, '_impure_tables_size', None)
         pure_base = getattr(self, '_pure_table_base', None)
@@ -103,1358 +107,65 @@ class ZAssembler:
                                          table_offsets[vword_map[idx]])
         return None
 
-    def _resolve_table_placeholders(self, data: bytes, table_base_addr: int,
-                                       table_offsets: dict,
-                                       dict_addr: int = None) -> bytes:
-        """
-        Resolve table address placeholders in data.
-
-        Scans for 16-bit values in range 0xFF00-0xFFFF which represent table
-        indices, and replaces them with actual table addresses.
-        Also resolves VOCAB placeholder (0xFA00) with dictionary address.
-
-        Args:
-            data: Bytes to scan (typically globals_data)
-            table_base_addr: Base address where tables are placed in memory
-            table_offsets: Dict mapping table index to offset within table data
-            dict_addr: Dictionary address for resolving VOCAB placeholder
-
-        Returns:
-            Modified data with actual table addresses
-        """
-        result = bytearray(data)
-
-        # Scan for 16-bit placeholders
-        # Globals are stored as big-endian 16-bit words
-        for i in range(0, len(result) - 1, 2):
-            word = (result[i] << 8) | result[i + 1]
-            # Check if this is a VOCAB placeholder (0xFA00)
-            if word == 0xFA00 and dict_addr is not None:
-                # Replace with dictionary address
-                result[i] = (dict_addr >> 8) & 0xFF
-                result[i + 1] = dict_addr & 0xFF
-            # Check if this is a table placeholder (0xFF00-0xFFFF)
-            elif ((0xFF00 <= word <= 0xFFFF) or (0xF800 <= word <= 0xF8FF)) and table_offsets:
-                # 0xF800|(idx-256): ext band for table indexes 256..511
-                table_index = (word & 0x00FF) + (0x100 if (word & 0xFF00) == 0xF800 else 0)
-                if table_index in table_offsets:
-                    # Calculate actual table address (pure tables sit past the
-                    # impure/pure alignment pad -- see _table_data_addr)
-                    actual_addr = self._table_data_addr(
-                        table_base_addr, table_offsets[table_index])
-                    # Write back as big-endian
-                    result[i] = (actual_addr >> 8) & 0xFF
-                    result[i + 1] = actual_addr & 0xFF
-
-        return bytes(result)
-
-    def _resolve_table_placeholders_split(self, data: bytes,
-                                           impure_base_addr: int,
-                                           pure_base_addr: int,
-                                           table_offsets: dict,
-                                           impure_tables_size: int,
-                                           dict_addr: int = None) -> bytes:
-        """
-        Resolve table address placeholders with split impure/pure table bases.
-
-        Like _resolve_table_placeholders but handles the case where impure tables
-        are at a different base address than pure tables.
-
-        Args:
-            data: Bytes to scan (typically globals_data)
-            impure_base_addr: Base address for impure tables (dynamic memory)
-            pure_base_addr: Base address for pure tables (static memory)
-            table_offsets: Dict mapping table index to offset within sorted table data
-            impure_tables_size: Byte offset where pure tables start in the sorted data
-            dict_addr: Dictionary address for resolving VOCAB placeholder
-
-        Returns:
-            Modified data with actual table addresses
-        """
-        result = bytearray(data)
-
-        # Scan for 16-bit placeholders
-        # Globals are stored as big-endian 16-bit words
-        for i in range(0, len(result) - 1, 2):
-            word = (result[i] << 8) | result[i + 1]
-            # Check if this is a VOCAB placeholder (0xFA00)
-            if word == 0xFA00 and dict_addr is not None:
-                # Replace with dictionary address
-                result[i] = (dict_addr >> 8) & 0xFF
-                result[i + 1] = dict_addr & 0xFF
-            # Check if this is a table placeholder (0xFF00-0xFFFF)
-            elif ((0xFF00 <= word <= 0xFFFF) or (0xF800 <= word <= 0xF8FF)) and table_offsets:
-                # 0xF800|(idx-256): ext band for table indexes 256..511
-                table_index = (word & 0x00FF) + (0x100 if (word & 0xFF00) == 0xF800 else 0)
-                if table_index in table_offsets:
-                    offset = table_offsets[table_index]
-                    # Determine which section this table is in
-                    if offset < impure_tables_size:
-                        # Impure table: in dynamic memory
-                        actual_addr = impure_base_addr + offset
-                    else:
-                        # Pure table: in static memory
-                        actual_addr = pure_base_addr + (offset - impure_tables_size)
-                    # Write back as big-endian
-                    result[i] = (actual_addr >> 8) & 0xFF
-                    result[i + 1] = actual_addr & 0xFF
-
-        return bytes(result)
-
-    def _resolve_string_markers(self, routines: bytes, string_table,
-                                   string_placeholders: dict = None,
-                                   placeholder_positions: list = None,
-                                   patched_positions: set = None) -> bytes:
-        """
-        Resolve string table markers in routine bytecode.
-
-        Uses position-based resolution when placeholder_positions is provided,
-        avoiding false matches when 0x8D appears as operand data (e.g., global var 141).
-
-        Handles two formats:
-        1. Old format: (0x8D 0xFF 0xFE <length> <text>) - variable size, uses scanning
-        2. New format: (0x8D <hi> <lo>) where value 0xE000-0xFFFD - uses position-based resolution
-
-        Both are replaced with PRINT_PADDR instructions:
-        (0x8D <packed_addr_hi> <packed_addr_lo>)
-
-        Args:
-            routines: Original routine bytecode with markers
-            string_table: StringTable instance with resolved addresses
-            string_placeholders: Dict mapping placeholder index to string text
-            placeholder_positions: List of (byte_offset, placeholder_idx) for position-based resolution
-
-        Returns:
-            Modified routine bytecode with markers resolved
-        """
-        # Use position-based resolution if positions are provided
-        if placeholder_positions:
-            result = bytearray(routines)
-            for byte_offset, placeholder_idx in placeholder_positions:
-                if byte_offset + 2 >= len(result):
-                    continue  # Invalid offset, skip
-                # Verify this looks like a placeholder (0x8D followed by placeholder value)
-                if result[byte_offset] != 0x8D:
-                    continue  # Not a PRINT_PADDR opcode, skip
-                # Get the string text for this placeholder
-                if string_placeholders and placeholder_idx in string_placeholders:
-                    text = string_placeholders[placeholder_idx]
-                    # Get packed address from string table
-                    packed_addr = string_table.get_packed_address(text, self.version)
-                    if packed_addr is not None:
-                        # Patch in place: keep 0x8D, update the address bytes
-                        result[byte_offset + 1] = (packed_addr >> 8) & 0xFF
-                        result[byte_offset + 2] = packed_addr & 0xFF
-                        if patched_positions is not None:
-                            patched_positions.add(byte_offset + 1)
-                            patched_positions.add(byte_offset + 2)
-            return bytes(result)
-
-        # Fallback: scan-based resolution (for old format or when positions not available)
-        result = bytearray()
-        i = 0
-
-        while i < len(routines):
-            # Check for PRINT_PADDR opcode (0x8D) which might contain placeholders
-            if routines[i] == 0x8D and i + 2 < len(routines):
-                high_byte = routines[i+1]
-                low_byte = routines[i+2]
-                placeholder_val = (high_byte << 8) | low_byte
-
-                # Check for old string table marker: 0x8D 0xFF 0xFE <len> <text>
-                if (high_byte == 0xFF and low_byte == 0xFE and
-                    i + 4 < len(routines)):
-
-                    # Read string length (2 bytes, little-endian)
-                    text_len = routines[i+3] | (routines[i+4] << 8)
-
-                    # Read string text
-                    if i + 5 + text_len <= len(routines):
-                        text_bytes = routines[i+5:i+5+text_len]
-                        text = text_bytes.decode('utf-8')
-
-                        # Get packed address from string table
-                        packed_addr = string_table.get_packed_address(text, self.version)
-
-                        if packed_addr is not None:
-                            # Emit PRINT_PADDR with actual packed address
-                            result.append(0x8D)  # SHORT PRINT_PADDR
-                            result.append((packed_addr >> 8) & 0xFF)  # High byte
-                            result.append(packed_addr & 0xFF)  # Low byte
-
-                            # Skip past the marker and text
-                            i += 5 + text_len
-                            continue
-                        else:
-                            # String not in table (shouldn't happen), keep marker
-                            result.append(routines[i])
-                            i += 1
-                            continue
-                    else:
-                        # Incomplete marker, keep byte
-                        result.append(routines[i])
-                        i += 1
-                        continue
-
-                # Regular PRINT_PADDR instruction (not a placeholder), copy as-is
-                # NOTE: We no longer scan for new format (0xE000-0xFFFD) to avoid false matches
-                # New format should use position-based resolution via placeholder_positions
-                else:
-                    result.append(routines[i])
-                    i += 1
-                    continue
-
-            # Normal bytecode, copy as-is
-            result.append(routines[i])
-            i += 1
-
-        return bytes(result)
-
-    def _resolve_routine_fixups(self, routines: bytes, routine_fixups: list) -> bytes:
-        """
-        Resolve routine call fixups by patching addresses.
-
-        Each fixup is (code_offset, routine_offset) where:
-        - code_offset: Position in routines to patch (2 bytes)
-        - routine_offset: Byte offset of target routine within routines
-
-        Args:
-            routines: Routine bytecode with placeholder addresses
-            routine_fixups: List of fixup tuples
-
-        Returns:
-            Patched routine bytecode
-        """
-        if not routine_fixups:
-            return routines
-
-        result = bytearray(routines)
-
-        for code_offset, routine_offset in routine_fixups:
-            # Calculate actual byte address of routine
-            actual_addr = self.high_mem_base + routine_offset
-
-            # Convert to packed address based on version
-            # V1-3: packed = byte_addr / 2
-            # V4-5: packed = byte_addr / 4
-            # V6-7: packed = (byte_addr - 8*routines_offset) / 4 = routine_offset / 4
-            # V8:   packed = byte_addr / 8
-            if self.version <= 3:
-                packed_addr = actual_addr // 2
-            elif self.version <= 5:
-                packed_addr = actual_addr // 4
-            elif self.version <= 7:
-                # V6-7 use routines_offset, with 4-byte padding before first routine
-                # packed = (4 + routine_offset) / 4
-                packed_addr = (4 + routine_offset) // 4
-            else:
-                packed_addr = actual_addr // 8
-
-            # Patch the 16-bit address
-            if code_offset + 1 < len(result):
-                result[code_offset] = (packed_addr >> 8) & 0xFF
-                result[code_offset + 1] = packed_addr & 0xFF
-
-        return bytes(result)
-
-    def _resolve_string_placeholders(self, routines: bytes, string_placeholders: dict,
-                                       string_table,
-                                       code_index_max: int = None,
-                                       patched_positions: set = None) -> bytes:
-        """
-        Resolve string operand placeholders in routine bytecode.
-
-        Scans bytecode for 0xFC00 | index values and replaces them with actual
-        packed string addresses.
-
-        This scan is position-blind, and 0xFC is a common HIGH byte of backward
-        JUMP offsets (-769..-1024). Two guards keep it from rewriting real code:
-        * code_index_max: only indices in the ROUTINE-code namespace (an
-          ascending prefix; data-region markers allocate from 255 down) are
-          accepted. A jump offset byte pairing with a data index (e.g. 0xFC9D
-          in minizork's CLAUSE loop) is rejected outright.
-        * a match immediately preceded by the JUMP opcode 0x8C is skipped --
-          that byte is a jump offset, never a string operand.
-
-        Args:
-            routines: Routine bytecode with string placeholders
-            string_placeholders: Dict mapping placeholder index to string text
-            string_table: StringTable instance with resolved addresses
-            code_index_max: exclusive upper bound of routine-code marker indices
-
-        Returns:
-            Patched routine bytecode
-        """
-        if not string_placeholders or string_table is None:
-            return routines
-
-        result = bytearray(routines)
-
-        # Scan for 0xFC00 | index patterns (16-bit values). Match against the
-        # PRISTINE input and skip bytes earlier passes already wrote (a resolved
-        # marker address from _resolve_string_markers can contain 0xFC).
-        protected = patched_positions if patched_positions is not None else set()
-        # STRUCTURAL gate: a string operand marker can only occupy a
-        # large-constant operand slot. Inline print/print_ret z-strings (0xB2 /
-        # 0xB3) are stepped over by the walker, so their bytes -- which may
-        # legally read 0xFC1A -- can never be mistaken for a marker.
-        _allowed, _fallback = self._structural_positions(routines, True)
-        i = 0
-        while i < len(result) - 1:
-            # Check for 0xFC high byte
-            if (routines[i] == 0xFC and i not in protected
-                    and (_allowed is None
-                         or self._structural_pos_ok(i, _allowed, _fallback))):
-                placeholder_idx = routines[i + 1]
-                # A JUMP (0x8C) offset can contain 0xFC in either byte: as the
-                # HIGH byte of a backward jump (0x8C directly before the match)
-                # or as the LOW byte of a forward jump (0x8C two bytes back,
-                # e.g. zork1's `jump #02fc` in MAIN-LOOP-1) -- skip both.
-                if ((placeholder_idx in string_placeholders)
-                        and (code_index_max is None or placeholder_idx < code_index_max)
-                        and not (i >= 1 and routines[i - 1] == 0x8C)
-                        and not (i >= 2 and routines[i - 2] == 0x8C)):
-                    text = string_placeholders[placeholder_idx]
-                    # Get packed address from string table
-                    packed_addr = string_table.get_packed_address(text, self.version)
-                    if packed_addr is not None:
-                        # Patch the 16-bit address
-                        result[i] = (packed_addr >> 8) & 0xFF
-                        result[i + 1] = packed_addr & 0xFF
-                        protected.add(i)
-                        protected.add(i + 1)
-                        i += 2
-                        continue
-            i += 1
-
-        return bytes(result)
-
-    def _resolve_string_placeholders_in_story(self, story: bytearray,
-                                               string_placeholders: dict,
-                                               string_table,
-                                               start_offset: int,
-                                               length: int,
-                                               step: int = 2,
-                                               data_placeholders: dict = None,
-                                               skip_positions: set = None) -> None:
-        """
-        Resolve string operand placeholders in a section of the story file.
-
-        Scans the specified range for 0xFC00 | index values and replaces them
-        with actual packed string addresses. Modifies story in place.
-
-        Args:
-            story: Story bytearray to modify in place
-            string_placeholders: Dict mapping placeholder index to string text
-            string_table: StringTable instance with resolved addresses
-            start_offset: Start offset in story to scan
-            length: Number of bytes to scan
-        """
-        if not string_placeholders or string_table is None or length == 0:
-            return
-
-        # Scan for 0xFC00 | index patterns (16-bit values).
-        #
-        # step=2 (globals table): slots are word-aligned from the even
-        # start_offset, so a 0xFC00|idx marker's high byte is always at an EVEN
-        # position. Scanning word-aligned avoids matching a 0xFC that is merely
-        # the LOW byte of an already-resolved table address (P-OTBL legitimately
-        # resolved to 0x20FC; a byte-blind scan misread it as a placeholder and
-        # clobbered P-VTBL to 0xF010 -> "Store out of dynamic memory").
-        #
-        # step=1 (table data): tables of mixed byte/word layout make region-wide
-        # word alignment meaningless, so scan byte-by-byte there and skip past
-        # both bytes of each patched marker.
-        end_offset = min(start_offset + length, len(story) - 1)
-        data_ph = data_placeholders or {}
-        _skip = skip_positions or set()
-        i = start_offset
-        while i < end_offset:
-            if i in _skip:
-                i += step
-                continue
-            hi = story[i]
-            text = None
-            # Code-namespace marker (0xFC00|idx) or data-namespace marker
-            # (0xF400|id, high bytes 0xF4-0xF7 carrying the id's top 2 bits).
-            # The data band is only matched in WORD-ALIGNED regions (globals):
-            # a byte-stepped scan over table data rewrote packed routine
-            # addresses whose LOW byte was 0xF4-0xF7 (ACTIONS[V?PRAY]=0x46F4).
-            if hi == 0xFC:
-                text = string_placeholders.get(story[i + 1])
-            elif 0xF4 <= hi <= 0xF7 and step == 2:
-                text = data_ph.get(((hi & 0x03) << 8) | story[i + 1])
-            elif 0xF0 <= hi <= 0xF3 and step == 2:
-                # ext data-string marker (band overflow); value-keyed dict,
-                # cannot collide with routine placeholders (disjoint pools)
-                text = (getattr(self, '_string_data_ext', {}) or {}).get(
-                    (hi << 8) | story[i + 1])
-            if text is not None:
-                packed_addr = string_table.get_packed_address(text, self.version)
-                if packed_addr is not None:
-                    story[i] = (packed_addr >> 8) & 0xFF
-                    story[i + 1] = packed_addr & 0xFF
-                    i += 2
-                    continue
-            i += step
-
-    def _structural_positions(self, blob, include_print_paddr=False):
-        """(allowed_positions, fallback_ranges) for the routines blob via the
-        codegen instruction walker, or (None, None) when structure is
-        unavailable. Positions gate the 0xFB scans STRUCTURALLY: only a 2-byte
-        large-constant operand may hold a vocab placeholder (an infidel call
-        placeholder's argument bytes previously false-matched)."""
-        offs_map = getattr(self, '_routine_offsets_map', None)
-        code_len = getattr(self, '_codegen_code_len', None)
-        if not offs_map or code_len is None or code_len != len(blob):
-            return None, None
-        from ..codegen.codegen_improved import (_walk_large_const_positions,
-                                                _PlaceholderScanDesync)
-        offs = sorted(set(offs_map.values()))
-        if not offs:
-            return None, None
-        allowed = set()
-        fallback = []
-        n = len(blob)
-        for idx, r in enumerate(offs):
-            if r >= n:
-                continue
-            end = offs[idx + 1] if idx + 1 < len(offs) else n
-            nl = blob[r]
-            cs = r + 1 + (2 * nl if self.version <= 4 else 0)
-            if nl > 15 or cs > end:
-                fallback.append((r, end))
-                continue
-            chunk = bytes(blob[cs:end])
-            try:
-                pos = _walk_large_const_positions(chunk, self.version,
-                                                  include_print_paddr)
-            except _PlaceholderScanDesync:
-                # A routine chunk runs up to the NEXT routine's start, so it
-                # includes the inter-routine alignment padding (routines pack
-                # on a 2-byte boundary in V1-3, 4 in V4-7, 8 in V8): up to
-                # align-1 trailing 0x00 pad bytes follow the last instruction.
-                # rstrip'ing ALL trailing zeros over-peeled a genuine 0x00
-                # operand byte (FAR-AWAY?'s closing `ret stack` = AB 00),
-                # desynced again, and dropped the whole routine into the coarse
-                # fallback range -- which then let the blind 0xFC string scan
-                # false-match a small-constant operand that read 0xFC (an object
-                # number of 252) and clobber the following branch byte. Peel
-                # only the contiguous 0x00 padding, one byte at a time.
-                align = 8 if self.version >= 8 else (4 if self.version >= 4 else 2)
-                pos = None
-                _strip = 1
-                while (_strip < align and _strip <= len(chunk)
-                       and chunk[-_strip] == 0):
-                    try:
-                        pos = _walk_large_const_positions(
-                            chunk[:-_strip], self.version, include_print_paddr)
-                        break
-                    except _PlaceholderScanDesync:
-                        pos = None
-                    _strip += 1
-                if pos is None:
-                    fallback.append((cs, end))
-                    continue
-            for p in pos:
-                allowed.add(cs + p)
-        return allowed, fallback
-
-    @staticmethod
-    def _structural_pos_ok(i, allowed, fallback):
-        if i in allowed:
-            return True
-        for a, b in fallback:
-            if a <= i < b:
-                return True
-        return False
-
-    def _resolve_vocab_placeholders(self, routines, vocab_fixups, dict_addr,
-                                    protected_positions=None):
-        if not vocab_fixups:
-            return routines
-        allowed, fallback = self._structural_positions(routines)
-        if allowed is None:
-            return self._resolve_vocab_placeholders_legacy(
-                routines, vocab_fixups, dict_addr, protected_positions)
-        result = bytearray(routines)
-        protected = protected_positions if protected_positions is not None else set()
-        fixup_map = {}
-        for placeholder_idx, word_offset in vocab_fixups:
-            fixup_map[placeholder_idx] = dict_addr + word_offset
-        i = 0
-        while i < len(result) - 1:
-            if (routines[i] == 0xFB and i not in protected
-                    and self._structural_pos_ok(i, allowed, fallback)
-                    and not (i >= 1 and routines[i - 1] == 0x8C)
-                    and not (i >= 2 and routines[i - 2] == 0x8C)):
-                placeholder_idx = routines[i + 1]
-                if placeholder_idx in fixup_map:
-                    word_addr = fixup_map[placeholder_idx]
-                    result[i] = (word_addr >> 8) & 0xFF
-                    result[i + 1] = word_addr & 0xFF
-                    protected.add(i)
-                    protected.add(i + 1)
-                    i += 2
-                    continue
-            i += 1
-        return bytes(result)
-
-    def _resolve_vword_placeholders(self, routines, vword_fixups, table_base_addr,
-                                    table_offsets, protected_positions=None):
-        if not vword_fixups:
-            return routines
-        allowed, fallback = self._structural_positions(routines)
-        if allowed is None:
-            return self._resolve_vword_placeholders_legacy(
-                routines, vword_fixups, table_base_addr, table_offsets,
-                protected_positions)
-        result = bytearray(routines)
-        protected = protected_positions if protected_positions is not None else set()
-        fixup_map = {}
-        for placeholder_idx, table_index in vword_fixups:
-            if table_index in table_offsets:
-                fixup_map[placeholder_idx] = self._table_data_addr(
-                    table_base_addr, table_offsets[table_index])
-        i = 0
-        while i < len(result) - 1:
-            if (routines[i] == 0xFB and i not in protected
-                    and self._structural_pos_ok(i, allowed, fallback)
-                    and not (i >= 1 and routines[i - 1] == 0x8C)
-                    and not (i >= 2 and routines[i - 2] == 0x8C)):
-                placeholder_idx = routines[i + 1]
-                if placeholder_idx in fixup_map:
-                    table_addr = fixup_map[placeholder_idx]
-                    result[i] = (table_addr >> 8) & 0xFF
-                    result[i + 1] = table_addr & 0xFF
-                    protected.add(i)
-                    protected.add(i + 1)
-                    i += 2
-                    continue
-            i += 1
-        return bytes(result)
-
-    def _resolve_vocab_placeholders_legacy(self, routines: bytes, vocab_fixups: list,
-                                       dict_addr: int, protected_positions: set = None) -> bytes:
-        """
-        Resolve vocabulary word placeholders (W?*) in routine bytecode.
-
-        Scans bytecode for 0xFB00 | index values and replaces them with actual
-        dictionary word addresses.
-
-        Args:
-            routines: Routine bytecode with vocab placeholders
-            vocab_fixups: List of (placeholder_idx, word_offset) tuples
-            dict_addr: Base address of dictionary in story file
-            protected_positions: Byte offsets already resolved as routine-call
-                operands. This scan is position-BLIND, so a routine whose packed
-                address happens to contain 0xFB (e.g. LIT? at packed 0x39FB) would
-                otherwise have that byte misread as a vocab placeholder and
-                clobbered, silently redirecting every call to it. Skipping the
-                bytes routine fixups already wrote prevents that collision.
-
-        Returns:
-            Patched routine bytecode
-        """
-        if not vocab_fixups:
-            return routines
-
-        result = bytearray(routines)
-        protected = protected_positions if protected_positions is not None else set()
-
-        # Build a map from placeholder_idx to word address
-        fixup_map = {}
-        for placeholder_idx, word_offset in vocab_fixups:
-            # Word offset is relative to dictionary data start
-            # Final address is dict_addr + word_offset
-            word_addr = dict_addr + word_offset
-            fixup_map[placeholder_idx] = word_addr
-
-        # Scan for 0xFB00 | index patterns (16-bit values). Match against the
-        # PRISTINE input (routines), never the partially patched result: a
-        # resolved word address can itself contain 0xFB as its LOW byte (zork1's
-        # '"' entry landed at dict 0x3EFB), and rescanning our own write made
-        # the scanner read that 0xFB plus the following je branch byte as a
-        # fresh placeholder, corrupting both the operand and the branch.
-        # Patched positions join `protected` so the vword pass below can't
-        # misread the bytes this pass wrote.
-        i = 0
-        while i < len(result) - 1:
-            # Skip 0xFB bytes that are JUMP (0x8C) offset bytes, not
-            # placeholders (either byte of the 16-bit offset can be 0xFB).
-            if (routines[i] == 0xFB and i not in protected
-                    and not (i >= 1 and routines[i - 1] == 0x8C)
-                    and not (i >= 2 and routines[i - 2] == 0x8C)):
-                placeholder_idx = routines[i + 1]
-                if placeholder_idx in fixup_map:
-                    word_addr = fixup_map[placeholder_idx]
-                    result[i] = (word_addr >> 8) & 0xFF
-                    result[i + 1] = word_addr & 0xFF
-                    protected.add(i)
-                    protected.add(i + 1)
-                    i += 2
-                    continue
-            i += 1
-
-        return bytes(result)
-
-    def _resolve_vword_placeholders_legacy(self, routines: bytes, vword_fixups: list,
-                                     table_base_addr: int, table_offsets: dict,
-                                     protected_positions: set = None) -> bytes:
-        """
-        Resolve VWORD table placeholders (W?*) in routine bytecode.
-
-        Similar to _resolve_vocab_placeholders, but resolves to table addresses
-        instead of dictionary addresses. Used in NEW-PARSER? mode.
-
-        Args:
-            routines: Routine bytecode with vocab placeholders
-            vword_fixups: List of (placeholder_idx, table_index) tuples
-            table_base_addr: Base address where tables are placed in memory
-            table_offsets: Dict mapping table index to offset within table data
-
-        Returns:
-            Patched routine bytecode
-        """
-        if not vword_fixups:
-            return routines
-
-        result = bytearray(routines)
-        protected = protected_positions if protected_positions is not None else set()
-
-        # Build a map from placeholder_idx to VWORD table address
-        fixup_map = {}
-        for placeholder_idx, table_index in vword_fixups:
-            if table_index in table_offsets:
-                table_addr = self._table_data_addr(
-                    table_base_addr, table_offsets[table_index])
-                fixup_map[placeholder_idx] = table_addr
-
-        # Scan for 0xFB00 | index patterns (16-bit values). Skip bytes already
-        # written as routine-call or vocab operands, match against the pristine
-        # input, and never rescan a just-written low byte (see
-        # _resolve_vocab_placeholders for the zork1 0x3EFB collision).
-        i = 0
-        while i < len(result) - 1:
-            if (routines[i] == 0xFB and i not in protected
-                    and not (i >= 1 and routines[i - 1] == 0x8C)
-                    and not (i >= 2 and routines[i - 2] == 0x8C)):
-                placeholder_idx = routines[i + 1]
-                if placeholder_idx in fixup_map:
-                    table_addr = fixup_map[placeholder_idx]
-                    result[i] = (table_addr >> 8) & 0xFF
-                    result[i + 1] = table_addr & 0xFF
-                    protected.add(i)
-                    protected.add(i + 1)
-                    i += 2
-                    continue
-            i += 1
-
-        return bytes(result)
-
-    def _resolve_table_vocab_placeholders(self, table_data: bytes,
-                                           vocab_fixups: list,
-                                           dict_addr: int,
-                                           protected_positions: set = None) -> bytes:
-        """
-        Resolve vocabulary word placeholders in table data.
-
-        Scans table data for 0xFB00 | index values and replaces them with
-        actual dictionary word addresses.
-
-        Args:
-            table_data: Table data with vocab placeholders
-            vocab_fixups: List of (placeholder_idx, word_offset) tuples
-            dict_addr: Base address of dictionary in story file
-
-        Returns:
-            Patched table data
-        """
-        if not vocab_fixups or not table_data:
-            return table_data
-
-        result = bytearray(table_data)
-        protected = protected_positions if protected_positions is not None else set()
-
-        # Build a map from placeholder_idx to word address
-        fixup_map = {}
-        for placeholder_idx, word_offset in vocab_fixups:
-            word_addr = dict_addr + word_offset
-            fixup_map[placeholder_idx] = word_addr
-
-        # Only indices actually EMITTED into table data may match here.
-        # Code-emitted indices are resolved by the code passes; letting them
-        # match table bytes turned CPEXITS's '-5, P?NW' word pair into a
-        # dictionary address (zork3 Royal Puzzle).
-        _tv = getattr(self, '_table_vocab_indices', None)
-        if _tv is not None:
-            fixup_map = {k: v for k, v in fixup_map.items() if k in _tv}
-
-        # Scan for 0xFB00 | index patterns against the PRISTINE input, skipping
-        # positions the vword pass already patched, and never rescanning our own
-        # writes (see _resolve_vocab_placeholders for the 0x3EFB collision).
-        i = 0
-        while i < len(result) - 1:
-            if table_data[i] == 0xFB and i not in protected:
-                placeholder_idx = table_data[i + 1]
-                if placeholder_idx in fixup_map:
-                    word_addr = fixup_map[placeholder_idx]
-                    result[i] = (word_addr >> 8) & 0xFF
-                    result[i + 1] = word_addr & 0xFF
-                    protected.add(i)
-                    protected.add(i + 1)
-                    i += 2
-                    continue
-            i += 1
-
-        return bytes(result)
-
-    def _resolve_table_vword_placeholders(self, table_data: bytes,
-                                          vword_fixups: list,
-                                          table_base_addr: int,
-                                          table_offsets: dict,
-                                          protected_positions: set = None) -> bytes:
-        """
-        Resolve VWORD table placeholders in table data.
-
-        Similar to _resolve_table_vocab_placeholders, but resolves to VWORD
-        table addresses instead of dictionary addresses. Used in NEW-PARSER? mode.
-
-        Args:
-            table_data: Table data with vocab placeholders
-            vword_fixups: List of (placeholder_idx, table_index) tuples
-            table_base_addr: Base address of tables in story file
-            table_offsets: Dict of table_index -> offset from table_base_addr
-
-        Returns:
-            Patched table data
-        """
-        if not vword_fixups or not table_data:
-            return table_data
-
-        result = bytearray(table_data)
-        protected = protected_positions if protected_positions is not None else set()
-
-        # Build a map from placeholder_idx to VWORD table address
-        fixup_map = {}
-        for placeholder_idx, table_index in vword_fixups:
-            if table_index in table_offsets:
-                table_addr = self._table_data_addr(
-                    table_base_addr, table_offsets[table_index])
-                fixup_map[placeholder_idx] = table_addr
-
-        # Scan for 0xFB00 | index patterns against the PRISTINE input and never
-        # rescan our own writes (see _resolve_vocab_placeholders).
-        i = 0
-        while i < len(result) - 1:
-            if table_data[i] == 0xFB and i not in protected:
-                placeholder_idx = table_data[i + 1]
-                if placeholder_idx in fixup_map:
-                    table_addr = fixup_map[placeholder_idx]
-                    result[i] = (table_addr >> 8) & 0xFF
-                    result[i + 1] = table_addr & 0xFF
-                    protected.add(i)
-                    protected.add(i + 1)
-                    i += 2
-                    continue
-            i += 1
-
-        return bytes(result)
-
-    def _resolve_vocab_placeholders_in_story(self, story: bytearray,
-                                              vocab_fixups: list,
-                                              dict_addr: int,
-                                              start_offset: int,
-                                              length: int,
-                                              skip_positions: set = None) -> None:
-        """
-        Resolve vocabulary word placeholders in a section of the story file.
-
-        Scans the specified range for 0xFB00 | index values and replaces them
-        with actual dictionary word addresses. Modifies story in place.
-
-        Args:
-            story: Story bytearray to modify in place
-            vocab_fixups: List of (placeholder_idx, word_offset) tuples
-            dict_addr: Base address of dictionary in story file
-            start_offset: Start offset in story to scan
-            length: Number of bytes to scan
-        """
-        if not vocab_fixups:
-            return
-
-        # Build a map from placeholder_idx to word address
-        fixup_map = {}
-        for placeholder_idx, word_offset in vocab_fixups:
-            word_addr = dict_addr + word_offset
-            fixup_map[placeholder_idx] = word_addr
-
-        # Scan for 0xFB00 | index patterns. WORD-ALIGNED: the globals region is
-        # 2-byte slots, and a byte-blind scan matched the LOW byte of an
-        # already-resolved table address (OOPS-INBUF's 0x1FFB) and rewrote it to
-        # a dictionary address, shrinking the OOPS buffer pointer so the input
-        # buffer copy overran into P-INBUF and every 2nd command read empty.
-        _skip = skip_positions if skip_positions is not None else set()
-        end_offset = min(start_offset + length, len(story) - 1)
-        i = start_offset
-        while i < end_offset:
-            if story[i] == 0xFB and i not in _skip:
-                placeholder_idx = story[i + 1]
-                if placeholder_idx in fixup_map:
-                    word_addr = fixup_map[placeholder_idx]
-                    story[i] = (word_addr >> 8) & 0xFF
-                    story[i + 1] = word_addr & 0xFF
-                    # Record the write: a resolved dictionary address is
-                    # legal data that can alias later scans' marker bands
-                    # (0xF4-0xF7 string band etc.).
-                    _skip.add(i)
-            i += 2
-
-    def _resolve_vword_placeholders_in_story(self, story: bytearray,
-                                              vword_fixups: list,
-                                              table_base_addr: int,
-                                              table_offsets: dict,
-                                              start_offset: int,
-                                              length: int,
-                                              skip_positions: set = None) -> None:
-        """
-        Resolve VWORD table placeholders in a section of the story file.
-
-        Similar to _resolve_vocab_placeholders_in_story, but resolves to
-        table addresses instead of dictionary addresses. Used in NEW-PARSER? mode.
-
-        Args:
-            story: Story bytearray to modify in place
-            vword_fixups: List of (placeholder_idx, table_index) tuples
-            table_base_addr: Base address where tables are placed in memory
-            table_offsets: Dict mapping table index to offset within table data
-            start_offset: Start offset in story to scan
-            length: Number of bytes to scan
-        """
-        if not vword_fixups:
-            return
-
-        # Build a map from placeholder_idx to VWORD table address
-        fixup_map = {}
-        for placeholder_idx, table_index in vword_fixups:
-            if table_index in table_offsets:
-                table_addr = self._table_data_addr(
-                    table_base_addr, table_offsets[table_index])
-                fixup_map[placeholder_idx] = table_addr
-
-        # Scan for 0xFB00 | index patterns (16-bit values)
-        _skip = skip_positions if skip_positions is not None else set()
-        end_offset = min(start_offset + length, len(story) - 1)
-        i = start_offset
-        while i < end_offset:
-            if story[i] == 0xFB and i not in _skip:
-                placeholder_idx = story[i + 1]
-                if placeholder_idx in fixup_map:
-                    table_addr = fixup_map[placeholder_idx]
-                    story[i] = (table_addr >> 8) & 0xFF
-                    story[i + 1] = table_addr & 0xFF
-                    _skip.add(i)
-            i += 1
-
-    def _resolve_dict_placeholders(self, objects_data: bytes, dict_addr: int,
-                                     prop_defaults_size: int,
-                                     vocab_fixups: list = None,
-                                     dir_prop_min: int = None,
-                                     prop_dict_fixups: list = None) -> bytes:
-        """
-        Resolve dictionary word placeholders in object property tables.
-
-        Scans property DATA (not names) for values marked with 0x8000 (SYNONYM),
-        0xFE00 (ADJECTIVE), or 0xFB00 (VOC from PROPDEF) high bits and replaces
-        them with dictionary addresses.
-
-        Args:
-            objects_data: Object table data with property tables
-            dict_addr: Base address of dictionary in story file
-            prop_defaults_size: Size of property defaults table in bytes
-            vocab_fixups: List of (placeholder_idx, word_offset) for VOC placeholders
-
-        Returns:
-            Modified object data with dictionary addresses resolved
-        """
-        result = bytearray(objects_data)
-
-        # Byte offsets (within the objects blob) that THIS pass resolves to
-        # real dictionary addresses. A resolved address is legal data that can
-        # land in ANY in-band marker range -- trinity's 'walkie' entry at
-        # 0xF5AE matched the 0xF4-0xF7 data-string band and the property
-        # string scan rewrote it to a packed string address, so 'drop walkie'
-        # resolved to garbage. Every later property scan must skip these.
-        patched = set()
-        self._prop_dict_patched = patched
-
-        # POSITIONAL dict-word patches (obj_num, prop_num, byte_off,
-        # word_offset), recorded at emission. These replace the SYNONYM marker
-        # scan entirely: in-band 0x8000|offset markers both truncated large
-        # dictionaries (zork1) and false-matched neighboring object-number
-        # bytes (minizork's GLOBAL prop 9a 8f).
-        if prop_dict_fixups:
-            obj_entry_sz = 9 if self.version <= 3 else 14
-            for obj_idx, prop_num, byte_off, word_offset in prop_dict_fixups:
-                # obj_idx is the 0-based object index from the compiler's
-                # emission loop (object number minus 1).
-                entry = prop_defaults_size + obj_idx * obj_entry_sz
-                ptr_at = entry + obj_entry_sz - 2
-                if ptr_at + 1 >= len(result):
-                    continue
-                pt = (result[ptr_at] << 8) | result[ptr_at + 1]
-                if pt >= len(result):
-                    continue
-                p = pt + 1 + 2 * result[pt]  # skip short-name
-                while p < len(result) and result[p] != 0:
-                    sz = result[p]
-                    if self.version <= 3:
-                        dlen = (sz >> 5) + 1
-                        pn = sz & 0x1F
-                        p += 1
-                    else:
-                        if sz & 0x80:
-                            dlen = result[p + 1] & 0x3F or 64
-                            pn = sz & 0x3F
-                            p += 2
-                        else:
-                            dlen = 2 if (sz & 0x40) else 1
-                            pn = sz & 0x3F
-                            p += 1
-                    if pn == prop_num:
-                        j = p + byte_off
-                        if j + 1 < len(result):
-                            addr = dict_addr + word_offset
-                            result[j] = (addr >> 8) & 0xFF
-                            result[j + 1] = addr & 0xFF
-                            patched.add(j)
-                            patched.add(j + 1)
-                        break
-                    p += dlen
-
-        # Build lookup for vocab fixups: idx -> word_offset
-        vocab_lookup = {}
-        if vocab_fixups:
-            for idx, word_offset in vocab_fixups:
-                vocab_lookup[idx] = word_offset
-
-        # Property tables start after property defaults and object entries
+    def _packed_routine_addr(self, routine_offset: int) -> int:
+        """Packed address of the routine at `routine_offset` in the code."""
+        actual_addr = self.high_mem_base + routine_offset
         if self.version <= 3:
-            obj_entry_size = 9
-        else:
-            obj_entry_size = 14
-
-        if len(result) <= prop_defaults_size + obj_entry_size:
-            return bytes(result)
-
-        # Get first property table address
-        prop_addr_offset = prop_defaults_size + obj_entry_size - 2
-        first_prop_offset = struct.unpack('>H', result[prop_addr_offset:prop_addr_offset+2])[0]
-
-        # Process each property table by properly parsing its structure
-        i = first_prop_offset
-        while i < len(result):
-            if i >= len(result):
-                break
-
-            # Read name length (in words)
-            name_len = result[i]
-            i += 1
-
-            # Skip over the name bytes (name_len * 2 bytes for 16-bit words)
-            i += name_len * 2
-
-            # Now process properties until terminator (0x00)
-            while i < len(result) and result[i] != 0x00:
-                size_byte = result[i]
-                i += 1
-
-                if self.version <= 3:
-                    # V1-3: size byte = 32 * (len - 1) + prop_num
-                    data_len = (size_byte >> 5) + 1
-                else:
-                    # V4+: more complex encoding
-                    if size_byte & 0x80:
-                        # Two size bytes
-                        if i >= len(result):
-                            break
-                        size_byte2 = result[i]
-                        i += 1
-                        data_len = size_byte2 & 0x3F
-                        if data_len == 0:
-                            data_len = 64  # Special case
-                    else:
-                        # Single size byte
-                        data_len = 2 if (size_byte & 0x40) else 1
-
-                # Scan property DATA for placeholders (aligned to 2-byte boundaries)
-                prop_end = i + data_len
-                # Direction (exit) properties hold raw room/object/flag bytes, not
-                # dict-word placeholders. A CEXIT like [room=0x8n, flag#] forms a
-                # word that LOOKS like a 0x8000|offset SYNONYM marker and would be
-                # rewritten to a dictionary address, corrupting the exit. Skip them.
-                if (dir_prop_min is not None and self.version <= 3
-                        and (size_byte & 0x1F) >= dir_prop_min):
-                    i = prop_end
-                    continue
-                j = i
-                while j + 1 < prop_end and j + 1 < len(result):
-                    # Never rescan a position this pass already resolved --
-                    # a patched dictionary address can alias any marker band.
-                    if j in patched:
-                        j += 2
-                        continue
-                    word = (result[j] << 8) | result[j + 1]
-
-                    # Check for SYNONYM placeholder: 0x8000 | word_offset.
-                    # Skipped when positional prop_dict_fixups were supplied --
-                    # those patches are authoritative and scanning is both
-                    # truncation-prone and false-positive-prone.
-                    if (word & 0xF000) == 0x8000 and not prop_dict_fixups:
-                        word_offset = word & 0x0FFF
-                        actual_addr = dict_addr + word_offset
-                        result[j] = (actual_addr >> 8) & 0xFF
-                        result[j + 1] = actual_addr & 0xFF
-                        patched.add(j)
-                        patched.add(j + 1)
-                        j += 2
-                    # Check for ADJECTIVE placeholder: 0xFE00 | word_offset
-                    elif (word & 0xFF00) == 0xFE00:
-                        word_offset = word & 0x00FF
-                        actual_addr = dict_addr + word_offset
-                        result[j] = (actual_addr >> 8) & 0xFF
-                        result[j + 1] = actual_addr & 0xFF
-                        patched.add(j)
-                        patched.add(j + 1)
-                        j += 2
-                    # Check for VOC placeholder from PROPDEF: 0xFB00 | placeholder_idx
-                    elif (word & 0xFF00) == 0xFB00:
-                        placeholder_idx = word & 0x00FF
-                        if placeholder_idx in vocab_lookup:
-                            word_offset = vocab_lookup[placeholder_idx]
-                            actual_addr = dict_addr + word_offset
-                            result[j] = (actual_addr >> 8) & 0xFF
-                            result[j + 1] = actual_addr & 0xFF
-                            patched.add(j)
-                            patched.add(j + 1)
-                        j += 2
-                    else:
-                        j += 2  # Move by words in property data
-
-                i = prop_end
-
-            # Skip terminator
-            if i < len(result) and result[i] == 0x00:
-                i += 1
-
-        return bytes(result)
-
-    def _resolve_string_placeholders_in_properties(self, story: bytearray,
-                                                    objects_addr: int,
-                                                    objects_len: int,
-                                                    prop_defaults_size: int,
-                                                    string_placeholders: dict,
-                                                    string_table,
-                                                    data_placeholders: dict = None,
-                                                    skip_positions: set = None) -> None:
-        """Resolve 0xFC00|idx string markers inside object PROPERTY data.
-
-        Classic direction exits (NEXIT/CEXIT/DEXIT) embed the packed address of
-        their refusal message in the property; the marker can only be resolved
-        after the string table is placed, so this walks the property tables in
-        the assembled story (addresses already absolute) and patches in place.
-        """
-        if not string_placeholders or string_table is None:
-            return
-
-        data_ph = data_placeholders or {}
-        _skip = skip_positions or ()
-
-        def patch(j):
-            # Positions already resolved to real addresses (dict words,
-            # routine addresses) are legal data, not markers.
-            if j in _skip:
-                return None
-            hi = story[j]
-            if hi == 0xFC:
-                text = string_placeholders.get(story[j + 1])
-            elif 0xF4 <= hi <= 0xF7:
-                text = data_ph.get(((hi & 0x03) << 8) | story[j + 1])
-            elif 0xF0 <= hi <= 0xF3:
-                text = (getattr(self, '_string_data_ext', {}) or {}).get(
-                    (hi << 8) | story[j + 1])
-            else:
-                return None
-            if text is None:
-                return None
-            return string_table.get_packed_address(text, self.version)
-
-        self._walk_property_data(story, objects_addr, objects_len,
-                                 prop_defaults_size, patch)
-
-    def _walk_property_data(self, story: bytearray, objects_addr: int,
-                            objects_len: int, prop_defaults_size: int,
-                            patch_fn) -> None:
-        """Walk every object's property DATA (never names, entries, or defaults)
-        and let patch_fn replace 16-bit marker words.
-
-        patch_fn(j) inspects story[j], story[j+1] (a word-aligned position within
-        one property's data) and returns a 16-bit value to write there, or None.
-        Walking per-object via each entry's own table pointer is the ONLY safe
-        iteration: sequential region scans desync on layout and byte-blind scans
-        rewrite entry pointers / name z-text whose bytes look like markers.
-        """
-        obj_entry_size = 9 if self.version <= 3 else 14
-        region_end = min(objects_addr + objects_len, len(story))
-        entries_base = objects_addr + prop_defaults_size
-        first_prop = entries_base + obj_entry_size - 2
-        if first_prop + 2 > len(story):
-            return
-        lowest_table = (story[first_prop] << 8) | story[first_prop + 1]
-        num_objects = max(0, (lowest_table - entries_base) // obj_entry_size)
-        # Clamp: with no real objects the "first property pointer" is garbage.
-        num_objects = min(num_objects, max(0, (region_end - entries_base) // obj_entry_size))
-        for n in range(num_objects):
-            pptr = entries_base + n * obj_entry_size + obj_entry_size - 2
-            if pptr + 1 >= len(story):
-                break
-            i = (story[pptr] << 8) | story[pptr + 1]
-            if not (objects_addr < i < region_end):
-                continue
-            name_len = story[i]
-            i += 1 + name_len * 2
-            while i < region_end and story[i] != 0x00:
-                size_byte = story[i]
-                i += 1
-                if self.version <= 3:
-                    data_len = (size_byte >> 5) + 1
-                else:
-                    if size_byte & 0x80:
-                        data_len = story[i] & 0x3F or 64
-                        i += 1
-                    else:
-                        data_len = 2 if (size_byte & 0x40) else 1
-                j = i
-                while j + 1 < i + data_len and j + 1 < region_end:
-                    val = patch_fn(j)
-                    if val is not None:
-                        story[j] = (val >> 8) & 0xFF
-                        story[j + 1] = val & 0xFF
-                    j += 2
-                i += data_len
-
-    def _resolve_property_routine_placeholders(self, objects_data: bytes,
-                                                property_routine_fixups: list,
-                                                high_mem_base: int,
-                                                prop_defaults_size: int) -> bytes:
-        """
-        Resolve routine address placeholders in object property tables.
-
-        Scans property DATA for values marked with 0xFA00 prefix and replaces
-        them with packed routine addresses.
+            return actual_addr // 2
+        if self.version <= 5:
+            return actual_addr // 4
+        if self.version <= 7:
+            # V6-7 use routines_offset, with 4-byte padding before first routine
+            return (4 + routine_offset) // 4
+        return actual_addr // 8
+
+    def apply_relocations(self, section: bytes, relocations: list,
+                          string_table=None, vocab_addr=None,
+                          table_addr=None, dict_addr: int = None) -> bytes:
+        """
+        Patch the address each relocation names into `section`.
+
+        One pass over the relocations; no other byte of the section is
+        read, so nothing that merely looks like a placeholder is touched.
+        A relocation whose target cannot be resolved (no string table, an
+        unknown vocabulary index or table) leaves its bytes as they are and
+        is added to unresolved_relocations.
 
         Args:
-            objects_data: Object table data with property tables
-            property_routine_fixups: List of (placeholder_idx, routine_byte_offset) tuples
-            high_mem_base: Base address of high memory where routines start
-            prop_defaults_size: Size of property defaults table in bytes
+            section: Bytes of the section the relocations point into
+            relocations: Relocation records (see relocations.py)
+            string_table: StringTable with resolved addresses, for STRING
+            vocab_addr: Callable mapping a vocab index to its address, for VOCAB
+            table_addr: Callable mapping a table index to its address, for TABLE
+            dict_addr: Dictionary address, for DICT
 
         Returns:
-            Modified object data with routine addresses resolved
-        """
-        if not property_routine_fixups:
-            return objects_data
-
-        result = bytearray(objects_data)
-
-        # Build lookup: placeholder_idx -> packed_routine_address
-        fixup_map = {}
-        for placeholder_idx, routine_offset in property_routine_fixups:
-            # Calculate actual byte address of routine
-            actual_addr = high_mem_base + routine_offset
-
-            # Convert to packed address based on version
-            if self.version <= 3:
-                packed_addr = actual_addr // 2
-            elif self.version <= 5:
-                packed_addr = actual_addr // 4
-            elif self.version <= 7:
-                # V6-7 use routines_offset (assume 0 for now)
-                packed_addr = actual_addr // 4
+            Patched section bytes
+        """
+        result = bytearray(section)
+        for reloc in relocations:
+            addr = None
+            if reloc.kind == ROUTINE:
+                addr = self._packed_routine_addr(reloc.target)
+            elif reloc.kind == STRING:
+                if string_table is not None:
+                    addr = string_table.get_packed_address(reloc.target, self.version)
+            elif reloc.kind == VOCAB:
+                if vocab_addr is not None:
+                    addr = vocab_addr(reloc.target)
+            elif reloc.kind == TABLE:
+                if table_addr is not None:
+                    addr = table_addr(reloc.target)
+            elif reloc.kind == DICT:
+                if dict_addr is not None:
+                    addr = dict_addr + reloc.target
             else:
-                packed_addr = actual_addr // 8
-
-            fixup_map[placeholder_idx] = packed_addr
-
-        # Property tables start after property defaults and object entries
-        if self.version <= 3:
-            obj_entry_size = 9
-        else:
-            obj_entry_size = 14
-
-        if len(result) <= prop_defaults_size + obj_entry_size:
-            return bytes(result)
-
-        # Get first property table address
-        prop_addr_offset = prop_defaults_size + obj_entry_size - 2
-        first_prop_offset = struct.unpack('>H', result[prop_addr_offset:prop_addr_offset+2])[0]
-
-        # Scan property tables for 0xFA placeholders
-        i = first_prop_offset
-        while i < len(result) - 1:
-            if i >= len(result):
-                break
-
-            # Check for property header (size/number byte)
-            size_num = result[i]
-            if size_num == 0x00:
-                # End of properties for this object, move to next
-                i += 1
+                raise ValueError(f"unknown relocation kind {reloc.kind!r}")
+            if addr is None:
+                self.unresolved_relocations.append(reloc)
                 continue
-
-            # Parse property header based on version
-            if self.version <= 3:
-                prop_size = ((size_num >> 5) & 0x07) + 1
-                prop_start = i + 1
-                prop_end = prop_start + prop_size
-            else:
-                if size_num & 0x80:
-                    # Two-byte header
-                    if i + 1 >= len(result):
-                        break
-                    size_byte = result[i + 1]
-                    prop_size = size_byte & 0x3F
-                    if prop_size == 0:
-                        prop_size = 64
-                    prop_start = i + 2
-                else:
-                    # One-byte header
-                    prop_size = ((size_num >> 6) & 0x01) + 1
-                    prop_start = i + 1
-                prop_end = prop_start + prop_size
-
-            # Scan property data for 0xFA placeholders (word-aligned)
-            j = prop_start
-            while j < prop_end - 1 and j < len(result) - 1:
-                if result[j] == 0xFA:
-                    placeholder_idx = result[j + 1]
-                    if placeholder_idx in fixup_map:
-                        packed_addr = fixup_map[placeholder_idx]
-                        result[j] = (packed_addr >> 8) & 0xFF
-                        result[j + 1] = packed_addr & 0xFF
-                        j += 2  # Skip the word we just patched
-                        continue
-                j += 1
-
-            i = prop_end
-
-        return bytes(result)
-
-    def _resolve_property_table_placeholders(self, objects_data: bytes,
-                                              table_offsets: dict,
-                                              tables_base: int,
-                                              prop_defaults_size: int) -> bytes:
-        """
-        Resolve table address placeholders in object property tables.
-
-        Scans property DATA for values marked with 0xFD00 prefix and replaces
-        them with actual table addresses.
-
-        Args:
-            objects_data: Object table data with property tables
-            table_offsets: Dict mapping table index to offset within table data
-            tables_base: Base address of tables in story file
-            prop_defaults_size: Size of property defaults table in bytes
-
-        Returns:
-            Modified object data with table addresses resolved
-        """
-        if not table_offsets:
-            return objects_data
-
-        result = bytearray(objects_data)
-
-        # Property tables start after property defaults and object entries
-        if self.version <= 3:
-            obj_entry_size = 9
-        else:
-            obj_entry_size = 14
-
-        if len(result) <= prop_defaults_size + obj_entry_size:
-            return bytes(result)
-
-        # Get first property table address
-        prop_addr_offset = prop_defaults_size + obj_entry_size - 2
-        first_prop_offset = struct.unpack('>H', result[prop_addr_offset:prop_addr_offset+2])[0]
-
-        # Process each property table by properly parsing its structure
-        i = first_prop_offset
-        while i < len(result):
-            if i >= len(result):
-                break
-
-            # Read name length (in words)
-            name_len = result[i]
-            i += 1
-
-            # Skip over the name bytes (name_len * 2 bytes for 16-bit words)
-            i += name_len * 2
-
-            # Now process properties until terminator (0x00)
-            while i < len(result) and result[i] != 0x00:
-                size_byte = result[i]
-                i += 1
-
-                if self.version <= 3:
-                    # V1-3: size byte = 32 * (len - 1) + prop_num
-                    data_len = (size_byte >> 5) + 1
-                else:
-                    # V4+: more complex encoding
-                    if size_byte & 0x80:
-                        # Two size bytes
-                        if i >= len(result):
-                            break
-                        size_byte2 = result[i]
-                        i += 1
-                        data_len = size_byte2 & 0x3F
-                        if data_len == 0:
-                            data_len = 64  # Special case
-                    else:
-                        # Single size byte
-                        data_len = 2 if (size_byte & 0x40) else 1
-
-                # Scan property DATA for 0xFD00 table address placeholders
-                prop_end = i + data_len
-                j = i
-                _dict_patched = getattr(self, '_prop_dict_patched', None) or ()
-                while j + 1 < prop_end and j + 1 < len(result):
-                    # Skip positions the dict-word pass resolved -- a real
-                    # dictionary address can alias the 0xFD/0xF9 bands.
-                    if j in _dict_patched:
-                        j += 2
-                        continue
-                    word = (result[j] << 8) | result[j + 1]
-
-                    # Check for table address placeholder: 0xFD00 | table_idx
-                    # (0xF900|(idx-256) = ext band for prop-table idx 256..511)
-                    if (word & 0xFF00) in (0xFD00, 0xF900):
-                        table_idx = (word & 0x00FF) + (0x100 if (word & 0xFF00) == 0xF900 else 0)
-                        if table_idx in table_offsets:
-                            table_offset = table_offsets[table_idx]
-                            actual_addr = self._table_data_addr(
-                                tables_base, table_offset)
-                            result[j] = (actual_addr >> 8) & 0xFF
-                            result[j + 1] = actual_addr & 0xFF
-                        j += 2
-                    else:
-                        j += 2  # Move by words in property data
-
-                i = prop_end
-
-            # Skip terminator
-            if i < len(result) and result[i] == 0x00:
-                i += 1
-
+            result[reloc.offset] = (addr >> 8) & 0xFF
+            result[reloc.offset + 1] = addr & 0xFF
         return bytes(result)
 
     def build_story_file(self, routines: bytes, objects: bytes = b'',
@@ -1462,29 +173,17 @@ class ZAssembler:
                         abbreviations_table=None, string_table=None,
                         table_data: bytes = b'',
                         table_offsets: dict = None,
-                        tables_with_placeholders: list = None,
                         impure_tables_size: int = None,
-                        routine_fixups: list = None,
-                        table_routine_fixups: list = None,
-                        property_routine_fixups: list = None,
+                        code_relocations: list = None,
                         extension_table: bytes = b'',
                         alphabet_table: bytes = b'',
-                        string_placeholders: dict = None,
-                        tell_string_placeholders: dict = None,
-                        tell_placeholder_positions: list = None,
                         vocab_fixups: list = None,
                         vword_fixups: list = None,
                         tchars_table_idx: int = None,
-                        dir_prop_min: int = None,
-                        string_code_index_max: int = None,
-                        string_data_placeholders: dict = None,
-                        table_string_fixups: list = None,
                         table_addr_fixups: list = None,
-                        prop_dict_fixups: list = None,
-                        property_routine_positional_fixups: list = None,
-                        vocab_positional_fixups: list = None,
-                        table_vocab_fixups: list = None,
-                        global_vocab_fixups: list = None) -> bytes:
+                        global_relocations: list = None,
+                        table_relocations: list = None,
+                        object_relocations: list = None) -> bytes:
         """
         Build complete story file.
 
@@ -1497,25 +196,21 @@ class ZAssembler:
             string_table: StringTable instance (optional, for deduplication)
             table_data: TABLE/LTABLE/ITABLE data (sorted: impure, parser, pure)
             table_offsets: Dict mapping table index to offset within table_data
-            tables_with_placeholders: List of (start, end) byte ranges containing table address placeholders
             impure_tables_size: Size of impure tables section (dynamic memory).
                                 Parser/pure tables start at this offset in static memory.
-            routine_fixups: List of (code_offset, routine_offset) for call address patching
-            table_routine_fixups: List of (table_offset, routine_offset) for table routine addresses
-            property_routine_fixups: List of (placeholder_idx, routine_offset) for object property routine addresses
+            code_relocations: Relocations into the routine code (routine, string
+                and vocab addresses), recorded by the code generator
             extension_table: Header extension table bytes (V5+)
-            string_placeholders: Dict mapping placeholder index to string text for operand resolution (0xFC format)
-            tell_string_placeholders: Dict mapping placeholder index to string text for TELL resolution (0x8D format)
-            tell_placeholder_positions: List of (byte_offset, placeholder_idx) for position-based TELL resolution
             vocab_fixups: List of (placeholder_idx, word_offset) for W?* vocabulary word resolution
             vword_fixups: List of (placeholder_idx, table_index) for NEW-PARSER? VWORD table resolution
             tchars_table_idx: Table index for TCHARS constant (terminating characters, header 0x2E)
-            vocab_positional_fixups: (code_offset, full_idx) vocab markers in ROUTINE
-                code, recorded at emission -- resolved point-wise, no 8-bit limit
-            table_vocab_fixups: (table_idx, byte_offset, full_idx) vocab markers in
-                TABLE data, recorded at encode time
-            global_vocab_fixups: (globals_data_offset, full_idx) vocab markers in
-                the GLOBALS region
+            global_relocations: Relocations into globals_data (table, dictionary,
+                string and vocab addresses), recorded by the code generator
+            table_relocations: Relocations into table_data (routine, string and
+                vocab addresses), recorded by the code generator
+            object_relocations: Relocations into the object table's property
+                data (routine, string, vocab, table and dictionary addresses),
+                recorded by the object table builder
 
         Returns:
             Complete story file as bytes
@@ -1524,10 +219,6 @@ class ZAssembler:
         if table_offsets is None:
             table_offsets = {}
 
-        # Initialize tables_with_placeholders if not provided
-        if tables_with_placeholders is None:
-            tables_with_placeholders = []
-
         # Start with header
         story = self.create_header()
 
@@ -1586,8 +277,8 @@ class ZAssembler:
                 static_base_precalc += 1
 
         # Publish the impure/pure split NOW: _table_data_addr consults these
-        # attrs, and the property-table 0xFD00 placeholder pass runs BEFORE
-        # the later (re)assignment near the table-emission code. With an ODD
+        # attrs, and the table passes below run BEFORE the later
+        # (re)assignment near the table-emission code. With an ODD
         # impure region the pure tables sit one alignment byte later than
         # table_base + offset, so every property value pointing at a pure
         # table (hollywood's THINGS pseudo tables) was one byte short and
@@ -1595,24 +286,6 @@ class ZAssembler:
         self._impure_tables_size = impure_tables_size
         self._pure_table_base = static_base_precalc
 
-        # Pre-calculate dictionary address for VOCAB global resolution
-        # Dictionary comes after: pure tables
-        dict_addr_precalc = static_base_precalc
-        pure_tables_size = len(table_data) - impure_tables_size if table_data else 0
-        if pure_tables_size > 0:
-            dict_addr_precalc += pure_tables_size
-            if dict_addr_precalc % 2 != 0:
-                dict_addr_precalc += 1
-
-        # Patch globals_data with actual table addresses and VOCAB
-        # For tables in the sorted data:
-        # - Impure tables (offset < impure_tables_size): address = table_base_addr + offset
-        # - Pure tables (offset >= impure_tables_size): address = static_base_precalc + (offset - impure_tables_size)
-        globals_data = self._resolve_table_placeholders_split(
-            globals_data, table_base_addr, static_base_precalc, table_offsets,
-            impure_tables_size, dict_addr_precalc
-        )
-
         globals_addr = current_addr
         globals_len = len(globals_data)
         story.extend(globals_data)
@@ -1669,37 +342,6 @@ class ZAssembler:
             prop_defaults_size = (31 if self.version <= 3 else 63) * 2
             obj_entry_size = 9 if self.version <= 3 else 14
 
-            # Calculate dictionary address ahead of time to resolve property placeholders
-            # Dictionary is in static memory: after objects, tables, and extension table
-            objects_end = current_addr + len(objects_fixed)
-            if objects_end % 2 != 0:
-                objects_end += 1  # Account for padding
-            # The table blob is written in TWO pieces -- impure tables, then
-            # (V5+) alphabet/extension, then pure tables -- with an even
-            # alignment pad after EACH.  Summing len(table_data) with a single
-            # trailing align undercounts by up to 2 bytes whenever a piece has
-            # odd length, and every SYNONYM/ADJECTIVE word address in the
-            # object property tables then points into the middle of a
-            # dictionary entry (hollywood: 3,107 impure + 4,535 pure, both
-            # odd -> 2 bytes low -> the parser could not see ANY object).
-            # dict_addr_precalc above already stages it correctly; reuse it.
-            dict_addr_calc = dict_addr_precalc
-
-            # Resolve dictionary word placeholders in property tables BEFORE
-            # fixing up property table addresses (since the resolver uses relative offsets)
-            # Placeholders are marked with 0x8000 bit set (SYNONYM), 0xFE00 (ADJECTIVE),
-            # or 0xFB00 (VOC from PROPDEF) - the low bits contain word offset or index
-            objects_fixed = bytearray(self._resolve_dict_placeholders(
-                bytes(objects_fixed), dict_addr_calc, prop_defaults_size, vocab_fixups,
-                dir_prop_min, prop_dict_fixups
-            ))
-
-            # Resolve table address placeholders (0xFD00 | table_idx) in property values
-            if table_offsets:
-                objects_fixed = bytearray(self._resolve_property_table_placeholders(
-                    bytes(objects_fixed), table_offsets, table_base_addr, prop_defaults_size
-                ))
-
             # Calculate number of objects
             # Find first property table address to determine where object entries end
             if len(objects_fixed) > prop_defaults_size + 7:
@@ -1748,93 +390,14 @@ class ZAssembler:
         # every resolver must switch base at the impure/pure boundary.
         self._impure_tables_size = impure_tables_size
         self._pure_table_base = static_base_precalc
-        table_data_start = 0  # Track position for later string placeholder resolution
-        table_data_len = 0
         impure_story_start = 0  # Story position where impure tables are added
         pure_story_start = 0    # Story position where pure tables are added
 
         if table_data:
-            # Calculate dictionary address for resolving vocab placeholders in tables
-            # Account for: impure tables + alignment + extension table + alignment + pure tables + alignment
-            dict_addr_for_tables = current_addr + len(impure_table_data)
-            if dict_addr_for_tables % 2 != 0:
-                dict_addr_for_tables += 1  # Account for alignment
-            # Add extension table size (V5+)
-            if extension_table and self.version >= 5:
-                dict_addr_for_tables += len(extension_table)
-                if dict_addr_for_tables % 2 != 0:
-                    dict_addr_for_tables += 1
-            # Add pure tables size
-            dict_addr_for_tables += len(pure_table_data)
-            if pure_table_data and dict_addr_for_tables % 2 != 0:
-                dict_addr_for_tables += 1
-
-            # Resolve VWORD placeholders in table data first (NEW-PARSER? mode)
-            # This must happen before vocab_fixups so vword placeholders get VWORD addresses
-            # Positions either pass patches are shared so the second pass can't
-            # misread a resolved address whose low byte is 0xFB.
-            table_patched_positions = set()
-
-            # POSITIONAL vocab markers in table data: exact (table, offset)
-            # pairs recorded at encode time carrying the FULL index (the
-            # marker's low byte cannot hold indices >= 256 -- trinity has
-            # 374 distinct W? words). Applied before the legacy scans, whose
-            # shared patched-position set then skips these bytes.
-            if table_vocab_fixups and table_offsets:
-                _vmap_t = dict(vocab_fixups or [])
-                _wmap_t = dict(vword_fixups or [])
-                _tba = bytearray(table_data)
-                for _tidx, _toff, _fidx in table_vocab_fixups:
-                    if _tidx not in table_offsets:
-                        continue
-                    _pos = table_offsets[_tidx] + _toff
-                    if _pos + 1 >= len(_tba) or _pos in table_patched_positions:
-                        continue
-                    # Validate the canonical marker bytes before patching.
-                    if _tba[_pos] != 0xFB or _tba[_pos + 1] != (_fidx & 0xFF):
-                        continue
-                    _addr = self._vocab_idx_addr(
-                        _fidx, _vmap_t, _wmap_t, dict_addr_for_tables,
-                        table_base_addr, table_offsets)
-                    if _addr is None:
-                        continue
-                    _tba[_pos] = (_addr >> 8) & 0xFF
-                    _tba[_pos + 1] = _addr & 0xFF
-                    table_patched_positions.add(_pos)
-                    table_patched_positions.add(_pos + 1)
-                table_data = bytes(_tba)
-                impure_table_data = table_data[:impure_tables_size]
-                pure_table_data = table_data[impure_tables_size:]
-
-            if vword_fixups and table_offsets:
-                table_data = self._resolve_table_vword_placeholders(
-                    table_data, vword_fixups, table_base_addr, table_offsets,
-                    table_patched_positions
-                )
-                # Re-split after resolution
-                impure_table_data = table_data[:impure_tables_size]
-                pure_table_data = table_data[impure_tables_size:]
-
-            # Resolve vocabulary word placeholders in table data (all tables)
-            if vocab_fixups:
-                table_data = self._resolve_table_vocab_placeholders(
-                    table_data, vocab_fixups, dict_addr_for_tables,
-                    table_patched_positions
-                )
-                # Re-split after resolution
-                impure_table_data = table_data[:impure_tables_size]
-                pure_table_data = table_data[impure_tables_size:]
-
             # Positional table-address fixups (VERBS -> syntax-entry blob):
             # patch the word at dst_table+dst_offset with the address of
             # src_table + addend. Positions recorded at encode time -- no
             # scanning, no 8-bit index limit.
-            # Byte positions (within table_data) written by the positional
-            # address fixups.  They hold RESOLVED addresses, so the
-            # byte-stepped 0xFC string scan must not rescan them -- a pointer
-            # whose low byte is 0xFC (cutthroats' VERBS slot 0x35FC) was eaten
-            # as a string marker together with the next slot's high byte.
-            _table_addr_positions = set()
             if table_addr_fixups and table_offsets:
                 table_data = bytearray(table_data)
                 for dst_idx, dst_off, src_idx, addend in table_addr_fixups:
@@ -1845,7 +408,7 @@ class ZAssembler:
                     # boundary with an even-alignment pad (and the V5+
                     # extension table) in between, so a PURE table's address
                     # is NOT table_base_addr + offset.  Use the same split
-                    # formula as _resolve_table_placeholders_split; otherwise
+                    # formula as _table_data_addr; otherwise
                     # every pure-table pointer is short by the pad whenever
                     # impure_tables_size is odd (hollywood: 3,107 -> every
                     # VERBS syntax-entry pointer one byte low -> every verb
@@ -1858,35 +421,10 @@ class ZAssembler:
                     if pos + 1 < len(table_data):
                         table_data[pos] = (addr >> 8) & 0xFF
                         table_data[pos + 1] = addr & 0xFF
-                        _table_addr_positions.add(pos)
-                        _table_addr_positions.add(pos + 1)
                 table_data = bytes(table_data)
                 impure_table_data = table_data[:impure_tables_size]
                 pure_table_data = table_data[impure_tables_size:]
 
-            # Resolve table address placeholders within VERBS table data
-            # (VERBS table contains pointers to syntax entry tables)
-            # Only apply to tables known to contain placeholders to avoid corrupting
-            # user data that happens to contain 0xFF bytes
-            if table_offsets and tables_with_placeholders:
-                # Only resolve for tables that explicitly contain placeholders
-                for table_start, table_end in tables_with_placeholders:
-                    if table_start < len(table_data):
-                        segment = bytearray(table_data[table_start:table_end])
-                        segment = self._resolve_table_placeholders(
-                            segment, table_base_addr, table_offsets, dict_addr_for_tables
-                        )
-                        table_data = bytearray(table_data)
-                        table_data[table_start:table_end] = segment
-                        table_data = bytes(table_data)
-                        # Re-split after resolution
-                        impure_table_data = table_data[:impure_tables_size]
-                        pure_table_data = table_data[impure_tables_size:]
-
-            # Track table data position for later string placeholder resolution
-            table_data_start = len(story)
-            table_data_len = len(table_data)
-
             # Add impure tables to dynamic memory
             impure_story_start = len(story)
             if impure_table_data:
@@ -1962,47 +500,6 @@ class ZAssembler:
             story.extend(dictionary)
             current_addr += len(dictionary)
 
-        # POSITIONAL vocab markers in the GLOBALS region: exact offsets
-        # recorded at emission with the FULL index. Patched bytes join a
-        # skip set so the legacy word-aligned scans below cannot misread a
-        # resolved address whose high byte happens to be 0xFB.
-        _gv_patched = set()
-        if global_vocab_fixups and globals_len > 0:
-            _vmap_g = dict(vocab_fixups or [])
-            _wmap_g = dict(vword_fixups or [])
-            for _goff, _fidx in global_vocab_fixups:
-                if _goff + 1 >= globals_len:
-                    continue
-                _pos = globals_addr + _goff
-                if _pos + 1 >= len(story):
-                    continue
-                if story[_pos] != 0xFB or story[_pos + 1] != (_fidx & 0xFF):
-                    continue
-                _addr = self._vocab_idx_addr(
-                    _fidx, _vmap_g, _wmap_g, dict_addr,
-                    table_base_addr, table_offsets)
-                if _addr is None:
-                    continue
-                story[_pos] = (_addr >> 8) & 0xFF
-                story[_pos + 1] = _addr & 0xFF
-                _gv_patched.add(_pos)
-
-        # Resolve vocab placeholders in globals data now that dict_addr is known
-        # (vocab placeholders are 0xFB00 | index, need to be patched to actual addresses)
-        if vocab_fixups and globals_len > 0:
-            self._resolve_vocab_placeholders_in_story(
-                story, vocab_fixups, dict_addr, globals_addr, globals_len,
-                skip_positions=_gv_patched
-            )
-
-        # Resolve VWORD table placeholders in NEW-PARSER? mode
-        # (same 0xFB00 format but resolves to table addresses instead of dictionary)
-        if vword_fixups and globals_len > 0 and table_offsets:
-            self._resolve_vword_placeholders_in_story(
-                story, vword_fixups, table_base_addr, table_offsets, globals_addr, globals_len,
-                skip_positions=_gv_patched
-            )
-
         # Align to even boundary
         while len(story) % 2 != 0:
             story.append(0)
@@ -2035,172 +532,10 @@ class ZAssembler:
                 story.append(0)
             # Don't update high_mem_base - routines_offset needs the original value
 
-        # Resolve table routine fixups (for ACTIONS table packed addresses)
-        # Now that we know high_mem_base, patch table data with routine addresses
-        table_routine_patched = set()
-        # Positional table-ADDRESS fixups (VERBS -> syntax blob) are resolved
-        # data as well: protect their bytes from the byte-stepped 0xFC scan.
-        for _tapos in locals().get('_table_addr_positions', ()) or ():
-            if _tapos < impure_tables_size:
-                _saspos = impure_story_start + _tapos
-            else:
-                _saspos = pure_story_start + (_tapos - impure_tables_size)
-            if _saspos + 1 < len(story):
-                table_routine_patched.add(_saspos)
-                table_routine_patched.add(_saspos + 1)
-        if table_routine_fixups and table_data:
-            for table_offset, routine_offset in table_routine_fixups:
-                # Calculate actual byte address of routine
-                actual_addr = self.high_mem_base + routine_offset
-
-                # Convert to packed address based on version
-                if self.version <= 3:
-                    packed_addr = actual_addr // 2
-                elif self.version <= 5:
-                    packed_addr = actual_addr // 4
-                elif self.version <= 7:
-                    # V6-7 use routines_offset, with 4-byte padding before first routine
-                    packed_addr = (4 + routine_offset) // 4
-                else:
-                    packed_addr = actual_addr // 8
-
-                # Determine story offset based on whether table is in impure or pure section
-                if table_offset < impure_tables_size:
-                    # Impure table: in dynamic memory section
-                    story_offset = impure_story_start + table_offset
-                else:
-                    # Pure table: in static memory section
-                    story_offset = pure_story_start + (table_offset - impure_tables_size)
-
-                if story_offset + 1 < len(story):
-                    story[story_offset] = (packed_addr >> 8) & 0xFF
-                    story[story_offset + 1] = packed_addr & 0xFF
-                    # These bytes are a RESOLVED packed routine address; the
-                    # byte-stepped 0xFC string scan over table data must not
-                    # rescan them (PRE-BOARD packed 0x4bfc: 'fc 00' was eaten
-                    # as string placeholder 0 and PREACTIONS[30] broke).
-                    table_routine_patched.add(story_offset)
-                    table_routine_patched.add(story_offset + 1)
-
-        # POSITIONAL property-routine fixups (>256 distinct routines):
-        # (obj_idx, prop_num, byte_off, routine_byte_offset) recorded at
-        # emission, patched point-wise -- mirrors prop_dict_fixups.  When
-        # supplied, the legacy 0xFA scan below never runs (the compiler
-        # passes an empty property_routine_fixups list).
-        # Story-absolute positions in the OBJECTS region already resolved by
-        # an earlier pass (dict words, property routines). Later in-band
-        # property scans (0xFA routine scan, 0xF4-0xF7/0xFC string scan) must
-        # skip them: a resolved dictionary address like trinity's 'walkie'
-        # entry at 0xF5AE is legal data that aliases the string band.
-        _prop_story_patched = set(
-            objects_addr + _po
-            for _po in (getattr(self, '_prop_dict_patched', None) or ()))
-
-        if property_routine_positional_fixups and objects:
-            obj_entry_sz = 9 if self.version <= 3 else 14
-            entries_base = objects_addr + prop_defaults_size
-            for _oi, _pn2, _boff, _roff in property_routine_positional_fixups:
-                actual_addr = self.high_mem_base + _roff
-                if self.version <= 3:
-                    packed_addr = actual_addr // 2
-                elif self.version <= 5:
-                    packed_addr = actual_addr // 4
-                elif self.version <= 7:
-                    packed_addr = (4 + _roff) // 4
-                else:
-                    packed_addr = actual_addr // 8
-                ptr_at = entries_base + _oi * obj_entry_sz + obj_entry_sz - 2
-                if ptr_at + 1 >= len(story):
-                    continue
-                pt = (story[ptr_at] << 8) | story[ptr_at + 1]
-                if not (0 < pt < len(story)):
-                    continue
-                p = pt + 1 + 2 * story[pt]  # skip short-name
-                while p < len(story) and story[p] != 0:
-                    sz = story[p]
-                    if self.version <= 3:
-                        dlen = (sz >> 5) + 1
-                        pn = sz & 0x1F
-                        p += 1
-                    else:
-                        if sz & 0x80:
-                            dlen = story[p + 1] & 0x3F or 64
-                            pn = sz & 0x3F
-                            p += 2
-                        else:
-                            dlen = 2 if (sz & 0x40) else 1
-                            pn = sz & 0x3F
-                            p += 1
-                    if pn == _pn2:
-                        j = p + _boff
-                        # Guard: the builder may have truncated the property.
-                        if j + 1 < len(story) and _boff + 1 < dlen:
-                            story[j] = (packed_addr >> 8) & 0xFF
-                            story[j + 1] = packed_addr & 0xFF
-                            _prop_story_patched.add(j)
-                            _prop_story_patched.add(j + 1)
-                        break
-                    p += dlen
-
-        # Resolve property routine placeholders in object data
-        # Now that we know high_mem_base, we can patch 0xFA00 | idx values
-        # with actual packed routine addresses
-        if property_routine_fixups and objects:
-            # Build lookup: placeholder_idx -> packed_routine_address
-            fixup_map = {}
-            for placeholder_idx, routine_offset in property_routine_fixups:
-                # Calculate actual byte address of routine
-                actual_addr = self.high_mem_base + routine_offset
-
-                # Convert to packed address based on version
-                if self.version <= 3:
-                    packed_addr = actual_addr // 2
-                elif self.version <= 5:
-                    packed_addr = actual_addr // 4
-                elif self.version <= 7:
-                    # V6-7 use routines_offset, with 4-byte padding before first routine
-                    packed_addr = (4 + routine_offset) // 4
-                else:
-                    packed_addr = actual_addr // 8
-
-                fixup_map[placeholder_idx] = packed_addr
-
-            # Patch 0xFA00|idx markers inside PROPERTY DATA only, by walking each
-            # object's property table. The old byte-blind scan covered the WHOLE
-            # objects region including the entry headers -- an object whose
-            # property-table pointer low byte happened to be 0xFA (minizork's
-            # CELLAR at 0x15FA) had its pointer rewritten to a routine address,
-            # so the room printed a garbage name and its neighbor's description.
-            self._walk_property_data(
-                story, objects_addr, len(objects), prop_defaults_size,
-                lambda j: (fixup_map.get(story[j + 1])
-                           if story[j] == 0xFA
-                           and j not in _prop_story_patched else None))
-
-        # Byte positions in `routines` that any resolution pass has already
-        # written. Later scanners (vocab/vword) must skip them: resolved packed
-        # string addresses can contain 0xFB/0xFC bytes that look like
-        # placeholders (see _resolve_vocab_placeholders).
-        code_patched_positions = set()
-
-        # If string table is present, add string table after routines and resolve markers
+        # If string table is present, add string table after routines
         if string_table is not None:
-            # Calculate final routine length AFTER marker resolution
-            # Each marker (0x8D 0xFF 0xFE <len16> <text>) becomes 3 bytes (0x8D <addr16>)
-            # So we shrink by (5 + text_len - 3) = (2 + text_len) per marker
+            # Relocations patch the routine code in place: its length is final.
             final_routines_len = len(routines)
-            i = 0
-            while (not tell_placeholder_positions) and i < len(routines):
-                if (i + 4 < len(routines) and
-                    routines[i] == 0x8D and
-                    routines[i+1] == 0xFF and
-                    routines[i+2] == 0xFE):
-                    text_len = routines[i+3] | (routines[i+4] << 8)
-                    # This marker will shrink from (5 + text_len) to 3 bytes
-                    final_routines_len -= (2 + text_len)
-                    i += 5 + text_len
-                else:
-                    i += 1
 
             # Now calculate where string table will be located
             # For V6-7, add 4 bytes for padding before routines
@@ -2242,165 +577,52 @@ class ZAssembler:
                 strings_offset = self.high_mem_base // 8
                 string_table.set_strings_offset(strings_offset)
 
-            # Now resolve string table markers with correct addresses
-            # Pass tell_string_placeholders and positions to handle the 0x8D format (TELL strings)
-            # Using position-based resolution to avoid false matches when 0x8D appears as operand data
-            # Every byte these passes write is recorded in code_patched_positions:
-            # a packed string address may legally contain 0xFB/0xFC bytes, and the
-            # later vocab/vword scanners must not misread them as placeholders
-            # (zork1's PARSER had a je branch clobbered exactly this way).
-            routines = self._resolve_string_markers(
-                routines, string_table, tell_string_placeholders, tell_placeholder_positions,
-                patched_positions=code_patched_positions
-            )
-
-            # Resolve string operand placeholders (0xFC00 | index -> packed address)
-            if string_placeholders:
-                routines = self._resolve_string_placeholders(
-                    routines, string_placeholders, string_table,
-                    string_code_index_max,
-                    patched_positions=code_patched_positions
-                )
-
-            # Point-wise OVERFLOW string markers in ROUTINE code (data band /
-            # ext band, used once the 256-slot 0xFC00 band is full). Only
-            # positions discovered structurally at generation time are
-            # patched -- no byte scan can safely match these bands in code.
-            _csm = getattr(self, '_code_string_marker_fixups', None)
-            _sde = getattr(self, '_string_data_ext', {}) or {}
-            if _csm and string_table is not None:
-                _sdp = string_data_placeholders or {}
-                _rba = bytearray(routines)
-                for _off, _w in _csm:
-                    if _off + 1 >= len(_rba) or _off in code_patched_positions:
-                        continue
-                    if ((_rba[_off] << 8) | _rba[_off + 1]) != _w:
-                        continue
-                    if 0xF400 <= _w <= 0xF7FF:
-                        _text = _sdp.get(_w & 0x3FF)
-                    else:
-                        _text = _sde.get(_w)
-                    if _text is None:
-                        continue
-                    _paddr = string_table.get_packed_address(_text, self.version)
-                    if _paddr is None:
-                        continue
-                    _rba[_off] = (_paddr >> 8) & 0xFF
-                    _rba[_off + 1] = _paddr & 0xFF
-                    code_patched_positions.add(_off)
-                    code_patched_positions.add(_off + 1)
-                routines = bytes(_rba)
-
-            # String markers inside TABLE data are resolved ONLY at the exact
-            # offsets the codegen recorded at emission (_table_string_fixups),
-            # NEVER by a byte-stepped scan.  The byte scan for the 0xFC code-
-            # string prefix false-matched the LOW byte of any literal word
-            # ending in 0xFC: Suspect's COCHRANE-LOOP <TABLE 0 6 -4 BALLROOM-1
-            # 6 -4 BALLROOM-9 0> stores -4 as 0xFFFC, and the 'fc 00' straddling
-            # that -4 and the following (small) room number was eaten as string
-            # placeholder 0, corrupting both words with the packed address of
-            # string 0 (a build-dependent value once inline-string offsets
-            # shift).  Data-string (0xF4-0xF7) and code-string (0xFC) markers in
-            # tables are BOTH recorded point-wise below, so a literal is never
-            # confused with a marker that happens to share a marker byte.
-            if table_string_fixups and table_offsets and (
-                    string_data_placeholders or string_placeholders):
-                _sdp = string_data_placeholders or {}
-                _sp = string_placeholders or {}
-                _sde2 = getattr(self, '_string_data_ext', {}) or {}
-                for _tidx, _off in table_string_fixups:
-                    if _tidx not in table_offsets:
-                        continue
-                    toff = table_offsets[_tidx] + _off
-                    if toff < impure_tables_size:
-                        pos = impure_story_start + toff
-                    else:
-                        pos = pure_story_start + (toff - impure_tables_size)
-                    if pos + 1 >= len(story):
-                        continue
-                    w = (story[pos] << 8) | story[pos + 1]
-                    if 0xF400 <= w <= 0xF7FF or w in _sde2:
-                        text = (_sdp.get(w & 0x3FF) if w >= 0xF400
-                                else _sde2.get(w))
-                    elif 0xFC00 <= w <= 0xFCFF:
-                        text = _sp.get(w & 0xFF)
-                    else:
-                        text = None
-                    if text is not None:
-                        paddr = string_table.get_packed_address(text, self.version)
-                        if paddr is not None:
-                            story[pos] = (paddr >> 8) & 0xFF
-                            story[pos + 1] = paddr & 0xFF
-
-            # Also resolve string placeholders in the globals table: a global
-            # initialized to a string constant (<GLOBAL X "text">) holds a 0xFC00|idx
-            # placeholder that must become the packed string address.
-            if (string_placeholders or string_data_placeholders) and globals_len > 0:
-                self._resolve_string_placeholders_in_story(
-                    story, string_placeholders or {}, string_table,
-                    globals_addr, globals_len,
-                    data_placeholders=string_data_placeholders,
-                    skip_positions=_gv_patched
-                )
-
-            # And in object property data: classic direction exits (NEXIT/CEXIT/
-            # DEXIT) embed their refusal-message string address in the property.
-            if (string_placeholders or string_data_placeholders) and objects:
-                self._resolve_string_placeholders_in_properties(
-                    story, objects_addr, len(objects), prop_defaults_size,
-                    string_placeholders or {}, string_table,
-                    data_placeholders=string_data_placeholders,
-                    skip_positions=_prop_story_patched
-                )
-
-        # Resolve routine call fixups (patch call addresses)
-        # Remember which byte positions now hold routine packed addresses -- the
-        # position-blind vocab/vword scanners below must not touch them, or a
-        # routine address containing 0xFB (a legal low byte, e.g. LIT? at 0x39FB)
-        # gets misread as a W?* placeholder and every call to it is silently
-        # redirected. Both bytes of each 2-byte operand are protected, as are
-        # all bytes the string-resolution passes wrote (code_patched_positions).
-        protected_positions = set(code_patched_positions)
-        if routine_fixups:
-            routines = self._resolve_routine_fixups(routines, routine_fixups)
-            for code_offset, _routine_offset in routine_fixups:
-                protected_positions.add(code_offset)
-                protected_positions.add(code_offset + 1)
-
-        # POSITIONAL vocab markers in ROUTINE code: exact offsets recorded at
-        # emission with the FULL index (no 8-bit limit, no in-band collision).
-        # Patched bytes join protected_positions so the legacy scans below
-        # (kept as a backup for anything a desync fallback missed) skip them.
-        if vocab_positional_fixups and (vocab_fixups or vword_fixups):
-            _vmap_c = dict(vocab_fixups or [])
-            _wmap_c = dict(vword_fixups or [])
-            _rvb = bytearray(routines)
-            for _coff, _fidx in vocab_positional_fixups:
-                if _coff + 1 >= len(_rvb) or _coff in protected_positions:
-                    continue
-                # Validate the canonical marker bytes before patching.
-                if _rvb[_coff] != 0xFB or _rvb[_coff + 1] != (_fidx & 0xFF):
-                    continue
-                _addr = self._vocab_idx_addr(
-                    _fidx, _vmap_c, _wmap_c, dict_addr,
-                    table_base_addr, table_offsets)
-                if _addr is None:
-                    continue
-                _rvb[_coff] = (_addr >> 8) & 0xFF
-                _rvb[_coff + 1] = _addr & 0xFF
-                protected_positions.add(_coff)
-                protected_positions.add(_coff + 1)
-            routines = bytes(_rvb)
-
-        # Resolve vocabulary word placeholders (W?* -> dictionary addresses)
-        if vocab_fixups:
-            routines = self._resolve_vocab_placeholders(routines, vocab_fixups, dict_addr,
-                                                        protected_positions)
-
-        # Resolve VWORD table placeholders (NEW-PARSER? mode: W?* -> table addresses)
-        if vword_fixups and table_offsets:
-            routines = self._resolve_vword_placeholders(routines, vword_fixups, table_base_addr,
-                                                       table_offsets, protected_positions)
+        # Every address the image refers to -- routines, strings, dictionary
+        # words, VWORD tables and tables -- was recorded by the builder that
+        # wrote its marker; patch them all in one pass.  Nothing scans a
+        # section for marker-like bytes: a jump offset, a literal or a
+        # resolved address holding 0xF0/0xFB/0xFC is left alone.
+        _vmap = dict(vocab_fixups or [])
+        _wmap = dict(vword_fixups or [])
+        resolvers = dict(
+            string_table=string_table,
+            vocab_addr=lambda idx: self._vocab_idx_addr(
+                idx, _vmap, _wmap, dict_addr, table_base_addr, table_offsets),
+            table_addr=lambda idx: (
+                self._table_data_addr(table_base_addr, table_offsets[idx])
+                if idx in table_offsets else None),
+            dict_addr=dict_addr)
+        self.unresolved_relocations = []
+        if code_relocations:
+            routines = self.apply_relocations(
+                routines, code_relocations, **resolvers)
+        if global_relocations:
+            story[globals_addr:globals_addr + globals_len] = self.apply_relocations(
+                story[globals_addr:globals_addr + globals_len],
+                global_relocations, **resolvers)
+        if table_relocations and table_data:
+            # table_data offsets: the impure part and the pure part sit
+            # apart in the image, so patch them as one section and split.
+            pure_len = len(table_data) - impure_tables_size
+            tables = self.apply_relocations(
+                story[impure_story_start:impure_story_start + impure_tables_size]
+                + story[pure_story_start:pure_story_start + pure_len],
+                table_relocations, **resolvers)
+            story[impure_story_start:impure_story_start + impure_tables_size] = \
+                tables[:impure_tables_size]
+            story[pure_story_start:pure_story_start + pure_len] = \
+                tables[impure_tables_size:]
+        if object_relocations:
+            story[objects_addr:objects_addr + len(objects)] = self.apply_relocations(
+                story[objects_addr:objects_addr + len(objects)],
+                object_relocations, **resolvers)
+        if self.unresolved_relocations:
+            # Each one would leave a marker word where an address belongs.
+            raise ValueError(
+                f"{len(self.unresolved_relocations)} relocation(s) did not "
+                f"resolve: " + ", ".join(
+                    f"{r.kind} {r.target!r} at {r.section}+0x{r.offset:04x}"
+                    for r in self.unresolved_relocations[:5]))
 
         # Add routines
         story.extend(routines)
@@ -8,6 +8,8 @@ from typing import List, Dict, Any, Tuple
 import re
 import struct
 
+from .relocations import OBJECTS, Relocation
+
 
 class ByteValue:
     """Wrapper to indicate a value should be stored as a single byte, not a word.
@@ -27,18 +29,28 @@ class ObjectTable:
         self.string_table = string_table  # Optional StringTable for deduplication
         self.objects: List[Dict[str, Any]] = []
         self.property_defaults = [0] * (31 if version <= 3 else 63)
+        # Relocations for the marker words in property data, offsets into
+        # the bytes build() returns; filled in by build().
+        self.relocations: List[Relocation] = []
 
     def add_object(self, name: str, parent: int = 0, sibling: int = 0,
                    child: int = 0, attributes: int = 0,
-                   properties: Dict[int, Any] = None):
-        """Add an object to the table."""
+                   properties: Dict[int, Any] = None,
+                   marks: List[Tuple[int, int, str, Any]] = None):
+        """Add an object to the table.
+
+        marks are the (prop_num, byte_offset, kind, target) marker words
+        written into the property values; build() turns them into
+        relocations.
+        """
         self.objects.append({
             'name': name,
             'parent': parent,
             'sibling': sibling,
             'child': child,
             'attributes': attributes,
-            'properties': properties or {}
+            'properties': properties or {},
+            'marks': marks or []
         })
 
     def build(self) -> bytes:
@@ -67,8 +79,10 @@ class ObjectTable:
 
         # Build all property tables first to know their addresses
         property_tables = []
+        data_at = []
         for obj in self.objects:
-            prop_table = self.build_property_table(obj)
+            data_at.append({})
+            prop_table = self.build_property_table(obj, data_at[-1])
             property_tables.append(prop_table)
 
         # Now build object entries with correct property table addresses
@@ -78,8 +92,16 @@ class ObjectTable:
 
         object_entries = bytearray()
         current_prop_addr = prop_table_base_addr
+        self.relocations = []
 
         for i, obj in enumerate(self.objects):
+            # A mark past the end of its property was cut off with the data
+            # (V3 caps a property at 8 bytes).
+            for prop_num, offset, kind, target in obj['marks']:
+                at = data_at[i].get(prop_num)
+                if at is not None and offset + 2 <= at[1]:
+                    self.relocations.append(Relocation(
+                        OBJECTS, current_prop_addr + at[0] + offset, kind, target))
             if self.version <= 3:
                 # V1-3: 9 bytes per object
                 # 4 bytes attributes (32 bits)
@@ -114,9 +136,13 @@ class ObjectTable:
 
         return bytes(result)
 
-    def build_property_table(self, obj: Dict[str, Any]) -> bytes:
+    def build_property_table(self, obj: Dict[str, Any],
+                             data_at: Dict[int, Tuple[int, int]] = None) -> bytes:
         """Build a property table for an object.
 
+        If data_at is given, it is filled with prop_num -> (offset of the
+        property data in the table, data length).
+
         Format (V1-3):
         - Byte 0: Text length (number of 2-byte words)
         - Bytes 1+: Object name (Z-encoded text)
@@ -209,6 +235,8 @@ class ObjectTable:
                     prop_table.append(size_byte1)
                     prop_table.append(size_byte2)
                     prop_table.extend(prop_data)
+            if data_at is not None:
+                data_at[prop_num] = (len(prop_table) - data_length, data_length)
 
         # Terminator
         prop_table.append(0x00)
@@ -0,0 +1,37 @@
+"""
+Relocation records for the generated story image.
+
+An address the compiler cannot know yet -- a routine's packed address, a
+string's packed address, a dictionary word, a table -- is written as an
+in-band marker word, and the place it was written is recorded.  Once a
+section is final its builder turns those records into Relocations: where
+to patch (section, offset), what kind of address goes there and which
+target it names.  ZAssembler.apply_relocations() then patches them in one
+pass, without looking at any other byte of the image.
+"""
+
+from dataclasses import dataclass
+from typing import Hashable
+
+# Sections a relocation can patch.
+CODE = 'code'           # the routine code
+GLOBALS = 'globals'     # the globals table
+OBJECTS = 'objects'     # the object table, property tables included
+TABLES = 'tables'       # the sorted table data (impure, then pure)
+
+# Relocation kinds.
+ROUTINE = 'routine'     # target: byte offset of the routine in the code
+STRING = 'string'       # target: text of a string in the string table
+VOCAB = 'vocab'         # target: full vocabulary placeholder index
+TABLE = 'table'         # target: table index
+DICT = 'dict'           # target: byte offset of a word in the dictionary
+
+
+@dataclass(frozen=True)
+class Relocation:
+    """A 16-bit word at `offset` in `section` that must hold the address of
+    `target`, resolved according to `kind`."""
+    section: str
+    offset: int
+    kind: str
+    target: Hashable